@@ -0,0 +1,44 @@
+"""Add cache cost columns to stats_hourly for incremental usage rollups
+
+Revision ID: 7e8f9a0b1c2d
+Revises: 6d7e8f9a0b1c
+Create Date: 2026-02-10 12:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "7e8f9a0b1c2d"
+down_revision: str | None = "6d7e8f9a0b1c"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [c["name"] for c in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    for column_name in ("cache_creation_cost", "cache_read_cost"):
+        if not column_exists("stats_hourly", column_name):
+            op.add_column(
+                "stats_hourly",
+                sa.Column(column_name, sa.Float(), nullable=False, server_default="0"),
+            )
+
+
+def downgrade() -> None:
+    for column_name in ("cache_read_cost", "cache_creation_cost"):
+        if column_exists("stats_hourly", column_name):
+            op.drop_column("stats_hourly", column_name)
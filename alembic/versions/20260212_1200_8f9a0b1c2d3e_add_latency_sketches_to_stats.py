@@ -0,0 +1,46 @@
+"""Add latency sketch columns to hourly and daily stats
+
+Revision ID: 8f9a0b1c2d3e
+Revises: 7e8f9a0b1c2d
+Create Date: 2026-02-12 12:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8f9a0b1c2d3e"
+down_revision: str | None = "7e8f9a0b1c2d"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+TABLES = ("stats_hourly", "stats_hourly_model", "stats_hourly_provider", "stats_daily")
+COLUMNS = ("response_time_sketch", "first_byte_time_sketch")
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [c["name"] for c in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    for table_name in TABLES:
+        for column_name in COLUMNS:
+            if not column_exists(table_name, column_name):
+                op.add_column(table_name, sa.Column(column_name, sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    for table_name in TABLES:
+        for column_name in reversed(COLUMNS):
+            if column_exists(table_name, column_name):
+                op.drop_column(table_name, column_name)
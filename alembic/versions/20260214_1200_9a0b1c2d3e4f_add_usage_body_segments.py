@@ -0,0 +1,85 @@
+"""Add content-addressed usage body segment store
+
+Revision ID: 9a0b1c2d3e4f
+Revises: 8f9a0b1c2d3e
+Create Date: 2026-02-14 12:00:00.000000
+
+"""
+
+from __future__ import annotations
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from sqlalchemy import inspect
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "9a0b1c2d3e4f"
+down_revision: str | None = "8f9a0b1c2d3e"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def table_exists(table_name: str) -> bool:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    return table_name in inspector.get_table_names()
+
+
+def column_exists(table_name: str, column_name: str) -> bool:
+    bind = op.get_bind()
+    inspector = inspect(bind)
+    columns = [c["name"] for c in inspector.get_columns(table_name)]
+    return column_name in columns
+
+
+def upgrade() -> None:
+    if not table_exists("usage_body_segments"):
+        op.create_table(
+            "usage_body_segments",
+            sa.Column("hash", sa.String(32), primary_key=True),
+            sa.Column("codec", sa.String(20), nullable=False),
+            sa.Column("data", sa.LargeBinary(), nullable=False),
+            sa.Column("raw_size", sa.Integer(), nullable=False),
+            sa.Column("stored_size", sa.Integer(), nullable=False),
+            sa.Column("ref_count", sa.BigInteger(), nullable=False, server_default=sa.text("1")),
+            sa.Column(
+                "created_at",
+                sa.DateTime(timezone=True),
+                server_default=sa.text("CURRENT_TIMESTAMP"),
+                nullable=False,
+            ),
+            sa.Column("last_seen_at", sa.DateTime(timezone=True), nullable=False),
+        )
+        op.create_index(
+            "ix_usage_body_segments_last_seen_at", "usage_body_segments", ["last_seen_at"]
+        )
+
+    if not table_exists("usage_body_dictionaries"):
+        op.create_table(
+            "usage_body_dictionaries",
+            sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+            sa.Column("data", sa.LargeBinary(), nullable=False),
+            sa.Column("size", sa.Integer(), nullable=False),
+            sa.Column("sample_count", sa.Integer(), nullable=False, server_default=sa.text("0")),
+            sa.Column(
+                "created_at",
+                sa.DateTime(timezone=True),
+                server_default=sa.text("CURRENT_TIMESTAMP"),
+                nullable=False,
+            ),
+        )
+
+    if not column_exists("usage", "request_body_ref"):
+        op.add_column("usage", sa.Column("request_body_ref", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    if column_exists("usage", "request_body_ref"):
+        op.drop_column("usage", "request_body_ref")
+    if table_exists("usage_body_dictionaries"):
+        op.drop_table("usage_body_dictionaries")
+    if table_exists("usage_body_segments"):
+        op.drop_table("usage_body_segments")
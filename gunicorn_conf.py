@@ -6,7 +6,15 @@ def when_ready(server):
     """
     Called just after the server is started.
     Freeze GC before forking workers to optimize Copy-on-Write memory sharing.
+    Tokenizer encoders are loaded first so their tables are frozen and shared by workers.
     """
+    try:
+        from src.services.usage.tokenizer import preload_encoders
+
+        server.log.info(f"Tokenizer encoders preloaded: {preload_encoders()}")
+    except Exception as e:
+        server.log.warning(f"Tokenizer encoder preload skipped: {e}")
+
     gc.freeze()
     server.log.info("GC frozen for Copy-on-Write optimization")
     server.log.info(f"Objects in permanent generation: {gc.get_freeze_count()}")
@@ -564,6 +564,7 @@ class AdminRecoverAllKeysHealthAdapter(AdminApiAdapter):
             # 重置所有格式的健康度
             key.health_by_format = {}  # type: ignore[assignment]
             key.circuit_breaker_by_format = {}  # type: ignore[assignment]
+            HealthMonitor.reset_key_state(key.id)
             recovered_keys.append(
                 {
                     "key_id": key.id,
@@ -26,6 +26,7 @@ from src.models.database import (
 from src.models.database import User as DBUser
 from src.services.health.monitor import HealthMonitor
 from src.services.system.audit import audit_service
+from src.services.system.body_store import storage_report
 from src.utils.database_helpers import escape_like_pattern
 
 router = APIRouter(prefix="/api/admin/monitoring", tags=["Admin - Monitoring"])
@@ -99,6 +100,28 @@ async def get_system_status(request: Request, db: Session = Depends(get_db)) ->
     return await pipeline.run(adapter=adapter, http_request=request, db=db, mode=adapter.mode)
 
 
+@router.get("/body-store")
+async def get_body_store_report(request: Request, db: Session = Depends(get_db)) -> Any:
+    """
+    获取请求体分段存储报告
+
+    统计使用记录请求体去重存储的节省情况。需要管理员权限。
+
+    **返回字段**:
+    - `zstd_available`: 是否安装了 zstandard（未安装时段使用 gzip）
+    - `dictionary`: 当前 zstd 训练字典（id, size, sample_count, created_at），未训练时为 null
+    - `segments`: 段统计（count: 段数, raw_bytes: 去重后原始字节, stored_bytes: 压缩后字节,
+      references: 累计引用次数, referenced_bytes: 按引用展开的原始字节, by_codec: 按编码分组）
+    - `usage`: 使用记录统计（segmented_rows: 分段存储的行数,
+      gzip_rows / gzip_bytes: 整体 gzip 的行数和字节数）
+    - `dedup_ratio`: 去重倍数（referenced_bytes / raw_bytes）
+    - `compression_ratio`: 压缩率（stored_bytes / raw_bytes）
+    - `saved_bytes`: 节省的字节数（referenced_bytes - stored_bytes）
+    """
+    adapter = AdminBodyStoreReportAdapter()
+    return await pipeline.run(adapter=adapter, http_request=request, db=db, mode=adapter.mode)
+
+
 @router.get("/suspicious-activities")
 async def get_suspicious_activities(
     request: Request,
@@ -360,6 +383,17 @@ class AdminSystemStatusAdapter(AdminApiAdapter):
         }
 
 
+class AdminBodyStoreReportAdapter(AdminApiAdapter):
+    async def handle(self, context: ApiRequestContext) -> Any:  # type: ignore[override]
+        report = storage_report(context.db)
+        context.add_audit_metadata(
+            action="body_store_report",
+            segment_count=report["segments"]["count"],
+            saved_bytes=report["saved_bytes"],
+        )
+        return report
+
+
 @dataclass
 class AdminSuspiciousActivitiesAdapter(AdminApiAdapter):
     hours: int
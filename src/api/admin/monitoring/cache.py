@@ -24,6 +24,8 @@ from src.database import get_db
 from src.models.database import ApiKey, User
 from src.services.cache.affinity_manager import get_affinity_manager
 from src.services.cache.aware_scheduler import CacheAwareScheduler, get_cache_aware_scheduler
+from src.services.cache.model_cache import ModelCacheService
+from src.services.cache.tiered import evict_all_local, get_tiered_cache_stats
 from src.services.system.config import SystemConfigService
 
 router = APIRouter(prefix="/api/admin/monitoring/cache", tags=["Admin - Monitoring: Cache"])
@@ -443,6 +445,7 @@ class AdminCacheStatsAdapter(AdminApiAdapter):
                 scheduling_mode=scheduling_mode,
             )
             stats = await scheduler.get_stats()
+            stats["tiered_caches"] = get_tiered_cache_stats()
             logger.info("缓存统计信息查询成功")
             context.add_audit_metadata(
                 action="cache_stats",
@@ -1729,6 +1732,8 @@ class AdminClearRedisCacheCategoryAdapter(AdminApiAdapter):
             for i in range(0, len(keys_to_delete), batch_size):
                 batch = keys_to_delete[i : i + batch_size]
                 deleted_count += await redis.delete(*batch)
+            # Redis 已直接删除，同步清理各实例的进程内 L1
+            await evict_all_local()
 
             logger.warning(
                 "已清除 Redis 缓存分类（管理员操作）: {} ({}), pattern={}, deleted={}",
@@ -1778,6 +1783,7 @@ class AdminClearAllModelMappingCacheAdapter(AdminApiAdapter):
 
             if keys_to_delete:
                 deleted_count = await redis.delete(*keys_to_delete)
+            await evict_all_local()
 
             logger.warning(f"已清除所有模型映射缓存（管理员操作）: {deleted_count} 个键")
             context.add_audit_metadata(
@@ -1822,6 +1828,7 @@ class AdminClearModelMappingCacheByNameAdapter(AdminApiAdapter):
             if await redis.exists(name_key):
                 await redis.delete(name_key)
                 deleted_keys.append(name_key)
+            await ModelCacheService.evict_local_cache(resolve_key, name_key)
 
             logger.info(f"已清除模型映射缓存: model_name={self.model_name}, 删除键={deleted_keys}")
             context.add_audit_metadata(
@@ -1869,6 +1876,7 @@ class AdminClearProviderModelMappingCacheAdapter(AdminApiAdapter):
             if await redis.exists(hit_count_key):
                 await redis.delete(hit_count_key)
                 deleted_keys.append(hit_count_key)
+            await ModelCacheService.evict_local_cache(provider_global_key)
 
             logger.info(
                 f"已清除 Provider 模型映射缓存: provider_id={self.provider_id[:8]}..., "
@@ -12,7 +12,10 @@ from src.api.base.admin_adapter import AdminApiAdapter
 from src.api.base.context import ApiRequestContext
 from src.database import get_db
 from src.models.database import StatsDaily
-from src.services.system.stats_aggregator import StatsAggregatorService
+from src.services.system.stats_aggregator import (
+    compute_latency_sketches,
+    sketch_percentiles,
+)
 from src.services.system.time_range import TimeRangeParams
 
 from .common import _apply_admin_default_range, _build_time_range_params, pipeline
@@ -21,8 +24,15 @@ router = APIRouter()
 
 
 class AdminPercentilesAdapter(AdminApiAdapter):
-    def __init__(self, time_range: TimeRangeParams | None) -> None:
+    def __init__(
+        self,
+        time_range: TimeRangeParams | None,
+        model: str | None = None,
+        provider_name: str | None = None,
+    ) -> None:
         self.time_range = _apply_admin_default_range(time_range)
+        self.model = model
+        self.provider_name = provider_name
 
     async def handle(self, context: ApiRequestContext) -> Any:  # type: ignore[override]
         if not self.time_range:
@@ -31,7 +41,7 @@ class AdminPercentilesAdapter(AdminApiAdapter):
         time_range = self.time_range
         is_utc = (time_range.timezone in {None, "UTC"}) and time_range.tz_offset_minutes == 0
 
-        if is_utc:
+        if is_utc and not self.model and not self.provider_name:
             start_utc, end_utc = time_range.to_utc_datetime_range()
             rows = (
                 context.db.query(StatsDaily)
@@ -59,15 +69,35 @@ class AdminPercentilesAdapter(AdminApiAdapter):
                 )
             return result
 
+        # 按本地日期或维度过滤：合并小时级草图
         result = []
         for local_date, day_start_utc, day_end_utc in time_range.get_local_day_hours():
-            percentiles = StatsAggregatorService.compute_daily_percentiles(
-                context.db, day_start_utc, day_end_utc
+            sketches = compute_latency_sketches(
+                context.db, day_start_utc, day_end_utc, self.model, self.provider_name
             )
-            result.append({"date": local_date.isoformat(), **percentiles})
+            result.append({"date": local_date.isoformat(), **sketch_percentiles(*sketches)})
         return result
 
 
+class AdminPercentilesSummaryAdapter(AdminPercentilesAdapter):
+    """整个时间范围的百分位（合并草图，不逐日拆分）"""
+
+    async def handle(self, context: ApiRequestContext) -> Any:  # type: ignore[override]
+        if not self.time_range:
+            return {}
+        start_utc, end_utc = self.time_range.to_utc_datetime_range()
+        rt_sketch, ttfb_sketch = compute_latency_sketches(
+            context.db, start_utc, end_utc, self.model, self.provider_name
+        )
+        return {
+            "model": self.model,
+            "provider_name": self.provider_name,
+            "response_time_samples": rt_sketch.count,
+            "first_byte_time_samples": ttfb_sketch.count,
+            **sketch_percentiles(rt_sketch, ttfb_sketch),
+        }
+
+
 @router.get("/performance/percentiles")
 async def get_percentiles(
     request: Request,
@@ -77,9 +107,34 @@ async def get_percentiles(
     preset: str | None = Query(None),
     timezone_name: str | None = Query(None, alias="timezone"),
     tz_offset_minutes: int | None = Query(0),
+    model: str | None = Query(None),
+    provider_name: str | None = Query(None),
 ) -> Any:
     time_range = _build_time_range_params(
         start_date, end_date, preset, timezone_name, tz_offset_minutes
     )
-    adapter = AdminPercentilesAdapter(time_range=time_range)
+    adapter = AdminPercentilesAdapter(
+        time_range=time_range, model=model, provider_name=provider_name
+    )
+    return await pipeline.run(adapter=adapter, http_request=request, db=db, mode=adapter.mode)
+
+
+@router.get("/performance/percentiles/summary")
+async def get_percentiles_summary(
+    request: Request,
+    db: Session = Depends(get_db),
+    start_date: date | None = Query(None),
+    end_date: date | None = Query(None),
+    preset: str | None = Query(None),
+    timezone_name: str | None = Query(None, alias="timezone"),
+    tz_offset_minutes: int | None = Query(0),
+    model: str | None = Query(None),
+    provider_name: str | None = Query(None),
+) -> Any:
+    time_range = _build_time_range_params(
+        start_date, end_date, preset, timezone_name, tz_offset_minutes
+    )
+    adapter = AdminPercentilesSummaryAdapter(
+        time_range=time_range, model=model, provider_name=provider_name
+    )
     return await pipeline.run(adapter=adapter, http_request=request, db=db, mode=adapter.mode)
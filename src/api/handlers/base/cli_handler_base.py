@@ -13,10 +13,9 @@ CLI Message Handler 通用基类
 from __future__ import annotations
 
 import asyncio
-import codecs
 import json
 import time
-from collections.abc import AsyncGenerator, Callable
+from collections.abc import AsyncGenerator, Callable, Sequence
 from typing import (
     TYPE_CHECKING,
     Any,
@@ -86,7 +85,7 @@ from src.services.provider.stream_policy import (
 )
 from src.services.provider.transport import build_provider_url
 from src.services.system.config import SystemConfigService
-from src.utils.sse_parser import SSEEventParser
+from src.utils.sse_parser import SSEByteParser
 from src.utils.timeout import read_first_chunk_with_ttfb_timeout
 
 # ==============================================================================
@@ -1300,12 +1299,10 @@ class CliMessageHandlerBase(BaseMessageHandler):
     ) -> AsyncGenerator[bytes]:
         """创建响应流生成器（使用字节流）"""
         try:
-            sse_parser = SSEEventParser()
+            # 按字节增量切分行并组装事件：完整行不会截断多字节字符，无需增量解码器
+            sse_parser = SSEByteParser()
             last_data_time = time.time()
-            buffer = b""
             output_state = {"first_yield": True, "streaming_updated": False}
-            # 使用增量解码器处理跨 chunk 的 UTF-8 字符
-            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
 
             # 使用已设置的 ctx.needs_conversion（由候选筛选阶段根据端点配置判断）
             # 不再调用 _needs_format_conversion，它只检查格式差异，不检查端点配置
@@ -1338,32 +1335,11 @@ class CliMessageHandlerBase(BaseMessageHandler):
                 chunk_source = stream_response.aiter_bytes()
 
             async for chunk in chunk_source:
-                buffer += chunk
-                # 处理缓冲区中的完整行
-                while b"\n" in buffer:
-                    line_bytes, buffer = buffer.split(b"\n", 1)
-                    try:
-                        # 使用增量解码器，可以正确处理跨 chunk 的多字节字符
-                        line = decoder.decode(line_bytes + b"\n", False).rstrip("\n")
-                    except Exception as e:
-                        logger.warning(
-                            "[{}] UTF-8 解码失败: {}, bytes={!r}",
-                            self.request_id,
-                            e,
-                            line_bytes[:50],
-                        )
-                        continue
-
-                    normalized_line = line.rstrip("\r")
-                    events = sse_parser.feed_line(normalized_line)
-
-                    if normalized_line == "":
+                for line_bytes, events in sse_parser.feed_lines(chunk):
+                    if not line_bytes:
                         for event in events:
                             self._handle_sse_event(
-                                ctx,
-                                event.get("event"),
-                                event.get("data") or "",
-                                record_chunk=not needs_conversion,
+                                ctx, event.event, event.data, record_chunk=not needs_conversion
                             )
                         self._mark_first_output(ctx, output_state)
                         yield b"\n"
@@ -1396,6 +1372,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
 
                     # 格式转换或直接透传
                     if needs_conversion:
+                        line = line_bytes.decode("utf-8", errors="replace")
                         converted_lines, converted_events = self._convert_sse_line(
                             ctx, line, events
                         )
@@ -1407,14 +1384,11 @@ class CliMessageHandlerBase(BaseMessageHandler):
                                 yield (converted_line + "\n").encode("utf-8")
                     else:
                         self._mark_first_output(ctx, output_state)
-                        yield (line + "\n").encode("utf-8")
+                        yield line_bytes + b"\n"
 
                     for event in events:
                         self._handle_sse_event(
-                            ctx,
-                            event.get("event"),
-                            event.get("data") or "",
-                            record_chunk=not needs_conversion,
+                            ctx, event.event, event.data, record_chunk=not needs_conversion
                         )
 
                     if ctx.data_count > 0:
@@ -1423,10 +1397,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
             # 处理剩余事件
             for event in sse_parser.flush():
                 self._handle_sse_event(
-                    ctx,
-                    event.get("event"),
-                    event.get("data") or "",
-                    record_chunk=not needs_conversion,
+                    ctx, event.event, event.data, record_chunk=not needs_conversion
                 )
 
             # 检查是否收到数据
@@ -1457,9 +1428,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
             raise
         except httpx.StreamClosed:
             # 连接关闭前 flush 残余数据，尝试捕获尾部事件（如 response.completed 中的 usage）
-            self._flush_remaining_sse_data(
-                ctx, buffer, decoder, sse_parser, record_chunk=not needs_conversion
-            )
+            self._flush_remaining_sse_data(ctx, sse_parser, record_chunk=not needs_conversion)
             if ctx.data_count == 0:
                 # 流已开始，发送错误事件而不是抛出异常
                 logger.warning(f"Provider '{ctx.provider_name}' 流连接关闭且无数据")
@@ -1477,9 +1446,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
                 yield f"event: error\ndata: {json.dumps(error_event)}\n\n".encode()
         except httpx.RemoteProtocolError:
             # 连接异常关闭前 flush 残余数据，尝试捕获尾部事件（如 response.completed 中的 usage）
-            self._flush_remaining_sse_data(
-                ctx, buffer, decoder, sse_parser, record_chunk=not needs_conversion
-            )
+            self._flush_remaining_sse_data(ctx, sse_parser, record_chunk=not needs_conversion)
             if ctx.data_count > 0:
                 error_event = {
                     "type": "error",
@@ -1493,9 +1460,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
                 raise
         except httpx.ReadError:
             # 代理/上游连接读取失败（如 aether-proxy 中断），与 RemoteProtocolError 处理逻辑一致
-            self._flush_remaining_sse_data(
-                ctx, buffer, decoder, sse_parser, record_chunk=not needs_conversion
-            )
+            self._flush_remaining_sse_data(ctx, sse_parser, record_chunk=not needs_conversion)
             if ctx.data_count > 0:
                 error_event = {
                     "type": "error",
@@ -1520,14 +1485,12 @@ class CliMessageHandlerBase(BaseMessageHandler):
     def _flush_remaining_sse_data(
         self,
         ctx: StreamContext,
-        buffer: bytes,
-        decoder: codecs.IncrementalDecoder,
-        sse_parser: SSEEventParser,
+        sse_parser: SSEByteParser,
         *,
         record_chunk: bool = True,
     ) -> None:
         """
-        异常发生时 flush 残留的字节 buffer 和 SSE parser 内部缓冲区。
+        异常发生时 flush SSE parser 中残留的不完整行与未完成事件。
 
         用于 StreamClosed / RemoteProtocolError 等场景：
         连接断开可能恰好发生在最后一个 SSE 事件（如 response.completed）
@@ -1535,27 +1498,8 @@ class CliMessageHandlerBase(BaseMessageHandler):
         从而正确捕获 usage 等关键信息。
         """
         try:
-            # 1) flush 字节 buffer 中的残余行
-            if buffer:
-                remaining = decoder.decode(buffer, True)
-                for line in remaining.split("\n"):
-                    stripped = line.rstrip("\r")
-                    events = sse_parser.feed_line(stripped)
-                    for event in events:
-                        self._handle_sse_event(
-                            ctx,
-                            event.get("event"),
-                            event.get("data") or "",
-                            record_chunk=record_chunk,
-                        )
-            # 2) flush SSE parser 内部累积的未完成事件
             for event in sse_parser.flush():
-                self._handle_sse_event(
-                    ctx,
-                    event.get("event"),
-                    event.get("data") or "",
-                    record_chunk=record_chunk,
-                )
+                self._handle_sse_event(ctx, event.event, event.data, record_chunk=record_chunk)
         except Exception:
             # best-effort: 不应因 flush 失败影响后续流程
             pass
@@ -1652,11 +1596,10 @@ class CliMessageHandlerBase(BaseMessageHandler):
         max_prefetch_lines = config.stream_prefetch_lines  # 最多预读行数来检测错误
         max_prefetch_bytes = StreamDefaults.MAX_PREFETCH_BYTES  # 避免无换行响应导致 buffer 增长
         total_prefetched_bytes = 0
-        buffer = b""
+        # 只用于按字节切分行（完整行不会截断多字节字符，无需增量解码器）
+        line_parser = SSEByteParser()
         line_count = 0
         should_stop = False
-        # 使用增量解码器处理跨 chunk 的 UTF-8 字符
-        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
 
         try:
             # 获取对应格式的解析器
@@ -1680,29 +1623,18 @@ class CliMessageHandlerBase(BaseMessageHandler):
             )
             prefetched_chunks.append(first_chunk)
             total_prefetched_bytes += len(first_chunk)
-            buffer += first_chunk
+            # feed_lines 立即写入缓冲区，首个 chunk 的行随下一个 chunk 一起检查
+            line_parser.feed_lines(first_chunk)
 
             # 继续读取剩余的预读数据
             async for chunk in aiter:
                 prefetched_chunks.append(chunk)
                 total_prefetched_bytes += len(chunk)
-                buffer += chunk
 
                 # 尝试按行解析缓冲区（SSE 格式）
-                while b"\n" in buffer:
-                    line_bytes, buffer = buffer.split(b"\n", 1)
-                    try:
-                        # 使用增量解码器，可以正确处理跨 chunk 的多字节字符
-                        line = decoder.decode(line_bytes + b"\n", False).rstrip("\n")
-                    except Exception as e:
-                        logger.warning(
-                            f"[{self.request_id}] 预读时 UTF-8 解码失败: {e}, "
-                            f"bytes={line_bytes[:50]!r}"
-                        )
-                        continue
-
+                for line_bytes, _events in line_parser.feed_lines(chunk):
                     line_count += 1
-                    normalized_line = line.rstrip("\r")
+                    normalized_line = line_bytes.decode("utf-8", errors="replace")
 
                     # 检测 HTML 响应（base_url 配置错误的常见症状）
                     if check_html_response(normalized_line):
@@ -1818,12 +1750,10 @@ class CliMessageHandlerBase(BaseMessageHandler):
     ) -> AsyncGenerator[bytes]:
         """创建响应流生成器（带预读数据，使用字节流）"""
         try:
-            sse_parser = SSEEventParser()
+            # 按字节增量切分行并组装事件：完整行不会截断多字节字符，无需增量解码器
+            sse_parser = SSEByteParser()
             last_data_time = time.time()
-            buffer = b""
             output_state = {"first_yield": True, "streaming_updated": False}
-            # 使用增量解码器处理跨 chunk 的 UTF-8 字符
-            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
 
             # 使用已设置的 ctx.needs_conversion（由候选筛选阶段根据端点配置判断）
             # 不再调用 _needs_format_conversion，它只检查格式差异，不检查端点配置
@@ -1859,30 +1789,11 @@ class CliMessageHandlerBase(BaseMessageHandler):
 
             # 先处理预读的字节块
             for chunk in prefetched_chunks:
-                buffer += chunk
-                # 处理缓冲区中的完整行
-                while b"\n" in buffer:
-                    line_bytes, buffer = buffer.split(b"\n", 1)
-                    try:
-                        # 使用增量解码器，可以正确处理跨 chunk 的多字节字符
-                        line = decoder.decode(line_bytes + b"\n", False).rstrip("\n")
-                    except Exception as e:
-                        logger.warning(
-                            f"[{self.request_id}] UTF-8 解码失败: {e}, "
-                            f"bytes={line_bytes[:50]!r}"
-                        )
-                        continue
-
-                    normalized_line = line.rstrip("\r")
-                    events = sse_parser.feed_line(normalized_line)
-
-                    if normalized_line == "":
+                for line_bytes, events in sse_parser.feed_lines(chunk):
+                    if not line_bytes:
                         for event in events:
                             self._handle_sse_event(
-                                ctx,
-                                event.get("event"),
-                                event.get("data") or "",
-                                record_chunk=not needs_conversion,
+                                ctx, event.event, event.data, record_chunk=not needs_conversion
                             )
                         self._mark_first_output(ctx, output_state)
                         yield b"\n"
@@ -1892,6 +1803,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
 
                     # 格式转换或直接透传
                     if needs_conversion:
+                        line = line_bytes.decode("utf-8", errors="replace")
                         converted_lines, converted_events = self._convert_sse_line(
                             ctx, line, events
                         )
@@ -1903,14 +1815,11 @@ class CliMessageHandlerBase(BaseMessageHandler):
                                 yield (converted_line + "\n").encode("utf-8")
                     else:
                         self._mark_first_output(ctx, output_state)
-                        yield (line + "\n").encode("utf-8")
+                        yield line_bytes + b"\n"
 
                     for event in events:
                         self._handle_sse_event(
-                            ctx,
-                            event.get("event"),
-                            event.get("data") or "",
-                            record_chunk=not needs_conversion,
+                            ctx, event.event, event.data, record_chunk=not needs_conversion
                         )
 
                     if ctx.data_count > 0:
@@ -1918,30 +1827,11 @@ class CliMessageHandlerBase(BaseMessageHandler):
 
             # 继续处理剩余的流数据（使用同一个迭代器）
             async for chunk in byte_iterator:
-                buffer += chunk
-                # 处理缓冲区中的完整行
-                while b"\n" in buffer:
-                    line_bytes, buffer = buffer.split(b"\n", 1)
-                    try:
-                        # 使用增量解码器，可以正确处理跨 chunk 的多字节字符
-                        line = decoder.decode(line_bytes + b"\n", False).rstrip("\n")
-                    except Exception as e:
-                        logger.warning(
-                            f"[{self.request_id}] UTF-8 解码失败: {e}, "
-                            f"bytes={line_bytes[:50]!r}"
-                        )
-                        continue
-
-                    normalized_line = line.rstrip("\r")
-                    events = sse_parser.feed_line(normalized_line)
-
-                    if normalized_line == "":
+                for line_bytes, events in sse_parser.feed_lines(chunk):
+                    if not line_bytes:
                         for event in events:
                             self._handle_sse_event(
-                                ctx,
-                                event.get("event"),
-                                event.get("data") or "",
-                                record_chunk=not needs_conversion,
+                                ctx, event.event, event.data, record_chunk=not needs_conversion
                             )
                         self._mark_first_output(ctx, output_state)
                         yield b"\n"
@@ -1971,6 +1861,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
 
                     # 格式转换或直接透传
                     if needs_conversion:
+                        line = line_bytes.decode("utf-8", errors="replace")
                         converted_lines, converted_events = self._convert_sse_line(
                             ctx, line, events
                         )
@@ -1982,14 +1873,11 @@ class CliMessageHandlerBase(BaseMessageHandler):
                                 yield (converted_line + "\n").encode("utf-8")
                     else:
                         self._mark_first_output(ctx, output_state)
-                        yield (line + "\n").encode("utf-8")
+                        yield line_bytes + b"\n"
 
                     for event in events:
                         self._handle_sse_event(
-                            ctx,
-                            event.get("event"),
-                            event.get("data") or "",
-                            record_chunk=not needs_conversion,
+                            ctx, event.event, event.data, record_chunk=not needs_conversion
                         )
 
                     if ctx.data_count > 0:
@@ -1999,10 +1887,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
             flushed_events = sse_parser.flush()
             for event in flushed_events:
                 self._handle_sse_event(
-                    ctx,
-                    event.get("event"),
-                    event.get("data") or "",
-                    record_chunk=not needs_conversion,
+                    ctx, event.event, event.data, record_chunk=not needs_conversion
                 )
 
             # 检查是否收到数据
@@ -2035,9 +1920,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
             raise
         except httpx.StreamClosed:
             # 连接关闭前 flush 残余数据，尝试捕获尾部事件（如 response.completed 中的 usage）
-            self._flush_remaining_sse_data(
-                ctx, buffer, decoder, sse_parser, record_chunk=not needs_conversion
-            )
+            self._flush_remaining_sse_data(ctx, sse_parser, record_chunk=not needs_conversion)
             if ctx.data_count == 0:
                 logger.warning(f"Provider '{ctx.provider_name}' 流连接关闭且无数据")
                 # 设置错误状态用于后续记录
@@ -2054,9 +1937,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
                 yield f"event: error\ndata: {json.dumps(error_event)}\n\n".encode()
         except httpx.RemoteProtocolError:
             # 连接异常关闭前 flush 残余数据，尝试捕获尾部事件（如 response.completed 中的 usage）
-            self._flush_remaining_sse_data(
-                ctx, buffer, decoder, sse_parser, record_chunk=not needs_conversion
-            )
+            self._flush_remaining_sse_data(ctx, sse_parser, record_chunk=not needs_conversion)
             if ctx.data_count > 0:
                 error_event = {
                     "type": "error",
@@ -2070,9 +1951,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
                 raise
         except httpx.ReadError:
             # 代理/上游连接读取失败（如 aether-proxy 中断），与 RemoteProtocolError 处理逻辑一致
-            self._flush_remaining_sse_data(
-                ctx, buffer, decoder, sse_parser, record_chunk=not needs_conversion
-            )
+            self._flush_remaining_sse_data(ctx, sse_parser, record_chunk=not needs_conversion)
             if ctx.data_count > 0:
                 error_event = {
                     "type": "error",
@@ -3531,7 +3410,7 @@ class CliMessageHandlerBase(BaseMessageHandler):
         self,
         ctx: StreamContext,
         line: str,
-        events: list,  # noqa: ARG002 - 预留给上下文感知转换
+        events: Sequence[Any],  # noqa: ARG002 - 预留给上下文感知转换
     ) -> tuple[list[str], list[dict[str, Any]]]:
         """
         将 SSE 行从 Provider 格式转换为客户端格式
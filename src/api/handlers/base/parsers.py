@@ -160,7 +160,7 @@ class OpenAIResponseParser(ResponseParser):
         text_delta = self._parser.extract_text_delta(parsed)
         if text_delta:
             chunk.text_delta = text_delta
-            stats.collected_text += text_delta
+            stats.append_text(text_delta)
 
         # 检查是否结束
         if self._parser.is_done_chunk(parsed):
@@ -414,7 +414,7 @@ class ClaudeResponseParser(ResponseParser):
         text_delta = self._parser.extract_text_delta(parsed)
         if text_delta:
             chunk.text_delta = text_delta
-            stats.collected_text += text_delta
+            stats.append_text(text_delta)
 
         # 检查是否结束
         if self._parser.is_done_event(parsed):
@@ -567,7 +567,7 @@ class GeminiResponseParser(ResponseParser):
         text_delta = self._parser.extract_text_delta(parsed)
         if text_delta:
             chunk.text_delta = text_delta
-            stats.collected_text += text_delta
+            stats.append_text(text_delta)
 
         # 检查是否结束
         if self._parser.is_done_event(parsed):
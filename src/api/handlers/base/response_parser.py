@@ -46,8 +46,9 @@ class StreamStats:
     cache_creation_tokens: int = 0
     cache_read_tokens: int = 0
 
-    # 内容
-    collected_text: str = ""
+    # 内容（collect_text=False 时不收集文本，由调用方自行累积）
+    collect_text: bool = True
+    _collected_text_parts: list[str] = field(default_factory=list, repr=False)
     response_id: str | None = None
 
     # 状态
@@ -64,6 +65,16 @@ class StreamStats:
     response_headers: dict[str, str] = field(default_factory=dict)
     final_response: dict[str, Any] | None = None
 
+    @property
+    def collected_text(self) -> str:
+        """已收集的文本内容（按需拼接，避免在流式过程中频繁做字符串拷贝）"""
+        return "".join(self._collected_text_parts)
+
+    def append_text(self, text: str) -> None:
+        """追加文本内容"""
+        if text and self.collect_text:
+            self._collected_text_parts.append(text)
+
 
 @dataclass
 class ParsedResponse:
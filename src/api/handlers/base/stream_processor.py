@@ -12,10 +12,8 @@
 from __future__ import annotations
 
 import asyncio
-import codecs
-import json
 import time
-from collections.abc import AsyncGenerator, Callable
+from collections.abc import AsyncGenerator, Callable, Iterable, Iterator
 from dataclasses import dataclass
 from typing import Any
 
@@ -45,8 +43,9 @@ from src.core.exceptions import (
 from src.core.logger import logger
 from src.models.database import Provider, ProviderEndpoint
 from src.services.provider.behavior import get_provider_behavior
+from src.utils import json_codec
 from src.utils.perf import PerfRecorder
-from src.utils.sse_parser import SSEEventParser
+from src.utils.sse_parser import SSEByteParser, SSEEvent, SSEUsageFrameScanner
 from src.utils.timeout import read_first_chunk_with_ttfb_timeout
 
 
@@ -246,8 +245,8 @@ class StreamProcessor:
             return
 
         try:
-            data = json.loads(data_str)
-        except json.JSONDecodeError:
+            data = json_codec.loads(data_str)
+        except json_codec.JSONDecodeError:
             return
 
         if not isinstance(data, dict):
@@ -276,6 +275,40 @@ class StreamProcessor:
             if finish_reason is not None:
                 ctx.has_completion = True
 
+    def _can_passthrough(self, ctx: StreamContext, envelope: Any) -> bool:
+        """
+        同格式流是否可以走字节级透传模式
+
+        透传模式只在旁路提取 usage/完成信号，因此需要逐事件处理的场景都要回退到逐行解析：
+        Provider envelope 需要解包、收集文本、以及 FULL 级别记录 parsed_chunks。
+        """
+        return bool(
+            config.stream_passthrough_enabled
+            and not envelope
+            and not self.collect_text
+            and not ctx.record_parsed_chunks
+        )
+
+    def _apply_passthrough_frames(
+        self,
+        ctx: StreamContext,
+        scanner: SSEUsageFrameScanner,
+        payloads: list[bytes],
+    ) -> None:
+        """处理旁路扫描器筛出的帧负载，并同步行/事件统计"""
+        for payload in payloads:
+            if payload == b"[DONE]":
+                ctx.has_completion = True
+                continue
+            self.handle_sse_event(
+                ctx,
+                None,
+                payload.decode("utf-8", errors="replace"),
+                skip_record=True,
+            )
+        ctx.chunk_count = scanner.line_count
+        ctx.data_count = scanner.data_frame_count
+
     def _extract_usage_from_converted_event(
         self,
         ctx: StreamContext,
@@ -387,12 +420,10 @@ class StreamProcessor:
         kiro_binary_stream = (
             ctx_provider_type == "kiro" and envelope and envelope.force_stream_rewrite()
         )
-        buffer = b""
+        line_parser = SSEByteParser()
         line_count = 0
         should_stop = False
         total_prefetched_bytes = 0
-        # 使用增量解码器处理跨 chunk 的 UTF-8 字符
-        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
 
         try:
             # 使用共享的 TTFB 超时函数读取首字节
@@ -411,27 +442,17 @@ class StreamProcessor:
             # we only enforce TTFB and let StreamProcessor rewrite bytes later.
             if kiro_binary_stream:
                 return prefetched_chunks
-            buffer += first_chunk
+            # 首个 chunk 只入缓冲，与后续 chunk 一起按行检查
+            line_parser.feed_lines(first_chunk)
 
             # 继续读取剩余的预读数据
             async for chunk in aiter:
                 prefetched_chunks.append(chunk)
                 total_prefetched_bytes += len(chunk)
-                buffer += chunk
-
-                # 尝试按行解析缓冲区
-                while b"\n" in buffer:
-                    line_bytes, buffer = buffer.split(b"\n", 1)
-                    try:
-                        # 使用增量解码器，可以正确处理跨 chunk 的多字节字符
-                        line = decoder.decode(line_bytes + b"\n", False).rstrip("\r\n")
-                    except Exception as e:
-                        logger.warning(
-                            f"[{self.request_id}] 预读时 UTF-8 解码失败: {e}, "
-                            f"bytes={line_bytes[:50]!r}"
-                        )
-                        continue
 
+                # 按完整行检查（完整行不会截断多字节字符，可直接解码）
+                for line_bytes, _events in line_parser.feed_lines(chunk):
+                    line = line_bytes.decode("utf-8", errors="replace")
                     line_count += 1
 
                     # 检测 HTML 响应（base_url 配置错误的常见症状）
@@ -464,8 +485,8 @@ class StreamProcessor:
                         break
 
                     try:
-                        data = json.loads(data_str)
-                    except json.JSONDecodeError:
+                        data = json_codec.loads(data_str)
+                    except json_codec.JSONDecodeError:
                         if line_count >= max_prefetch_lines:
                             break
                         continue
@@ -597,12 +618,11 @@ class StreamProcessor:
             编码后的响应数据块
         """
         try:
-            sse_parser = SSEEventParser()
+            # 按字节增量解析 SSE；转换分支经 feed_lines 逐行取得原始行用于转换输出
+            byte_parser = SSEByteParser()
+            usage_scanner: SSEUsageFrameScanner | None = None
             streaming_started = False
             yielded_any = False
-            buffer = b""
-            # 使用增量解码器处理跨 chunk 的 UTF-8 字符
-            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
             metrics_enabled = PerfRecorder.enabled()
             perf_capture = metrics_enabled or ctx.perf_sampled
             parse_time = 0.0
@@ -657,6 +677,20 @@ class StreamProcessor:
                 # 保持 ctx 与实际行为一致，避免 Usage 记录误标记为转换
                 ctx.needs_conversion = False
 
+            # 字节级透传：原始 chunk 原样转发，usage/完成信号由旁路扫描器按需解码
+            if not needs_conversion and self._can_passthrough(ctx, envelope):
+                usage_scanner = SSEUsageFrameScanner()
+
+            def _scan_passthrough_chunk(chunk: bytes) -> None:
+                nonlocal parse_time
+                assert usage_scanner is not None
+                if perf_capture:
+                    t0 = time.perf_counter()
+                    self._apply_passthrough_frames(ctx, usage_scanner, usage_scanner.scan(chunk))
+                    parse_time += time.perf_counter() - t0
+                    return
+                self._apply_passthrough_frames(ctx, usage_scanner, usage_scanner.scan(chunk))
+
             def _mark_stream_started() -> None:
                 nonlocal start_time, streaming_started, yielded_any
                 yielded_any = True
@@ -669,31 +703,43 @@ class StreamProcessor:
                     self.on_streaming_start()
                     streaming_started = True
 
-            def _process_line_with_perf(
-                line: str,
+            def _parse_lines_with_perf(
+                lines: Iterable[tuple[bytes, tuple[SSEEvent, ...]]],
                 *,
-                skip_record: bool = False,
                 skip_ctx_update: bool = False,
-            ) -> None:
+            ) -> Iterator[str]:
+                """处理每行完成的事件（转换时跳过记录原始数据），并逐行产出解码后的文本。"""
                 nonlocal parse_time
+                line_iter = iter(lines)
+                while True:
+                    t0 = time.perf_counter() if perf_capture else 0.0
+                    item = next(line_iter, None)
+                    if item is None:
+                        return
+                    line_bytes, events = item
+                    for event in events:
+                        self.handle_sse_event(
+                            ctx,
+                            event.event,
+                            event.data,
+                            skip_record=True,
+                            skip_ctx_update=skip_ctx_update,
+                        )
+                    ctx.chunk_count = byte_parser.line_count
+                    # 完整行不会截断多字节字符，可直接解码
+                    line = line_bytes.decode("utf-8", errors="replace")
+                    if perf_capture:
+                        parse_time += time.perf_counter() - t0
+                    yield line
+
+            def _feed_bytes_with_perf(chunk: bytes) -> None:
+                nonlocal parse_time
+                t0 = time.perf_counter() if perf_capture else 0.0
+                for event in byte_parser.feed(chunk):
+                    self.handle_sse_event(ctx, event.event, event.data)
+                ctx.chunk_count = byte_parser.line_count
                 if perf_capture:
-                    t0 = time.perf_counter()
-                    self._process_line(
-                        ctx,
-                        sse_parser,
-                        line,
-                        skip_record=skip_record,
-                        skip_ctx_update=skip_ctx_update,
-                    )
                     parse_time += time.perf_counter() - t0
-                    return
-                self._process_line(
-                    ctx,
-                    sse_parser,
-                    line,
-                    skip_record=skip_record,
-                    skip_ctx_update=skip_ctx_update,
-                )
 
             def _build_stream_error_payload(message: str) -> dict:
                 if client_family == "openai":
@@ -720,12 +766,21 @@ class StreamProcessor:
                 if client_family == "claude":
                     event_type_str = evt.get("type", "")
                     if event_type_str:
-                        return f"event: {event_type_str}\ndata: {json.dumps(evt, ensure_ascii=False)}\n\n".encode()
-                return f"data: {json.dumps(evt, ensure_ascii=False)}\n\n".encode()
+                        return (
+                            f"event: {event_type_str}\ndata: {json_codec.dumps(evt)}\n\n".encode()
+                        )
+                return f"data: {json_codec.dumps(evt)}\n\n".encode()
 
             # 处理预读数据
             if needs_conversion:
                 registry = get_format_converter_registry()
+                # 每个请求只解析一次转码器（normalizer/metrics label/SSE 编码方式均已预绑定）
+                transcoder_error: FormatConversionError | None = None
+                try:
+                    transcoder = registry.get_stream_transcoder(provider_format, client_format)
+                except FormatConversionError as exc:
+                    # 延迟到第一个需要转换的事件再报错，走统一的转换失败处理
+                    transcoder, transcoder_error = None, exc
 
                 # 初始化流式转换状态（Canonical）
                 if ctx.stream_conversion_state is None:
@@ -788,8 +843,8 @@ class StreamProcessor:
 
                     convert_start = time.perf_counter() if perf_capture else None
                     try:
-                        data_obj = json.loads(data_content)
-                    except json.JSONDecodeError:
+                        data_obj = json_codec.loads(data_content)
+                    except json_codec.JSONDecodeError:
                         if perf_capture and convert_start is not None:
                             convert_time += time.perf_counter() - convert_start
                         # 跨格式转换时，JSON 解析失败应跳过而不是透传（避免泄漏 Provider 格式）
@@ -819,11 +874,15 @@ class StreamProcessor:
                         )
 
                     try:
-                        converted_events = registry.convert_stream_chunk(
+                        if transcoder is None:
+                            # 转码器解析失败（normalizer 缺失等）
+                            raise transcoder_error or FormatConversionError(
+                                provider_format, client_format, "流式转码器不可用"
+                            )
+                        converted_events = transcoder.transcode(
                             data_obj,
-                            provider_format,
-                            client_format,
-                            state=ctx.stream_conversion_state,
+                            ctx.stream_conversion_state,
+                            materialize=ctx.record_parsed_chunks,
                         )
                     except Exception as conv_err:
                         # 首字节后无法 failover：输出目标格式错误事件并终止流
@@ -847,9 +906,13 @@ class StreamProcessor:
                     skip_next_blank_line = True
                     out: list[bytes] = []
 
-                    for evt in converted_events:
+                    for item in converted_events:
+                        evt = item.data
+                        # 快速路径产出的文本增量不构造 dict：只计数，不含完成/usage 信号
+                        if evt is None:
+                            ctx.data_count += 1
                         # 记录转换后的数据到 parsed_chunks（这是客户端实际收到的格式）
-                        if isinstance(evt, dict):
+                        elif isinstance(evt, dict):
                             ctx.data_count += 1
                             if ctx.record_parsed_chunks:
                                 ctx.parsed_chunks.append(evt)
@@ -866,30 +929,17 @@ class StreamProcessor:
                             # 从转换后的事件中补充 usage 信息
                             self._extract_usage_from_converted_event(ctx, evt, event_type)
 
-                        # 根据客户端格式生成 SSE 事件
-                        out.append(_format_sse_event(evt) if isinstance(evt, dict) else f"data: {json.dumps(evt, ensure_ascii=False)}\n\n".encode())
+                        # 转码器已按客户端格式生成 SSE 事件字节
+                        out.append(item.payload)
                     return out
 
                 # 统一处理 prefetched + iterator
                 if prefetched_chunks:
                     for chunk in prefetched_chunks:
-                        buffer += chunk
-                        while b"\n" in buffer:
-                            line_bytes, buffer = buffer.split(b"\n", 1)
-                            try:
-                                line = decoder.decode(line_bytes + b"\n", False)
-                            except Exception as e:
-                                logger.warning(
-                                    f"[{self.request_id}] UTF-8 解码失败: {e}, bytes={line_bytes[:50]!r}"
-                                )
-                                line = ""
-
-                            if line:
-                                # 需要格式转换时，跳过记录原始数据（由 _emit_converted_line 记录转换后的数据）
-                                _process_line_with_perf(
-                                    line, skip_record=True, skip_ctx_update=True
-                                )
-                            normalized_line = line.rstrip("\r\n") if line else ""
+                        # 需要格式转换时，跳过记录原始数据（由 _emit_converted_line 记录转换后的数据）
+                        for normalized_line in _parse_lines_with_perf(
+                            byte_parser.feed_lines(chunk), skip_ctx_update=True
+                        ):
                             out_chunks = _emit_converted_line(normalized_line)
                             if not out_chunks:
                                 empty_yield_count += 1
@@ -909,21 +959,8 @@ class StreamProcessor:
                                     return
 
                 async for chunk in byte_iterator:
-                    buffer += chunk
-                    while b"\n" in buffer:
-                        line_bytes, buffer = buffer.split(b"\n", 1)
-                        try:
-                            line = decoder.decode(line_bytes + b"\n", False)
-                        except Exception as e:
-                            logger.warning(
-                                f"[{self.request_id}] UTF-8 解码失败: {e}, bytes={line_bytes[:50]!r}"
-                            )
-                            line = ""
-
-                        if line:
-                            # 需要格式转换时，跳过记录原始数据（由 _emit_converted_line 记录转换后的数据）
-                            _process_line_with_perf(line, skip_record=True)
-                        normalized_line = line.rstrip("\r\n") if line else ""
+                    # 需要格式转换时，跳过记录原始数据（由 _emit_converted_line 记录转换后的数据）
+                    for normalized_line in _parse_lines_with_perf(byte_parser.feed_lines(chunk)):
                         out_chunks = _emit_converted_line(normalized_line)
                         if not out_chunks:
                             empty_yield_count += 1
@@ -941,20 +978,9 @@ class StreamProcessor:
                             if ctx.error_message == "format_conversion_failed":
                                 return
 
-                # 处理剩余缓冲区（needs_conversion 分支内，可复用 _emit_converted_line）
-                if buffer:
-                    try:
-                        line = decoder.decode(buffer, True)
-                    except Exception as e:
-                        logger.warning(
-                            f"[{self.request_id}] 处理剩余缓冲区失败: {e}, bytes={buffer[:50]!r}"
-                        )
-                        line = ""
-                    buffer = b""  # 标记已消费，避免 finally 中重复处理
-                    if line:
-                        # 需要格式转换时，跳过记录原始数据
-                        _process_line_with_perf(line, skip_record=True)
-                        normalized_line = line.rstrip("\r\n")
+                # 处理未以换行结束的残留行（needs_conversion 分支内，可复用 _emit_converted_line）
+                for normalized_line in _parse_lines_with_perf(byte_parser.flush_lines()):
+                    if normalized_line:
                         out_chunks = _emit_converted_line(normalized_line)
                         for out in out_chunks:
                             if out:
@@ -964,6 +990,9 @@ class StreamProcessor:
                                 if ctx.error_message == "format_conversion_failed":
                                     return
 
+                if transcoder is not None:
+                    transcoder.flush_metrics()
+
                 # Provider 流结束后，为 OpenAI 客户端补齐 [DONE]（许多上游不发送该哨兵）
                 if client_family == "openai" and not openai_done_sent:
                     _mark_stream_started()
@@ -975,21 +1004,10 @@ class StreamProcessor:
                         _mark_stream_started()
                         yield chunk
 
-                        buffer += chunk
-                        # 处理缓冲区中的完整行
-                        while b"\n" in buffer:
-                            line_bytes, buffer = buffer.split(b"\n", 1)
-                            try:
-                                # 使用增量解码器，可以正确处理跨 chunk 的多字节字符
-                                line = decoder.decode(line_bytes + b"\n", False)
-                                _process_line_with_perf(line)
-                            except Exception as e:
-                                # 解码失败，记录警告但继续处理
-                                logger.warning(
-                                    f"[{self.request_id}] UTF-8 解码失败: {e}, "
-                                    f"bytes={line_bytes[:50]!r}"
-                                )
-                                continue
+                        if usage_scanner is not None:
+                            _scan_passthrough_chunk(chunk)
+                        else:
+                            _feed_bytes_with_perf(chunk)
 
             # 处理剩余的流数据
             if not needs_conversion:
@@ -999,74 +1017,35 @@ class StreamProcessor:
                     # 原始数据透传
                     yield chunk
 
-                    buffer += chunk
-                    # 处理缓冲区中的完整行
-                    while b"\n" in buffer:
-                        line_bytes, buffer = buffer.split(b"\n", 1)
-                        try:
-                            # 使用增量解码器，可以正确处理跨 chunk 的多字节字符
-                            line = decoder.decode(line_bytes + b"\n", False)
-                            _process_line_with_perf(line)
-                        except Exception as e:
-                            # 解码失败，记录警告但继续处理
-                            logger.warning(
-                                f"[{self.request_id}] UTF-8 解码失败: {e}, "
-                                f"bytes={line_bytes[:50]!r}"
-                            )
-                            continue
+                    if usage_scanner is not None:
+                        _scan_passthrough_chunk(chunk)
+                    else:
+                        _feed_bytes_with_perf(chunk)
 
-            # 处理剩余的缓冲区数据（仅非转换分支，转换分支已在内部处理）
-            if not needs_conversion and buffer:
-                try:
-                    # 使用 final=True 处理最后的不完整字符
-                    line = decoder.decode(buffer, True)
-                    _process_line_with_perf(line)
-                except Exception as e:
-                    logger.warning(
-                        f"[{self.request_id}] 处理剩余缓冲区失败: {e}, bytes={buffer[:50]!r}"
+            # 处理尚未以换行结束的残留数据与解析器内累积的未完成事件
+            # （转换分支的残留行已在内部输出，此处只收尾最后一个事件）
+            if usage_scanner is not None:
+                self._apply_passthrough_frames(ctx, usage_scanner, usage_scanner.flush())
+            else:
+                for event in byte_parser.flush():
+                    self.handle_sse_event(
+                        ctx, event.event, event.data, skip_record=needs_conversion
                     )
-                buffer = b""  # 标记已消费，避免下方重复处理
-
-            # flush 残留的字节 buffer（异常中断时 buffer 可能仍有未解析的数据，
-            # 如包含 usage 的 message_delta/response.completed 事件）
-            # 正常结束时 buffer 已在上方被消费为空，此处为 no-op
-            if buffer:
-                try:
-                    remaining = decoder.decode(buffer, True)
-                    for line in remaining.split("\n"):
-                        stripped = line.rstrip("\r\n")
-                        if stripped:
-                            events = sse_parser.feed_line(stripped)
-                            for event in events:
-                                self.handle_sse_event(
-                                    ctx, event.get("event"), event.get("data") or ""
-                                )
-                except Exception:
-                    pass  # best-effort: 不应因 flush 失败影响后续流程
-
-            # flush SSE parser 内部累积的未完成事件
-            for event in sse_parser.flush():
-                self.handle_sse_event(ctx, event.get("event"), event.get("data") or "")
+                ctx.chunk_count = byte_parser.line_count
 
         except GeneratorExit:
             raise
         except (httpx.StreamClosed, httpx.HTTPError) as exc:
             # 连接关闭/协议错误：best-effort flush 残留 SSE，避免丢失尾部 usage。
             try:
-                if buffer:
-                    remaining = decoder.decode(buffer, True)
-                    buffer = b""
-                    for line in remaining.split("\n"):
-                        self._process_line(ctx, sse_parser, line, skip_record=needs_conversion)
-
-                # flush SSE parser 内部累积的未完成事件
-                for event in sse_parser.flush():
-                    self.handle_sse_event(
-                        ctx,
-                        event.get("event"),
-                        event.get("data") or "",
-                        skip_record=needs_conversion,
-                    )
+                if usage_scanner is not None:
+                    self._apply_passthrough_frames(ctx, usage_scanner, usage_scanner.flush())
+                else:
+                    # 含转换分支中尚未输出的残留行与未完成事件
+                    for event in byte_parser.flush():
+                        self.handle_sse_event(
+                            ctx, event.event, event.data, skip_record=needs_conversion
+                        )
             except Exception:
                 # best-effort: 不应因 flush 失败影响后续流程
                 pass
@@ -1111,42 +1090,6 @@ class StreamProcessor:
                     ctx.perf_metrics["stream_data_events"] = int(ctx.data_count)
             await self._cleanup(response_ctx, http_client)
 
-    def _process_line(
-        self,
-        ctx: StreamContext,
-        sse_parser: SSEEventParser,
-        line: str,
-        *,
-        skip_record: bool = False,
-        skip_ctx_update: bool = False,
-    ) -> None:
-        """
-        处理单行数据
-
-        Args:
-            ctx: 流式上下文
-            sse_parser: SSE 解析器
-            line: 原始行数据
-            skip_record: 是否跳过记录到 parsed_chunks（当需要格式转换时应为 True）
-            skip_ctx_update: 跳过 usage/completion/text 提取（由调用方统一处理时使用）
-        """
-        # SSEEventParser 以"去掉换行符"的单行文本作为输入；这里统一剔除 CR/LF，
-        # 避免把空行误判成 "\n" 并导致事件边界解析错误。
-        normalized_line = line.rstrip("\r\n")
-        events = sse_parser.feed_line(normalized_line)
-
-        if normalized_line != "":
-            ctx.chunk_count += 1
-
-        for event in events:
-            self.handle_sse_event(
-                ctx,
-                event.get("event"),
-                event.get("data") or "",
-                skip_record=skip_record,
-                skip_ctx_update=skip_ctx_update,
-            )
-
     async def create_monitored_stream(
         self,
         ctx: StreamContext,
@@ -1270,8 +1213,8 @@ class StreamProcessor:
 
                 # 尝试解析 JSON
                 try:
-                    data = json.loads(data_str)
-                except json.JSONDecodeError:
+                    data = json_codec.loads(data_str)
+                except json_codec.JSONDecodeError:
                     yield event_block + b"\n\n"
                     continue
 
@@ -1467,8 +1410,8 @@ class _LightweightSmoother:
                     continue
 
                 try:
-                    data = json.loads(data_str)
-                except json.JSONDecodeError:
+                    data = json_codec.loads(data_str)
+                except json_codec.JSONDecodeError:
                     yield event_block + b"\n\n"
                     continue
 
@@ -18,8 +18,8 @@ from src.api.handlers.base.chat_adapter_base import ChatAdapterBase, register_ad
 from src.api.handlers.base.chat_handler_base import ChatHandlerBase
 from src.core.api_format import ApiFamily, get_header_value
 from src.core.logger import logger
-from src.core.optimization_utils import TokenCounter
 from src.models.claude import ClaudeMessagesRequest, ClaudeTokenCountRequest
+from src.services.usage.tokenizer import get_tokenizer
 
 
 class ClaudeCapabilityDetector:
@@ -296,21 +296,24 @@ class ClaudeTokenCountAdapter(ApiAdapter):
             logger.error(f"Token count payload invalid: {e}")
             raise HTTPException(status_code=400, detail="Invalid token count payload") from e
 
-        token_counter = TokenCounter()
+        tokenizer = get_tokenizer()
         total_tokens = 0
 
         if request.system:
             if isinstance(request.system, str):
-                total_tokens += token_counter.count_tokens(request.system, request.model)
+                total_tokens += await tokenizer.count_text(request.system, request.model)
             elif isinstance(request.system, list):
                 for block in request.system:
                     if hasattr(block, "text"):
-                        total_tokens += token_counter.count_tokens(block.text, request.model)
+                        total_tokens += await tokenizer.count_text(block.text, request.model)
 
         messages_dict = [
             msg.model_dump() if hasattr(msg, "model_dump") else msg for msg in request.messages
         ]
-        total_tokens += token_counter.count_messages_tokens(messages_dict, request.model)
+        # 每条消息 3 + 角色（约 1）≈ 4 个 token 的开销；多轮对话的历史前缀命中缓存
+        total_tokens += await tokenizer.count_messages(
+            messages_dict, request.model, message_overhead=3, reply_overhead=0
+        )
 
         context.add_audit_metadata(
             action="claude_token_count",
@@ -16,17 +16,21 @@ Gemini Files API 代理端点
 参考文档：
 https://ai.google.dev/api/files
 
-优化：HTTP 代理请求期间不持有数据库连接，避免阻塞其他请求。
+优化：
+- HTTP 代理请求期间不持有数据库连接，避免阻塞其他请求
+- 上传请求体与下载响应体均为流式转发，单次传输的内存占用与文件大小无关
 """
 
 from __future__ import annotations
 
+from collections.abc import AsyncIterable, AsyncIterator
 from dataclasses import dataclass
 from typing import Any, Dict, Optional, Tuple
 from urllib.parse import urlencode
 
+import httpx
 from fastapi import APIRouter, HTTPException, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from sqlalchemy.orm import Session
 
 from src.clients.http_client import HTTPClientPool
@@ -58,6 +62,12 @@ GEMINI_FILES_BASE_URL = "https://generativelanguage.googleapis.com"
 
 # Gemini Files API 无能力限制（任何 Gemini key 都可用）
 
+# 流式下载每次转发的块大小；上传按 ASGI 服务器收到的块原样转发
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# 下载响应中不转发的逐跳头部
+_DOWNLOAD_HOP_BY_HOP = frozenset({"transfer-encoding", "connection", "keep-alive"})
+
 # 需要从客户端请求中移除的头部（这些会由代理重新设置或不应转发）
 HEADERS_TO_REMOVE = frozenset(
     {
@@ -352,7 +362,7 @@ async def _proxy_request(
     method: str,
     upstream_url: str,
     headers: dict[str, str],
-    content: bytes | None = None,
+    content: bytes | AsyncIterable[bytes] | None = None,
     json_body: dict[str, Any] | None = None,
     file_key_id: str | None = None,
     user_id: str | None = None,
@@ -364,7 +374,7 @@ async def _proxy_request(
         method: HTTP 方法
         upstream_url: 上游 URL
         headers: 请求头
-        content: 原始请求体（二进制）
+        content: 原始请求体（二进制或异步字节流；流式请求体由 httpx 边读边发）
         json_body: JSON 请求体
         file_key_id: 上游 Provider Key ID，用于成功响应时存储 file→key 映射
         user_id: 用户 ID，用于文件映射的权限验证
@@ -520,10 +530,7 @@ async def upload_file(
     # 阶段 1：解析上下文（短暂持有数据库连接）
     ctx = await _resolve_upstream_context_standalone(request)
 
-    # 阶段 2：读取请求体
-    body = await request.body()
-
-    # 阶段 3：代理请求（不持有数据库连接）
+    # 阶段 2：代理请求（不持有数据库连接）
     upstream_url = _build_upstream_url(
         ctx.base_url,
         "/v1beta/files",
@@ -532,14 +539,23 @@ async def upload_file(
     )
 
     headers = _build_upstream_headers(dict(request.headers), ctx.upstream_key)
+    # 可恢复上传的 upload / finalize 块要求定长请求体：保留客户端声明的长度，
+    # 请求体边收边发；客户端本身使用分块编码时按分块转发
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        headers["content-length"] = content_length
 
-    logger.debug("Gemini Files upload proxy: POST {}", redact_url_for_log(upstream_url))
+    logger.debug(
+        "Gemini Files upload proxy: POST {} (command={})",
+        redact_url_for_log(upstream_url),
+        request.headers.get("x-goog-upload-command", "-"),
+    )
 
     return await _proxy_request(
         "POST",
         upstream_url,
         headers,
-        content=body,
+        content=request.stream(),
         file_key_id=ctx.file_key_id,
         user_id=ctx.user_id,
     )
@@ -698,10 +714,6 @@ async def download_file(
 
     优化：HTTP 下载期间不持有数据库连接
     """
-    import httpx
-    from fastapi import HTTPException
-    from fastapi.responses import JSONResponse, Response
-
     # ========== 阶段 1：数据库操作（短暂持有连接）==========
     client_key = _extract_gemini_api_key(request)
     if not client_key:
@@ -776,15 +788,37 @@ async def download_file(
 
     logger.debug("Gemini Files download proxy: GET {}", redact_url_for_log(upstream_url))
 
-    # 使用 follow_redirects=True 跟随重定向（Gemini 文件下载会重定向）
+    return await _stream_download(upstream_url, headers)
+
+
+def _download_client() -> httpx.AsyncClient:
+    """下载专用客户端：使用 follow_redirects=True 跟随重定向（Gemini 文件下载会重定向）"""
+    return httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(300.0))
+
+
+async def _stream_download(upstream_url: str, headers: dict[str, str]) -> Response:
+    """
+    流式转发上游下载响应
+
+    响应体按原始编码（不解压）逐块转发，保留上游的 Content-Length / Content-Encoding；
+    下一块只在上一块写入客户端后才读取，客户端读得慢时上游读取随之放缓。
+    """
+    client = _download_client()
     try:
-        async with httpx.AsyncClient(follow_redirects=True, timeout=httpx.Timeout(300.0)) as client:
-            response = await client.get(upstream_url, headers=headers)
+        request = client.build_request("GET", upstream_url, headers=headers)
+        response = await client.send(request, stream=True)
     except Exception as exc:
+        await client.aclose()
         logger.error("Gemini Files download failed: {}", exc)
         raise HTTPException(status_code=502, detail="Failed to download file")
 
     if response.status_code >= 400:
+        # 错误响应体很小，读完后直接返回
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
+            await client.aclose()
         content: dict[str, Any]
         if response.headers.get("content-type", "").startswith("application/json"):
             try:
@@ -795,14 +829,19 @@ async def download_file(
             content = {"error": response.text}
         return JSONResponse(content=content, status_code=response.status_code)
 
-    # 返回文件内容
-    return Response(
-        content=response.content,
+    async def relay() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in response.aiter_raw(STREAM_CHUNK_SIZE):
+                yield chunk
+        finally:
+            await response.aclose()
+            await client.aclose()
+
+    return StreamingResponse(
+        relay(),
         status_code=response.status_code,
         headers={
-            k: v
-            for k, v in response.headers.items()
-            if k.lower() not in {"transfer-encoding", "connection", "keep-alive"}
+            k: v for k, v in response.headers.items() if k.lower() not in _DOWNLOAD_HOP_BY_HOP
         },
         media_type=response.headers.get("content-type", "application/octet-stream"),
     )
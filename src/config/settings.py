@@ -137,6 +137,17 @@ class Config:
         self.concurrency_slot_ttl = int(os.getenv("CONCURRENCY_SLOT_TTL", "600"))
         self.cache_reservation_ratio = float(os.getenv("CACHE_RESERVATION_RATIO", "0.1"))
 
+        # RPM 租约配置（仅 Redis 模式生效）
+        # RPM_LEASE_ENABLED: 每个进程按 Key 从 Redis 批量预占 RPM 槽位并在本地消费
+        # RPM_LEASE_MAX_ERROR_RATIO: 单进程持有的未用槽位上限占 Key RPM 限制的比例
+        #   （误差只表现为少放行，不会超限；集群误差上限 = 进程数 * 该比例）
+        # RPM_LEASE_HORIZON_SECONDS: 租约大小按该时长内的预估请求量计算
+        # RPM_LEASE_IDLE_RETURN_SECONDS: 租约空闲超过该时长后归还未用槽位
+        self.rpm_lease_enabled = os.getenv("RPM_LEASE_ENABLED", "false").lower() == "true"
+        self.rpm_lease_max_error_ratio = float(os.getenv("RPM_LEASE_MAX_ERROR_RATIO", "0.05"))
+        self.rpm_lease_horizon_seconds = float(os.getenv("RPM_LEASE_HORIZON_SECONDS", "2"))
+        self.rpm_lease_idle_return_seconds = float(os.getenv("RPM_LEASE_IDLE_RETURN_SECONDS", "5"))
+
         # 限流降级策略配置
         # RATE_LIMIT_FAIL_OPEN: 当限流服务（Redis）异常时的行为
         #
@@ -179,9 +190,13 @@ class Config:
         # STREAM_PREFETCH_LINES: 预读行数，用于检测嵌套错误
         # STREAM_STATS_DELAY: 统计记录延迟（秒），等待流完全关闭
         # STREAM_FIRST_BYTE_TIMEOUT: 首字节超时（秒），等待首字节超过此时间触发故障转移
+        # STREAM_PASSTHROUGH_ENABLED: 同格式流式响应按原始字节透传，usage 由旁路字节扫描提取
         self.stream_prefetch_lines = int(os.getenv("STREAM_PREFETCH_LINES", "5"))
         self.stream_stats_delay = float(os.getenv("STREAM_STATS_DELAY", "0.1"))
         self.stream_first_byte_timeout = float(os.getenv("STREAM_FIRST_BYTE_TIMEOUT", "30.0"))
+        self.stream_passthrough_enabled = (
+            os.getenv("STREAM_PASSTHROUGH_ENABLED", "true").lower() == "true"
+        )
 
         # Usage 队列配置（Redis Streams）
         # 默认启用队列模式，通过 Redis Streams 异步写入 DB，提升响应性能
@@ -203,6 +218,50 @@ class Config:
         self.usage_queue_metrics_interval_seconds = float(
             os.getenv("USAGE_QUEUE_METRICS_INTERVAL_SECONDS", "30")
         )
+        # 分片：按 user_id（或 api_key_id）哈希写入 N 个 Stream（1 = 不分片，沿用单一 Stream）
+        # 消费者通过带 TTL 的租约独占分片，成员加入/离开时自动重新平衡
+        self.usage_queue_shards = max(1, int(os.getenv("USAGE_QUEUE_SHARDS", "1")))
+        self.usage_queue_shard_by = os.getenv("USAGE_QUEUE_SHARD_BY", "user_id").strip().lower()
+        self.usage_queue_lease_ttl_seconds = float(os.getenv("USAGE_QUEUE_LEASE_TTL_SECONDS", "15"))
+        self.usage_queue_lag_refresh_seconds = float(
+            os.getenv("USAGE_QUEUE_LAG_REFRESH_SECONDS", "5")
+        )
+        # 背压：分片 lag 超过阈值时写入端先丢弃 headers/bodies，超过更高阈值才丢弃事件
+        # 0 表示禁用对应级别
+        self.usage_queue_backpressure_lag = int(os.getenv("USAGE_QUEUE_BACKPRESSURE_LAG", "20000"))
+        self.usage_queue_drop_lag = int(os.getenv("USAGE_QUEUE_DROP_LAG", "0"))
+
+        # 路由快照：调度器候选查询使用进程内只读路由表，配置变更时按 Provider 增量重建
+        # ROUTING_SNAPSHOT_TTL_SECONDS: 快照最长使用时间，兜底覆盖绕过 ORM 的批量更新
+        self.routing_snapshot_enabled = (
+            os.getenv("ROUTING_SNAPSHOT_ENABLED", "true").lower() == "true"
+        )
+        self.routing_snapshot_ttl_seconds = float(os.getenv("ROUTING_SNAPSHOT_TTL_SECONDS", "30"))
+
+        # 计费价格快照：计费规则/阶梯价格/缓存价格使用进程内只读快照，按集群价格版本号整体替换
+        # PRICING_SNAPSHOT_TTL_SECONDS: 快照最长使用时间，兜底覆盖丢失的版本广播
+        self.pricing_snapshot_enabled = (
+            os.getenv("PRICING_SNAPSHOT_ENABLED", "true").lower() == "true"
+        )
+        self.pricing_snapshot_ttl_seconds = float(os.getenv("PRICING_SNAPSHOT_TTL_SECONDS", "300"))
+
+        # 两级缓存（模型/用户/Provider 缓存）：进程内 L1 + Redis L2，失效经 pub/sub 广播
+        # TIERED_CACHE_L1_TTL_SECONDS: L1 最长保留时间，兜底覆盖丢失的失效广播
+        self.tiered_cache_l1_enabled = (
+            os.getenv("TIERED_CACHE_L1_ENABLED", "true").lower() == "true"
+        )
+        self.tiered_cache_l1_ttl_seconds = int(os.getenv("TIERED_CACHE_L1_TTL_SECONDS", "10"))
+        self.tiered_cache_l1_max_size = int(os.getenv("TIERED_CACHE_L1_MAX_SIZE", "10000"))
+
+        # API Key 认证缓存：按 key_hash 缓存已验证的 Key/用户快照，命中时认证不访问数据库
+        # 锁定/禁用/删除/余额耗尽经 pub/sub 全集群失效；TTL 兜底绕过 ORM 的批量更新
+        self.api_key_auth_cache_enabled = (
+            os.getenv("API_KEY_AUTH_CACHE_ENABLED", "true").lower() == "true"
+        )
+        self.api_key_auth_cache_ttl_seconds = float(
+            os.getenv("API_KEY_AUTH_CACHE_TTL_SECONDS", "60")
+        )
+        self.api_key_auth_cache_max_size = int(os.getenv("API_KEY_AUTH_CACHE_MAX_SIZE", "10000"))
 
         # Admin analytics query defaults (protect DB from unbounded scans)
         # ADMIN_USAGE_DEFAULT_DAYS:
@@ -285,6 +344,20 @@ class Config:
             os.getenv("USAGE_METADATA_MAX_BYTES", default_usage_metadata_max_bytes)
         )
 
+        # 流式响应捕获上限（StreamUsageTracker，保证单个流的内存有界）
+        # STREAM_CAPTURE_MAX_CHARS: 保留的输出文本头部字符数，默认 262144
+        # STREAM_CAPTURE_TAIL_CHARS: 超出上限后额外保留的末尾字符数，默认 16384
+        # STREAM_CAPTURE_MAX_CHUNKS: 保留的已解析响应块数（超出后只保留末尾若干块），默认 2000
+        self.stream_capture_max_chars = int(os.getenv("STREAM_CAPTURE_MAX_CHARS", "262144"))
+        self.stream_capture_tail_chars = int(os.getenv("STREAM_CAPTURE_TAIL_CHARS", "16384"))
+        self.stream_capture_max_chunks = int(os.getenv("STREAM_CAPTURE_MAX_CHUNKS", "2000"))
+
+        # 使用记录 body 压缩（维护任务）
+        # USAGE_COMPACTION_WORKERS: 压缩进程池大小，0 表示使用线程池，默认 2
+        self.usage_compaction_workers = int(os.getenv("USAGE_COMPACTION_WORKERS", "2"))
+        # USAGE_BODY_STORE: 压缩时把请求体拆分为内容寻址的段去重存储（zstd/gzip），默认开启
+        self.usage_body_store_enabled = os.getenv("USAGE_BODY_STORE", "true").lower() == "true"
+
         # 视频任务轮询配置
         # VIDEO_POLL_INTERVAL_SECONDS: 轮询间隔（秒），默认 10 秒
         # VIDEO_MAX_POLL_COUNT: 最大轮询次数，默认 360 次（约 1 小时）
@@ -294,6 +367,14 @@ class Config:
         self.video_max_poll_count = int(os.getenv("VIDEO_MAX_POLL_COUNT", "360"))
         self.video_poll_batch_size = int(os.getenv("VIDEO_POLL_BATCH_SIZE", "50"))
         self.video_poll_concurrency = int(os.getenv("VIDEO_POLL_CONCURRENCY", "10"))
+        # VIDEO_POLL_PARTITIONS: 任务分区数；Redis 可用时各 worker 通过分区租约分摊轮询
+        # VIDEO_POLL_REFRESH_SECONDS: 从数据库增量刷新到期队列的间隔（秒）
+        # VIDEO_POLL_MAX_INTERVAL_SECONDS: 自适应退避下单个任务的最长轮询间隔（秒）
+        self.video_poll_partitions = max(1, int(os.getenv("VIDEO_POLL_PARTITIONS", "16")))
+        self.video_poll_refresh_seconds = float(os.getenv("VIDEO_POLL_REFRESH_SECONDS", "5"))
+        self.video_poll_max_interval_seconds = int(
+            os.getenv("VIDEO_POLL_MAX_INTERVAL_SECONDS", "60")
+        )
 
         # Management Token 速率限制（每分钟每 IP）
         self.management_token_rate_limit = int(os.getenv("MANAGEMENT_TOKEN_RATE_LIMIT", "30"))
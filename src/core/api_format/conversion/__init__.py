@@ -5,6 +5,7 @@ API 格式转换子模块（Canonical）
 - `format_conversion_registry`: 全局转换注册表（Hub-and-Spoke）
 - `register_default_normalizers()`: 注册默认 Normalizers（OPENAI/CLAUDE/GEMINI）
 - `StreamState`: 统一流式状态容器
+- `StreamTranscoder`: 按 (source, target) 预解析的流式转码器（直接输出 SSE 字节）
 """
 
 from src.core.api_format.conversion.compatibility import is_format_compatible
@@ -15,6 +16,7 @@ from src.core.api_format.conversion.registry import (
     register_default_normalizers,
 )
 from src.core.api_format.conversion.stream_state import StreamState
+from src.core.api_format.conversion.stream_transcoder import StreamTranscoder, TranscodedEvent
 
 __all__ = [
     # Registry
@@ -23,6 +25,8 @@ __all__ = [
     "register_default_normalizers",
     # Stream state
     "StreamState",
+    "StreamTranscoder",
+    "TranscodedEvent",
     # Exceptions
     "FormatConversionError",
     # Compatibility
@@ -6,6 +6,7 @@
 """
 
 from abc import ABC, abstractmethod
+from collections.abc import Hashable
 from typing import Any
 
 from .internal import FormatCapabilities, InternalError, InternalRequest, InternalResponse
@@ -84,6 +85,32 @@ class FormatNormalizer(ABC):
         """将内部事件转换为格式特定流式块"""
         raise NotImplementedError
 
+    def stream_text_delta_template_key(
+        self,
+        block_index: int,
+        state: StreamState,
+    ) -> Hashable | None:
+        """
+        文本增量快速路径的模板缓存键（可选）
+
+        返回 None 表示该格式/当前状态不支持快速路径；否则返回一个可哈希的键，
+        键相同则 `stream_text_delta_template` 的输出（除文本外）必须完全一致。
+        """
+        return None
+
+    def stream_text_delta_template(
+        self,
+        block_index: int,
+        state: StreamState,
+    ) -> dict[str, Any]:
+        """
+        文本增量事件的输出模板
+
+        必须与 `stream_event_from_internal(ContentDeltaEvent(...))` 的单个输出结构一致，
+        文本位置填入 `STREAM_TEXT_PLACEHOLDER`，且不得修改 state。
+        """
+        raise NotImplementedError
+
     # ============ 错误转换（可选） ============
 
     def is_error_response(self, response: dict[str, Any]) -> bool:
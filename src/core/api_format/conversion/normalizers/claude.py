@@ -7,7 +7,6 @@ Claude Messages API Normalizer
 - 可选：Claude error <-> InternalError
 """
 
-import json
 from typing import Any
 
 from src.core.api_format.conversion.field_mappings import (
@@ -41,6 +40,7 @@ from src.core.api_format.conversion.internal import (
 )
 from src.core.api_format.conversion.normalizer import FormatNormalizer
 from src.core.api_format.conversion.stream_events import (
+    STREAM_TEXT_PLACEHOLDER,
     ContentBlockStartEvent,
     ContentBlockStopEvent,
     ContentDeltaEvent,
@@ -51,6 +51,7 @@ from src.core.api_format.conversion.stream_events import (
     ToolCallDeltaEvent,
 )
 from src.core.api_format.conversion.stream_state import StreamState
+from src.utils import json_codec
 
 
 class ClaudeNormalizer(FormatNormalizer):
@@ -633,6 +634,27 @@ class ClaudeNormalizer(FormatNormalizer):
 
         return out
 
+    def stream_text_delta_template_key(
+        self,
+        block_index: int,
+        state: StreamState,
+    ) -> tuple[int, bool]:
+        ss = state.substate(self.FORMAT_ID)
+        is_thinking = ss.get(f"block_type_{block_index}") == ContentType.THINKING.value
+        return int(block_index), is_thinking
+
+    def stream_text_delta_template(
+        self,
+        block_index: int,
+        state: StreamState,
+    ) -> dict[str, Any]:
+        _, is_thinking = self.stream_text_delta_template_key(block_index, state)
+        if is_thinking:
+            delta = {"type": "thinking_delta", "thinking": STREAM_TEXT_PLACEHOLDER}
+        else:
+            delta = {"type": "text_delta", "text": STREAM_TEXT_PLACEHOLDER}
+        return {"type": "content_block_delta", "index": int(block_index), "delta": delta}
+
     # =========================
     # Error conversion
     # =========================
@@ -816,8 +838,8 @@ class ClaudeNormalizer(FormatNormalizer):
         if isinstance(raw_content, str):
             parsed: Any = None
             try:
-                parsed = json.loads(raw_content)
-            except json.JSONDecodeError:
+                parsed = json_codec.loads(raw_content)
+            except json_codec.JSONDecodeError:
                 parsed = None
 
             if parsed is not None:
@@ -11,7 +11,6 @@ Gemini (GenerateContent / streamGenerateContent) Normalizer
 - 响应/流式通常为 camelCase（candidates/finishReason/usageMetadata/modelVersion）。
 """
 
-import json
 from typing import Any
 
 from src.core.api_format.conversion.field_mappings import (
@@ -62,6 +61,7 @@ from src.core.api_format.conversion.stream_events import (
 )
 from src.core.api_format.conversion.stream_state import StreamState
 from src.core.api_format.schema_utils import clean_gemini_schema as _clean_gemini_schema
+from src.utils import json_codec
 
 # Valid Gemini Part data-oneof field names (camelCase + snake_case).
 _VALID_PART_DATA_FIELDS = frozenset(
@@ -131,6 +131,31 @@ def compact_gemini_contents(contents: list[dict[str, Any]]) -> list[dict[str, An
     return merged
 
 
+def _take_stream_text_delta(ss: dict[str, Any], key: str, text: str) -> str:
+    """
+    返回本次流式文本的新增部分，并维护累积状态（兼容增量与累积两种上游行为）
+
+    累积文本以片段列表保存（ss[key]），长度记录在 ss[f"{key}_len"]。只有新文本不短于
+    已累积长度（可能是累积模式）时才拼接比较，避免增量模式下每个 token 都复制整段累积文本。
+    """
+    parts = ss.get(key)
+    if not isinstance(parts, list):
+        parts = ss[key] = []
+    total = int(ss.get(f"{key}_len") or 0)
+
+    if total and len(text) >= total:
+        prev = "".join(parts)
+        if text.startswith(prev):
+            parts[:] = [text]
+            ss[f"{key}_len"] = len(text)
+            return text[total:]
+        parts[:] = [prev]
+
+    parts.append(text)
+    ss[f"{key}_len"] = total + len(text)
+    return text
+
+
 class GeminiNormalizer(FormatNormalizer):
     FORMAT_ID = "gemini:chat"
     capabilities = FormatCapabilities(
@@ -572,8 +597,8 @@ class GeminiNormalizer(FormatNormalizer):
             # 当不存在思考内容时，golden tests 期望文本位于索引0。
             ss.setdefault("text_block_index", None)
             ss.setdefault("thinking_block_index", None)
-            ss.setdefault("accumulated_text", "")
-            ss.setdefault("accumulated_thinking", "")
+            ss.setdefault("accumulated_text", [])
+            ss.setdefault("accumulated_thinking", [])
             ss.setdefault("next_block_index", 0)
             events.append(MessageStartEvent(message_id=state.message_id, model=model))
 
@@ -611,13 +636,7 @@ class GeminiNormalizer(FormatNormalizer):
 
                     if is_thought:
                         # Thinking content
-                        prev = str(ss.get("accumulated_thinking") or "")
-                        if text.startswith(prev):
-                            delta = text[len(prev) :]
-                            ss["accumulated_thinking"] = text
-                        else:
-                            delta = text
-                            ss["accumulated_thinking"] = prev + delta
+                        delta = _take_stream_text_delta(ss, "accumulated_thinking", text)
 
                         if delta:
                             if not ss.get("thinking_block_started"):
@@ -636,13 +655,7 @@ class GeminiNormalizer(FormatNormalizer):
                             )
                     else:
                         # Regular text
-                        prev = str(ss.get("accumulated_text") or "")
-                        if text.startswith(prev):
-                            delta = text[len(prev) :]
-                            ss["accumulated_text"] = text
-                        else:
-                            delta = text
-                            ss["accumulated_text"] = prev + delta
+                        delta = _take_stream_text_delta(ss, "accumulated_text", text)
 
                         if delta:
                             # Transition: stop thinking block before text (Claude requires stop/start ordering).
@@ -722,7 +735,7 @@ class GeminiNormalizer(FormatNormalizer):
                             ToolCallDeltaEvent(
                                 block_index=block_index,
                                 tool_id=tool_id or "",
-                                input_delta=json.dumps(args, ensure_ascii=False),
+                                input_delta=json_codec.dumps(args),
                             )
                         )
                     events.append(ContentBlockStopEvent(block_index=block_index))
@@ -881,10 +894,10 @@ class GeminiNormalizer(FormatNormalizer):
             args: dict[str, Any] = {}
             if raw_json:
                 try:
-                    parsed = json.loads(raw_json)
+                    parsed = json_codec.loads(raw_json)
                     if isinstance(parsed, dict):
                         args = parsed
-                except json.JSONDecodeError:
+                except json_codec.JSONDecodeError:
                     args = {}
 
             fc: dict[str, Any] = {"name": name, "args": args}
@@ -7,7 +7,6 @@ OpenAI Chat Completions Normalizer
 - 可选：OpenAI error <-> InternalError
 """
 
-import json
 import time
 from datetime import datetime, timezone
 from typing import Any
@@ -47,6 +46,7 @@ from src.core.api_format.conversion.internal_video import (
 )
 from src.core.api_format.conversion.normalizer import FormatNormalizer
 from src.core.api_format.conversion.stream_events import (
+    STREAM_TEXT_PLACEHOLDER,
     ContentBlockStartEvent,
     ContentBlockStopEvent,
     ContentDeltaEvent,
@@ -58,6 +58,7 @@ from src.core.api_format.conversion.stream_events import (
 )
 from src.core.api_format.conversion.stream_state import StreamState
 from src.core.logger import logger
+from src.utils import json_codec
 
 
 class OpenAINormalizer(FormatNormalizer):
@@ -698,6 +699,37 @@ class OpenAINormalizer(FormatNormalizer):
         # 其他事件类型：OpenAI chunk 无直接对应，跳过
         return out
 
+    def stream_text_delta_template_key(
+        self,
+        block_index: int,
+        state: StreamState,
+    ) -> tuple[bool, str, str, int]:
+        ss = state.substate(self.FORMAT_ID)
+        is_thinking = ss.get(f"block_type_{block_index}") == ContentType.THINKING.value
+        # created 为秒级时间戳，模板按秒失效即可与逐事件构造的结果保持一致
+        return is_thinking, state.message_id, state.model, int(time.time())
+
+    def stream_text_delta_template(
+        self,
+        block_index: int,
+        state: StreamState,
+    ) -> dict[str, Any]:
+        is_thinking, message_id, model, created = self.stream_text_delta_template_key(
+            block_index, state
+        )
+        if is_thinking:
+            delta: dict[str, Any] = {"reasoning_content": STREAM_TEXT_PLACEHOLDER, "content": None}
+        else:
+            delta = {"content": STREAM_TEXT_PLACEHOLDER}
+        return {
+            "id": message_id or "chatcmpl-stream",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model or "",
+            "system_fingerprint": None,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+        }
+
     # =========================
     # Error conversion
     # =========================
@@ -1169,9 +1201,9 @@ class OpenAINormalizer(FormatNormalizer):
         tool_input: dict[str, Any]
         if args_str:
             try:
-                parsed = json.loads(args_str)
+                parsed = json_codec.loads(args_str)
                 tool_input = parsed if isinstance(parsed, dict) else {"raw": parsed}
-            except json.JSONDecodeError:
+            except json_codec.JSONDecodeError:
                 tool_input = {"raw": args_str}
         else:
             tool_input = {}
@@ -1201,9 +1233,9 @@ class OpenAINormalizer(FormatNormalizer):
         tool_input: dict[str, Any]
         if args_str:
             try:
-                parsed = json.loads(args_str)
+                parsed = json_codec.loads(args_str)
                 tool_input = parsed if isinstance(parsed, dict) else {"raw": parsed}
-            except json.JSONDecodeError:
+            except json_codec.JSONDecodeError:
                 tool_input = {"raw": args_str}
         else:
             tool_input = {}
@@ -1236,8 +1268,8 @@ class OpenAINormalizer(FormatNormalizer):
         if isinstance(content, str):
             parsed: Any = None
             try:
-                parsed = json.loads(content)
-            except json.JSONDecodeError:
+                parsed = json_codec.loads(content)
+            except json_codec.JSONDecodeError:
                 parsed = None
 
             if parsed is not None:
@@ -1457,7 +1489,7 @@ class OpenAINormalizer(FormatNormalizer):
         elif isinstance(block.output, str):
             content = block.output
         else:
-            content = json.dumps(block.output, ensure_ascii=False)
+            content = json_codec.dumps(block.output)
 
         return {
             "role": "tool",
@@ -1472,7 +1504,7 @@ class OpenAINormalizer(FormatNormalizer):
             "type": "function",
             "function": {
                 "name": block.tool_name,
-                "arguments": json.dumps(block.tool_input or {}, ensure_ascii=False),
+                "arguments": json_codec.dumps(block.tool_input or {}),
             },
         }
 
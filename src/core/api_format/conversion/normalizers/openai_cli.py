@@ -10,7 +10,6 @@ OpenAI CLI / Responses Normalizer (OPENAI_CLI)
 - 未识别的字段会进入 extra/raw，未知内容块保留在 internal，但默认输出阶段会丢弃。
 """
 
-import json
 import time
 from collections.abc import Callable
 from typing import Any
@@ -54,6 +53,7 @@ from src.core.api_format.conversion.stream_events import (
     UnknownStreamEvent,
 )
 from src.core.api_format.conversion.stream_state import StreamState
+from src.utils import json_codec
 
 
 class OpenAICliNormalizer(FormatNormalizer):
@@ -1026,11 +1026,11 @@ class OpenAICliNormalizer(FormatNormalizer):
         args_raw = item.get("arguments") or "{}"
         try:
             tool_input = (
-                json.loads(args_raw)
+                json_codec.loads(args_raw)
                 if isinstance(args_raw, str)
                 else (args_raw if isinstance(args_raw, dict) else {})
             )
-        except (json.JSONDecodeError, TypeError):
+        except (json_codec.JSONDecodeError, TypeError):
             tool_input = {"_raw": args_raw}
         tool_block = ToolUseBlock(
             tool_id=tool_id,
@@ -1131,9 +1131,7 @@ class OpenAICliNormalizer(FormatNormalizer):
                             "call_id": block.tool_id,
                             "name": block.tool_name,
                             "arguments": (
-                                json.dumps(block.tool_input, ensure_ascii=False)
-                                if block.tool_input
-                                else "{}"
+                                json_codec.dumps(block.tool_input) if block.tool_input else "{}"
                             ),
                         }
                     )
@@ -18,6 +18,7 @@ from typing import Any
 from src.core.api_format.conversion.exceptions import FormatConversionError
 from src.core.api_format.conversion.normalizer import FormatNormalizer
 from src.core.api_format.conversion.stream_state import StreamState
+from src.core.api_format.conversion.stream_transcoder import StreamTranscoder
 from src.core.logger import logger
 from src.core.metrics import format_conversion_duration_seconds, format_conversion_total
 
@@ -46,9 +47,11 @@ class FormatConversionRegistry:
 
     def __init__(self) -> None:
         self._normalizers: dict[str, FormatNormalizer] = {}
+        self._stream_transcoders: dict[tuple[str, str], StreamTranscoder] = {}
 
     def register(self, normalizer: FormatNormalizer) -> None:
         self._normalizers[str(normalizer.FORMAT_ID).upper()] = normalizer
+        self._stream_transcoders.clear()
         logger.info(f"[FormatConversionRegistry] 注册 normalizer: {normalizer.FORMAT_ID}")
 
     def get_normalizer(self, format_id: str) -> FormatNormalizer | None:
@@ -263,6 +266,34 @@ class FormatConversionRegistry:
 
     # ==================== 流式转换（严格） ====================
 
+    def get_stream_transcoder(self, source_format: str, target_format: str) -> StreamTranscoder:
+        """
+        获取 (source, target) 的流式转码器（按格式对缓存，供单个请求全程复用）
+
+        Raises:
+            FormatConversionError: normalizer 未注册或不支持流式转换
+        """
+        key = (str(source_format).upper(), str(target_format).upper())
+        transcoder = self._stream_transcoders.get(key)
+        if transcoder is not None:
+            return transcoder
+
+        if key[0] == key[1]:
+            transcoder = StreamTranscoder(source_format, target_format, None, None)
+        else:
+            src = self._require_normalizer(source_format)
+            tgt = self._require_normalizer(target_format)
+            if not (src.capabilities.supports_stream and tgt.capabilities.supports_stream):
+                raise FormatConversionError(
+                    source_format,
+                    target_format,
+                    "source/target normalizer 不支持流式转换",
+                )
+            transcoder = StreamTranscoder(source_format, target_format, src, tgt)
+
+        self._stream_transcoders[key] = transcoder
+        return transcoder
+
     def convert_stream_chunk(
         self,
         chunk: dict[str, Any],
@@ -270,19 +301,10 @@ class FormatConversionRegistry:
         target_format: str,
         state: StreamState | None = None,
     ) -> list[dict[str, Any]]:
-        if str(source_format).upper() == str(target_format).upper():
+        transcoder = self.get_stream_transcoder(source_format, target_format)
+        if transcoder.is_identity:
             return [chunk]
 
-        src = self._require_normalizer(source_format)
-        tgt = self._require_normalizer(target_format)
-
-        if not (src.capabilities.supports_stream and tgt.capabilities.supports_stream):
-            raise FormatConversionError(
-                source_format,
-                target_format,
-                "source/target normalizer 不支持流式转换",
-            )
-
         if state is None:
             # 调用方应提供预初始化的 state（包含 model/message_id），
             # 这里仅作为防御性回退，可能导致响应中 model 字段为空
@@ -292,17 +314,7 @@ class FormatConversionRegistry:
             )
             state = StreamState()
 
-        with _track_conversion_metrics(
-            "stream", str(source_format).upper(), str(target_format).upper()
-        ):
-            try:
-                events = src.stream_chunk_to_internal(chunk, state)
-                out: list[dict[str, Any]] = []
-                for event in events:
-                    out.extend(tgt.stream_event_from_internal(event, state))
-                return out
-            except Exception as e:
-                raise FormatConversionError(source_format, target_format, str(e)) from e
+        return transcoder.convert(chunk, state)
 
     # ==================== 能力查询 ====================
 
@@ -117,6 +117,10 @@ class UnknownStreamEvent:
     extra: dict[str, Any] = field(default_factory=dict)
 
 
+# 文本增量快速路径模板中的文本占位符（JSON 序列化后为唯一的转义序列，不会与真实文本冲突）
+STREAM_TEXT_PLACEHOLDER = "\x00aether:text_delta\x00"
+
+
 InternalStreamEvent = (
     MessageStartEvent
     | ContentBlockStartEvent
@@ -142,4 +146,5 @@ __all__ = [
     "ErrorEvent",
     "UnknownStreamEvent",
     "InternalStreamEvent",
+    "STREAM_TEXT_PLACEHOLDER",
 ]
@@ -0,0 +1,218 @@
+"""
+流式转码器（StreamTranscoder）
+
+为固定的 (source, target) 格式对预先解析好转换所需的一切，按请求复用：
+- normalizer 查找、格式字符串规范化、metrics label 绑定只在构造时做一次
+- 转换结果直接编码为 SSE 字节（Claude 带 event: 行，其余格式只有 data: 行）
+- 文本增量事件走快速路径：目标 normalizer 提供模板后，把 JSON 编码后的文本片段
+  拼接进缓存的字节模板，不再为每个 token 构造并序列化完整 dict
+"""
+
+from __future__ import annotations
+
+import time
+from json.encoder import encode_basestring
+from typing import Any
+
+from src.core.api_format.conversion.exceptions import FormatConversionError
+from src.core.api_format.conversion.normalizer import FormatNormalizer
+from src.core.api_format.conversion.stream_events import (
+    STREAM_TEXT_PLACEHOLDER,
+    ContentDeltaEvent,
+)
+from src.core.api_format.conversion.stream_state import StreamState
+from src.core.metrics import format_conversion_duration_seconds, format_conversion_total
+from src.utils import json_codec
+
+# 模板缓存存放在 StreamState.extra 中（按流隔离，随流结束释放）
+_TEMPLATE_CACHE_KEY = "_text_delta_templates"
+# 单个流的模板缓存上限（OpenAI 模板按秒失效，超过上限直接清空重建）
+_TEMPLATE_CACHE_MAX = 16
+_PLACEHOLDER_JSON = encode_basestring(STREAM_TEXT_PLACEHOLDER).encode("utf-8")
+# 成功计数本地累积，达到阈值（或调用 flush_metrics）时一次性写入 Prometheus
+_METRICS_FLUSH_EVERY = 256
+# 耗时直方图按 1/N 采样，避免每个 chunk 都计时并写直方图
+_DURATION_SAMPLE_EVERY = 16
+
+
+class TranscodedEvent:
+    """转码后的单个事件
+
+    data 为目标格式 dict；快速路径产出的文本增量不构造 dict，data 为 None。
+    """
+
+    __slots__ = ("data", "payload")
+
+    def __init__(self, data: dict[str, Any] | None, payload: bytes) -> None:
+        self.data = data
+        self.payload = payload
+
+
+class StreamTranscoder:
+    """固定 (source, target) 的流式转码器，通过 `FormatConversionRegistry.get_stream_transcoder` 获取"""
+
+    def __init__(
+        self,
+        source_format: str,
+        target_format: str,
+        source: FormatNormalizer | None,
+        target: FormatNormalizer | None,
+    ) -> None:
+        self.source_format = source_format
+        self.target_format = target_format
+        source_upper = str(source_format).upper()
+        target_upper = str(target_format).upper()
+        self.is_identity = source_upper == target_upper
+        self._event_line = target_upper.split(":", 1)[0] == "CLAUDE"
+
+        self._to_internal = source.stream_chunk_to_internal if source else None
+        self._from_internal = target.stream_event_from_internal if target else None
+        self._target = target
+        # 目标格式未覆盖模板钩子时，完全跳过快速路径判断
+        self._has_text_template = target is not None and (
+            type(target).stream_text_delta_template_key
+            is not FormatNormalizer.stream_text_delta_template_key
+        )
+
+        self._calls = 0
+        self._pending_success = 0
+        self._success_total = format_conversion_total.labels(
+            "stream", source_upper, target_upper, "success"
+        )
+        self._error_total = format_conversion_total.labels(
+            "stream", source_upper, target_upper, "error"
+        )
+        self._duration = format_conversion_duration_seconds.labels(
+            "stream", source_upper, target_upper
+        )
+
+    # ==================== SSE 编码 ====================
+
+    def encode_event(self, evt: Any) -> bytes:
+        """按目标格式生成 SSE 事件字节（Claude 需要 event: 行，OpenAI/Gemini 只需要 data: 行）"""
+        data = json_codec.dumpb(evt)
+        if self._event_line and isinstance(evt, dict):
+            event_type = evt.get("type", "")
+            if event_type:
+                return b"event: " + str(event_type).encode() + b"\ndata: " + data + b"\n\n"
+        return b"data: " + data + b"\n\n"
+
+    # ==================== 转换 ====================
+
+    def convert(self, chunk: dict[str, Any], state: StreamState) -> list[dict[str, Any]]:
+        """转换单个 chunk，返回目标格式 dict 列表（与 convert_stream_chunk 语义一致）"""
+        if self.is_identity:
+            return [chunk]
+
+        start = self._start_timing()
+        try:
+            out: list[dict[str, Any]] = []
+            for event in self._to_internal(chunk, state):
+                out.extend(self._from_internal(event, state))
+        except Exception as e:
+            self._error_total.inc()
+            raise FormatConversionError(self.source_format, self.target_format, str(e)) from e
+        finally:
+            self._stop_timing(start)
+        self._record_success()
+        return out
+
+    def transcode(
+        self,
+        chunk: dict[str, Any],
+        state: StreamState,
+        *,
+        materialize: bool = False,
+    ) -> list[TranscodedEvent]:
+        """
+        转换单个 chunk 并直接输出 SSE 字节
+
+        Args:
+            chunk: 源格式流式块
+            state: 流式转换状态
+            materialize: 是否需要每个事件的 dict（如记录 parsed_chunks），为 True 时不走快速路径
+        """
+        if self.is_identity:
+            return [TranscodedEvent(chunk, self.encode_event(chunk))]
+
+        start = self._start_timing()
+        try:
+            out: list[TranscodedEvent] = []
+            fast = self._has_text_template and not materialize
+            for event in self._to_internal(chunk, state):
+                if (
+                    fast
+                    and type(event) is ContentDeltaEvent
+                    and event.text_delta
+                    and not event.extra
+                ):
+                    fragments = self._text_delta_fragments(event.block_index, state)
+                    if fragments is not None:
+                        text = encode_basestring(event.text_delta).encode("utf-8")
+                        out.append(TranscodedEvent(None, fragments[0] + text + fragments[1]))
+                        continue
+                for evt in self._from_internal(event, state):
+                    out.append(TranscodedEvent(evt, self.encode_event(evt)))
+        except Exception as e:
+            self._error_total.inc()
+            raise FormatConversionError(self.source_format, self.target_format, str(e)) from e
+        finally:
+            self._stop_timing(start)
+        self._record_success()
+        return out
+
+    # ==================== Metrics ====================
+
+    def _start_timing(self) -> float | None:
+        self._calls += 1
+        if self._calls % _DURATION_SAMPLE_EVERY:
+            return None
+        return time.perf_counter()
+
+    def _stop_timing(self, start: float | None) -> None:
+        if start is not None:
+            self._duration.observe(time.perf_counter() - start)
+
+    def _record_success(self) -> None:
+        self._pending_success += 1
+        if self._pending_success >= _METRICS_FLUSH_EVERY:
+            self.flush_metrics()
+
+    def flush_metrics(self) -> None:
+        """把本地累积的成功计数写入 Prometheus（流结束时调用）"""
+        if self._pending_success:
+            self._success_total.inc(self._pending_success)
+            self._pending_success = 0
+
+    def _text_delta_fragments(
+        self,
+        block_index: int,
+        state: StreamState,
+    ) -> tuple[bytes, bytes] | None:
+        key = self._target.stream_text_delta_template_key(block_index, state)
+        if key is None:
+            return None
+
+        cache = state.extra.get(_TEMPLATE_CACHE_KEY)
+        if cache is None:
+            cache = state.extra[_TEMPLATE_CACHE_KEY] = {}
+        elif key in cache:
+            return cache[key]
+        elif len(cache) >= _TEMPLATE_CACHE_MAX:
+            cache.clear()
+
+        template = self._target.stream_text_delta_template(block_index, state)
+        raw = self.encode_event(template)
+        # 占位符必须恰好出现一次，否则无法安全拼接，回退到逐事件构造
+        fragments: tuple[bytes, bytes] | None = None
+        if raw.count(_PLACEHOLDER_JSON) == 1:
+            prefix, suffix = raw.split(_PLACEHOLDER_JSON)
+            fragments = (prefix, suffix)
+        cache[key] = fragments
+        return fragments
+
+
+__all__ = [
+    "StreamTranscoder",
+    "TranscodedEvent",
+]
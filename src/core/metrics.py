@@ -113,3 +113,133 @@ antigravity_degradation_total = Counter(
     "Count of Antigravity signature degradation (rectification) events",
     ["stage", "model"],
 )
+
+# ==================== Usage 队列 ====================
+
+usage_queue_stream_lag = Gauge(
+    "usage_queue_stream_lag",
+    "Number of undelivered entries per usage stream shard (XINFO GROUPS lag)",
+    ["shard"],
+)
+
+usage_queue_owned_shards = Gauge(
+    "usage_queue_owned_shards",
+    "Number of usage stream shards leased by this consumer process",
+)
+
+usage_queue_backpressure_total = Counter(
+    "usage_queue_backpressure_total",
+    "Total number of usage events degraded or dropped due to stream backpressure",
+    ["action"],  # action: degraded/dropped
+)
+
+# ==================== 路由快照 ====================
+
+routing_snapshot_rebuild_total = Counter(
+    "routing_snapshot_rebuild_total",
+    "Total number of routing snapshot rebuilds",
+    ["mode"],  # mode: full/incremental
+)
+
+routing_snapshot_build_seconds = Histogram(
+    "routing_snapshot_build_seconds",
+    "Time spent building the routing snapshot in seconds",
+    ["mode"],
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+)
+
+# ==================== 计费价格快照 ====================
+
+pricing_snapshot_rebuild_total = Counter(
+    "pricing_snapshot_rebuild_total",
+    "Total number of billing pricing snapshot rebuilds",
+    ["reason"],  # reason: initial/invalidated/version/ttl
+)
+
+pricing_snapshot_build_seconds = Histogram(
+    "pricing_snapshot_build_seconds",
+    "Time spent building the billing pricing snapshot in seconds",
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5],
+)
+
+# ==================== API Key 认证缓存 ====================
+
+credential_cache_requests_total = Counter(
+    "credential_cache_requests_total",
+    "Total number of API key credential cache lookups",
+    ["result"],  # result: hit/miss
+)
+
+credential_cache_invalidations_total = Counter(
+    "credential_cache_invalidations_total",
+    "Total number of API key credential cache invalidations",
+    ["source"],  # source: local/remote/exhausted
+)
+
+credential_cache_invalidation_lag_seconds = Histogram(
+    "credential_cache_invalidation_lag_seconds",
+    "Delay between publishing a credential invalidation and applying it on another instance",
+    buckets=[0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+
+# ==================== 活动记录合并写入 ====================
+
+activity_flush_seconds = Histogram(
+    "activity_flush_seconds",
+    "Time spent writing a coalesced batch of activity touches to the database",
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+
+activity_flush_rows_total = Counter(
+    "activity_flush_rows_total",
+    "Total number of entities updated by the activity flusher",
+    ["kind"],
+)
+
+# ==================== 统计增量汇总 ====================
+
+stats_rollup_flush_seconds = Histogram(
+    "stats_rollup_flush_seconds",
+    "Time spent upserting a batch of usage rollups into the hourly stats tables",
+    buckets=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5],
+)
+
+stats_rollup_rows_total = Counter(
+    "stats_rollup_rows_total",
+    "Total number of hourly stats rows upserted (or dropped) by the rollup flusher",
+    ["dimension", "result"],
+)
+
+# ==================== 使用记录 body 压缩 ====================
+
+usage_body_compaction_seconds = Histogram(
+    "usage_body_compaction_seconds",
+    "Time spent per batch in each stage of the usage body compaction pipeline",
+    ["stage"],  # stage values: fetch/compress/write
+    buckets=[0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10],
+)
+
+usage_body_compaction_rows_total = Counter(
+    "usage_body_compaction_rows_total",
+    "Total number of usage rows whose request/response bodies were compacted",
+)
+
+usage_body_compaction_bytes_total = Counter(
+    "usage_body_compaction_bytes_total",
+    "Total body bytes processed by the compaction pipeline",
+    ["kind"],  # kind values: raw/compressed
+)
+
+# ==================== RPM 计数 ====================
+
+rpm_redis_ops_total = Counter(
+    "rpm_redis_ops_total",
+    "Total number of Redis round-trips issued by the RPM limiter",
+    ["op"],  # op values: acquire/lease/return/get
+)
+
+rpm_slot_requests_total = Counter(
+    "rpm_slot_requests_total",
+    "Total number of RPM slot acquisitions by how they were served",
+    ["source", "result"],  # source values: redis/lease/memory, result: granted/rejected
+)
@@ -4,7 +4,7 @@
 
 from typing import Any
 
-import tiktoken
+from src.services.usage.tokenizer import encoding_for_model, estimate_tokens, get_encoder
 
 
 class TokenCounter:
@@ -13,45 +13,18 @@ class TokenCounter:
     支持多种模型的准确计数
     """
 
-    # 模型到编码器的映射
-    MODEL_TO_ENCODING = {
-        "gpt-4": "cl100k_base",
-        "gpt-3.5-turbo": "cl100k_base",
-        "claude-3": "cl100k_base",  # Claude使用类似的tokenizer
-        "claude-2": "cl100k_base",
-    }
-
-    def __init__(self) -> None:
-        self._encodings = {}
-        self._default_encoding = None
-
-    def _get_encoding(self, model: str) -> Any:
-        """获取模型对应的编码器"""
-        # 标准化模型名称
-        model_base = model.lower().split("-")[0]
-
-        if model_base not in self._encodings:
-            encoding_name = self.MODEL_TO_ENCODING.get(model_base, "cl100k_base")  # 默认编码器
-            try:
-                self._encodings[model_base] = tiktoken.get_encoding(encoding_name)
-            except Exception:
-                # 如果失败，使用默认编码器
-                if not self._default_encoding:
-                    self._default_encoding = tiktoken.get_encoding("cl100k_base")
-                self._encodings[model_base] = self._default_encoding
-
-        return self._encodings[model_base]
-
     def count_tokens(self, text: str, model: str = "claude-3") -> int:
         """
-        精确计算文本的token数量
+        精确计算文本的token数量（编码器由共享分词服务预加载并缓存）
         """
         if not text:
             return 0
 
+        encoding = get_encoder(encoding_for_model(model))
+        if encoding is None:
+            return estimate_tokens(text)
         try:
-            encoding = self._get_encoding(model)
-            return len(encoding.encode(text))
+            return len(encoding.encode(text, disallowed_special=()))
         except Exception:
             # 降级到简单估算
             return len(text) // 4
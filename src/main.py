@@ -92,6 +92,10 @@ async def lifespan(app: FastAPI) -> Any:
     logger.info(f"AI Proxy v{__version__} - GlobalModel Architecture")
     logger.info("=" * 60)
 
+    from src.utils import json_codec
+
+    logger.info(f"JSON 编解码后端: {json_codec.backend_name()}")
+
     # 安全配置验证（生产环境会阻止启动）
     security_errors = config.validate_security_config()
     if security_errors:
@@ -138,6 +142,32 @@ async def lifespan(app: FastAPI) -> Any:
         logger.warning(f"Redis连接失败，但配置允许降级，将继续使用内存模式: {e}")
         redis_client = None
 
+    # 路由快照、两级缓存 L1 与认证缓存的跨实例失效同步（Redis Pub/Sub）
+    if redis_client:
+        from src.services.auth.credential_cache import handle_credential_invalidation
+        from src.services.cache.sync import get_cache_sync_service
+        from src.services.cache.tiered import handle_tiered_invalidation
+
+        cache_sync = await get_cache_sync_service(redis_client)
+        if cache_sync:
+            cache_sync.register_handler(cache_sync.CHANNEL_TIERED, handle_tiered_invalidation)
+            cache_sync.register_handler(
+                cache_sync.CHANNEL_CREDENTIAL, handle_credential_invalidation
+            )
+            if config.routing_snapshot_enabled:
+                from src.services.cache.routing_snapshot import handle_routing_invalidation
+
+                cache_sync.register_handler(cache_sync.CHANNEL_ROUTING, handle_routing_invalidation)
+            if config.pricing_snapshot_enabled:
+                from src.services.billing.pricing_snapshot import (
+                    handle_pricing_version,
+                    load_pricing_version,
+                )
+
+                cache_sync.register_handler(cache_sync.CHANNEL_PRICING, handle_pricing_version)
+                await load_pricing_version(redis_client)
+            await cache_sync.start()
+
     # 初始化并发管理器（内部会使用Redis）
     logger.info("初始化并发管理器...")
     from src.services.rate_limit.concurrency_manager import get_concurrency_manager
@@ -151,6 +181,28 @@ async def lifespan(app: FastAPI) -> Any:
     await init_batch_committer()
     logger.info("[OK] 批量提交器已启动，数据库写入性能优化已启用")
 
+    # 健康度状态后台同步（Redis 熔断状态拉取 + 数据库快照写入）
+    from src.services.health.state_store import start_health_state_flusher
+
+    await start_health_state_flusher()
+
+    # 活动记录（last_used_at 等）合并写入
+    from src.services.system.activity_writer import start_activity_flusher
+
+    await start_activity_flusher()
+
+    # 统计增量汇总（usage 结算折叠进 stats_hourly*）
+    from src.services.system.stats_rollup import start_stats_rollup_flusher
+
+    await start_stats_rollup_flusher()
+
+    # 分词编码器预加载（gunicorn --preload 时已在 when_ready 中加载，这里直接命中）
+    from src.services.usage.tokenizer import preload_encoders
+    from src.utils.async_utils import run_in_executor
+
+    loaded_encodings = await run_in_executor(preload_encoders)
+    logger.info(f"[OK] 分词编码器已就绪: {', '.join(loaded_encodings) or '无（使用估算）'}")
+
     # 初始化 Usage 队列消费者（可选）
     if config.usage_queue_enabled:
         logger.info("初始化 Usage 队列消费者...")
@@ -239,8 +291,12 @@ async def lifespan(app: FastAPI) -> Any:
         model_fetch_scheduler = None  # type: ignore[assignment]
 
     # 启动异步任务轮询服务（当前仅视频）
-    task_poller_active = await task_coordinator.acquire("task_poller:video")
-    if task_poller_active:
+    # 有 Redis 且启用分区时每个 worker 都运行，通过分区租约均分任务；否则仅一个 worker 运行
+    task_poller_partitioned = redis_client is not None and config.video_poll_partitions > 1
+    if task_poller_partitioned:
+        logger.info("启动 TaskPoller（video，{} 个分区）...", config.video_poll_partitions)
+        await task_poller.start()
+    elif await task_coordinator.acquire("task_poller:video"):
         logger.info("启动 TaskPoller（video）...")
         await task_poller.start()
     else:
@@ -263,6 +319,16 @@ async def lifespan(app: FastAPI) -> Any:
     # 关闭时执行
     logger.info("正在关闭服务...")
 
+    # 停止健康度状态同步（写入最后一次快照）
+    from src.services.health.state_store import stop_health_state_flusher
+
+    await stop_health_state_flusher()
+
+    # 停止活动记录合并写入（写入剩余记录）
+    from src.services.system.activity_writer import stop_activity_flusher
+
+    await stop_activity_flusher()
+
     # 停止批量提交器（确保所有待提交的数据都被保存）
     logger.info("停止批量提交器...")
     from src.core.batch_committer import shutdown_batch_committer
@@ -277,6 +343,16 @@ async def lifespan(app: FastAPI) -> Any:
 
         await stop_usage_queue_consumer()
 
+    # 停止统计增量汇总（在 usage 写入方之后，写入剩余增量）
+    from src.services.system.stats_rollup import stop_stats_rollup_flusher
+
+    await stop_stats_rollup_flusher()
+
+    # 关闭分词进程池
+    from src.services.usage.tokenizer import shutdown_tokenizer
+
+    shutdown_tokenizer()
+
     # 停止维护调度器
     if maintenance_scheduler:
         logger.info("停止系统维护调度器...")
@@ -299,7 +375,8 @@ async def lifespan(app: FastAPI) -> Any:
     if task_poller:
         logger.info("停止 TaskPoller（video）...")
         await task_poller.stop()
-        await task_coordinator.release("task_poller:video")
+        if not task_poller_partitioned:
+            await task_coordinator.release("task_poller:video")
 
     # 停止统一的定时任务调度器
     logger.info("停止定时任务调度器...")
@@ -320,6 +397,11 @@ async def lifespan(app: FastAPI) -> Any:
     if concurrency_manager:
         await concurrency_manager.close()
 
+    # 关闭缓存同步服务
+    from src.services.cache.sync import close_cache_sync_service
+
+    await close_cache_sync_service()
+
     # 关闭全局Redis客户端
     logger.info("关闭全局Redis客户端...")
     from src.clients.redis_client import close_redis_client
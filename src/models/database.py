@@ -374,6 +374,8 @@ class Usage(Base):
     # 压缩存储字段（7天后自动压缩到这里）
     request_body_compressed = Column(LargeBinary, nullable=True)  # gzip压缩的请求体
     response_body_compressed = Column(LargeBinary, nullable=True)  # gzip压缩的响应体
+    # 分段去重存储的请求体清单（7天后写入，段内容见 usage_body_segments）
+    request_body_ref = Column(JSON, nullable=True)
 
     # 元数据
     request_metadata = Column(JSON, nullable=True)  # 存储额外信息
@@ -397,6 +399,12 @@ class Usage(Base):
         """获取请求体（自动解压）"""
         if self.request_body is not None:
             return self.request_body
+        if self.request_body_ref is not None:
+            from sqlalchemy.orm import object_session
+
+            from src.services.system.body_store import load_request_body
+
+            return load_request_body(object_session(self), self.request_body_ref)
         if self.request_body_compressed is not None:
             from src.utils.compression import decompress_json
 
@@ -414,6 +422,38 @@ class Usage(Base):
         return None
 
 
+class UsageBodySegment(Base):
+    """请求体分段（按内容哈希去重，跨使用记录共享）"""
+
+    __tablename__ = "usage_body_segments"
+
+    hash = Column(String(32), primary_key=True)  # 段 JSON 字节的 blake2b-128 摘要
+    codec = Column(String(20), nullable=False)  # gzip / zstd / zstd:<字典ID>
+    data = Column(LargeBinary, nullable=False)
+    raw_size = Column(Integer, nullable=False)
+    stored_size = Column(Integer, nullable=False)
+    ref_count = Column(BigInteger, nullable=False, default=1)  # 累计被引用次数
+    created_at = Column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+    # 引用该段的最新使用记录的 created_at，用于随压缩字段保留期一起回收
+    last_seen_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+class UsageBodyDictionary(Base):
+    """请求体分段的 zstd 训练字典"""
+
+    __tablename__ = "usage_body_dictionaries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    data = Column(LargeBinary, nullable=False)
+    size = Column(Integer, nullable=False)
+    sample_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
+    )
+
+
 class UserQuota(Base):
     """用户配额历史记录"""
 
@@ -2075,9 +2115,13 @@ class StatsHourly(Base):
     # 成本统计 (USD)
     total_cost = Column(Float, default=0.0, nullable=False)
     actual_total_cost = Column(Float, default=0.0, nullable=False)
+    cache_creation_cost = Column(Float, default=0.0, nullable=False)
+    cache_read_cost = Column(Float, default=0.0, nullable=False)
 
     # 性能统计
     avg_response_time_ms = Column(Float, default=0.0, nullable=False)
+    response_time_sketch = Column(JSON, nullable=True)  # LatencySketch.to_dict()
+    first_byte_time_sketch = Column(JSON, nullable=True)
 
     # 完成标记
     is_complete = Column(Boolean, default=False, nullable=False)
@@ -2144,6 +2188,8 @@ class StatsHourlyModel(Base):
     output_tokens = Column(BigInteger, default=0, nullable=False)
     total_cost = Column(Float, default=0.0, nullable=False)
     avg_response_time_ms = Column(Float, default=0.0, nullable=False)
+    response_time_sketch = Column(JSON, nullable=True)  # LatencySketch.to_dict()
+    first_byte_time_sketch = Column(JSON, nullable=True)
 
     created_at = Column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
@@ -2175,6 +2221,8 @@ class StatsHourlyProvider(Base):
     input_tokens = Column(BigInteger, default=0, nullable=False)
     output_tokens = Column(BigInteger, default=0, nullable=False)
     total_cost = Column(Float, default=0.0, nullable=False)
+    response_time_sketch = Column(JSON, nullable=True)  # LatencySketch.to_dict()
+    first_byte_time_sketch = Column(JSON, nullable=True)
 
     created_at = Column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False
@@ -2229,6 +2277,8 @@ class StatsDaily(Base):
     p50_first_byte_time_ms = Column(Integer, nullable=True)
     p90_first_byte_time_ms = Column(Integer, nullable=True)
     p99_first_byte_time_ms = Column(Integer, nullable=True)
+    response_time_sketch = Column(JSON, nullable=True)  # LatencySketch.to_dict()
+    first_byte_time_sketch = Column(JSON, nullable=True)
     fallback_count = Column(Integer, default=0, nullable=False)  # Provider 切换次数
 
     # 使用维度统计
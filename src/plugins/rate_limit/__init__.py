@@ -4,6 +4,13 @@
 
 from .base import RateLimitResult, RateLimitStrategy
 from .sliding_window import SlidingWindowStrategy
+from .sliding_window_counter import SlidingWindowCounterStrategy
 from .token_bucket import TokenBucketStrategy
 
-__all__ = ["RateLimitStrategy", "RateLimitResult", "TokenBucketStrategy", "SlidingWindowStrategy"]
+__all__ = [
+    "RateLimitStrategy",
+    "RateLimitResult",
+    "TokenBucketStrategy",
+    "SlidingWindowStrategy",
+    "SlidingWindowCounterStrategy",
+]
@@ -0,0 +1,420 @@
+"""
+滑动窗口计数器速率限制策略，支持 Redis 分布式后端
+
+与 sliding_window.py 逐请求记录时间戳不同，每个键只保存当前窗口与上一窗口的计数，
+窗口内请求数按上一窗口计数的剩余比例加权估算：
+
+    estimate = previous * (1 - elapsed / window_size) + current
+
+每个键的内存与单次检查开销都是 O(1)，与限制大小无关；空闲超过两个窗口的键状态
+等价于空，清理时直接删除，不需要 LRU 淘汰。估算假设上一窗口内请求均匀分布，
+突发集中在上一窗口末尾时可能少量多放行或少放行（误差不超过上一窗口计数的比例部分）。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any
+
+from src.core.logger import logger
+
+from ...clients.redis_client import get_redis_client_sync
+from .base import RateLimitResult, RateLimitStrategy
+
+
+class WindowCounter:
+    """双窗口加权计数器"""
+
+    __slots__ = ("window_size", "max_requests", "index", "current", "previous", "last_access_time")
+
+    def __init__(self, window_size: float, max_requests: int):
+        """
+        初始化计数器
+
+        Args:
+            window_size: 窗口大小（秒）
+            max_requests: 窗口内最大请求数
+        """
+        self.window_size = window_size
+        self.max_requests = max_requests
+        self.index = 0
+        self.current = 0
+        self.previous = 0
+        self.last_access_time = time.time()
+
+    def roll(self, now: float) -> float:
+        """推进到 now 所在窗口，返回滑动窗口内的加权请求数"""
+        self.last_access_time = now
+        position = now / self.window_size
+        index = int(position)
+        if index > self.index:
+            self.previous = self.current if index == self.index + 1 else 0
+            self.current = 0
+            self.index = index
+        if not self.previous:
+            return self.current
+        elapsed = min(1.0, max(0.0, position - self.index))
+        return self.previous * (1.0 - elapsed) + self.current
+
+    def estimate(self, now: float) -> float:
+        """滑动窗口内的加权请求数"""
+        return self.roll(now)
+
+    def can_accept(self, now: float, amount: int = 1) -> bool:
+        return self.roll(now) + amount <= self.max_requests
+
+    def add_request(self, now: float, amount: int = 1) -> bool:
+        if self.roll(now) + amount > self.max_requests:
+            return False
+        self.current += amount
+        return True
+
+    def get_remaining(self, now: float) -> int:
+        return max(0, math.floor(self.max_requests - self.roll(now)))
+
+    def get_retry_after(self, now: float, amount: int = 1) -> float | None:
+        """距离可以接受 amount 个请求的秒数；amount 超过限制时返回 None"""
+        if amount > self.max_requests:
+            return None
+        self.roll(now)
+        window_start = self.index * self.window_size
+        elapsed = (now - window_start) / self.window_size
+        if self.current + amount <= self.max_requests:
+            # 等待上一窗口的权重衰减
+            if self.previous <= 0:
+                return 0.0
+            needed = 1.0 - (self.max_requests - self.current - amount) / self.previous
+            return max(0.0, needed - elapsed) * self.window_size
+        # 当前窗口已满，等到下一窗口中当前计数的权重衰减
+        needed = 1.0 - (self.max_requests - amount) / self.current
+        return (1.0 - elapsed + max(0.0, needed)) * self.window_size
+
+    def get_reset_time(self, now: float) -> datetime:
+        """计数完全衰减为 0 的时间"""
+        self.roll(now)
+        if self.current > 0:
+            reset = (self.index + 2) * self.window_size
+        elif self.previous > 0:
+            reset = (self.index + 1) * self.window_size
+        else:
+            reset = now
+        return datetime.fromtimestamp(reset, tz=timezone.utc)
+
+    def is_idle(self, now: float) -> bool:
+        """超过两个窗口未访问，状态等价于空"""
+        return now - self.last_access_time > 2 * self.window_size
+
+    def to_result(self, now: float, amount: int) -> RateLimitResult:
+        allowed = self.can_accept(now, amount)
+        retry_after = None
+        if not allowed:
+            wait = self.get_retry_after(now, amount)
+            retry_after = int(wait if wait is not None else self.window_size) + 1
+        return RateLimitResult(
+            allowed=allowed,
+            remaining=self.get_remaining(now),
+            reset_at=self.get_reset_time(now),
+            retry_after=retry_after,
+            message=(
+                None
+                if allowed
+                else f"Rate limit exceeded. Please retry after {retry_after} seconds."
+            ),
+        )
+
+
+class SlidingWindowCounterStrategy(RateLimitStrategy):
+    """
+    滑动窗口计数器速率限制策略
+
+    特点：
+    - 近似滑动窗口，不允许窗口边界处的双倍突发
+    - 每个键固定内存，适合限制在每分钟数千次的热点键
+    - Redis 可用时多实例共享计数（RATE_LIMIT_BACKEND=auto/redis）
+    """
+
+    # 默认空闲计数器清理间隔（秒）
+    DEFAULT_CLEANUP_INTERVAL = 300
+
+    def __init__(self) -> None:
+        super().__init__("sliding_window_counter")
+        self.counters: dict[str, WindowCounter] = {}
+        self._lock = asyncio.Lock()
+
+        # 默认配置
+        self.default_window_size = 60  # 默认60秒窗口
+        self.default_max_requests = 100  # 默认100个请求
+
+        self._cleanup_interval = self.DEFAULT_CLEANUP_INTERVAL
+        self._last_cleanup_time: float = time.time()
+
+        # 可选的 Redis 后端
+        self._redis_backend: RedisSlidingWindowCounterBackend | None = None
+        self._redis_checked = False
+        self._backend_mode = os.getenv("RATE_LIMIT_BACKEND", "auto").lower()
+
+    def _resolve_limits(self, key: str, rate_limit: int | None = None) -> tuple[int, int]:
+        """返回 (window_size, max_requests)；rate_limit 为数据库中的每分钟限制"""
+        if rate_limit is not None:
+            return 60, rate_limit
+        if key.startswith("api_key:"):
+            return (
+                self.config.get("api_key_window_size", self.default_window_size),
+                self.config.get("api_key_max_requests", self.default_max_requests),
+            )
+        if key.startswith("user:"):
+            return (
+                self.config.get("user_window_size", self.default_window_size),
+                self.config.get("user_max_requests", self.default_max_requests * 2),
+            )
+        return self.default_window_size, self.default_max_requests
+
+    def _get_counter(self, key: str, rate_limit: int | None = None) -> WindowCounter:
+        counter = self.counters.get(key)
+        window_size, max_requests = self._resolve_limits(key, rate_limit)
+        if counter is None:
+            counter = self.counters[key] = WindowCounter(window_size, max_requests)
+        elif rate_limit is not None:
+            # 限制由数据库配置驱动时跟随最新值
+            counter.max_requests = max_requests
+        return counter
+
+    def _maybe_cleanup(self, now: float) -> None:
+        if now - self._last_cleanup_time <= self._cleanup_interval:
+            return
+        self._last_cleanup_time = now
+        idle = [key for key, counter in self.counters.items() if counter.is_idle(now)]
+        for key in idle:
+            del self.counters[key]
+        if idle:
+            logger.debug(f"清理了 {len(idle)} 个空闲的滑动窗口计数器")
+
+    def _want_redis_backend(self) -> bool:
+        return self._backend_mode in {"auto", "redis"}
+
+    async def _ensure_backend(self) -> None:
+        if self._redis_checked:
+            return
+        self._redis_checked = True
+        if not self._want_redis_backend():
+            return
+        redis_client = get_redis_client_sync()
+        if redis_client:
+            self._redis_backend = RedisSlidingWindowCounterBackend(redis_client)
+            logger.info("速率限制改用 Redis 滑动窗口计数器后端")
+        elif self._backend_mode == "redis":
+            logger.warning("RATE_LIMIT_BACKEND=redis 但 Redis 客户端不可用，回退到内存计数器")
+
+    async def check_limit(self, key: str, **kwargs: Any) -> RateLimitResult:
+        """
+        检查速率限制
+
+        Args:
+            key: 限制键
+            **kwargs: 额外参数，包括 rate_limit (从数据库配置)
+
+        Returns:
+            速率限制检查结果
+        """
+        await self._ensure_backend()
+
+        rate_limit = kwargs.get("rate_limit")
+        amount = kwargs.get("amount", 1)
+
+        if self._redis_backend:
+            window_size, max_requests = self._resolve_limits(key, rate_limit)
+            return await self._redis_backend.peek(key, window_size, max_requests, amount)
+
+        async with self._lock:
+            now = time.time()
+            self._maybe_cleanup(now)
+            return self._get_counter(key, rate_limit).to_result(now, amount)
+
+    async def consume(self, key: str, amount: int = 1, **kwargs: Any) -> bool:
+        """
+        消费配额
+
+        Args:
+            key: 限制键
+            amount: 消费数量
+
+        Returns:
+            是否成功消费
+        """
+        await self._ensure_backend()
+
+        rate_limit = kwargs.get("rate_limit")
+        if self._redis_backend:
+            window_size, max_requests = self._resolve_limits(key, rate_limit)
+            success = await self._redis_backend.consume(key, window_size, max_requests, amount)
+        else:
+            async with self._lock:
+                success = self._get_counter(key, rate_limit).add_request(time.time(), amount)
+
+        if success:
+            logger.debug("滑动窗口计数器请求记录成功")
+        else:
+            logger.warning("滑动窗口计数器请求被拒绝：超出速率限制")
+        return success
+
+    async def reset(self, key: str) -> Any:
+        """
+        重置计数器
+
+        Args:
+            key: 限制键
+        """
+        await self._ensure_backend()
+
+        if self._redis_backend:
+            await self._redis_backend.reset(key)
+            return
+
+        async with self._lock:
+            if self.counters.pop(key, None) is not None:
+                logger.info("滑动窗口计数器已重置")
+
+    async def get_stats(self, key: str) -> dict[str, Any]:
+        """
+        获取统计信息
+
+        Args:
+            key: 限制键
+
+        Returns:
+            统计信息
+        """
+        await self._ensure_backend()
+
+        window_size, max_requests = self._resolve_limits(key)
+        if self._redis_backend:
+            return await self._redis_backend.get_stats(key, window_size, max_requests)
+
+        async with self._lock:
+            now = time.time()
+            counter = self._get_counter(key)
+            return _counter_stats(key, counter, now)
+
+    def configure(self, config: dict[str, Any]) -> Any:
+        """
+        配置策略
+
+        支持的配置项：
+        - api_key_window_size: API Key的窗口大小（秒）
+        - api_key_max_requests: API Key的最大请求数
+        - user_window_size: 用户的窗口大小（秒）
+        - user_max_requests: 用户的最大请求数
+        - cleanup_interval: 空闲计数器清理间隔（秒）
+        """
+        super().configure(config)
+        self.default_window_size = config.get("default_window_size", self.default_window_size)
+        self.default_max_requests = config.get("default_max_requests", self.default_max_requests)
+        self._cleanup_interval = config.get("cleanup_interval", self._cleanup_interval)
+
+    def get_memory_stats(self) -> dict[str, Any]:
+        """
+        获取内存使用统计信息
+
+        Returns:
+            内存使用统计
+        """
+        return {
+            "total_counters": len(self.counters),
+            "cleanup_interval": self._cleanup_interval,
+            "last_cleanup_time": self._last_cleanup_time,
+            "backend": "redis" if self._redis_backend else "memory",
+        }
+
+
+def _counter_stats(key: str, counter: WindowCounter, now: float) -> dict[str, Any]:
+    return {
+        "strategy": "sliding_window_counter",
+        "key": key,
+        "window_size": counter.window_size,
+        "max_requests": counter.max_requests,
+        "current_requests": round(counter.estimate(now), 2),
+        "remaining": counter.get_remaining(now),
+        "reset_at": counter.get_reset_time(now).isoformat(),
+    }
+
+
+class RedisSlidingWindowCounterBackend:
+    """使用 Redis 存储双窗口计数，支持多实例共享"""
+
+    _SCRIPT = """
+    local key = KEYS[1]
+    local now = tonumber(ARGV[1])
+    local window = tonumber(ARGV[2])
+    local limit = tonumber(ARGV[3])
+    local amount = tonumber(ARGV[4])
+
+    local index = math.floor(now / window)
+    local data = redis.call('HMGET', key, 'index', 'current', 'previous')
+    local stored = tonumber(data[1])
+    local current = tonumber(data[2]) or 0
+    local previous = tonumber(data[3]) or 0
+
+    if stored == nil or index > stored + 1 then
+        current = 0
+        previous = 0
+    elseif index == stored + 1 then
+        previous = current
+        current = 0
+    elseif index < stored then
+        -- 实例间时钟偏差：沿用已存储的窗口
+        index = stored
+    end
+
+    local elapsed = math.min(1, math.max(0, now / window - index))
+    local estimate = previous * (1 - elapsed) + current
+
+    local allowed = 0
+    if estimate + amount <= limit then
+        current = current + amount
+        allowed = 1
+    end
+
+    redis.call('HMSET', key, 'index', index, 'current', current, 'previous', previous)
+    redis.call('EXPIRE', key, math.ceil(window * 2))
+    return {allowed, index, current, previous}
+    """
+
+    def __init__(self, redis_client: Any) -> None:
+        self.redis = redis_client
+        self._consume_script = self.redis.register_script(self._SCRIPT)
+
+    def _redis_key(self, key: str) -> str:
+        return f"rate_limit:window:{key}"
+
+    async def _load(self, key: str, window_size: int, max_requests: int) -> WindowCounter:
+        data = await self.redis.hmget(self._redis_key(key), "index", "current", "previous")
+        counter = WindowCounter(window_size, max_requests)
+        if data[0] is not None:
+            counter.index = int(data[0])
+            counter.current = int(data[1] or 0)
+            counter.previous = int(data[2] or 0)
+        return counter
+
+    async def peek(
+        self, key: str, window_size: int, max_requests: int, amount: int
+    ) -> RateLimitResult:
+        counter = await self._load(key, window_size, max_requests)
+        return counter.to_result(time.time(), amount)
+
+    async def consume(self, key: str, window_size: int, max_requests: int, amount: int) -> bool:
+        result = await self._consume_script(
+            keys=[self._redis_key(key)],
+            args=[time.time(), window_size, max_requests, amount],
+        )
+        return bool(result[0])
+
+    async def reset(self, key: str) -> Any:
+        await self.redis.delete(self._redis_key(key))
+
+    async def get_stats(self, key: str, window_size: int, max_requests: int) -> dict[str, Any]:
+        counter = await self._load(key, window_size, max_requests)
+        return {**_counter_stats(key, counter, time.time()), "backend": "redis"}
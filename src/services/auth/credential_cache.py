@@ -0,0 +1,363 @@
+"""
+API Key 认证缓存
+
+AuthService.authenticate_api_key 的进程内缓存，命中时只按主键读取一次额度计数，
+不再做按 key_hash 的关联查询。
+
+结构:
+- 按 key_hash 缓存已通过校验的 Key 与所属用户快照（只含列属性的 detached 副本，不可变），
+  返回前通过 merge(load=False) 挂到当前请求的 Session（不发 SQL）
+- 只缓存认证成功的结果；过期时间每次命中重新判断；额度计数（已用/余额/配额）由用量累加
+  高频更新，命中时经 refresh_counters 读取实时值并重新校验余额，下游配额检查也基于实时值；
+  其余校验（启用/锁定/用户状态）以加载时为准，状态变化由下方失效机制负责
+- 条目数受 API_KEY_AUTH_CACHE_MAX_SIZE 限制（LRU），存活时间受 API_KEY_AUTH_CACHE_TTL_SECONDS
+  限制；TTL 同时覆盖 query.update() 等绕过 ORM 事件的批量更新
+
+失效:
+- Session after_flush 监听 ApiKey/User 的非统计列变更与删除（锁定、禁用、删除、配额/余额调整），
+  提交后清理本地条目并通过 CacheSyncService 广播
+- 用量累加后 Key 余额或用户配额耗尽时，由 UsageService 调用 invalidate_exhausted 全集群失效
+- 用户配额周期重置后全量清理
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from src.config.settings import config
+from src.core.logger import logger
+from src.core.metrics import (
+    credential_cache_invalidation_lag_seconds,
+    credential_cache_invalidations_total,
+    credential_cache_requests_total,
+)
+from src.models.database import ApiKey, User
+from src.services.cache.routing_snapshot import detached_copy
+
+# 本实例标识，用于忽略自己发出的广播
+_INSTANCE_ID = uuid.uuid4().hex
+
+# 统计类列：变更不影响认证结果，不触发失效
+_VOLATILE_COLUMNS: dict[type, frozenset[str]] = {
+    ApiKey: frozenset({"total_requests", "total_cost_usd", "last_used_at", "updated_at"}),
+    User: frozenset({"total_usd", "last_login_at", "updated_at"}),
+}
+
+
+@dataclass(frozen=True, slots=True)
+class CachedCredential:
+    """已通过校验的 Key 与用户快照"""
+
+    key: ApiKey
+    user: User
+    # 已规范为 aware datetime；None 表示永不过期
+    expires_at: datetime | None
+    loaded_at: float
+
+    def is_expired(self, now: datetime) -> bool:
+        return self.expires_at is not None and self.expires_at < now
+
+
+class CredentialCache:
+    """线程安全的 key_hash -> CachedCredential 缓存（LRU + TTL）"""
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, CachedCredential] = OrderedDict()
+        self._by_key_id: dict[str, str] = {}
+        self._by_user_id: dict[str, set[str]] = {}
+        self._lock = threading.Lock()
+        # 每次失效递增；加载期间发生过失效时，加载结果不写入缓存
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key_hash: str) -> CachedCredential | None:
+        with self._lock:
+            entry = self._entries.get(key_hash)
+            if entry is not None and time.monotonic() - entry.loaded_at >= self.ttl:
+                self._remove(key_hash)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                result = "miss"
+            else:
+                self._entries.move_to_end(key_hash)
+                self.hits += 1
+                result = "hit"
+        credential_cache_requests_total.labels(result).inc()
+        return entry
+
+    def put(self, key_hash: str, key: ApiKey, user: User, generation: int) -> None:
+        """写入快照；generation 为加载前读取的 self.generation"""
+        expires_at = key.expires_at
+        if expires_at is not None and expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=timezone.utc)
+        entry = CachedCredential(
+            key=detached_copy(key),
+            user=detached_copy(user),
+            expires_at=expires_at,
+            loaded_at=time.monotonic(),
+        )
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._remove(key_hash)
+            self._entries[key_hash] = entry
+            self._by_key_id[key.id] = key_hash
+            self._by_user_id.setdefault(user.id, set()).add(key_hash)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, key_ids: Iterable[str] = (), user_ids: Iterable[str] = ()) -> int:
+        """清理指定 Key/用户的条目，返回清理数量"""
+        removed = 0
+        with self._lock:
+            self.generation += 1
+            for key_id in key_ids:
+                key_hash = self._by_key_id.get(key_id)
+                if key_hash is not None:
+                    removed += self._remove(key_hash)
+            for user_id in user_ids:
+                for key_hash in list(self._by_user_id.get(user_id, ())):
+                    removed += self._remove(key_hash)
+        return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            self.generation += 1
+            removed = len(self._entries)
+            self._entries.clear()
+            self._by_key_id.clear()
+            self._by_user_id.clear()
+        return removed
+
+    def _remove(self, key_hash: str) -> int:
+        entry = self._entries.pop(key_hash, None)
+        if entry is None:
+            return 0
+        key_id, user_id = entry.key.id, entry.user.id
+        if self._by_key_id.get(key_id) == key_hash:
+            del self._by_key_id[key_id]
+        hashes = self._by_user_id.get(user_id)
+        if hashes is not None:
+            hashes.discard(key_hash)
+            if not hashes:
+                del self._by_user_id[user_id]
+        return 1
+
+    def get_stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+credential_cache: CredentialCache | None = (
+    CredentialCache(config.api_key_auth_cache_max_size, config.api_key_auth_cache_ttl_seconds)
+    if config.api_key_auth_cache_enabled and config.api_key_auth_cache_ttl_seconds > 0
+    else None
+)
+
+
+def attach_credential(db: Session, entry: CachedCredential) -> tuple[User, ApiKey]:
+    """将快照挂到请求 Session（Session 中已有同一行时直接复用），返回 (user, key)"""
+    user = _attach(db, entry.user)
+    key = db.identity_map.get(inspect(entry.key).key)
+    if key is None:
+        key = db.merge(entry.key, load=False)
+        set_committed_value(key, "user", user)
+    return user, key
+
+
+def refresh_counters(db: Session, user: User, key: ApiKey) -> bool:
+    """读取实时额度计数覆盖挂载对象上的快照值（不标记为脏）；Key 已不存在时返回 False"""
+    row = (
+        db.query(
+            ApiKey.balance_used_usd,
+            ApiKey.current_balance_usd,
+            User.used_usd,
+            User.quota_usd,
+        )
+        .join(User, ApiKey.user_id == User.id)
+        .filter(ApiKey.id == key.id)
+        .first()
+    )
+    if row is None:
+        return False
+    set_committed_value(key, "balance_used_usd", row.balance_used_usd)
+    set_committed_value(key, "current_balance_usd", row.current_balance_usd)
+    set_committed_value(user, "used_usd", row.used_usd)
+    set_committed_value(user, "quota_usd", row.quota_usd)
+    return True
+
+
+def _attach(db: Session, obj: Any) -> Any:
+    existing = db.identity_map.get(inspect(obj).key)
+    if existing is not None:
+        return existing
+    return db.merge(obj, load=False)
+
+
+# ==================== 失效 ====================
+
+
+_SESSION_DIRTY_KEY = "credential_cache_dirty"
+_pending_broadcasts: set[asyncio.Task] = set()
+
+
+def _has_auth_change(obj: Any) -> bool:
+    state = inspect(obj)
+    volatile = _VOLATILE_COLUMNS[type(obj)]
+    for attr in state.mapper.column_attrs:
+        if attr.key not in volatile and state.attrs[attr.key].history.has_changes():
+            return True
+    return False
+
+
+def _on_after_flush(session: Session, _flush_context: Any) -> None:
+    dirty: tuple[set[str], set[str]] | None = None
+    for objs, check_columns in ((session.deleted, False), (session.dirty, True)):
+        for obj in objs:
+            if isinstance(obj, ApiKey):
+                index = 0
+            elif isinstance(obj, User):
+                index = 1
+            else:
+                continue
+            if check_columns and not _has_auth_change(obj):
+                continue
+            if dirty is None:
+                dirty = session.info.setdefault(_SESSION_DIRTY_KEY, (set(), set()))
+            dirty[index].add(str(obj.id))
+
+
+def _on_after_commit(session: Session) -> None:
+    dirty: tuple[set[str], set[str]] | None = session.info.pop(_SESSION_DIRTY_KEY, None)
+    if dirty:
+        invalidate_credentials(key_ids=dirty[0], user_ids=dirty[1])
+
+
+def _on_after_rollback(session: Session) -> None:
+    session.info.pop(_SESSION_DIRTY_KEY, None)
+
+
+def invalidate_credentials(
+    key_ids: Iterable[str] = (), user_ids: Iterable[str] = (), source: str = "local"
+) -> None:
+    """清理本地条目并广播给其他实例"""
+    key_ids, user_ids = sorted(key_ids), sorted(user_ids)
+    if not key_ids and not user_ids:
+        return
+    if credential_cache is not None:
+        credential_cache.invalidate(key_ids, user_ids)
+    credential_cache_invalidations_total.labels(source).inc()
+    _broadcast(key_ids, user_ids)
+
+
+def invalidate_all_credentials() -> None:
+    """清理所有实例的全部条目（配额周期重置等批量更新后调用）"""
+    if credential_cache is not None:
+        credential_cache.clear()
+    credential_cache_invalidations_total.labels("local").inc()
+    _broadcast(["*"], [])
+
+
+def invalidate_exhausted(
+    users: Iterable[Sequence[Any]] = (), keys: Iterable[Sequence[Any]] = ()
+) -> None:
+    """
+    用量累加后检查额度是否耗尽，耗尽的用户/Key 全集群失效
+
+    Args:
+        users: (user_id, used_usd, quota_usd) 行
+        keys: (api_key_id, balance_used_usd, current_balance_usd) 行
+    """
+    user_ids = [row[0] for row in users if _exhausted(row[1], row[2])]
+    key_ids = [row[0] for row in keys if _exhausted(row[1], row[2])]
+    if user_ids or key_ids:
+        logger.debug(f"[CredentialCache] 额度耗尽失效: users={user_ids}, keys={key_ids}")
+        invalidate_credentials(key_ids=key_ids, user_ids=user_ids, source="exhausted")
+
+
+def _exhausted(used: float | None, limit: float | None) -> bool:
+    return limit is not None and (used or 0) >= limit
+
+
+def _broadcast(key_ids: list[str], user_ids: list[str]) -> None:
+    """通过 CacheSyncService 通知其他实例（无 Redis 或不在事件循环内时跳过，由 TTL 兜底）"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    published_at = time.time()
+
+    async def _publish() -> None:
+        from src.clients.redis_client import get_redis_client_sync
+        from src.services.cache.sync import get_cache_sync_service
+
+        if get_redis_client_sync() is None:
+            return
+        sync = await get_cache_sync_service()
+        if sync is not None:
+            await sync.publish_credential_invalidation(
+                key_ids, user_ids, origin=_INSTANCE_ID, published_at=published_at
+            )
+
+    task = loop.create_task(_publish())
+    _pending_broadcasts.add(task)
+    task.add_done_callback(_pending_broadcasts.discard)
+
+
+async def handle_credential_invalidation(payload: dict[str, Any]) -> None:
+    """CacheSyncService 认证缓存失效消息处理器"""
+    if payload.get("origin") == _INSTANCE_ID:
+        return
+    published_at = payload.get("published_at")
+    if isinstance(published_at, (int, float)):
+        credential_cache_invalidation_lag_seconds.observe(max(0.0, time.time() - published_at))
+    credential_cache_invalidations_total.labels("remote").inc()
+    if credential_cache is None:
+        return
+    key_ids = payload.get("key_ids") or []
+    if "*" in key_ids:
+        credential_cache.clear()
+    else:
+        credential_cache.invalidate(key_ids, payload.get("user_ids") or [])
+
+
+if not event.contains(Session, "after_flush", _on_after_flush):
+    event.listen(Session, "after_flush", _on_after_flush)
+    event.listen(Session, "after_commit", _on_after_commit)
+    event.listen(Session, "after_rollback", _on_after_rollback)
+
+
+__all__ = [
+    "CachedCredential",
+    "CredentialCache",
+    "attach_credential",
+    "credential_cache",
+    "handle_credential_invalidation",
+    "invalidate_all_credentials",
+    "invalidate_credentials",
+    "invalidate_exhausted",
+    "refresh_counters",
+]
@@ -8,9 +8,7 @@ import hashlib
 import secrets
 import time
 import uuid
-from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from threading import Lock
 from typing import TYPE_CHECKING, Any
 
 import jwt
@@ -29,49 +27,13 @@ if TYPE_CHECKING:
     from src.models.database import ManagementToken
 
 from src.models.database import ApiKey, User, UserRole
+from src.services.auth import credential_cache as _credential_cache
 from src.services.auth.jwt_blacklist import JWTBlacklistService
 from src.services.auth.ldap import LDAPService
 from src.services.cache.user_cache import UserCacheService
+from src.services.system.activity_writer import record_activity
 from src.services.user.apikey import ApiKeyService
 
-# API Key last_used_at 更新节流配置
-# 同一个 API Key 在此时间间隔内只会更新一次 last_used_at
-_LAST_USED_UPDATE_INTERVAL = 60  # 秒
-_LAST_USED_CACHE_MAX_SIZE = 10000  # LRU 缓存最大条目数
-
-# 进程内缓存：记录每个 API Key 最后一次更新 last_used_at 的时间
-# 使用 OrderedDict 实现 LRU，避免内存无限增长
-_api_key_last_update_times: OrderedDict[str, float] = OrderedDict()
-_last_update_lock = Lock()
-
-
-def _should_update_last_used(api_key_id: str) -> bool:
-    """判断是否应该更新 API Key 的 last_used_at
-
-    使用节流策略，同一个 Key 在指定间隔内只更新一次。
-    线程安全，使用 LRU 策略限制缓存大小。
-
-    Returns:
-        True 表示应该更新，False 表示跳过
-    """
-    now = time.time()
-
-    with _last_update_lock:
-        last_update = _api_key_last_update_times.get(api_key_id, 0)
-
-        if now - last_update >= _LAST_USED_UPDATE_INTERVAL:
-            _api_key_last_update_times[api_key_id] = now
-            # LRU: 移到末尾（最近使用）
-            _api_key_last_update_times.move_to_end(api_key_id)
-
-            # 超过最大容量时，移除最旧的条目
-            while len(_api_key_last_update_times) > _LAST_USED_CACHE_MAX_SIZE:
-                _api_key_last_update_times.popitem(last=False)
-
-            return True
-        return False
-
-
 # JWT配置从config读取
 if not config.jwt_secret_key:
     # 如果没有配置，生成一个随机密钥并警告
@@ -419,9 +381,34 @@ class AuthService:
 
     @staticmethod
     def authenticate_api_key(db: Session, api_key: str) -> tuple[User, ApiKey] | None:
-        """API密钥认证"""
-        # 对API密钥进行哈希查找，预加载 user 关系以支持后续访问限制检查
+        """API密钥认证
+
+        命中认证缓存时只读取实时额度计数并重新校验余额（见 credential_cache）；
+        未命中时查询并校验，通过后写入缓存。
+        """
         key_hash = ApiKey.hash_key(api_key)
+        cache = _credential_cache.credential_cache
+        generation = 0
+        if cache is not None:
+            entry = cache.get(key_hash)
+            if entry is not None:
+                if entry.is_expired(datetime.now(timezone.utc)):
+                    cache.invalidate(key_ids=[entry.key.id])
+                    logger.warning("API认证失败 - 密钥已过期")
+                    return None
+                user, key_record = _credential_cache.attach_credential(db, entry)
+                if not _credential_cache.refresh_counters(db, user, key_record):
+                    cache.invalidate(key_ids=[entry.key.id])
+                    logger.warning("API认证失败 - 密钥不存在或无效")
+                    return None
+                if not AuthService._check_key_balance(key_record):
+                    cache.invalidate(key_ids=[entry.key.id])
+                    return None
+                record_activity("api_key", key_record.id)
+                return user, key_record
+            generation = cache.generation
+
+        # 对API密钥进行哈希查找，预加载 user 关系以支持后续访问限制检查
         key_record = (
             db.query(ApiKey)
             .options(joinedload(ApiKey.user))
@@ -455,14 +442,7 @@ class AuthService:
                 return None
 
         # 检查余额限制（仅独立Key）
-        is_balance_ok, remaining = ApiKeyService.check_balance(key_record)
-        if not is_balance_ok:
-            # 获取剩余余额用于日志
-            remaining_balance = ApiKeyService.get_remaining_balance(key_record)
-            logger.warning(
-                f"API认证失败 - 余额不足 "
-                f"(已用: ${key_record.balance_used_usd:.4f}, 剩余: ${remaining_balance:.4f})"
-            )
+        if not AuthService._check_key_balance(key_record):
             return None
 
         # 获取用户
@@ -474,15 +454,27 @@ class AuthService:
             logger.warning(f"API认证失败 - 用户已删除: {user.email}")
             return None
 
-        # 更新最后使用时间（使用节流策略，减少数据库写入）
-        if _should_update_last_used(key_record.id):
-            key_record.last_used_at = datetime.now(timezone.utc)
-            db.commit()  # 立即提交事务,释放数据库锁,避免阻塞后续请求
+        if cache is not None and isinstance(key_record, ApiKey) and isinstance(user, User):
+            cache.put(key_hash, key_record, user, generation)
+
+        # 最后使用时间由 ActivityFlusher 合并写入，不在请求内提交
+        record_activity("api_key", key_record.id)
 
         api_key_fp = hashlib.sha256(api_key.encode()).hexdigest()[:12]
         logger.debug("API认证成功: 用户 {} (api_key_fp={})", user.email, api_key_fp)
         return user, key_record
 
+    @staticmethod
+    def _check_key_balance(key_record: ApiKey) -> bool:
+        """检查余额限制（仅独立Key），不足时记录日志并返回 False"""
+        is_balance_ok, remaining_balance = ApiKeyService.check_balance(key_record)
+        if not is_balance_ok:
+            logger.warning(
+                f"API认证失败 - 余额不足 "
+                f"(已用: ${key_record.balance_used_usd:.4f}, 剩余: ${remaining_balance:.4f})"
+            )
+        return is_balance_ok
+
     @staticmethod
     def check_user_quota(user: User, estimated_cost: float = 0) -> bool:
         """检查用户配额"""
@@ -707,18 +699,8 @@ class AuthService:
             logger.warning("Management Token 认证失败 - 用户不存在或已禁用")
             return None
 
-        # 使用 SQL 原子操作更新使用统计
-        from sqlalchemy import func
-
-        db.query(ManagementToken).filter(ManagementToken.id == token_record.id).update(
-            {
-                ManagementToken.last_used_at: func.now(),  # 使用数据库时间确保一致性
-                ManagementToken.last_used_ip: client_ip,
-                ManagementToken.usage_count: ManagementToken.usage_count + 1,
-                ManagementToken.updated_at: func.now(),  # 显式更新，因为原子 SQL 绕过 ORM
-            },
-            synchronize_session=False,
-        )
+        # 使用统计由 ActivityFlusher 合并写入（计数累加、时间与 IP 取最新）
+        record_activity("management_token", token_record.id, count=1, ip=client_ip)
 
         # 记录 Token 使用审计日志
         AuditService.log_event(
@@ -17,6 +17,7 @@ from typing import Any, Literal, Protocol
 
 from sqlalchemy.orm import Session
 
+from src.config.settings import config
 from src.core.logger import logger
 from src.models.database import DimensionCollector
 from src.services.billing.cache import BillingCache
@@ -27,6 +28,7 @@ from src.services.billing.formula_engine import (
     extract_variable_names,
 )
 from src.services.billing.presets import CORE_PRESET_PACK
+from src.services.billing.pricing_snapshot import get_pricing_snapshot_manager
 
 ValueType = Literal["float", "int", "string"]
 
@@ -350,6 +352,17 @@ class DimensionCollectorService:
         if not api or not task:
             return []
 
+        # 价格快照存在时随快照缓存（与计费规则同一版本），否则使用 BillingCache
+        snapshot = (
+            get_pricing_snapshot_manager().snapshot if config.pricing_snapshot_enabled else None
+        )
+        if snapshot is not None:
+            memo = snapshot.collectors.get((api, task))
+            if memo is None:
+                memo = self._list_builtin_collectors(api_format=api_format, task_type=task_type)
+                snapshot.collectors[(api, task)] = memo
+            return memo
+
         # Code-defined collectors cache.
         cache_key = f"code:{api}:{task}"
         cached = BillingCache.get_collectors(cache_key)
@@ -12,12 +12,19 @@ FormulaEngine - 配置驱动的安全计费表达式引擎
 from __future__ import annotations
 
 import ast
+import copy
+import functools
+import operator
+import threading
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Mapping, Sequence
 from dataclasses import dataclass, field
 from decimal import Decimal
 from functools import lru_cache
-from typing import Any, Iterable, Literal
+from typing import Any, Literal
 
 from src.services.billing.precision import DECIMAL_CONTEXT_PRECISION, to_decimal
+from src.utils import json_codec
 
 
 class UnsafeExpressionError(ValueError):
@@ -223,16 +230,9 @@ class SafeExpressionEvaluator:
         - float literals don't leak binary float arithmetic
         - all arithmetic stays within Decimal
         """
-        tree = self.validate(expression)
-        try:
-            with _decimal_context(DECIMAL_CONTEXT_PRECISION):
-                return _eval_decimal(tree.body, variables or {}, self.ALLOWED_FUNCS)
-        except NameError:
-            raise
-        except ExpressionEvaluationError:
-            raise
-        except Exception as exc:
-            raise ExpressionEvaluationError(str(exc)) from exc
+        compiled = compile_expression(expression)
+        with _decimal_context(DECIMAL_CONTEXT_PRECISION):
+            return _run_compiled(compiled, variables or {})
 
     def eval_number(self, expression: str, variables: dict[str, Any]) -> float:
         """Backward-compatible float evaluation (used by DimensionCollector transforms)."""
@@ -260,100 +260,424 @@ class _decimal_context:
         setcontext(self._ctx)
 
 
-def _eval_decimal(node: ast.AST, variables: dict[str, Any], funcs: dict[str, Any]) -> Decimal:
+# ==================== 表达式编译 ====================
+#
+# 校验后的 AST 编译为闭包树，每个节点在编译期确定运算和子节点，求值时不再逐节点
+# isinstance 分派；常量在编译期转换为 Decimal。语义与逐节点解释求值完全一致：
+# - 变量缺失抛 NameError，函数调用异常包装为 ExpressionEvaluationError
+# - 所有运算在 Decimal 上进行，幂运算仅支持整数指数
+#
+# 编译结果需在 Decimal 上下文中调用（见 SafeExpressionEvaluator.eval_decimal）。
+
+CompiledExpression = Callable[[Mapping[str, Any]], Decimal]
+# 列式：(列名 -> 值列表, 行数) -> 每行结果
+CompiledColumnExpression = Callable[[Mapping[str, Sequence[Any]], int], list[Decimal]]
+
+
+def _decimal_pow(left: Decimal, right: Decimal) -> Decimal:
+    # Decimal power is only well-defined for integer exponents here.
+    try:
+        exp_int = int(right)
+        if to_decimal(exp_int) != right:
+            raise ValueError("non-integer exponent")
+    except Exception as exc:
+        raise ExpressionEvaluationError("Pow only supports integer exponents") from exc
+    return left**exp_int
+
+
+_BINOP_FUNCS: dict[type, Callable[[Decimal, Decimal], Decimal]] = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _decimal_pow,
+}
+
+_DECIMAL_FUNCS: dict[str, Callable[..., Decimal]] = {
+    "min": SafeExpressionEvaluator._min,
+    "max": SafeExpressionEvaluator._max,
+    "abs": SafeExpressionEvaluator._abs,
+    "round": SafeExpressionEvaluator._round,
+    "int": SafeExpressionEvaluator._int,
+    "float": SafeExpressionEvaluator._float,
+}
+
+
+def _compile_node(node: ast.AST) -> CompiledExpression:
     if isinstance(node, ast.Constant):
-        return to_decimal(node.value)
+        const = to_decimal(node.value)
+        return lambda env: const
+
     if isinstance(node, ast.Name):
-        if node.id not in variables:
-            raise NameError(node.id)
-        return to_decimal(variables[node.id])
+        name = node.id
+
+        def load(env: Mapping[str, Any]) -> Decimal:
+            try:
+                value = env[name]
+            except KeyError:
+                raise NameError(name) from None
+            return to_decimal(value)
+
+        return load
+
     if isinstance(node, ast.UnaryOp):
-        v = _eval_decimal(node.operand, variables, funcs)
+        operand = _compile_node(node.operand)
         if isinstance(node.op, ast.UAdd):
-            return v
+            return operand
         if isinstance(node.op, ast.USub):
-            return -v
+            return lambda env: -operand(env)
         raise ExpressionEvaluationError(f"Unary operator not allowed: {type(node.op).__name__}")
+
     if isinstance(node, ast.BinOp):
-        left = _eval_decimal(node.left, variables, funcs)
-        right = _eval_decimal(node.right, variables, funcs)
-        if isinstance(node.op, ast.Add):
-            return left + right
-        if isinstance(node.op, ast.Sub):
-            return left - right
-        if isinstance(node.op, ast.Mult):
-            return left * right
-        if isinstance(node.op, ast.Div):
-            return left / right
-        if isinstance(node.op, ast.FloorDiv):
-            return left // right
-        if isinstance(node.op, ast.Mod):
-            return left % right
-        if isinstance(node.op, ast.Pow):
-            # Decimal power is only well-defined for integer exponents here.
+        op = _BINOP_FUNCS.get(type(node.op))
+        if op is None:
+            raise ExpressionEvaluationError(f"Operator not allowed: {type(node.op).__name__}")
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda env: op(left(env), right(env))
+
+    if isinstance(node, ast.Call):
+        func = _call_target(node)
+        args = [_compile_node(a) for a in node.args]
+        kwargs = [(kw.arg, _compile_node(kw.value)) for kw in node.keywords if kw.arg]
+
+        def call(env: Mapping[str, Any]) -> Decimal:
+            arg_values = [f(env) for f in args]
+            kwarg_values = {k: f(env) for k, f in kwargs}
             try:
-                exp_int = int(right)
-                if to_decimal(exp_int) != right:
-                    raise ValueError("non-integer exponent")
+                result = func(*arg_values, **kwarg_values)
             except Exception as exc:
-                raise ExpressionEvaluationError("Pow only supports integer exponents") from exc
-            return left**exp_int
-        raise ExpressionEvaluationError(f"Operator not allowed: {type(node.op).__name__}")
+                raise ExpressionEvaluationError(str(exc)) from exc
+            return to_decimal(result)
+
+        return call
+
+    raise ExpressionEvaluationError(f"AST node not allowed: {type(node).__name__}")
+
+
+def _compile_column_node(node: ast.AST) -> CompiledColumnExpression:
+    """列式编译：每个节点一次处理整列，逐元素运算与 _compile_node 相同"""
+    if isinstance(node, ast.Constant):
+        const = to_decimal(node.value)
+        return lambda cols, n: [const] * n
+
+    if isinstance(node, ast.Name):
+        name = node.id
+
+        def load(cols: Mapping[str, Sequence[Any]], n: int) -> list[Decimal]:
+            try:
+                column = cols[name]
+            except KeyError:
+                raise NameError(name) from None
+            return list(map(to_decimal, column))
+
+        return load
+
+    if isinstance(node, ast.UnaryOp):
+        operand = _compile_column_node(node.operand)
+        if isinstance(node.op, ast.UAdd):
+            return operand
+        if isinstance(node.op, ast.USub):
+            return lambda cols, n: list(map(operator.neg, operand(cols, n)))
+        raise ExpressionEvaluationError(f"Unary operator not allowed: {type(node.op).__name__}")
+
+    if isinstance(node, ast.BinOp):
+        op = _BINOP_FUNCS.get(type(node.op))
+        if op is None:
+            raise ExpressionEvaluationError(f"Operator not allowed: {type(node.op).__name__}")
+        left, right = _compile_column_node(node.left), _compile_column_node(node.right)
+        return lambda cols, n: list(map(op, left(cols, n), right(cols, n)))
+
     if isinstance(node, ast.Call):
-        if not isinstance(node.func, ast.Name):
-            raise ExpressionEvaluationError("Only direct function calls are allowed")
-        func_name = node.func.id
-        func = funcs.get(func_name)
-        if func is None:
-            raise ExpressionEvaluationError(f"Function not allowed: {func_name}")
-        args = [_eval_decimal(a, variables, funcs) for a in node.args]
-        kwargs = {
-            kw.arg: _eval_decimal(kw.value, variables, funcs) for kw in node.keywords if kw.arg
-        }
-        try:
-            result = func(*args, **kwargs)
-        except Exception as exc:
-            raise ExpressionEvaluationError(str(exc)) from exc
-        return to_decimal(result)
+        func = _call_target(node)
+        args = [_compile_column_node(a) for a in node.args]
+        kwargs = [(kw.arg, _compile_column_node(kw.value)) for kw in node.keywords if kw.arg]
+
+        def call(cols: Mapping[str, Sequence[Any]], n: int) -> list[Decimal]:
+            arg_columns = [f(cols, n) for f in args]
+            kwarg_columns = [(k, f(cols, n)) for k, f in kwargs]
+            result: list[Decimal] = []
+            for i in range(n):
+                try:
+                    value = func(
+                        *(column[i] for column in arg_columns),
+                        **{k: column[i] for k, column in kwarg_columns},
+                    )
+                except Exception as exc:
+                    raise ExpressionEvaluationError(str(exc)) from exc
+                result.append(to_decimal(value))
+            return result
+
+        return call
 
     raise ExpressionEvaluationError(f"AST node not allowed: {type(node).__name__}")
 
 
-class FormulaEngine:
-    """计费表达式引擎：解析 dimension_mappings 并进行安全求值。"""
+def _call_target(node: ast.Call) -> Callable[..., Decimal]:
+    if not isinstance(node.func, ast.Name):
+        raise ExpressionEvaluationError("Only direct function calls are allowed")
+    func = _DECIMAL_FUNCS.get(node.func.id)
+    if func is None:
+        raise ExpressionEvaluationError(f"Function not allowed: {node.func.id}")
+    return func
 
-    def __init__(self) -> None:
-        self._evaluator = SafeExpressionEvaluator()
 
-    def evaluate(
+@lru_cache(maxsize=2048)
+def compile_expression(expression: str) -> CompiledExpression:
+    """校验并编译表达式（按表达式文本缓存）；不安全的表达式抛 UnsafeExpressionError"""
+    return _compile_node(_validate_expression_cached(expression).body)
+
+
+@lru_cache(maxsize=512)
+def compile_column_expression(expression: str) -> CompiledColumnExpression:
+    """校验并编译表达式的列式版本（批量求值使用）"""
+    return _compile_column_node(_validate_expression_cached(expression).body)
+
+
+def _run_compiled(fn: Callable[..., Decimal], *args: Any) -> Decimal:
+    """调用编译结果（调用方已进入 Decimal 上下文），异常语义与 eval_decimal 一致"""
+    try:
+        return fn(*args)
+    except (NameError, ExpressionEvaluationError):
+        raise
+    except Exception as exc:
+        raise ExpressionEvaluationError(str(exc)) from exc
+
+
+ComputedStatus = Literal["ok", "pending", "missing_required"]
+MappingResolver = Callable[[Mapping[str, Any]], tuple[Any, bool, "dict[str, Any] | None"]]
+
+
+class CompiledFormula:
+    """
+    一条计费规则（expression + variables + dimension_mappings）的编译结果。
+
+    编译期完成：表达式编译为闭包树；constant 映射的兜底值直接确定；computed 变量
+    分析依赖关系并预先排好求值顺序。evaluate() 与逐次解析的 FormulaEngine 语义一致，
+    evaluate_batch() 对列式维度批量求值（重新计费/回填）。
+
+    computed 变量：
+    - 依赖只指向排在前面的变量（默认规则均如此）时，按原顺序单轮求值
+    - 否则若无 required 变量、无循环依赖，按拓扑序单轮求值；行内维度与被后置依赖的
+      computed 变量同名（原逐轮解析会先读到维度值）时，该行回退逐轮解析
+    - 其余情况（循环依赖等）始终逐轮解析
+    """
+
+    def __init__(
         self,
+        engine: FormulaEngine,
         *,
         expression: str,
         variables: dict[str, Any] | None,
-        dimensions: dict[str, Any] | None,
         dimension_mappings: dict[str, dict[str, Any]] | None,
-        strict_mode: bool = False,
-    ) -> FormulaEvaluationResult:
-        dims = dimensions or {}
-        mappings = dimension_mappings or {}
-        resolved: dict[str, Any] = dict(variables or {})
-
-        missing_required: list[str] = []
-        tier_index: int | None = None
-        tier_info: dict[str, Any] | None = None
+    ) -> None:
+        self._engine = engine
+        self.expression = expression
+        self._variables = dict(variables or {})
 
+        # 1) 非 computed 映射（按原顺序）：(变量名, 解析函数)；constant 兜底为 (变量名, None, 默认值)
+        self._steps: list[tuple[str, MappingResolver | None, Any]] = []
         computed: dict[str, dict[str, Any]] = {}
-
-        # 1) Resolve non-computed mappings first
-        for var_name, mapping in mappings.items():
+        for var_name, mapping in (dimension_mappings or {}).items():
             source = (mapping.get("source") or "constant").lower()
             if source == "computed":
                 computed[var_name] = mapping
+            elif source == "constant":
+                # Explicit constant mapping is fallback-only when variable already exists.
+                if var_name not in self._variables:
+                    self._steps.append((var_name, None, mapping.get("default", 0)))
+            else:
+                self._steps.append((var_name, self._compile_mapping(var_name, mapping), None))
+
+        # 2) computed 映射：variables 已提供的变量不参与解析
+        self._computed: dict[str, tuple[bool, Any, str | None]] = {}
+        for var_name, mapping in computed.items():
+            if var_name in self._variables:
                 continue
-            # Explicit constant mapping is fallback-only when variable already exists.
-            if source == "constant" and var_name in resolved:
+            expr = mapping.get("expression") or mapping.get("transform_expression")
+            self._computed[var_name] = (
+                bool(mapping.get("required", False)),
+                mapping.get("default", 0),
+                str(expr) if expr else None,
+            )
+        self._order, self._shadow_keys = self._plan_computed()
+
+        # 3) 总价表达式：不安全的表达式延迟到求值时按原语义处理
+        self._cost_error: UnsafeExpressionError | None = None
+        try:
+            compile_expression(expression)
+        except UnsafeExpressionError as exc:
+            self._cost_error = exc
+
+    def _compile_mapping(self, var_name: str, mapping: dict[str, Any]) -> MappingResolver:
+        """
+        预编译 dimension/tiered 映射（阶梯上限与单价在编译期转为 Decimal），
+        其余来源或配置异常的映射按原逻辑逐次解析。
+        """
+        source = (mapping.get("source") or "constant").lower()
+        resolver: MappingResolver | None = None
+        if source == "dimension":
+            resolver = self._compile_dimension(var_name, mapping)
+        elif source == "tiered":
+            resolver = self._compile_tiered(mapping)
+        if resolver is None:
+            resolver = functools.partial(self._engine._resolve_mapping, var_name, mapping)
+        return resolver
+
+    @staticmethod
+    def _compile_dimension(var_name: str, mapping: dict[str, Any]) -> MappingResolver:
+        key = mapping.get("key") or var_name
+        allow_zero = bool(mapping.get("allow_zero", False))
+        missing = (
+            (None, True, None)
+            if mapping.get("required", False)
+            else (mapping.get("default", 0), False, None)
+        )
+
+        def resolve(dims: Mapping[str, Any]) -> tuple[Any, bool, dict[str, Any] | None]:
+            raw = dims.get(key)
+            if raw is None:
+                return missing
+            if isinstance(raw, str):
+                if raw == "":
+                    return missing
+                # 尝试将字符串解析为数字，否则按字符串返回（供上层自行决定）
+                try:
+                    num = to_decimal(raw)
+                    if num == 0 and not allow_zero:
+                        return missing
+                    return num, False, None
+                except Exception:
+                    return raw, False, None
+            try:
+                num = to_decimal(raw)
+            except Exception:
+                if isinstance(raw, (int, float, Decimal)):
+                    raise
+                return missing
+            if num == 0 and not allow_zero:
+                return missing
+            return num, False, None
+
+        return resolve
+
+    def _compile_tiered(self, mapping: dict[str, Any]) -> MappingResolver | None:
+        tier_key = mapping.get("tier_key")
+        tiers = mapping.get("tiers") or []
+        if not tier_key or not isinstance(tiers, list):
+            return None
+        default = mapping.get("default", 0)
+        allow_zero = bool(mapping.get("allow_zero", False))
+        missing = (None, True, None) if mapping.get("required", False) else (default, False, None)
+        ttl_key = mapping.get("ttl_key")
+        ttl_value_key = str(mapping.get("ttl_value_key")) if mapping.get("ttl_value_key") else None
+
+        # (tier_index, 上限 | None, 单价, 原始阶梯, cache_ttl_pricing | None)
+        compiled: list[tuple[int, Decimal | None, Decimal, dict[str, Any], list[Any] | None]] = []
+        for idx, tier in enumerate(tiers):
+            if not isinstance(tier, dict):
+                return None
+            try:
+                up_to = tier.get("up_to")
+                bound = None if up_to is None else to_decimal(up_to)
+                value = to_decimal(tier.get("value", default))
+            except Exception:
+                return None
+            ttl_pricing = tier.get("cache_ttl_pricing")
+            compiled.append(
+                (idx, bound, value, tier, ttl_pricing if isinstance(ttl_pricing, list) else None)
+            )
+        resolve_ttl = self._engine._resolve_ttl_pricing
+
+        def resolve(dims: Mapping[str, Any]) -> tuple[Any, bool, dict[str, Any] | None]:
+            raw_tier_value = dims.get(tier_key)
+            if raw_tier_value is None:
+                return missing
+            try:
+                tier_value = to_decimal(raw_tier_value)
+            except Exception:
+                return missing
+            if tier_value == 0 and not allow_zero:
+                return missing
+
+            ttl_minutes: Decimal | None = None
+            if ttl_key and ttl_value_key and dims.get(ttl_key) is not None:
+                try:
+                    ttl_minutes = to_decimal(dims.get(ttl_key))
+                except Exception:
+                    ttl_minutes = None
+
+            for idx, bound, value, tier, ttl_pricing in compiled:
+                try:
+                    if bound is not None and not tier_value <= bound:
+                        continue
+                except Exception:
+                    continue
+                if ttl_minutes is not None and ttl_pricing is not None:
+                    value = resolve_ttl(ttl_pricing, ttl_minutes, ttl_value_key, fallback=value)
+                return value, False, {"tier_index": idx, "tier_info": dict(tier)}
+            if compiled:
+                idx, _bound, value, tier, ttl_pricing = compiled[-1]
+                if ttl_minutes is not None and ttl_pricing is not None:
+                    value = resolve_ttl(ttl_pricing, ttl_minutes, ttl_value_key, fallback=value)
+                return value, False, {"tier_index": idx, "tier_info": dict(tier)}
+            return default, False, None
+
+        return resolve
+
+    def _plan_computed(self) -> tuple[list[str] | None, frozenset[str]]:
+        """返回 (单轮求值顺序，None 表示必须逐轮解析; 需要回退检查的维度名)"""
+        names = list(self._computed)
+        position = {name: i for i, name in enumerate(names)}
+        deps: dict[str, list[str]] = {}
+        for name, (_required, _default, expr) in self._computed.items():
+            try:
+                refs = extract_variable_names(expr) if expr else set()
+            except UnsafeExpressionError:
+                refs = set()
+            deps[name] = [d for d in refs if d in position]
+
+        back_refs = frozenset(
+            d for name in names for d in deps[name] if position[d] >= position[name]
+        )
+        if not back_refs:
+            return names, frozenset()
+        if any(required for required, _default, _expr in self._computed.values()):
+            return None, frozenset()
+
+        # 按原逐轮解析的顺序静态排程：每轮按原顺序取依赖已就绪的变量，
+        # 使 resolved_variables 的写入顺序与逐轮解析一致
+        order: list[str] = []
+        done: set[str] = set()
+        remaining = names
+        while remaining:
+            deferred = []
+            for name in remaining:
+                if done.issuperset(deps[name]):
+                    order.append(name)
+                    done.add(name)
+                else:
+                    deferred.append(name)
+            if len(deferred) == len(remaining):
+                return None, frozenset()  # 循环依赖
+            remaining = deferred
+        return order, back_refs
+
+    # ---------- 单行求值 ----------
+
+    def _resolve_static(
+        self, dims: dict[str, Any]
+    ) -> tuple[dict[str, Any], list[str], int | None, dict[str, Any] | None]:
+        resolved = dict(self._variables)
+        missing_required: list[str] = []
+        tier_index: int | None = None
+        tier_info: dict[str, Any] | None = None
+        for var_name, resolver, default in self._steps:
+            if resolver is None:
+                resolved[var_name] = default
                 continue
-            value, is_missing, tier_meta = self._resolve_mapping(var_name, mapping, dims)
+            value, is_missing, tier_meta = resolver(dims)
             if tier_meta and tier_index is None:
                 tier_index = tier_meta.get("tier_index")
                 tier_info = tier_meta.get("tier_info")
@@ -361,97 +685,282 @@ class FormulaEngine:
                 missing_required.append(var_name)
                 continue
             resolved[var_name] = value
+        return resolved, missing_required, tier_index, tier_info
 
-        # 2) Resolve computed mappings (iterative dependency resolution)
-        if computed:
-            unresolved = dict(computed)
-            for _ in range(max(4, len(unresolved) + 1)):
-                progressed = False
-                for var_name, mapping in list(unresolved.items()):
-                    if var_name in resolved:
-                        unresolved.pop(var_name, None)
-                        continue
-                    value, status = self._try_resolve_computed(var_name, mapping, dims, resolved)
-                    if status == "pending":
-                        continue
-                    unresolved.pop(var_name, None)
-                    if status == "missing_required":
-                        missing_required.append(var_name)
-                        continue
-                    resolved[var_name] = value
-                    progressed = True
-                if not progressed:
-                    break
-
-            # any remaining unresolved computed vars
-            for var_name, mapping in unresolved.items():
-                required = bool(mapping.get("required", False))
-                default = mapping.get("default", 0)
-                if required:
+    def _eval_computed(self, var_name: str, env: dict[str, Any]) -> tuple[Any, ComputedStatus]:
+        required, default, expr = self._computed[var_name]
+        if not expr:
+            return (None, "missing_required") if required else (default, "ok")
+        try:
+            return _run_compiled(compile_expression(expr), env), "ok"
+        except NameError:
+            # dependency not ready yet
+            return (None, "pending") if required else (default, "pending")
+        except Exception:
+            # treat as config error: fallback to default unless required
+            return (None, "missing_required") if required else (default, "ok")
+
+    def _single_pass(self, dims: Mapping[str, Any]) -> bool:
+        return self._order is not None and self._shadow_keys.isdisjoint(dims)
+
+    def _resolve_computed(
+        self, dims: dict[str, Any], resolved: dict[str, Any], missing_required: list[str]
+    ) -> None:
+        if not self._computed:
+            return
+        # Computed vars can reference both resolved variables and raw dims.
+        env = {**dims, **resolved}
+        pending: list[str] = []
+        if self._single_pass(dims):
+            for var_name in self._order or ():
+                value, status = self._eval_computed(var_name, env)
+                if status == "pending":
+                    pending.append(var_name)
+                elif status == "missing_required":
                     missing_required.append(var_name)
                 else:
-                    resolved[var_name] = default
+                    resolved[var_name] = env[var_name] = value
+            if len(pending) > 1:
+                pending.sort(key=list(self._computed).index)
+        else:
+            pending = self._resolve_iterative(env, resolved, missing_required)
+
+        # any remaining unresolved computed vars
+        for var_name in pending:
+            required, default, _expr = self._computed[var_name]
+            if required:
+                missing_required.append(var_name)
+            else:
+                resolved[var_name] = default
+
+    def _resolve_iterative(
+        self, env: dict[str, Any], resolved: dict[str, Any], missing_required: list[str]
+    ) -> list[str]:
+        """逐轮解析（依赖顺序无法静态确定时），返回仍未解析的变量"""
+        unresolved = list(self._computed)
+        for _ in range(max(4, len(unresolved) + 1)):
+            progressed = False
+            remaining: list[str] = []
+            for var_name in unresolved:
+                value, status = self._eval_computed(var_name, env)
+                if status == "pending":
+                    remaining.append(var_name)
+                    continue
+                if status == "missing_required":
+                    missing_required.append(var_name)
+                    continue
+                resolved[var_name] = env[var_name] = value
+                progressed = True
+            unresolved = remaining
+            if not progressed:
+                break
+        return unresolved
 
-        # required 维度缺失：直接标记 incomplete（并由 strict_mode 决定是否抛错）
-        if missing_required:
-            if strict_mode:
-                raise BillingIncompleteError(
-                    f"Missing required dimensions: {missing_required}",
-                    missing_required=missing_required,
+    def evaluate(
+        self, dimensions: dict[str, Any] | None, *, strict_mode: bool = False
+    ) -> FormulaEvaluationResult:
+        dims = dimensions or {}
+        with _decimal_context(DECIMAL_CONTEXT_PRECISION):
+            resolved, missing_required, tier_index, tier_info = self._resolve_static(dims)
+            self._resolve_computed(dims, resolved, missing_required)
+            if missing_required:
+                return self._incomplete_or_raise(
+                    dims, resolved, missing_required, tier_index, tier_info, strict_mode
                 )
-            return FormulaEvaluationResult(
-                status="incomplete",
-                cost=Decimal("0"),
-                resolved_dimensions=dims,
-                resolved_variables=resolved,
-                missing_required=missing_required,
-                tier_index=tier_index,
-                tier_info=tier_info,
-            )
+            try:
+                if self._cost_error is not None:
+                    raise self._cost_error
+                cost = _run_compiled(compile_expression(self.expression), resolved)
+            except Exception as exc:
+                return self._cost_failed(dims, resolved, tier_index, tier_info, exc, strict_mode)
+            return self._finish(dims, resolved, tier_index, tier_info, cost)
+
+    # ---------- 列式批量求值 ----------
 
-        # 3) Evaluate total cost
+    def evaluate_batch(
+        self, columns: Mapping[str, Sequence[Any]], *, strict_mode: bool = False
+    ) -> list[FormulaEvaluationResult]:
+        """
+        对列式维度批量求值：columns 为 维度名 -> 每行取值（各列等长），值为 None 表示该行
+        没有这个维度。结果与逐行 evaluate() 相同。
+
+        映射解析逐行进行；computed 变量和总价表达式对可求值的行整列计算（Decimal 精确运算，
+        每个节点一次处理整列），整列计算失败或缺变量的行回退逐行求值以保留原有错误语义。
+        """
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError("All dimension columns must have the same length")
+        n = lengths.pop() if lengths else 0
+        names = list(columns)
+        rows_dims = [
+            {name: value for name in names if (value := columns[name][i]) is not None}
+            for i in range(n)
+        ]
+
+        with _decimal_context(DECIMAL_CONTEXT_PRECISION):
+            states = [self._resolve_static(dims) for dims in rows_dims]
+
+            # computed：单轮求值的行按变量逐列计算，其余行逐行解析
+            fast = [i for i in range(n) if self._single_pass(rows_dims[i])]
+            fast_set = set(fast)
+            for i in range(n):
+                if i not in fast_set:
+                    self._resolve_computed(rows_dims[i], states[i][0], states[i][1])
+            if fast and self._computed:
+                self._resolve_computed_columns(fast, rows_dims, states)
+
+            # 总价表达式
+            results: list[FormulaEvaluationResult | None] = [None] * n
+            complete: list[int] = []
+            for i, (resolved, missing_required, tier_index, tier_info) in enumerate(states):
+                if missing_required:
+                    results[i] = self._incomplete_or_raise(
+                        rows_dims[i], resolved, missing_required, tier_index, tier_info, strict_mode
+                    )
+                else:
+                    complete.append(i)
+            costs = self._column_costs(complete, states)
+            for i in complete:
+                resolved, _missing, tier_index, tier_info = states[i]
+                cost = costs.get(i)
+                if cost is None:
+                    try:
+                        if self._cost_error is not None:
+                            raise self._cost_error
+                        cost = _run_compiled(compile_expression(self.expression), resolved)
+                    except Exception as exc:
+                        results[i] = self._cost_failed(
+                            rows_dims[i], resolved, tier_index, tier_info, exc, strict_mode
+                        )
+                        continue
+                results[i] = self._finish(rows_dims[i], resolved, tier_index, tier_info, cost)
+        return results  # type: ignore[return-value]
+
+    def _resolve_computed_columns(
+        self,
+        rows: list[int],
+        rows_dims: list[dict[str, Any]],
+        states: list[tuple[dict[str, Any], list[str], int | None, dict[str, Any] | None]],
+    ) -> None:
+        envs = {i: {**rows_dims[i], **states[i][0]} for i in rows}
+        pending: dict[int, list[str]] = {i: [] for i in rows}
+        for var_name in self._order or ():
+            required, default, expr = self._computed[var_name]
+            values = self._column_values(expr, rows, envs) if expr else {}
+            for i in rows:
+                if i in values:
+                    value, status = values[i], "ok"
+                else:
+                    value, status = self._eval_computed(var_name, envs[i])
+                if status == "pending":
+                    pending[i].append(var_name)
+                elif status == "missing_required":
+                    states[i][1].append(var_name)
+                else:
+                    states[i][0][var_name] = envs[i][var_name] = value
+        position = list(self._computed).index
+        for i in rows:
+            for var_name in sorted(pending[i], key=position):
+                required, default, _expr = self._computed[var_name]
+                if required:
+                    states[i][1].append(var_name)
+                else:
+                    states[i][0][var_name] = default
+
+    def _column_costs(
+        self,
+        rows: list[int],
+        states: list[tuple[dict[str, Any], list[str], int | None, dict[str, Any] | None]],
+    ) -> dict[int, Decimal]:
+        if not rows or self._cost_error is not None:
+            return {}
+        return self._column_values(self.expression, rows, {i: states[i][0] for i in rows})
+
+    @staticmethod
+    def _column_values(
+        expression: str, rows: list[int], envs: Mapping[int, Mapping[str, Any]]
+    ) -> dict[int, Decimal]:
+        """对引用的变量齐全的行整列求值；失败时返回空结果，由调用方逐行求值"""
         try:
-            cost = self._evaluator.eval_decimal(expression, resolved)
-            if cost < 0:
-                return FormulaEvaluationResult(
-                    status="incomplete",
-                    cost=Decimal("0"),
-                    resolved_dimensions=dims,
-                    resolved_variables=resolved,
-                    missing_required=[],
-                    tier_index=tier_index,
-                    tier_info=tier_info,
-                    error="negative_cost",
-                )
+            names = extract_variable_names(expression)
+            compiled = compile_column_expression(expression)
+        except Exception:
+            return {}
+        ready = [i for i in rows if all(name in envs[i] for name in names)]
+        if not ready:
+            return {}
+        columns = {name: [envs[i][name] for i in ready] for name in names}
+        try:
+            values = compiled(columns, len(ready))
+        except Exception:
+            return {}
+        return dict(zip(ready, values))
 
-            breakdown = self._extract_cost_breakdown(resolved)
-            return FormulaEvaluationResult(
-                status="complete",
-                cost=cost,
-                resolved_dimensions=dims,
-                resolved_variables=resolved,
-                cost_breakdown=breakdown,
-                tier_index=tier_index,
-                tier_info=tier_info,
-                missing_required=[],
+    # ---------- 结果构造 ----------
+
+    def _incomplete_or_raise(
+        self,
+        dims: dict[str, Any],
+        resolved: dict[str, Any],
+        missing_required: list[str],
+        tier_index: int | None,
+        tier_info: dict[str, Any] | None,
+        strict_mode: bool,
+    ) -> FormulaEvaluationResult:
+        # required 维度缺失：直接标记 incomplete（并由 strict_mode 决定是否抛错）
+        if strict_mode:
+            raise BillingIncompleteError(
+                f"Missing required dimensions: {missing_required}",
+                missing_required=missing_required,
             )
-        except NameError as exc:
+        return FormulaEvaluationResult(
+            status="incomplete",
+            cost=Decimal("0"),
+            resolved_dimensions=dims,
+            resolved_variables=resolved,
+            missing_required=missing_required,
+            tier_index=tier_index,
+            tier_info=tier_info,
+        )
+
+    def _cost_failed(
+        self,
+        dims: dict[str, Any],
+        resolved: dict[str, Any],
+        tier_index: int | None,
+        tier_info: dict[str, Any] | None,
+        exc: Exception,
+        strict_mode: bool,
+    ) -> FormulaEvaluationResult:
+        if isinstance(exc, NameError):
             # expression references missing vars
             if strict_mode:
                 raise ExpressionEvaluationError(f"Missing variable: {exc}") from exc
-            return FormulaEvaluationResult(
-                status="incomplete",
-                cost=Decimal("0"),
-                resolved_dimensions=dims,
-                resolved_variables=resolved,
-                missing_required=[],
-                tier_index=tier_index,
-                tier_info=tier_info,
-                error=f"missing_variable:{exc}",
-            )
-        except (UnsafeExpressionError, ExpressionEvaluationError) as exc:
+            error = f"missing_variable:{exc}"
+        else:
             if strict_mode:
-                raise
+                raise exc
+            error = str(exc)
+        return FormulaEvaluationResult(
+            status="incomplete",
+            cost=Decimal("0"),
+            resolved_dimensions=dims,
+            resolved_variables=resolved,
+            missing_required=[],
+            tier_index=tier_index,
+            tier_info=tier_info,
+            error=error,
+        )
+
+    def _finish(
+        self,
+        dims: dict[str, Any],
+        resolved: dict[str, Any],
+        tier_index: int | None,
+        tier_info: dict[str, Any] | None,
+        cost: Decimal,
+    ) -> FormulaEvaluationResult:
+        if cost < 0:
             return FormulaEvaluationResult(
                 status="incomplete",
                 cost=Decimal("0"),
@@ -460,8 +969,72 @@ class FormulaEngine:
                 missing_required=[],
                 tier_index=tier_index,
                 tier_info=tier_info,
-                error=str(exc),
+                error="negative_cost",
             )
+        return FormulaEvaluationResult(
+            status="complete",
+            cost=cost,
+            resolved_dimensions=dims,
+            resolved_variables=resolved,
+            cost_breakdown=self._engine._extract_cost_breakdown(resolved),
+            tier_index=tier_index,
+            tier_info=tier_info,
+            missing_required=[],
+        )
+
+
+class FormulaEngine:
+    """计费表达式引擎：解析 dimension_mappings 并进行安全求值。"""
+
+    # 编译结果缓存（按规则内容指纹，规则内容变化即为新版本）
+    COMPILED_CACHE_SIZE = 512
+
+    def __init__(self) -> None:
+        self._evaluator = SafeExpressionEvaluator()
+        self._compiled: OrderedDict[bytes, CompiledFormula] = OrderedDict()
+        self._compiled_lock = threading.Lock()
+
+    def compile(
+        self,
+        *,
+        expression: str,
+        variables: dict[str, Any] | None,
+        dimension_mappings: dict[str, dict[str, Any]] | None,
+    ) -> CompiledFormula:
+        """编译一条规则（同内容的规则复用缓存的编译结果）"""
+        key = json_codec.dumpb(
+            [expression, variables or {}, dimension_mappings or {}], sort_keys=True, default=str
+        )
+        with self._compiled_lock:
+            compiled = self._compiled.get(key)
+            if compiled is not None:
+                self._compiled.move_to_end(key)
+                return compiled
+        compiled = CompiledFormula(
+            self,
+            expression=expression,
+            variables=variables,
+            dimension_mappings=copy.deepcopy(dimension_mappings),
+        )
+        with self._compiled_lock:
+            self._compiled[key] = compiled
+            if len(self._compiled) > self.COMPILED_CACHE_SIZE:
+                self._compiled.popitem(last=False)
+        return compiled
+
+    def evaluate(
+        self,
+        *,
+        expression: str,
+        variables: dict[str, Any] | None,
+        dimensions: dict[str, Any] | None,
+        dimension_mappings: dict[str, dict[str, Any]] | None,
+        strict_mode: bool = False,
+    ) -> FormulaEvaluationResult:
+        compiled = self.compile(
+            expression=expression, variables=variables, dimension_mappings=dimension_mappings
+        )
+        return compiled.evaluate(dimensions, strict_mode=strict_mode)
 
     def _extract_cost_breakdown(self, resolved: dict[str, Any]) -> dict[str, Decimal]:
         breakdown: dict[str, Decimal] = {}
@@ -474,41 +1047,6 @@ class FormulaEngine:
                 continue
         return breakdown
 
-    def _try_resolve_computed(
-        self,
-        var_name: str,
-        mapping: dict[str, Any],
-        dims: dict[str, Any],
-        resolved: dict[str, Any],
-    ) -> tuple[Any, Literal["ok", "pending", "missing_required"]]:
-        """
-        Try resolve a computed mapping.
-
-        Returns:
-            (value, status)
-            - ok: value computed
-            - pending: missing dependencies, retry later
-            - missing_required: required=true and cannot resolve
-        """
-        required = bool(mapping.get("required", False))
-        default = mapping.get("default", 0)
-        expr = mapping.get("expression") or mapping.get("transform_expression")
-        if not expr:
-            return (None, "missing_required") if required else (default, "ok")
-        # Computed vars can reference both resolved variables and raw dims.
-        env: dict[str, Any] = {}
-        env.update(dims)
-        env.update(resolved)
-        try:
-            value = self._evaluator.eval_decimal(str(expr), env)
-            return value, "ok"
-        except NameError:
-            # dependency not ready yet
-            return (None, "pending") if required else (default, "pending")
-        except Exception:
-            # treat as config error: fallback to default unless required
-            return (None, "missing_required") if required else (default, "ok")
-
     def _resolve_mapping(
         self,
         var_name: str,
@@ -0,0 +1,385 @@
+"""
+计费价格快照 (Pricing Snapshot)
+
+计费规则、维度采集器、阶梯价格与缓存 TTL 价格的进程内只读快照，稳态下计费查价只做字典查找。
+
+结构:
+- PricingSnapshot 不可变，一次构建（活跃 GlobalModel、活跃 Model、Provider 名称各一次查询），
+  按 (provider_id, 模型名) 预先算好 PricingEntry：阶梯价格及来源、首阶梯输入/输出/缓存价格、
+  按次价格；provider_id=None 的条目为 GlobalModel 默认价格（Provider 未实现该模型时使用）
+- 计费规则按 (provider_id, 模型名, task_type, require_rule)、采集器按 (api_format, task_type)
+  在快照内按需生成并缓存，随快照一起替换
+- 快照中的 ORM 对象是只含列属性的 detached 副本（Model.global_model 指向同一快照内的副本）
+
+版本与失效:
+- 集群版本号保存在 Redis（INCR，单调递增），变更时通过 CacheSyncService 广播；
+  各实例读取时发现快照版本落后即整体重建并替换引用，一次 pub/sub 即收敛
+- Session after_commit 监听 GlobalModel/Model/Provider 的配置变更：本实例立即标记重建，
+  并递增集群版本
+- 无 Redis 时仅本实例失效；PRICING_SNAPSHOT_TTL_SECONDS 兜底覆盖丢失的广播和绕过 ORM 的批量更新
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from src.config.settings import config
+from src.core.logger import logger
+from src.core.metrics import pricing_snapshot_build_seconds, pricing_snapshot_rebuild_total
+from src.models.database import GlobalModel, Model, Provider
+
+# 集群价格版本号（Redis INCR）
+PRICING_VERSION_KEY = "billing:pricing_version"
+
+# 与计费无关的列：变更不触发快照失效
+_IGNORED_COLUMNS: dict[type, frozenset[str]] = {
+    GlobalModel: frozenset({"usage_count", "created_at", "updated_at"}),
+    Model: frozenset({"created_at", "updated_at"}),
+}
+# Provider 只有名称参与查价（ModelCostService 支持按名称传入 Provider）
+_PROVIDER_COLUMNS = frozenset({"name"})
+
+
+def _detached_copy(obj: Any) -> Any:
+    """复制 ORM 对象的列属性为 detached 实例（同 routing_snapshot.detached_copy；
+    计费模块不依赖 src.services.cache 包，避免导入环）"""
+    mapper = inspect(obj).mapper
+    clone = mapper.class_manager.new_instance()
+    for attr in mapper.column_attrs:
+        set_committed_value(clone, attr.key, getattr(obj, attr.key))
+    make_transient_to_detached(clone)
+    return clone
+
+
+@dataclass(frozen=True, slots=True)
+class PricingEntry:
+    """某个 Provider（或 GlobalModel 默认）对一个模型的价格配置"""
+
+    global_model: GlobalModel
+    model: Model | None
+    tiered_pricing: dict | None
+    # 阶梯价格来源：provider / global
+    tiered_source: str | None
+    input_price: float
+    output_price: float
+    cache_creation_price: float | None
+    cache_read_price: float | None
+    price_per_request: float | None
+
+
+def build_pricing_entry(global_model: GlobalModel, model: Model | None) -> PricingEntry:
+    """按 ModelCostService 的取价规则计算价格条目（Model 配置优先，回退 GlobalModel 默认值）"""
+    if model is not None and model.tiered_pricing is not None:
+        tiered, source = model.tiered_pricing, "provider"
+    elif global_model.default_tiered_pricing is not None:
+        tiered, source = global_model.default_tiered_pricing, "global"
+    else:
+        tiered, source = None, None
+
+    first_tier = tiered["tiers"][0] if tiered and tiered.get("tiers") else None
+    input_price = output_price = 0.0
+    cache_creation_price = cache_read_price = None
+    if first_tier is not None:
+        input_price = first_tier.get("input_price_per_1m", 0)
+        output_price = first_tier.get("output_price_per_1m", 0)
+        cache_creation_price = first_tier.get("cache_creation_price_per_1m")
+        cache_read_price = first_tier.get("cache_read_price_per_1m")
+
+    if model is not None and model.price_per_request is not None:
+        price_per_request = model.price_per_request
+    else:
+        price_per_request = global_model.default_price_per_request
+
+    return PricingEntry(
+        global_model=global_model,
+        model=model,
+        tiered_pricing=tiered,
+        tiered_source=source,
+        input_price=0.0 if input_price is None else input_price,
+        output_price=0.0 if output_price is None else output_price,
+        cache_creation_price=cache_creation_price,
+        cache_read_price=cache_read_price,
+        price_per_request=price_per_request,
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class PricingSnapshot:
+    # 集群版本号（无 Redis 时为 0）
+    version: int
+    # 本实例构建序号
+    generation: int
+    built_at: float
+    # (provider_id | None, GlobalModel.name) -> 价格条目
+    entries: dict[tuple[str | None, str], PricingEntry]
+    # Provider.name -> Provider.id
+    provider_ids: dict[str, str]
+    # 按需生成的计费规则 / 采集器，随快照一起替换
+    rules: dict[tuple[str, str, str, bool], Any] = field(
+        default_factory=dict, compare=False, repr=False
+    )
+    collectors: dict[tuple[str, str], list[Any]] = field(
+        default_factory=dict, compare=False, repr=False
+    )
+
+    def entry(self, provider_id: str | None, model_name: str) -> PricingEntry | None:
+        """Provider 实现了该模型时返回其价格，否则返回 GlobalModel 默认价格；模型不存在返回 None"""
+        if provider_id:
+            found = self.entries.get((str(provider_id), model_name))
+            if found is not None:
+                return found
+        return self.entries.get((None, model_name))
+
+
+def build_pricing_snapshot(db: Session, *, version: int, generation: int) -> PricingSnapshot:
+    global_models = {
+        gm.id: _detached_copy(gm)
+        for gm in db.query(GlobalModel).filter(GlobalModel.is_active == True).all()
+    }
+    entries: dict[tuple[str | None, str], PricingEntry] = {
+        (None, gm.name): build_pricing_entry(gm, None) for gm in global_models.values()
+    }
+    for model in db.query(Model).filter(Model.is_active == True).all():
+        gm = global_models.get(model.global_model_id)
+        if gm is None:
+            continue
+        key = (str(model.provider_id), gm.name)
+        if key in entries:
+            continue
+        copy = _detached_copy(model)
+        set_committed_value(copy, "global_model", gm)
+        entries[key] = build_pricing_entry(gm, copy)
+    provider_ids = {name: str(pid) for pid, name in db.query(Provider.id, Provider.name).all()}
+    return PricingSnapshot(
+        version=version,
+        generation=generation,
+        built_at=time.monotonic(),
+        entries=entries,
+        provider_ids=provider_ids,
+    )
+
+
+# ==================== 管理器 ====================
+
+
+class PricingSnapshotManager:
+    """进程内价格快照的持有者
+
+    读取无锁（直接返回当前引用）；需要重建时加锁并二次检查，同一实例同一版本只查询一次数据库。
+    """
+
+    def __init__(self) -> None:
+        self._snapshot: PricingSnapshot | None = None
+        self._generation = 0
+        # 观察到的最高集群版本
+        self._seen_version = 0
+        self._dirty = True
+        self._lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> PricingSnapshot | None:
+        return self._snapshot
+
+    @property
+    def seen_version(self) -> int:
+        return self._seen_version
+
+    def invalidate(self) -> None:
+        self._dirty = True
+
+    def observe_version(self, version: int) -> bool:
+        """记录集群版本；高于当前快照版本时下次读取重建"""
+        if version <= self._seen_version:
+            return False
+        self._seen_version = version
+        return True
+
+    def _stale_reason(self, snapshot: PricingSnapshot | None) -> str | None:
+        if snapshot is None:
+            return "initial"
+        if self._dirty:
+            return "invalidated"
+        if snapshot.version < self._seen_version:
+            return "version"
+        if time.monotonic() - snapshot.built_at >= config.pricing_snapshot_ttl_seconds:
+            return "ttl"
+        return None
+
+    def get(self, db: Session) -> PricingSnapshot:
+        snapshot = self._snapshot
+        if self._stale_reason(snapshot) is None:
+            return snapshot  # type: ignore[return-value]
+        with self._lock:
+            snapshot = self._snapshot
+            reason = self._stale_reason(snapshot)
+            if reason is None:
+                return snapshot  # type: ignore[return-value]
+            return self._rebuild(db, reason)
+
+    def _rebuild(self, db: Session, reason: str) -> PricingSnapshot:
+        start = time.perf_counter()
+        # 先清标记再查询：构建期间的新失效会在下次读取时再次重建
+        self._dirty = False
+        version = self._seen_version
+        try:
+            snapshot = build_pricing_snapshot(db, version=version, generation=self._generation + 1)
+        except Exception:
+            self._dirty = True
+            raise
+        self._generation = snapshot.generation
+        self._snapshot = snapshot
+
+        elapsed = time.perf_counter() - start
+        pricing_snapshot_rebuild_total.labels(reason).inc()
+        pricing_snapshot_build_seconds.observe(elapsed)
+        logger.debug(
+            "[PricingSnapshot] rebuild v{} (#{}, {}): entries={}, {:.1f}ms",
+            snapshot.version,
+            snapshot.generation,
+            reason,
+            len(snapshot.entries),
+            elapsed * 1000,
+        )
+        return snapshot
+
+
+_manager: PricingSnapshotManager | None = None
+
+
+def get_pricing_snapshot_manager() -> PricingSnapshotManager:
+    global _manager
+    if _manager is None:
+        _manager = PricingSnapshotManager()
+    return _manager
+
+
+# ==================== 失效 ====================
+
+
+_SESSION_DIRTY_KEY = "pricing_snapshot_dirty"
+_pending_publishes: set[asyncio.Task] = set()
+
+
+def _has_pricing_change(obj: Any) -> bool:
+    state = inspect(obj)
+    if isinstance(obj, Provider):
+        watched = (state.attrs[key].history for key in _PROVIDER_COLUMNS)
+        return any(history.has_changes() for history in watched)
+    ignored = _IGNORED_COLUMNS.get(type(obj), frozenset())
+    for attr in state.mapper.column_attrs:
+        if attr.key not in ignored and state.attrs[attr.key].history.has_changes():
+            return True
+    return False
+
+
+def _on_after_flush(session: Session, _flush_context: Any) -> None:
+    if session.info.get(_SESSION_DIRTY_KEY):
+        return
+    for objs, check_columns in (
+        (session.new, False),
+        (session.deleted, False),
+        (session.dirty, True),
+    ):
+        for obj in objs:
+            if not isinstance(obj, (GlobalModel, Model, Provider)):
+                continue
+            if check_columns and not _has_pricing_change(obj):
+                continue
+            session.info[_SESSION_DIRTY_KEY] = True
+            return
+
+
+def _on_after_commit(session: Session) -> None:
+    if session.info.pop(_SESSION_DIRTY_KEY, None):
+        notify_pricing_changed()
+
+
+def _on_after_transaction_end(session: Session, transaction: Any) -> None:
+    # 回滚或未提交即关闭：快照可能已在该事务内经 autoflush 读到未提交的价格，仅本地失效
+    if transaction.parent is None and session.info.pop(_SESSION_DIRTY_KEY, None):
+        get_pricing_snapshot_manager().invalidate()
+
+
+def notify_pricing_changed() -> None:
+    """本实例立即失效，并递增集群版本通知其他实例（无 Redis 或不在事件循环内时仅本地失效）"""
+    get_pricing_snapshot_manager().invalidate()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+
+    task = loop.create_task(publish_pricing_version())
+    _pending_publishes.add(task)
+    task.add_done_callback(_pending_publishes.discard)
+
+
+async def publish_pricing_version() -> int | None:
+    """递增 Redis 中的集群版本并广播，返回新版本号"""
+    from src.clients.redis_client import get_redis_client_sync
+    from src.services.cache.sync import get_cache_sync_service
+
+    redis_client = get_redis_client_sync()
+    if redis_client is None:
+        return None
+    try:
+        version = int(await redis_client.incr(PRICING_VERSION_KEY))
+    except Exception as e:
+        logger.warning(f"[PricingSnapshot] 递增价格版本失败: {e}")
+        return None
+    get_pricing_snapshot_manager().observe_version(version)
+    sync = await get_cache_sync_service()
+    if sync is not None:
+        await sync.publish_pricing_version(version)
+    return version
+
+
+async def load_pricing_version(redis_client: Any) -> int:
+    """启动时读取集群版本，使新实例的首个快照带上当前版本号"""
+    try:
+        raw = await redis_client.get(PRICING_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"[PricingSnapshot] 读取价格版本失败: {e}")
+        return 0
+    version = int(raw or 0)
+    get_pricing_snapshot_manager().observe_version(version)
+    return version
+
+
+async def handle_pricing_version(payload: dict[str, Any]) -> None:
+    """CacheSyncService 价格版本消息处理器"""
+    try:
+        version = int(payload.get("version") or 0)
+    except (TypeError, ValueError):
+        return
+    if get_pricing_snapshot_manager().observe_version(version):
+        logger.debug("[PricingSnapshot] 收到价格版本 v{}", version)
+
+
+if not event.contains(Session, "after_flush", _on_after_flush):
+    event.listen(Session, "after_flush", _on_after_flush)
+    event.listen(Session, "after_commit", _on_after_commit)
+    event.listen(Session, "after_transaction_end", _on_after_transaction_end)
+
+
+__all__ = [
+    "PRICING_VERSION_KEY",
+    "PricingEntry",
+    "PricingSnapshot",
+    "PricingSnapshotManager",
+    "build_pricing_entry",
+    "build_pricing_snapshot",
+    "get_pricing_snapshot_manager",
+    "handle_pricing_version",
+    "load_pricing_version",
+    "notify_pricing_changed",
+    "publish_pricing_version",
+]
@@ -19,6 +19,7 @@ from src.config.settings import config
 from src.models.database import GlobalModel, Model
 from src.services.billing.cache import BillingCache
 from src.services.billing.default_rules import DefaultBillingRuleGenerator, VirtualBillingRule
+from src.services.billing.pricing_snapshot import get_pricing_snapshot_manager
 from src.services.billing.rule_templates import CodeBillingRuleTemplateService
 
 TaskType = Literal["chat", "cli", "video", "image", "audio"]
@@ -57,6 +58,11 @@ class BillingRuleService:
     ) -> BillingRuleLookupResult | None:
         effective_task = effective_rule_task_type(task_type)
 
+        if config.pricing_snapshot_enabled:
+            return BillingRuleService._find_rule_in_snapshot(
+                db, provider_id=provider_id, model_name=model_name, effective_task=effective_task
+            )
+
         # Normalize provider_id for cache key to avoid duplicate entries (None vs "").
         pid = provider_id or ""
         # Cache must include runtime knobs that affect fallback behavior.
@@ -92,22 +98,69 @@ class BillingRuleService:
                 .first()
             )
 
+        result = BillingRuleService._resolve_rule(
+            global_model=global_model,
+            model=model_obj,
+            provider_id=provider_id,
+            model_name=model_name,
+            effective_task=effective_task,
+        )
+        if result is not None:
+            BillingCache.set_rule(cache_key, result)
+        return result
+
+    @staticmethod
+    def _find_rule_in_snapshot(
+        db: Session,
+        *,
+        provider_id: str | None,
+        model_name: str,
+        effective_task: str,
+    ) -> BillingRuleLookupResult | None:
+        """从计费价格快照查找（结果随快照缓存，包括未找到的 None）"""
+        snapshot = get_pricing_snapshot_manager().get(db)
+        key = (provider_id or "", model_name, effective_task, config.billing_require_rule)
+        try:
+            return snapshot.rules[key]
+        except KeyError:
+            pass
+
+        entry = snapshot.entry(provider_id, model_name)
+        result = None
+        if entry is not None:
+            result = BillingRuleService._resolve_rule(
+                global_model=entry.global_model,
+                model=entry.model,
+                provider_id=provider_id,
+                model_name=model_name,
+                effective_task=effective_task,
+            )
+        snapshot.rules[key] = result
+        return result
+
+    @staticmethod
+    def _resolve_rule(
+        *,
+        global_model: GlobalModel,
+        model: Model | None,
+        provider_id: str | None,
+        model_name: str,
+        effective_task: str,
+    ) -> BillingRuleLookupResult | None:
         # Code templates (config-file mode)
         code_rule = CodeBillingRuleTemplateService.resolve_rule(
             global_model=global_model,
-            model=model_obj,
+            model=model,
             provider_id=provider_id,
             model_name=model_name,
             task_type=effective_task,
         )
         if code_rule is not None:
-            result = BillingRuleLookupResult(
+            return BillingRuleLookupResult(
                 rule=code_rule,
                 scope="default",
                 effective_task_type=effective_task,
             )
-            BillingCache.set_rule(cache_key, result)
-            return result
 
         # Runtime default rule (backward compatible)
         #
@@ -119,15 +172,13 @@ class BillingRuleService:
         if effective_task == "chat" or not config.billing_require_rule:
             default_rule = DefaultBillingRuleGenerator.generate_for_model(
                 global_model=global_model,
-                model=model_obj,
+                model=model,
                 task_type=effective_task,
             )
-            result = BillingRuleLookupResult(
+            return BillingRuleLookupResult(
                 rule=default_rule,
                 scope="default",
                 effective_task_type=effective_task,
             )
-            BillingCache.set_rule(cache_key, result)
-            return result
 
         return None
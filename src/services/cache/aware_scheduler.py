@@ -38,10 +38,11 @@ import time
 from collections import defaultdict
 from collections.abc import Sequence
 from dataclasses import dataclass
-from typing import TYPE_CHECKING, Any
+from typing import TYPE_CHECKING, Any, TypeVar
 
 from sqlalchemy.orm import Session, selectinload
 
+from src.config.settings import config
 from src.core.api_format.conversion.compatibility import is_format_compatible
 from src.core.api_format.enums import ApiFamily, EndpointKind
 from src.core.api_format.signature import make_signature_key, parse_signature_key
@@ -70,6 +71,13 @@ from src.services.cache.affinity_manager import (
     get_affinity_manager,
 )
 from src.services.cache.model_cache import ModelCacheService
+from src.services.cache.routing_snapshot import (
+    RoutingGlobalModel,
+    RoutingSnapshot,
+    attach_to_session,
+    get_routing_snapshot_manager,
+    provider_priority,
+)
 from src.services.health.monitor import health_monitor
 from src.services.provider.format import normalize_endpoint_signature
 from src.services.rate_limit.adaptive_reservation import (
@@ -168,6 +176,22 @@ def _sort_endpoints_by_family_priority(
     return sorted(eps, key=sort_key)
 
 
+_T = TypeVar("_T")
+
+
+def _page_providers(providers: Sequence[_T], offset: int, limit: int | None) -> Sequence[_T]:
+    """Provider 分页（快照与数据库回退路径共用）
+
+    两条路径都对"实现了该 GlobalModel、且通过访问限制的活跃 Provider"按
+    (优先级, id) 排序后的同一列表分页，分批获取途中切换路径也不会跳过或重复 Provider。
+    """
+    if offset:
+        providers = providers[offset:]
+    if limit:
+        providers = providers[:limit]
+    return providers
+
+
 class CacheAwareScheduler:
     """
     缓存感知调度器
@@ -657,25 +681,42 @@ class CacheAwareScheduler:
             logger.warning("GlobalModel not found: <empty model name>")
             raise ModelNotSupportedException(model=model_name)
 
-        global_model = await ModelCacheService.get_global_model_by_name(db, normalized_name)
-        if not global_model or not global_model.is_active:
-            logger.warning(f"GlobalModel not found or inactive: {normalized_name}")
-            raise ModelNotSupportedException(model=model_name)
+        # 路由快照：稳态下直接从进程内只读路由表解析模型与 Provider，不访问数据库
+        snapshot: RoutingSnapshot | None = None
+        routing_model: RoutingGlobalModel | None = None
+        if config.routing_snapshot_enabled:
+            snapshot = get_routing_snapshot_manager().get(db)
+            routing_model = snapshot.global_models.get(normalized_name)
+            if routing_model is None:
+                snapshot = None
+
+        if routing_model is not None:
+            global_model_id: str = routing_model.id
+            model_mappings: list[str] = list(routing_model.model_mappings)
+        else:
+            global_model = await ModelCacheService.get_global_model_by_name(db, normalized_name)
+            if not global_model or not global_model.is_active:
+                logger.warning(f"GlobalModel not found or inactive: {normalized_name}")
+                raise ModelNotSupportedException(model=model_name)
+            if config.routing_snapshot_enabled:
+                # 快照中缺少该模型（新建的 GlobalModel 尚未进入快照），下次读取时全量重建
+                get_routing_snapshot_manager().invalidate_all()
 
-        logger.debug(
-            "[Scheduler] GlobalModel resolved: id={}, name={}",
-            global_model.id,
-            global_model.name,
-        )
+            # 使用 GlobalModel.id 作为缓存亲和性的模型标识，确保映射名和规范名都能命中同一个缓存
+            global_model_id = str(global_model.id)
 
-        # 使用 GlobalModel.id 作为缓存亲和性的模型标识，确保映射名和规范名都能命中同一个缓存
-        global_model_id: str = str(global_model.id)
+            # 提取模型映射（用于 Provider Key 的 allowed_models 匹配）
+            model_mappings = (global_model.config or {}).get("model_mappings", [])
 
-        # 提取模型映射（用于 Provider Key 的 allowed_models 匹配）
-        model_mappings: list[str] = (global_model.config or {}).get("model_mappings", [])
+        logger.debug(
+            "[Scheduler] GlobalModel resolved: id={}, name={}, snapshot={}",
+            global_model_id,
+            normalized_name,
+            snapshot.version if snapshot else None,
+        )
         if model_mappings:
             logger.debug(
-                f"[Scheduler] GlobalModel={global_model.name} 配置了映射规则: {model_mappings}"
+                f"[Scheduler] GlobalModel={normalized_name} 配置了映射规则: {model_mappings}"
             )
 
         # 获取合并后的访问限制（ApiKey + User）
@@ -705,12 +746,30 @@ class CacheAwareScheduler:
             )
             return [], global_model_id
 
-        # 1. 查询 Providers
-        providers = self._query_providers(
-            db=db,
-            provider_offset=provider_offset,
-            provider_limit=provider_limit,
-        )
+        if snapshot is not None and routing_model is not None:
+            candidates = await self._build_candidates_from_snapshot(
+                db=db,
+                snapshot=snapshot,
+                routing_model=routing_model,
+                client_format=target_format,
+                model_name=model_name,
+                model_mappings=model_mappings,
+                affinity_key=affinity_key,
+                allowed_providers=allowed_providers,
+                provider_offset=provider_offset,
+                provider_limit=provider_limit,
+                max_candidates=max_candidates,
+                is_stream=is_stream,
+                capability_requirements=capability_requirements,
+            )
+            candidates = await self._order_candidates(
+                candidates, db, affinity_key, target_format, model_name, global_model_id
+            )
+            # 快照对象是 detached 副本，返回前挂到请求 Session（下游会修改并 flush Key）
+            return self._attach_candidates(db, candidates), global_model_id
+
+        # 1. 查询 Providers（全部活跃 Provider，过滤后再分页，与快照路径口径一致）
+        providers = self._query_providers(db=db)
 
         # Provider query starts a transaction; release connection before entering async candidate build.
         self._release_db_connection_before_await(db)
@@ -729,8 +788,14 @@ class CacheAwareScheduler:
                 len(p.models) if p.models else 0,
             )
 
-        if not providers:
-            return [], global_model_id
+        # 1.4 只保留实现了该 GlobalModel 的 Provider（与路由快照的 providers_for_model 相同）
+        providers = [
+            p
+            for p in providers
+            if any(
+                m.is_active and str(m.global_model_id) == global_model_id for m in p.models or []
+            )
+        ]
 
         # 1.5 根据 allowed_providers 过滤（合并 ApiKey 和 User 的限制）
         if allowed_providers is not None:
@@ -742,6 +807,8 @@ class CacheAwareScheduler:
             if original_count != len(providers):
                 logger.debug(f"用户/API Key 过滤 Provider: {original_count} -> {len(providers)}")
 
+        providers.sort(key=lambda p: (provider_priority(p), str(p.id)))
+        providers = list(_page_providers(providers, provider_offset, provider_limit))
         if not providers:
             return [], global_model_id
 
@@ -763,6 +830,21 @@ class CacheAwareScheduler:
             global_conversion_enabled=global_conversion_enabled,
         )
 
+        candidates = await self._order_candidates(
+            candidates, db, affinity_key, target_format, model_name, global_model_id
+        )
+        return candidates, global_model_id
+
+    async def _order_candidates(
+        self,
+        candidates: list[ProviderCandidate],
+        db: Session,
+        affinity_key: str | None,
+        target_format: str,
+        model_name: str,
+        global_model_id: str,
+    ) -> list[ProviderCandidate]:
+        """按优先级模式与调度模式对候选排序，并更新指标"""
         # 3. 应用优先级模式排序
         candidates = self._apply_priority_mode_sort(candidates, db, affinity_key, target_format)
 
@@ -796,21 +878,16 @@ class CacheAwareScheduler:
             for candidate in candidates:
                 candidate.is_cached = False
 
-        return candidates, global_model_id
+        return candidates
 
-    def _query_providers(
-        self,
-        db: Session,
-        provider_offset: int = 0,
-        provider_limit: int | None = None,
-    ) -> list[Provider]:
+    def _query_providers(self, db: Session) -> list[Provider]:
         """
         查询活跃的 Providers（带预加载）
 
+        分页由调用方在按模型与访问限制过滤后统一进行（见 _page_providers）。
+
         Args:
             db: 数据库会话
-            provider_offset: 分页偏移
-            provider_limit: 分页限制
 
         Returns:
             Provider 列表
@@ -829,11 +906,6 @@ class CacheAwareScheduler:
             .order_by(Provider.provider_priority.asc())
         )
 
-        if provider_offset:
-            provider_query = provider_query.offset(provider_offset)
-        if provider_limit:
-            provider_query = provider_query.limit(provider_limit)
-
         return provider_query.all()
 
     async def _check_model_support(
@@ -1309,6 +1381,128 @@ class CacheAwareScheduler:
 
         return candidates
 
+    async def _build_candidates_from_snapshot(
+        self,
+        db: Session,
+        snapshot: RoutingSnapshot,
+        routing_model: RoutingGlobalModel,
+        client_format: str,
+        model_name: str,
+        affinity_key: str | None,
+        model_mappings: list[str] | None = None,
+        allowed_providers: set[str] | None = None,
+        provider_offset: int = 0,
+        provider_limit: int | None = None,
+        max_candidates: int | None = None,
+        is_stream: bool = False,
+        capability_requirements: dict[str, bool] | None = None,
+    ) -> list[ProviderCandidate]:
+        """
+        基于路由快照构建候选列表（语义与 _build_candidates 一致）
+
+        快照只包含实现了该 GlobalModel 的活跃 Provider，端点分组排序、Key 的 api_formats
+        过滤、模型名映射均已预计算；这里只做与请求相关的检查（流式、能力、Key 健康度）。
+        分页口径与数据库回退路径一致，见 _page_providers。
+        """
+        global_model_id = routing_model.id
+        # 模型能力检查（GlobalModel 级别，空集合表示未配置能力限制）
+        if capability_requirements and routing_model.supported_capabilities:
+            for cap_name, is_required in capability_requirements.items():
+                if is_required and cap_name not in routing_model.supported_capabilities:
+                    logger.debug(f"模型 {model_name} 不支持能力: {cap_name}")
+                    return []
+
+        providers = snapshot.providers_for_model(global_model_id)
+        if allowed_providers is not None:
+            # 同时支持 provider id 和 name 匹配
+            providers = tuple(
+                rp for rp in providers if rp.id in allowed_providers or rp.name in allowed_providers
+            )
+        providers = _page_providers(providers, provider_offset, provider_limit)
+        if not providers:
+            return []
+
+        # 格式转换总开关（数据库配置，进程内缓存）
+        global_conversion_enabled = SystemConfigService.is_format_conversion_enabled(db)
+
+        client_format_str = normalize_endpoint_signature(client_format)
+        client_sig = parse_signature_key(client_format_str)
+        client_family, client_kind = client_sig.api_family.value, client_sig.endpoint_kind.value
+
+        candidates: list[ProviderCandidate] = []
+        for rp in providers:
+            model = rp.models[global_model_id]
+            if is_stream and not model.supports_streaming:
+                logger.debug(f"Provider {rp.name} 模型 {model_name} 不支持流式")
+                continue
+
+            skip_endpoint_check = global_conversion_enabled or rp.allows_conversion
+            exact_candidates: list[ProviderCandidate] = []
+            convertible_candidates: list[ProviderCandidate] = []
+
+            for rep in rp.ordered_endpoints(client_family, client_kind):
+                if not rep.keys:
+                    continue
+                is_compatible, needs_conversion = rep.compatibility(
+                    client_format_str, is_stream, global_conversion_enabled, skip_endpoint_check
+                )
+                if not is_compatible:
+                    continue
+
+                provider_model_names = set(model.model_names_by_signature[rep.signature])
+                keys = self._shuffle_keys_by_internal_priority(
+                    list(rep.keys), affinity_key, rep.keys_rotate
+                )
+                for key in keys:
+                    is_available, key_skip_reason, mapping_matched_model = (
+                        self._check_key_availability(
+                            key,
+                            rep.signature,
+                            model_name,
+                            capability_requirements,
+                            model_mappings=model_mappings,
+                            candidate_models=provider_model_names,
+                        )
+                    )
+                    candidate = ProviderCandidate(
+                        provider=rp.provider,
+                        endpoint=rep.endpoint,
+                        key=key,
+                        is_skipped=not is_available,
+                        skip_reason=key_skip_reason,
+                        mapping_matched_model=mapping_matched_model,
+                        needs_conversion=needs_conversion,
+                        provider_api_format=rep.signature,
+                    )
+                    if needs_conversion:
+                        convertible_candidates.append(candidate)
+                    else:
+                        exact_candidates.append(candidate)
+
+            candidates.extend(exact_candidates)
+            candidates.extend(convertible_candidates)
+
+        if max_candidates and len(candidates) > max_candidates:
+            candidates = candidates[:max_candidates]
+
+        return candidates
+
+    @staticmethod
+    def _attach_candidates(
+        db: Session, candidates: list[ProviderCandidate]
+    ) -> list[ProviderCandidate]:
+        """
+        将快照中的 Provider/Endpoint/Key 副本挂到请求 Session
+
+        下游会修改并 flush 候选 Key（RPM 学习、健康度等），必须是 Session 中的持久化对象。
+        """
+        attached: dict[int, Any] = {}
+        for candidate in candidates:
+            candidate.provider = attach_to_session(db, candidate.provider, attached)
+            candidate.endpoint = attach_to_session(db, candidate.endpoint, attached)
+            candidate.key = attach_to_session(db, candidate.key, attached)
+        return candidates
+
     async def _apply_cache_affinity(
         self,
         candidates: list[ProviderCandidate],
@@ -2,7 +2,7 @@
 缓存后端抽象层
 
 提供统一的缓存接口，支持多种后端实现：
-1. LocalCache: 内存缓存（单实例，线程安全）
+1. LocalCache: 内存缓存（单实例，分片 W-TinyLFU + 时间轮 TTL）
 2. RedisCache: Redis 缓存（分布式）
 
 使用场景：
@@ -12,148 +12,16 @@
 
 from __future__ import annotations
 
-import asyncio
-import json
 import time
-from abc import ABC, abstractmethod
-from collections import OrderedDict
 from typing import Any
 
 import redis.asyncio as aioredis
 
 from src.clients.redis_client import get_redis_client_sync
 from src.core.logger import logger
-
-
-class BaseCacheBackend(ABC):
-    """缓存后端抽象基类"""
-
-    @abstractmethod
-    async def get(self, key: str) -> Any | None:
-        """获取缓存值"""
-        pass
-
-    @abstractmethod
-    async def set(self, key: str, value: Any, ttl: int = 300) -> None:
-        """设置缓存值"""
-        pass
-
-    @abstractmethod
-    async def delete(self, key: str) -> None:
-        """删除缓存值"""
-        pass
-
-    @abstractmethod
-    async def clear(self, pattern: str | None = None) -> None:
-        """清空缓存（支持模式匹配）"""
-        pass
-
-    @abstractmethod
-    async def exists(self, key: str) -> bool:
-        """检查键是否存在"""
-        pass
-
-
-class LocalCache(BaseCacheBackend):
-    """本地内存缓存后端（LRU + TTL，线程安全）"""
-
-    def __init__(self, max_size: int = 1000, default_ttl: int = 300):
-        """
-        初始化本地缓存
-
-        Args:
-            max_size: 最大缓存条目数
-            default_ttl: 默认过期时间（秒）
-        """
-        self._cache: OrderedDict = OrderedDict()
-        self._expiry: dict[str, float] = {}
-        self._max_size = max_size
-        self._default_ttl = default_ttl
-        self._lock = asyncio.Lock()
-
-    async def get(self, key: str) -> Any | None:
-        """获取缓存值（线程安全）"""
-        async with self._lock:
-            if key not in self._cache:
-                return None
-
-            # 检查过期
-            if key in self._expiry and time.time() > self._expiry[key]:
-                # 过期，删除
-                del self._cache[key]
-                del self._expiry[key]
-                return None
-
-            # 更新访问顺序（LRU）
-            self._cache.move_to_end(key)
-            return self._cache[key]
-
-    async def set(self, key: str, value: Any, ttl: int | None = None) -> None:
-        """设置缓存值（线程安全）"""
-        async with self._lock:
-            if ttl is None:
-                ttl = self._default_ttl
-
-            # 如果键已存在，更新访问顺序
-            if key in self._cache:
-                self._cache.move_to_end(key)
-
-            self._cache[key] = value
-            self._expiry[key] = time.time() + ttl
-
-            # 检查容量限制，淘汰最旧项
-            if len(self._cache) > self._max_size:
-                oldest_key = next(iter(self._cache))
-                del self._cache[oldest_key]
-                if oldest_key in self._expiry:
-                    del self._expiry[oldest_key]
-
-    async def delete(self, key: str) -> None:
-        """删除缓存值（线程安全）"""
-        async with self._lock:
-            if key in self._cache:
-                del self._cache[key]
-            if key in self._expiry:
-                del self._expiry[key]
-
-    async def clear(self, pattern: str | None = None) -> None:
-        """清空缓存（线程安全）"""
-        async with self._lock:
-            if pattern is None:
-                # 清空所有
-                self._cache.clear()
-                self._expiry.clear()
-            else:
-                # 模式匹配删除（简单实现：支持前缀匹配）
-                prefix = pattern.rstrip("*")
-                keys_to_delete = [k for k in self._cache.keys() if k.startswith(prefix)]
-                for key in keys_to_delete:
-                    del self._cache[key]
-                    if key in self._expiry:
-                        del self._expiry[key]
-
-    async def exists(self, key: str) -> bool:
-        """检查键是否存在（线程安全）"""
-        async with self._lock:
-            if key not in self._cache:
-                return False
-
-            # 检查过期
-            if key in self._expiry and time.time() > self._expiry[key]:
-                del self._cache[key]
-                del self._expiry[key]
-                return False
-
-            return True
-
-    def get_stats(self) -> dict[str, Any]:
-        """获取缓存统计信息"""
-        return {
-            "backend": "local",
-            "size": len(self._cache),
-            "max_size": self._max_size,
-            "default_ttl": self._default_ttl,
-        }
+from src.services.cache.base import BaseCacheBackend
+from src.services.cache.local import LocalCache
+from src.utils import json_codec
 
 
 class RedisCache(BaseCacheBackend):
@@ -188,8 +56,8 @@ class RedisCache(BaseCacheBackend):
 
             # 尝试 JSON 反序列化
             try:
-                return json.loads(value)
-            except (json.JSONDecodeError, TypeError):
+                return json_codec.loads(value)
+            except (json_codec.JSONDecodeError, TypeError):
                 # 如果不是 JSON，直接返回字符串
                 return value
         except Exception as e:
@@ -206,9 +74,9 @@ class RedisCache(BaseCacheBackend):
 
             # 序列化值
             if isinstance(value, (dict, list, tuple)):
-                serialized = json.dumps(value)
+                serialized = json_codec.dumpb(value)
             elif isinstance(value, (int, float, bool)):
-                serialized = json.dumps(value)
+                serialized = json_codec.dumpb(value)
             else:
                 serialized = str(value)
 
@@ -259,7 +127,7 @@ class RedisCache(BaseCacheBackend):
     async def publish_invalidation(self, channel: str, key: str) -> None:
         """发布缓存失效消息（用于分布式同步）"""
         try:
-            message = json.dumps({"key": key, "timestamp": time.time()})
+            message = json_codec.dumps({"key": key, "timestamp": time.time()})
             await self._redis.publish(channel, message)
             logger.debug(f"[RedisCache] 发布缓存失效: {channel} -> {key}")
         except Exception as e:
@@ -279,7 +147,11 @@ _cache_backends: dict[str, BaseCacheBackend] = {}
 
 
 async def get_cache_backend(
-    name: str, backend_type: str = "auto", max_size: int = 1000, ttl: int = 300
+    name: str,
+    backend_type: str = "auto",
+    max_size: int = 1000,
+    ttl: int = 300,
+    max_bytes: int | None = None,
 ) -> BaseCacheBackend:
     """
     获取缓存后端实例
@@ -289,6 +161,7 @@ async def get_cache_backend(
         backend_type: 后端类型 (auto/local/redis)
         max_size: LocalCache 的最大容量
         ttl: 默认过期时间（秒）
+        max_bytes: LocalCache 的估算字节数上限（None 表示只按条目数限制）
 
     Returns:
         BaseCacheBackend 实例
@@ -305,14 +178,14 @@ async def get_cache_backend(
 
         if redis_client is None:
             logger.warning(f"[CacheBackend] Redis 未初始化，{name} 降级为本地缓存")
-            backend = LocalCache(max_size=max_size, default_ttl=ttl)
+            backend = LocalCache(max_size=max_size, default_ttl=ttl, max_bytes=max_bytes)
         else:
             backend = RedisCache(redis_client=redis_client, key_prefix=name, default_ttl=ttl)
             logger.info(f"[CacheBackend] {name} 使用 Redis 缓存")
 
     elif backend_type == "local":
         # 强制使用本地缓存
-        backend = LocalCache(max_size=max_size, default_ttl=ttl)
+        backend = LocalCache(max_size=max_size, default_ttl=ttl, max_bytes=max_bytes)
         logger.info(f"[CacheBackend] {name} 使用本地缓存")
 
     else:  # auto
@@ -323,7 +196,7 @@ async def get_cache_backend(
             backend = RedisCache(redis_client=redis_client, key_prefix=name, default_ttl=ttl)
             logger.debug(f"[CacheBackend] {name} 自动选择 Redis 缓存")
         else:
-            backend = LocalCache(max_size=max_size, default_ttl=ttl)
+            backend = LocalCache(max_size=max_size, default_ttl=ttl, max_bytes=max_bytes)
             logger.debug(f"[CacheBackend] {name} 自动选择本地缓存（Redis 不可用）")
 
     _cache_backends[cache_key] = backend
@@ -9,6 +9,7 @@ from __future__ import annotations
 from typing import Any
 
 from src.core.logger import logger
+from src.services.cache.routing_snapshot import get_routing_snapshot_manager
 
 
 class CacheInvalidationService:
@@ -53,7 +54,11 @@ class CacheInvalidationService:
         except Exception as e:
             logger.error(f"[CacheInvalidation] 失效 ModelCacheService 缓存失败: {e}")
 
-        # 4. 清除 /v1/models 列表缓存
+        # 4. 路由快照全量重建，计费价格快照重建
+        get_routing_snapshot_manager().invalidate_all()
+        _invalidate_pricing_snapshot()
+
+        # 5. 清除 /v1/models 列表缓存
         from src.api.base.models_service import invalidate_models_list_cache
 
         try:
@@ -64,6 +69,7 @@ class CacheInvalidationService:
     def on_model_changed(self, provider_id: str, global_model_id: str) -> Any:
         """Model 变更时的缓存失效"""
         self._refresh_provider_cache(provider_id)
+        _invalidate_pricing_snapshot()
 
     async def on_key_allowed_models_changed(self, provider_id: str) -> None:
         """
@@ -87,14 +93,23 @@ class CacheInvalidationService:
             logger.error(f"[CacheInvalidation] 失效 models list 缓存失败: {e}")
 
     def _refresh_provider_cache(self, provider_id: str) -> None:
-        """刷新指定 Provider 的 ModelMapper 缓存"""
+        """刷新指定 Provider 的 ModelMapper 缓存与路由快照"""
         for mapper in self._model_mappers:
             mapper.refresh_cache(provider_id)
+        get_routing_snapshot_manager().invalidate_provider(provider_id)
 
     def clear_all_caches(self) -> None:
         """清空所有缓存"""
         for mapper in self._model_mappers:
             mapper.clear_cache()
+        get_routing_snapshot_manager().invalidate_all()
+        _invalidate_pricing_snapshot()
+
+
+def _invalidate_pricing_snapshot() -> None:
+    from src.services.billing.pricing_snapshot import get_pricing_snapshot_manager
+
+    get_pricing_snapshot_manager().invalidate()
 
 
 # 全局单例
@@ -0,0 +1,504 @@
+"""
+内存缓存后端 LocalCache（单实例，分片 W-TinyLFU + 时间轮 TTL）
+
+只依赖标准库：TieredCache 的 L1 等在模块导入阶段就需要 LocalCache 的地方从这里导入，
+避免经 backend -> src.clients 形成导入环。
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Any
+
+from src.services.cache.base import BaseCacheBackend
+
+# ==================== LocalCache 内部结构 ====================
+#
+# 读写路径不加锁：get/set/delete 内部没有 await，在单个事件循环中天然串行。
+#
+# 分层时间轮（毫秒刻度）：各层跨度约 1s / 65s / 70min / 37h / 6.2d，
+# 条目按剩余时长落入对应层的桶，时钟推进时只处理到期的桶并向下级联。
+_WHEEL_SHIFTS = (10, 16, 22, 27, 29)
+_WHEEL_BUCKETS = (64, 64, 32, 4, 1)
+_WHEEL_TICK_SHIFT = _WHEEL_SHIFTS[0]
+
+# Count-Min Sketch 的哈希混合常数（64 位奇数乘法哈希）
+_SKETCH_SEED = 0x9E3779B97F4A7C15
+_MASK64 = (1 << 64) - 1
+_HALVE = bytes(i >> 1 for i in range(256))
+
+# 每个分片至少承载的条目数（容量较小时不分片）
+_MIN_SHARD_ENTRIES = 256
+_MAX_SHARDS = 16
+
+# 估算容器大小时的最大递归深度与采样元素数
+_SIZEOF_MAX_DEPTH = 4
+_SIZEOF_SAMPLE = 256
+
+
+def _estimate_size(value: Any, depth: int = 0) -> int:
+    """粗略估算值占用的字节数（容器递归至有限深度，超大容器按采样外推）"""
+    size = sys.getsizeof(value)
+    if depth >= _SIZEOF_MAX_DEPTH or isinstance(value, (str, bytes, bytearray, int, float)):
+        return size
+    if isinstance(value, dict):
+        items: Any = value.items()
+        count = len(value)
+        sampled = 0
+        for k, v in items:
+            size += _estimate_size(k, depth + 1) + _estimate_size(v, depth + 1)
+            sampled += 1
+            if sampled >= _SIZEOF_SAMPLE:
+                break
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        count = len(value)
+        sampled = 0
+        for item in value:
+            size += _estimate_size(item, depth + 1)
+            sampled += 1
+            if sampled >= _SIZEOF_SAMPLE:
+                break
+    elif hasattr(value, "__dict__"):
+        return size + _estimate_size(vars(value), depth + 1)
+    else:
+        return size
+    if sampled and count > sampled:
+        base = sys.getsizeof(value)
+        size = base + (size - base) * count // sampled
+    return size
+
+
+class _CacheEntry:
+    """缓存条目：所在分片、所在队列与时间轮桶都挂在条目上，删除均为 O(1)"""
+
+    __slots__ = ("key", "value", "size", "expire_ms", "shard", "queue", "bucket")
+
+    def __init__(self, key: str, value: Any, size: int, expire_ms: int, shard: _CacheShard):
+        self.key = key
+        self.value = value
+        self.size = size
+        self.expire_ms = expire_ms
+        self.shard = shard
+        self.queue: OrderedDict[str, _CacheEntry] | None = None
+        self.bucket: set[_CacheEntry] | None = None
+
+
+class _CacheShard:
+    """
+    单个分片的 W-TinyLFU 队列
+
+    新条目先进入约 1% 容量的窗口 LRU；窗口溢出的条目作为候选，与主区
+    （SLRU：probation + 80% 的 protected）的 LRU 端按访问频率竞争准入。
+    条目数与估算字节数两个预算同时生效。
+    """
+
+    __slots__ = (
+        "data",
+        "window",
+        "probation",
+        "protected",
+        "bytes",
+        "window_bytes",
+        "protected_bytes",
+        "max_entries",
+        "max_bytes",
+        "window_max_entries",
+        "window_max_bytes",
+        "protected_max_entries",
+        "protected_max_bytes",
+    )
+
+    def __init__(self, max_entries: int, max_bytes: float):
+        self.data: dict[str, _CacheEntry] = {}
+        self.window: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self.probation: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self.protected: OrderedDict[str, _CacheEntry] = OrderedDict()
+        self.bytes = 0
+        self.window_bytes = 0
+        self.protected_bytes = 0
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.window_max_entries = max(1, max_entries // 100)
+        self.window_max_bytes = max(max_bytes / 100, 1)
+        main_entries = max_entries - self.window_max_entries
+        self.protected_max_entries = main_entries * 4 // 5
+        self.protected_max_bytes = (max_bytes - self.window_max_bytes) * 4 / 5
+
+
+class _FrequencySketch:
+    """
+    TinyLFU 频率估计：4 行 Count-Min Sketch（计数上限 15）+ 门卫集合
+
+    首次出现的键只记入门卫，避免一次性访问污染计数；累计增量达到采样量后
+    计数整体减半、门卫清空，使频率随时间老化。调用方传入 hash(key)，经一次
+    64 位乘法混合后各行分别取其中 16 位作为列下标。
+    """
+
+    __slots__ = ("_table", "_width", "_mask", "_door", "_additions", "_sample_size")
+
+    def __init__(self, capacity: int):
+        # 每行宽度取容量 4 倍向上的 2 的幂（上限 2^16），降低热点与冷键的计数碰撞
+        width = 1 << min(16, max(6, (4 * max(capacity, 1) - 1).bit_length()))
+        self._table = bytearray(width * 4)
+        self._width = width
+        self._mask = width - 1
+        self._door: set[int] = set()
+        self._additions = 0
+        self._sample_size = 10 * max(capacity, 16)
+
+    def increment(self, key_hash: int) -> None:
+        h = (key_hash * _SKETCH_SEED) & _MASK64
+        door = self._door
+        if h not in door:
+            door.add(h)
+        else:
+            table, width, mask = self._table, self._width, self._mask
+            for index in (
+                h & mask,
+                width + ((h >> 16) & mask),
+                2 * width + ((h >> 32) & mask),
+                3 * width + ((h >> 48) & mask),
+            ):
+                if table[index] < 15:
+                    table[index] += 1
+        self._additions += 1
+        if self._additions >= self._sample_size:
+            self._table = self._table.translate(_HALVE)
+            door.clear()
+            self._additions //= 2
+
+    def frequency(self, key_hash: int) -> int:
+        h = (key_hash * _SKETCH_SEED) & _MASK64
+        table, width, mask = self._table, self._width, self._mask
+        count = min(
+            table[h & mask],
+            table[width + ((h >> 16) & mask)],
+            table[2 * width + ((h >> 32) & mask)],
+            table[3 * width + ((h >> 48) & mask)],
+        )
+        return count + (h in self._door)
+
+
+class _TimerWheel:
+    """分层时间轮：schedule/deschedule O(1)，advance 只处理跨过的桶"""
+
+    __slots__ = ("_wheel", "_now_ms")
+
+    def __init__(self, now_ms: int):
+        self._wheel = tuple(tuple(set() for _ in range(n)) for n in _WHEEL_BUCKETS)
+        self._now_ms = now_ms
+
+    def schedule(self, entry: _CacheEntry) -> None:
+        duration = entry.expire_ms - self._now_ms
+        level = len(_WHEEL_SHIFTS) - 1
+        for i in range(level):
+            if duration < 1 << _WHEEL_SHIFTS[i + 1]:
+                level = i
+                break
+        buckets = self._wheel[level]
+        bucket = buckets[(entry.expire_ms >> _WHEEL_SHIFTS[level]) & (len(buckets) - 1)]
+        bucket.add(entry)
+        entry.bucket = bucket
+
+    @staticmethod
+    def deschedule(entry: _CacheEntry) -> None:
+        if entry.bucket is not None:
+            entry.bucket.discard(entry)
+            entry.bucket = None
+
+    def advance(self, now_ms: int) -> list[_CacheEntry]:
+        """推进时钟，返回已到期的条目；未到期的条目重新落入更低层的桶"""
+        previous = self._now_ms
+        self._now_ms = now_ms
+        expired: list[_CacheEntry] = []
+        for level, shift in enumerate(_WHEEL_SHIFTS):
+            previous_ticks = previous >> shift
+            delta = (now_ms >> shift) - previous_ticks
+            if delta <= 0:
+                break
+            buckets = self._wheel[level]
+            mask = len(buckets) - 1
+            for step in range(min(delta + 1, len(buckets))):
+                bucket = buckets[(previous_ticks + step) & mask]
+                if not bucket:
+                    continue
+                entries = list(bucket)
+                bucket.clear()
+                for entry in entries:
+                    entry.bucket = None
+                    if entry.expire_ms <= now_ms:
+                        expired.append(entry)
+                    else:
+                        self.schedule(entry)
+        return expired
+
+
+class LocalCache(BaseCacheBackend):
+    """
+    本地内存缓存后端（分片 W-TinyLFU + 分层时间轮 TTL）
+
+    - 读写路径不加锁，各操作内部无 await，在事件循环内保持原子
+    - 按键哈希分片，每个分片独立维护窗口 LRU 与 SLRU 主区
+    - 准入/淘汰按 TinyLFU 频率决定，扫描式的一次性访问不会冲掉热点
+    - 同时受条目数与估算字节数约束；过期条目由时间轮在时钟推进时主动回收
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1000,
+        default_ttl: int = 300,
+        max_bytes: int | None = None,
+        shards: int | None = None,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        初始化本地缓存
+
+        Args:
+            max_size: 最大缓存条目数
+            default_ttl: 默认过期时间（秒）
+            max_bytes: 估算字节数上限（None 表示只按条目数限制）
+            shards: 分片数（None 时按容量自动选择，取 2 的幂）
+            clock: 单调时钟（秒），测试可注入
+        """
+        if shards is None:
+            shards = 1 << min(
+                _MAX_SHARDS.bit_length() - 1,
+                max(0, (max_size // _MIN_SHARD_ENTRIES).bit_length() - 1),
+            )
+        elif shards < 1 or shards & (shards - 1):
+            raise ValueError("shards 必须是正的 2 的幂")
+        while shards > max(1, max_size):
+            shards >>= 1
+
+        self._max_size = max_size
+        self._max_bytes = max_bytes
+        self._default_ttl = default_ttl
+        self._clock = clock
+        self._shard_mask = shards - 1
+        self._shards = tuple(
+            _CacheShard(
+                max_size // shards + (1 if i < max_size % shards else 0),
+                max_bytes / shards if max_bytes is not None else float("inf"),
+            )
+            for i in range(shards)
+        )
+        self._sketch = _FrequencySketch(max_size)
+        now_ms = int(clock() * 1000)
+        self._wheel = _TimerWheel(now_ms)
+        self._wheel_tick = now_ms >> _WHEEL_TICK_SHIFT
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    # ---------- 内部操作 ----------
+
+    def _now_ms(self) -> int:
+        """读取时钟；跨过时间轮最小刻度时顺带回收到期条目"""
+        now_ms = int(self._clock() * 1000)
+        if now_ms >> _WHEEL_TICK_SHIFT != self._wheel_tick:
+            self._advance(now_ms)
+        return now_ms
+
+    def _advance(self, now_ms: int) -> None:
+        self._wheel_tick = now_ms >> _WHEEL_TICK_SHIFT
+        for entry in self._wheel.advance(now_ms):
+            self._remove(entry)
+            self._expirations += 1
+
+    def _remove(self, entry: _CacheEntry) -> None:
+        shard = entry.shard
+        queue = entry.queue
+        del shard.data[entry.key]
+        if queue is not None:
+            del queue[entry.key]
+            if queue is shard.window:
+                shard.window_bytes -= entry.size
+            elif queue is shard.protected:
+                shard.protected_bytes -= entry.size
+            entry.queue = None
+        shard.bytes -= entry.size
+        self._wheel.deschedule(entry)
+
+    def _evict(self, entry: _CacheEntry) -> None:
+        self._remove(entry)
+        self._evictions += 1
+
+    def _promote(self, entry: _CacheEntry) -> None:
+        """probation 命中晋升到 protected，protected 溢出的 LRU 端降级回 probation"""
+        shard = entry.shard
+        del shard.probation[entry.key]
+        shard.protected[entry.key] = entry
+        entry.queue = shard.protected
+        shard.protected_bytes += entry.size
+        self._demote_protected(shard)
+
+    @staticmethod
+    def _demote_protected(shard: _CacheShard) -> None:
+        protected = shard.protected
+        while protected and (
+            len(protected) > shard.protected_max_entries
+            or shard.protected_bytes > shard.protected_max_bytes
+        ):
+            key, demoted = protected.popitem(last=False)
+            shard.protected_bytes -= demoted.size
+            shard.probation[key] = demoted
+            demoted.queue = shard.probation
+
+    def _maintain(self, shard: _CacheShard) -> None:
+        """窗口溢出的候选与主区 LRU 端按频率竞争；之后若仍超预算则从主区尾部淘汰"""
+        window, probation, protected, data = (
+            shard.window,
+            shard.probation,
+            shard.protected,
+            shard.data,
+        )
+        max_entries, max_bytes = shard.max_entries, shard.max_bytes
+        while len(window) > shard.window_max_entries or (
+            window and shard.window_bytes > shard.window_max_bytes
+        ):
+            key, candidate = window.popitem(last=False)
+            shard.window_bytes -= candidate.size
+            probation[key] = candidate
+            candidate.queue = probation
+            candidate_freq = -1
+            while len(data) > max_entries or shard.bytes > max_bytes:
+                victim = next(iter(probation.values()))
+                if victim is candidate:
+                    victim = next(iter(protected.values()), None)
+                    if victim is None:
+                        break
+                if candidate_freq < 0:
+                    candidate_freq = self._sketch.frequency(hash(key))
+                if candidate_freq > self._sketch.frequency(hash(victim.key)):
+                    self._evict(victim)
+                else:
+                    self._evict(candidate)
+                    break
+        while len(data) > max_entries or shard.bytes > max_bytes:
+            queue = probation or protected or window
+            self._evict(next(iter(queue.values())))
+
+    # ---------- 公共接口 ----------
+
+    async def get(self, key: str) -> Any | None:
+        """获取缓存值"""
+        # 热路径：时钟检查与 LRU 调整内联，避免额外的方法调用
+        now_ms = int(self._clock() * 1000)
+        if now_ms >> _WHEEL_TICK_SHIFT != self._wheel_tick:
+            self._advance(now_ms)
+        key_hash = hash(key)
+        entry = self._shards[key_hash & self._shard_mask].data.get(key)
+        if entry is None:
+            self._misses += 1
+            return None
+        if now_ms >= entry.expire_ms:
+            self._remove(entry)
+            self._expirations += 1
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._sketch.increment(key_hash)
+        queue = entry.queue
+        if queue is entry.shard.probation:
+            self._promote(entry)
+        elif queue is not None:
+            queue.move_to_end(key)
+        return entry.value
+
+    async def set(self, key: str, value: Any, ttl: int | None = None) -> None:
+        """设置缓存值"""
+        if ttl is None:
+            ttl = self._default_ttl
+        now_ms = self._now_ms()
+        key_hash = hash(key)
+        shard = self._shards[key_hash & self._shard_mask]
+        size = _estimate_size(value) if self._max_bytes is not None else 0
+
+        entry = shard.data.get(key)
+        if size > shard.max_bytes:
+            # 单个值超过分片字节预算：不缓存，同时移除旧值避免读到过期数据
+            if entry is not None:
+                self._remove(entry)
+            return
+
+        self._sketch.increment(key_hash)
+        if entry is not None:
+            delta = size - entry.size
+            shard.bytes += delta
+            if entry.queue is shard.window:
+                shard.window_bytes += delta
+            elif entry.queue is shard.protected:
+                shard.protected_bytes += delta
+            entry.value = value
+            entry.size = size
+            entry.expire_ms = now_ms + int(ttl * 1000)
+            self._wheel.deschedule(entry)
+            self._wheel.schedule(entry)
+            if entry.queue is not None:
+                entry.queue.move_to_end(key)
+            if entry.queue is shard.protected:
+                self._demote_protected(shard)
+        else:
+            entry = _CacheEntry(key, value, size, now_ms + int(ttl * 1000), shard)
+            shard.data[key] = entry
+            shard.window[key] = entry
+            entry.queue = shard.window
+            shard.bytes += size
+            shard.window_bytes += size
+            self._wheel.schedule(entry)
+        self._maintain(shard)
+
+    async def delete(self, key: str) -> None:
+        """删除缓存值"""
+        entry = self._shards[hash(key) & self._shard_mask].data.get(key)
+        if entry is not None:
+            self._remove(entry)
+
+    async def clear(self, pattern: str | None = None) -> None:
+        """清空缓存（pattern 支持前缀匹配）"""
+        if pattern is None:
+            for shard in self._shards:
+                for entry in list(shard.data.values()):
+                    self._remove(entry)
+            return
+        prefix = pattern.rstrip("*")
+        for shard in self._shards:
+            for key in [k for k in shard.data if k.startswith(prefix)]:
+                self._remove(shard.data[key])
+
+    async def exists(self, key: str) -> bool:
+        """检查键是否存在（不计入命中统计与访问频率）"""
+        now_ms = self._now_ms()
+        entry = self._shards[hash(key) & self._shard_mask].data.get(key)
+        if entry is None:
+            return False
+        if now_ms >= entry.expire_ms:
+            self._remove(entry)
+            self._expirations += 1
+            return False
+        return True
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取缓存统计信息"""
+        lookups = self._hits + self._misses
+        return {
+            "backend": "local",
+            "size": sum(len(shard.data) for shard in self._shards),
+            "max_size": self._max_size,
+            "default_ttl": self._default_ttl,
+            "bytes": sum(shard.bytes for shard in self._shards),
+            "max_bytes": self._max_bytes,
+            "shards": len(self._shards),
+            "hits": self._hits,
+            "misses": self._misses,
+            "hit_rate": self._hits / lookups if lookups else 0.0,
+            "evictions": self._evictions,
+            "expirations": self._expirations,
+        }
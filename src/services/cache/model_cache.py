@@ -4,7 +4,7 @@ Model 映射缓存服务 - 减少模型查询
 架构说明
 ========
 本服务采用混合 async/sync 模式：
-- 缓存操作（CacheService）：真正的 async，使用 aioredis
+- 缓存操作（TieredCache）：进程内 L1 + Redis L2，并发未命中合并为一次加载
 - 数据库查询（db.query）：同步的 SQLAlchemy Session
 
 设计决策
@@ -18,6 +18,9 @@ Model 映射缓存服务 - 减少模型查询
     global_model = await ModelCacheService.resolve_global_model_by_name_or_mapping(db, "gpt-4")
 """
 
+from __future__ import annotations
+
+import asyncio
 import time
 
 from sqlalchemy.orm import Session
@@ -31,6 +34,41 @@ from src.core.metrics import (
     model_mapping_resolution_total,
 )
 from src.models.database import GlobalModel, Model
+from src.services.cache.tiered import TieredCache
+
+_cache = TieredCache("model", ttl=CacheTTL.MODEL)
+
+# provider_global 命中计数：进程内累积后定期以 INCRBY 批量写入 Redis
+_HIT_COUNT_FLUSH_SECONDS = 5.0
+_pending_hit_counts: dict[str, int] = {}
+_hit_count_flush_task: asyncio.Task | None = None
+
+
+def _record_provider_global_hit(hit_count_key: str) -> None:
+    global _hit_count_flush_task
+
+    _pending_hit_counts[hit_count_key] = _pending_hit_counts.get(hit_count_key, 0) + 1
+    if _hit_count_flush_task is None or _hit_count_flush_task.done():
+        _hit_count_flush_task = asyncio.get_running_loop().create_task(_flush_hit_counts())
+
+
+async def _flush_hit_counts() -> None:
+    await asyncio.sleep(_HIT_COUNT_FLUSH_SECONDS)
+    pending = dict(_pending_hit_counts)
+    _pending_hit_counts.clear()
+    try:
+        from src.clients.redis_client import get_redis_client
+
+        redis = await get_redis_client(require_redis=False)
+        if not redis:
+            return
+        async with redis.pipeline(transaction=False) as pipe:
+            for key, count in pending.items():
+                pipe.incrby(key, count)
+                pipe.expire(key, ModelCacheService.CACHE_TTL)
+            await pipe.execute()
+    except Exception as e:
+        logger.warning(f"Model 命中计数写入失败: {e}")
 
 
 class ModelCacheService:
@@ -55,24 +93,12 @@ class ModelCacheService:
         Returns:
             Model 对象或 None
         """
-        cache_key = f"model:id:{model_id}"
-
-        # 1. 尝试从缓存获取
-        cached_data = await CacheService.get(cache_key)
-        if cached_data:
-            logger.debug(f"Model 缓存命中: {model_id}")
-            return ModelCacheService._dict_to_model(cached_data)
-
-        # 2. 缓存未命中，查询数据库
-        model = db.query(Model).filter(Model.id == model_id).first()
-
-        # 3. 写入缓存
-        if model:
-            model_dict = ModelCacheService._model_to_dict(model)
-            await CacheService.set(cache_key, model_dict, ttl_seconds=ModelCacheService.CACHE_TTL)
-            logger.debug(f"Model 已缓存: {model_id}")
-
-        return model
+        return await _cache.get_or_load_object(
+            f"model:id:{model_id}",
+            lambda: db.query(Model).filter(Model.id == model_id).first(),
+            ModelCacheService._model_to_dict,
+            ModelCacheService._dict_to_model,
+        )
 
     @staticmethod
     async def get_global_model_by_id(db: Session, global_model_id: str) -> GlobalModel | None:
@@ -86,26 +112,12 @@ class ModelCacheService:
         Returns:
             GlobalModel 对象或 None
         """
-        cache_key = f"global_model:id:{global_model_id}"
-
-        # 1. 尝试从缓存获取
-        cached_data = await CacheService.get(cache_key)
-        if cached_data:
-            logger.debug(f"GlobalModel 缓存命中: {global_model_id}")
-            return ModelCacheService._dict_to_global_model(cached_data)
-
-        # 2. 缓存未命中，查询数据库
-        global_model = db.query(GlobalModel).filter(GlobalModel.id == global_model_id).first()
-
-        # 3. 写入缓存
-        if global_model:
-            global_model_dict = ModelCacheService._global_model_to_dict(global_model)
-            await CacheService.set(
-                cache_key, global_model_dict, ttl_seconds=ModelCacheService.CACHE_TTL
-            )
-            logger.debug(f"GlobalModel 已缓存: {global_model_id}")
-
-        return global_model
+        return await _cache.get_or_load_object(
+            f"global_model:id:{global_model_id}",
+            lambda: db.query(GlobalModel).filter(GlobalModel.id == global_model_id).first(),
+            ModelCacheService._global_model_to_dict,
+            ModelCacheService._dict_to_global_model,
+        )
 
     @staticmethod
     async def get_model_by_provider_and_global_model(
@@ -124,39 +136,37 @@ class ModelCacheService:
         """
         cache_key = f"model:provider_global:{provider_id}:{global_model_id}"
         hit_count_key = f"model:provider_global:hits:{provider_id}:{global_model_id}"
+        loaded: list[Model] = []
 
-        # 1. 尝试从缓存获取
-        cached_data = await CacheService.get(cache_key)
-        if cached_data:
-            logger.debug(
-                f"Model 缓存命中(provider+global): {provider_id[:8]}...+{global_model_id[:8]}..."
-            )
-            # 递增命中计数，同时刷新 TTL
-            await CacheService.incr(hit_count_key, ttl_seconds=ModelCacheService.CACHE_TTL)
-            return ModelCacheService._dict_to_model(cached_data)
-
-        # 2. 缓存未命中，查询数据库
-        model = (
-            db.query(Model)
-            .filter(
-                Model.provider_id == provider_id,
-                Model.global_model_id == global_model_id,
-                Model.is_active == True,
+        def load() -> dict | None:
+            model = (
+                db.query(Model)
+                .filter(
+                    Model.provider_id == provider_id,
+                    Model.global_model_id == global_model_id,
+                    Model.is_active == True,
+                )
+                .first()
             )
-            .first()
-        )
+            if model is None:
+                return None
+            loaded.append(model)
+            return ModelCacheService._model_to_dict(model)
 
-        # 3. 写入缓存
-        if model:
-            model_dict = ModelCacheService._model_to_dict(model)
-            await CacheService.set(cache_key, model_dict, ttl_seconds=ModelCacheService.CACHE_TTL)
+        data = await _cache.get_or_load(cache_key, load)
+        if loaded:
             # 重置命中计数（新缓存从1开始）
+            _pending_hit_counts.pop(hit_count_key, None)
             await CacheService.set(hit_count_key, 1, ttl_seconds=ModelCacheService.CACHE_TTL)
             logger.debug(
                 f"Model 已缓存(provider+global): {provider_id[:8]}...+{global_model_id[:8]}..."
             )
-
-        return model
+            return loaded[0]
+        if data is None:
+            return None
+        # 命中计数在进程内累积，定期批量写入并刷新 TTL
+        _record_provider_global_hit(hit_count_key)
+        return ModelCacheService._dict_to_model(data)
 
     @staticmethod
     async def get_global_model_by_name(db: Session, name: str) -> GlobalModel | None:
@@ -170,26 +180,12 @@ class ModelCacheService:
         Returns:
             GlobalModel 对象或 None
         """
-        cache_key = f"global_model:name:{name}"
-
-        # 1. 尝试从缓存获取
-        cached_data = await CacheService.get(cache_key)
-        if cached_data:
-            logger.debug(f"GlobalModel 缓存命中(名称): {name}")
-            return ModelCacheService._dict_to_global_model(cached_data)
-
-        # 2. 缓存未命中，查询数据库
-        global_model = db.query(GlobalModel).filter(GlobalModel.name == name).first()
-
-        # 3. 写入缓存
-        if global_model:
-            global_model_dict = ModelCacheService._global_model_to_dict(global_model)
-            await CacheService.set(
-                cache_key, global_model_dict, ttl_seconds=ModelCacheService.CACHE_TTL
-            )
-            logger.debug(f"GlobalModel 已缓存(名称): {name}")
-
-        return global_model
+        return await _cache.get_or_load_object(
+            f"global_model:name:{name}",
+            lambda: db.query(GlobalModel).filter(GlobalModel.name == name).first(),
+            ModelCacheService._global_model_to_dict,
+            ModelCacheService._dict_to_global_model,
+        )
 
     @staticmethod
     async def invalidate_model_cache(
@@ -209,11 +205,11 @@ class ModelCacheService:
             provider_model_mappings: 映射名称列表（用于清除 resolve 缓存）
         """
         # 清除 model:id 缓存
-        await CacheService.delete(f"model:id:{model_id}")
+        await _cache.invalidate(f"model:id:{model_id}")
 
         # 清除 provider_global 缓存及其命中计数（如果提供了必要参数）
         if provider_id and global_model_id:
-            await CacheService.delete(f"model:provider_global:{provider_id}:{global_model_id}")
+            await _cache.invalidate(f"model:provider_global:{provider_id}:{global_model_id}")
             await CacheService.delete(f"model:provider_global:hits:{provider_id}:{global_model_id}")
             logger.debug(
                 f"Model 缓存已清除: {model_id}, provider_global:{provider_id[:8]}...:{global_model_id[:8]}..."
@@ -232,8 +228,7 @@ class ModelCacheService:
                     if mapping_name:
                         resolve_keys_to_clear.append(mapping_name)
 
-        for key in resolve_keys_to_clear:
-            await CacheService.delete(f"global_model:resolve:{key}")
+        await _cache.invalidate(*(f"global_model:resolve:{key}" for key in resolve_keys_to_clear))
 
         if resolve_keys_to_clear:
             logger.debug(f"Model resolve 缓存已清除: {resolve_keys_to_clear}")
@@ -241,14 +236,12 @@ class ModelCacheService:
     @staticmethod
     async def invalidate_global_model_cache(global_model_id: str, name: str | None = None) -> None:
         """清除 GlobalModel 缓存"""
-        await CacheService.delete(f"global_model:id:{global_model_id}")
+        await _cache.invalidate(f"global_model:id:{global_model_id}")
         if name:
-            await CacheService.delete(f"global_model:name:{name}")
-            # 同时清除 resolve 缓存，因为 GlobalModel.name 也是一个 resolve key
-            await CacheService.delete(f"global_model:resolve:{name}")
-        # 全量清除 resolve 缓存，确保映射规则变更后不命中旧缓存
+            await _cache.invalidate(f"global_model:name:{name}")
+        # 全量清除 resolve 缓存（含以 GlobalModel.name 为键的条目），确保映射规则变更后不命中旧缓存
         try:
-            await CacheService.delete_pattern("global_model:resolve:*")
+            await _cache.invalidate_prefix("global_model:resolve:")
         except Exception as e:
             logger.error(f"GlobalModel resolve 缓存清除失败，可能导致映射不一致: {e}")
         logger.debug(f"GlobalModel 缓存已清除: {global_model_id}")
@@ -261,11 +254,16 @@ class ModelCacheService:
         在 Provider 启用/禁用时调用，因为 Provider 状态变更会影响模型解析结果。
         """
         try:
-            deleted = await CacheService.delete_pattern("global_model:resolve:*")
+            deleted = await _cache.invalidate_prefix("global_model:resolve:")
             logger.debug(f"已清除 {deleted} 个 GlobalModel resolve 缓存")
         except Exception as e:
             logger.error(f"GlobalModel resolve 缓存清除失败: {e}")
 
+    @staticmethod
+    async def evict_local_cache(*keys: str) -> None:
+        """只清理各实例的进程内 L1（Redis 键已由调用方直接删除时使用）"""
+        await _cache.evict_local(keys)
+
     @staticmethod
     async def resolve_global_model_by_name_or_mapping(
         db: Session, model_name: str
@@ -301,225 +299,224 @@ class ModelCacheService:
         cache_key = f"global_model:resolve:{normalized_name}"
 
         try:
-            # 1. 尝试从缓存获取
-            cached_data = await CacheService.get(cache_key)
-            if cached_data:
-                if cached_data == "NOT_FOUND":
-                    # 缓存的负结果
-                    cache_hit = True
-                    resolution_method = "not_found"
-                    logger.debug(f"GlobalModel 缓存命中(映射解析-未找到): {normalized_name}")
-                    return None
-                if isinstance(cached_data, dict) and "supported_capabilities" not in cached_data:
-                    # 兼容旧缓存：字段不全时视为未命中，走 DB 刷新
-                    logger.debug(f"GlobalModel 缓存命中但 schema 过旧，刷新: {normalized_name}")
-                else:
-                    cache_hit = True
-                    resolution_method = "direct_match"  # 缓存命中时无法区分原始解析方式
-                    logger.debug(f"GlobalModel 缓存命中(映射解析): {normalized_name}")
-                    return ModelCacheService._dict_to_global_model(cached_data)
-
-            # 2. 直接通过 GlobalModel.name 匹配（优先级最高）
-            # 说明：如果存在同名 GlobalModel，应优先解析为 GlobalModel 本身，
-            # 避免被某个 Provider 的 provider_model_name 误导导致解析到错误的 GlobalModel。
-            global_model = (
-                db.query(GlobalModel)
-                .filter(GlobalModel.name == normalized_name, GlobalModel.is_active == True)
-                .first()
-            )
+            loaded: list[GlobalModel] = []
 
-            if global_model:
-                resolution_method = "direct_match"
-                global_model_dict = ModelCacheService._global_model_to_dict(global_model)
-                await CacheService.set(
-                    cache_key, global_model_dict, ttl_seconds=ModelCacheService.CACHE_TTL
+            def load() -> dict | str:
+                nonlocal resolution_method, cache_hit
+                cache_hit = False
+                global_model, resolution_method = ModelCacheService._resolve_from_db(
+                    db, normalized_name
                 )
-                logger.debug(f"GlobalModel 已缓存(映射解析-直接匹配): {normalized_name}")
-                return global_model
-
-            # 3. 通过 provider_model_name 匹配
-            from src.models.database import Provider
+                if global_model is None:
+                    # 未找到匹配，缓存负结果
+                    return "NOT_FOUND"
+                loaded.append(global_model)
+                return ModelCacheService._global_model_to_dict(global_model)
+
+            cache_hit = True
+            cached_data = await _cache.get_or_load(cache_key, load)
+            if isinstance(cached_data, dict) and "supported_capabilities" not in cached_data:
+                # 兼容旧缓存：字段不全时视为未命中，走 DB 刷新
+                logger.debug(f"GlobalModel 缓存命中但 schema 过旧，刷新: {normalized_name}")
+                await _cache.invalidate(cache_key)
+                cached_data = await _cache.get_or_load(cache_key, load)
+
+            if loaded:
+                return loaded[0]
+            if cached_data is None or cached_data == "NOT_FOUND":
+                resolution_method = "not_found"
+                return None
+            if cache_hit:
+                resolution_method = "direct_match"  # 缓存命中时无法区分原始解析方式
+            return ModelCacheService._dict_to_global_model(cached_data)
 
-            models_with_global = (
-                db.query(Model, GlobalModel)
-                .join(Provider, Model.provider_id == Provider.id)
-                .join(GlobalModel, Model.global_model_id == GlobalModel.id)
-                .filter(
-                    Provider.is_active == True,
-                    Model.is_active == True,
-                    GlobalModel.is_active == True,
-                    Model.provider_model_name == normalized_name,
-                )
-                .all()
+        finally:
+            # 记录监控指标
+            duration = time.time() - start_time
+            model_mapping_resolution_total.labels(
+                method=resolution_method, cache_hit=str(cache_hit).lower()
+            ).inc()
+            model_mapping_resolution_duration_seconds.labels(method=resolution_method).observe(
+                duration
             )
 
-            # 收集匹配的 GlobalModel（只通过 provider_model_name 匹配）
-            matched_global_models: list[GlobalModel] = []
-            seen_global_model_ids: set[str] = set()
-            for model, gm in models_with_global:
-                if gm.id not in seen_global_model_ids:
-                    seen_global_model_ids.add(gm.id)
-                    matched_global_models.append(gm)
-                    logger.debug(
-                        f"模型名称 '{normalized_name}' 通过 provider_model_name 匹配到 "
-                        f"GlobalModel: {gm.name} (Model: {model.id[:8]}...)"
-                    )
+    @staticmethod
+    def _resolve_from_db(db: Session, normalized_name: str) -> tuple[GlobalModel | None, str]:
+        """
+        按优先级从数据库解析 GlobalModel
+
+        Returns:
+            (GlobalModel 或 None, 解析方式)
+        """
+        # 2. 直接通过 GlobalModel.name 匹配（优先级最高）
+        # 说明：如果存在同名 GlobalModel，应优先解析为 GlobalModel 本身，
+        # 避免被某个 Provider 的 provider_model_name 误导导致解析到错误的 GlobalModel。
+        global_model = (
+            db.query(GlobalModel)
+            .filter(GlobalModel.name == normalized_name, GlobalModel.is_active == True)
+            .first()
+        )
 
-            # 如果通过 provider_model_name 找到了，返回
-            if matched_global_models:
-                resolution_method = "provider_model_name"
+        if global_model:
+            return global_model, "direct_match"
 
-                if len(matched_global_models) > 1:
-                    # 检测到冲突（多个不同的 GlobalModel 有相同的 provider_model_name）
-                    model_names = [gm.name for gm in matched_global_models if gm.name]
-                    logger.warning(
-                        f"模型映射冲突: 名称 '{normalized_name}' 匹配到多个不同的 GlobalModel: "
-                        f"{', '.join(model_names)}，使用第一个匹配结果"
-                    )
-                    # 记录冲突指标
-                    model_mapping_conflict_total.inc()
-
-                # 返回第一个匹配的 GlobalModel
-                result_global_model = matched_global_models[0]
-                global_model_dict = ModelCacheService._global_model_to_dict(result_global_model)
-                await CacheService.set(
-                    cache_key, global_model_dict, ttl_seconds=ModelCacheService.CACHE_TTL
-                )
+        # 3. 通过 provider_model_name 匹配
+        from src.models.database import Provider
+
+        models_with_global = (
+            db.query(Model, GlobalModel)
+            .join(Provider, Model.provider_id == Provider.id)
+            .join(GlobalModel, Model.global_model_id == GlobalModel.id)
+            .filter(
+                Provider.is_active == True,
+                Model.is_active == True,
+                GlobalModel.is_active == True,
+                Model.provider_model_name == normalized_name,
+            )
+            .all()
+        )
+
+        # 收集匹配的 GlobalModel（只通过 provider_model_name 匹配）
+        matched_global_models: list[GlobalModel] = []
+        seen_global_model_ids: set[str] = set()
+        for model, gm in models_with_global:
+            if gm.id not in seen_global_model_ids:
+                seen_global_model_ids.add(gm.id)
+                matched_global_models.append(gm)
                 logger.debug(
-                    f"GlobalModel 已缓存(映射解析-{resolution_method}): {normalized_name} -> {result_global_model.name}"
+                    f"模型名称 '{normalized_name}' 通过 provider_model_name 匹配到 "
+                    f"GlobalModel: {gm.name} (Model: {model.id[:8]}...)"
                 )
-                return result_global_model
 
-            # 4. 通过 provider_model_mappings 匹配
-            models_with_mappings = (
-                db.query(Model, GlobalModel)
-                .join(Provider, Model.provider_id == Provider.id)
-                .join(GlobalModel, Model.global_model_id == GlobalModel.id)
-                .filter(
-                    Provider.is_active == True,
-                    Model.is_active == True,
-                    GlobalModel.is_active == True,
-                    Model.provider_model_mappings.isnot(None),
+        # 如果通过 provider_model_name 找到了，返回
+        if matched_global_models:
+            resolution_method = "provider_model_name"
+
+            if len(matched_global_models) > 1:
+                # 检测到冲突（多个不同的 GlobalModel 有相同的 provider_model_name）
+                model_names = [gm.name for gm in matched_global_models if gm.name]
+                logger.warning(
+                    f"模型映射冲突: 名称 '{normalized_name}' 匹配到多个不同的 GlobalModel: "
+                    f"{', '.join(model_names)}，使用第一个匹配结果"
                 )
-                .all()
+                # 记录冲突指标
+                model_mapping_conflict_total.inc()
+
+            # 返回第一个匹配的 GlobalModel
+            result_global_model = matched_global_models[0]
+            logger.debug(
+                f"GlobalModel 映射解析({resolution_method}): "
+                f"{normalized_name} -> {result_global_model.name}"
             )
+            return result_global_model, resolution_method
 
-            mapping_matched_global_models: list[GlobalModel] = []
-            mapping_seen_ids: set[str] = set()
-            for model, gm in models_with_mappings:
-                raw_mappings = model.provider_model_mappings
-                if not isinstance(raw_mappings, list):
+        # 4. 通过 provider_model_mappings 匹配
+        models_with_mappings = (
+            db.query(Model, GlobalModel)
+            .join(Provider, Model.provider_id == Provider.id)
+            .join(GlobalModel, Model.global_model_id == GlobalModel.id)
+            .filter(
+                Provider.is_active == True,
+                Model.is_active == True,
+                GlobalModel.is_active == True,
+                Model.provider_model_mappings.isnot(None),
+            )
+            .all()
+        )
+
+        mapping_matched_global_models: list[GlobalModel] = []
+        mapping_seen_ids: set[str] = set()
+        for model, gm in models_with_mappings:
+            raw_mappings = model.provider_model_mappings
+            if not isinstance(raw_mappings, list):
+                continue
+            for raw in raw_mappings:
+                if not isinstance(raw, dict):
                     continue
-                for raw in raw_mappings:
-                    if not isinstance(raw, dict):
-                        continue
-                    name = raw.get("name")
-                    if not isinstance(name, str):
-                        continue
-                    if name.strip() != normalized_name:
-                        continue
-                    if gm.id not in mapping_seen_ids:
-                        mapping_seen_ids.add(gm.id)
-                        mapping_matched_global_models.append(gm)
-                        logger.debug(
-                            f"模型名称 '{normalized_name}' 通过 provider_model_mappings 匹配到 "
-                            f"GlobalModel: {gm.name} (Model: {model.id[:8]}...)"
-                        )
-                    break
+                name = raw.get("name")
+                if not isinstance(name, str):
+                    continue
+                if name.strip() != normalized_name:
+                    continue
+                if gm.id not in mapping_seen_ids:
+                    mapping_seen_ids.add(gm.id)
+                    mapping_matched_global_models.append(gm)
+                    logger.debug(
+                        f"模型名称 '{normalized_name}' 通过 provider_model_mappings 匹配到 "
+                        f"GlobalModel: {gm.name} (Model: {model.id[:8]}...)"
+                    )
+                break
 
-            if mapping_matched_global_models:
-                resolution_method = "provider_model_mappings"
+        if mapping_matched_global_models:
+            resolution_method = "provider_model_mappings"
 
-                if len(mapping_matched_global_models) > 1:
-                    model_names = [gm.name for gm in mapping_matched_global_models if gm.name]
-                    logger.warning(
-                        f"模型映射冲突: 名称 '{normalized_name}' 匹配到多个不同的 GlobalModel: "
-                        f"{', '.join(model_names)}，使用第一个匹配结果"
-                    )
-                    model_mapping_conflict_total.inc()
-
-                # 按名称排序确保确定性
-                result_global_model = sorted(
-                    mapping_matched_global_models, key=lambda gm: gm.name or ""
-                )[0]
-                global_model_dict = ModelCacheService._global_model_to_dict(result_global_model)
-                await CacheService.set(
-                    cache_key, global_model_dict, ttl_seconds=ModelCacheService.CACHE_TTL
+            if len(mapping_matched_global_models) > 1:
+                model_names = [gm.name for gm in mapping_matched_global_models if gm.name]
+                logger.warning(
+                    f"模型映射冲突: 名称 '{normalized_name}' 匹配到多个不同的 GlobalModel: "
+                    f"{', '.join(model_names)}，使用第一个匹配结果"
                 )
-                logger.debug(
-                    f"GlobalModel 已缓存(映射解析-{resolution_method}): "
-                    f"{normalized_name} -> {result_global_model.name}"
-                )
-                return result_global_model
+                model_mapping_conflict_total.inc()
+
+            # 按名称排序确保确定性
+            result_global_model = sorted(
+                mapping_matched_global_models, key=lambda gm: gm.name or ""
+            )[0]
+            logger.debug(
+                f"GlobalModel 映射解析({resolution_method}): "
+                f"{normalized_name} -> {result_global_model.name}"
+            )
+            return result_global_model, resolution_method
 
-            # 5. 通过 GlobalModel.config.model_mappings 匹配（支持正则）
-            from sqlalchemy import func
+        # 5. 通过 GlobalModel.config.model_mappings 匹配（支持正则）
+        from sqlalchemy import func
 
-            from src.core.model_permissions import match_model_with_pattern
+        from src.core.model_permissions import match_model_with_pattern
 
-            mapping_rows = (
-                db.query(GlobalModel)
-                .filter(
-                    GlobalModel.is_active == True,
-                    GlobalModel.config.isnot(None),
-                    GlobalModel.config["model_mappings"].isnot(None),
-                    func.jsonb_array_length(GlobalModel.config["model_mappings"]) > 0,
-                )
-                .all()
+        mapping_rows = (
+            db.query(GlobalModel)
+            .filter(
+                GlobalModel.is_active == True,
+                GlobalModel.config.isnot(None),
+                GlobalModel.config["model_mappings"].isnot(None),
+                func.jsonb_array_length(GlobalModel.config["model_mappings"]) > 0,
             )
+            .all()
+        )
 
-            mapping_matches: list[GlobalModel] = []
-            for gm in mapping_rows:
-                config = gm.config or {}
-                mappings = config.get("model_mappings")
-                if not isinstance(mappings, list):
-                    continue
-                for pattern in mappings:
-                    if isinstance(pattern, str) and match_model_with_pattern(
-                        pattern, normalized_name
-                    ):
-                        mapping_matches.append(gm)
-                        break
-
-            if mapping_matches:
-                resolution_method = "model_mappings"
-
-                if len(mapping_matches) > 1:
-                    model_names = [gm.name for gm in mapping_matches if gm.name]
-                    logger.warning(
-                        f"模型映射冲突: 名称 '{normalized_name}' 匹配到多个不同的 GlobalModel: "
-                        f"{', '.join(model_names)}，使用第一个匹配结果"
-                    )
-                    model_mapping_conflict_total.inc()
+        mapping_matches: list[GlobalModel] = []
+        for gm in mapping_rows:
+            config = gm.config or {}
+            mappings = config.get("model_mappings")
+            if not isinstance(mappings, list):
+                continue
+            for pattern in mappings:
+                if isinstance(pattern, str) and match_model_with_pattern(pattern, normalized_name):
+                    mapping_matches.append(gm)
+                    break
 
-                # 按名称排序确保确定性
-                result_global_model = sorted(mapping_matches, key=lambda gm: gm.name or "")[0]
-                global_model_dict = ModelCacheService._global_model_to_dict(result_global_model)
-                await CacheService.set(
-                    cache_key, global_model_dict, ttl_seconds=ModelCacheService.CACHE_TTL
-                )
-                logger.debug(
-                    f"GlobalModel 已缓存(映射解析-{resolution_method}): "
-                    f"{normalized_name} -> {result_global_model.name}"
-                )
-                return result_global_model
+        if mapping_matches:
+            resolution_method = "model_mappings"
 
-            # 6. 完全未找到
-            resolution_method = "not_found"
-            # 未找到匹配，缓存负结果
-            await CacheService.set(cache_key, "NOT_FOUND", ttl_seconds=ModelCacheService.CACHE_TTL)
-            logger.debug(f"GlobalModel 未找到(映射解析): {normalized_name}")
-            return None
+            if len(mapping_matches) > 1:
+                model_names = [gm.name for gm in mapping_matches if gm.name]
+                logger.warning(
+                    f"模型映射冲突: 名称 '{normalized_name}' 匹配到多个不同的 GlobalModel: "
+                    f"{', '.join(model_names)}，使用第一个匹配结果"
+                )
+                model_mapping_conflict_total.inc()
 
-        finally:
-            # 记录监控指标
-            duration = time.time() - start_time
-            model_mapping_resolution_total.labels(
-                method=resolution_method, cache_hit=str(cache_hit).lower()
-            ).inc()
-            model_mapping_resolution_duration_seconds.labels(method=resolution_method).observe(
-                duration
+            # 按名称排序确保确定性
+            result_global_model = sorted(mapping_matches, key=lambda gm: gm.name or "")[0]
+            logger.debug(
+                f"GlobalModel 映射解析({resolution_method}): "
+                f"{normalized_name} -> {result_global_model.name}"
             )
+            return result_global_model, resolution_method
+
+        # 6. 完全未找到
+        logger.debug(f"GlobalModel 未找到(映射解析): {normalized_name}")
+        return None, "not_found"
 
     @staticmethod
     def _model_to_dict(model: Model) -> dict:
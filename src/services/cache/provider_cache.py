@@ -10,10 +10,13 @@ from __future__ import annotations
 from sqlalchemy.orm import Session
 
 from src.config.constants import CacheTTL
-from src.core.cache_service import CacheService
 from src.core.enums import ProviderBillingType
 from src.core.logger import logger
 from src.models.database import Provider, ProviderAPIKey
+from src.services.cache.routing_snapshot import get_routing_snapshot_manager
+from src.services.cache.tiered import TieredCache
+
+_cache = TieredCache("provider", ttl=CacheTTL.PROVIDER)
 
 
 class ProviderCacheService:
@@ -69,43 +72,28 @@ class ProviderCacheService:
         format_suffix = str(api_format).strip().lower() if api_format else "default"
         cache_key = f"provider_api_key:rate_multiplier:{provider_api_key_id}:{format_suffix}"
 
-        # 1. 尝试从缓存获取
-        cached_data = await CacheService.get(cache_key)
-        if cached_data is not None:
-            logger.debug(
-                f"ProviderAPIKey rate_multiplier 缓存命中: {provider_api_key_id[:8]}... format={format_suffix}"
+        def load() -> float | str:
+            provider_key = (
+                db.query(ProviderAPIKey.rate_multipliers)
+                .filter(ProviderAPIKey.id == provider_api_key_id)
+                .first()
             )
-            # 缓存的 "NOT_FOUND" 表示数据库中不存在
-            if cached_data == "NOT_FOUND":
-                return None
-            return float(cached_data)
-
-        # 2. 缓存未命中，查询数据库
-        provider_key = (
-            db.query(ProviderAPIKey.rate_multipliers)
-            .filter(ProviderAPIKey.id == provider_api_key_id)
-            .first()
-        )
-
-        # 3. 计算倍率并写入缓存
-        if provider_key:
+            if not provider_key:
+                # 缓存负结果
+                return "NOT_FOUND"
             rate_multiplier = ProviderCacheService.compute_rate_multiplier(
                 provider_key.rate_multipliers, api_format
             )
-
-            await CacheService.set(
-                cache_key, rate_multiplier, ttl_seconds=ProviderCacheService.CACHE_TTL
-            )
             logger.debug(
                 f"ProviderAPIKey rate_multiplier 已缓存: {provider_api_key_id[:8]}... format={format_suffix} value={rate_multiplier}"
             )
             return rate_multiplier
-        else:
-            # 缓存负结果
-            await CacheService.set(
-                cache_key, "NOT_FOUND", ttl_seconds=ProviderCacheService.CACHE_TTL
-            )
+
+        cached_data = await _cache.get_or_load(cache_key, load)
+        # 缓存的 "NOT_FOUND" 表示数据库中不存在
+        if cached_data is None or cached_data == "NOT_FOUND":
             return None
+        return float(cached_data)
 
     @staticmethod
     async def get_provider_billing_type(
@@ -123,35 +111,26 @@ class ProviderCacheService:
         """
         cache_key = f"provider:billing_type:{provider_id}"
 
-        # 1. 尝试从缓存获取
-        cached_data = await CacheService.get(cache_key)
-        if cached_data is not None:
-            logger.debug(f"Provider billing_type 缓存命中: {provider_id[:8]}...")
-            if cached_data == "NOT_FOUND":
-                return None
-            try:
-                return ProviderBillingType(cached_data)
-            except ValueError:
-                # 缓存值无效，删除并重新查询
-                await CacheService.delete(cache_key)
-
-        # 2. 缓存未命中，查询数据库
-        provider = db.query(Provider.billing_type).filter(Provider.id == provider_id).first()
-
-        # 3. 写入缓存
-        if provider:
-            billing_type = provider.billing_type
-            await CacheService.set(
-                cache_key, billing_type.value, ttl_seconds=ProviderCacheService.CACHE_TTL
-            )
+        def load() -> str:
+            provider = db.query(Provider.billing_type).filter(Provider.id == provider_id).first()
+            if not provider:
+                # 缓存负结果
+                return "NOT_FOUND"
             logger.debug(f"Provider billing_type 已缓存: {provider_id[:8]}...")
-            return billing_type
-        else:
-            # 缓存负结果
-            await CacheService.set(
-                cache_key, "NOT_FOUND", ttl_seconds=ProviderCacheService.CACHE_TTL
-            )
+            return provider.billing_type.value
+
+        cached_data = await _cache.get_or_load(cache_key, load)
+        if cached_data is None or cached_data == "NOT_FOUND":
             return None
+        try:
+            return ProviderBillingType(cached_data)
+        except ValueError:
+            # 缓存值无效，删除并重新查询
+            await _cache.invalidate(cache_key)
+            cached_data = await _cache.get_or_load(cache_key, load)
+            if cached_data == "NOT_FOUND":
+                return None
+            return ProviderBillingType(cached_data)
 
     @staticmethod
     async def get_rate_multiplier_and_free_tier(
@@ -197,13 +176,13 @@ class ProviderCacheService:
     async def invalidate_provider_api_key_cache(provider_api_key_id: str) -> None:
         """清除 ProviderAPIKey 缓存（包括所有 API 格式的缓存）"""
         # 使用模式匹配删除所有格式的缓存
-        await CacheService.delete_pattern(
-            f"provider_api_key:rate_multiplier:{provider_api_key_id}:*"
-        )
+        await _cache.invalidate_prefix(f"provider_api_key:rate_multiplier:{provider_api_key_id}:")
+        get_routing_snapshot_manager().invalidate_key(provider_api_key_id)
         logger.debug(f"ProviderAPIKey 缓存已清除: {provider_api_key_id[:8]}...")
 
     @staticmethod
     async def invalidate_provider_cache(provider_id: str) -> None:
         """清除 Provider 缓存"""
-        await CacheService.delete(f"provider:billing_type:{provider_id}")
+        await _cache.invalidate(f"provider:billing_type:{provider_id}")
+        get_routing_snapshot_manager().invalidate_provider(provider_id)
         logger.debug(f"Provider 缓存已清除: {provider_id[:8]}...")
@@ -0,0 +1,621 @@
+"""
+路由快照 (Routing Snapshot)
+
+CacheAwareScheduler.list_all_candidates 的进程内只读路由表，稳态下候选构建不访问数据库。
+
+结构:
+- RoutingSnapshot 不可变、带版本号，按 GlobalModel.id 索引实现了该模型的 Provider，
+  每个 Provider 预先过滤好活跃端点及其可用 Key（按端点签名匹配 api_formats），
+  并预计算端点签名 -> Provider 侧模型名集合、流式支持、模型能力集合
+- 快照中的 ORM 对象是只含列属性的 detached 副本；返回候选前通过
+  merge(load=False) 挂到当前请求的 Session（不发 SQL），请求内的写入不会污染快照
+- 重建时构造新快照后整体替换引用（copy-on-write），正在使用旧快照的请求不受影响
+
+失效:
+- Session after_flush 监听 Provider/Endpoint/Key/Model 的配置列变更，提交后标记对应 Provider
+  脏并通过 CacheSyncService 广播，下次读取时仅重新查询脏 Provider（增量重建）
+- GlobalModel 变更、CacheInvalidationService.clear_all_caches 触发全量重建
+- 统计/健康度等高频写入列不触发失效；熔断器仅在打开/关闭状态切换时触发
+- ROUTING_SNAPSHOT_TTL_SECONDS 兜底：覆盖 query.update() 等绕过 ORM 事件的批量更新
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.session import make_transient_to_detached
+
+from src.config.settings import config
+from src.core.api_format.conversion.compatibility import is_format_compatible
+from src.core.api_format.enums import ApiFamily, EndpointKind
+from src.core.api_format.signature import make_signature_key
+from src.core.logger import logger
+from src.core.metrics import routing_snapshot_build_seconds, routing_snapshot_rebuild_total
+from src.models.database import GlobalModel, Model, Provider, ProviderAPIKey, ProviderEndpoint
+
+# 本实例标识，用于忽略自己发出的广播
+_INSTANCE_ID = uuid.uuid4().hex
+
+# 高频写入、与路由无关的列：变更不触发快照失效
+_VOLATILE_COLUMNS: dict[type, frozenset[str]] = {
+    Provider: frozenset(
+        {"monthly_used_usd", "quota_last_reset_at", "created_at", "updated_at"},
+    ),
+    ProviderEndpoint: frozenset({"created_at", "updated_at"}),
+    ProviderAPIKey: frozenset(
+        {
+            "health_by_format",
+            "circuit_breaker_by_format",  # 单独判断打开/关闭状态切换
+            "request_count",
+            "success_count",
+            "error_count",
+            "total_response_time_ms",
+            "last_used_at",
+            "last_error_at",
+            "last_error_msg",
+            "learned_rpm_limit",
+            "concurrent_429_count",
+            "rpm_429_count",
+            "last_429_at",
+            "last_429_type",
+            "last_rpm_peak",
+            "adjustment_history",
+            "utilization_samples",
+            "last_probe_increase_at",
+            "last_models_fetch_at",
+            "last_models_fetch_error",
+            "created_at",
+            "updated_at",
+        }
+    ),
+    Model: frozenset({"created_at", "updated_at"}),
+    GlobalModel: frozenset({"usage_count", "created_at", "updated_at"}),
+}
+
+
+def detached_copy(obj: Any) -> Any:
+    """复制 ORM 对象的列属性为 detached 实例（不含关系，不关联任何 Session）"""
+    mapper = inspect(obj).mapper
+    clone = mapper.class_manager.new_instance()
+    for attr in mapper.column_attrs:
+        set_committed_value(clone, attr.key, getattr(obj, attr.key))
+    make_transient_to_detached(clone)
+    return clone
+
+
+def _family_priority(family: str) -> int:
+    try:
+        return ApiFamily(family).priority
+    except ValueError:
+        return 99
+
+
+@dataclass(frozen=True, slots=True)
+class RoutingEndpoint:
+    """活跃端点及其预过滤的可用 Key"""
+
+    endpoint: ProviderEndpoint
+    signature: str
+    family: str
+    kind: str
+    keys: tuple[ProviderAPIKey, ...]
+    # 所有 Key 都是 TTL=0（轮换模式）
+    keys_rotate: bool
+    _compat_cache: dict[tuple[str, bool, bool, bool], tuple[bool, bool]] = field(
+        default_factory=dict, compare=False, repr=False
+    )
+
+    def compatibility(
+        self,
+        client_format: str,
+        is_stream: bool,
+        global_conversion_enabled: bool,
+        skip_endpoint_check: bool,
+    ) -> tuple[bool, bool]:
+        """(is_compatible, needs_conversion)，结果按参数组合缓存在快照内"""
+        cache_key = (client_format, is_stream, global_conversion_enabled, skip_endpoint_check)
+        cached = self._compat_cache.get(cache_key)
+        if cached is None:
+            is_compatible, needs_conversion, _reason = is_format_compatible(
+                client_format,
+                self.signature,
+                getattr(self.endpoint, "format_acceptance_config", None),
+                is_stream,
+                global_conversion_enabled,
+                skip_endpoint_check=skip_endpoint_check,
+            )
+            cached = (is_compatible, needs_conversion)
+            self._compat_cache[cache_key] = cached
+        return cached
+
+
+@dataclass(frozen=True, slots=True)
+class RoutingModel:
+    """Provider 对某个 GlobalModel 的实现"""
+
+    supports_streaming: bool
+    # 端点签名 -> Provider 侧可用模型名（主名称 + 按 api_formats 过滤后的映射名）
+    model_names_by_signature: dict[str, frozenset[str]]
+
+
+@dataclass(frozen=True, slots=True)
+class RoutingProvider:
+    provider: Provider
+    id: str
+    name: str
+    priority: int
+    allows_conversion: bool
+    endpoints: tuple[RoutingEndpoint, ...]
+    models: dict[str, RoutingModel]
+    key_ids: frozenset[str]
+    _order_cache: dict[tuple[str, str], tuple[RoutingEndpoint, ...]] = field(
+        default_factory=dict, compare=False, repr=False
+    )
+
+    def ordered_endpoints(
+        self, client_family: str, client_kind: str
+    ) -> tuple[RoutingEndpoint, ...]:
+        """按客户端格式排序的端点（与 CacheAwareScheduler._build_candidates 的分组规则一致）
+
+        同 family+kind 优先，其次同 kind，再次同 family；chat/cli 可互相回退，其他 kind 不跨类。
+        """
+        cache_key = (client_family, client_kind)
+        cached = self._order_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        chat_like = {EndpointKind.CHAT.value, EndpointKind.CLI.value}
+        allowed_kinds = chat_like if client_kind in chat_like else {client_kind}
+        groups: tuple[list[RoutingEndpoint], ...] = ([], [], [], [])
+        for ep in self.endpoints:
+            if ep.kind not in allowed_kinds:
+                continue
+            same_family = ep.family == client_family
+            same_kind = ep.kind == client_kind
+            if same_kind and same_family:
+                groups[0].append(ep)
+            elif same_kind:
+                groups[1].append(ep)
+            elif same_family:
+                groups[2].append(ep)
+            else:
+                groups[3].append(ep)
+
+        ordered = tuple(
+            ep for group in groups for ep in sorted(group, key=lambda e: _family_priority(e.family))
+        )
+        self._order_cache[cache_key] = ordered
+        return ordered
+
+
+@dataclass(frozen=True, slots=True)
+class RoutingGlobalModel:
+    id: str
+    name: str
+    supported_capabilities: frozenset[str]
+    model_mappings: tuple[str, ...]
+
+
+@dataclass(frozen=True, slots=True)
+class RoutingSnapshot:
+    version: int
+    built_at: float
+    providers: tuple[RoutingProvider, ...]
+    global_models: dict[str, RoutingGlobalModel]
+    # GlobalModel.id -> 实现了该模型的 Provider（按 provider_priority 排序）
+    providers_by_model: dict[str, tuple[RoutingProvider, ...]]
+    # Key.id -> Provider.id（含未参与路由的停用 Key，用于按 Key 失效）
+    key_owner: dict[str, str]
+    # Key.id -> 参与路由的 Key 副本（用于判断熔断状态是否与快照一致）
+    routed_keys: dict[str, ProviderAPIKey]
+
+    def providers_for_model(self, global_model_id: str) -> tuple[RoutingProvider, ...]:
+        return self.providers_by_model.get(global_model_id, ())
+
+
+# ==================== 编译 ====================
+
+
+def _compile_model_names(model: Model, signature: str) -> frozenset[str]:
+    names: set[str] = {model.provider_model_name}
+    raw_mappings = model.provider_model_mappings
+    if isinstance(raw_mappings, list):
+        for raw in raw_mappings:
+            if not isinstance(raw, dict):
+                continue
+            name = raw.get("name")
+            if not isinstance(name, str) or not name.strip():
+                continue
+            mapping_api_formats = raw.get("api_formats")
+            if mapping_api_formats and isinstance(mapping_api_formats, list):
+                allowed = {str(fmt).strip().lower() for fmt in mapping_api_formats if fmt}
+                if signature not in allowed:
+                    continue
+            names.add(name.strip())
+    return frozenset(names)
+
+
+def compile_provider(provider: Provider) -> RoutingProvider:
+    """将已预加载 endpoints/api_keys/models 的 Provider 编译为路由条目"""
+    key_copies: dict[str, ProviderAPIKey] = {}
+    active_keys = [k for k in (provider.api_keys or []) if k.is_active]
+
+    endpoints: list[RoutingEndpoint] = []
+    for ep in provider.endpoints or []:
+        if not ep.is_active:
+            continue
+        raw_family = ep.api_family
+        raw_kind = ep.endpoint_kind
+        if not isinstance(raw_family, str) or not raw_family.strip():
+            continue
+        if not isinstance(raw_kind, str) or not raw_kind.strip():
+            continue
+        family = raw_family.strip().lower()
+        kind = raw_kind.strip().lower()
+        signature = make_signature_key(family, kind)
+
+        # api_formats=None 视为"全支持"（兼容历史数据）
+        keys: list[ProviderAPIKey] = []
+        for key in active_keys:
+            if key.api_formats is not None and signature not in key.api_formats:
+                continue
+            copy = key_copies.get(key.id)
+            if copy is None:
+                copy = key_copies[key.id] = detached_copy(key)
+            keys.append(copy)
+
+        endpoints.append(
+            RoutingEndpoint(
+                endpoint=detached_copy(ep),
+                signature=signature,
+                family=family,
+                kind=kind,
+                keys=tuple(keys),
+                keys_rotate=all((k.cache_ttl_minutes or 0) == 0 for k in keys),
+            )
+        )
+
+    signatures = {ep.signature for ep in endpoints}
+    models: dict[str, RoutingModel] = {}
+    for model in provider.models or []:
+        if not model.is_active or not model.global_model_id or model.global_model_id in models:
+            continue
+        models[model.global_model_id] = RoutingModel(
+            supports_streaming=bool(model.get_effective_supports_streaming()),
+            model_names_by_signature={sig: _compile_model_names(model, sig) for sig in signatures},
+        )
+
+    return RoutingProvider(
+        provider=detached_copy(provider),
+        id=str(provider.id),
+        name=str(provider.name),
+        priority=provider_priority(provider),
+        allows_conversion=bool(getattr(provider, "enable_format_conversion", True)),
+        endpoints=tuple(endpoints),
+        models=models,
+        key_ids=frozenset(str(k.id) for k in (provider.api_keys or [])),
+    )
+
+
+def provider_priority(provider: Provider) -> int:
+    """Provider 排序优先级（未设置时取默认值 100）"""
+    return int(provider.provider_priority if provider.provider_priority is not None else 100)
+
+
+def compile_global_model(global_model: GlobalModel) -> RoutingGlobalModel:
+    mappings = (global_model.config or {}).get("model_mappings") or []
+    return RoutingGlobalModel(
+        id=str(global_model.id),
+        name=str(global_model.name),
+        supported_capabilities=frozenset(global_model.supported_capabilities or []),
+        model_mappings=tuple(m for m in mappings if isinstance(m, str)),
+    )
+
+
+def _assemble(
+    version: int,
+    providers: list[RoutingProvider],
+    global_models: dict[str, RoutingGlobalModel],
+) -> RoutingSnapshot:
+    # 同优先级按 id 排序，保证快照与数据库回退路径的 Provider 顺序一致（分页依赖该顺序）
+    providers.sort(key=lambda rp: (rp.priority, rp.id))
+    by_model: dict[str, list[RoutingProvider]] = {}
+    key_owner: dict[str, str] = {}
+    routed_keys: dict[str, ProviderAPIKey] = {}
+    for rp in providers:
+        for gm_id in rp.models:
+            by_model.setdefault(gm_id, []).append(rp)
+        key_owner.update(dict.fromkeys(rp.key_ids, rp.id))
+        for ep in rp.endpoints:
+            routed_keys.update((k.id, k) for k in ep.keys)
+    return RoutingSnapshot(
+        version=version,
+        built_at=time.monotonic(),
+        providers=tuple(providers),
+        global_models=global_models,
+        providers_by_model={gm_id: tuple(rps) for gm_id, rps in by_model.items()},
+        key_owner=key_owner,
+        routed_keys=routed_keys,
+    )
+
+
+def _query_providers(db: Session, provider_ids: set[str] | None = None) -> list[Provider]:
+    query = (
+        db.query(Provider)
+        .options(
+            selectinload(Provider.api_keys),
+            selectinload(Provider.endpoints),
+            selectinload(Provider.models).selectinload(Model.global_model),
+        )
+        .filter(Provider.is_active == True)
+    )
+    if provider_ids is not None:
+        query = query.filter(Provider.id.in_(provider_ids))
+    return query.order_by(Provider.provider_priority.asc()).all()
+
+
+# ==================== 管理器 ====================
+
+
+class RoutingSnapshotManager:
+    """进程内路由快照的持有者
+
+    重建是同步的数据库读取（与原先每个请求的查询相同），单事件循环内不会并发重建。
+    """
+
+    def __init__(self) -> None:
+        self._snapshot: RoutingSnapshot | None = None
+        self._version = 0
+        self._dirty_providers: set[str] = set()
+        self._dirty_all = True
+
+    @property
+    def snapshot(self) -> RoutingSnapshot | None:
+        return self._snapshot
+
+    def invalidate_provider(self, provider_id: str | None) -> None:
+        if provider_id:
+            self._dirty_providers.add(str(provider_id))
+
+    def invalidate_key(self, key_id: str) -> None:
+        snapshot = self._snapshot
+        provider_id = snapshot.key_owner.get(key_id) if snapshot else None
+        if provider_id:
+            self._dirty_providers.add(provider_id)
+        else:
+            self._dirty_all = True
+
+    def invalidate_all(self) -> None:
+        self._dirty_all = True
+
+    def get(self, db: Session) -> RoutingSnapshot:
+        snapshot = self._snapshot
+        if (
+            snapshot is None
+            or self._dirty_all
+            or time.monotonic() - snapshot.built_at >= config.routing_snapshot_ttl_seconds
+        ):
+            return self._rebuild_full(db)
+        if self._dirty_providers:
+            return self._rebuild_providers(db, snapshot)
+        return snapshot
+
+    def _rebuild_full(self, db: Session) -> RoutingSnapshot:
+        start = time.perf_counter()
+        self._dirty_all = False
+        self._dirty_providers.clear()
+        providers = [compile_provider(p) for p in _query_providers(db)]
+        global_models = {
+            gm.name: compile_global_model(gm)
+            for gm in db.query(GlobalModel).filter(GlobalModel.is_active == True).all()
+        }
+        self._version += 1
+        snapshot = _assemble(self._version, providers, global_models)
+        self._snapshot = snapshot
+
+        elapsed = time.perf_counter() - start
+        routing_snapshot_rebuild_total.labels("full").inc()
+        routing_snapshot_build_seconds.labels("full").observe(elapsed)
+        logger.debug(
+            "[RoutingSnapshot] full rebuild v{}: providers={}, global_models={}, {:.1f}ms",
+            snapshot.version,
+            len(snapshot.providers),
+            len(global_models),
+            elapsed * 1000,
+        )
+        return snapshot
+
+    def _rebuild_providers(self, db: Session, base: RoutingSnapshot) -> RoutingSnapshot:
+        start = time.perf_counter()
+        dirty = set(self._dirty_providers)
+        self._dirty_providers.clear()
+        # 重新查询脏 Provider；查不到（已删除/停用）的直接移除
+        fresh = {p.id: compile_provider(p) for p in _query_providers(db, dirty)}
+        providers = [rp for rp in base.providers if rp.id not in dirty]
+        providers.extend(fresh.values())
+        self._version += 1
+        snapshot = _assemble(self._version, providers, base.global_models)
+        self._snapshot = snapshot
+
+        elapsed = time.perf_counter() - start
+        routing_snapshot_rebuild_total.labels("incremental").inc()
+        routing_snapshot_build_seconds.labels("incremental").observe(elapsed)
+        logger.debug(
+            "[RoutingSnapshot] incremental rebuild v{}: providers={}, {:.1f}ms",
+            snapshot.version,
+            len(dirty),
+            elapsed * 1000,
+        )
+        return snapshot
+
+
+_manager: RoutingSnapshotManager | None = None
+
+
+def get_routing_snapshot_manager() -> RoutingSnapshotManager:
+    global _manager
+    if _manager is None:
+        _manager = RoutingSnapshotManager()
+    return _manager
+
+
+def attach_to_session(db: Session, obj: Any, attached: dict[int, Any]) -> Any:
+    """将快照中的 detached 副本挂到请求 Session
+
+    Session 中已有同一行时直接复用；否则 merge(load=False)（不发 SQL），并 expire 高频写入列，
+    下游读取或回写这些列时按主键重新加载，避免用快照中的旧值覆盖其他进程的写入。
+    """
+    cached = attached.get(id(obj))
+    if cached is not None:
+        return cached
+    existing = db.identity_map.get(inspect(obj).key)
+    if existing is not None:
+        result = existing
+    else:
+        result = db.merge(obj, load=False)
+        volatile = _VOLATILE_COLUMNS.get(type(obj))
+        if volatile:
+            db.expire(result, list(volatile))
+    attached[id(obj)] = result
+    return result
+
+
+# ==================== 失效 ====================
+
+
+_SESSION_DIRTY_KEY = "routing_snapshot_dirty"
+_pending_broadcasts: set[asyncio.Task] = set()
+
+
+def _open_circuits(value: Any) -> frozenset[str]:
+    if not isinstance(value, dict):
+        return frozenset()
+    return frozenset(fmt for fmt, d in value.items() if isinstance(d, dict) and d.get("open"))
+
+
+def _has_routing_change(obj: Any) -> bool:
+    state = inspect(obj)
+    volatile = _VOLATILE_COLUMNS.get(type(obj), frozenset())
+    for attr in state.mapper.column_attrs:
+        history = state.attrs[attr.key].history
+        if not history.has_changes():
+            continue
+        if attr.key == "circuit_breaker_by_format":
+            # 与快照中的状态比较（候选 Key 的该列在挂到 Session 时已 expire，变更历史里可能没有旧值）
+            snapshot = get_routing_snapshot_manager().snapshot
+            routed = snapshot.routed_keys.get(obj.id) if snapshot else None
+            if routed is not None:
+                old = routed.circuit_breaker_by_format
+            else:
+                old = history.deleted[0] if history.deleted else None
+            new = history.added[0] if history.added else None
+            if _open_circuits(old) != _open_circuits(new):
+                return True
+            continue
+        if attr.key not in volatile:
+            return True
+    return False
+
+
+def _on_after_flush(session: Session, _flush_context: Any) -> None:
+    dirty: set[str] | None = None
+    for objs, check_columns in (
+        (session.new, False),
+        (session.deleted, False),
+        (session.dirty, True),
+    ):
+        for obj in objs:
+            if isinstance(obj, Provider):
+                provider_id = obj.id
+            elif isinstance(obj, (ProviderEndpoint, ProviderAPIKey, Model)):
+                provider_id = obj.provider_id
+            elif isinstance(obj, GlobalModel):
+                provider_id = "*"
+            else:
+                continue
+            if check_columns and not _has_routing_change(obj):
+                continue
+            if dirty is None:
+                dirty = session.info.setdefault(_SESSION_DIRTY_KEY, set())
+            dirty.add(str(provider_id))
+
+
+def _on_after_commit(session: Session) -> None:
+    dirty: set[str] | None = session.info.pop(_SESSION_DIRTY_KEY, None)
+    if not dirty:
+        return
+    apply_invalidation(dirty)
+    _broadcast(dirty)
+
+
+def _on_after_rollback(session: Session) -> None:
+    session.info.pop(_SESSION_DIRTY_KEY, None)
+
+
+def apply_invalidation(provider_ids: set[str] | list[str]) -> None:
+    """应用失效：'*' 表示全量重建"""
+    manager = get_routing_snapshot_manager()
+    for provider_id in provider_ids:
+        if provider_id == "*":
+            manager.invalidate_all()
+        else:
+            manager.invalidate_provider(provider_id)
+
+
+def _broadcast(provider_ids: set[str]) -> None:
+    """通过 CacheSyncService 通知其他实例（无 Redis 或不在事件循环内时跳过）"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+
+    async def _publish() -> None:
+        from src.clients.redis_client import get_redis_client_sync
+        from src.services.cache.sync import get_cache_sync_service
+
+        if get_redis_client_sync() is None:
+            return
+        sync = await get_cache_sync_service()
+        if sync is not None:
+            await sync.publish_routing_changed(sorted(provider_ids), origin=_INSTANCE_ID)
+
+    task = loop.create_task(_publish())
+    _pending_broadcasts.add(task)
+    task.add_done_callback(_pending_broadcasts.discard)
+
+
+async def handle_routing_invalidation(payload: dict[str, Any]) -> None:
+    """CacheSyncService 路由失效消息处理器"""
+    if payload.get("origin") == _INSTANCE_ID:
+        return
+    provider_ids = payload.get("provider_ids") or ["*"]
+    apply_invalidation(provider_ids)
+
+
+if not event.contains(Session, "after_flush", _on_after_flush):
+    event.listen(Session, "after_flush", _on_after_flush)
+    event.listen(Session, "after_commit", _on_after_commit)
+    event.listen(Session, "after_rollback", _on_after_rollback)
+
+
+__all__ = [
+    "RoutingEndpoint",
+    "RoutingGlobalModel",
+    "RoutingModel",
+    "RoutingProvider",
+    "RoutingSnapshot",
+    "RoutingSnapshotManager",
+    "apply_invalidation",
+    "attach_to_session",
+    "compile_global_model",
+    "compile_provider",
+    "get_routing_snapshot_manager",
+    "handle_routing_invalidation",
+]
@@ -7,6 +7,10 @@
 使用场景：
 1. 多实例部署时，确保所有实例的缓存一致性
 2. GlobalModel/Model 变更时，同步失效所有实例的缓存
+3. Provider/Endpoint/Key 配置变更时，通知所有实例增量重建路由快照
+4. 两级缓存（TieredCache）失效时，通知所有实例清理进程内 L1
+5. API Key/用户锁定、禁用、删除或额度耗尽时，通知所有实例清理认证缓存
+6. 计费价格配置变更时，广播新的价格版本号，各实例按版本重建价格快照
 """
 
 from __future__ import annotations
@@ -33,6 +37,10 @@ class CacheSyncService:
     CHANNEL_GLOBAL_MODEL = "cache:invalidate:global_model"
     CHANNEL_MODEL = "cache:invalidate:model"
     CHANNEL_CLEAR_ALL = "cache:invalidate:clear_all"
+    CHANNEL_ROUTING = "cache:invalidate:routing"
+    CHANNEL_TIERED = "cache:invalidate:tiered"
+    CHANNEL_CREDENTIAL = "cache:invalidate:credential"
+    CHANNEL_PRICING = "cache:invalidate:pricing"
 
     def __init__(self, redis_client: aioredis.Redis):
         """
@@ -61,6 +69,10 @@ class CacheSyncService:
                 self.CHANNEL_GLOBAL_MODEL,
                 self.CHANNEL_MODEL,
                 self.CHANNEL_CLEAR_ALL,
+                self.CHANNEL_ROUTING,
+                self.CHANNEL_TIERED,
+                self.CHANNEL_CREDENTIAL,
+                self.CHANNEL_PRICING,
             )
 
             # 启动监听任务
@@ -70,7 +82,8 @@ class CacheSyncService:
             logger.info(
                 "[CacheSync] 缓存同步服务已启动，订阅频道: "
                 f"{self.CHANNEL_GLOBAL_MODEL}, "
-                f"{self.CHANNEL_MODEL}, {self.CHANNEL_CLEAR_ALL}"
+                f"{self.CHANNEL_MODEL}, {self.CHANNEL_CLEAR_ALL}, {self.CHANNEL_ROUTING}, "
+                f"{self.CHANNEL_TIERED}, {self.CHANNEL_CREDENTIAL}, {self.CHANNEL_PRICING}"
             )
         except Exception as e:
             logger.error(f"[CacheSync] 启动失败: {e}")
@@ -153,6 +166,37 @@ class CacheSyncService:
         """发布清空所有缓存通知"""
         await self._publish(self.CHANNEL_CLEAR_ALL, {})
 
+    async def publish_routing_changed(self, provider_ids: list[str], origin: str) -> Any:
+        """发布路由配置变更通知（provider_ids 含 '*' 表示全量重建）"""
+        await self._publish(self.CHANNEL_ROUTING, {"provider_ids": provider_ids, "origin": origin})
+
+    async def publish_tiered_invalidation(
+        self, cache_name: str, keys: list[str], prefixes: list[str], origin: str
+    ) -> Any:
+        """发布两级缓存 L1 失效通知（cache_name 为 '*' 表示清理全部 L1）"""
+        await self._publish(
+            self.CHANNEL_TIERED,
+            {"cache": cache_name, "keys": keys, "prefixes": prefixes, "origin": origin},
+        )
+
+    async def publish_credential_invalidation(
+        self, key_ids: list[str], user_ids: list[str], origin: str, published_at: float
+    ) -> Any:
+        """发布认证缓存失效通知（key_ids 含 '*' 表示全量清理）"""
+        await self._publish(
+            self.CHANNEL_CREDENTIAL,
+            {
+                "key_ids": key_ids,
+                "user_ids": user_ids,
+                "origin": origin,
+                "published_at": published_at,
+            },
+        )
+
+    async def publish_pricing_version(self, version: int) -> Any:
+        """发布计费价格版本号（各实例快照版本落后时重建）"""
+        await self._publish(self.CHANNEL_PRICING, {"version": version})
+
     async def _publish(self, channel: str, data: dict) -> None:
         """发布消息到 Redis 频道"""
         try:
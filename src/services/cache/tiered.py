@@ -0,0 +1,412 @@
+"""
+两级缓存（L1 进程内 + L2 Redis）
+
+- L1：每个 worker 内的 LocalCache，TTL 较短；存放编码后的字节，命中时解码出独立副本，
+  调用方修改返回值不会污染其他请求
+- L2：Redis（经 CacheService，JSON 编码）；Redis 不可用时只使用 L1
+- 失效：删除 L2 与本地 L1 后，经 CacheSyncService.CHANNEL_TIERED 广播，
+  其他实例收到后只清理各自的 L1
+- 单飞加载：同一键的并发未命中（含 L2 查询）合并为一次加载，其余协程等待结果
+- 统计：各缓存的 L1/L2 命中、回源次数与加载耗时，按固定间隔上报到监控插件
+
+使用示例
+--------
+    _cache = TieredCache("model", ttl=CacheTTL.MODEL)
+    data = await _cache.get_or_load(f"model:id:{model_id}", load)
+    await _cache.invalidate(f"model:id:{model_id}")
+"""
+
+from __future__ import annotations
+
+import asyncio
+import inspect
+import time
+import uuid
+from collections.abc import Awaitable, Callable, Iterable
+from typing import Any, TypeVar
+
+from src.config.settings import config
+from src.core.cache_service import CacheService
+from src.core.logger import logger
+from src.services.cache.local import LocalCache
+from src.utils import json_codec
+
+# 实例标识：忽略自己发出的失效广播
+_INSTANCE_ID = uuid.uuid4().hex
+
+# 命中统计上报到监控插件的间隔（秒）
+_REPORT_INTERVAL_SECONDS = 10.0
+
+# 按名称登记的缓存实例，供失效广播与统计查询使用
+_registry: dict[str, TieredCache] = {}
+
+_pending_tasks: set[asyncio.Task] = set()
+
+T = TypeVar("T")
+
+
+class TieredCache:
+    """
+    两级缓存
+
+    值须可 JSON 序列化；None 表示未命中，需要缓存负结果时由调用方存入哨兵值
+    （如 "NOT_FOUND"）。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        ttl: int,
+        l1_ttl: int | None = None,
+        l1_max_size: int | None = None,
+    ):
+        """
+        Args:
+            name: 缓存名称（失效广播与统计的标识，需全局唯一）
+            ttl: L2 默认过期时间（秒）
+            l1_ttl: L1 过期时间（秒），默认取 TIERED_CACHE_L1_TTL_SECONDS，不超过 ttl
+            l1_max_size: L1 最大条目数，默认取 TIERED_CACHE_L1_MAX_SIZE
+        """
+        self.name = name
+        self.ttl = ttl
+        l1_ttl = min(ttl, config.tiered_cache_l1_ttl_seconds if l1_ttl is None else l1_ttl)
+        self._l1: LocalCache | None = None
+        if config.tiered_cache_l1_enabled and l1_ttl > 0:
+            self._l1 = LocalCache(
+                max_size=l1_max_size or config.tiered_cache_l1_max_size, default_ttl=l1_ttl
+            )
+
+        self._inflight: dict[str, asyncio.Future[Any]] = {}
+        # 每次失效递增；加载期间发生过失效时，加载结果不回填缓存
+        self._epoch = 0
+
+        self._stats: dict[str, float] = {
+            "l1_hits": 0,
+            "l2_hits": 0,
+            "loads": 0,
+            "coalesced": 0,
+            "load_errors": 0,
+            "load_seconds": 0.0,
+        }
+        self._reported: dict[str, float] = dict(self._stats)
+        self._last_report = time.monotonic()
+
+        _registry[name] = self
+
+    # ---------- 读取 ----------
+
+    async def get(self, key: str) -> Any | None:
+        """只读缓存（L1 -> L2），不触发加载"""
+        value = await self._get_l1(key)
+        if value is not None:
+            return value
+        value = await CacheService.get(key)
+        if value is not None:
+            self._stats["l2_hits"] += 1
+            await self._set_l1(key, value)
+        return value
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Any | Awaitable[Any]],
+        ttl: int | None = None,
+    ) -> Any | None:
+        """
+        读取缓存，未命中时调用 loader 加载并回填两级缓存
+
+        同一键的并发调用只有一个执行 L2 查询与 loader，其余等待其结果；
+        loader 返回 None 时不缓存。
+
+        Args:
+            key: 缓存键（同时作为 Redis 键）
+            loader: 加载函数（同步或异步），返回可 JSON 序列化的值
+            ttl: L2 过期时间（秒），默认使用构造时的 ttl
+        """
+        value = await self._get_l1(key)
+        if value is not None:
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self._stats["coalesced"] += 1
+            await asyncio.wait([future])
+            if future.cancelled():
+                # 领头协程被取消：由当前协程重新加载
+                return await self.get_or_load(key, loader, ttl)
+            return future.result()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._load(key, loader, ttl)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # 标记已读取，无等待者时不产生告警
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    async def get_or_load_object(
+        self,
+        key: str,
+        query: Callable[[], T | None],
+        dump: Callable[[T], Any],
+        restore: Callable[[Any], T],
+        ttl: int | None = None,
+    ) -> T | None:
+        """
+        ORM 对象的读穿缓存
+
+        由当前协程执行查询时直接返回 Session 中的对象；命中缓存或复用其他协程的
+        加载结果时，用 restore 从缓存值重建（分离的）对象。
+
+        Args:
+            key: 缓存键
+            query: 数据库查询（同步），未找到返回 None
+            dump: 对象 -> 可缓存的值
+            restore: 缓存值 -> 对象
+            ttl: L2 过期时间（秒）
+        """
+        loaded: list[T] = []
+
+        def load() -> Any | None:
+            obj = query()
+            if obj is None:
+                return None
+            loaded.append(obj)
+            return dump(obj)
+
+        data = await self.get_or_load(key, load, ttl)
+        if loaded:
+            return loaded[0]
+        return restore(data) if data is not None else None
+
+    async def _load(
+        self, key: str, loader: Callable[[], Any | Awaitable[Any]], ttl: int | None
+    ) -> Any | None:
+        epoch = self._epoch
+        value = await CacheService.get(key)
+        if value is not None:
+            self._stats["l2_hits"] += 1
+        else:
+            start = time.perf_counter()
+            try:
+                value = loader()
+                if inspect.isawaitable(value):
+                    value = await value
+            except Exception:
+                self._stats["load_errors"] += 1
+                raise
+            duration = time.perf_counter() - start
+            self._stats["loads"] += 1
+            self._stats["load_seconds"] += duration
+            _report_load(self.name, duration)
+            if value is None or epoch != self._epoch:
+                return value
+            await CacheService.set(key, value, ttl_seconds=ttl or self.ttl)
+
+        if epoch == self._epoch:
+            await self._set_l1(key, value)
+        return value
+
+    async def _get_l1(self, key: str) -> Any | None:
+        if self._l1 is None:
+            return None
+        raw = await self._l1.get(key)
+        if raw is None:
+            return None
+        self._stats["l1_hits"] += 1
+        now = time.monotonic()
+        if now - self._last_report >= _REPORT_INTERVAL_SECONDS:
+            self._last_report = now
+            self._report()
+        return json_codec.loads(raw)
+
+    async def _set_l1(self, key: str, value: Any) -> None:
+        if self._l1 is not None:
+            await self._l1.set(key, json_codec.dumpb(value))
+
+    # ---------- 写入与失效 ----------
+
+    async def set(self, key: str, value: Any, ttl: int | None = None) -> None:
+        """直接写入两级缓存"""
+        await CacheService.set(key, value, ttl_seconds=ttl or self.ttl)
+        await self._set_l1(key, value)
+
+    async def invalidate(self, *keys: str) -> None:
+        """删除指定键的两级缓存，并通知其他实例清理 L1"""
+        if not keys:
+            return
+        await self._drop_local(keys, ())
+        for key in keys:
+            await CacheService.delete(key)
+        await _broadcast(self.name, keys, ())
+
+    async def invalidate_prefix(self, prefix: str) -> int:
+        """删除指定前缀的两级缓存，并通知其他实例清理 L1；返回 L2 删除的键数"""
+        await self._drop_local((), (prefix,))
+        deleted = await CacheService.delete_pattern(f"{prefix}*")
+        await _broadcast(self.name, (), (prefix,))
+        return deleted
+
+    async def evict_local(self, keys: Iterable[str] = (), prefixes: Iterable[str] = ()) -> None:
+        """只清理所有实例的 L1（L2 已由调用方直接删除时使用）"""
+        keys, prefixes = tuple(keys), tuple(prefixes)
+        await self._drop_local(keys, prefixes)
+        await _broadcast(self.name, keys, prefixes)
+
+    async def _drop_local(self, keys: Iterable[str], prefixes: Iterable[str]) -> None:
+        self._epoch += 1
+        if self._l1 is None:
+            return
+        for key in keys:
+            await self._l1.delete(key)
+        for prefix in prefixes:
+            await self._l1.clear(f"{prefix}*")
+
+    async def _drop_all_local(self) -> None:
+        self._epoch += 1
+        if self._l1 is not None:
+            await self._l1.clear()
+
+    # ---------- 统计 ----------
+
+    def get_stats(self) -> dict[str, Any]:
+        """获取缓存统计信息"""
+        stats = self._stats
+        hits = stats["l1_hits"] + stats["l2_hits"]
+        lookups = hits + stats["loads"]
+        return {
+            "name": self.name,
+            "ttl": self.ttl,
+            "l1": self._l1.get_stats() if self._l1 is not None else None,
+            "l1_hits": int(stats["l1_hits"]),
+            "l2_hits": int(stats["l2_hits"]),
+            "loads": int(stats["loads"]),
+            "coalesced": int(stats["coalesced"]),
+            "load_errors": int(stats["load_errors"]),
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "avg_load_ms": (
+                stats["load_seconds"] / stats["loads"] * 1000 if stats["loads"] else 0.0
+            ),
+            "inflight": len(self._inflight),
+        }
+
+    def _report(self) -> None:
+        """把上次上报以来的命中/回源增量与当前命中率推送到监控插件"""
+        plugin = _get_monitor_plugin()
+        if plugin is None:
+            return
+        stats, reported = self._stats, self._reported
+        for result, field in (
+            ("l1_hit", "l1_hits"),
+            ("l2_hit", "l2_hits"),
+            ("load", "loads"),
+            ("coalesced", "coalesced"),
+        ):
+            delta = stats[field] - reported[field]
+            if delta > 0:
+                _spawn(
+                    plugin.increment(
+                        "tiered_cache_requests_total",
+                        value=delta,
+                        labels={"cache": self.name, "result": result},
+                    )
+                )
+        self._reported = dict(stats)
+        _spawn(
+            plugin.gauge(
+                "tiered_cache_hit_ratio", self.get_stats()["hit_rate"], labels={"cache": self.name}
+            )
+        )
+
+
+def _get_monitor_plugin() -> Any | None:
+    try:
+        from src.plugins.manager import get_plugin_manager
+
+        plugin = get_plugin_manager().get_plugin("monitor")
+    except Exception:
+        return None
+    if plugin and getattr(plugin, "enabled", True):
+        return plugin
+    return None
+
+
+def _spawn(coro: Awaitable[Any]) -> None:
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        coro.close()  # type: ignore[attr-defined]
+        return
+    task = loop.create_task(coro)  # type: ignore[arg-type]
+    _pending_tasks.add(task)
+    task.add_done_callback(_pending_tasks.discard)
+
+
+def _report_load(name: str, duration: float) -> None:
+    plugin = _get_monitor_plugin()
+    if plugin is not None:
+        _spawn(plugin.timing("tiered_cache_load", duration, labels={"cache": name}))
+
+
+async def _broadcast(name: str, keys: Iterable[str], prefixes: Iterable[str]) -> None:
+    """通过 CacheSyncService 通知其他实例（无 Redis 时跳过）"""
+    from src.clients.redis_client import get_redis_client_sync
+    from src.services.cache.sync import get_cache_sync_service
+
+    if get_redis_client_sync() is None:
+        return
+    sync = await get_cache_sync_service()
+    if sync is not None:
+        await sync.publish_tiered_invalidation(
+            name, list(keys), list(prefixes), origin=_INSTANCE_ID
+        )
+
+
+async def evict_all_local() -> None:
+    """清理所有两级缓存在各实例上的 L1（管理员直接清理 Redis 后使用）"""
+    for cache in _registry.values():
+        await cache._drop_all_local()
+    await _broadcast("*", (), ())
+
+
+async def handle_tiered_invalidation(payload: dict[str, Any]) -> None:
+    """CacheSyncService 两级缓存失效消息处理器"""
+    if payload.get("origin") == _INSTANCE_ID:
+        return
+    name = payload.get("cache")
+    if name == "*":
+        for cache in _registry.values():
+            await cache._drop_all_local()
+        return
+    cache = _registry.get(name or "")
+    if cache is None:
+        return
+    keys = payload.get("keys") or []
+    prefixes = payload.get("prefixes") or []
+    if not keys and not prefixes:
+        await cache._drop_all_local()
+    else:
+        await cache._drop_local(keys, prefixes)
+    logger.debug(f"[TieredCache] 收到失效广播: {name} keys={len(keys)} prefixes={prefixes}")
+
+
+def get_tiered_cache_stats() -> dict[str, dict[str, Any]]:
+    """获取所有两级缓存的统计信息"""
+    return {name: cache.get_stats() for name, cache in _registry.items()}
+
+
+__all__ = [
+    "TieredCache",
+    "evict_all_local",
+    "get_tiered_cache_stats",
+    "handle_tiered_invalidation",
+]
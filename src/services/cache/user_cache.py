@@ -4,7 +4,7 @@
 架构说明
 ========
 本服务采用混合 async/sync 模式：
-- 缓存操作（CacheService）：真正的 async，使用 aioredis
+- 缓存操作（TieredCache）：进程内 L1 + Redis L2，并发未命中合并为一次加载
 - 数据库查询（db.query）：同步的 SQLAlchemy Session
 
 设计决策
@@ -26,9 +26,12 @@ from typing import Any
 from sqlalchemy.orm import Session
 
 from src.config.constants import CacheTTL
-from src.core.cache_service import CacheKeys, CacheService
+from src.core.cache_service import CacheKeys
 from src.core.logger import logger
 from src.models.database import User
+from src.services.cache.tiered import TieredCache
+
+_cache = TieredCache("user", ttl=CacheTTL.USER)
 
 
 class UserCacheService:
@@ -53,25 +56,12 @@ class UserCacheService:
         Returns:
             User 对象或 None
         """
-        cache_key = CacheKeys.user_by_id(user_id)
-
-        # 1. 尝试从缓存获取
-        cached_data = await CacheService.get(cache_key)
-        if cached_data:
-            logger.debug(f"用户缓存命中: {user_id}")
-            # 从缓存数据重建 User 对象
-            return UserCacheService._dict_to_user(db, cached_data)
-
-        # 2. 缓存未命中，查询数据库
-        user = db.query(User).filter(User.id == user_id).first()
-
-        # 3. 写入缓存
-        if user:
-            user_dict = UserCacheService._user_to_dict(user)
-            await CacheService.set(cache_key, user_dict, ttl_seconds=UserCacheService.CACHE_TTL)
-            logger.debug(f"用户已缓存: {user_id}")
-
-        return user
+        return await _cache.get_or_load_object(
+            CacheKeys.user_by_id(user_id),
+            lambda: db.query(User).filter(User.id == user_id).first(),
+            UserCacheService._user_to_dict,
+            lambda data: UserCacheService._dict_to_user(db, data),
+        )
 
     @staticmethod
     async def get_user_by_email(db: Session, email: str) -> User | None:
@@ -85,24 +75,12 @@ class UserCacheService:
         Returns:
             User 对象或 None
         """
-        cache_key = CacheKeys.user_by_email(email)
-
-        # 1. 尝试从缓存获取
-        cached_data = await CacheService.get(cache_key)
-        if cached_data:
-            logger.debug(f"用户缓存命中(邮箱): {email}")
-            return UserCacheService._dict_to_user(db, cached_data)
-
-        # 2. 缓存未命中，查询数据库
-        user = db.query(User).filter(User.email == email).first()
-
-        # 3. 写入缓存
-        if user:
-            user_dict = UserCacheService._user_to_dict(user)
-            await CacheService.set(cache_key, user_dict, ttl_seconds=UserCacheService.CACHE_TTL)
-            logger.debug(f"用户已缓存(邮箱): {email}")
-
-        return user
+        return await _cache.get_or_load_object(
+            CacheKeys.user_by_email(email),
+            lambda: db.query(User).filter(User.email == email).first(),
+            UserCacheService._user_to_dict,
+            lambda data: UserCacheService._dict_to_user(db, data),
+        )
 
     @staticmethod
     async def invalidate_user_cache(user_id: str, email: str | None = None) -> Any:
@@ -113,12 +91,10 @@ class UserCacheService:
             user_id: 用户ID
             email: 用户邮箱（可选）
         """
-        # 删除 ID 缓存
-        await CacheService.delete(CacheKeys.user_by_id(user_id))
-
-        # 删除邮箱缓存
+        keys = [CacheKeys.user_by_id(user_id)]
         if email:
-            await CacheService.delete(CacheKeys.user_by_email(email))
+            keys.append(CacheKeys.user_by_email(email))
+        await _cache.invalidate(*keys)
 
         logger.debug(f"用户缓存已清除: {user_id}")
 
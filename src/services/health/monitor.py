@@ -10,12 +10,17 @@
 数据结构：
 - health_by_format: {"CLAUDE": {"health_score": 1.0, "consecutive_failures": 0, ...}, ...}
 - circuit_breaker_by_format: {"CLAUDE": {"open": false, "open_at": null, ...}, ...}
+
+运行时状态保存在 state_store（进程内 + 可选 Redis 镜像），上面两个 JSON 列只接收
+熔断器状态切换与定期快照，请求路径上的查询不依赖 ORM 对象。
 """
 
 from __future__ import annotations
 
+import asyncio
 import os
-from datetime import datetime, timedelta, timezone
+import time
+from datetime import datetime, timezone
 from typing import Any
 
 from sqlalchemy import case, func
@@ -26,6 +31,12 @@ from src.core.batch_committer import get_batch_committer
 from src.core.logger import logger
 from src.core.metrics import health_open_circuits
 from src.models.database import ProviderAPIKey, ProviderEndpoint
+from src.services.health.state_store import (
+    FormatHealthState,
+    KeyHealthState,
+    get_health_redis_client,
+    health_state_store,
+)
 
 
 class CircuitState:
@@ -123,38 +134,107 @@ class HealthMonitor:
     # 进程级别状态缓存
     _circuit_history: list[dict[str, Any]] = []
     _open_circuit_keys: int = 0
+    _pending_mirrors: set[asyncio.Task] = set()
 
-    # ==================== 数据访问辅助方法 ====================
+    # ==================== 状态访问辅助方法 ====================
 
     @classmethod
-    def _get_health_data(cls, key: ProviderAPIKey, api_format: str) -> dict[str, Any]:
-        """获取指定格式的健康度数据，不存在则返回默认值"""
-        health_by_format = key.health_by_format or {}
-        if api_format not in health_by_format:
-            return _default_health_data()
-        return health_by_format[api_format]
+    def _resolve_state(
+        cls, db: Session, key_id: str, api_format: str | None, caller: str
+    ) -> tuple[KeyHealthState, str] | None:
+        """获取 Key 的内存状态（首次访问时从数据库加载）及生效的 API 格式"""
+        key_state = health_state_store.get(key_id)
+        if key_state is None:
+            key = db.get(ProviderAPIKey, key_id)
+            if not key:
+                return None
+            key_state = health_state_store.hydrate(key)
+
+        # api_format 兼容处理：如果未提供，尝试使用 Key 的第一个格式
+        if api_format:
+            return key_state, api_format
+        if key_state.default_format:
+            logger.debug(f"{caller}: api_format 未提供，使用默认格式 {key_state.default_format}")
+            return key_state, key_state.default_format
+        logger.warning(f"{caller}: api_format 未提供且 Key 无可用格式: key_id={key_id[:8]}...")
+        return None
 
     @classmethod
-    def _set_health_data(cls, key: ProviderAPIKey, api_format: str, data: dict[str, Any]) -> None:
-        """设置指定格式的健康度数据"""
-        health_by_format = dict(key.health_by_format or {})
-        health_by_format[api_format] = data
-        key.health_by_format = health_by_format  # type: ignore[assignment]
+    def _format_states(cls, resource: ProviderAPIKey | str) -> dict[str, FormatHealthState]:
+        """只读视图：优先使用内存状态；未跟踪的 Key 从 ORM 对象的 JSON 列解析（不写入内存表）"""
+        key_id = resource if isinstance(resource, str) else resource.id
+        key_state = health_state_store.get(key_id)
+        if key_state is not None:
+            return key_state.formats
+        if isinstance(resource, str):
+            return {}
+        health_by_format = resource.health_by_format or {}
+        circuit_by_format = resource.circuit_breaker_by_format or {}
+        return {
+            fmt: FormatHealthState.from_json(health_by_format.get(fmt), circuit_by_format.get(fmt))
+            for fmt in set(health_by_format) | set(circuit_by_format)
+        }
 
     @classmethod
-    def _get_circuit_data(cls, key: ProviderAPIKey, api_format: str) -> dict[str, Any]:
-        """获取指定格式的熔断器数据，不存在则返回默认值"""
-        circuit_by_format = key.circuit_breaker_by_format or {}
-        if api_format not in circuit_by_format:
-            return _default_circuit_data()
-        return circuit_by_format[api_format]
+    def _format_state(
+        cls, resource: ProviderAPIKey | str, api_format: str
+    ) -> FormatHealthState | None:
+        key_id = resource if isinstance(resource, str) else resource.id
+        key_state = health_state_store.get(key_id)
+        if key_state is not None:
+            return key_state.formats.get(api_format)
+        if isinstance(resource, str):
+            return None
+        circuit = (resource.circuit_breaker_by_format or {}).get(api_format)
+        health = (resource.health_by_format or {}).get(api_format)
+        if circuit is None and health is None:
+            return None
+        return FormatHealthState.from_json(health, circuit)
 
     @classmethod
-    def _set_circuit_data(cls, key: ProviderAPIKey, api_format: str, data: dict[str, Any]) -> None:
-        """设置指定格式的熔断器数据"""
-        circuit_by_format = dict(key.circuit_breaker_by_format or {})
-        circuit_by_format[api_format] = data
-        key.circuit_breaker_by_format = circuit_by_format  # type: ignore[assignment]
+    def _persist_transition(
+        cls, db: Session, key_id: str, api_format: str, key_state: KeyHealthState
+    ) -> None:
+        """熔断器状态切换：立即写回数据库，并镜像到 Redis"""
+        key = db.get(ProviderAPIKey, key_id)
+        if key is not None:
+            key.health_by_format = {  # type: ignore[assignment]
+                fmt: s.health_json() for fmt, s in key_state.formats.items()
+            }
+            key.circuit_breaker_by_format = {  # type: ignore[assignment]
+                fmt: s.circuit_json() for fmt, s in key_state.formats.items()
+            }
+            db.flush()
+            get_batch_committer().mark_dirty(db)
+        cls._mirror_circuit(key_id, api_format, key_state.format_state(api_format))
+
+    @classmethod
+    def _mirror_circuit(
+        cls, key_id: str, api_format: str, state: FormatHealthState, force: bool = False
+    ) -> None:
+        """后台写入 Redis 镜像（未启用 Redis 或不在事件循环内时跳过）"""
+        redis_client = get_health_redis_client()
+        if redis_client is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+
+        async def _publish() -> None:
+            try:
+                if force:
+                    await health_state_store.force_circuit(redis_client, key_id, api_format, state)
+                else:
+                    await health_state_store.publish_circuit(
+                        redis_client, key_id, api_format, state
+                    )
+            except Exception as e:
+                logger.warning(f"[HealthState] 熔断状态同步到 Redis 失败: {e}")
+
+        task = loop.create_task(_publish())
+        cls._pending_mirrors.add(task)
+        task.add_done_callback(cls._pending_mirrors.discard)
 
     # ==================== 核心方法 ====================
 
@@ -177,107 +257,82 @@ class HealthMonitor:
         Note:
             api_format 在逻辑上是必需的，但为了向后兼容保持 Optional 签名。
             如果未提供，会尝试从 Key 的 api_formats 中获取第一个格式作为 fallback。
+            只更新内存状态；仅熔断器状态切换时写数据库，其余由 HealthStateFlusher 定期写入。
         """
         try:
             if not key_id:
                 return
 
-            key = db.query(ProviderAPIKey).filter(ProviderAPIKey.id == key_id).first()
-            if not key:
+            resolved = cls._resolve_state(db, key_id, api_format, "record_success")
+            if resolved is None:
                 return
-
-            # api_format 兼容处理：如果未提供，尝试使用 Key 的第一个格式
-            effective_api_format = api_format
-            if not effective_api_format:
-                if key.api_formats and len(key.api_formats) > 0:
-                    effective_api_format = key.api_formats[0]
-                    logger.debug(
-                        f"record_success: api_format 未提供，使用默认格式 {effective_api_format}"
-                    )
-                else:
-                    logger.warning(
-                        f"record_success: api_format 未提供且 Key 无可用格式: key_id={key_id[:8]}..."
-                    )
-                    return
+            key_state, effective_api_format = resolved
+            state = key_state.format_state(effective_api_format)
 
             now = datetime.now(timezone.utc)
             now_ts = now.timestamp()
 
-            # 获取当前格式的健康度数据
-            health_data = cls._get_health_data(key, effective_api_format)
-            circuit_data = cls._get_circuit_data(key, effective_api_format)
-
             # 1. 更新滑动窗口
-            window = health_data.get("request_results_window") or []
-            window.append({"ts": now_ts, "ok": True})
-            cutoff_ts = now_ts - cls.WINDOW_SECONDS
-            window = [r for r in window if r["ts"] > cutoff_ts]
-            if len(window) > cls.WINDOW_SIZE:
-                window = window[-cls.WINDOW_SIZE :]
-            health_data["request_results_window"] = window
+            state.push(now_ts, True, now_ts - cls.WINDOW_SECONDS)
 
             # 2. 更新健康度（用于展示）
-            current_score = float(health_data.get("health_score") or 0)
-            new_score = min(current_score + cls.SUCCESS_INCREMENT, 1.0)
-            health_data["health_score"] = new_score
+            state.health_score = min(state.health_score + cls.SUCCESS_INCREMENT, 1.0)
 
             # 3. 更新统计
-            health_data["consecutive_failures"] = 0
-            health_data["last_failure_at"] = None
+            state.consecutive_failures = 0
+            state.last_failure_at = None
 
             # 4. 处理熔断器状态
-            state = cls._get_circuit_state_from_data(circuit_data, now)
+            circuit_state = cls._get_circuit_state(state, now_ts)
+            transitioned = False
 
-            if state == CircuitState.HALF_OPEN:
+            if circuit_state == CircuitState.HALF_OPEN:
                 # 半开状态：记录成功
-                circuit_data["half_open_successes"] = (
-                    int(circuit_data.get("half_open_successes") or 0) + 1
-                )
+                state.half_open_successes += 1
 
-                if circuit_data["half_open_successes"] >= cls.HALF_OPEN_SUCCESS_THRESHOLD:
+                if state.half_open_successes >= cls.HALF_OPEN_SUCCESS_THRESHOLD:
                     # 达到成功阈值，关闭熔断器
-                    cls._close_circuit_data(circuit_data, health_data, reason="半开状态验证成功")
+                    cls._close_circuit(state)
+                    transitioned = True
                     cls._push_circuit_event(
                         {
                             "event": "closed",
-                            "key_id": key.id,
+                            "key_id": key_id,
                             "api_format": effective_api_format,
                             "reason": "半开状态验证成功",
                             "timestamp": now.isoformat(),
                         }
                     )
                     logger.info(
-                        f"[CLOSED] Key 熔断器关闭: {key.id[:8]}.../{effective_api_format} | 原因: 半开状态验证成功"
+                        f"[CLOSED] Key 熔断器关闭: {key_id[:8]}.../{effective_api_format} | 原因: 半开状态验证成功"
                     )
 
-            elif state == CircuitState.OPEN:
+            elif circuit_state == CircuitState.OPEN:
                 # 打开状态下的成功（探测成功），进入半开状态
-                cls._enter_half_open_data(circuit_data, now)
+                cls._enter_half_open(state, now_ts)
+                transitioned = True
                 cls._push_circuit_event(
                     {
                         "event": "half_open",
-                        "key_id": key.id,
+                        "key_id": key_id,
                         "api_format": effective_api_format,
                         "timestamp": now.isoformat(),
                     }
                 )
                 logger.info(
-                    f"[HALF-OPEN] Key 进入半开状态: {key.id[:8]}.../{effective_api_format} | "
+                    f"[HALF-OPEN] Key 进入半开状态: {key_id[:8]}.../{effective_api_format} | "
                     f"需要 {cls.HALF_OPEN_SUCCESS_THRESHOLD} 次成功关闭熔断器"
                 )
 
-            # 保存数据
-            cls._set_health_data(key, effective_api_format, health_data)
-            cls._set_circuit_data(key, effective_api_format, circuit_data)
-
-            # 更新全局统计
-            key.success_count = int(key.success_count or 0) + 1  # type: ignore[assignment]
-            key.request_count = int(key.request_count or 0) + 1  # type: ignore[assignment]
+            # 5. 累计全局统计（定期以增量写入数据库）
+            key_state.request_delta += 1
+            key_state.success_delta += 1
             if response_time_ms:
-                key.total_response_time_ms = int(key.total_response_time_ms or 0) + response_time_ms  # type: ignore[assignment]
+                key_state.response_time_delta += response_time_ms
+            health_state_store.mark_dirty(key_id)
 
-            db.flush()
-            get_batch_committer().mark_dirty(db)
+            if transitioned:
+                cls._persist_transition(db, key_id, effective_api_format, key_state)
 
         except Exception as e:
             logger.error(f"记录成功请求失败: {e}")
@@ -302,77 +357,50 @@ class HealthMonitor:
         Note:
             api_format 在逻辑上是必需的，但为了向后兼容保持 Optional 签名。
             如果未提供，会尝试从 Key 的 api_formats 中获取第一个格式作为 fallback。
+            只更新内存状态；仅熔断器状态切换时写数据库，其余由 HealthStateFlusher 定期写入。
         """
         try:
             if not key_id:
                 return
 
-            key = db.query(ProviderAPIKey).filter(ProviderAPIKey.id == key_id).first()
-            if not key:
+            resolved = cls._resolve_state(db, key_id, api_format, "record_failure")
+            if resolved is None:
                 return
-
-            # api_format 兼容处理：如果未提供，尝试使用 Key 的第一个格式
-            effective_api_format = api_format
-            if not effective_api_format:
-                if key.api_formats and len(key.api_formats) > 0:
-                    effective_api_format = key.api_formats[0]
-                    logger.debug(
-                        f"record_failure: api_format 未提供，使用默认格式 {effective_api_format}"
-                    )
-                else:
-                    logger.warning(
-                        f"record_failure: api_format 未提供且 Key 无可用格式: key_id={key_id[:8]}..."
-                    )
-                    return
+            key_state, effective_api_format = resolved
+            state = key_state.format_state(effective_api_format)
 
             now = datetime.now(timezone.utc)
             now_ts = now.timestamp()
-
-            # 获取当前格式的健康度数据
-            health_data = cls._get_health_data(key, effective_api_format)
-            circuit_data = cls._get_circuit_data(key, effective_api_format)
+            cutoff_ts = now_ts - cls.WINDOW_SECONDS
 
             # 1. 更新滑动窗口
-            window = health_data.get("request_results_window") or []
-            window.append({"ts": now_ts, "ok": False})
-            cutoff_ts = now_ts - cls.WINDOW_SECONDS
-            window = [r for r in window if r["ts"] > cutoff_ts]
-            if len(window) > cls.WINDOW_SIZE:
-                window = window[-cls.WINDOW_SIZE :]
-            health_data["request_results_window"] = window
+            state.push(now_ts, False, cutoff_ts)
 
             # 2. 更新健康度（用于展示）
-            current_score = float(health_data.get("health_score") or 1)
-            new_score = max(current_score - cls.FAILURE_DECREMENT, 0.0)
-            health_data["health_score"] = new_score
+            state.health_score = max(state.health_score - cls.FAILURE_DECREMENT, 0.0)
 
             # 3. 更新统计
-            health_data["consecutive_failures"] = (
-                int(health_data.get("consecutive_failures") or 0) + 1
-            )
-            health_data["last_failure_at"] = now.isoformat()
+            state.consecutive_failures += 1
+            state.last_failure_at = now_ts
 
             # 4. 处理熔断器状态
-            state = cls._get_circuit_state_from_data(circuit_data, now)
+            circuit_state = cls._get_circuit_state(state, now_ts)
+            transitioned = False
 
-            if state == CircuitState.HALF_OPEN:
+            if circuit_state == CircuitState.HALF_OPEN:
                 # 半开状态：记录失败
-                circuit_data["half_open_failures"] = (
-                    int(circuit_data.get("half_open_failures") or 0) + 1
-                )
+                state.half_open_failures += 1
 
-                if circuit_data["half_open_failures"] >= cls.HALF_OPEN_FAILURE_THRESHOLD:
+                if state.half_open_failures >= cls.HALF_OPEN_FAILURE_THRESHOLD:
                     # 达到失败阈值，重新打开熔断器
                     # 注意：半开状态本身就是打开状态的子状态，不需要增加计数
-                    consecutive = int(health_data.get("consecutive_failures") or 0)
-                    recovery_seconds = cls._calculate_recovery_seconds(consecutive)
-                    cls._open_circuit_data(
-                        circuit_data, now, recovery_seconds, reason="半开状态验证失败"
-                    )
+                    recovery_seconds = cls._calculate_recovery_seconds(state.consecutive_failures)
+                    cls._open_circuit(state, now_ts, recovery_seconds)
+                    transitioned = True
                     cls._push_circuit_event(
                         {
                             "event": "opened",
-                            "key_id": key.id,
+                            "key_id": key_id,
                             "api_format": effective_api_format,
                             "reason": "半开状态验证失败",
                             "recovery_seconds": recovery_seconds,
@@ -380,25 +408,26 @@ class HealthMonitor:
                         }
                     )
                     logger.warning(
-                        f"[OPEN] Key 熔断器打开: {key.id[:8]}.../{effective_api_format} | 原因: 半开状态验证失败 | "
+                        f"[OPEN] Key 熔断器打开: {key_id[:8]}.../{effective_api_format} | 原因: 半开状态验证失败 | "
                         f"{recovery_seconds}秒后进入半开状态"
                     )
 
-            elif state == CircuitState.CLOSED:
+            elif circuit_state == CircuitState.CLOSED:
                 # 关闭状态：检查是否需要打开熔断器
-                error_rate = cls._calculate_error_rate_from_window(window, now_ts)
+                window_size, failures = state.window_stats(cutoff_ts)
+                error_rate = failures / window_size if window_size else 0.0
 
-                if len(window) >= cls.MIN_REQUESTS and error_rate >= cls.ERROR_RATE_THRESHOLD:
-                    consecutive = int(health_data.get("consecutive_failures") or 0)
-                    recovery_seconds = cls._calculate_recovery_seconds(consecutive)
+                if window_size >= cls.MIN_REQUESTS and error_rate >= cls.ERROR_RATE_THRESHOLD:
+                    recovery_seconds = cls._calculate_recovery_seconds(state.consecutive_failures)
                     reason = f"错误率 {error_rate:.0%} 超过阈值 {cls.ERROR_RATE_THRESHOLD:.0%}"
-                    cls._open_circuit_data(circuit_data, now, recovery_seconds, reason=reason)
+                    cls._open_circuit(state, now_ts, recovery_seconds)
+                    transitioned = True
                     cls._open_circuit_keys += 1
                     health_open_circuits.set(cls._open_circuit_keys)
                     cls._push_circuit_event(
                         {
                             "event": "opened",
-                            "key_id": key.id,
+                            "key_id": key_id,
                             "api_format": effective_api_format,
                             "reason": reason,
                             "recovery_seconds": recovery_seconds,
@@ -406,114 +435,70 @@ class HealthMonitor:
                         }
                     )
                     logger.warning(
-                        f"[OPEN] Key 熔断器打开: {key.id[:8]}.../{effective_api_format} | 原因: {reason} | "
+                        f"[OPEN] Key 熔断器打开: {key_id[:8]}.../{effective_api_format} | 原因: {reason} | "
                         f"{recovery_seconds}秒后进入半开状态"
                     )
 
-            # 保存数据
-            cls._set_health_data(key, effective_api_format, health_data)
-            cls._set_circuit_data(key, effective_api_format, circuit_data)
-
-            # 更新全局统计
-            key.error_count = int(key.error_count or 0) + 1  # type: ignore[assignment]
-            key.request_count = int(key.request_count or 0) + 1  # type: ignore[assignment]
-            key.last_error_at = now  # type: ignore[assignment]
+            # 5. 累计全局统计（定期以增量写入数据库）
+            key_state.error_delta += 1
+            key_state.request_delta += 1
+            key_state.last_error_at = now
+            health_state_store.mark_dirty(key_id)
 
             logger.debug(
-                f"[WARN] Key 健康度下降: {key_id[:8]}.../{effective_api_format} -> {new_score:.2f} "
-                f"(连续失败 {health_data['consecutive_failures']} 次, error_type={error_type})"
+                f"[WARN] Key 健康度下降: {key_id[:8]}.../{effective_api_format} -> {state.health_score:.2f} "
+                f"(连续失败 {state.consecutive_failures} 次, error_type={error_type})"
             )
 
-            db.flush()
-            get_batch_committer().mark_dirty(db)
+            if transitioned:
+                cls._persist_transition(db, key_id, effective_api_format, key_state)
 
         except Exception as e:
             logger.error(f"记录失败请求失败: {e}")
             db.rollback()
 
-    # ==================== 滑动窗口方法 ====================
-
-    @classmethod
-    def _calculate_error_rate_from_window(
-        cls, window: list[dict[str, Any]], now_ts: float
-    ) -> float:
-        """从窗口数据计算错误率"""
-        if not window:
-            return 0.0
-
-        cutoff_ts = now_ts - cls.WINDOW_SECONDS
-        valid_records = [r for r in window if r["ts"] > cutoff_ts]
-
-        if not valid_records:
-            return 0.0
-
-        failures = sum(1 for r in valid_records if not r["ok"])
-        return failures / len(valid_records)
-
-    # ==================== 熔断器状态方法（操作数据字典）====================
+    # ==================== 熔断器状态方法 ====================
 
     @classmethod
-    def _get_circuit_state_from_data(cls, circuit_data: dict[str, Any], now: datetime) -> str:
-        """从数据字典获取当前熔断器状态"""
-        if not circuit_data.get("open"):
+    def _get_circuit_state(cls, state: FormatHealthState, now_ts: float) -> str:
+        """获取当前熔断器状态"""
+        if not state.open:
             return CircuitState.CLOSED
 
         # 检查是否在半开状态
-        half_open_until_str = circuit_data.get("half_open_until")
-        if half_open_until_str:
-            half_open_until = datetime.fromisoformat(half_open_until_str)
-            if now < half_open_until:
-                return CircuitState.HALF_OPEN
+        if state.half_open_until is not None and now_ts < state.half_open_until:
+            return CircuitState.HALF_OPEN
 
         # 检查是否到了探测时间（进入半开）
-        next_probe_str = circuit_data.get("next_probe_at")
-        if next_probe_str:
-            next_probe_at = datetime.fromisoformat(next_probe_str)
-            if now >= next_probe_at:
-                return CircuitState.HALF_OPEN
+        if state.next_probe_at is not None and now_ts >= state.next_probe_at:
+            return CircuitState.HALF_OPEN
 
         return CircuitState.OPEN
 
     @classmethod
-    def _open_circuit_data(
-        cls,
-        circuit_data: dict[str, Any],
-        now: datetime,
-        recovery_seconds: int,
-        reason: str,
-    ) -> None:
-        """打开熔断器（操作数据字典）"""
-        circuit_data["open"] = True
-        circuit_data["open_at"] = now.isoformat()
-        circuit_data["half_open_until"] = None
-        circuit_data["half_open_successes"] = 0
-        circuit_data["half_open_failures"] = 0
-        circuit_data["next_probe_at"] = (now + timedelta(seconds=recovery_seconds)).isoformat()
+    def _open_circuit(cls, state: FormatHealthState, now_ts: float, recovery_seconds: int) -> None:
+        """打开熔断器"""
+        state.open = True
+        state.open_at = now_ts
+        state.half_open_until = None
+        state.half_open_successes = 0
+        state.half_open_failures = 0
+        state.next_probe_at = now_ts + recovery_seconds
 
     @classmethod
-    def _enter_half_open_data(cls, circuit_data: dict[str, Any], now: datetime) -> None:
-        """进入半开状态（操作数据字典）"""
-        circuit_data["half_open_until"] = (
-            now + timedelta(seconds=cls.HALF_OPEN_DURATION)
-        ).isoformat()
-        circuit_data["half_open_successes"] = 0
-        circuit_data["half_open_failures"] = 0
+    def _enter_half_open(cls, state: FormatHealthState, now_ts: float) -> None:
+        """进入半开状态"""
+        state.half_open_until = now_ts + cls.HALF_OPEN_DURATION
+        state.half_open_successes = 0
+        state.half_open_failures = 0
 
     @classmethod
-    def _close_circuit_data(
-        cls, circuit_data: dict[str, Any], health_data: dict[str, Any], reason: str
-    ) -> None:
-        """关闭熔断器（操作数据字典）"""
-        circuit_data["open"] = False
-        circuit_data["open_at"] = None
-        circuit_data["next_probe_at"] = None
-        circuit_data["half_open_until"] = None
-        circuit_data["half_open_successes"] = 0
-        circuit_data["half_open_failures"] = 0
+    def _close_circuit(cls, state: FormatHealthState) -> None:
+        """关闭熔断器"""
+        state.reset_circuit()
 
         # 快速恢复健康度
-        current_score = float(health_data.get("health_score") or 0)
-        health_data["health_score"] = max(current_score, cls.PROBE_RECOVERY_SCORE)
+        state.health_score = max(state.health_score, cls.PROBE_RECOVERY_SCORE)
 
         cls._open_circuit_keys = max(0, cls._open_circuit_keys - 1)
         health_open_circuits.set(cls._open_circuit_keys)
@@ -529,78 +514,67 @@ class HealthMonitor:
 
     @classmethod
     def is_circuit_breaker_closed(
-        cls, resource: ProviderAPIKey, api_format: str | None = None
+        cls, resource: ProviderAPIKey | str, api_format: str | None = None
     ) -> bool:
-        """检查熔断器是否允许请求通过（按 API 格式）"""
+        """检查熔断器是否允许请求通过（按 API 格式）
+
+        resource 可以是 Key 对象或 Key ID；已跟踪的 Key 直接读取内存状态，O(1)。
+        """
         if not api_format:
             # 兼容旧调用：检查是否有任何格式的熔断器开启
-            circuit_by_format = resource.circuit_breaker_by_format or {}
-            for fmt, circuit_data in circuit_by_format.items():
-                if circuit_data.get("open"):
-                    return False
-            return True
+            return not any(s.open for s in cls._format_states(resource).values())
 
-        circuit_data = cls._get_circuit_data(resource, api_format)
-
-        if not circuit_data.get("open"):
+        state = cls._format_state(resource, api_format)
+        if state is None or not state.open:
             return True
 
-        now = datetime.now(timezone.utc)
-        state = cls._get_circuit_state_from_data(circuit_data, now)
-
-        # 半开状态允许请求通过
-        if state == CircuitState.HALF_OPEN:
+        now_ts = time.time()
+        if state.half_open_until is not None and now_ts < state.half_open_until:
+            # 半开状态允许请求通过
             return True
 
         # 检查是否到了探测时间
-        next_probe_str = circuit_data.get("next_probe_at")
-        if next_probe_str:
-            next_probe_at = datetime.fromisoformat(next_probe_str)
-            if now >= next_probe_at:
-                # 自动进入半开状态
-                cls._enter_half_open_data(circuit_data, now)
-                cls._set_circuit_data(resource, api_format, circuit_data)
-                return True
+        if state.next_probe_at is not None and now_ts >= state.next_probe_at:
+            # 自动进入半开状态
+            cls._enter_half_open(state, now_ts)
+            return True
 
         return False
 
     @classmethod
     def get_circuit_breaker_status(
-        cls, resource: ProviderAPIKey, api_format: str | None = None
+        cls, resource: ProviderAPIKey | str, api_format: str | None = None
     ) -> tuple[bool, str | None]:
         """获取熔断器详细状态（按 API 格式）"""
         if not api_format:
             # 兼容旧调用：返回第一个开启的熔断器状态
-            circuit_by_format = resource.circuit_breaker_by_format or {}
-            for fmt, circuit_data in circuit_by_format.items():
-                if circuit_data.get("open"):
-                    return cls._get_status_from_circuit_data(circuit_data)
+            for state in cls._format_states(resource).values():
+                if state.open:
+                    return cls._get_status_from_state(state)
             return True, None
 
-        circuit_data = cls._get_circuit_data(resource, api_format)
-        return cls._get_status_from_circuit_data(circuit_data)
+        state = cls._format_state(resource, api_format)
+        if state is None:
+            return True, None
+        return cls._get_status_from_state(state)
 
     @classmethod
-    def _get_status_from_circuit_data(cls, circuit_data: dict[str, Any]) -> tuple[bool, str | None]:
-        """从熔断器数据获取状态描述"""
-        if not circuit_data.get("open"):
+    def _get_status_from_state(cls, state: FormatHealthState) -> tuple[bool, str | None]:
+        """从熔断器状态获取状态描述"""
+        if not state.open:
             return True, None
 
-        now = datetime.now(timezone.utc)
-        state = cls._get_circuit_state_from_data(circuit_data, now)
-
-        if state == CircuitState.HALF_OPEN:
-            successes = int(circuit_data.get("half_open_successes") or 0)
-            return True, f"半开状态({successes}/{cls.HALF_OPEN_SUCCESS_THRESHOLD}成功)"
+        now_ts = time.time()
+        circuit_state = cls._get_circuit_state(state, now_ts)
 
-        next_probe_str = circuit_data.get("next_probe_at")
-        if next_probe_str:
-            next_probe_at = datetime.fromisoformat(next_probe_str)
-            if now >= next_probe_at:
-                return True, None
+        if circuit_state == CircuitState.HALF_OPEN:
+            return (
+                True,
+                f"半开状态({state.half_open_successes}/{cls.HALF_OPEN_SUCCESS_THRESHOLD}成功)",
+            )
 
-            remaining = next_probe_at - now
-            remaining_seconds = int(remaining.total_seconds())
+        if state.next_probe_at is not None:
+            remaining_seconds = int(state.next_probe_at - now_ts)
             if remaining_seconds >= 60:
                 time_str = f"{remaining_seconds // 60}min{remaining_seconds % 60}s"
             else:
@@ -609,6 +583,27 @@ class HealthMonitor:
 
         return False, "熔断中"
 
+    @classmethod
+    def _format_health_view(cls, state: FormatHealthState, now_ts: float) -> dict[str, Any]:
+        window_size, _failures = state.window_stats(now_ts - cls.WINDOW_SECONDS)
+        circuit = state.circuit_json()
+        return {
+            "health_score": state.health_score,
+            "error_rate": state.error_rate(now_ts - cls.WINDOW_SECONDS),
+            "window_size": window_size,
+            "consecutive_failures": state.consecutive_failures,
+            "last_failure_at": state.health_json()["last_failure_at"],
+            "circuit_breaker": {
+                "state": cls._get_circuit_state(state, now_ts),
+                "open": state.open,
+                "open_at": circuit["open_at"],
+                "next_probe_at": circuit["next_probe_at"],
+                "half_open_until": circuit["half_open_until"],
+                "half_open_successes": state.half_open_successes,
+                "half_open_failures": state.half_open_failures,
+            },
+        }
+
     @classmethod
     def get_key_health(
         cls, db: Session, key_id: str, api_format: str | None = None
@@ -619,86 +614,48 @@ class HealthMonitor:
             if not key:
                 return None
 
-            now = datetime.now(timezone.utc)
-            now_ts = now.timestamp()
+            now_ts = time.time()
 
-            avg_response_time_ms = (
-                int(key.total_response_time_ms or 0) / int(key.success_count or 1)
-                if key.success_count
-                else 0
-            )
+            # 加上尚未写入数据库的计数增量
+            key_state = health_state_store.get(key.id)
+            request_count = int(key.request_count or 0)
+            success_count = int(key.success_count or 0)
+            error_count = int(key.error_count or 0)
+            total_response_time_ms = int(key.total_response_time_ms or 0)
+            if key_state is not None:
+                request_count += key_state.request_delta
+                success_count += key_state.success_delta
+                error_count += key_state.error_delta
+                total_response_time_ms += key_state.response_time_delta
+
+            avg_response_time_ms = total_response_time_ms / success_count if success_count else 0
 
             # 全局统计
-            result = {
+            result: dict[str, Any] = {
                 "key_id": key.id,
                 "is_active": key.is_active,
                 "statistics": {
-                    "request_count": int(key.request_count or 0),
-                    "success_count": int(key.success_count or 0),
-                    "error_count": int(key.error_count or 0),
-                    "success_rate": (
-                        int(key.success_count or 0) / int(key.request_count or 1)
-                        if key.request_count
-                        else 0.0
-                    ),
+                    "request_count": request_count,
+                    "success_count": success_count,
+                    "error_count": error_count,
+                    "success_rate": success_count / request_count if request_count else 0.0,
                     "avg_response_time_ms": round(avg_response_time_ms, 2),
                 },
             }
 
-            # 按格式的健康度数据
-            health_by_format = key.health_by_format or {}
-            circuit_by_format = key.circuit_breaker_by_format or {}
+            states = cls._format_states(key)
 
             if api_format:
                 # 查询单个格式
-                health_data = cls._get_health_data(key, api_format)
-                circuit_data = cls._get_circuit_data(key, api_format)
-                window = health_data.get("request_results_window") or []
-                valid_window = [r for r in window if r["ts"] > now_ts - cls.WINDOW_SECONDS]
-
+                state = states.get(api_format) or FormatHealthState()
                 result["api_format"] = api_format
-                result["health_score"] = float(health_data.get("health_score") or 1.0)
-                result["error_rate"] = cls._calculate_error_rate_from_window(window, now_ts)
-                result["window_size"] = len(valid_window)
-                result["consecutive_failures"] = int(health_data.get("consecutive_failures") or 0)
-                result["last_failure_at"] = health_data.get("last_failure_at")
-                result["circuit_breaker"] = {
-                    "state": cls._get_circuit_state_from_data(circuit_data, now),
-                    "open": circuit_data.get("open", False),
-                    "open_at": circuit_data.get("open_at"),
-                    "next_probe_at": circuit_data.get("next_probe_at"),
-                    "half_open_until": circuit_data.get("half_open_until"),
-                    "half_open_successes": int(circuit_data.get("half_open_successes") or 0),
-                    "half_open_failures": int(circuit_data.get("half_open_failures") or 0),
-                }
+                result.update(cls._format_health_view(state, now_ts))
             else:
                 # 返回所有格式的健康度数据
-                formats_health = {}
-                for fmt in key.api_formats or []:
-                    health_data = health_by_format.get(fmt, _default_health_data())
-                    circuit_data = circuit_by_format.get(fmt, _default_circuit_data())
-                    window = health_data.get("request_results_window") or []
-                    valid_window = [r for r in window if r["ts"] > now_ts - cls.WINDOW_SECONDS]
-
-                    formats_health[fmt] = {
-                        "health_score": float(health_data.get("health_score") or 1.0),
-                        "error_rate": cls._calculate_error_rate_from_window(window, now_ts),
-                        "window_size": len(valid_window),
-                        "consecutive_failures": int(health_data.get("consecutive_failures") or 0),
-                        "last_failure_at": health_data.get("last_failure_at"),
-                        "circuit_breaker": {
-                            "state": cls._get_circuit_state_from_data(circuit_data, now),
-                            "open": circuit_data.get("open", False),
-                            "open_at": circuit_data.get("open_at"),
-                            "next_probe_at": circuit_data.get("next_probe_at"),
-                            "half_open_until": circuit_data.get("half_open_until"),
-                            "half_open_successes": int(
-                                circuit_data.get("half_open_successes") or 0
-                            ),
-                            "half_open_failures": int(circuit_data.get("half_open_failures") or 0),
-                        },
-                    }
-
+                formats_health = {
+                    fmt: cls._format_health_view(states.get(fmt) or FormatHealthState(), now_ts)
+                    for fmt in key.api_formats or []
+                }
                 result["health_by_format"] = formats_health
 
                 # 计算整体健康度（取最低值）
@@ -752,14 +709,19 @@ class HealthMonitor:
                 if key:
                     if api_format:
                         # 重置单个格式
-                        cls._set_health_data(key, api_format, _default_health_data())
-                        cls._set_circuit_data(key, api_format, _default_circuit_data())
+                        health_by_format = dict(key.health_by_format or {})
+                        circuit_by_format = dict(key.circuit_breaker_by_format or {})
+                        health_by_format[api_format] = _default_health_data()
+                        circuit_by_format[api_format] = _default_circuit_data()
+                        key.health_by_format = health_by_format  # type: ignore[assignment]
+                        key.circuit_breaker_by_format = circuit_by_format  # type: ignore[assignment]
                         logger.info(f"[RESET] 重置 Key 健康度: {key_id}/{api_format}")
                     else:
                         # 重置所有格式
                         key.health_by_format = {}  # type: ignore[assignment]
                         key.circuit_breaker_by_format = {}  # type: ignore[assignment]
                         logger.info(f"[RESET] 重置 Key 所有格式健康度: {key_id}")
+                    cls.reset_key_state(key_id, api_format)
 
             db.flush()
             get_batch_committer().mark_dirty(db)
@@ -770,6 +732,21 @@ class HealthMonitor:
             db.rollback()
             return False
 
+    @classmethod
+    def reset_key_state(cls, key_id: str, api_format: str | None = None) -> None:
+        """重置 Key 的内存健康状态，并同步到 Redis 镜像（数据库由调用方更新）"""
+        key_state = health_state_store.get(key_id)
+        if key_state is None:
+            return
+        formats = [api_format] if api_format else list(key_state.formats)
+        for fmt in formats:
+            state = key_state.formats.get(fmt)
+            fresh = FormatHealthState()
+            if state is not None:
+                fresh.version = state.version
+            key_state.formats[fmt] = fresh
+            cls._mirror_circuit(key_id, fmt, fresh, force=True)
+
     @classmethod
     def reset_open_circuit_count(cls) -> None:
         """重置进程级别的熔断计数器（批量恢复后调用）。"""
@@ -787,6 +764,7 @@ class HealthMonitor:
                     # 重置所有格式的健康度
                     key.health_by_format = {}  # type: ignore[assignment]
                     key.circuit_breaker_by_format = {}  # type: ignore[assignment]
+                    cls.reset_key_state(key_id)
                     logger.info(f"[OK] 手动启用 Key: {key_id}")
 
             db.flush()
@@ -886,49 +864,45 @@ class HealthMonitor:
             return False  # Endpoint 不支持探测
 
         if key_id:
-            key = db.query(ProviderAPIKey).filter(ProviderAPIKey.id == key_id).first()
-            if key:
+            resource: ProviderAPIKey | str | None = key_id
+            if health_state_store.get(key_id) is None:
+                resource = db.query(ProviderAPIKey).filter(ProviderAPIKey.id == key_id).first()
+            if resource is not None:
+                now_ts = time.time()
                 if api_format:
-                    circuit_data = cls._get_circuit_data(key, api_format)
-                    if circuit_data.get("open"):
-                        now = datetime.now(timezone.utc)
-                        state = cls._get_circuit_state_from_data(circuit_data, now)
-                        return state == CircuitState.HALF_OPEN
+                    state = cls._format_state(resource, api_format)
+                    if state is not None and state.open:
+                        return cls._get_circuit_state(state, now_ts) == CircuitState.HALF_OPEN
                 else:
                     # 兼容旧调用：检查是否有任何格式处于半开状态
-                    circuit_by_format = key.circuit_breaker_by_format or {}
-                    now = datetime.now(timezone.utc)
-                    for fmt, circuit_data in circuit_by_format.items():
-                        if circuit_data.get("open"):
-                            state = cls._get_circuit_state_from_data(circuit_data, now)
-                            if state == CircuitState.HALF_OPEN:
-                                return True
+                    for state in cls._format_states(resource).values():
+                        if (
+                            state.open
+                            and cls._get_circuit_state(state, now_ts) == CircuitState.HALF_OPEN
+                        ):
+                            return True
 
         return False
 
     # ==================== 便捷方法 ====================
 
     @classmethod
-    def get_health_score(cls, key: ProviderAPIKey, api_format: str | None = None) -> float:
-        """获取指定格式的健康度分数"""
+    def get_health_score(cls, key: ProviderAPIKey | str, api_format: str | None = None) -> float:
+        """获取指定格式的健康度分数（key 可以是 Key 对象或 Key ID）"""
         if not api_format:
             # 返回所有格式中的最低健康度
-            health_by_format = key.health_by_format or {}
-            if not health_by_format:
+            states = cls._format_states(key)
+            if not states:
                 return 1.0
-            return min(float(h.get("health_score") or 1.0) for h in health_by_format.values())
+            return min(s.health_score for s in states.values())
 
-        health_data = cls._get_health_data(key, api_format)
-        return float(health_data.get("health_score") or 1.0)
+        state = cls._format_state(key, api_format)
+        return state.health_score if state is not None else 1.0
 
     @classmethod
-    def is_any_circuit_open(cls, key: ProviderAPIKey) -> bool:
+    def is_any_circuit_open(cls, key: ProviderAPIKey | str) -> bool:
         """检查是否有任何格式的熔断器开启"""
-        circuit_by_format = key.circuit_breaker_by_format or {}
-        for circuit_data in circuit_by_format.values():
-            if circuit_data.get("open"):
-                return True
-        return False
+        return any(s.open for s in cls._format_states(key).values())
 
 
 # 全局健康监控器实例
@@ -0,0 +1,592 @@
+"""
+健康度 / 熔断器状态存储（进程内，write-behind）
+
+HealthMonitor 的热路径只读写这里的内存状态，不再每次请求都改写
+ProviderAPIKey.health_by_format / circuit_breaker_by_format 并 flush：
+
+- 每个 (key_id, api_format) 一个 FormatHealthState：定长环形缓冲区（时间戳 array + 成功标记
+  bytearray）保存滑动窗口，失败数增量维护，错误率 / 熔断判断均为 O(1) 摊还
+- 首次访问某个 Key 时从 ORM 的 JSON 列加载（hydrate），之后以内存状态为准
+- 熔断器状态切换（打开/半开/关闭）由 HealthMonitor 立即写回数据库；其余变化（窗口、健康度、
+  请求计数）标记为脏，由 HealthStateFlusher 按 HEALTH_SNAPSHOT_INTERVAL_SECONDS 批量写入快照，
+  计数列以增量 UPDATE 累加，多实例不会互相覆盖
+- 可选 Redis 镜像（HEALTH_STATE_REDIS_ENABLED）：熔断切换通过 Lua 以版本号 CAS 写入
+  Redis hash，HealthStateFlusher 按 HEALTH_STATE_SYNC_INTERVAL_SECONDS 拉取其他实例的切换，
+  使熔断状态在集群内一致；滑动窗口保持进程内
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from array import array
+from collections.abc import Callable
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import bindparam, func, update
+
+from src.config.constants import CircuitBreakerDefaults
+from src.core.logger import logger
+from src.models.database import ProviderAPIKey
+
+HEALTH_WINDOW_SIZE = int(os.getenv("HEALTH_WINDOW_SIZE", str(CircuitBreakerDefaults.WINDOW_SIZE)))
+HEALTH_SNAPSHOT_INTERVAL_SECONDS = float(os.getenv("HEALTH_SNAPSHOT_INTERVAL_SECONDS", "30"))
+HEALTH_STATE_REDIS_ENABLED = os.getenv("HEALTH_STATE_REDIS_ENABLED", "true").lower() == "true"
+HEALTH_STATE_SYNC_INTERVAL_SECONDS = float(os.getenv("HEALTH_STATE_SYNC_INTERVAL_SECONDS", "2"))
+
+_REDIS_KEY_PREFIX = "health:circuit"
+_REDIS_TTL_SECONDS = 86400
+
+# 熔断器状态 CAS：版本号与调用方看到的一致时写入并递增版本；否则返回当前状态供调用方采纳
+_CIRCUIT_CAS_SCRIPT = """
+local cur = tonumber(redis.call('HGET', KEYS[1], 'version') or '0')
+if ARGV[1] ~= '-1' and cur ~= tonumber(ARGV[1]) then
+    return redis.call('HGETALL', KEYS[1])
+end
+redis.call('HSET', KEYS[1],
+    'version', cur + 1, 'open', ARGV[2], 'open_at', ARGV[3], 'next_probe_at', ARGV[4],
+    'half_open_until', ARGV[5], 'half_open_successes', ARGV[6], 'half_open_failures', ARGV[7])
+redis.call('EXPIRE', KEYS[1], ARGV[8])
+return cur + 1
+"""
+
+
+def _iso_to_ts(value: Any) -> float | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        return None
+
+
+def _ts_to_iso(ts: float | None) -> str | None:
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+def _redis_key(key_id: str, api_format: str) -> str:
+    return f"{_REDIS_KEY_PREFIX}:{key_id}:{api_format}"
+
+
+class FormatHealthState:
+    """单个 (Key, API 格式) 的健康度与熔断器状态"""
+
+    __slots__ = (
+        "_ts",
+        "_ok",
+        "_head",
+        "_size",
+        "_failures",
+        "health_score",
+        "consecutive_failures",
+        "last_failure_at",
+        "open",
+        "open_at",
+        "next_probe_at",
+        "half_open_until",
+        "half_open_successes",
+        "half_open_failures",
+        "version",
+    )
+
+    def __init__(self, capacity: int = HEALTH_WINDOW_SIZE) -> None:
+        capacity = max(1, capacity)
+        self._ts = array("d", bytes(8 * capacity))
+        self._ok = bytearray(capacity)
+        self._head = 0  # 最旧记录的位置
+        self._size = 0
+        self._failures = 0
+        self.health_score = 1.0
+        self.consecutive_failures = 0
+        self.last_failure_at: float | None = None
+        self.open = False
+        self.open_at: float | None = None
+        self.next_probe_at: float | None = None
+        self.half_open_until: float | None = None
+        self.half_open_successes = 0
+        self.half_open_failures = 0
+        # Redis 镜像中的熔断器版本号
+        self.version = 0
+
+    # ---------- 滑动窗口 ----------
+
+    def _drop_oldest(self) -> None:
+        if not self._ok[self._head]:
+            self._failures -= 1
+        self._head = (self._head + 1) % len(self._ok)
+        self._size -= 1
+
+    def _evict(self, cutoff_ts: float) -> None:
+        while self._size and self._ts[self._head] <= cutoff_ts:
+            self._drop_oldest()
+
+    def push(self, ts: float, ok: bool, cutoff_ts: float) -> None:
+        """追加一条请求结果，同时淘汰窗口外与超出容量的记录"""
+        self._evict(cutoff_ts)
+        if self._size == len(self._ok):
+            self._drop_oldest()
+        idx = (self._head + self._size) % len(self._ok)
+        self._ts[idx] = ts
+        self._ok[idx] = 1 if ok else 0
+        self._size += 1
+        if not ok:
+            self._failures += 1
+
+    def window_stats(self, cutoff_ts: float) -> tuple[int, int]:
+        """(窗口内请求数, 失败数)"""
+        self._evict(cutoff_ts)
+        return self._size, self._failures
+
+    def error_rate(self, cutoff_ts: float) -> float:
+        size, failures = self.window_stats(cutoff_ts)
+        return failures / size if size else 0.0
+
+    # ---------- 熔断器 ----------
+
+    def reset_circuit(self) -> None:
+        self.open = False
+        self.open_at = None
+        self.next_probe_at = None
+        self.half_open_until = None
+        self.half_open_successes = 0
+        self.half_open_failures = 0
+
+    def circuit_fields(self) -> tuple[str, ...]:
+        """Redis 镜像字段（顺序与 _CIRCUIT_CAS_SCRIPT 的 ARGV[2..7] 一致）"""
+        return (
+            "1" if self.open else "0",
+            repr(self.open_at) if self.open_at is not None else "",
+            repr(self.next_probe_at) if self.next_probe_at is not None else "",
+            repr(self.half_open_until) if self.half_open_until is not None else "",
+            str(self.half_open_successes),
+            str(self.half_open_failures),
+        )
+
+    def apply_circuit_fields(self, fields: dict[str, str]) -> None:
+        def _float(name: str) -> float | None:
+            raw = fields.get(name)
+            return float(raw) if raw else None
+
+        self.open = fields.get("open") == "1"
+        self.open_at = _float("open_at")
+        self.next_probe_at = _float("next_probe_at")
+        self.half_open_until = _float("half_open_until")
+        self.half_open_successes = int(fields.get("half_open_successes") or 0)
+        self.half_open_failures = int(fields.get("half_open_failures") or 0)
+        self.version = int(fields.get("version") or 0)
+
+    # ---------- 与 ORM JSON 列互转 ----------
+
+    @classmethod
+    def from_json(
+        cls, health: dict[str, Any] | None, circuit: dict[str, Any] | None
+    ) -> FormatHealthState:
+        state = cls()
+        health = health or {}
+        circuit = circuit or {}
+        for record in health.get("request_results_window") or []:
+            try:
+                state.push(float(record["ts"]), bool(record["ok"]), 0.0)
+            except (KeyError, TypeError, ValueError):
+                continue
+        score = health.get("health_score")
+        state.health_score = float(score) if score is not None else 1.0
+        state.consecutive_failures = int(health.get("consecutive_failures") or 0)
+        state.last_failure_at = _iso_to_ts(health.get("last_failure_at"))
+        state.open = bool(circuit.get("open"))
+        state.open_at = _iso_to_ts(circuit.get("open_at"))
+        state.next_probe_at = _iso_to_ts(circuit.get("next_probe_at"))
+        state.half_open_until = _iso_to_ts(circuit.get("half_open_until"))
+        state.half_open_successes = int(circuit.get("half_open_successes") or 0)
+        state.half_open_failures = int(circuit.get("half_open_failures") or 0)
+        return state
+
+    def health_json(self) -> dict[str, Any]:
+        capacity = len(self._ok)
+        window = []
+        for i in range(self._size):
+            idx = (self._head + i) % capacity
+            window.append({"ts": self._ts[idx], "ok": bool(self._ok[idx])})
+        return {
+            "health_score": self.health_score,
+            "consecutive_failures": self.consecutive_failures,
+            "last_failure_at": _ts_to_iso(self.last_failure_at),
+            "request_results_window": window,
+        }
+
+    def circuit_json(self) -> dict[str, Any]:
+        return {
+            "open": self.open,
+            "open_at": _ts_to_iso(self.open_at),
+            "next_probe_at": _ts_to_iso(self.next_probe_at),
+            "half_open_until": _ts_to_iso(self.half_open_until),
+            "half_open_successes": self.half_open_successes,
+            "half_open_failures": self.half_open_failures,
+        }
+
+
+class KeyHealthState:
+    """单个 Key 的全部格式状态 + 待写入的计数增量"""
+
+    __slots__ = (
+        "formats",
+        "default_format",
+        "request_delta",
+        "success_delta",
+        "error_delta",
+        "response_time_delta",
+        "last_error_at",
+    )
+
+    def __init__(self, default_format: str | None = None) -> None:
+        self.formats: dict[str, FormatHealthState] = {}
+        self.default_format = default_format
+        self.request_delta = 0
+        self.success_delta = 0
+        self.error_delta = 0
+        self.response_time_delta = 0
+        self.last_error_at: datetime | None = None
+
+    def format_state(self, api_format: str) -> FormatHealthState:
+        state = self.formats.get(api_format)
+        if state is None:
+            state = self.formats[api_format] = FormatHealthState()
+        return state
+
+    def take_counters(self) -> dict[str, Any]:
+        counters = {
+            "d_request": self.request_delta,
+            "d_success": self.success_delta,
+            "d_error": self.error_delta,
+            "d_response_time": self.response_time_delta,
+            "b_last_error_at": self.last_error_at,
+        }
+        self.request_delta = self.success_delta = self.error_delta = 0
+        self.response_time_delta = 0
+        self.last_error_at = None
+        return counters
+
+    def restore_counters(self, counters: dict[str, Any]) -> None:
+        """写入失败时把增量加回，下一轮重试"""
+        self.request_delta += counters["d_request"]
+        self.success_delta += counters["d_success"]
+        self.error_delta += counters["d_error"]
+        self.response_time_delta += counters["d_response_time"]
+        self.last_error_at = self.last_error_at or counters["b_last_error_at"]
+
+
+class HealthStateStore:
+    """进程内健康状态表"""
+
+    def __init__(self) -> None:
+        self._keys: dict[str, KeyHealthState] = {}
+        self._dirty: set[str] = set()
+
+    def get(self, key_id: str) -> KeyHealthState | None:
+        return self._keys.get(key_id)
+
+    def get_format(self, key_id: str, api_format: str) -> FormatHealthState | None:
+        key_state = self._keys.get(key_id)
+        return key_state.formats.get(api_format) if key_state else None
+
+    def hydrate(self, key: ProviderAPIKey) -> KeyHealthState:
+        """从 ORM 对象的 JSON 列加载（已加载过则直接返回内存状态）"""
+        key_state = self._keys.get(key.id)
+        if key_state is not None:
+            return key_state
+        api_formats = key.api_formats or []
+        key_state = KeyHealthState(default_format=api_formats[0] if api_formats else None)
+        health_by_format = key.health_by_format or {}
+        circuit_by_format = key.circuit_breaker_by_format or {}
+        for fmt in set(health_by_format) | set(circuit_by_format):
+            key_state.formats[fmt] = FormatHealthState.from_json(
+                health_by_format.get(fmt), circuit_by_format.get(fmt)
+            )
+        self._keys[key.id] = key_state
+        return key_state
+
+    def mark_dirty(self, key_id: str) -> None:
+        self._dirty.add(key_id)
+
+    def discard(self, key_id: str) -> None:
+        self._keys.pop(key_id, None)
+        self._dirty.discard(key_id)
+
+    def clear(self) -> None:
+        self._keys.clear()
+        self._dirty.clear()
+
+    def items(self) -> list[tuple[str, KeyHealthState]]:
+        return list(self._keys.items())
+
+    def open_circuit_count(self) -> int:
+        return sum(1 for ks in self._keys.values() if any(fs.open for fs in ks.formats.values()))
+
+    # ---------- write-behind 快照 ----------
+
+    def take_snapshot_rows(self) -> list[dict[str, Any]]:
+        """取出脏 Key 的快照行并清零计数增量（须在事件循环线程调用）
+
+        行内只含计数与新构建的 JSON 结构，之后交给执行器线程写库不会再触碰内存状态。
+        """
+        if not self._dirty:
+            return []
+        dirty, self._dirty = self._dirty, set()
+
+        rows: list[dict[str, Any]] = []
+        for key_id in dirty:
+            key_state = self._keys.get(key_id)
+            if key_state is None:
+                continue
+            row = key_state.take_counters()
+            row["b_id"] = key_id
+            row["b_health"] = {f: s.health_json() for f, s in key_state.formats.items()}
+            row["b_circuit"] = {f: s.circuit_json() for f, s in key_state.formats.items()}
+            rows.append(row)
+        return rows
+
+    def restore_snapshot_rows(self, rows: list[dict[str, Any]]) -> None:
+        """写库或提交失败时把增量加回并重新标脏（须在事件循环线程调用）"""
+        for row in rows:
+            key_state = self._keys.get(row["b_id"])
+            if key_state is not None:
+                key_state.restore_counters(row)
+            self._dirty.add(row["b_id"])
+
+    def flush_snapshots(self, db: Any) -> int:
+        """把脏 Key 的健康度快照与计数增量批量写入数据库（调用方负责 commit）
+
+        同步路径：取行、写库都在调用线程执行；后台任务走 HealthStateFlusher.flush。
+        """
+        rows = self.take_snapshot_rows()
+        if not rows:
+            return 0
+        try:
+            write_snapshot_rows(db, rows)
+        except Exception:
+            self.restore_snapshot_rows(rows)
+            raise
+        return len(rows)
+
+    # ---------- Redis 镜像 ----------
+
+    async def publish_circuit(
+        self, redis_client: Any, key_id: str, api_format: str, state: FormatHealthState
+    ) -> None:
+        """以 CAS 写入熔断器状态；版本冲突时采纳 Redis 中其他实例的状态"""
+        expected = state.version
+        result = await redis_client.eval(
+            _CIRCUIT_CAS_SCRIPT,
+            1,
+            _redis_key(key_id, api_format),
+            str(expected),
+            *state.circuit_fields(),
+            _REDIS_TTL_SECONDS,
+        )
+        if isinstance(result, int):
+            state.version = result
+            return
+        fields = _pairs_to_dict(result)
+        state.apply_circuit_fields(fields)
+        logger.debug(
+            f"[HealthState] 熔断状态冲突，采纳集群状态: {key_id[:8]}.../{api_format} "
+            f"open={state.open} v{state.version}"
+        )
+
+    async def force_circuit(
+        self, redis_client: Any, key_id: str, api_format: str, state: FormatHealthState
+    ) -> None:
+        """无条件写入（管理员重置）"""
+        state.version = await redis_client.eval(
+            _CIRCUIT_CAS_SCRIPT,
+            1,
+            _redis_key(key_id, api_format),
+            "-1",
+            *state.circuit_fields(),
+            _REDIS_TTL_SECONDS,
+        )
+
+    async def pull_circuits(self, redis_client: Any) -> int:
+        """拉取本进程已跟踪的 Key 在 Redis 中的熔断状态，采纳版本更新的记录"""
+        targets = [
+            (key_id, fmt, fs) for key_id, ks in self._keys.items() for fmt, fs in ks.formats.items()
+        ]
+        if not targets:
+            return 0
+        pipe = redis_client.pipeline()
+        for key_id, fmt, _ in targets:
+            pipe.hgetall(_redis_key(key_id, fmt))
+        results = await pipe.execute()
+
+        adopted = 0
+        for (key_id, fmt, fs), raw in zip(targets, results):
+            if not raw:
+                continue
+            fields = {_decode(k): _decode(v) for k, v in raw.items()}
+            if int(fields.get("version") or 0) > fs.version:
+                fs.apply_circuit_fields(fields)
+                adopted += 1
+        return adopted
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _pairs_to_dict(items: list[Any]) -> dict[str, str]:
+    flat = [_decode(v) for v in items]
+    return dict(zip(flat[::2], flat[1::2]))
+
+
+def write_snapshot_rows(db: Any, rows: list[dict[str, Any]]) -> None:
+    """执行快照 UPDATE（可在执行器线程调用，不访问内存状态）
+
+    使用 Core UPDATE：计数列按增量累加，不经过 ORM 事件，也不会触发路由快照失效。
+    """
+    table = ProviderAPIKey.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(
+            health_by_format=bindparam("b_health", type_=table.c.health_by_format.type),
+            circuit_breaker_by_format=bindparam(
+                "b_circuit", type_=table.c.circuit_breaker_by_format.type
+            ),
+            request_count=func.coalesce(table.c.request_count, 0) + bindparam("d_request"),
+            success_count=func.coalesce(table.c.success_count, 0) + bindparam("d_success"),
+            error_count=func.coalesce(table.c.error_count, 0) + bindparam("d_error"),
+            total_response_time_ms=func.coalesce(table.c.total_response_time_ms, 0)
+            + bindparam("d_response_time"),
+            last_error_at=func.coalesce(bindparam("b_last_error_at"), table.c.last_error_at),
+        )
+    )
+    db.connection().execute(stmt, rows)
+
+
+health_state_store = HealthStateStore()
+
+
+class HealthStateFlusher:
+    """后台任务：同步 Redis 熔断状态 + 周期写入数据库快照"""
+
+    def __init__(self) -> None:
+        self._task: asyncio.Task | None = None
+        self._last_snapshot = time.monotonic()
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(
+                f"[HealthState] 健康状态后台同步已启动: snapshot={HEALTH_SNAPSHOT_INTERVAL_SECONDS}s, "
+                f"redis={'on' if HEALTH_STATE_REDIS_ENABLED else 'off'}"
+            )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        logger.info("[HealthState] 健康状态后台同步已停止")
+
+    async def _loop(self) -> None:
+        interval = min(HEALTH_STATE_SYNC_INTERVAL_SECONDS, HEALTH_SNAPSHOT_INTERVAL_SECONDS)
+        while True:
+            await asyncio.sleep(max(0.1, interval))
+            try:
+                await self.sync_redis()
+                if time.monotonic() - self._last_snapshot >= HEALTH_SNAPSHOT_INTERVAL_SECONDS:
+                    await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[HealthState] 后台同步失败: {e}")
+
+    async def sync_redis(self) -> None:
+        redis_client = get_health_redis_client()
+        if redis_client is None:
+            return
+        await health_state_store.pull_circuits(redis_client)
+
+    async def flush(self) -> int:
+        from src.database.database import get_db_context
+        from src.utils.async_utils import run_in_executor
+
+        self._last_snapshot = time.monotonic()
+
+        # 取行在事件循环线程完成（请求处理同样在此线程修改状态），执行器只负责写库与提交
+        rows = health_state_store.take_snapshot_rows()
+        if not rows:
+            return 0
+
+        def _write() -> None:
+            with get_db_context() as db:
+                write_snapshot_rows(db, rows)
+
+        write = asyncio.ensure_future(run_in_executor(_write))
+        try:
+            await asyncio.shield(write)
+        except asyncio.CancelledError:
+            # 任务被取消时写库仍在执行器中进行，待其结束后按结果决定是否加回增量
+            write.add_done_callback(_restore_on_failure(rows))
+            raise
+        except Exception:
+            health_state_store.restore_snapshot_rows(rows)
+            raise
+        written = len(rows)
+        if written:
+            logger.debug(f"[HealthState] 写入健康度快照: {written} 个 Key")
+        return written
+
+
+def _restore_on_failure(rows: list[dict[str, Any]]) -> Callable[[asyncio.Future], None]:
+    def _callback(future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            health_state_store.restore_snapshot_rows(rows)
+
+    return _callback
+
+
+def get_health_redis_client() -> Any:
+    if not HEALTH_STATE_REDIS_ENABLED:
+        return None
+    from src.clients.redis_client import get_redis_client_sync
+
+    return get_redis_client_sync()
+
+
+_flusher: HealthStateFlusher | None = None
+
+
+async def start_health_state_flusher() -> HealthStateFlusher:
+    global _flusher
+    if _flusher is None:
+        _flusher = HealthStateFlusher()
+        await _flusher.start()
+    return _flusher
+
+
+async def stop_health_state_flusher() -> None:
+    global _flusher
+    if _flusher is not None:
+        await _flusher.stop()
+        _flusher = None
+
+
+__all__ = [
+    "FormatHealthState",
+    "HealthStateFlusher",
+    "HealthStateStore",
+    "KeyHealthState",
+    "health_state_store",
+    "start_health_state_flusher",
+    "stop_health_state_flusher",
+]
@@ -14,8 +14,14 @@ from dataclasses import dataclass
 
 from sqlalchemy.orm import Session
 
+from src.config.settings import config
 from src.core.logger import logger
 from src.models.database import GlobalModel, Model, Provider
+from src.services.billing.pricing_snapshot import (
+    PricingEntry,
+    build_pricing_entry,
+    get_pricing_snapshot_manager,
+)
 
 ProviderRef = str | Provider | None
 
@@ -47,9 +53,9 @@ class CostBreakdown:
 class ModelCostService:
     """集中负责模型价格与成本计算，避免在 mapper/usage 中重复实现。"""
 
-    _price_cache: dict[str, dict[str, float]] = {}
-    _cache_price_cache: dict[str, dict[str, float]] = {}
-    _tiered_pricing_cache: dict[str, dict | None] = {}
+    # 未启用价格快照时按 "provider:model" 缓存价格条目
+    _entry_cache: dict[str, PricingEntry | None] = {}
+    _warned_missing: set[tuple[str, str]] = set()
 
     def __init__(self, db: Session):
         self.db = db
@@ -129,8 +135,7 @@ class ModelCostService:
         Returns:
             阶梯计费配置，如果未配置返回 None
         """
-        result = await self.get_tiered_pricing_with_source_async(provider, model)
-        return result.get("pricing") if result else None
+        return self.get_tiered_pricing(provider, model)
 
     async def get_tiered_pricing_with_source_async(
         self, provider: ProviderRef, model: str
@@ -147,114 +152,20 @@ class ModelCostService:
             - pricing: 阶梯计费配置
             - source: 'provider' 或 'global'
         """
-        provider_name = self._provider_name(provider)
-        cache_key = f"{provider_name}:{model}:tiered_with_source"
-
-        if cache_key in self._tiered_pricing_cache:
-            return self._tiered_pricing_cache[cache_key]
-
-        provider_obj = self._resolve_provider(provider)
-        result = None
-
-        if provider_obj:
-            # 直接通过 GlobalModel.name 查找
-            global_model = (
-                self.db.query(GlobalModel)
-                .filter(
-                    GlobalModel.name == model,
-                    GlobalModel.is_active == True,
-                )
-                .first()
-            )
-
-            if global_model:
-                model_obj = (
-                    self.db.query(Model)
-                    .filter(
-                        Model.provider_id == provider_obj.id,
-                        Model.global_model_id == global_model.id,
-                        Model.is_active == True,
-                    )
-                    .first()
-                )
-
-                if model_obj:
-                    # 判断定价来源
-                    if model_obj.tiered_pricing is not None:
-                        result = {"pricing": model_obj.tiered_pricing, "source": "provider"}
-                    elif global_model.default_tiered_pricing is not None:
-                        result = {
-                            "pricing": global_model.default_tiered_pricing,
-                            "source": "global",
-                        }
-                else:
-                    # Provider 没有实现该模型，直接使用 GlobalModel 的默认阶梯配置
-                    if global_model.default_tiered_pricing is not None:
-                        result = {
-                            "pricing": global_model.default_tiered_pricing,
-                            "source": "global",
-                        }
-
-        self._tiered_pricing_cache[cache_key] = result
-        return result
+        entry = self._pricing_entry(provider, model)
+        if entry is None or entry.tiered_pricing is None:
+            return None
+        return {"pricing": entry.tiered_pricing, "source": entry.tiered_source}
 
     def get_tiered_pricing(self, provider: ProviderRef, model: str) -> dict | None:
-        """同步获取模型的阶梯计费配置（直接查缓存和数据库，避免事件循环开销）。
+        """同步获取模型的阶梯计费配置（直接查快照/缓存和数据库，避免事件循环开销）。
 
         Returns:
             阶梯计费配置字典，如果未找到配置则返回 None。
-            注意：与 get_tiered_pricing_async 不同，此方法仅返回 pricing 部分，不含 source 字段。
+            注意：此方法仅返回 pricing 部分，不含 source 字段。
         """
-        provider_name = self._provider_name(provider)
-        cache_key = f"{provider_name}:{model}:tiered_with_source"
-
-        # 优先从缓存获取
-        if cache_key in self._tiered_pricing_cache:
-            result = self._tiered_pricing_cache[cache_key]
-            return result.get("pricing") if result else None
-
-        # 缓存未命中，同步查询数据库
-        provider_obj = self._resolve_provider(provider)
-        result = None
-
-        if provider_obj:
-            global_model = (
-                self.db.query(GlobalModel)
-                .filter(
-                    GlobalModel.name == model,
-                    GlobalModel.is_active == True,
-                )
-                .first()
-            )
-
-            if global_model:
-                model_obj = (
-                    self.db.query(Model)
-                    .filter(
-                        Model.provider_id == provider_obj.id,
-                        Model.global_model_id == global_model.id,
-                        Model.is_active == True,
-                    )
-                    .first()
-                )
-
-                if model_obj:
-                    if model_obj.tiered_pricing is not None:
-                        result = {"pricing": model_obj.tiered_pricing, "source": "provider"}
-                    elif global_model.default_tiered_pricing is not None:
-                        result = {
-                            "pricing": global_model.default_tiered_pricing,
-                            "source": "global",
-                        }
-                else:
-                    if global_model.default_tiered_pricing is not None:
-                        result = {
-                            "pricing": global_model.default_tiered_pricing,
-                            "source": "global",
-                        }
-
-        self._tiered_pricing_cache[cache_key] = result
-        return result.get("pricing") if result else None
+        entry = self._pricing_entry(provider, model)
+        return entry.tiered_pricing if entry is not None else None
 
     # ------------------------------------------------------------------
     # 公共方法
@@ -267,11 +178,6 @@ class ModelCostService:
         注意：如果模型配置了阶梯计费，此方法返回第一个阶梯的价格作为默认值。
         实际计费时应使用 compute_cost_with_tiered_pricing 方法。
 
-        计费逻辑:
-        1. 直接通过 GlobalModel.name 匹配
-        2. 查找该 Provider 的 Model 实现
-        3. 获取价格配置
-
         Args:
             provider: Provider 对象或提供商名称
             model: 用户请求的模型名（必须是 GlobalModel.name）
@@ -279,88 +185,16 @@ class ModelCostService:
         Returns:
             (input_price, output_price) 元组
         """
-        provider_name = self._provider_name(provider)
-        cache_key = f"{provider_name}:{model}"
-
-        if cache_key in self._price_cache:
-            prices = self._price_cache[cache_key]
-            return prices["input"], prices["output"]
-
-        provider_obj = self._resolve_provider(provider)
-        input_price = None
-        output_price = None
-
-        if provider_obj:
-            # 直接通过 GlobalModel.name 查找（用户必须使用标准模型名称）
-            global_model = (
-                self.db.query(GlobalModel)
-                .filter(
-                    GlobalModel.name == model,
-                    GlobalModel.is_active == True,
-                )
-                .first()
-            )
-            if global_model:
-                model_obj = (
-                    self.db.query(Model)
-                    .filter(
-                        Model.provider_id == provider_obj.id,
-                        Model.global_model_id == global_model.id,
-                        Model.is_active == True,
-                    )
-                    .first()
-                )
-                if model_obj:
-                    # 检查是否有阶梯计费
-                    tiered = model_obj.get_effective_tiered_pricing()
-                    if tiered and tiered.get("tiers"):
-                        first_tier = tiered["tiers"][0]
-                        input_price = first_tier.get("input_price_per_1m", 0)
-                        output_price = first_tier.get("output_price_per_1m", 0)
-                    else:
-                        input_price = model_obj.get_effective_input_price()
-                        output_price = model_obj.get_effective_output_price()
-                    logger.debug(
-                        f"找到模型价格配置: {provider_name}/{model} "
-                        f"(输入: ${input_price}/M, 输出: ${output_price}/M)"
-                    )
-                else:
-                    # Provider 没有实现该模型，直接使用 GlobalModel 的默认价格
-                    tiered = global_model.default_tiered_pricing
-                    if tiered and tiered.get("tiers"):
-                        first_tier = tiered["tiers"][0]
-                        input_price = first_tier.get("input_price_per_1m", 0)
-                        output_price = first_tier.get("output_price_per_1m", 0)
-                    else:
-                        input_price = 0.0
-                        output_price = 0.0
-                    logger.debug(
-                        f"使用 GlobalModel 默认价格: {provider_name}/{model} "
-                        f"(输入: ${input_price}/M, 输出: ${output_price}/M)"
-                    )
-
-        # 如果没有找到价格配置，使用 0.0 并记录警告
-        if input_price is None:
-            input_price = 0.0
-        if output_price is None:
-            output_price = 0.0
-
-        # 检查是否有按次计费配置（按次计费模型的 token 价格可以为 0）
-        if input_price == 0.0 and output_price == 0.0:
-            # 异步检查按次计费价格
-            price_per_request = await self.get_request_price_async(provider, model)
-            if price_per_request is None or price_per_request == 0.0:
-                logger.warning(
-                    f"未找到模型价格配置: {provider_name}/{model}，请在 GlobalModel 中配置价格"
-                )
-
-        self._price_cache[cache_key] = {"input": input_price, "output": output_price}
-        return input_price, output_price
+        return self.get_model_price(provider, model)
 
     def get_model_price(self, provider: ProviderRef, model: str) -> tuple[float, float]:
         """
         返回给定 provider/model 的 (input_price, output_price)。
-        直接查缓存和数据库，避免事件循环开销。
+
+        计费逻辑:
+        1. 直接通过 GlobalModel.name 匹配
+        2. 查找该 Provider 的 Model 实现（未实现时使用 GlobalModel 默认价格）
+        3. 取有效阶梯计费配置的第一个阶梯
 
         Args:
             provider: Provider 对象或提供商名称
@@ -369,73 +203,24 @@ class ModelCostService:
         Returns:
             (input_price, output_price) 元组
         """
-        provider_name = self._provider_name(provider)
-        cache_key = f"{provider_name}:{model}"
-
-        # 优先从缓存获取
-        if cache_key in self._price_cache:
-            prices = self._price_cache[cache_key]
-            return prices["input"], prices["output"]
-
-        # 缓存未命中，同步查询数据库
-        provider_obj = self._resolve_provider(provider)
-        input_price = None
-        output_price = None
-
-        if provider_obj:
-            global_model = (
-                self.db.query(GlobalModel)
-                .filter(
-                    GlobalModel.name == model,
-                    GlobalModel.is_active == True,
-                )
-                .first()
-            )
-            if global_model:
-                model_obj = (
-                    self.db.query(Model)
-                    .filter(
-                        Model.provider_id == provider_obj.id,
-                        Model.global_model_id == global_model.id,
-                        Model.is_active == True,
-                    )
-                    .first()
-                )
-                if model_obj:
-                    tiered = model_obj.get_effective_tiered_pricing()
-                    if tiered and tiered.get("tiers"):
-                        first_tier = tiered["tiers"][0]
-                        input_price = first_tier.get("input_price_per_1m", 0)
-                        output_price = first_tier.get("output_price_per_1m", 0)
-                    else:
-                        input_price = model_obj.get_effective_input_price()
-                        output_price = model_obj.get_effective_output_price()
-                else:
-                    tiered = global_model.default_tiered_pricing
-                    if tiered and tiered.get("tiers"):
-                        first_tier = tiered["tiers"][0]
-                        input_price = first_tier.get("input_price_per_1m", 0)
-                        output_price = first_tier.get("output_price_per_1m", 0)
-                    else:
-                        input_price = 0.0
-                        output_price = 0.0
-
-        if input_price is None:
-            input_price = 0.0
-        if output_price is None:
-            output_price = 0.0
-
-        # 与异步版本保持一致：当 token 价格为 0 时，仅在没有按次计费配置时告警
-        if input_price == 0.0 and output_price == 0.0:
-            price_per_request = self.get_request_price(provider, model)
-            if price_per_request is None or price_per_request == 0.0:
+        entry = self._pricing_entry(provider, model)
+        if entry is None:
+            input_price, output_price, price_per_request = 0.0, 0.0, None
+        else:
+            input_price, output_price = entry.input_price, entry.output_price
+            price_per_request = entry.price_per_request
+
+        # 按次计费模型的 token 价格可以为 0：仅在没有按次计费配置时告警（每个模型只告警一次）
+        if input_price == 0.0 and output_price == 0.0 and not price_per_request:
+            provider_name = self._provider_name(provider)
+            warn_key = (provider_name, model)
+            if warn_key not in self._warned_missing:
+                self._warned_missing.add(warn_key)
                 logger.warning(
                     "未找到模型价格配置: {}/{}，请在 GlobalModel 中配置价格",
                     provider_name,
                     model,
                 )
-
-        self._price_cache[cache_key] = {"input": input_price, "output": output_price}
         return input_price, output_price
 
     async def get_cache_prices_async(
@@ -452,75 +237,7 @@ class ModelCostService:
         Returns:
             (cache_creation_price, cache_read_price) 元组
         """
-        provider_name = self._provider_name(provider)
-        cache_key = f"{provider_name}:{model}"
-
-        if cache_key in self._cache_price_cache:
-            prices = self._cache_price_cache[cache_key]
-            return prices["creation"], prices["read"]
-
-        provider_obj = self._resolve_provider(provider)
-        cache_creation_price = None
-        cache_read_price = None
-
-        if provider_obj:
-            # 直接通过 GlobalModel.name 查找（用户必须使用标准模型名称）
-            global_model = (
-                self.db.query(GlobalModel)
-                .filter(
-                    GlobalModel.name == model,
-                    GlobalModel.is_active == True,
-                )
-                .first()
-            )
-
-            # 查找该 Provider 的 Model 实现
-            if global_model:
-                model_obj = (
-                    self.db.query(Model)
-                    .filter(
-                        Model.provider_id == provider_obj.id,
-                        Model.global_model_id == global_model.id,
-                        Model.is_active == True,
-                    )
-                    .first()
-                )
-
-                if model_obj:
-                    # 检查是否有阶梯计费配置
-                    tiered = model_obj.get_effective_tiered_pricing()
-                    if tiered and tiered.get("tiers"):
-                        # 使用第一个阶梯的缓存价格作为默认值
-                        first_tier = tiered["tiers"][0]
-                        cache_creation_price = first_tier.get("cache_creation_price_per_1m")
-                        cache_read_price = first_tier.get("cache_read_price_per_1m")
-                    else:
-                        # 使用 get_effective_* 方法，会自动回退到 GlobalModel 的默认值
-                        cache_creation_price = model_obj.get_effective_cache_creation_price()
-                        cache_read_price = model_obj.get_effective_cache_read_price()
-                else:
-                    # Provider 没有实现该模型，直接使用 GlobalModel 的默认价格
-                    tiered = global_model.default_tiered_pricing
-                    if tiered and tiered.get("tiers"):
-                        first_tier = tiered["tiers"][0]
-                        cache_creation_price = first_tier.get("cache_creation_price_per_1m")
-                        cache_read_price = first_tier.get("cache_read_price_per_1m")
-                    else:
-                        cache_creation_price = None
-                        cache_read_price = None
-
-        # 默认缓存价格估算（如果没有配置）- 基于输入价格计算
-        if cache_creation_price is None or cache_read_price is None:
-            if cache_creation_price is None:
-                cache_creation_price = input_price * 1.25
-            if cache_read_price is None:
-                cache_read_price = input_price * 0.1
-
-        self._cache_price_cache[cache_key] = {
-            "creation": cache_creation_price,
-            "read": cache_read_price,
-        }
-        return cache_creation_price, cache_read_price
+        return self.get_cache_prices(provider, model, input_price)
 
     async def get_request_price_async(self, provider: ProviderRef, model: str) -> float | None:
         """
@@ -533,45 +250,11 @@ class ModelCostService:
         Returns:
             按次计费价格，如果没有配置则返回 None
         """
-        provider_obj = self._resolve_provider(provider)
-        price_per_request = None
-
-        if provider_obj:
-            # 直接通过 GlobalModel.name 查找（用户必须使用标准模型名称）
-            global_model = (
-                self.db.query(GlobalModel)
-                .filter(
-                    GlobalModel.name == model,
-                    GlobalModel.is_active == True,
-                )
-                .first()
-            )
-
-            # 查找该 Provider 的 Model 实现
-            if global_model:
-                model_obj = (
-                    self.db.query(Model)
-                    .filter(
-                        Model.provider_id == provider_obj.id,
-                        Model.global_model_id == global_model.id,
-                        Model.is_active == True,
-                    )
-                    .first()
-                )
-
-                if model_obj:
-                    # 使用 get_effective_* 方法，会自动回退到 GlobalModel 的默认值
-                    price_per_request = model_obj.get_effective_price_per_request()
-                else:
-                    # Provider 没有实现该模型，直接使用 GlobalModel 的默认价格
-                    price_per_request = global_model.default_price_per_request
-
-        return price_per_request
+        return self.get_request_price(provider, model)
 
     def get_request_price(self, provider: ProviderRef, model: str) -> float | None:
         """
         返回按次计费价格（每次请求的固定费用）。
-        直接查数据库，避免事件循环开销。
 
         Args:
             provider: Provider 对象或提供商名称
@@ -580,112 +263,32 @@ class ModelCostService:
         Returns:
             按次计费价格，如果没有配置则返回 None
         """
-        provider_obj = self._resolve_provider(provider)
-        price_per_request = None
-
-        if provider_obj:
-            global_model = (
-                self.db.query(GlobalModel)
-                .filter(
-                    GlobalModel.name == model,
-                    GlobalModel.is_active == True,
-                )
-                .first()
-            )
-
-            if global_model:
-                model_obj = (
-                    self.db.query(Model)
-                    .filter(
-                        Model.provider_id == provider_obj.id,
-                        Model.global_model_id == global_model.id,
-                        Model.is_active == True,
-                    )
-                    .first()
-                )
-
-                if model_obj:
-                    price_per_request = model_obj.get_effective_price_per_request()
-                else:
-                    price_per_request = global_model.default_price_per_request
-
-        return price_per_request
+        entry = self._pricing_entry(provider, model)
+        return entry.price_per_request if entry is not None else None
 
     def get_cache_prices(
         self, provider: ProviderRef, model: str, input_price: float
     ) -> tuple[float | None, float | None]:
         """
         返回缓存创建/读取价格（每 1M tokens）。
-        直接查缓存和数据库，避免事件循环开销。
 
         Args:
             provider: Provider 对象或提供商名称
             model: 用户请求的模型名（必须是 GlobalModel.name）
-            input_price: 基础输入价格（用于默认估算）
+            input_price: 基础输入价格（未配置缓存价格时按其估算）
 
         Returns:
             (cache_creation_price, cache_read_price) 元组
         """
-        provider_name = self._provider_name(provider)
-        cache_key = f"{provider_name}:{model}"
-
-        # 优先从缓存获取
-        if cache_key in self._cache_price_cache:
-            prices = self._cache_price_cache[cache_key]
-            return prices["creation"], prices["read"]
-
-        # 缓存未命中，同步查询数据库
-        provider_obj = self._resolve_provider(provider)
-        cache_creation_price = None
-        cache_read_price = None
-
-        if provider_obj:
-            global_model = (
-                self.db.query(GlobalModel)
-                .filter(
-                    GlobalModel.name == model,
-                    GlobalModel.is_active == True,
-                )
-                .first()
-            )
-
-            if global_model:
-                model_obj = (
-                    self.db.query(Model)
-                    .filter(
-                        Model.provider_id == provider_obj.id,
-                        Model.global_model_id == global_model.id,
-                        Model.is_active == True,
-                    )
-                    .first()
-                )
+        entry = self._pricing_entry(provider, model)
+        cache_creation_price = entry.cache_creation_price if entry is not None else None
+        cache_read_price = entry.cache_read_price if entry is not None else None
 
-                if model_obj:
-                    tiered = model_obj.get_effective_tiered_pricing()
-                    if tiered and tiered.get("tiers"):
-                        first_tier = tiered["tiers"][0]
-                        cache_creation_price = first_tier.get("cache_creation_price_per_1m")
-                        cache_read_price = first_tier.get("cache_read_price_per_1m")
-                    else:
-                        cache_creation_price = model_obj.get_effective_cache_creation_price()
-                        cache_read_price = model_obj.get_effective_cache_read_price()
-                else:
-                    tiered = global_model.default_tiered_pricing
-                    if tiered and tiered.get("tiers"):
-                        first_tier = tiered["tiers"][0]
-                        cache_creation_price = first_tier.get("cache_creation_price_per_1m")
-                        cache_read_price = first_tier.get("cache_read_price_per_1m")
-
-        # 默认缓存价格估算
+        # 默认缓存价格估算（如果没有配置）- 基于输入价格计算
         if cache_creation_price is None:
             cache_creation_price = input_price * 1.25
         if cache_read_price is None:
             cache_read_price = input_price * 0.1
-
-        self._cache_price_cache[cache_key] = {
-            "creation": cache_creation_price,
-            "read": cache_read_price,
-        }
         return cache_creation_price, cache_read_price
 
     def calculate_cost(
@@ -863,10 +466,10 @@ class ModelCostService:
 
     @classmethod
     def clear_cache(cls) -> None:
-        """清理价格相关缓存。"""
-        cls._price_cache.clear()
-        cls._cache_price_cache.clear()
-        cls._tiered_pricing_cache.clear()
+        """清理价格相关缓存（含进程内价格快照）。"""
+        cls._entry_cache.clear()
+        cls._warned_missing.clear()
+        get_pricing_snapshot_manager().invalidate()
 
     # ------------------------------------------------------------------
     # 内部辅助
@@ -877,6 +480,52 @@ class ModelCostService:
             return provider.name
         return provider or "unknown"
 
+    def _pricing_entry(self, provider: ProviderRef, model: str) -> PricingEntry | None:
+        """解析 provider/model 的价格条目；Provider 或 GlobalModel 不存在时返回 None"""
+        if config.pricing_snapshot_enabled:
+            snapshot = get_pricing_snapshot_manager().get(self.db)
+            if isinstance(provider, Provider):
+                provider_id = str(provider.id)
+            elif not provider or provider == "unknown":
+                return None
+            else:
+                provider_id = snapshot.provider_ids.get(provider)
+                if provider_id is None:
+                    return None
+            return snapshot.entry(provider_id, model)
+
+        cache_key = f"{self._provider_name(provider)}:{model}"
+        if cache_key in self._entry_cache:
+            return self._entry_cache[cache_key]
+
+        provider_obj = self._resolve_provider(provider)
+        entry = None
+        if provider_obj:
+            # 直接通过 GlobalModel.name 查找（用户必须使用标准模型名称）
+            global_model = (
+                self.db.query(GlobalModel)
+                .filter(
+                    GlobalModel.name == model,
+                    GlobalModel.is_active == True,
+                )
+                .first()
+            )
+            if global_model:
+                # 查找该 Provider 的 Model 实现（未实现时使用 GlobalModel 的默认价格）
+                model_obj = (
+                    self.db.query(Model)
+                    .filter(
+                        Model.provider_id == provider_obj.id,
+                        Model.global_model_id == global_model.id,
+                        Model.is_active == True,
+                    )
+                    .first()
+                )
+                entry = build_pricing_entry(global_model, model_obj)
+
+        self._entry_cache[cache_key] = entry
+        return entry
+
     def _resolve_provider(self, provider: ProviderRef) -> Provider | None:
         if isinstance(provider, Provider):
             return provider
@@ -49,6 +49,7 @@ from src.services.provider.adapters.antigravity.constants import (
 )
 from src.services.provider.adapters.antigravity.url_availability import url_availability
 from src.services.provider.request_context import get_selected_base_url
+from src.utils.conversation_fingerprint import fingerprint_messages
 
 # ---------------------------------------------------------------------------
 # Key normalization: snake_case → camelCase
@@ -834,24 +835,42 @@ def _inject_claude_tool_ids_response(response: dict[str, Any], model: str) -> No
 # ---------------------------------------------------------------------------
 
 
-def _generate_stable_session_id(inner_request: dict[str, Any]) -> str:
-    """生成稳定的 sessionId（对齐 CLIProxyAPI generateStableSessionID）。
+# sessionId 指纹命名空间（更改会使所有会话的 sessionId 变化）
+_SESSION_FINGERPRINT_NAMESPACE = "antigravity:session"
+
+
+def _session_anchor(inner_request: dict[str, Any]) -> list[Any] | None:
+    """sessionId 的锚点：systemInstruction + 截至首条 model 回复（含）的 contents。
 
-    基于请求内容的哈希生成确定性 sessionId，相同内容的请求会得到相同的 sessionId，
-    有助于上游维持会话上下文。
+    首条 model 回复出现后锚点不再变化，且包含模型的首次回复，开场消息相同的不同会话
+    也能区分；首轮尚无回复时锚点为当前全部 contents。
     """
-    import hashlib
-    import json
+    contents = inner_request.get("contents")
+    if not isinstance(contents, list) or not contents:
+        return None
+    end = len(contents)
+    for index, content in enumerate(contents):
+        if isinstance(content, dict) and content.get("role") == "model":
+            end = index + 1
+            break
+    return [inner_request.get("systemInstruction"), *contents[:end]]
+
 
+def _generate_stable_session_id(inner_request: dict[str, Any], project_id: str) -> str:
+    """生成稳定的 sessionId（对齐 CLIProxyAPI generateStableSessionID）。
+
+    基于会话锚点（见 _session_anchor）的指纹生成确定性 sessionId，同一会话自第二轮起
+    得到相同的 sessionId，有助于上游维持会话上下文；无 contents 时按整个请求内容生成。
+    按 project_id 隔离，并使用标准库编码，sessionId 不随实例安装的 JSON 后端变化。
+    """
     try:
-        # 使用 contents 字段生成稳定哈希（与 CLIProxyAPI 对齐）
-        contents = inner_request.get("contents")
-        if contents:
-            raw = json.dumps(contents, sort_keys=True, separators=(",", ":"))
-        else:
-            raw = json.dumps(inner_request, sort_keys=True, separators=(",", ":"))
-        digest = hashlib.sha256(raw.encode()).hexdigest()[:32]
-        return f"session-{digest}"
+        anchor = _session_anchor(inner_request)
+        fingerprint = fingerprint_messages(
+            anchor if anchor is not None else [inner_request],
+            namespace=f"{_SESSION_FINGERPRINT_NAMESPACE}|{project_id}",
+            portable=True,
+        )
+        return f"session-{fingerprint.conversation_id}"
     except Exception:
         return f"session-{uuid.uuid4().hex[:32]}"
 
@@ -920,7 +939,7 @@ def wrap_v1internal_request(
         session_id = inner_request.get("sessionId")
         if not isinstance(session_id, str):
             # 提前生成 sessionId 用于 signature 查找
-            session_id = _generate_stable_session_id(inner_request)
+            session_id = _generate_stable_session_id(inner_request, project_id)
             inner_request["sessionId"] = session_id
         _inject_thought_signatures(inner_request, session_id)
 
@@ -949,7 +968,7 @@ def wrap_v1internal_request(
 
     # 12. 注入 sessionId（如果还没有的话）
     if "sessionId" not in inner_request:
-        inner_request["sessionId"] = _generate_stable_session_id(inner_request)
+        inner_request["sessionId"] = _generate_stable_session_id(inner_request, project_id)
 
     return {
         "project": project_id,
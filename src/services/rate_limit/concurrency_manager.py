@@ -6,6 +6,7 @@ RPM 限制管理器 - 支持 Redis 或内存的 Key 级别 RPM 限制
 2. 分布式环境下优先使用 Redis，多实例共享
 3. 在开发/单实例场景下自动降级为内存计数
 4. 支持缓存用户优先级（预留槽位机制）
+5. 可选租约模式（RPM_LEASE_ENABLED）：批量预占槽位在本地消费，减少 Redis 往返
 """
 
 from __future__ import annotations
@@ -21,6 +22,8 @@ import redis.asyncio as aioredis
 
 from src.config.constants import RPMDefaults
 from src.core.logger import logger
+from src.core.metrics import rpm_redis_ops_total, rpm_slot_requests_total
+from src.services.rate_limit.rpm_lease import RPMLeaser
 
 
 class ConcurrencyManager:
@@ -50,6 +53,7 @@ class ConcurrencyManager:
         self._last_cleanup_time: float = 0  # 上次清理的时间戳，用于强制定期清理
         self._cleanup_interval_seconds: int = 300  # 强制清理间隔（5 分钟）
         self._cleanup_task: asyncio.Task | None = None  # 后台清理任务
+        self._leaser: RPMLeaser | None = None  # 租约模式（仅 Redis 模式）
 
         # 内存模式下的最大条目限制，防止内存泄漏（支持环境变量覆盖）
         self._max_memory_rpm_entries: int = int(
@@ -74,6 +78,7 @@ class ConcurrencyManager:
             self._owns_redis = False
             if self._redis:
                 logger.info("[OK] ConcurrencyManager 已复用全局 Redis 客户端")
+                self._start_leaser()
             else:
                 logger.warning(
                     "[WARN] Redis 不可用，RPM 限制降级为内存模式（仅在单实例环境下安全）"
@@ -88,6 +93,31 @@ class ConcurrencyManager:
             # 内存模式下启动后台清理任务
             self._start_background_cleanup()
 
+    def _start_leaser(self) -> None:
+        """启用 RPM 租约模式（需要配置开启）"""
+        from src.config.settings import config
+
+        if not config.rpm_lease_enabled or self._leaser is not None:
+            return
+        self._leaser = RPMLeaser(
+            self._redis,
+            redis_key=self._get_key_key,
+            current_bucket=self._get_rpm_bucket,
+            key_ttl=self._key_rpm_key_ttl_seconds,
+            max_error_ratio=config.rpm_lease_max_error_ratio,
+            horizon_seconds=config.rpm_lease_horizon_seconds,
+            idle_return_seconds=config.rpm_lease_idle_return_seconds,
+        )
+        try:
+            self._leaser.start()
+        except RuntimeError:
+            # 没有事件循环时不启动后台归还，租约仍随分钟桶过期
+            pass
+        logger.info(
+            f"[OK] RPM 租约模式已启用: max_error_ratio={config.rpm_lease_max_error_ratio}, "
+            f"horizon={config.rpm_lease_horizon_seconds}s"
+        )
+
     def _start_background_cleanup(self) -> None:
         """启动后台定期清理任务（仅内存模式需要）"""
         if self._cleanup_task is not None:
@@ -115,6 +145,14 @@ class ConcurrencyManager:
 
     async def close(self) -> None:
         """关闭 Redis 连接"""
+        # 停止租约并归还未用槽位
+        if self._leaser is not None:
+            try:
+                await self._leaser.stop()
+            except Exception as e:
+                logger.debug(f"归还 RPM 租约失败: {e}")
+            self._leaser = None
+
         # 停止后台清理任务
         if self._cleanup_task is not None:
             self._cleanup_task.cancel()
@@ -251,10 +289,21 @@ class ConcurrencyManager:
                 self._cleanup_expired_memory_rpm_counts(bucket)
                 return self._get_memory_key_rpm_count(key_id, bucket)
 
+        bucket = self._get_rpm_bucket()
+        if self._leaser is not None:
+            local_count = self._leaser.get_count(key_id, bucket)
+            if local_count is not None:
+                return local_count
+
         try:
-            key_key = self._get_key_key(key_id)
+            key_key = self._get_key_key(key_id, bucket=bucket)
             result = await self._redis.get(key_key)
-            return int(result) if result else 0
+            rpm_redis_ops_total.labels("get").inc()
+            count = int(result) if result else 0
+            if self._leaser is not None:
+                self._leaser.note_count(key_id, bucket, count)
+                return self._leaser.get_count(key_id, bucket) or 0
+            return count
         except Exception as e:
             logger.error(f"获取 RPM 计数失败: {e}")
             return 0
@@ -355,6 +404,20 @@ class ConcurrencyManager:
         bucket = self._get_rpm_bucket()
         key_key = self._get_key_key(key_id, bucket=bucket)
 
+        if self._leaser is not None and key_rpm_limit is not None:
+            try:
+                success = await self._leaser.acquire(
+                    key_id, bucket, key_rpm_limit, is_cached_user, cache_reservation_ratio
+                )
+            except Exception as e:
+                logger.error(f"获取 RPM 租约失败，降级到内存模式: {e}")
+                return await self._acquire_fallback_slot(key_id, key_rpm_limit)
+            rpm_slot_requests_total.labels("lease", "granted" if success else "rejected").inc()
+            if not success:
+                user_type = "缓存用户" if is_cached_user else "新用户"
+                logger.warning(f"[WARN] RPM 限制已达上限(租约): key={key_id}, 类型={user_type}")
+            return success
+
         try:
             # 使用 Lua 脚本保证原子性（支持缓存预留逻辑）
             lua_script = """
@@ -400,8 +463,10 @@ class ConcurrencyManager:
                 1 if is_cached_user else 0,  # 缓存用户标志
                 cache_reservation_ratio,  # 预留比例
             )
+            rpm_redis_ops_total.labels("acquire").inc()
 
             success = result == 1
+            rpm_slot_requests_total.labels("redis", "granted" if success else "rejected").inc()
 
             if success:
                 user_type = "缓存用户" if is_cached_user else "新用户"
@@ -422,28 +487,29 @@ class ConcurrencyManager:
 
         except Exception as e:
             logger.error(f"获取 RPM 槽位失败，降级到内存模式: {e}")
-            # Redis 异常时降级到内存模式进行保守限流
-            async with self._memory_lock:
-                bucket = self._get_rpm_bucket()
-                self._cleanup_expired_memory_rpm_counts(bucket)
+            return await self._acquire_fallback_slot(key_id, key_rpm_limit)
 
-                key_count = self._get_memory_key_rpm_count(key_id, bucket)
+    async def _acquire_fallback_slot(self, key_id: str, key_rpm_limit: int | None) -> bool:
+        """Redis 异常时降级到内存模式进行保守限流"""
+        async with self._memory_lock:
+            bucket = self._get_rpm_bucket()
+            self._cleanup_expired_memory_rpm_counts(bucket)
 
-                # 降级模式下使用更保守的限制（50%）
-                fallback_rpm_limit = (
-                    max(1, key_rpm_limit // 2) if key_rpm_limit is not None else None
-                )
+            key_count = self._get_memory_key_rpm_count(key_id, bucket)
 
-                if fallback_rpm_limit is not None and key_count >= fallback_rpm_limit:
-                    logger.warning(
-                        f"[FALLBACK] Key RPM 达到降级限制: {key_count}/{fallback_rpm_limit}"
-                    )
-                    return False
+            # 降级模式下使用更保守的限制（50%）
+            fallback_rpm_limit = max(1, key_rpm_limit // 2) if key_rpm_limit is not None else None
 
-                # 更新内存计数
-                self._set_memory_key_rpm_count(key_id, bucket, key_count + 1)
-                logger.debug(f"[FALLBACK] 使用内存模式获取 RPM 槽位: key={key_id}")
-                return True
+            if fallback_rpm_limit is not None and key_count >= fallback_rpm_limit:
+                logger.warning(f"[FALLBACK] Key RPM 达到降级限制: {key_count}/{fallback_rpm_limit}")
+                rpm_slot_requests_total.labels("memory", "rejected").inc()
+                return False
+
+            # 更新内存计数
+            self._set_memory_key_rpm_count(key_id, bucket, key_count + 1)
+            logger.debug(f"[FALLBACK] 使用内存模式获取 RPM 槽位: key={key_id}")
+            rpm_slot_requests_total.labels("memory", "granted").inc()
+            return True
 
     @asynccontextmanager
     async def rpm_guard(
@@ -550,6 +616,8 @@ class ConcurrencyManager:
                 logger.info(f"[RESET] 重置 Key RPM 计数(内存): {key_id}")
             return
 
+        if self._leaser is not None:
+            self._leaser.forget(key_id)
         try:
             deleted_count = await self._scan_and_delete(f"rpm:key:{key_id}:*")
             logger.info(f"[RESET] 重置 Key RPM 计数: {key_id}, 删除 {deleted_count} 个键")
@@ -566,6 +634,8 @@ class ConcurrencyManager:
                     logger.info(f"[RESET] 重置所有 Key RPM 计数(内存): {count} 个")
             return
 
+        if self._leaser is not None:
+            self._leaser.forget()
         try:
             deleted_count = await self._scan_and_delete("rpm:key:*")
             if deleted_count:
@@ -0,0 +1,331 @@
+"""
+RPM 槽位租约 - 按 Key 从 Redis 批量预占槽位，在本地消费
+
+每次请求执行一次 Lua 脚本会在关键路径上增加 Redis 往返；租约模式下每个进程
+一次原子调用预占一批槽位（INCRBY），后续请求在本地扣减，用完再续租。
+
+准确性:
+- 槽位先在 Redis 计数器中预占再使用，集群总放行数不会超过限制
+- 误差只表现为"已预占但未使用"导致的少放行：单进程持有的未用槽位不超过
+  max(1, floor(limit * RPM_LEASE_MAX_ERROR_RATIO))，集群误差上限为进程数乘以该值
+- 剩余容量不足时每次最多预占剩余的一半，避免单个进程占满尾部容量
+- 空闲超过 RPM_LEASE_IDLE_RETURN_SECONDS 或分钟桶切换时，未用槽位由后台任务归还（DECRBY）
+
+缓存预留:
+- Redis 计数低于新用户上限的部分记为通用槽位，新用户与缓存用户都可使用
+- 超出部分记为预留槽位，只有缓存用户可以使用
+
+租约大小按指数加权的请求速率估算（HORIZON 秒内的预估请求量），并受上述误差上限约束。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+from typing import Any
+
+from src.core.logger import logger
+from src.core.metrics import rpm_redis_ops_total
+
+# 预占槽位：返回 {通用槽位数, 预留槽位数, 预占后的计数}
+_LEASE_SCRIPT = """
+local key = KEYS[1]
+local limit = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+local is_cached = tonumber(ARGV[3])
+local ratio = tonumber(ARGV[4])
+local want = tonumber(ARGV[5])
+
+local count = tonumber(redis.call('GET', key) or '0')
+local new_cap = math.max(1, math.floor(limit * (1 - ratio)))
+local cap = new_cap
+if is_cached == 1 then
+    cap = limit
+end
+
+local remaining = cap - count
+if remaining <= 0 then
+    return {0, 0, count}
+end
+-- 最多预占剩余容量的一半，尾部容量留给其他进程
+local grant = math.min(want, math.max(1, math.floor(remaining / 2)))
+
+redis.call('INCRBY', key, grant)
+redis.call('EXPIRE', key, ttl)
+
+local general = math.max(0, math.min(grant, new_cap - count))
+return {general, grant - general, count + grant}
+"""
+
+# 归还槽位：计数不会被减到 0 以下（Key 被重置或过期时）
+_RETURN_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local n = math.min(tonumber(ARGV[1]), current)
+if n > 0 then
+    redis.call('DECRBY', KEYS[1], n)
+end
+return n
+"""
+
+# 本地计数估算的有效期（秒），超过后重新读取 Redis
+_COUNT_MAX_AGE_SECONDS = 1.0
+
+
+@dataclass(slots=True)
+class KeyLease:
+    """单个 Key 在某个分钟桶内的本地租约"""
+
+    bucket: int
+    # 通用槽位（新用户与缓存用户均可使用）
+    general: int = 0
+    # 预留槽位（仅缓存用户）
+    reserved: int = 0
+    # 最近一次从 Redis 得到的桶内计数（包含各进程未用完的租约）
+    observed: int = 0
+    observed_at: float = 0.0
+    # Redis 报告容量已满后，在此时间之前直接拒绝
+    new_exhausted_until: float = 0.0
+    cached_exhausted_until: float = 0.0
+    # 指数加权请求速率（次/秒）
+    demand: float = 0.0
+    demand_at: float = 0.0
+    used_at: float = 0.0
+
+    @property
+    def unspent(self) -> int:
+        return self.general + self.reserved
+
+    def take(self, is_cached_user: bool) -> bool:
+        if self.general > 0:
+            self.general -= 1
+            return True
+        if is_cached_user and self.reserved > 0:
+            self.reserved -= 1
+            return True
+        return False
+
+    def is_exhausted(self, is_cached_user: bool, now: float) -> bool:
+        until = self.cached_exhausted_until if is_cached_user else self.new_exhausted_until
+        return now < until
+
+    def note_demand(self, now: float, tau: float) -> None:
+        if self.demand_at:
+            self.demand *= math.exp(-max(0.0, now - self.demand_at) / tau)
+        self.demand += 1.0 / tau
+        self.demand_at = now
+        self.used_at = now
+
+    def estimated_count(self) -> int:
+        """集群计数估算：Redis 计数减去本进程尚未使用的槽位"""
+        return max(0, self.observed - self.unspent)
+
+
+class RPMLeaser:
+    """按 Key 管理 RPM 租约（单进程内使用，依赖事件循环串行执行）"""
+
+    def __init__(
+        self,
+        redis: Any,
+        redis_key: Callable[[str, int], str],
+        current_bucket: Callable[[], int],
+        key_ttl: int,
+        max_error_ratio: float,
+        horizon_seconds: float,
+        idle_return_seconds: float,
+    ) -> None:
+        self._redis = redis
+        self._redis_key = redis_key
+        self._current_bucket = current_bucket
+        self._key_ttl = key_ttl
+        self._max_error_ratio = max(0.0, max_error_ratio)
+        self._horizon = max(0.1, horizon_seconds)
+        self._idle_return = max(0.0, idle_return_seconds)
+        self._leases: dict[str, KeyLease] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        # 待归还的槽位：{(key_id, bucket): count}
+        self._pending_returns: dict[tuple[str, int], int] = {}
+        self._task: asyncio.Task | None = None
+
+    # ---------------- 生命周期 ----------------
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self) -> None:
+        """停止后台任务并归还全部未用槽位"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for key_id, lease in self._leases.items():
+            self._queue_return(key_id, lease)
+        self._leases.clear()
+        self._locks.clear()
+        await self.flush_returns()
+
+    async def _loop(self) -> None:
+        interval = min(1.0, self._idle_return or 1.0)
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                self.release_idle(self._current_bucket(), time.time())
+                await self.flush_returns()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.debug(f"[RPMLease] 归还租约失败: {e}")
+
+    # ---------------- 获取槽位 ----------------
+
+    async def acquire(
+        self,
+        key_id: str,
+        bucket: int,
+        key_rpm_limit: int,
+        is_cached_user: bool,
+        cache_reservation_ratio: float,
+    ) -> bool:
+        """获取一个槽位；Redis 异常向上抛出，由调用方降级"""
+        now = time.time()
+        lease = self._current_lease(key_id, bucket)
+        lease.note_demand(now, self._horizon)
+        if lease.take(is_cached_user):
+            return True
+        if lease.is_exhausted(is_cached_user, now):
+            return False
+
+        lock = self._locks.get(key_id)
+        if lock is None:
+            lock = self._locks[key_id] = asyncio.Lock()
+        async with lock:
+            # 等锁期间其他协程可能已续租
+            lease = self._current_lease(key_id, bucket)
+            if lease.take(is_cached_user):
+                return True
+
+            want = self._lease_size(lease, key_rpm_limit)
+            result = await self._redis.eval(
+                _LEASE_SCRIPT,
+                1,
+                self._redis_key(key_id, bucket),
+                key_rpm_limit,
+                self._key_ttl,
+                1 if is_cached_user else 0,
+                cache_reservation_ratio,
+                want,
+            )
+            rpm_redis_ops_total.labels("lease").inc()
+            general, reserved, count = (int(x) for x in result)
+
+            now = time.time()
+            lease.general += general
+            lease.reserved += reserved
+            lease.observed = count
+            lease.observed_at = now
+            if general + reserved == 0:
+                retry_at = now + min(1.0, self._horizon)
+                if is_cached_user:
+                    lease.cached_exhausted_until = retry_at
+                else:
+                    lease.new_exhausted_until = retry_at
+                return False
+            return lease.take(is_cached_user)
+
+    def _lease_size(self, lease: KeyLease, key_rpm_limit: int) -> int:
+        max_lease = max(1, math.floor(key_rpm_limit * self._max_error_ratio))
+        want = math.ceil(lease.demand * self._horizon)
+        return max(1, min(want, max_lease))
+
+    def _current_lease(self, key_id: str, bucket: int) -> KeyLease:
+        lease = self._leases.get(key_id)
+        if lease is None or lease.bucket != bucket:
+            if lease is not None:
+                # 分钟桶切换：旧桶未用槽位交给后台归还，保留速率估算
+                self._queue_return(key_id, lease)
+                new_lease = KeyLease(bucket, demand=lease.demand, demand_at=lease.demand_at)
+            else:
+                new_lease = KeyLease(bucket)
+            lease = self._leases[key_id] = new_lease
+        return lease
+
+    # ---------------- 计数 ----------------
+
+    def get_count(self, key_id: str, bucket: int) -> int | None:
+        """返回本地估算的计数；没有足够新的观测值时返回 None"""
+        lease = self._leases.get(key_id)
+        if lease is None or lease.bucket != bucket:
+            return None
+        if time.time() - lease.observed_at > _COUNT_MAX_AGE_SECONDS:
+            return None
+        return lease.estimated_count()
+
+    def note_count(self, key_id: str, bucket: int, count: int) -> None:
+        """记录一次从 Redis 读取到的计数"""
+        lease = self._current_lease(key_id, bucket)
+        lease.observed = count
+        lease.observed_at = time.time()
+
+    # ---------------- 归还 ----------------
+
+    def release_idle(self, current_bucket: int, now: float) -> None:
+        """空闲租约与旧桶租约加入待归还队列，旧桶租约同时移除"""
+        for key_id, lease in list(self._leases.items()):
+            stale = lease.bucket < current_bucket
+            if not stale and now - lease.used_at < self._idle_return:
+                continue
+            self._queue_return(key_id, lease)
+            if stale:
+                del self._leases[key_id]
+                lock = self._locks.get(key_id)
+                if lock is not None and not lock.locked():
+                    del self._locks[key_id]
+
+    def _queue_return(self, key_id: str, lease: KeyLease) -> None:
+        if lease.unspent <= 0:
+            return
+        slot = (key_id, lease.bucket)
+        self._pending_returns[slot] = self._pending_returns.get(slot, 0) + lease.unspent
+        lease.observed = lease.estimated_count()
+        lease.general = lease.reserved = 0
+
+    async def flush_returns(self) -> int:
+        """归还待归还槽位，返回归还数量"""
+        returned = 0
+        while self._pending_returns:
+            (key_id, bucket), n = self._pending_returns.popitem()
+            try:
+                returned += int(
+                    await self._redis.eval(_RETURN_SCRIPT, 1, self._redis_key(key_id, bucket), n)
+                )
+                rpm_redis_ops_total.labels("return").inc()
+            except Exception as e:
+                # 归还失败只影响少放行，槽位随分钟桶过期
+                logger.debug(f"[RPMLease] 归还槽位失败: key={key_id}, n={n}, error={e}")
+        return returned
+
+    def forget(self, key_id: str | None = None) -> None:
+        """丢弃本地租约（计数被重置后调用，不归还）"""
+        if key_id is None:
+            self._leases.clear()
+            self._pending_returns.clear()
+            return
+        self._leases.pop(key_id, None)
+        for slot in [s for s in self._pending_returns if s[0] == key_id]:
+            del self._pending_returns[slot]
+
+    def get_stats(self) -> dict[str, Any]:
+        return {
+            "leases": len(self._leases),
+            "unspent": sum(lease.unspent for lease in self._leases.values()),
+            "pending_returns": sum(self._pending_returns.values()),
+        }
+
+
+__all__ = ["KeyLease", "RPMLeaser"]
@@ -0,0 +1,417 @@
+"""
+活动时间合并写入（write-behind）
+
+API Key 的 last_used_at、Management Token 的 last_used_at/last_used_ip/usage_count 等
+"touch" 写入不再在请求内 commit：
+
+- 请求路径调用 record_activity() 只更新进程内字典（同一实体在一个周期内合并为一条：
+  时间取最大值、计数累加、IP 取最新）
+- ActivityFlusher 每 ACTIVITY_FLUSH_INTERVAL_SECONDS 取出累积的记录，每类实体一条
+  UPDATE ... FROM (VALUES ...) 写入（PostgreSQL；其他方言按主键 executemany）
+- 可选 Redis 汇聚（ACTIVITY_FLUSH_REDIS_ENABLED）：各进程先把本地记录合并进 Redis hash，
+  再由抢到本周期锁的进程原子取出并写库，集群内同一实体每周期只写一次
+- 写库失败时记录放回内存，下个周期重试；进程崩溃最多丢失一个周期的本地记录
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import DateTime, Integer, String, bindparam, case, column, func, update, values
+
+from src.core.logger import logger
+from src.core.metrics import activity_flush_rows_total, activity_flush_seconds
+from src.models.database import ApiKey, ManagementToken
+
+ACTIVITY_FLUSH_INTERVAL_SECONDS = float(os.getenv("ACTIVITY_FLUSH_INTERVAL_SECONDS", "5"))
+ACTIVITY_FLUSH_REDIS_ENABLED = os.getenv("ACTIVITY_FLUSH_REDIS_ENABLED", "false").lower() == "true"
+
+_REDIS_KEY_PREFIX = "activity"
+_REDIS_LOCK_KEY = "activity:flush_lock"
+
+# 合并本地记录：时间取最大值、计数累加、IP 覆盖
+# KEYS: ts/count/ip 三个 hash；ARGV: 每 4 个一组 (id, ts, count, ip)
+_MERGE_SCRIPT = """
+for i = 1, #ARGV, 4 do
+    local id = ARGV[i]
+    local cur = tonumber(redis.call('HGET', KEYS[1], id) or '0')
+    if tonumber(ARGV[i + 1]) > cur then
+        redis.call('HSET', KEYS[1], id, ARGV[i + 1])
+    end
+    if tonumber(ARGV[i + 2]) > 0 then
+        redis.call('HINCRBY', KEYS[2], id, ARGV[i + 2])
+    end
+    if ARGV[i + 3] ~= '' then
+        redis.call('HSET', KEYS[3], id, ARGV[i + 3])
+    end
+end
+return 1
+"""
+
+# 原子取出并清空
+_DRAIN_SCRIPT = """
+local out = {}
+for i, key in ipairs(KEYS) do
+    out[i] = redis.call('HGETALL', key)
+    redis.call('DEL', key)
+end
+return out
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class ActivityTarget:
+    """一类可合并写入的实体"""
+
+    model: type
+    ts_column: str
+    count_column: str | None = None
+    ip_column: str | None = None
+    # 与时间列一起推进的更新时间列（Core UPDATE 不经过 ORM，需要显式写入）
+    updated_column: str | None = None
+
+
+ACTIVITY_TARGETS: dict[str, ActivityTarget] = {
+    "api_key": ActivityTarget(ApiKey, "last_used_at"),
+    "management_token": ActivityTarget(
+        ManagementToken,
+        "last_used_at",
+        count_column="usage_count",
+        ip_column="last_used_ip",
+        updated_column="updated_at",
+    ),
+}
+
+
+@dataclass(slots=True)
+class Touch:
+    ts: float
+    count: int = 0
+    ip: str | None = None
+
+    def merge(self, other: Touch) -> None:
+        if other.ts > self.ts:
+            self.ts = other.ts
+            if other.ip:
+                self.ip = other.ip
+        elif other.ip and not self.ip:
+            self.ip = other.ip
+        self.count += other.count
+
+
+Batch = dict[str, dict[str, Touch]]
+
+
+class ActivityRecorder:
+    """进程内累积的活动记录（线程安全）"""
+
+    def __init__(self) -> None:
+        self._pending: Batch = {}
+        self._lock = threading.Lock()
+
+    def record(self, kind: str, entity_id: str, *, count: int = 0, ip: str | None = None) -> None:
+        touch = Touch(time.time(), count, ip)
+        with self._lock:
+            entries = self._pending.setdefault(kind, {})
+            existing = entries.get(entity_id)
+            if existing is None:
+                entries[entity_id] = touch
+            else:
+                existing.merge(touch)
+
+    def drain(self) -> Batch:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        return batch
+
+    def restore(self, batch: Batch) -> None:
+        """写库失败时放回，与期间新产生的记录合并"""
+        with self._lock:
+            for kind, entries in batch.items():
+                pending = self._pending.setdefault(kind, {})
+                for entity_id, touch in entries.items():
+                    existing = pending.get(entity_id)
+                    if existing is None:
+                        pending[entity_id] = touch
+                    else:
+                        existing.merge(touch)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return sum(len(entries) for entries in self._pending.values())
+
+
+activity_recorder = ActivityRecorder()
+
+
+def record_activity(kind: str, entity_id: str, *, count: int = 0, ip: str | None = None) -> None:
+    """记录一次实体活动（只写内存，由 ActivityFlusher 合并写库）
+
+    Args:
+        kind: ACTIVITY_TARGETS 中的实体类型
+        entity_id: 实体主键
+        count: 计数列增量（实体类型配置了 count_column 时生效）
+        ip: 最近使用 IP（实体类型配置了 ip_column 时生效）
+    """
+    activity_recorder.record(kind, entity_id, count=count, ip=ip)
+
+
+# ---------- 写库 ----------
+
+
+def write_batch(db: Any, batch: Batch) -> int:
+    """每类实体一条 UPDATE（调用方负责 commit），返回写入的实体数"""
+    written = 0
+    postgres = db.get_bind().dialect.name == "postgresql"
+    for kind, entries in batch.items():
+        target = ACTIVITY_TARGETS.get(kind)
+        if target is None or not entries:
+            continue
+        if postgres:
+            _update_from_values(db, target, entries)
+        else:
+            _update_executemany(db, target, entries)
+        activity_flush_rows_total.labels(kind).inc(len(entries))
+        written += len(entries)
+    return written
+
+
+def _assignments(target: ActivityTarget, ts: Any, count: Any, ip: Any) -> dict[str, Any]:
+    table = target.model.__table__
+    ts_column = table.c[target.ts_column]
+    # 只向前推进：其他路径可能已写入更晚的时间
+    result: dict[str, Any] = {
+        target.ts_column: case((ts_column.is_(None) | (ts_column < ts), ts), else_=ts_column)
+    }
+    if target.updated_column:
+        updated_column = table.c[target.updated_column]
+        result[target.updated_column] = case(
+            (updated_column.is_(None) | (updated_column < ts), ts), else_=updated_column
+        )
+    if target.count_column:
+        result[target.count_column] = func.coalesce(table.c[target.count_column], 0) + count
+    if target.ip_column:
+        result[target.ip_column] = func.coalesce(ip, table.c[target.ip_column])
+    return result
+
+
+def _to_datetime(ts: float) -> datetime:
+    return datetime.fromtimestamp(ts, tz=timezone.utc)
+
+
+def _update_from_values(db: Any, target: ActivityTarget, entries: dict[str, Touch]) -> None:
+    touched = values(
+        column("id", String),
+        column("ts", DateTime(timezone=True)),
+        column("cnt", Integer),
+        column("ip", String),
+        name="touched",
+    ).data([(i, _to_datetime(t.ts), t.count, t.ip) for i, t in entries.items()])
+    table = target.model.__table__
+    db.execute(
+        update(table)
+        .where(table.c.id == touched.c.id)
+        .values(_assignments(target, touched.c.ts, touched.c.cnt, touched.c.ip))
+    )
+
+
+def _update_executemany(db: Any, target: ActivityTarget, entries: dict[str, Touch]) -> None:
+    table = target.model.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(
+            _assignments(
+                target,
+                bindparam("b_ts", type_=DateTime(timezone=True)),
+                bindparam("b_count", type_=Integer),
+                bindparam("b_ip", type_=String),
+            )
+        )
+    )
+    rows = [
+        {"b_id": i, "b_ts": _to_datetime(t.ts), "b_count": t.count, "b_ip": t.ip}
+        for i, t in entries.items()
+    ]
+    db.connection().execute(stmt, rows)
+
+
+# ---------- Redis 汇聚 ----------
+
+
+def _redis_keys(kind: str) -> list[str]:
+    return [f"{_REDIS_KEY_PREFIX}:{kind}:{field}" for field in ("ts", "count", "ip")]
+
+
+async def merge_into_redis(redis_client: Any, batch: Batch) -> set[str]:
+    """逐类合并到 Redis，返回已合并的实体类型
+
+    某一类失败时不再继续，未合并的类型由调用方直接写库；已合并的类型不能再直接写库，
+    否则计数会被重复累加。
+    """
+    merged: set[str] = set()
+    for kind, entries in batch.items():
+        if entries:
+            args: list[Any] = []
+            for entity_id, touch in entries.items():
+                args.extend((entity_id, repr(touch.ts), touch.count, touch.ip or ""))
+            try:
+                await redis_client.eval(_MERGE_SCRIPT, 3, *_redis_keys(kind), *args)
+            except Exception as e:
+                logger.warning(f"[Activity] 合并到 Redis 失败，直接写库: kind={kind} {e}")
+                break
+        merged.add(kind)
+    return merged
+
+
+async def drain_redis(redis_client: Any) -> Batch:
+    batch: Batch = {}
+    for kind in ACTIVITY_TARGETS:
+        ts_items, count_items, ip_items = await redis_client.eval(
+            _DRAIN_SCRIPT, 3, *_redis_keys(kind)
+        )
+        counts = _pairs_to_dict(count_items)
+        ips = _pairs_to_dict(ip_items)
+        entries = {
+            entity_id: Touch(float(ts), int(counts.get(entity_id, 0)), ips.get(entity_id))
+            for entity_id, ts in _pairs_to_dict(ts_items).items()
+        }
+        if entries:
+            batch[kind] = entries
+    return batch
+
+
+def _decode(value: Any) -> str:
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def _pairs_to_dict(items: list[Any]) -> dict[str, str]:
+    flat = [_decode(v) for v in items]
+    return dict(zip(flat[::2], flat[1::2]))
+
+
+# ---------- 后台任务 ----------
+
+
+class ActivityFlusher:
+    """后台任务：周期合并写入活动记录"""
+
+    def __init__(self, interval: float = ACTIVITY_FLUSH_INTERVAL_SECONDS) -> None:
+        self.interval = max(0.1, interval)
+        self._task: asyncio.Task | None = None
+        self._lock_token = uuid.uuid4().hex
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(
+                f"[Activity] 活动记录合并写入已启动: interval={self.interval}s, "
+                f"redis={'on' if ACTIVITY_FLUSH_REDIS_ENABLED else 'off'}"
+            )
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        # 关闭时不等待 Redis 锁，直接写入本进程与 Redis 中剩余的记录
+        await self.flush(force=True)
+        logger.info("[Activity] 活动记录合并写入已停止")
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[Activity] 活动记录写入失败: {e}")
+
+    async def flush(self, force: bool = False) -> int:
+        batch = activity_recorder.drain()
+        redis_client = get_activity_redis_client()
+        if redis_client is not None:
+            merged = await merge_into_redis(redis_client, batch)
+            if len(merged) == len(batch):
+                batch = {}
+                if force or await self._acquire_round(redis_client):
+                    batch = await drain_redis(redis_client)
+            else:
+                # 部分失败：只直接写入未合并的类型
+                batch = {kind: entries for kind, entries in batch.items() if kind not in merged}
+        if not batch:
+            return 0
+
+        from src.database.database import get_db_context
+        from src.utils.async_utils import run_in_executor
+
+        def _write() -> int:
+            with get_db_context() as db:
+                return write_batch(db, batch)
+
+        start = time.perf_counter()
+        try:
+            written = await run_in_executor(_write)
+        except Exception:
+            activity_recorder.restore(batch)
+            raise
+        activity_flush_seconds.observe(time.perf_counter() - start)
+        if written:
+            logger.debug(f"[Activity] 合并写入活动记录: {written} 条")
+        return written
+
+    async def _acquire_round(self, redis_client: Any) -> bool:
+        """每个周期只有一个进程从 Redis 取出并写库"""
+        ttl_ms = max(100, int(self.interval * 1000) - 50)
+        return bool(await redis_client.set(_REDIS_LOCK_KEY, self._lock_token, nx=True, px=ttl_ms))
+
+
+def get_activity_redis_client() -> Any:
+    if not ACTIVITY_FLUSH_REDIS_ENABLED:
+        return None
+    from src.clients.redis_client import get_redis_client_sync
+
+    return get_redis_client_sync()
+
+
+_flusher: ActivityFlusher | None = None
+
+
+async def start_activity_flusher() -> ActivityFlusher:
+    global _flusher
+    if _flusher is None:
+        _flusher = ActivityFlusher()
+        await _flusher.start()
+    return _flusher
+
+
+async def stop_activity_flusher() -> None:
+    global _flusher
+    if _flusher is not None:
+        await _flusher.stop()
+        _flusher = None
+
+
+__all__ = [
+    "ACTIVITY_TARGETS",
+    "ActivityFlusher",
+    "ActivityRecorder",
+    "ActivityTarget",
+    "activity_recorder",
+    "record_activity",
+    "start_activity_flusher",
+    "stop_activity_flusher",
+    "write_batch",
+]
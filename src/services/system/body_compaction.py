@@ -0,0 +1,353 @@
+"""
+使用记录 body 压缩流水线（维护任务：request_body / response_body -> *_compressed）
+
+原实现逐条 UPDATE、在事件循环上同步 gzip，并用不断增长的 processed_ids 集合防止死循环。
+这里改为三段流水线：
+
+- 读取：按 (created_at, id) 键集分页，只取仍有 body 的过期行；body 以 JSON 文本读出
+  （cast 为 Text），不经过反序列化/再序列化
+- 压缩：每页切片后提交到进程池（spawn；USAGE_COMPACTION_WORKERS=0 时为线程池），
+  任务函数 compress_rows 在不依赖数据库的 src.utils.body_codec 中；
+  USAGE_BODY_STORE 开启时请求体拆分为内容寻址的段去重存储（见 body_store），
+  无法分段的请求体和响应体仍整体 gzip
+- 写入：每页一条段 upsert + 一条 UPDATE ... FROM (VALUES ...)（PostgreSQL；其他方言
+  executemany），同一事务内写入检查点 (created_at, id) 到 system_configs
+
+读取下一页与压缩/写入当前页并行；数据库操作都在线程池中执行，不阻塞事件循环。
+检查点之前的行已全部处理，重启后从检查点继续，不再重新扫描。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+import time
+from collections.abc import Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    JSON,
+    LargeBinary,
+    String,
+    Text,
+    bindparam,
+    cast,
+    column,
+    null,
+    or_,
+    tuple_,
+    update,
+    values,
+)
+from sqlalchemy.orm import Session
+
+from src.config.settings import config
+from src.core.logger import logger
+from src.core.metrics import (
+    usage_body_compaction_bytes_total,
+    usage_body_compaction_rows_total,
+    usage_body_compaction_seconds,
+)
+from src.database import create_session
+from src.models.database import SystemConfig, Usage
+from src.services.system.body_store import load_latest_dictionary, upsert_segments
+from src.utils.async_utils import run_in_executor
+from src.utils.body_codec import BodyRow, CompressedRow, Dictionary, Segments, compress_rows
+
+CHECKPOINT_KEY = "usage_body_compaction_checkpoint"
+# 每处理多少页输出一次进度日志
+PROGRESS_LOG_EVERY = 20
+
+Checkpoint = tuple[datetime, str]
+
+
+@dataclass(slots=True)
+class CompactionResult:
+    rows: int = 0
+    batches: int = 0
+    segments: int = 0
+    raw_bytes: int = 0
+    compressed_bytes: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.elapsed if self.elapsed > 0 else 0.0
+
+
+@dataclass(slots=True)
+class _Page:
+    rows: list[BodyRow]
+    last: Checkpoint
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite 返回 naive datetime
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+def _merge_segments(parts: Sequence[Segments]) -> Segments:
+    merged: Segments = {}
+    for part in parts:
+        for digest, segment in part.items():
+            existing = merged.get(digest)
+            if existing is None:
+                merged[digest] = segment
+            else:
+                existing.refs += segment.refs
+    return merged
+
+
+# ---------- 检查点 ----------
+
+
+def load_checkpoint(db: Session) -> Checkpoint | None:
+    row = db.query(SystemConfig.value).filter(SystemConfig.key == CHECKPOINT_KEY).first()
+    value = row[0] if row else None
+    if not isinstance(value, dict) or not value.get("created_at") or not value.get("id"):
+        return None
+    try:
+        return _as_utc(datetime.fromisoformat(value["created_at"])), str(value["id"])
+    except ValueError:
+        logger.warning(f"body 压缩检查点格式无效，从头开始: {value}")
+        return None
+
+
+def _save_checkpoint(db: Session, checkpoint: Checkpoint) -> None:
+    """写入检查点（随当前事务提交）"""
+    value = {"created_at": checkpoint[0].isoformat(), "id": checkpoint[1]}
+    entry = db.query(SystemConfig).filter(SystemConfig.key == CHECKPOINT_KEY).first()
+    if entry is None:
+        db.add(SystemConfig(key=CHECKPOINT_KEY, value=value, description="使用记录 body 压缩进度"))
+    else:
+        entry.value = value
+
+
+# ---------- 读取 / 写入（同步，在线程池中执行） ----------
+
+
+def fetch_page(cutoff: datetime, after: Checkpoint | None, limit: int) -> _Page | None:
+    with create_session() as db:
+        query = db.query(
+            Usage.id,
+            Usage.created_at,
+            cast(Usage.request_body, Text),
+            cast(Usage.response_body, Text),
+        ).filter(
+            Usage.created_at < cutoff,
+            or_(Usage.request_body.isnot(None), Usage.response_body.isnot(None)),
+        )
+        if after is not None:
+            query = query.filter(tuple_(Usage.created_at, Usage.id) > tuple_(*after))
+        records = query.order_by(Usage.created_at, Usage.id).limit(limit).all()
+    if not records:
+        return None
+    last = records[-1]
+    return _Page(
+        rows=[(r[0], r[2], r[3]) for r in records],
+        last=(_as_utc(last[1]), last[0]),
+    )
+
+
+def write_page(rows: Sequence[CompressedRow], segments: Segments, checkpoint: Checkpoint) -> None:
+    with create_session() as db:
+        # 段先于引用它的清单写入；last_seen_at 取本页最大 created_at
+        upsert_segments(db, segments, checkpoint[0])
+        if db.get_bind().dialect.name == "postgresql":
+            _update_from_values(db, rows)
+        else:
+            _update_executemany(db, rows)
+        _save_checkpoint(db, checkpoint)
+        db.commit()
+
+
+def _update_from_values(db: Session, rows: Sequence[CompressedRow]) -> None:
+    compacted = values(
+        column("id", String),
+        column("request_body_compressed", LargeBinary),
+        column("response_body_compressed", LargeBinary),
+        column("request_body_ref", Text),
+        name="compacted",
+    ).data([(*row[:3], row[4]) for row in rows])
+    table = Usage.__table__
+    db.execute(
+        update(table)
+        .where(table.c.id == compacted.c.id)
+        .values(
+            # null() 确保写入 SQL NULL 而不是 JSON null
+            request_body=null(),
+            response_body=null(),
+            request_body_compressed=cast(compacted.c.request_body_compressed, LargeBinary),
+            response_body_compressed=cast(compacted.c.response_body_compressed, LargeBinary),
+            # 清单以文本传入，SQL NULL 保持为 NULL
+            request_body_ref=cast(compacted.c.request_body_ref, JSON),
+        )
+    )
+
+
+def _update_executemany(db: Session, rows: Sequence[CompressedRow]) -> None:
+    table = Usage.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values(
+            request_body=null(),
+            response_body=null(),
+            request_body_compressed=bindparam("b_request", type_=LargeBinary),
+            response_body_compressed=bindparam("b_response", type_=LargeBinary),
+            request_body_ref=bindparam("b_ref", type_=Text),
+        )
+    )
+    db.connection().execute(
+        stmt,
+        [{"b_id": r[0], "b_request": r[1], "b_response": r[2], "b_ref": r[4]} for r in rows],
+    )
+
+
+# ---------- 流水线 ----------
+
+
+class UsageBodyCompactor:
+    """按检查点续跑的 body 压缩流水线"""
+
+    def __init__(
+        self, batch_size: int = 1000, workers: int | None = None, body_store: bool | None = None
+    ) -> None:
+        self.batch_size = max(1, batch_size)
+        self.workers = config.usage_compaction_workers if workers is None else workers
+        self.body_store = config.usage_body_store_enabled if body_store is None else body_store
+        self._dictionary: Dictionary | None = None
+        self._pool: ProcessPoolExecutor | None = None
+
+    def _executor(self) -> Executor | None:
+        if self.workers <= 0:
+            return None
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._pool
+
+    def _shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _compress(self, rows: list[BodyRow]) -> tuple[list[CompressedRow], Segments]:
+        loop = asyncio.get_running_loop()
+        slices = max(1, self.workers)
+        size = -(-len(rows) // slices)
+        parts = [rows[i : i + size] for i in range(0, len(rows), size)]
+        args = (self.body_store, self._dictionary)
+        try:
+            executor = self._executor()
+            results = await asyncio.gather(
+                *(loop.run_in_executor(executor, compress_rows, part, *args) for part in parts)
+            )
+        except BrokenProcessPool:
+            logger.warning("body 压缩进程池异常，改用线程池")
+            self._shutdown()
+            self.workers = 0
+            results = [await loop.run_in_executor(None, compress_rows, rows, *args)]
+        compressed = [row for part in results for row in part[0]]
+        return compressed, _merge_segments([part[1] for part in results])
+
+    async def run(self, cutoff: datetime) -> CompactionResult:
+        result = CompactionResult()
+        started = time.perf_counter()
+        with create_session() as db:
+            after = load_checkpoint(db)
+        if self.body_store:
+            self._dictionary = await run_in_executor(load_latest_dictionary)
+        if after is not None:
+            logger.info(f"body 压缩从检查点继续: created_at={after[0].isoformat()}, id={after[1]}")
+
+        fetch_task: asyncio.Task | None = asyncio.create_task(self._timed_fetch(cutoff, after))
+        write_task: asyncio.Task | None = None
+        try:
+            while fetch_task is not None:
+                page = await fetch_task
+                fetch_task = None
+                if page is None:
+                    break
+                # 当前页压缩/写入期间预取下一页
+                fetch_task = asyncio.create_task(self._timed_fetch(cutoff, page.last))
+
+                with usage_body_compaction_seconds.labels(stage="compress").time():
+                    compressed, segments = await self._compress(page.rows)
+
+                # 按顺序写入，保证检查点单调前进
+                if write_task is not None:
+                    await write_task
+                write_task = asyncio.create_task(self._timed_write(compressed, segments, page.last))
+
+                raw = sum(row[3] for row in compressed)
+                packed = sum(len(row[1] or b"") + len(row[2] or b"") for row in compressed)
+                packed += sum(len(segment.data) for segment in segments.values())
+                result.rows += len(compressed)
+                result.batches += 1
+                result.segments += len(segments)
+                result.raw_bytes += raw
+                result.compressed_bytes += packed
+                usage_body_compaction_rows_total.inc(len(compressed))
+                usage_body_compaction_bytes_total.labels(kind="raw").inc(raw)
+                usage_body_compaction_bytes_total.labels(kind="compressed").inc(packed)
+
+                if result.batches % PROGRESS_LOG_EVERY == 0:
+                    result.elapsed = time.perf_counter() - started
+                    logger.info(
+                        f"body 压缩进度: {result.rows} 条, {result.rows_per_second:.0f} 条/秒, "
+                        f"进度至 {page.last[0].isoformat()}"
+                    )
+            if write_task is not None:
+                await write_task
+        finally:
+            for task in (fetch_task, write_task):
+                if task is not None and not task.done():
+                    task.cancel()
+            self._shutdown()
+
+        result.elapsed = time.perf_counter() - started
+        if result.rows:
+            ratio = result.compressed_bytes / result.raw_bytes if result.raw_bytes else 0.0
+            logger.info(
+                f"body 压缩完成: {result.rows} 条 / {result.batches} 批 / {result.segments} 段, "
+                f"耗时 {result.elapsed:.1f}s ({result.rows_per_second:.0f} 条/秒), "
+                f"压缩率 {ratio:.1%}"
+            )
+        return result
+
+    async def _timed_fetch(self, cutoff: datetime, after: Checkpoint | None) -> _Page | None:
+        with usage_body_compaction_seconds.labels(stage="fetch").time():
+            return await run_in_executor(fetch_page, cutoff, after, self.batch_size)
+
+    async def _timed_write(
+        self, rows: list[CompressedRow], segments: Segments, checkpoint: Checkpoint
+    ) -> None:
+        with usage_body_compaction_seconds.labels(stage="write").time():
+            await run_in_executor(write_page, rows, segments, checkpoint)
+
+
+async def compact_usage_bodies(
+    cutoff: datetime,
+    batch_size: int = 1000,
+    workers: int | None = None,
+    body_store: bool | None = None,
+) -> CompactionResult:
+    """压缩 cutoff 之前仍保留明文 body 的使用记录"""
+    return await UsageBodyCompactor(batch_size, workers, body_store).run(cutoff)
+
+
+__all__ = [
+    "CHECKPOINT_KEY",
+    "CompactionResult",
+    "UsageBodyCompactor",
+    "compact_usage_bodies",
+    "compress_rows",
+    "fetch_page",
+    "load_checkpoint",
+    "write_page",
+]
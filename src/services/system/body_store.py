@@ -0,0 +1,441 @@
+"""
+使用记录请求体的内容寻址去重存储
+
+Agent 类客户端每一轮都会重发相同的 system prompt、工具定义和历史消息，usage 表中的请求体
+绝大部分是重复字节。body 压缩维护任务（见 body_compaction）把过期请求体移出明文列时，
+将其拆成稳定的段：
+
+- 整块段：system / tools / instructions（Gemini 的 systemInstruction 同理）
+- 逐条段：messages / contents / input 列表中的每一条
+
+每段按 JSON 字节的 blake2b-128 摘要寻址，在 usage_body_segments 中只存一份；
+usage.request_body_ref 只保存清单（其余顶层字段 + 段哈希），读取时由
+Usage.get_request_body() 按需还原。没有可分段字段的请求体仍走整体 gzip。
+
+段压缩优先使用 zstd（安装 zstandard 时；有训练字典时带字典压缩，小段收益明显），
+否则回退到 gzip。段内容不可变，解压结果按哈希缓存在进程内。分段与段编码本身在
+src.utils.body_codec 中（不依赖数据库，供压缩进程池使用），本模块负责读写与维护。
+
+段的 last_seen_at 记录引用它的最新使用记录的 created_at，压缩字段保留期到期时
+与 usage 上的清单一起回收。
+
+命令行：
+    python -m src.services.system.body_store train [--samples 2000]
+    python -m src.services.system.body_store backfill [--batch-size 500]
+    python -m src.services.system.body_store report
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import os
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import Text, bindparam, case, func, tuple_, update
+from sqlalchemy.orm import Session
+
+from src.core.cache_utils import SyncLRUCache
+from src.core.logger import logger
+from src.database import create_session
+from src.models.database import Usage, UsageBodyDictionary, UsageBodySegment
+from src.utils import json_codec
+from src.utils.body_codec import (
+    Dictionary,
+    EncodedSegment,
+    assemble_request_body,
+    encode_request_body,
+    manifest_hashes,
+    split_request_body,
+    zstd_available,
+    zstd_codec,
+)
+from src.utils.compression import decompress_json
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+DICTIONARY_SIZE = 112 * 1024
+# 解压后的段缓存（按哈希，段内容不可变）
+SEGMENT_CACHE_SIZE = int(os.getenv("USAGE_BODY_SEGMENT_CACHE_SIZE", "2048"))
+
+Checkpoint = tuple[datetime, str]
+
+
+@dataclass(slots=True)
+class BackfillResult:
+    scanned: int = 0
+    converted: int = 0
+    segments: int = 0
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite 返回 naive datetime
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value
+
+
+# ---------- 段编解码 ----------
+
+_dictionaries: dict[int, bytes] = {}
+_dictionaries_lock = threading.Lock()
+_segment_cache = SyncLRUCache(max_size=SEGMENT_CACHE_SIZE, ttl=3600)
+
+
+def decode_segment(db: Session, codec: str, data: bytes) -> bytes:
+    if codec == "gzip":
+        return gzip.decompress(data)
+    name, _, dict_id = codec.partition(":")
+    if name != "zstd":
+        raise ValueError(f"未知的段编码: {codec}")
+    if _zstd is None:
+        raise RuntimeError("请求体分段使用 zstd 压缩，但未安装 zstandard")
+    dictionary = (int(dict_id), _load_dictionary(db, int(dict_id))) if dict_id else None
+    return zstd_codec("decompressors", dictionary).decompress(data)
+
+
+def _load_dictionary(db: Session, dict_id: int) -> bytes:
+    data = _dictionaries.get(dict_id)
+    if data is None:
+        row = db.query(UsageBodyDictionary.data).filter(UsageBodyDictionary.id == dict_id).first()
+        if row is None:
+            raise KeyError(f"zstd 字典不存在: {dict_id}")
+        with _dictionaries_lock:
+            data = _dictionaries.setdefault(dict_id, bytes(row[0]))
+    return data
+
+
+def load_latest_dictionary() -> Dictionary | None:
+    """最新训练的字典（未安装 zstandard 时返回 None）"""
+    if _zstd is None:
+        return None
+    with create_session() as db:
+        row = (
+            db.query(UsageBodyDictionary.id, UsageBodyDictionary.data)
+            .order_by(UsageBodyDictionary.id.desc())
+            .first()
+        )
+    return (row[0], bytes(row[1])) if row else None
+
+
+# ---------- 读写 ----------
+
+
+def upsert_segments(db: Session, segments: Mapping[str, EncodedSegment], seen_at: datetime) -> None:
+    """写入段：已存在的段只累加引用次数并推进 last_seen_at（随当前事务提交）"""
+    if not segments:
+        return
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    table = UsageBodySegment.__table__
+    stmt = dialect_insert(table)
+    excluded = stmt.excluded
+    # 按哈希排序，并发写入时加锁顺序一致
+    rows = [
+        {
+            "hash": digest,
+            "codec": segment.codec,
+            "data": segment.data,
+            "raw_size": segment.raw_size,
+            "stored_size": len(segment.data),
+            "ref_count": segment.refs,
+            "created_at": datetime.now(timezone.utc),
+            "last_seen_at": seen_at,
+        }
+        for digest, segment in sorted(segments.items())
+    ]
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[table.c.hash],
+            set_={
+                "ref_count": table.c.ref_count + excluded.ref_count,
+                "last_seen_at": case(
+                    (excluded.last_seen_at > table.c.last_seen_at, excluded.last_seen_at),
+                    else_=table.c.last_seen_at,
+                ),
+            },
+        ),
+        rows,
+    )
+
+
+def _fetch_segments(db: Session, hashes: list[str]) -> dict[str, bytes]:
+    result: dict[str, bytes] = {}
+    rows = (
+        db.query(UsageBodySegment.hash, UsageBodySegment.codec, UsageBodySegment.data)
+        .filter(UsageBodySegment.hash.in_(hashes))
+        .all()
+    )
+    for digest, codec, data in rows:
+        raw = decode_segment(db, codec, bytes(data))
+        _segment_cache.set(digest, raw)
+        result[digest] = raw
+    return result
+
+
+def load_request_body(db: Session | None, manifest: Any) -> Any:
+    """按清单还原请求体；段缺失或无法解码时返回 None"""
+    if not isinstance(manifest, dict):
+        return None
+    raw: dict[str, bytes] = {}
+    missing: list[str] = []
+    for digest in set(manifest_hashes(manifest)):
+        cached = _segment_cache.get(digest)
+        if cached is None:
+            missing.append(digest)
+        else:
+            raw[digest] = cached
+    try:
+        if missing:
+            if db is None:
+                with create_session() as session:
+                    raw.update(_fetch_segments(session, missing))
+            else:
+                raw.update(_fetch_segments(db, missing))
+        return assemble_request_body(manifest, raw)
+    except Exception as e:
+        logger.warning(f"还原分段请求体失败: {e}")
+        return None
+
+
+def purge_segments(cutoff: datetime, batch_size: int = 1000) -> int:
+    """删除 last_seen_at 早于 cutoff 的段（引用它们的清单已随压缩字段清理）"""
+    total = 0
+    with create_session() as db:
+        while True:
+            hashes = [
+                r[0]
+                for r in db.query(UsageBodySegment.hash)
+                .filter(UsageBodySegment.last_seen_at < cutoff)
+                .limit(batch_size)
+                .all()
+            ]
+            if not hashes:
+                break
+            deleted = (
+                db.query(UsageBodySegment)
+                .filter(UsageBodySegment.hash.in_(hashes), UsageBodySegment.last_seen_at < cutoff)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            total += deleted
+    return total
+
+
+# ---------- 字典训练 / 历史数据迁移 ----------
+
+
+def train_dictionary(samples: int = 2000, dict_size: int = DICTIONARY_SIZE) -> int:
+    """从最近仍保留明文的请求体中采样段训练 zstd 字典，返回新字典 ID"""
+    if _zstd is None:
+        raise RuntimeError("未安装 zstandard，无法训练字典")
+    corpus: dict[str, bytes] = {}
+    with create_session() as db:
+        rows = (
+            db.query(Usage.request_body)
+            .filter(Usage.request_body.isnot(None))
+            .order_by(Usage.created_at.desc())
+            .limit(samples)
+            .all()
+        )
+        for (body,) in rows:
+            split = split_request_body(body)
+            if split is not None:
+                corpus.update(split[1])
+        if not corpus:
+            raise ValueError("没有可用于训练的请求体样本")
+        trained = _zstd.train_dictionary(dict_size, list(corpus.values()))
+        data = trained.as_bytes()
+        entry = UsageBodyDictionary(data=data, size=len(data), sample_count=len(corpus))
+        db.add(entry)
+        db.commit()
+        logger.info(f"zstd 字典训练完成: id={entry.id}, {len(data)} 字节, {len(corpus)} 个样本段")
+        return entry.id
+
+
+def backfill_page(
+    after: Checkpoint | None, limit: int, dictionary: Dictionary | None
+) -> tuple[Checkpoint, int, int, int] | None:
+    """把一页历史 gzip 请求体迁移为分段存储，返回 (进度, 扫描数, 转换数, 段数)"""
+    with create_session() as db:
+        query = db.query(Usage.id, Usage.created_at, Usage.request_body_compressed).filter(
+            Usage.request_body_compressed.isnot(None), Usage.request_body_ref.is_(None)
+        )
+        if after is not None:
+            query = query.filter(tuple_(Usage.created_at, Usage.id) > tuple_(*after))
+        records = query.order_by(Usage.created_at, Usage.id).limit(limit).all()
+        if not records:
+            return None
+
+        segments: dict[str, EncodedSegment] = {}
+        updates = []
+        for row_id, _created_at, packed in records:
+            manifest = encode_request_body(decompress_json(packed), dictionary, segments)
+            if manifest is not None:
+                updates.append({"b_id": row_id, "b_ref": json_codec.dumps(manifest)})
+
+        last = records[-1]
+        checkpoint = (_as_utc(last[1]), last[0])
+        upsert_segments(db, segments, checkpoint[0])
+        if updates:
+            table = Usage.__table__
+            db.connection().execute(
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values(
+                    request_body_ref=bindparam("b_ref", type_=Text),
+                    request_body_compressed=None,
+                ),
+                updates,
+            )
+        db.commit()
+    return checkpoint, len(records), len(updates), len(segments)
+
+
+def backfill_request_bodies(batch_size: int = 500) -> BackfillResult:
+    """迁移所有历史 gzip 请求体（可重复执行，已迁移的行不会再被选中）"""
+    result = BackfillResult()
+    dictionary = load_latest_dictionary()
+    after: Checkpoint | None = None
+    while True:
+        page = backfill_page(after, max(1, batch_size), dictionary)
+        if page is None:
+            break
+        after, scanned, converted, segments = page
+        result.scanned += scanned
+        result.converted += converted
+        result.segments += segments
+        logger.info(f"请求体分段迁移: 已扫描 {result.scanned} 条, 转换 {result.converted} 条")
+    return result
+
+
+# ---------- 存储报告 ----------
+
+
+def storage_report(db: Session) -> dict[str, Any]:
+    """分段存储的节省情况（referenced_bytes 为段按引用次数展开后的原始字节数）"""
+    count, raw_bytes, stored_bytes, references, referenced_bytes = db.query(
+        func.count(UsageBodySegment.hash),
+        func.coalesce(func.sum(UsageBodySegment.raw_size), 0),
+        func.coalesce(func.sum(UsageBodySegment.stored_size), 0),
+        func.coalesce(func.sum(UsageBodySegment.ref_count), 0),
+        func.coalesce(func.sum(UsageBodySegment.raw_size * UsageBodySegment.ref_count), 0),
+    ).one()
+    by_codec = (
+        db.query(
+            UsageBodySegment.codec,
+            func.count(UsageBodySegment.hash),
+            func.coalesce(func.sum(UsageBodySegment.stored_size), 0),
+        )
+        .group_by(UsageBodySegment.codec)
+        .all()
+    )
+    segmented_rows = (
+        db.query(func.count(Usage.id)).filter(Usage.request_body_ref.isnot(None)).scalar() or 0
+    )
+    gzip_rows, gzip_bytes = (
+        db.query(
+            func.count(Usage.id),
+            func.coalesce(func.sum(func.length(Usage.request_body_compressed)), 0),
+        )
+        .filter(Usage.request_body_compressed.isnot(None))
+        .one()
+    )
+    dictionary = (
+        db.query(
+            UsageBodyDictionary.id,
+            UsageBodyDictionary.size,
+            UsageBodyDictionary.sample_count,
+            UsageBodyDictionary.created_at,
+        )
+        .order_by(UsageBodyDictionary.id.desc())
+        .first()
+    )
+
+    raw_bytes, stored_bytes, referenced_bytes = (
+        int(raw_bytes),
+        int(stored_bytes),
+        int(referenced_bytes),
+    )
+    return {
+        "zstd_available": zstd_available(),
+        "dictionary": (
+            {
+                "id": dictionary[0],
+                "size": dictionary[1],
+                "sample_count": dictionary[2],
+                "created_at": _as_utc(dictionary[3]).isoformat() if dictionary[3] else None,
+            }
+            if dictionary
+            else None
+        ),
+        "segments": {
+            "count": int(count),
+            "raw_bytes": raw_bytes,
+            "stored_bytes": stored_bytes,
+            "references": int(references),
+            "referenced_bytes": referenced_bytes,
+            "by_codec": [
+                {"codec": codec, "count": int(n), "stored_bytes": int(size)}
+                for codec, n, size in by_codec
+            ],
+        },
+        "usage": {
+            "segmented_rows": int(segmented_rows),
+            "gzip_rows": int(gzip_rows),
+            "gzip_bytes": int(gzip_bytes),
+        },
+        "dedup_ratio": round(referenced_bytes / raw_bytes, 2) if raw_bytes else 0.0,
+        "compression_ratio": round(stored_bytes / raw_bytes, 4) if raw_bytes else 0.0,
+        "saved_bytes": referenced_bytes - stored_bytes,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="使用记录请求体分段存储工具")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="从近期请求体训练 zstd 字典")
+    train.add_argument("--samples", type=int, default=2000, help="采样的请求体条数")
+    train.add_argument("--dict-size", type=int, default=DICTIONARY_SIZE, help="字典大小（字节）")
+    backfill = sub.add_parser("backfill", help="把历史 gzip 请求体迁移为分段存储")
+    backfill.add_argument("--batch-size", type=int, default=500)
+    sub.add_parser("report", help="输出存储节省报告")
+    args = parser.parse_args(argv)
+
+    if args.command == "train":
+        print(f"dictionary id: {train_dictionary(args.samples, args.dict_size)}")
+    elif args.command == "backfill":
+        result = backfill_request_bodies(args.batch_size)
+        print(f"scanned={result.scanned} converted={result.converted} segments={result.segments}")
+    else:
+        with create_session() as db:
+            print(json_codec.dumps(storage_report(db)))
+
+
+__all__ = [
+    "BackfillResult",
+    "EncodedSegment",
+    "assemble_request_body",
+    "backfill_request_bodies",
+    "encode_request_body",
+    "load_latest_dictionary",
+    "load_request_body",
+    "purge_segments",
+    "split_request_body",
+    "storage_report",
+    "train_dictionary",
+    "upsert_segments",
+    "zstd_available",
+]
+
+
+if __name__ == "__main__":
+    main()
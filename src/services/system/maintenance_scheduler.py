@@ -26,11 +26,13 @@ from src.core.logger import logger
 from src.database import create_session
 from src.models.database import AuditLog, Provider, Usage
 from src.services.provider_ops.service import ProviderOpsService
+from src.services.system.body_compaction import compact_usage_bodies
+from src.services.system.body_store import purge_segments
 from src.services.system.config import SystemConfigService
 from src.services.system.scheduler import get_scheduler
 from src.services.system.stats_aggregator import StatsAggregatorService
 from src.services.user.apikey import ApiKeyService
-from src.utils.compression import compress_json
+from src.utils.async_utils import run_in_executor
 
 
 class MaintenanceScheduler:
@@ -830,6 +832,11 @@ class MaintenanceScheduler:
             )
             db.commit()
 
+            # 批量更新绕过 ORM 事件，显式清理认证缓存中的用户额度快照
+            from src.services.auth.credential_cache import invalidate_all_credentials
+
+            invalidate_all_credentials()
+
             # 记录 last_reset_at（成功执行后更新，滚动计算用）
             SystemConfigService.set_config(
                 db,
@@ -914,120 +921,14 @@ class MaintenanceScheduler:
     ) -> int:
         """压缩 request_body 和 response_body 字段到压缩字段
 
-        逐条处理，确保每条记录都正确更新
+        键集分页 + 进程池压缩 + 每批一条 UPDATE，按检查点续跑（见 body_compaction）
         """
-        from sqlalchemy import null, update
-
-        total_compressed = 0
-        no_progress_count = 0  # 连续无进展计数
-        processed_ids: set = set()  # 记录已处理的 ID，防止重复处理
-
-        while True:
-            batch_db = create_session()
-            try:
-                # 1. 查询需要压缩的记录
-                # 注意：排除已经是 NULL 或 JSON null 的记录
-                records = (
-                    batch_db.query(Usage.id, Usage.request_body, Usage.response_body)
-                    .filter(Usage.created_at < cutoff_time)
-                    .filter((Usage.request_body.isnot(None)) | (Usage.response_body.isnot(None)))
-                    .limit(batch_size)
-                    .all()
-                )
-
-                if not records:
-                    break
-
-                # 过滤掉实际值为 None 的记录（JSON null 被解析为 Python None）
-                valid_records = [
-                    (rid, req, resp)
-                    for rid, req, resp in records
-                    if req is not None or resp is not None
-                ]
-
-                if not valid_records:
-                    # 所有记录都是 JSON null，需要清理它们
-                    logger.warning(
-                        f"检测到 {len(records)} 条记录的 body 字段为 JSON null，进行清理"
-                    )
-                    for record_id, _, _ in records:
-                        batch_db.execute(
-                            update(Usage)
-                            .where(Usage.id == record_id)
-                            .values(request_body=null(), response_body=null())
-                        )
-                    batch_db.commit()
-                    continue
-
-                # 检测是否有重复的 ID（说明更新未生效）
-                current_ids = {r[0] for r in valid_records}
-                repeated_ids = current_ids & processed_ids
-                if repeated_ids:
-                    logger.error(
-                        f"检测到重复处理的记录 ID: {list(repeated_ids)[:5]}...，"
-                        "说明数据库更新未生效，终止循环"
-                    )
-                    break
-
-                batch_success = 0
-
-                # 2. 逐条更新（确保每条都正确处理）
-                for record_id, req_body, resp_body in valid_records:
-                    try:
-                        # 使用 null() 确保设置的是 SQL NULL 而不是 JSON null
-                        result = batch_db.execute(
-                            update(Usage)
-                            .where(Usage.id == record_id)
-                            .values(
-                                request_body=null(),
-                                response_body=null(),
-                                request_body_compressed=(
-                                    compress_json(req_body) if req_body else None
-                                ),
-                                response_body_compressed=(
-                                    compress_json(resp_body) if resp_body else None
-                                ),
-                            )
-                        )
-                        if result.rowcount > 0:
-                            batch_success += 1
-                            processed_ids.add(record_id)
-                    except Exception as e:
-                        logger.warning(f"压缩记录 {record_id} 失败: {e}")
-                        continue
-
-                batch_db.commit()
-
-                # 3. 检查是否有实际进展
-                if batch_success == 0:
-                    no_progress_count += 1
-                    if no_progress_count >= 3:
-                        logger.error(
-                            f"压缩 body 字段连续 {no_progress_count} 批无进展，"
-                            "终止循环以避免死循环"
-                        )
-                        break
-                else:
-                    no_progress_count = 0  # 重置计数
-
-                total_compressed += batch_success
-                logger.debug(
-                    f"已压缩 {batch_success} 条记录的 body 字段，累计 {total_compressed} 条"
-                )
-
-                await asyncio.sleep(0.1)
-
-            except Exception as e:
-                logger.exception(f"压缩 body 字段失败: {e}")
-                try:
-                    batch_db.rollback()
-                except Exception:
-                    pass
-                break
-            finally:
-                batch_db.close()
-
-        return total_compressed
+        try:
+            result = await compact_usage_bodies(cutoff_time, batch_size)
+        except Exception as e:
+            logger.exception(f"压缩 body 字段失败: {e}")
+            return 0
+        return result.rows
 
     async def _cleanup_compressed_fields(
         self, db: Session, cutoff_time: datetime, batch_size: int
@@ -1050,6 +951,7 @@ class MaintenanceScheduler:
                     .filter(
                         (Usage.request_body_compressed.isnot(None))
                         | (Usage.response_body_compressed.isnot(None))
+                        | (Usage.request_body_ref.isnot(None))
                     )
                     .limit(batch_size)
                     .all()
@@ -1067,6 +969,7 @@ class MaintenanceScheduler:
                     .values(
                         request_body_compressed=null(),
                         response_body_compressed=null(),
+                        request_body_ref=null(),
                     )
                 )
 
@@ -1092,6 +995,14 @@ class MaintenanceScheduler:
             finally:
                 batch_db.close()
 
+        # 引用分段请求体的清单已清理，回收不再被较新记录引用的段
+        try:
+            segments_purged = await run_in_executor(purge_segments, cutoff_time, batch_size)
+            if segments_purged:
+                logger.debug(f"已回收 {segments_purged} 个请求体分段")
+        except Exception as e:
+            logger.exception(f"回收请求体分段失败: {e}")
+
         return total_cleaned
 
     async def _cleanup_header_fields(
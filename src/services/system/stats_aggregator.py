@@ -7,6 +7,7 @@ from __future__ import annotations
 
 import os
 import uuid
+from collections.abc import Iterable
 from dataclasses import dataclass
 from datetime import date, datetime, time, timedelta, timezone
 from typing import Any
@@ -32,6 +33,8 @@ from src.models.database import (
     Usage,
 )
 from src.models.database import User as DBUser
+from src.services.system.latency_sketch import LatencySketch
+from src.services.system.stats_rollup import STATS_ROLLUP_ENABLED, rollup_covers, sum_hourly
 from src.services.system.time_range import TimeRangeParams, split_time_range_for_hourly
 
 # App timezone (legacy defaults for dashboard)
@@ -150,76 +153,8 @@ class StatsAggregatorService:
     def compute_daily_percentiles(
         db: Session, day_start: datetime, day_end: datetime
     ) -> dict[str, int | None]:
-        """计算指定 UTC 日期的性能百分位（P50/P90/P99）"""
-        bind = db.bind
-        dialect = bind.dialect.name if bind is not None else "sqlite"
-        if dialect != "postgresql":
-            return {
-                "p50_response_time_ms": None,
-                "p90_response_time_ms": None,
-                "p99_response_time_ms": None,
-                "p50_first_byte_time_ms": None,
-                "p90_first_byte_time_ms": None,
-                "p99_first_byte_time_ms": None,
-            }
-        rt_row = (
-            db.query(
-                func.percentile_cont(0.5).within_group(Usage.response_time_ms).label("p50"),
-                func.percentile_cont(0.9).within_group(Usage.response_time_ms).label("p90"),
-                func.percentile_cont(0.99).within_group(Usage.response_time_ms).label("p99"),
-                func.count().label("count"),
-            )
-            .filter(
-                Usage.created_at >= day_start,
-                Usage.created_at < day_end,
-                Usage.status == "completed",
-                Usage.response_time_ms.isnot(None),
-            )
-            .first()
-        )
-
-        ttfb_row = (
-            db.query(
-                func.percentile_cont(0.5).within_group(Usage.first_byte_time_ms).label("p50"),
-                func.percentile_cont(0.9).within_group(Usage.first_byte_time_ms).label("p90"),
-                func.percentile_cont(0.99).within_group(Usage.first_byte_time_ms).label("p99"),
-                func.count().label("count"),
-            )
-            .filter(
-                Usage.created_at >= day_start,
-                Usage.created_at < day_end,
-                Usage.status == "completed",
-                Usage.first_byte_time_ms.isnot(None),
-            )
-            .first()
-        )
-
-        def _resolve(row: Any | None) -> tuple[int | None, int | None, int | None]:
-            if not row:
-                return None, None, None
-            count = int(getattr(row, "count", 0) or 0)
-            if count < MIN_PERCENTILE_SAMPLES:
-                return None, None, None
-            p50 = getattr(row, "p50", None)
-            p90 = getattr(row, "p90", None)
-            p99 = getattr(row, "p99", None)
-            return (
-                int(p50) if p50 is not None else None,
-                int(p90) if p90 is not None else None,
-                int(p99) if p99 is not None else None,
-            )
-
-        p50_rt, p90_rt, p99_rt = _resolve(rt_row)
-        p50_ttfb, p90_ttfb, p99_ttfb = _resolve(ttfb_row)
-
-        return {
-            "p50_response_time_ms": p50_rt,
-            "p90_response_time_ms": p90_rt,
-            "p99_response_time_ms": p99_rt,
-            "p50_first_byte_time_ms": p50_ttfb,
-            "p90_first_byte_time_ms": p90_ttfb,
-            "p99_first_byte_time_ms": p99_ttfb,
-        }
+        """计算指定 UTC 日期的性能百分位（P50/P90/P99，合并小时级草图）"""
+        return sketch_percentiles(*compute_latency_sketches(db, day_start, day_end))
 
     @staticmethod
     def aggregate_daily_stats(db: Session, date: datetime, commit: bool = True) -> StatsDaily:
@@ -262,9 +197,12 @@ class StatsAggregatorService:
         stats.fallback_count = computed["fallback_count"]
         stats.unique_models = computed["unique_models"]
         stats.unique_providers = computed["unique_providers"]
-        percentiles = StatsAggregatorService.compute_daily_percentiles(
-            db, day_start, day_start + timedelta(days=1)
+        rt_sketch, ttfb_sketch = compute_latency_sketches(
+            db, day_start, day_start + timedelta(days=1), include_daily=False
         )
+        percentiles = sketch_percentiles(rt_sketch, ttfb_sketch)
+        stats.response_time_sketch = rt_sketch.to_dict()
+        stats.first_byte_time_sketch = ttfb_sketch.to_dict()
         stats.p50_response_time_ms = percentiles["p50_response_time_ms"]
         stats.p90_response_time_ms = percentiles["p90_response_time_ms"]
         stats.p99_response_time_ms = percentiles["p99_response_time_ms"]
@@ -679,6 +617,8 @@ class StatsAggregatorService:
                 func.sum(Usage.output_tokens).label("output_tokens"),
                 func.sum(Usage.cache_creation_input_tokens).label("cache_creation_tokens"),
                 func.sum(Usage.cache_read_input_tokens).label("cache_read_tokens"),
+                func.sum(Usage.cache_creation_cost_usd).label("cache_creation_cost"),
+                func.sum(Usage.cache_read_cost_usd).label("cache_read_cost"),
                 func.sum(Usage.total_cost_usd).label("total_cost"),
                 func.sum(Usage.actual_total_cost_usd).label("actual_total_cost"),
                 func.avg(Usage.response_time_ms).label("avg_response_time"),
@@ -699,6 +639,8 @@ class StatsAggregatorService:
         stats.output_tokens = int(getattr(aggregated, "output_tokens", 0) or 0)
         stats.cache_creation_tokens = int(getattr(aggregated, "cache_creation_tokens", 0) or 0)
         stats.cache_read_tokens = int(getattr(aggregated, "cache_read_tokens", 0) or 0)
+        stats.cache_creation_cost = float(getattr(aggregated, "cache_creation_cost", 0) or 0.0)
+        stats.cache_read_cost = float(getattr(aggregated, "cache_read_cost", 0) or 0.0)
         stats.total_cost = float(getattr(aggregated, "total_cost", 0) or 0.0)
         stats.actual_total_cost = float(getattr(aggregated, "actual_total_cost", 0) or 0.0)
         stats.avg_response_time_ms = float(getattr(aggregated, "avg_response_time", 0) or 0.0)
@@ -876,6 +818,65 @@ class StatsAggregatorService:
             db.commit()
         return results
 
+    @staticmethod
+    def aggregate_hourly_latency_sketches(
+        db: Session, hour_utc: datetime, commit: bool = True
+    ) -> None:
+        """一次扫描生成指定 UTC 小时的延迟草图（全局/模型/提供商），写入已聚合的小时行
+
+        没有样本的行写入空草图，用以区分"已生成草图"与旧数据（NULL）。
+        """
+        if hour_utc.tzinfo is None:
+            hour_utc = hour_utc.replace(tzinfo=timezone.utc)
+        hour_start = hour_utc.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        hour_end = hour_start + timedelta(hours=1)
+
+        total = (LatencySketch(), LatencySketch())
+        by_model: dict[str, tuple[LatencySketch, LatencySketch]] = {}
+        by_provider: dict[str, tuple[LatencySketch, LatencySketch]] = {}
+        rows = (
+            db.query(
+                Usage.model, Usage.provider_name, Usage.response_time_ms, Usage.first_byte_time_ms
+            )
+            .filter(
+                Usage.created_at >= hour_start,
+                Usage.created_at < hour_end,
+                Usage.status == "completed",
+            )
+            .yield_per(5000)
+        )
+        for model, provider_name, response_time, first_byte_time in rows:
+            targets = [total]
+            if model:
+                targets.append(by_model.setdefault(model, (LatencySketch(), LatencySketch())))
+            if provider_name:
+                targets.append(
+                    by_provider.setdefault(provider_name, (LatencySketch(), LatencySketch()))
+                )
+            for rt_sketch, ttfb_sketch in targets:
+                if response_time is not None:
+                    rt_sketch.add(response_time)
+                if first_byte_time is not None:
+                    ttfb_sketch.add(first_byte_time)
+
+        def _store(record: Any, sketches: tuple[LatencySketch, LatencySketch] | None) -> None:
+            rt_sketch, ttfb_sketch = sketches or (LatencySketch(), LatencySketch())
+            record.response_time_sketch = rt_sketch.to_dict()
+            record.first_byte_time_sketch = ttfb_sketch.to_dict()
+
+        stats = db.query(StatsHourly).filter(StatsHourly.hour_utc == hour_start).first()
+        if stats is not None:
+            _store(stats, total)
+        for record in db.query(StatsHourlyModel).filter(StatsHourlyModel.hour_utc == hour_start):
+            _store(record, by_model.get(record.model))
+        for record in db.query(StatsHourlyProvider).filter(
+            StatsHourlyProvider.hour_utc == hour_start
+        ):
+            _store(record, by_provider.get(record.provider_name))
+
+        if commit:
+            db.commit()
+
     @staticmethod
     def aggregate_hourly_stats_bundle(db: Session, hour_utc: datetime) -> StatsHourly:
         """聚合单小时所有统计（原子提交）"""
@@ -883,6 +884,7 @@ class StatsAggregatorService:
         StatsAggregatorService.aggregate_hourly_user_stats(db, hour_utc, commit=False)
         StatsAggregatorService.aggregate_hourly_model_stats(db, hour_utc, commit=False)
         StatsAggregatorService.aggregate_hourly_provider_stats(db, hour_utc, commit=False)
+        StatsAggregatorService.aggregate_hourly_latency_sketches(db, hour_utc, commit=False)
 
         stats.is_complete = True
         stats.aggregated_at = datetime.now(timezone.utc)
@@ -955,10 +957,15 @@ class StatsAggregatorService:
 
     @staticmethod
     def get_today_realtime_stats(db: Session) -> dict:
-        """获取今日实时统计（用于与预聚合数据合并）"""
+        """获取今日实时统计（用于与预聚合数据合并）
+
+        启用增量汇总时读取今日的 stats_hourly* 行，不再扫描 usage 原始行。
+        """
         # 使用 UTC 今天的开始时间
         now_utc = datetime.now(timezone.utc)
         today_utc = now_utc.replace(hour=0, minute=0, second=0, microsecond=0)
+        if STATS_ROLLUP_ENABLED:
+            return StatsAggregatorService._get_today_rollup_stats(db, today_utc)
 
         error_cond = (Usage.status_code >= 400) | (Usage.error_message.isnot(None))
         aggregated = (
@@ -1013,6 +1020,37 @@ class StatsAggregatorService:
             "unique_providers": int(getattr(aggregated, "unique_providers", 0) or 0),
         }
 
+    @staticmethod
+    def _get_today_rollup_stats(db: Session, today_utc: datetime) -> dict:
+        """从小时级统计表汇总今日数据（已对账小时 + 增量汇总中的小时）"""
+        stats = _hourly_row_to_stats(sum_hourly(db, today_utc, today_utc + timedelta(days=1)))
+        unique_models = (
+            db.query(func.count(func.distinct(StatsHourlyModel.model)))
+            .filter(StatsHourlyModel.hour_utc >= today_utc, StatsHourlyModel.total_requests > 0)
+            .scalar()
+        )
+        unique_providers = (
+            db.query(func.count(func.distinct(StatsHourlyProvider.provider_name)))
+            .filter(
+                StatsHourlyProvider.hour_utc >= today_utc, StatsHourlyProvider.total_requests > 0
+            )
+            .scalar()
+        )
+        return {
+            "total_requests": stats.total_requests,
+            "success_requests": stats.success_requests,
+            "error_requests": stats.error_requests,
+            "input_tokens": stats.input_tokens,
+            "output_tokens": stats.output_tokens,
+            "cache_creation_tokens": stats.cache_creation_tokens,
+            "cache_read_tokens": stats.cache_read_tokens,
+            "total_cost": stats.total_cost,
+            "actual_total_cost": stats.actual_total_cost,
+            "avg_response_time_ms": stats.avg_response_time_ms,
+            "unique_models": int(unique_models or 0),
+            "unique_providers": int(unique_providers or 0),
+        }
+
     @staticmethod
     def get_combined_stats(db: Session, today_stats: dict | None = None) -> dict:
         """获取合并后的统计数据（预聚合 + 今日实时）"""
@@ -1115,10 +1153,13 @@ class StatsAggregatorService:
                     current += timedelta(days=1)
                     continue
 
-            percentiles = StatsAggregatorService.compute_daily_percentiles(
-                db, day_start, day_start + timedelta(days=1)
+            rt_sketch, ttfb_sketch = compute_latency_sketches(
+                db, day_start, day_start + timedelta(days=1), include_daily=False
             )
+            percentiles: dict[str, Any] = sketch_percentiles(rt_sketch, ttfb_sketch)
             if any(value is not None for value in percentiles.values()):
+                percentiles["response_time_sketch"] = rt_sketch.to_dict()
+                percentiles["first_byte_time_sketch"] = ttfb_sketch.to_dict()
                 db.query(StatsDaily).filter(StatsDaily.date == day_start).update(percentiles)
                 processed += 1
             if processed % 30 == 0:
@@ -1275,6 +1316,200 @@ def aggregate_usage_range(
     )
 
 
+def _split_hours(
+    start_utc: datetime, end_utc: datetime
+) -> tuple[list[tuple[datetime, datetime]], list[datetime]]:
+    """拆分为 (不足一小时的片段, 整点小时)；区间落在同一小时内时整体作为片段"""
+    head_fragment, hours, tail_fragment = split_time_range_for_hourly(start_utc, end_utc)
+    fragments = [f for f in (head_fragment, tail_fragment) if f and f[0] < f[1]]
+    if not hours and not fragments and start_utc < end_utc:
+        fragments = [(start_utc, end_utc)]
+    return fragments, hours
+
+
+def _hour_runs(hours: list[datetime]) -> list[tuple[datetime, datetime]]:
+    """连续小时合并为 [start, end) 区间"""
+    runs: list[tuple[datetime, datetime]] = []
+    for hour in hours:
+        if runs and runs[-1][1] == hour:
+            runs[-1] = (runs[-1][0], hour + timedelta(hours=1))
+        else:
+            runs.append((hour, hour + timedelta(hours=1)))
+    return runs
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite 返回不带时区的时间
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def scan_latency_sketches(
+    db: Session,
+    start_utc: datetime,
+    end_utc: datetime,
+    model: str | None = None,
+    provider_name: str | None = None,
+) -> tuple[LatencySketch, LatencySketch]:
+    """扫描 usage 原始行构建 (响应时间, 首字时间) 草图"""
+    rt_sketch, ttfb_sketch = LatencySketch(), LatencySketch()
+    query = db.query(Usage.response_time_ms, Usage.first_byte_time_ms).filter(
+        Usage.created_at >= start_utc,
+        Usage.created_at < end_utc,
+        Usage.status == "completed",
+    )
+    if model:
+        query = query.filter(Usage.model == model)
+    if provider_name:
+        query = query.filter(Usage.provider_name == provider_name)
+    for response_time, first_byte_time in query.yield_per(5000):
+        if response_time is not None:
+            rt_sketch.add(response_time)
+        if first_byte_time is not None:
+            ttfb_sketch.add(first_byte_time)
+    return rt_sketch, ttfb_sketch
+
+
+def compute_latency_sketches(
+    db: Session,
+    start_utc: datetime,
+    end_utc: datetime,
+    model: str | None = None,
+    provider_name: str | None = None,
+    include_daily: bool = True,
+) -> tuple[LatencySketch, LatencySketch]:
+    """[start_utc, end_utc) 的 (响应时间, 首字时间) 草图
+
+    未过滤时整天优先合并 stats_daily 草图（生成日草图时 include_daily=False）；其余整点小时合并已对账小时的草图
+    （按 model / provider_name 过滤时读对应维度表）；不足一小时的片段与
+    尚无草图的小时扫描原始行。
+    """
+    rt_sketch, ttfb_sketch = LatencySketch(), LatencySketch()
+
+    def _merge(rows: Iterable[Any]) -> None:
+        for rt_data, ttfb_data in rows:
+            rt_sketch.merge(LatencySketch.from_dict(rt_data))
+            ttfb_sketch.merge(LatencySketch.from_dict(ttfb_data))
+
+    remaining = [(start_utc, end_utc)]
+    if include_daily and not model and not provider_name:
+        first_day = start_utc.replace(hour=0, minute=0, second=0, microsecond=0)
+        if first_day < start_utc:
+            first_day += timedelta(days=1)
+        last_day = end_utc.replace(hour=0, minute=0, second=0, microsecond=0)
+        if first_day < last_day:
+            daily_rows = (
+                db.query(
+                    StatsDaily.date,
+                    StatsDaily.response_time_sketch,
+                    StatsDaily.first_byte_time_sketch,
+                )
+                .filter(
+                    StatsDaily.date >= first_day,
+                    StatsDaily.date < last_day,
+                    StatsDaily.is_complete.is_(True),
+                    StatsDaily.response_time_sketch.isnot(None),
+                )
+                .all()
+            )
+            _merge((rt, ttfb) for _, rt, ttfb in daily_rows)
+            remaining = []
+            cursor = start_utc
+            for day in sorted(_as_utc(row[0]) for row in daily_rows):
+                if cursor < day:
+                    remaining.append((cursor, day))
+                cursor = day + timedelta(days=1)
+            if cursor < end_utc:
+                remaining.append((cursor, end_utc))
+
+    if model:
+        table: Any = StatsHourlyModel
+        key_filter = StatsHourlyModel.model == model
+    elif provider_name:
+        table = StatsHourlyProvider
+        key_filter = StatsHourlyProvider.provider_name == provider_name
+    else:
+        table, key_filter = StatsHourly, None
+
+    raw_ranges: list[tuple[datetime, datetime]] = []
+    for range_start, range_end in remaining:
+        fragments, hours = _split_hours(range_start, range_end)
+        raw_ranges.extend(fragments)
+        if not hours:
+            continue
+        covered = {
+            _as_utc(row[0])
+            for row in db.query(StatsHourly.hour_utc).filter(
+                StatsHourly.hour_utc >= hours[0],
+                StatsHourly.hour_utc <= hours[-1],
+                StatsHourly.is_complete.is_(True),
+                StatsHourly.response_time_sketch.isnot(None),
+            )
+        }
+        if covered:
+            query = db.query(table.response_time_sketch, table.first_byte_time_sketch).filter(
+                table.hour_utc.in_(sorted(covered))
+            )
+            if key_filter is not None:
+                query = query.filter(key_filter)
+            _merge(query.all())
+        raw_ranges.extend(_hour_runs([h for h in hours if h not in covered]))
+
+    for raw_start, raw_end in raw_ranges:
+        rt_part, ttfb_part = scan_latency_sketches(db, raw_start, raw_end, model, provider_name)
+        rt_sketch.merge(rt_part)
+        ttfb_sketch.merge(ttfb_part)
+    return rt_sketch, ttfb_sketch
+
+
+def sketch_percentiles(
+    rt_sketch: LatencySketch, ttfb_sketch: LatencySketch
+) -> dict[str, int | None]:
+    """由草图得出 P50/P90/P99（样本不足 MIN_PERCENTILE_SAMPLES 时为 None）"""
+    result: dict[str, int | None] = {}
+    for prefix, sketch in (("response_time", rt_sketch), ("first_byte_time", ttfb_sketch)):
+        enough = sketch.count >= MIN_PERCENTILE_SAMPLES
+        for label, q in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            value = sketch.quantile(q) if enough else None
+            result[f"{label}_{prefix}_ms"] = int(round(value)) if value is not None else None
+    return result
+
+
+def _hourly_row_to_stats(row: Any) -> AggregatedStats:
+    total_requests = int(getattr(row, "total_requests", 0) or 0)
+    error_requests = int(getattr(row, "error_requests", 0) or 0)
+    return AggregatedStats(
+        total_requests=total_requests,
+        success_requests=total_requests - error_requests,
+        error_requests=error_requests,
+        input_tokens=int(getattr(row, "input_tokens", 0) or 0),
+        output_tokens=int(getattr(row, "output_tokens", 0) or 0),
+        cache_creation_tokens=int(getattr(row, "cache_creation_tokens", 0) or 0),
+        cache_read_tokens=int(getattr(row, "cache_read_tokens", 0) or 0),
+        cache_creation_cost=float(getattr(row, "cache_creation_cost", 0) or 0.0),
+        cache_read_cost=float(getattr(row, "cache_read_cost", 0) or 0.0),
+        total_cost=float(getattr(row, "total_cost", 0) or 0.0),
+        actual_total_cost=float(getattr(row, "actual_total_cost", 0) or 0.0),
+        total_response_time_ms=float(getattr(row, "total_response_time_ms", 0) or 0.0),
+    )
+
+
+def aggregate_range_with_rollup(
+    db: Session, start_utc: datetime, end_utc: datetime
+) -> AggregatedStats:
+    """聚合 [start_utc, end_utc)：增量汇总覆盖的整点小时读 stats_hourly，其余扫描 usage"""
+    fragments, hours = _split_hours(start_utc, end_utc)
+    now_utc = datetime.now(timezone.utc)
+    covered = [hour for hour in hours if rollup_covers(hour, now_utc)]
+    uncovered = [hour for hour in hours if not rollup_covers(hour, now_utc)]
+
+    result = AggregatedStats()
+    for run_start, run_end in _hour_runs(covered):
+        result.add(_hourly_row_to_stats(sum_hourly(db, run_start, run_end)))
+    for raw_start, raw_end in _hour_runs(uncovered) + fragments:
+        result.add(aggregate_usage_range(db, raw_start, raw_end))
+    return result
+
+
 def query_stats_hybrid(
     db: Session, params: TimeRangeParams, filters: StatsFilter | None = None
 ) -> AggregatedStats:
@@ -1285,7 +1520,6 @@ def query_stats_hybrid(
 
     complete_dates, head_boundary, tail_boundary = params.get_complete_utc_dates()
     today_utc = datetime.now(timezone.utc).date()
-    filters = filters or StatsFilter()
 
     result = AggregatedStats()
 
@@ -1324,14 +1558,14 @@ def query_stats_hybrid(
         result.actual_total_cost += stats.actual_total_cost
         result.total_response_time_ms += (stats.avg_response_time_ms or 0.0) * stats.total_requests
 
-    # Realtime per day
+    # Realtime per day（未过滤时今日的整点小时读增量汇总）
     for day_dt in realtime_dates:
-        result.add(aggregate_usage_range(db, day_dt, day_dt + timedelta(days=1), filters=filters))
+        result.add(aggregate_range_with_rollup(db, day_dt, day_dt + timedelta(days=1)))
 
     if head_boundary:
-        result.add(aggregate_usage_range(db, head_boundary[0], head_boundary[1], filters=filters))
+        result.add(aggregate_range_with_rollup(db, head_boundary[0], head_boundary[1]))
     if tail_boundary:
-        result.add(aggregate_usage_range(db, tail_boundary[0], tail_boundary[1], filters=filters))
+        result.add(aggregate_range_with_rollup(db, tail_boundary[0], tail_boundary[1]))
 
     return result
 
@@ -0,0 +1,472 @@
+"""
+统计增量汇总（usage 结算时折叠进小时级统计表）
+
+dashboard 的"今日"统计与小时聚合不再每次扫描 usage 原始行：
+
+- UsageService 在一条 usage 结算（进入 completed/failed/cancelled 且首次 settled）并提交后，
+  调用 rollup_usage() 把它折叠进进程内累加器：按 (维度, UTC 小时, 维度键) 合并，
+  维度为全局 / 用户 / 模型 / 提供商，对应 stats_hourly* 四张表
+- StatsRollupFlusher 每 STATS_ROLLUP_FLUSH_INTERVAL_SECONDS 取出累加器，
+  每张表一条 INSERT ... ON CONFLICT DO UPDATE（计数累加、平均响应时间按请求数加权）；
+  多个进程各自累加写库即可，无需 Redis 汇聚
+- 整点任务 aggregate_hourly_stats_bundle 仍按原始行重算上一小时并标记 is_complete，
+  作为对账；已对账的小时不再接受增量（迟到的增量直接丢弃，以重算结果为准）
+- 写库失败时增量放回内存，下个周期重试；进程崩溃最多丢失一个周期的增量，由整点对账修正
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections.abc import Iterable, Mapping
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+from sqlalchemy import case, func
+
+from src.core.logger import logger
+from src.core.metrics import stats_rollup_flush_seconds, stats_rollup_rows_total
+from src.models.database import StatsHourly, StatsHourlyModel, StatsHourlyProvider, StatsHourlyUser
+
+STATS_ROLLUP_ENABLED = os.getenv("STATS_ROLLUP_ENABLED", "true").lower() == "true"
+STATS_ROLLUP_FLUSH_INTERVAL_SECONDS = float(os.getenv("STATS_ROLLUP_FLUSH_INTERVAL_SECONDS", "5"))
+
+_TERMINAL_STATUSES = frozenset({"completed", "failed", "cancelled"})
+
+
+@dataclass(frozen=True, slots=True)
+class RollupTarget:
+    """一张小时级统计表"""
+
+    model: type
+    key_column: str | None = None
+
+
+ROLLUP_TARGETS: dict[str, RollupTarget] = {
+    "global": RollupTarget(StatsHourly),
+    "user": RollupTarget(StatsHourlyUser, "user_id"),
+    "model": RollupTarget(StatsHourlyModel, "model"),
+    "provider": RollupTarget(StatsHourlyProvider, "provider_name"),
+}
+
+
+@dataclass(slots=True)
+class RollupDelta:
+    """一个 (维度, 小时, 键) 的累加值"""
+
+    requests: int = 0
+    errors: int = 0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cache_creation_tokens: int = 0
+    cache_read_tokens: int = 0
+    cache_creation_cost: float = 0.0
+    cache_read_cost: float = 0.0
+    total_cost: float = 0.0
+    actual_total_cost: float = 0.0
+    response_time_sum: float = 0.0
+    response_time_count: int = 0
+
+    def merge(self, other: RollupDelta) -> None:
+        self.requests += other.requests
+        self.errors += other.errors
+        self.input_tokens += other.input_tokens
+        self.output_tokens += other.output_tokens
+        self.cache_creation_tokens += other.cache_creation_tokens
+        self.cache_read_tokens += other.cache_read_tokens
+        self.cache_creation_cost += other.cache_creation_cost
+        self.cache_read_cost += other.cache_read_cost
+        self.total_cost += other.total_cost
+        self.actual_total_cost += other.actual_total_cost
+        self.response_time_sum += other.response_time_sum
+        self.response_time_count += other.response_time_count
+
+    def columns(self) -> dict[str, Any]:
+        """映射到 stats_hourly* 的列（调用方按表实际拥有的列过滤）"""
+        avg = self.response_time_sum / self.response_time_count if self.response_time_count else 0.0
+        return {
+            "total_requests": self.requests,
+            "success_requests": self.requests - self.errors,
+            "error_requests": self.errors,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_creation_cost": self.cache_creation_cost,
+            "cache_read_cost": self.cache_read_cost,
+            "total_cost": self.total_cost,
+            "actual_total_cost": self.actual_total_cost,
+            "avg_response_time_ms": avg,
+        }
+
+
+@dataclass(slots=True)
+class UsageFact:
+    """一条已结算 usage 中用于汇总的字段（提交前采集，避免提交后访问过期的 ORM 属性）"""
+
+    hour_utc: datetime
+    user_id: str | None
+    model: str | None
+    provider_name: str | None
+    delta: RollupDelta = field(default_factory=RollupDelta)
+
+
+# (维度, 小时, 键)；全局维度的键为空字符串
+RollupKey = tuple[str, datetime, str]
+Batch = dict[RollupKey, RollupDelta]
+
+
+def _hour_of(value: datetime | None) -> datetime:
+    if value is None:
+        value = datetime.now(timezone.utc)
+    elif value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def capture_usage(
+    params: Mapping[str, Any], created_at: datetime | None = None
+) -> UsageFact | None:
+    """从 usage 列值采集汇总字段；非终态记录返回 None
+
+    Args:
+        params: Usage 列名到值的映射（_build_usage_params 的结果）
+        created_at: 已存在记录的创建时间；新记录为 None（按当前时间归属小时）
+    """
+    if not STATS_ROLLUP_ENABLED or params.get("status") not in _TERMINAL_STATUSES:
+        return None
+    status_code = params.get("status_code") or 0
+    response_time = params.get("response_time_ms")
+    return UsageFact(
+        hour_utc=_hour_of(created_at or params.get("created_at")),
+        user_id=params.get("user_id"),
+        model=params.get("model"),
+        provider_name=params.get("provider_name"),
+        delta=RollupDelta(
+            requests=1,
+            errors=int(status_code >= 400 or params.get("error_message") is not None),
+            input_tokens=int(params.get("input_tokens") or 0),
+            output_tokens=int(params.get("output_tokens") or 0),
+            cache_creation_tokens=int(params.get("cache_creation_input_tokens") or 0),
+            cache_read_tokens=int(params.get("cache_read_input_tokens") or 0),
+            cache_creation_cost=float(params.get("cache_creation_cost_usd") or 0.0),
+            cache_read_cost=float(params.get("cache_read_cost_usd") or 0.0),
+            total_cost=float(params.get("total_cost_usd") or 0.0),
+            actual_total_cost=float(params.get("actual_total_cost_usd") or 0.0),
+            response_time_sum=float(response_time or 0),
+            response_time_count=int(response_time is not None),
+        ),
+    )
+
+
+class RollupRecorder:
+    """进程内累加器（线程安全）"""
+
+    def __init__(self) -> None:
+        self._pending: Batch = {}
+        self._lock = threading.Lock()
+
+    def fold(self, facts: Iterable[UsageFact | None]) -> None:
+        with self._lock:
+            for fact in facts:
+                if fact is None:
+                    continue
+                keys: list[RollupKey] = [("global", fact.hour_utc, "")]
+                if fact.user_id:
+                    keys.append(("user", fact.hour_utc, str(fact.user_id)))
+                if fact.model:
+                    keys.append(("model", fact.hour_utc, fact.model))
+                if fact.provider_name:
+                    keys.append(("provider", fact.hour_utc, fact.provider_name))
+                for key in keys:
+                    existing = self._pending.get(key)
+                    if existing is None:
+                        self._pending[key] = existing = RollupDelta()
+                    existing.merge(fact.delta)
+
+    def drain(self) -> Batch:
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        return batch
+
+    def restore(self, batch: Batch) -> None:
+        """写库失败时放回，与期间新产生的增量合并"""
+        with self._lock:
+            for key, delta in batch.items():
+                existing = self._pending.get(key)
+                if existing is None:
+                    self._pending[key] = delta
+                else:
+                    existing.merge(delta)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+
+rollup_recorder = RollupRecorder()
+
+
+def rollup_usage(facts: Iterable[UsageFact | None]) -> None:
+    """折叠已提交的 usage（只写内存，由 StatsRollupFlusher 写库）"""
+    if STATS_ROLLUP_ENABLED:
+        rollup_recorder.fold(facts)
+
+
+# ---------- 写库 ----------
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite 返回不带时区的时间
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
+
+
+def write_batch(db: Any, batch: Batch) -> int:
+    """每张表一条 UPSERT（调用方负责 commit），返回写入的行数
+
+    已对账（stats_hourly.is_complete）的小时直接丢弃。
+    """
+    if not batch:
+        return 0
+    hours = {hour for _, hour, _ in batch}
+    completed = {
+        _as_utc(row[0])
+        for row in db.query(StatsHourly.hour_utc)
+        .filter(StatsHourly.hour_utc.in_(hours), StatsHourly.is_complete.is_(True))
+        .all()
+    }
+
+    grouped: dict[str, list[tuple[datetime, str, RollupDelta]]] = {}
+    for (dimension, hour, key), delta in batch.items():
+        if hour in completed:
+            stats_rollup_rows_total.labels(dimension, "dropped").inc()
+            continue
+        grouped.setdefault(dimension, []).append((hour, key, delta))
+
+    dialect = db.get_bind().dialect.name
+    now = datetime.now(timezone.utc)
+    written = 0
+    for dimension, entries in grouped.items():
+        target = ROLLUP_TARGETS[dimension]
+        table = target.model.__table__
+        rows = []
+        for hour, key, delta in entries:
+            row = {c: v for c, v in delta.columns().items() if c in table.c}
+            row["hour_utc"] = hour
+            if target.key_column:
+                row[target.key_column] = key
+            rows.append(row)
+        if dialect in ("postgresql", "sqlite"):
+            _upsert(db, target, rows, dialect, now)
+        else:
+            _upsert_orm(db, target, rows)
+        stats_rollup_rows_total.labels(dimension, "written").inc(len(rows))
+        written += len(rows)
+    return written
+
+
+def _merged_values(table: Any, incoming: Any) -> dict[str, Any]:
+    """ON CONFLICT 时的合并表达式：计数累加，平均响应时间按请求数加权"""
+    result: dict[str, Any] = {}
+    for name in RollupDelta().columns():
+        if name not in table.c or name == "avg_response_time_ms":
+            continue
+        result[name] = table.c[name] + incoming[name]
+    if "avg_response_time_ms" in table.c:
+        old_n, new_n = table.c.total_requests, incoming.total_requests
+        result["avg_response_time_ms"] = case(
+            (
+                old_n + new_n > 0,
+                (table.c.avg_response_time_ms * old_n + incoming.avg_response_time_ms * new_n)
+                / (old_n + new_n),
+            ),
+            else_=0.0,
+        )
+    return result
+
+
+def _upsert(
+    db: Any, target: RollupTarget, rows: list[dict[str, Any]], dialect: str, now: datetime
+) -> None:
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    table = target.model.__table__
+    index_elements = [table.c.hour_utc]
+    if target.key_column:
+        index_elements.append(table.c[target.key_column])
+    stmt = dialect_insert(table)
+    values = _merged_values(table, stmt.excluded)
+    values["updated_at"] = now
+    where = None
+    if target.model is StatsHourly:
+        # 与整点对账并发时，以对账结果为准
+        where = table.c.is_complete.is_(False)
+    db.execute(
+        stmt.on_conflict_do_update(index_elements=index_elements, set_=values, where=where),
+        rows,
+    )
+
+
+def _upsert_orm(db: Any, target: RollupTarget, rows: list[dict[str, Any]]) -> None:
+    """不支持 ON CONFLICT 的方言：逐行读取后累加"""
+    model = target.model
+    for row in rows:
+        query = db.query(model).filter(model.hour_utc == row["hour_utc"])
+        if target.key_column:
+            query = query.filter(getattr(model, target.key_column) == row[target.key_column])
+        record = query.first()
+        if record is None:
+            db.add(model(**row))
+            continue
+        old_n, new_n = record.total_requests or 0, row["total_requests"]
+        if "avg_response_time_ms" in row and old_n + new_n > 0:
+            record.avg_response_time_ms = (
+                (record.avg_response_time_ms or 0.0) * old_n + row["avg_response_time_ms"] * new_n
+            ) / (old_n + new_n)
+        for name, value in row.items():
+            if name in ("hour_utc", "avg_response_time_ms", target.key_column):
+                continue
+            setattr(record, name, (getattr(record, name) or 0) + value)
+
+
+# ---------- 读取 ----------
+
+
+def rollup_covers(hour_utc: datetime, now: datetime | None = None) -> bool:
+    """该小时的 stats_hourly 行是否可代替原始行扫描（未对账时）
+
+    只信任当前 UTC 日内的小时：更早且未对账的小时可能早于增量汇总启用或在进程崩溃中丢失增量。
+    """
+    if not STATS_ROLLUP_ENABLED:
+        return False
+    now = now or datetime.now(timezone.utc)
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return _as_utc(hour_utc) >= today
+
+
+def sum_hourly(db: Any, start_utc: datetime, end_utc: datetime) -> Any:
+    """汇总 [start_utc, end_utc) 内的 stats_hourly 行（响应时间以总和 total_response_time_ms 返回）"""
+    return (
+        db.query(
+            func.sum(StatsHourly.total_requests).label("total_requests"),
+            func.sum(StatsHourly.error_requests).label("error_requests"),
+            func.sum(StatsHourly.input_tokens).label("input_tokens"),
+            func.sum(StatsHourly.output_tokens).label("output_tokens"),
+            func.sum(StatsHourly.cache_creation_tokens).label("cache_creation_tokens"),
+            func.sum(StatsHourly.cache_read_tokens).label("cache_read_tokens"),
+            func.sum(StatsHourly.cache_creation_cost).label("cache_creation_cost"),
+            func.sum(StatsHourly.cache_read_cost).label("cache_read_cost"),
+            func.sum(StatsHourly.total_cost).label("total_cost"),
+            func.sum(StatsHourly.actual_total_cost).label("actual_total_cost"),
+            func.sum(StatsHourly.avg_response_time_ms * StatsHourly.total_requests).label(
+                "total_response_time_ms"
+            ),
+        )
+        .filter(StatsHourly.hour_utc >= start_utc, StatsHourly.hour_utc < end_utc)
+        .first()
+    )
+
+
+# ---------- 后台任务 ----------
+
+
+class StatsRollupFlusher:
+    """后台任务：周期把累加器写入小时级统计表"""
+
+    def __init__(self, interval: float = STATS_ROLLUP_FLUSH_INTERVAL_SECONDS) -> None:
+        self.interval = max(0.1, interval)
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+            logger.info(f"[StatsRollup] 统计增量汇总已启动: interval={self.interval}s")
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self.flush()
+        logger.info("[StatsRollup] 统计增量汇总已停止")
+
+    async def _loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[StatsRollup] 统计增量写入失败: {e}")
+
+    async def flush(self) -> int:
+        batch = rollup_recorder.drain()
+        if not batch:
+            return 0
+
+        from src.database.database import get_db_context
+        from src.utils.async_utils import run_in_executor
+
+        def _write() -> int:
+            with get_db_context() as db:
+                return write_batch(db, batch)
+
+        start = time.perf_counter()
+        try:
+            written = await run_in_executor(_write)
+        except Exception:
+            rollup_recorder.restore(batch)
+            raise
+        stats_rollup_flush_seconds.observe(time.perf_counter() - start)
+        if written:
+            logger.debug(f"[StatsRollup] 写入小时统计增量: {written} 行")
+        return written
+
+
+_flusher: StatsRollupFlusher | None = None
+
+
+async def start_stats_rollup_flusher() -> StatsRollupFlusher | None:
+    global _flusher
+    if not STATS_ROLLUP_ENABLED:
+        return None
+    if _flusher is None:
+        _flusher = StatsRollupFlusher()
+        await _flusher.start()
+    return _flusher
+
+
+async def stop_stats_rollup_flusher() -> None:
+    global _flusher
+    if _flusher is not None:
+        await _flusher.stop()
+        _flusher = None
+
+
+__all__ = [
+    "ROLLUP_TARGETS",
+    "STATS_ROLLUP_ENABLED",
+    "RollupDelta",
+    "RollupRecorder",
+    "StatsRollupFlusher",
+    "UsageFact",
+    "capture_usage",
+    "rollup_covers",
+    "rollup_recorder",
+    "rollup_usage",
+    "start_stats_rollup_flusher",
+    "stop_stats_rollup_flusher",
+    "sum_hourly",
+    "write_batch",
+]
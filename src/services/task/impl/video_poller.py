@@ -14,6 +14,18 @@ from dataclasses import dataclass
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    String,
+    bindparam,
+    cast,
+    column,
+    func,
+    or_,
+    update,
+    values,
+)
 from sqlalchemy.orm import Session
 
 from src.api.handlers.base.request_builder import ProviderAuthInfo, get_provider_auth
@@ -35,6 +47,7 @@ from src.core.crypto import crypto_service
 from src.core.logger import logger
 from src.database import create_session
 from src.models.database import ProviderAPIKey, ProviderEndpoint, VideoTask
+from src.services.task.scheduling import AdaptiveBackoff, PollOutcome
 from src.services.task.service import TaskService
 
 
@@ -54,6 +67,22 @@ class VideoPollContext:
     poll_interval_seconds: int
     max_poll_count: int
     current_status: str
+    # 用于估计完成耗时
+    model: str = ""
+    submitted_at: datetime | None = None
+
+
+# 仍需轮询的状态
+_ACTIVE_STATUSES = (
+    VideoStatus.SUBMITTED.value,
+    VideoStatus.QUEUED.value,
+    VideoStatus.PROCESSING.value,
+)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite 返回不带时区的时间
+    return value if value.tzinfo is not None else value.replace(tzinfo=timezone.utc)
 
 
 # 永久性错误指示词（用于降级判断，不应重试）
@@ -104,6 +133,7 @@ class VideoTaskPollerAdapter:
     def __init__(self) -> None:
         self._openai_normalizer = OpenAINormalizer()
         self._gemini_normalizer = GeminiNormalizer()
+        self.backoff = AdaptiveBackoff(config.video_poll_max_interval_seconds)
 
     def sanitize_error_message(self, message: str) -> str:
         return sanitize_error_message(message)
@@ -112,13 +142,7 @@ class VideoTaskPollerAdapter:
         tasks = (
             db.query(VideoTask)
             .filter(
-                VideoTask.status.in_(
-                    [
-                        VideoStatus.SUBMITTED.value,
-                        VideoStatus.QUEUED.value,
-                        VideoStatus.PROCESSING.value,
-                    ]
-                ),
+                VideoTask.status.in_(_ACTIVE_STATUSES),
                 VideoTask.next_poll_at <= now,
                 VideoTask.poll_count < VideoTask.max_poll_count,
             )
@@ -197,6 +221,8 @@ class VideoTaskPollerAdapter:
             poll_interval_seconds=task.poll_interval_seconds,
             max_poll_count=task.max_poll_count,
             current_status=task.status,
+            model=task.model or "",
+            submitted_at=task.submitted_at,
         )
 
     async def poll_task_http(self, ctx: VideoPollContext) -> InternalVideoPollResult:
@@ -239,62 +265,279 @@ class VideoTaskPollerAdapter:
             error_exception: 如果 HTTP 请求失败，传入异常对象
         """
         with create_session() as db:
-            task = db.get(VideoTask, task_id)
+            # 行锁：分区租约交接期间新旧持有者可能同时写回同一任务，后到者等待并看到终态
+            task = db.get(VideoTask, task_id, with_for_update=True)
             if not task:
                 logger.warning("Task {} disappeared during poll update", task_id)
                 return
+            if task.status not in _ACTIVE_STATUSES:
+                return
 
-            if error_exception is not None and ctx is not None:
-                # HTTP 请求失败（需要 ctx 来计算 backoff）
-                self._handle_poll_error(task, error_exception, ctx)
-            elif result.status == VideoStatus.COMPLETED:
-                task.status = VideoStatus.COMPLETED.value
-                task.video_url = result.video_url
-                task.video_expires_at = result.expires_at
-                task.completed_at = datetime.now(timezone.utc)
-                task.progress_percent = 100
-                if result.video_urls:
-                    task.video_urls = result.video_urls
-                if result.video_duration_seconds is not None:
-                    task.video_duration_seconds = result.video_duration_seconds
-                self._attach_poll_raw_response(task, result)
-            elif result.status == VideoStatus.FAILED:
-                task.status = VideoStatus.FAILED.value
-                task.error_code = result.error_code
-                task.error_message = result.error_message
-                task.completed_at = datetime.now(timezone.utc)
-                self._attach_poll_raw_response(task, result)
-            else:
-                task.poll_count += 1
-                task.progress_percent = result.progress_percent
-                task.next_poll_at = datetime.now(timezone.utc) + timedelta(
-                    seconds=task.poll_interval_seconds
+            self._apply_poll_result(task, result, ctx, error_exception)
+            await self._finalize_if_terminal(db, task, redis_client)
+            db.commit()
+
+    # ==================== 批量处理（TaskPollerService 使用）====================
+
+    def list_schedule(
+        self, db: Session, *, updated_since: datetime | None
+    ) -> list[tuple[str, datetime | None]]:
+        """
+        返回调度队列所需的 (task_id, next_poll_at)
+
+        updated_since 为 None 时全量加载在途任务；否则返回此后更新过的任务，
+        已不需要轮询的任务 next_poll_at 返回 None，由调用方移出队列。
+        """
+        query = db.query(
+            VideoTask.id,
+            VideoTask.status,
+            VideoTask.next_poll_at,
+            VideoTask.poll_count,
+            VideoTask.max_poll_count,
+        )
+        if updated_since is None:
+            query = query.filter(VideoTask.status.in_(_ACTIVE_STATUSES))
+        else:
+            query = query.filter(VideoTask.updated_at >= updated_since)
+
+        schedule: list[tuple[str, datetime | None]] = []
+        for task_id, status, next_poll_at, poll_count, max_poll_count in query:
+            pollable = (
+                status in _ACTIVE_STATUSES
+                and next_poll_at is not None
+                and (poll_count or 0) < (max_poll_count or 0)
+            )
+            schedule.append((task_id, _as_utc(next_poll_at) if pollable else None))
+        return schedule
+
+    def list_completion_samples(
+        self, db: Session, *, since: datetime, limit: int
+    ) -> list[tuple[str, float]]:
+        """最近完成任务的 (backoff key, 完成耗时秒)，按完成时间倒序"""
+        rows = (
+            db.query(
+                VideoTask.provider_api_format,
+                VideoTask.model,
+                VideoTask.submitted_at,
+                VideoTask.completed_at,
+            )
+            .filter(
+                VideoTask.status == VideoStatus.COMPLETED.value,
+                VideoTask.completed_at >= since,
+                VideoTask.submitted_at.isnot(None),
+            )
+            .order_by(VideoTask.completed_at.desc())
+            .limit(limit)
+            .all()
+        )
+        return [
+            (
+                AdaptiveBackoff.key((provider_format or "").strip().lower(), model or ""),
+                (_as_utc(completed_at) - _as_utc(submitted_at)).total_seconds(),
+            )
+            for provider_format, model, submitted_at, completed_at in rows
+        ]
+
+    async def prepare_poll_batch(
+        self, db: Session, task_ids: list[str], *, now: datetime
+    ) -> tuple[list[tuple[str, VideoPollContext | InternalVideoPollResult]], dict[str, datetime]]:
+        """
+        阶段 1（批量）：一次查询加载任务，并预取端点与密钥
+
+        Returns:
+            (prepared, reschedule)：prepared 为需要轮询的任务及其上下文（或准备失败的结果）；
+            reschedule 为未到期（已被其他路径改期）或准备时出错、需要稍后重试的任务
+        """
+        tasks = {t.id: t for t in db.query(VideoTask).filter(VideoTask.id.in_(task_ids)).all()}
+        # 预取到会话 identity map，之后 _get_endpoint/_get_key 直接命中
+        endpoint_ids = {t.endpoint_id for t in tasks.values() if t.endpoint_id}
+        key_ids = {t.key_id for t in tasks.values() if t.key_id}
+        if endpoint_ids:
+            db.query(ProviderEndpoint).filter(ProviderEndpoint.id.in_(endpoint_ids)).all()
+        if key_ids:
+            db.query(ProviderAPIKey).filter(ProviderAPIKey.id.in_(key_ids)).all()
+
+        prepared: list[tuple[str, VideoPollContext | InternalVideoPollResult]] = []
+        reschedule: dict[str, datetime] = {}
+        for task_id in task_ids:
+            task = tasks.get(task_id)
+            if task is None:
+                logger.warning("[{}] Task {} disappeared during poll", self.task_type, task_id)
+                continue
+            if (
+                task.status not in _ACTIVE_STATUSES
+                or task.next_poll_at is None
+                or task.poll_count >= task.max_poll_count
+            ):
+                continue
+            next_poll_at = _as_utc(task.next_poll_at)
+            if next_poll_at > now:
+                reschedule[task_id] = next_poll_at
+                continue
+            try:
+                prepared.append((task_id, await self.prepare_poll_context(db, task)))
+            except Exception as exc:
+                logger.exception(
+                    "[{}] Unexpected error preparing task {}: {}",
+                    self.task_type,
+                    task_id,
+                    sanitize_error_message(str(exc)),
                 )
+                reschedule[task_id] = now + timedelta(seconds=task.poll_interval_seconds)
+        return prepared, reschedule
 
-            # 超时检查
-            task.updated_at = datetime.now(timezone.utc)
-            if task.poll_count >= task.max_poll_count and task.status not in [
-                VideoStatus.COMPLETED.value,
-                VideoStatus.FAILED.value,
-                VideoStatus.CANCELLED.value,
-            ]:
-                task.status = VideoStatus.FAILED.value
-                task.error_code = "poll_timeout"
-                task.error_message = f"Task timed out after {task.poll_count} polls"
-                task.completed_at = datetime.now(timezone.utc)
+    async def apply_poll_results(
+        self, outcomes: list[PollOutcome], redis_client: Any | None
+    ) -> dict[str, datetime]:
+        """
+        阶段 3（批量）：一个会话写回一轮结果
 
-            # 终态结算
-            if task.status in (VideoStatus.COMPLETED.value, VideoStatus.FAILED.value):
-                try:
-                    await TaskService(db, redis_client=redis_client).finalize_video_task(task)
-                except Exception as exc:
-                    logger.exception(
-                        "Failed to record video usage for task={}: {}",
-                        task.id,
-                        sanitize_error_message(str(exc)),
+        - 仍在进行中（含可重试错误）的任务合并为一条 UPDATE，只更新仍处于在途状态的行
+        - 进入终态的任务逐个走 ORM 路径并结算
+        返回仍需轮询的任务的下次轮询时间。
+        """
+        now = datetime.now(timezone.utc)
+        rows: list[dict[str, Any]] = []
+        terminal: list[PollOutcome] = []
+        next_due: dict[str, datetime] = {}
+
+        for outcome in outcomes:
+            ctx, result, error = outcome.ctx, outcome.result, outcome.error
+            if ctx is None or ctx.poll_count + 1 >= ctx.max_poll_count:
+                terminal.append(outcome)
+                continue
+            if error is not None:
+                status_code = error.status_code if isinstance(error, PollHTTPError) else None
+                if self._is_permanent_error(error, status_code=status_code):
+                    terminal.append(outcome)
+                    continue
+                error_msg = sanitize_error_message(str(error))
+                logger.warning("Poll error for task {}: {}", ctx.task_id, error_msg)
+                delay = self._error_backoff(ctx.poll_interval_seconds, ctx.retry_count)
+                fields = (ctx.retry_count + 1, None, f"Poll error: {error_msg}")
+            elif result.status in (VideoStatus.COMPLETED, VideoStatus.FAILED):
+                terminal.append(outcome)
+                continue
+            else:
+                elapsed = (
+                    (now - _as_utc(ctx.submitted_at)).total_seconds() if ctx.submitted_at else 0
+                )
+                delay = self.backoff.next_delay(
+                    AdaptiveBackoff.key(ctx.provider_api_format, ctx.model),
+                    elapsed,
+                    ctx.poll_interval_seconds,
+                )
+                fields = (ctx.retry_count, result.progress_percent, None)
+
+            next_poll_at = now + timedelta(seconds=delay)
+            rows.append(
+                {
+                    "b_id": ctx.task_id,
+                    "b_poll_count": ctx.poll_count + 1,
+                    "b_retry_count": fields[0],
+                    "b_next_poll_at": next_poll_at,
+                    "b_progress_percent": fields[1],
+                    "b_progress_message": fields[2],
+                    "b_updated_at": now,
+                }
+            )
+            next_due[ctx.task_id] = next_poll_at
+
+        with create_session() as db:
+            if rows:
+                if db.get_bind().dialect.name == "postgresql":
+                    _update_progress_from_values(db, rows)
+                else:
+                    _update_progress_executemany(db, rows)
+
+            # 终态任务加行锁（按 ID 排序，多实例并发时加锁顺序一致）：租约交接期间两个实例
+            # 可能同时轮询到同一任务的终态，后到者在锁释放后看到已结束的状态并跳过，不会重复结算
+            for outcome in sorted(terminal, key=lambda o: o.task_id):
+                task = db.get(VideoTask, outcome.task_id, with_for_update=True)
+                if task is None or task.status not in _ACTIVE_STATUSES:
+                    # 轮询期间被取消或已由其他路径结束
+                    continue
+                self._apply_poll_result(task, outcome.result, outcome.ctx, outcome.error)
+                await self._finalize_if_terminal(db, task, redis_client)
+                if task.status == VideoStatus.COMPLETED.value and task.submitted_at:
+                    self.backoff.observe(
+                        AdaptiveBackoff.key(
+                            (task.provider_api_format or "").strip().lower(), task.model or ""
+                        ),
+                        (_as_utc(task.completed_at) - _as_utc(task.submitted_at)).total_seconds(),
                     )
+                elif task.status in _ACTIVE_STATUSES and task.next_poll_at is not None:
+                    next_due[task.id] = _as_utc(task.next_poll_at)
 
             db.commit()
+        return next_due
+
+    # ==================== 结果写回 ====================
+
+    def _apply_poll_result(
+        self,
+        task: VideoTask,
+        result: InternalVideoPollResult,
+        ctx: VideoPollContext | None,
+        error_exception: Exception | None,
+    ) -> None:
+        """把一次轮询结果写到任务对象上（不提交）"""
+        if error_exception is not None and ctx is not None:
+            # HTTP 请求失败（需要 ctx 来计算 backoff）
+            self._handle_poll_error(task, error_exception, ctx)
+        elif result.status == VideoStatus.COMPLETED:
+            task.status = VideoStatus.COMPLETED.value
+            task.video_url = result.video_url
+            task.video_expires_at = result.expires_at
+            task.completed_at = datetime.now(timezone.utc)
+            task.progress_percent = 100
+            if result.video_urls:
+                task.video_urls = result.video_urls
+            if result.video_duration_seconds is not None:
+                task.video_duration_seconds = result.video_duration_seconds
+            self._attach_poll_raw_response(task, result)
+        elif result.status == VideoStatus.FAILED:
+            task.status = VideoStatus.FAILED.value
+            task.error_code = result.error_code
+            task.error_message = result.error_message
+            task.completed_at = datetime.now(timezone.utc)
+            self._attach_poll_raw_response(task, result)
+        else:
+            task.poll_count += 1
+            task.progress_percent = result.progress_percent
+            task.next_poll_at = datetime.now(timezone.utc) + timedelta(
+                seconds=task.poll_interval_seconds
+            )
+
+        # 超时检查
+        task.updated_at = datetime.now(timezone.utc)
+        if task.poll_count >= task.max_poll_count and task.status not in [
+            VideoStatus.COMPLETED.value,
+            VideoStatus.FAILED.value,
+            VideoStatus.CANCELLED.value,
+        ]:
+            task.status = VideoStatus.FAILED.value
+            task.error_code = "poll_timeout"
+            task.error_message = f"Task timed out after {task.poll_count} polls"
+            task.completed_at = datetime.now(timezone.utc)
+
+    async def _finalize_if_terminal(
+        self, db: Session, task: VideoTask, redis_client: Any | None
+    ) -> None:
+        """终态结算"""
+        if task.status not in (VideoStatus.COMPLETED.value, VideoStatus.FAILED.value):
+            return
+        try:
+            await TaskService(db, redis_client=redis_client).finalize_video_task(task)
+        except Exception as exc:
+            logger.exception(
+                "Failed to record video usage for task={}: {}",
+                task.id,
+                sanitize_error_message(str(exc)),
+            )
+
+    def _error_backoff(self, poll_interval_seconds: int, retry_count: int) -> int:
+        return min(poll_interval_seconds * (2 ** min(retry_count, 5)), self.max_backoff_seconds)
 
     def _handle_poll_error(self, task: VideoTask, exc: Exception, ctx: VideoPollContext) -> None:
         """处理轮询错误"""
@@ -311,10 +554,7 @@ class VideoTaskPollerAdapter:
             task.error_message = error_msg
             task.completed_at = datetime.now(timezone.utc)
         else:
-            backoff = min(
-                ctx.poll_interval_seconds * (2 ** min(ctx.retry_count, 5)),
-                self.max_backoff_seconds,
-            )
+            backoff = self._error_backoff(ctx.poll_interval_seconds, ctx.retry_count)
             task.retry_count += 1
             task.next_poll_at = datetime.now(timezone.utc) + timedelta(seconds=backoff)
 
@@ -593,13 +833,14 @@ class VideoTaskPollerAdapter:
         return headers
 
     def _get_endpoint(self, db: Session, endpoint_id: str) -> ProviderEndpoint:
-        endpoint = db.query(ProviderEndpoint).filter(ProviderEndpoint.id == endpoint_id).first()
+        # db.get 优先命中会话 identity map（批量准备时已预取）
+        endpoint = db.get(ProviderEndpoint, endpoint_id)
         if not endpoint:
             raise RuntimeError("Provider endpoint not found")
         return endpoint
 
     def _get_key(self, db: Session, key_id: str) -> ProviderAPIKey:
-        key = db.query(ProviderAPIKey).filter(ProviderAPIKey.id == key_id).first()
+        key = db.get(ProviderAPIKey, key_id)
         if not key:
             raise RuntimeError("Provider key not found")
         return key
@@ -625,3 +866,80 @@ class VideoTaskPollerAdapter:
 
         # 回退到原始文本（截断）
         return sanitize_error_message(response_text[:500])
+
+
+# ==================== 批量写回进行中任务 ====================
+
+
+def _still_active(table: Any) -> Any:
+    # executemany 不支持 IN 的展开参数，用 OR 等值条件
+    return or_(*(table.c.status == status for status in _ACTIVE_STATUSES))
+
+
+def _progress_assignments(
+    poll_count: Any,
+    retry_count: Any,
+    next_poll_at: Any,
+    progress_percent: Any,
+    progress_message: Any,
+    updated_at: Any,
+) -> dict[str, Any]:
+    table = VideoTask.__table__
+    return {
+        "poll_count": poll_count,
+        "retry_count": retry_count,
+        "next_poll_at": next_poll_at,
+        # 没有新值时保留原值（显式 cast：VALUES 中整列为 NULL 时 PostgreSQL 推断为 text）
+        "progress_percent": func.coalesce(
+            cast(progress_percent, Integer), table.c.progress_percent
+        ),
+        "progress_message": func.coalesce(cast(progress_message, String), table.c.progress_message),
+        "updated_at": updated_at,
+    }
+
+
+def _update_progress_from_values(db: Session, rows: list[dict[str, Any]]) -> None:
+    polled = values(
+        column("id", String),
+        column("poll_count", Integer),
+        column("retry_count", Integer),
+        column("next_poll_at", DateTime(timezone=True)),
+        column("progress_percent", Integer),
+        column("progress_message", String),
+        column("updated_at", DateTime(timezone=True)),
+        name="polled",
+    ).data([tuple(row.values()) for row in rows])
+    table = VideoTask.__table__
+    db.execute(
+        update(table)
+        .where(table.c.id == polled.c.id, _still_active(table))
+        .values(
+            _progress_assignments(
+                polled.c.poll_count,
+                polled.c.retry_count,
+                polled.c.next_poll_at,
+                polled.c.progress_percent,
+                polled.c.progress_message,
+                polled.c.updated_at,
+            )
+        )
+    )
+
+
+def _update_progress_executemany(db: Session, rows: list[dict[str, Any]]) -> None:
+    table = VideoTask.__table__
+    stmt = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"), _still_active(table))
+        .values(
+            _progress_assignments(
+                bindparam("b_poll_count", type_=Integer),
+                bindparam("b_retry_count", type_=Integer),
+                bindparam("b_next_poll_at", type_=DateTime(timezone=True)),
+                bindparam("b_progress_percent", type_=Integer),
+                bindparam("b_progress_message", type_=String),
+                bindparam("b_updated_at", type_=DateTime(timezone=True)),
+            )
+        )
+    )
+    db.connection().execute(stmt, rows)
@@ -0,0 +1,222 @@
+"""
+任务轮询调度原语
+
+- PollOutcome：一次轮询的结果，在轮询服务与适配器之间传递
+- DueQueue：按分区组织的到期时间最小堆
+- AdaptiveBackoff：按 (provider 格式, 模型) 学习完成耗时，计算下次轮询间隔
+- PartitionLeases：基于 Redis 的分区租约，多个 worker 均分任务分区
+"""
+
+from __future__ import annotations
+
+import heapq
+import time
+import zlib
+from collections.abc import Iterable
+from dataclasses import dataclass
+from typing import Any
+from uuid import uuid4
+
+
+@dataclass(slots=True)
+class PollOutcome:
+    """单个任务一次轮询的结果（ctx 为 None 表示准备阶段已失败）"""
+
+    task_id: str
+    result: Any
+    ctx: Any | None
+    error: Exception | None = None
+
+
+class DueQueue:
+    """按分区组织的到期时间最小堆（惰性删除：以 _due 中的时间为准）"""
+
+    def __init__(self, partitions: int) -> None:
+        self.partitions = max(1, partitions)
+        self._heaps: list[list[tuple[float, str]]] = [[] for _ in range(self.partitions)]
+        self._due: dict[str, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._due)
+
+    def __contains__(self, task_id: object) -> bool:
+        return task_id in self._due
+
+    def partition_of(self, task_id: str) -> int:
+        return zlib.crc32(task_id.encode()) % self.partitions
+
+    def schedule(self, task_id: str, due_ts: float) -> None:
+        if self._due.get(task_id) == due_ts:
+            return
+        self._due[task_id] = due_ts
+        heapq.heappush(self._heaps[self.partition_of(task_id)], (due_ts, task_id))
+
+    def discard(self, task_id: str) -> None:
+        self._due.pop(task_id, None)
+
+    def clear(self) -> None:
+        for heap in self._heaps:
+            heap.clear()
+        self._due.clear()
+
+    def pop_due(self, now: float, limit: int, partitions: Iterable[int]) -> list[str]:
+        """取出指定分区中已到期的任务（最早到期优先，最多 limit 个）"""
+        candidates: list[tuple[float, str]] = []
+        for p in partitions:
+            heap = self._heaps[p]
+            while heap and heap[0][0] <= now:
+                due, task_id = heapq.heappop(heap)
+                if self._due.get(task_id) == due:
+                    candidates.append((due, task_id))
+        candidates.sort()
+        for due, task_id in candidates[limit:]:
+            heapq.heappush(self._heaps[self.partition_of(task_id)], (due, task_id))
+        taken = candidates[:limit]
+        for _, task_id in taken:
+            del self._due[task_id]
+        return [task_id for _, task_id in taken]
+
+    def next_due(self, partitions: Iterable[int]) -> float | None:
+        earliest: float | None = None
+        for p in partitions:
+            heap = self._heaps[p]
+            while heap and self._due.get(heap[0][1]) != heap[0][0]:
+                heapq.heappop(heap)
+            if heap and (earliest is None or heap[0][0] < earliest):
+                earliest = heap[0][0]
+        return earliest
+
+
+class AdaptiveBackoff:
+    """
+    按 (provider 格式, 模型) 学习任务完成耗时（EWMA），据此安排下次轮询
+
+    - 预计完成前：每次等待剩余时间的一半（不短于基础间隔），逐步逼近预计完成时刻
+    - 接近或刚超过预计时间：按基础间隔轮询
+    - 远超预计时间：间隔随超出比例线性放大
+    所有间隔都在 [基础间隔, max_interval] 之间；没有样本时退化为基础间隔。
+    """
+
+    def __init__(self, max_interval: float, alpha: float = 0.2) -> None:
+        self.max_interval = max_interval
+        self.alpha = alpha
+        self._expected: dict[str, float] = {}
+
+    @staticmethod
+    def key(provider_format: str, model: str) -> str:
+        return f"{provider_format}|{model}"
+
+    def observe(self, key: str, duration: float) -> None:
+        if duration <= 0:
+            return
+        previous = self._expected.get(key)
+        self._expected[key] = (
+            duration if previous is None else previous + self.alpha * (duration - previous)
+        )
+
+    def expected(self, key: str) -> float | None:
+        return self._expected.get(key)
+
+    def next_delay(self, key: str, elapsed: float, base_interval: float) -> float:
+        upper = max(base_interval, self.max_interval)
+        expected = self._expected.get(key)
+        if expected is None:
+            return base_interval
+        remaining = expected - elapsed
+        if remaining > base_interval:
+            return min(upper, max(base_interval, remaining / 2))
+        overdue = -remaining / expected
+        if overdue <= 1:
+            return base_interval
+        return min(upper, base_interval * overdue)
+
+    def snapshot(self) -> dict[str, float]:
+        return {k: round(v, 1) for k, v in self._expected.items()}
+
+
+class PartitionLeases:
+    """
+    分区租约：每个 worker 心跳登记后按活跃 worker 数均分分区
+
+    一次 Lua 调用完成心跳、续约自己的分区、释放超出份额的分区、抢占空闲分区。
+    无 Redis 时持有全部分区。
+    """
+
+    _REFRESH_SCRIPT = """
+    local worker = ARGV[1]
+    local now = tonumber(ARGV[2])
+    local ttl = tonumber(ARGV[3])
+    local start = tonumber(ARGV[4])
+
+    redis.call('ZADD', KEYS[1], now, worker)
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+    redis.call('PEXPIRE', KEYS[1], ttl * 2)
+    local workers = math.max(1, redis.call('ZCARD', KEYS[1]))
+    local total = #KEYS - 1
+    local fair = math.ceil(total / workers)
+
+    local owned = {}
+    for i = 2, #KEYS do
+        if redis.call('GET', KEYS[i]) == worker then
+            if #owned < fair then
+                redis.call('PEXPIRE', KEYS[i], ttl)
+                table.insert(owned, i - 2)
+            else
+                redis.call('DEL', KEYS[i])
+            end
+        end
+    end
+    for j = 0, total - 1 do
+        if #owned >= fair then
+            break
+        end
+        local p = (start + j) % total
+        if redis.call('SET', KEYS[p + 2], worker, 'NX', 'PX', ttl) then
+            table.insert(owned, p)
+        end
+    end
+    return owned
+    """
+
+    _RELEASE_SCRIPT = """
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    for i = 2, #KEYS do
+        if redis.call('GET', KEYS[i]) == ARGV[1] then
+            redis.call('DEL', KEYS[i])
+        end
+    end
+    return 1
+    """
+
+    def __init__(self, redis: Any | None, prefix: str, partitions: int, ttl_seconds: int) -> None:
+        self.redis = redis
+        self.partitions = partitions
+        self.ttl_ms = ttl_seconds * 1000
+        self.worker_id = str(uuid4())
+        self._keys = [f"{prefix}:workers"] + [f"{prefix}:{p}" for p in range(partitions)]
+        self.owned: frozenset[int] = frozenset(range(partitions)) if redis is None else frozenset()
+        self.refreshed_at = 0.0
+
+    async def refresh(self) -> frozenset[int]:
+        if self.redis is None:
+            return self.owned
+        now_ms = int(time.time() * 1000)
+        start = zlib.crc32(self.worker_id.encode()) % self.partitions
+        owned = await self.redis.eval(
+            self._REFRESH_SCRIPT,
+            len(self._keys),
+            *self._keys,
+            self.worker_id,
+            now_ms,
+            self.ttl_ms,
+            start,
+        )
+        self.owned = frozenset(int(p) for p in owned)
+        self.refreshed_at = time.monotonic()
+        return self.owned
+
+    async def release(self) -> None:
+        if self.redis is None:
+            return
+        await self.redis.eval(self._RELEASE_SCRIPT, len(self._keys), *self._keys, self.worker_id)
+        self.owned = frozenset()
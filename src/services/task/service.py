@@ -1713,7 +1713,10 @@ class TaskService:
         if not request_id:
             return False
 
-        existing = self.db.query(Usage).filter(Usage.request_id == request_id).first()
+        # 行锁：并发结算时后到者等待前者提交，再读到 billing_updated_at 后跳过
+        existing = (
+            self.db.query(Usage).filter(Usage.request_id == request_id).with_for_update().first()
+        )
         if not existing:
             logger.warning(
                 "Usage not found for video task, creating fallback: task_id={} request_id={}",
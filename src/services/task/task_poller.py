@@ -6,22 +6,32 @@ Currently wired with a video poller adapter.
 
 优化：HTTP 请求期间不持有数据库连接，避免阻塞其他请求。
 采用三阶段处理：准备数据 -> HTTP 请求 -> 更新数据库。
+
+调度：
+- 进程内按分区维护到期时间最小堆（DueQueue），启动时从数据库加载在途任务，
+  之后按 updated_at 增量刷新，并定期全量重建以自愈
+- 轮询循环睡眠到最近的到期时间（或下一次刷新），不再固定间隔扫表
+- 每轮一个会话批量准备任务、一条语句批量写回进行中任务的状态；终态任务逐个结算
+- 下次轮询时间由 AdaptiveBackoff 按 (provider 格式, 模型) 的预计完成耗时计算
+- Redis 可用时任务按 ID 哈希分区，各 worker 通过分区租约（PartitionLeases）
+  按活跃 worker 数均分；无 Redis 时单进程持有全部分区
 """
 
 from __future__ import annotations
 
 import asyncio
-from datetime import datetime, timezone
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Any, Protocol, runtime_checkable
-from uuid import uuid4
 
 from sqlalchemy.orm import Session
 
+from src.config.settings import config
 from src.core.api_format.conversion.internal_video import InternalVideoPollResult
 from src.core.logger import logger
 from src.database import create_session
-from src.services.system.scheduler import get_scheduler
-from src.services.task.impl.video_poller import VideoPollContext, VideoTaskPollerAdapter
+from src.services.task.impl.video_poller import VideoTaskPollerAdapter
+from src.services.task.scheduling import AdaptiveBackoff, DueQueue, PartitionLeases, PollOutcome
 
 
 @runtime_checkable
@@ -33,7 +43,7 @@ class TaskPollerAdapter(Protocol):
     job_name: str
     interval_seconds: int
 
-    # distributed lock (optional, best-effort)
+    # partition leases (Redis key prefix and TTL)
     lock_key: str
     lock_ttl: int
 
@@ -46,6 +56,24 @@ class TaskPollerAdapter(Protocol):
 
     def get_task(self, db: Session, task_id: str) -> Any | None: ...
 
+    # 调度队列
+    def list_schedule(
+        self, db: Session, *, updated_since: datetime | None
+    ) -> list[tuple[str, datetime | None]]: ...
+
+    def list_completion_samples(
+        self, db: Session, *, since: datetime, limit: int
+    ) -> list[tuple[str, float]]: ...
+
+    # 批量分阶段处理
+    async def prepare_poll_batch(
+        self, db: Session, task_ids: list[str], *, now: datetime
+    ) -> tuple[list[tuple[str, Any]], dict[str, datetime | None]]: ...
+
+    async def apply_poll_results(
+        self, outcomes: list[PollOutcome], redis_client: Any | None
+    ) -> dict[str, datetime]: ...
+
     # 分阶段处理方法（推荐使用）
     async def prepare_poll_context(
         self, db: Session, task: Any
@@ -73,6 +101,14 @@ class TaskPollerAdapter(Protocol):
 class TaskPollerService:
     """Generic background poller for async tasks."""
 
+    # 全量重建到期队列的间隔（秒）
+    FULL_RESEED_SECONDS = 300
+    # 增量刷新时 updated_at 向前重叠的秒数（覆盖提交延迟）
+    REFRESH_OVERLAP_SECONDS = 30
+    # 启动时用于估计完成耗时的历史样本
+    COMPLETION_SAMPLE_HOURS = 24
+    COMPLETION_SAMPLE_LIMIT = 500
+
     def __init__(self, adapter: TaskPollerAdapter) -> None:
         self.adapter = adapter
         self._lock = asyncio.Lock()
@@ -80,6 +116,21 @@ class TaskPollerService:
         self._semaphore: asyncio.Semaphore | None = None
         self._consecutive_failures = 0
 
+        self._queue = DueQueue(config.video_poll_partitions)
+        self._leases: PartitionLeases | None = None
+        self._in_flight: set[str] = set()
+        self._refresh_interval = max(0.5, config.video_poll_refresh_seconds)
+        self._refreshed_at = 0.0
+        self._reseeded_at = 0.0
+        self._watermark: datetime | None = None
+        self._wakeup = asyncio.Event()
+        self._loop_task: asyncio.Task | None = None
+
+    @property
+    def partitioned(self) -> bool:
+        """是否通过 Redis 分区租约在多个 worker 间分摊"""
+        return self._leases is not None and self._leases.redis is not None
+
     async def start(self) -> None:
         if self._semaphore is None:
             self._semaphore = asyncio.Semaphore(self.adapter.concurrency)
@@ -90,144 +141,230 @@ class TaskPollerService:
         if self.redis is None:
             self.redis = await get_redis_client(require_redis=False)
 
-        scheduler = get_scheduler()
-        scheduler.add_interval_job(
-            self.poll_pending_tasks,
-            seconds=self.adapter.interval_seconds,
-            job_id=self.adapter.job_id,
-            name=self.adapter.job_name,
+        self._leases = PartitionLeases(
+            self.redis,
+            prefix=f"{self.adapter.lock_key}:partition",
+            partitions=self._queue.partitions,
+            ttl_seconds=self.adapter.lock_ttl,
         )
+        await self._seed_completion_estimates()
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
 
     async def stop(self) -> None:
-        scheduler = get_scheduler()
-        scheduler.remove_job(self.adapter.job_id)
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        if self._leases is not None:
+            try:
+                await self._leases.release()
+            except Exception as exc:
+                logger.debug("[{}] 释放分区租约失败: {}", self.adapter.task_type, exc)
+
+    def wake(self) -> None:
+        """提前唤醒轮询循环（例如刚提交了新任务）"""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self._refresh_if_needed()
+                await self.poll_pending_tasks()
+                await self._sleep_until_next_due()
+            except asyncio.CancelledError:
+                break
+            except Exception as exc:
+                logger.exception(
+                    "[{}] poller loop error: {}",
+                    self.adapter.task_type,
+                    self.adapter.sanitize_error_message(str(exc)),
+                )
+                await asyncio.sleep(self.adapter.interval_seconds)
+
+    async def _sleep_until_next_due(self) -> None:
+        owned = self._leases.owned if self._leases else range(self._queue.partitions)
+        next_due = self._queue.next_due(owned)
+        until_refresh = self._refreshed_at + self._refresh_interval - time.monotonic()
+        timeout = until_refresh
+        if next_due is not None:
+            timeout = min(timeout, next_due - time.time())
+        if timeout <= 0:
+            return
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=timeout)
+        except TimeoutError:
+            pass
+
+    # ---------------- 队列维护 ----------------
+
+    async def _refresh_if_needed(self, force: bool = False) -> None:
+        mono = time.monotonic()
+        if not force and mono - self._refreshed_at < self._refresh_interval:
+            return
+        self._refreshed_at = mono
+        if self._leases is not None:
+            previous = self._leases.owned
+            try:
+                owned = await self._leases.refresh()
+            except Exception as exc:
+                # Redis 异常时暂停轮询，等待下次续约
+                logger.warning("[{}] 分区租约续约失败: {}", self.adapter.task_type, exc)
+                self._leases.owned = frozenset()
+                owned = frozenset()
+            if owned != previous:
+                logger.info(
+                    "[{}] 轮询分区变更: {}/{}",
+                    self.adapter.task_type,
+                    len(owned),
+                    self._queue.partitions,
+                )
+
+        full = self._watermark is None or mono - self._reseeded_at >= self.FULL_RESEED_SECONDS
+        started = datetime.now(timezone.utc)
+        since = None if full else self._watermark - timedelta(seconds=self.REFRESH_OVERLAP_SECONDS)
+        with create_session() as db:
+            rows = self.adapter.list_schedule(db, updated_since=since)
+        if full:
+            self._queue.clear()
+            self._reseeded_at = mono
+        for task_id, next_poll_at in rows:
+            if task_id in self._in_flight:
+                continue
+            if next_poll_at is None:
+                self._queue.discard(task_id)
+            else:
+                self._queue.schedule(task_id, next_poll_at.timestamp())
+        self._watermark = started
+
+    async def _seed_completion_estimates(self) -> None:
+        backoff: AdaptiveBackoff | None = getattr(self.adapter, "backoff", None)
+        if backoff is None:
+            return
+        since = datetime.now(timezone.utc) - timedelta(hours=self.COMPLETION_SAMPLE_HOURS)
+        try:
+            with create_session() as db:
+                samples = self.adapter.list_completion_samples(
+                    db, since=since, limit=self.COMPLETION_SAMPLE_LIMIT
+                )
+        except Exception as exc:
+            logger.warning("[{}] 加载完成耗时样本失败: {}", self.adapter.task_type, exc)
+            return
+        # 样本按完成时间倒序，逆序喂入使最近的样本权重最高
+        for key, duration in reversed(samples):
+            backoff.observe(key, duration)
+        if samples:
+            logger.info("[{}] 预计完成耗时: {}", self.adapter.task_type, backoff.snapshot())
+
+    # ---------------- 轮询 ----------------
 
     async def poll_pending_tasks(self) -> None:
         async with self._lock:
-            token = await self._acquire_redis_lock()
-            if token is None:
+            owned = self._leases.owned if self._leases else range(self._queue.partitions)
+            task_ids = self._queue.pop_due(time.time(), self.adapter.batch_size, owned)
+            if not task_ids:
+                self._consecutive_failures = 0
                 return
 
+            self._in_flight.update(task_ids)
             try:
-                with create_session() as db:
-                    now = datetime.now(timezone.utc)
-                    task_ids = self.adapter.list_due_task_ids(
-                        db, now=now, limit=self.adapter.batch_size
+                failures = await self._poll_round(task_ids)
+            except Exception as exc:
+                logger.exception(
+                    "[{}] poll round failed: {}",
+                    self.adapter.task_type,
+                    self.adapter.sanitize_error_message(str(exc)),
+                )
+                # 放回队列，避免丢失（下次刷新也会从数据库恢复）
+                retry_at = time.time() + self.adapter.interval_seconds
+                for task_id in task_ids:
+                    self._queue.schedule(task_id, retry_at)
+                failures = len(task_ids)
+            finally:
+                self._in_flight.difference_update(task_ids)
+
+            if failures == len(task_ids):
+                self._consecutive_failures += 1
+                if self._consecutive_failures >= self.adapter.consecutive_failure_alert_threshold:
+                    logger.error(
+                        "[ALERT] {} poller: {} consecutive batches failed.",
+                        self.adapter.task_type,
+                        self._consecutive_failures,
                     )
+            else:
+                self._consecutive_failures = 0
+
+    async def _poll_round(self, task_ids: list[str]) -> int:
+        """执行一轮轮询，返回失败数"""
+        # ========== 阶段 1：批量准备数据（一个会话）==========
+        with create_session() as db:
+            prepared, reschedule = await self.adapter.prepare_poll_batch(
+                db, task_ids, now=datetime.now(timezone.utc)
+            )
+        for task_id, next_poll_at in reschedule.items():
+            if next_poll_at is not None:
+                self._queue.schedule(task_id, next_poll_at.timestamp())
 
-                if not task_ids:
-                    self._consecutive_failures = 0
-                    return
-
-                poll_results: list[bool] = []
-
-                if self._semaphore is None:
-                    self._semaphore = asyncio.Semaphore(self.adapter.concurrency)
-                semaphore = self._semaphore
-
-                async def poll_with_semaphore(task_id: str) -> None:
-                    async with semaphore:
-                        try:
-                            # ========== 阶段 1：准备数据（短暂持有连接）==========
-                            with create_session() as task_db:
-                                task_obj = self.adapter.get_task(task_db, task_id)
-                                if not task_obj:
-                                    logger.warning(
-                                        "[{}] Task {} disappeared during poll",
-                                        self.adapter.task_type,
-                                        task_id,
-                                    )
-                                    poll_results.append(True)
-                                    return
-
-                                ctx_or_result = await self.adapter.prepare_poll_context(
-                                    task_db, task_obj
-                                )
-
-                            # 检查是否是错误结果（而非上下文）
-                            if isinstance(ctx_or_result, InternalVideoPollResult):
-                                # 准备阶段就失败了，直接更新任务状态
-                                await self.adapter.update_task_after_poll(
-                                    task_id=task_id,
-                                    result=ctx_or_result,
-                                    ctx=None,  # type: ignore[arg-type]
-                                    redis_client=self.redis,
-                                )
-                                poll_results.append(True)
-                                return
-
-                            ctx: VideoPollContext = ctx_or_result
-
-                            # ========== 阶段 2：HTTP 请求（不持有数据库连接）==========
-                            error_exception: Exception | None = None
-                            try:
-                                result = await self.adapter.poll_task_http(ctx)
-                            except Exception as http_exc:
-                                # HTTP 请求失败，记录异常以便后续处理
-                                error_exception = http_exc
-                                result = InternalVideoPollResult(
-                                    status=None,  # type: ignore[arg-type]
-                                    error_message=str(http_exc),
-                                )
-
-                            # ========== 阶段 3：更新数据库（获取新连接）==========
-                            await self.adapter.update_task_after_poll(
-                                task_id=task_id,
-                                result=result,
-                                ctx=ctx,
-                                redis_client=self.redis,
-                                error_exception=error_exception,
-                            )
-                            poll_results.append(True)
-                        except Exception as exc:
-                            logger.exception(
-                                "[{}] Unexpected error polling task {}: {}",
-                                self.adapter.task_type,
-                                task_id,
-                                self.adapter.sanitize_error_message(str(exc)),
-                            )
-                            poll_results.append(False)
-
-                async with asyncio.TaskGroup() as tg:
-                    for tid in task_ids:
-                        tg.create_task(poll_with_semaphore(tid))
-
-                batch_failures = sum(1 for r in poll_results if r is False)
-                if batch_failures == len(task_ids):
-                    self._consecutive_failures += 1
-                    if (
-                        self._consecutive_failures
-                        >= self.adapter.consecutive_failure_alert_threshold
-                    ):
-                        logger.error(
-                            "[ALERT] {} poller: {} consecutive batches failed.",
-                            self.adapter.task_type,
-                            self._consecutive_failures,
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.adapter.concurrency)
+        semaphore = self._semaphore
+        outcomes: list[PollOutcome] = []
+        failures = 0
+
+        # ========== 阶段 2：HTTP 请求（不持有数据库连接）==========
+        async def poll_one(task_id: str, ctx_or_result: Any) -> None:
+            nonlocal failures
+            if isinstance(ctx_or_result, InternalVideoPollResult):
+                # 准备阶段就失败了，直接更新任务状态
+                outcomes.append(PollOutcome(task_id, ctx_or_result, None))
+                return
+            async with semaphore:
+                try:
+                    result = await self.adapter.poll_task_http(ctx_or_result)
+                    outcomes.append(PollOutcome(task_id, result, ctx_or_result))
+                except Exception as http_exc:
+                    # HTTP 请求失败，记录异常以便后续处理
+                    failures += 1
+                    outcomes.append(
+                        PollOutcome(
+                            task_id,
+                            InternalVideoPollResult(
+                                status=None,  # type: ignore[arg-type]
+                                error_message=str(http_exc),
+                            ),
+                            ctx_or_result,
+                            http_exc,
                         )
-                else:
-                    self._consecutive_failures = 0
-            finally:
-                await self._release_redis_lock(token)
-
-    async def _acquire_redis_lock(self) -> str | None:
-        if not self.redis:
-            return "no_redis"
-        token = str(uuid4())
-        acquired = await self.redis.set(
-            self.adapter.lock_key, token, nx=True, ex=self.adapter.lock_ttl
-        )
-        return token if acquired else None
+                    )
 
-    async def _release_redis_lock(self, token: str) -> None:
-        if not self.redis or token == "no_redis":
-            return
-        script = """
-        if redis.call('GET', KEYS[1]) == ARGV[1] then
-            return redis.call('DEL', KEYS[1])
-        end
-        return 0
-        """
-        await self.redis.eval(script, 1, self.adapter.lock_key, token)
+        async with asyncio.TaskGroup() as tg:
+            for task_id, ctx_or_result in prepared:
+                tg.create_task(poll_one(task_id, ctx_or_result))
+
+        # ========== 阶段 3：批量更新数据库（一个会话）==========
+        if outcomes:
+            next_due = await self.adapter.apply_poll_results(outcomes, redis_client=self.redis)
+            for task_id, next_poll_at in next_due.items():
+                self._queue.schedule(task_id, next_poll_at.timestamp())
+
+        # 全部在准备阶段被跳过（已取消/未到期）不算失败
+        return failures if prepared else 0
+
+    def get_stats(self) -> dict[str, Any]:
+        owned = self._leases.owned if self._leases else frozenset()
+        backoff: AdaptiveBackoff | None = getattr(self.adapter, "backoff", None)
+        return {
+            "queued": len(self._queue),
+            "in_flight": len(self._in_flight),
+            "partitions": self._queue.partitions,
+            "owned_partitions": sorted(owned),
+            "partitioned": self.partitioned,
+            "expected_durations": backoff.snapshot() if backoff else {},
+        }
 
 
 _task_poller: TaskPollerService | None = None
@@ -7,7 +7,6 @@ Usage Redis Streams consumer.
 from __future__ import annotations
 
 import asyncio
-import json
 import os
 import socket
 import time
@@ -25,6 +24,13 @@ from src.core.logger import logger
 from src.database.database import create_session
 from src.services.usage.events import UsageEvent, UsageEventType
 from src.services.usage.service import UsageService
+from src.services.usage.sharding import (
+    ShardLeaseManager,
+    all_stream_keys,
+    publish_shard_lag,
+    stream_key_for_shard,
+)
+from src.utils import json_codec
 
 
 def _consumer_name() -> str:
@@ -42,8 +48,8 @@ def _parse_body(value: Any) -> Any:
         return value
     if isinstance(value, str):
         try:
-            return json.loads(value)
-        except (json.JSONDecodeError, TypeError):
+            return json_codec.loads(value)
+        except (json_codec.JSONDecodeError, TypeError):
             # 解析失败，保留原字符串（可能已被截断）
             return value
     return value
@@ -96,18 +102,23 @@ async def ensure_usage_stream_group() -> None:
     redis_client = await get_redis_client(require_redis=False)
     if not redis_client:
         return
-    try:
-        await redis_client.xgroup_create(
-            config.usage_queue_stream_key,
-            config.usage_queue_stream_group,
-            id="0-0",
-            mkstream=True,
-        )
-        logger.info(f"[usage-queue] Created consumer group {config.usage_queue_stream_group}")
-    except ResponseError as exc:
-        if "BUSYGROUP" in str(exc):
-            return
-        raise
+    # 分片模式下每个分片 Stream 各自拥有同名消费者组
+    for stream_key in all_stream_keys():
+        try:
+            await redis_client.xgroup_create(
+                stream_key,
+                config.usage_queue_stream_group,
+                id="0-0",
+                mkstream=True,
+            )
+            logger.info(
+                f"[usage-queue] Created consumer group {config.usage_queue_stream_group} "
+                f"on {stream_key}"
+            )
+        except ResponseError as exc:
+            if "BUSYGROUP" in str(exc):
+                continue
+            raise
 
 
 class UsageQueueConsumer:
@@ -115,8 +126,14 @@ class UsageQueueConsumer:
 
     性能优化：
     - 缓存配置值避免重复属性访问
-    - STREAMING 事件使用 pipeline 批量 ACK
-    - 记录事件批量写入数据库
+    - 成功处理的消息在提交后用单条 XACK 批量确认
+    - 记录事件批量写入数据库（多行 INSERT ... ON CONFLICT，聚合增量单条 UPDATE）
+    - 吞吐（events/s）随 _log_metrics 周期输出
+
+    水平扩展：
+    - usage_queue_shards > 1 时事件按用户哈希分布到多个 Stream，消费者通过
+      ShardLeaseManager 租约独占部分分片，成员加入/离开时自动重新分配
+    - 所持分片的 lag 周期性上报（Prometheus + Redis），写入端据此施加背压
     """
 
     def __init__(self) -> None:
@@ -136,6 +153,15 @@ class UsageQueueConsumer:
         self._dlq_key = config.usage_queue_dlq_key
         self._dlq_maxlen = config.usage_queue_dlq_maxlen
         self._metrics_interval = config.usage_queue_metrics_interval_seconds
+        self._lag_refresh = config.usage_queue_lag_refresh_seconds
+        self._last_lag_refresh = 0.0
+        self._leases = ShardLeaseManager(self._consumer)
+        # 分片 -> (lag, pending)，由 _refresh_lag 更新
+        self._shard_lag: dict[int, tuple[int, int]] = {}
+        # 吞吐统计（自上次 _log_metrics 起）
+        self._processed_since_log = 0
+        self._batches_since_log = 0
+        self._metrics_window_start = time.monotonic()
 
     @staticmethod
     def _is_duplicate_key_error(exc: IntegrityError) -> bool:
@@ -160,6 +186,13 @@ class UsageQueueConsumer:
                 await self._task
             except asyncio.CancelledError:
                 pass
+        # 释放分片租约，其他消费者无需等待租约过期即可接管
+        try:
+            redis_client = await get_redis_client(require_redis=False)
+            if redis_client:
+                await self._leases.release_all(redis_client)
+        except Exception as exc:
+            logger.debug(f"[usage-queue] Release shard leases failed: {exc}")
         logger.info(f"[usage-queue] Consumer stopped: {self._consumer}")
 
     async def _run(self) -> None:
@@ -170,8 +203,10 @@ class UsageQueueConsumer:
                     await asyncio.sleep(1)
                     continue
 
+                await self._leases.rebalance(redis_client)
                 await self._maybe_claim_pending(redis_client)
                 await self._read_new(redis_client)
+                await self._refresh_lag(redis_client)
                 await self._log_metrics(redis_client)
             except asyncio.CancelledError:
                 break
@@ -187,37 +222,46 @@ class UsageQueueConsumer:
         if now - self._last_claim < self._claim_interval:
             return
         self._last_claim = now
-        try:
-            result = await redis_client.xautoclaim(
-                self._stream_key,
-                self._stream_group,
-                self._consumer,
-                min_idle_time=self._claim_idle_ms,
-                start_id="0-0",
-                count=self._batch_size,
-            )
-        except ResponseError as exc:
-            logger.warning(f"[usage-queue] XAUTOCLAIM failed: {exc}")
-            return
-        if not result:
-            return
-        _, messages = result[:2]
-        await self._process_messages(redis_client, messages)
+        # 只认领自己持有分片上的超时消息（包括前任持有者未确认的消息）
+        for stream_key in self._leases.owned_stream_keys():
+            try:
+                result = await redis_client.xautoclaim(
+                    stream_key,
+                    self._stream_group,
+                    self._consumer,
+                    min_idle_time=self._claim_idle_ms,
+                    start_id="0-0",
+                    count=self._batch_size,
+                )
+            except ResponseError as exc:
+                logger.warning(f"[usage-queue] XAUTOCLAIM failed: {stream_key} {exc}")
+                continue
+            if not result:
+                continue
+            _, messages = result[:2]
+            await self._process_messages(redis_client, messages, stream_key=stream_key)
 
     async def _read_new(self, redis_client: Any) -> None:
+        stream_keys = self._leases.owned_stream_keys()
+        if not stream_keys:
+            # 暂未分配到分片（成员数多于分片数或租约尚未过期），等待下一轮重新分配
+            await asyncio.sleep(self._block_ms / 1000)
+            return
         result = await redis_client.xreadgroup(
             groupname=self._stream_group,
             consumername=self._consumer,
-            streams={self._stream_key: ">"},
+            streams={key: ">" for key in stream_keys},
             count=self._batch_size,
             block=self._block_ms,
         )
         if not result:
             return
-        for _stream, messages in result:
-            await self._process_messages(redis_client, messages)
+        for stream, messages in result:
+            await self._process_messages(redis_client, messages, stream_key=stream)
 
-    async def _process_messages(self, redis_client: Any, messages: list) -> None:
+    async def _process_messages(
+        self, redis_client: Any, messages: list, *, stream_key: str | None = None
+    ) -> None:
         """批量处理消息，区分 STREAMING（状态更新）和其他事件（记录写入）"""
         if not messages:
             return
@@ -239,20 +283,26 @@ class UsageQueueConsumer:
 
         # 批量处理 STREAMING 事件（状态更新）
         if streaming_messages:
-            await self._process_streaming_batch(redis_client, streaming_messages)
+            await self._process_streaming_batch(
+                redis_client, streaming_messages, stream_key=stream_key
+            )
 
         # 批量处理记录事件
         if record_messages:
-            await self._process_record_batch(redis_client, record_messages)
+            await self._process_record_batch(redis_client, record_messages, stream_key=stream_key)
 
         # 处理解析失败的消息
         for message_id, fields, exc in failed_messages:
-            await self._handle_processing_error(redis_client, message_id, fields, exc)
+            await self._handle_processing_error(
+                redis_client, message_id, fields, exc, stream_key=stream_key
+            )
 
     async def _process_streaming_batch(
         self,
         redis_client: Any,
         messages: list[tuple[str, UsageEvent]],
+        *,
+        stream_key: str | None = None,
     ) -> None:
         """批量处理 STREAMING 事件（状态更新）"""
         success_ids: list[str] = []
@@ -262,19 +312,28 @@ class UsageQueueConsumer:
                 await self._apply_streaming_event(event)
                 success_ids.append(message_id)
             except Exception as exc:
-                await self._handle_processing_error(redis_client, message_id, {}, exc)
+                await self._handle_processing_error(
+                    redis_client, message_id, {}, exc, stream_key=stream_key
+                )
 
-        # 使用 pipeline 批量 ACK 成功处理的消息
-        if success_ids:
-            pipe = redis_client.pipeline()
-            for message_id in success_ids:
-                pipe.xack(self._stream_key, self._stream_group, message_id)
-            await pipe.execute()
+        await self._ack(redis_client, success_ids, stream_key=stream_key)
+
+    async def _ack(
+        self, redis_client: Any, message_ids: list[str], *, stream_key: str | None = None
+    ) -> None:
+        """单条 XACK 确认整批消息，并计入吞吐统计"""
+        if not message_ids:
+            return
+        await redis_client.xack(stream_key or self._stream_key, self._stream_group, *message_ids)
+        self._processed_since_log += len(message_ids)
+        self._batches_since_log += 1
 
     async def _process_record_batch(
         self,
         redis_client: Any,
         messages: list[tuple[str, dict[str, Any], UsageEvent]],
+        *,
+        stream_key: str | None = None,
     ) -> None:
         """批量处理记录类型的事件"""
         db = create_session()
@@ -288,14 +347,11 @@ class UsageQueueConsumer:
                 records.append(_event_to_record(event))
                 message_ids.append(message_id)
 
-            # 批量写入
+            # 批量写入（内部单次 commit，重复 request_id 由 ON CONFLICT 处理）
             await UsageService.record_usage_batch(db, records)
 
-            # 使用 pipeline 批量 ACK 提升性能
-            pipe = redis_client.pipeline()
-            for message_id in message_ids:
-                pipe.xack(self._stream_key, self._stream_group, message_id)
-            await pipe.execute()
+            # 提交成功后再确认整批消息
+            await self._ack(redis_client, message_ids, stream_key=stream_key)
 
             logger.debug(f"[usage-queue] Batch processed {len(records)} records")
 
@@ -325,17 +381,15 @@ class UsageQueueConsumer:
                         )
                         success_ids.append(message_id)
                     else:
-                        await self._handle_processing_error(redis_client, message_id, fields, ie)
+                        await self._handle_processing_error(
+                            redis_client, message_id, fields, ie, stream_key=stream_key
+                        )
                 except Exception as individual_exc:
                     await self._handle_processing_error(
-                        redis_client, message_id, fields, individual_exc
+                        redis_client, message_id, fields, individual_exc, stream_key=stream_key
                     )
             # 批量 ACK 成功处理的消息
-            if success_ids:
-                pipe = redis_client.pipeline()
-                for message_id in success_ids:
-                    pipe.xack(self._stream_key, self._stream_group, message_id)
-                await pipe.execute()
+            await self._ack(redis_client, success_ids, stream_key=stream_key)
         finally:
             db.close()
 
@@ -345,8 +399,11 @@ class UsageQueueConsumer:
         message_id: str,
         fields: dict[str, Any],
         error: Exception,
+        *,
+        stream_key: str | None = None,
     ) -> None:
-        retries = await self._get_delivery_count(redis_client, message_id)
+        stream_key = stream_key or self._stream_key
+        retries = await self._get_delivery_count(redis_client, message_id, stream_key=stream_key)
         if retries >= self._max_retries:
             try:
                 dlq_fields = dict(fields)
@@ -361,7 +418,7 @@ class UsageQueueConsumer:
                     )
                 else:
                     await redis_client.xadd(self._dlq_key, dlq_fields)
-                await redis_client.xack(self._stream_key, self._stream_group, message_id)
+                await redis_client.xack(stream_key, self._stream_group, message_id)
                 logger.error(
                     f"[usage-queue] Message moved to DLQ after {retries} attempts: {message_id}"
                 )
@@ -372,10 +429,12 @@ class UsageQueueConsumer:
                 f"[usage-queue] Processing failed (attempt {retries}): {message_id} error={error}"
             )
 
-    async def _get_delivery_count(self, redis_client: Any, message_id: str) -> int:
+    async def _get_delivery_count(
+        self, redis_client: Any, message_id: str, *, stream_key: str | None = None
+    ) -> int:
         try:
             pending = await redis_client.xpending_range(
-                self._stream_key,
+                stream_key or self._stream_key,
                 self._stream_group,
                 min=message_id,
                 max=message_id,
@@ -485,26 +544,64 @@ class UsageQueueConsumer:
         else:
             await self._apply_record_event(event)
 
-    async def _log_metrics(self, redis_client: Any) -> None:
+    async def _refresh_lag(self, redis_client: Any, *, force: bool = False) -> None:
+        """读取所持分片的 lag/pending 并上报（Prometheus gauge + 写入端背压依据）"""
         now = time.time()
-        if now - self._last_metrics_log < self._metrics_interval:
+        if not force and now - self._last_lag_refresh < self._lag_refresh:
             return
-        self._last_metrics_log = now
-        try:
-            # 使用 XINFO GROUPS 获取更准确的 lag（未处理消息数）
-            groups_info = await redis_client.xinfo_groups(self._stream_key)
-            lag = 0
-            pending_count = 0
-            for group in groups_info:
+        self._last_lag_refresh = now
+
+        shard_lag: dict[int, tuple[int, int]] = {}
+        for shard in sorted(self._leases.owned):
+            try:
+                # 使用 XINFO GROUPS 获取更准确的 lag（未处理消息数）
+                groups_info = await redis_client.xinfo_groups(stream_key_for_shard(shard))
+            except Exception as exc:
+                logger.debug(f"[usage-queue] XINFO GROUPS failed: shard={shard} {exc}")
+                continue
+            for group in groups_info or []:
                 if isinstance(group, dict) and group.get("name") == self._stream_group:
-                    lag = group.get("lag", 0) or 0
-                    pending_count = group.get("pending", 0) or 0
+                    shard_lag[shard] = (
+                        int(group.get("lag", 0) or 0),
+                        int(group.get("pending", 0) or 0),
+                    )
                     break
-            # lag=未读消息数, pending=已读但未ACK的消息数
-            if lag > 0 or pending_count > 0:
-                logger.info(f"[usage-queue] lag={lag} pending={pending_count}")
+        self._shard_lag = shard_lag
+        if not shard_lag:
+            return
+        try:
+            await publish_shard_lag(redis_client, {s: v[0] for s, v in shard_lag.items()})
         except Exception as exc:
-            logger.debug(f"[usage-queue] metrics log failed: {exc}")
+            logger.debug(f"[usage-queue] Publish shard lag failed: {exc}")
+
+    async def _log_metrics(self, redis_client: Any) -> None:
+        now = time.time()
+        if now - self._last_metrics_log < self._metrics_interval:
+            return
+        self._last_metrics_log = now
+
+        # 吞吐：自上次输出以来确认的事件数 / 经过时间
+        monotonic_now = time.monotonic()
+        elapsed = monotonic_now - self._metrics_window_start
+        processed = self._processed_since_log
+        batches = self._batches_since_log
+        throughput = processed / elapsed if elapsed > 0 else 0.0
+        self._metrics_window_start = monotonic_now
+        self._processed_since_log = 0
+        self._batches_since_log = 0
+
+        # 所持分片合计（_refresh_lag 周期更新）
+        lag = sum(v[0] for v in self._shard_lag.values())
+        pending_count = sum(v[1] for v in self._shard_lag.values())
+
+        # lag=未读消息数, pending=已读但未ACK的消息数
+        if lag > 0 or pending_count > 0 or processed > 0:
+            logger.info(
+                f"[usage-queue] lag={lag} pending={pending_count} "
+                f"throughput={throughput:.1f} events/s "
+                f"(processed={processed}, batches={batches}, "
+                f"shards={sorted(self._leases.owned)})"
+            )
 
 
 _consumer_instance: UsageQueueConsumer | None = None
@@ -4,12 +4,13 @@ Usage 事件定义与序列化工具（用于 Redis Streams）
 
 from __future__ import annotations
 
-import json
 import time
 from dataclasses import dataclass
 from enum import Enum
 from typing import Any
 
+from src.utils import json_codec
+
 USAGE_EVENT_VERSION = 1
 
 
@@ -53,7 +54,7 @@ class UsageEvent:
             "timestamp_ms": self.timestamp_ms,
             "data": sanitize_payload(self.data),
         }
-        return {"payload": json.dumps(payload, ensure_ascii=False)}
+        return {"payload": json_codec.dumps(payload)}
 
     @classmethod
     def from_stream_fields(cls, fields: dict[str, Any]) -> UsageEvent:
@@ -62,7 +63,7 @@ class UsageEvent:
             raise ValueError("Missing payload field in usage event")
         if isinstance(raw, bytes):
             raw = raw.decode("utf-8", errors="ignore")
-        payload = json.loads(raw)
+        payload = json_codec.loads(raw)
         event_type = UsageEventType(payload["type"])
         return cls(
             event_type=event_type,
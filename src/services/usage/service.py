@@ -25,9 +25,11 @@ from src.models.database import (
     User,
     UserRole,
 )
+from src.services.auth.credential_cache import invalidate_exhausted
 from src.services.billing.token_normalization import normalize_input_tokens_for_billing
 from src.services.model.cost import ModelCostService
 from src.services.system.config import SystemConfigService
+from src.services.system.stats_rollup import capture_usage, rollup_usage
 from src.services.usage.error_classifier import classify_error
 
 
@@ -975,7 +977,9 @@ class UsageService:
             usage.billing_status = "settled"
             usage.finalized_at = datetime.now(timezone.utc)
 
+        fact = capture_usage(usage_params)
         db.commit()  # 立即提交事务，释放数据库锁
+        rollup_usage([fact])
         return usage
 
     @classmethod
@@ -1073,9 +1077,16 @@ class UsageService:
                 f"request_id {request_id} 已存在，更新现有记录 "
                 f"(status: {existing_usage.status} -> {status})"
             )
+            # 统计增量只在首次结算时折叠，重复写入同一 request_id 不重复计数
+            fact = (
+                None
+                if existing_usage.billing_status in ("settled", "void")
+                else capture_usage(usage_params, existing_usage.created_at)
+            )
             cls._update_existing_usage(existing_usage, usage_params, target_model)
             usage = existing_usage
         else:
+            fact = capture_usage(usage_params)
             usage = Usage(**usage_params)
             db.add(usage)
 
@@ -1094,8 +1105,11 @@ class UsageService:
         from src.models.database import User as UserModel
 
         # 更新用户使用量（独立 Key 不计入创建者的使用记录）
+        # RETURNING 累加后的额度，提交后据此判断是否耗尽（认证缓存失效）
+        user_totals: list[Any] = []
+        key_totals: list[Any] = []
         if user and not (api_key and api_key.is_standalone):
-            db.execute(
+            user_totals = db.execute(
                 update(UserModel)
                 .where(UserModel.id == user.id)
                 .values(
@@ -1103,12 +1117,13 @@ class UsageService:
                     total_usd=UserModel.total_usd + total_cost,
                     updated_at=sql_func.now(),
                 )
-            )
+                .returning(UserModel.id, UserModel.used_usd, UserModel.quota_usd)
+            ).all()
 
         # 更新 API 密钥使用量
         if api_key:
             if api_key.is_standalone:
-                db.execute(
+                key_totals = db.execute(
                     update(ApiKeyModel)
                     .where(ApiKeyModel.id == api_key.id)
                     .values(
@@ -1118,7 +1133,12 @@ class UsageService:
                         last_used_at=sql_func.now(),
                         updated_at=sql_func.now(),
                     )
-                )
+                    .returning(
+                        ApiKeyModel.id,
+                        ApiKeyModel.balance_used_usd,
+                        ApiKeyModel.current_balance_usd,
+                    )
+                ).all()
             else:
                 db.execute(
                     update(ApiKeyModel)
@@ -1160,6 +1180,8 @@ class UsageService:
             db.rollback()
             raise
 
+        rollup_usage([fact])
+        invalidate_exhausted(users=user_totals, keys=key_totals)
         return usage
 
     @classmethod
@@ -1310,9 +1332,11 @@ class UsageService:
             existing_usage.billing_status = "settled"
             existing_usage.finalized_at = now
 
+            fact = capture_usage(usage_params, existing_usage.created_at)
             cls._update_existing_usage(existing_usage, usage_params, target_model)
             usage = existing_usage
         else:
+            fact = capture_usage(usage_params)
             usage = Usage(**usage_params)
             db.add(usage)
 
@@ -1331,8 +1355,11 @@ class UsageService:
         from src.models.database import User as UserModel
 
         # 更新用户使用量（独立 Key 不计入创建者）
+        # RETURNING 累加后的额度，提交后据此判断是否耗尽（认证缓存失效）
+        user_totals: list[Any] = []
+        key_totals: list[Any] = []
         if user and not (api_key and api_key.is_standalone):
-            db.execute(
+            user_totals = db.execute(
                 update(UserModel)
                 .where(UserModel.id == user.id)
                 .values(
@@ -1340,12 +1367,13 @@ class UsageService:
                     total_usd=UserModel.total_usd + total_cost,
                     updated_at=sql_func.now(),
                 )
-            )
+                .returning(UserModel.id, UserModel.used_usd, UserModel.quota_usd)
+            ).all()
 
         # 更新 API 密钥使用量
         if api_key:
             if api_key.is_standalone:
-                db.execute(
+                key_totals = db.execute(
                     update(ApiKeyModel)
                     .where(ApiKeyModel.id == api_key.id)
                     .values(
@@ -1355,7 +1383,12 @@ class UsageService:
                         last_used_at=sql_func.now(),
                         updated_at=sql_func.now(),
                     )
-                )
+                    .returning(
+                        ApiKeyModel.id,
+                        ApiKeyModel.balance_used_usd,
+                        ApiKeyModel.current_balance_usd,
+                    )
+                ).all()
             else:
                 db.execute(
                     update(ApiKeyModel)
@@ -1408,8 +1441,39 @@ class UsageService:
             db.rollback()
             raise
 
+        rollup_usage([fact])
+        invalidate_exhausted(users=user_totals, keys=key_totals)
         return usage
 
+    @staticmethod
+    def _bulk_insert_usage_rows(db: Session, rows: list[dict[str, Any]]) -> set[str] | None:
+        """多行写入 Usage：INSERT ... ON CONFLICT (request_id) DO NOTHING RETURNING request_id
+
+        Returns:
+            实际插入的 request_id 集合（冲突行不在其中）；
+            当前方言不支持 ON CONFLICT 时返回 None，由调用方回退到 ORM 逐条 add
+        """
+        if not rows:
+            return set()
+
+        dialect_name = getattr(getattr(db.get_bind(), "dialect", None), "name", None)
+        if dialect_name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        elif dialect_name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            return None
+
+        table = Usage.__table__
+        stmt = (
+            dialect_insert(table)
+            .on_conflict_do_nothing(index_elements=[table.c.request_id])
+            .returning(table.c.request_id)
+        )
+        # executemany + RETURNING 由 SQLAlchemy 的 insertmanyvalues 合并为多行 VALUES
+        result = db.execute(stmt, rows)
+        return {row[0] for row in result}
+
     @classmethod
     async def record_usage_batch(
         cls,
@@ -1419,8 +1483,9 @@ class UsageService:
         """批量记录使用量（高性能版，单次提交多条记录）
 
         此方法针对高并发场景优化，特点：
-        - 批量插入 Usage 记录，减少 commit 次数
-        - 聚合更新用户/API Key 统计（按 user_id/api_key_id 分组）
+        - 新记录通过一条多行 INSERT ... ON CONFLICT (request_id) DO NOTHING 写入，
+          并发写入导致的冲突行改走更新路径，不再依赖逐条 IntegrityError 判重
+        - 聚合更新用户/API Key 统计（按 user_id/api_key_id 分组，每张表一条 UPDATE）
         - 聚合更新 GlobalModel 和 Provider 统计
         - 支持更新已存在的 pending/streaming 状态记录
 
@@ -1453,6 +1518,7 @@ class UsageService:
             existing_records = db.query(Usage).filter(Usage.request_id.in_(request_ids)).all()
             existing_usages = {u.request_id: u for u in existing_records}
 
+            seen_insert_ids: set[str] = set()
             for record in records:
                 req_id = record.get("request_id")
                 if req_id and req_id in existing_usages:
@@ -1475,7 +1541,12 @@ class UsageService:
                             getattr(existing_usage, "status", None),
                             billing_status,
                         )
+                elif req_id in seen_insert_ids:
+                    # 同一批次内重复投递（如 XAUTOCLAIM 重新认领），只保留第一条
+                    logger.debug("批量记录预过滤: 跳过批次内重复的 request_id={}", req_id)
                 else:
+                    if req_id:
+                        seen_insert_ids.add(req_id)
                     records_to_insert.append(record)
         else:
             records_to_insert = list(records)
@@ -1492,6 +1563,7 @@ class UsageService:
         )
         model_counts: dict[str, int] = defaultdict(int)  # model -> count
         provider_costs: dict[str, float] = defaultdict(float)  # provider_id -> cost
+        rollup_facts: list[Any] = []  # 提交后折叠进统计增量汇总
 
         # 合并所有需要处理的记录（用于预取 user/api_key）
         all_records = records_to_insert + records_to_update
@@ -1595,6 +1667,51 @@ class UsageService:
         finalized_at = datetime.now(timezone.utc)
         terminal_statuses = {"completed", "failed", "cancelled"}
 
+        def accumulate(
+            record: dict[str, Any],
+            usage_params: dict[str, Any],
+            total_cost: float,
+            user: User | None,
+            api_key: ApiKey | None,
+            created_at: datetime | None = None,
+        ) -> None:
+            """聚合统计（按 model/provider/user/api_key 分组，最后每张表一条 UPDATE）"""
+            rollup_facts.append(capture_usage(usage_params, created_at))
+            model_name = record.get("model") or "unknown"
+            model_counts[model_name] += 1
+
+            provider_id = record.get("provider_id")
+            if provider_id:
+                provider_costs[provider_id] += usage_params.get("actual_total_cost_usd", 0)
+
+            # 用户统计（独立 Key 不计入创建者）
+            if user and not (api_key and api_key.is_standalone):
+                user_costs[str(user.id)] += total_cost
+
+            # API Key 统计
+            if api_key:
+                key_id = str(api_key.id)
+                apikey_stats[key_id]["requests"] += 1
+                apikey_stats[key_id]["cost"] += total_cost
+                apikey_stats[key_id]["is_standalone"] = api_key.is_standalone
+
+        def settle_existing(
+            existing_usage: Usage,
+            record: dict[str, Any],
+            usage_params: dict[str, Any],
+        ) -> None:
+            # 更新已存在的 Usage 记录
+            cls._update_existing_usage(existing_usage, usage_params, record.get("target_model"))
+            # 结算标记：pending -> settled（幂等闸门由 prefilter 控制）
+            if (
+                usage_params.get("status") in terminal_statuses
+                and getattr(existing_usage, "billing_status", None) == "pending"
+            ):
+                existing_usage.billing_status = "settled"
+                if getattr(existing_usage, "finalized_at", None) is None:
+                    existing_usage.finalized_at = finalized_at
+            usages.append(existing_usage)
+
         # 1. 处理需要更新的记录
         for i, (record, request_id, params) in enumerate(update_params_list):
             try:
@@ -1604,91 +1721,78 @@ class UsageService:
 
                 # existing_usage 已在构建阶段验证存在
                 existing_usage = existing_usages[request_id]
-                user = params.user
-                api_key = params.api_key
-
-                # 更新已存在的 Usage 记录
-                cls._update_existing_usage(existing_usage, usage_params, record.get("target_model"))
-                # 结算标记：pending -> settled（幂等闸门由 prefilter 控制）
-                if (
-                    usage_params.get("status") in terminal_statuses
-                    and getattr(existing_usage, "billing_status", None) == "pending"
-                ):
-                    existing_usage.billing_status = "settled"
-                    if getattr(existing_usage, "finalized_at", None) is None:
-                        existing_usage.finalized_at = finalized_at
-                usages.append(existing_usage)
+                settle_existing(existing_usage, record, usage_params)
                 updated_count += 1
-
-                # 聚合统计
-                model_name = record.get("model") or "unknown"
-                model_counts[model_name] += 1
-
-                provider_id = record.get("provider_id")
-                if provider_id:
-                    actual_cost = usage_params.get("actual_total_cost_usd", 0)
-                    provider_costs[provider_id] += actual_cost
-
-                if user and not (api_key and api_key.is_standalone):
-                    user_costs[str(user.id)] += total_cost
-
-                if api_key:
-                    key_id = str(api_key.id)
-                    apikey_stats[key_id]["requests"] += 1
-                    apikey_stats[key_id]["cost"] += total_cost
-                    apikey_stats[key_id]["is_standalone"] = api_key.is_standalone
+                accumulate(
+                    record,
+                    usage_params,
+                    total_cost,
+                    params.user,
+                    params.api_key,
+                    existing_usage.created_at,
+                )
 
             except Exception as e:
                 skipped_count += 1
                 logger.warning("批量记录中更新失败: {}, request_id={}", e, request_id)
                 continue
 
-        # 2. 处理需要新建的记录
+        # 2. 处理需要新建的记录：先构建行数据，再一次性多行写入
+        insert_rows: list[tuple[dict[str, Any], str, dict[str, Any], float, UsageRecordParams]] = []
         for i, (record, request_id, params) in enumerate(insert_params_list):
             try:
                 usage_params, total_cost, exc = insert_results[i]
                 if exc:
                     raise exc
 
-                user = params.user
-                api_key = params.api_key
-
-                # 创建 Usage 记录
-                usage = Usage(**usage_params)
-                # 新建记录默认 billing_status=settled，但补齐 finalized_at，便于审计与幂等判断
-                if usage_params.get("status") in terminal_statuses:
-                    if getattr(usage, "billing_status", None) in (None, "pending"):
-                        usage.billing_status = "settled"
-                    if getattr(usage, "finalized_at", None) is None:
-                        usage.finalized_at = finalized_at
-                db.add(usage)
-                usages.append(usage)
-
-                # 聚合统计
-                model_name = record.get("model") or "unknown"
-                model_counts[model_name] += 1
-
-                provider_id = record.get("provider_id")
-                if provider_id:
-                    actual_cost = usage_params.get("actual_total_cost_usd", 0)
-                    provider_costs[provider_id] += actual_cost
-
-                # 用户统计（独立 Key 不计入创建者）
-                if user and not (api_key and api_key.is_standalone):
-                    user_costs[str(user.id)] += total_cost
-
-                # API Key 统计
-                if api_key:
-                    key_id = str(api_key.id)
-                    apikey_stats[key_id]["requests"] += 1
-                    apikey_stats[key_id]["cost"] += total_cost
-                    apikey_stats[key_id]["is_standalone"] = api_key.is_standalone
+                row = dict(usage_params)
+                row["id"] = str(uuid.uuid4())
+                # 新建记录默认 billing_status=settled，终态补齐 finalized_at，便于审计与幂等判断
+                row["billing_status"] = "settled"
+                row["finalized_at"] = (
+                    finalized_at if usage_params.get("status") in terminal_statuses else None
+                )
+                insert_rows.append((record, request_id, row, total_cost, params))
 
             except Exception as e:
                 skipped_count += 1
                 logger.warning("批量记录中跳过无效记录: {}, request_id={}", e, request_id)
                 continue
 
+        inserted_ids = cls._bulk_insert_usage_rows(db, [row for _, _, row, _, _ in insert_rows])
+        conflicts: list[tuple[dict[str, Any], str, dict[str, Any], float, UsageRecordParams]] = []
+        for record, request_id, row, total_cost, params in insert_rows:
+            if inserted_ids is None:
+                # 方言不支持 ON CONFLICT：回退到 ORM 逐条 add
+                usage = Usage(**row)
+                db.add(usage)
+            elif request_id in inserted_ids:
+                usage = Usage(**row)
+            else:
+                # 预查询之后被并发写入（如 pending 记录），改走更新路径
+                conflicts.append((record, request_id, row, total_cost, params))
+                continue
+            usages.append(usage)
+            accumulate(record, row, total_cost, params.user, params.api_key)
+
+        if conflicts:
+            conflict_usages = {
+                u.request_id: u
+                for u in db.query(Usage)
+                .filter(Usage.request_id.in_([request_id for _, request_id, *_ in conflicts]))
+                .all()
+            }
+            for record, request_id, row, total_cost, params in conflicts:
+                existing_usage = conflict_usages.get(request_id)
+                if existing_usage is None or existing_usage.billing_status != "pending":
+                    logger.debug("批量记录: 跳过已存在的 request_id={}", request_id)
+                    continue
+                settle_existing(existing_usage, record, row)
+                updated_count += 1
+                accumulate(
+                    record, row, total_cost, params.user, params.api_key, existing_usage.created_at
+                )
+
         # 统计跳过的记录，失败率超过 10% 时提升日志级别
         if skipped_count > 0:
             skip_ratio = skipped_count / total_count if total_count > 0 else 0
@@ -1702,63 +1806,80 @@ class UsageService:
             else:
                 logger.warning("批量记录部分失败: {}/{} 条记录被跳过", skipped_count, total_count)
 
-        # 批量更新 GlobalModel 使用计数
-        for model_name, count in model_counts.items():
+        # 聚合增量：每张表一条 UPDATE（CASE 按主键分派增量）
+        from sqlalchemy import case
+        from sqlalchemy import func as sql_func
+
+        if model_counts:
             db.execute(
                 update(GlobalModel)
-                .where(GlobalModel.name == model_name)
-                .values(usage_count=GlobalModel.usage_count + count)
+                .where(GlobalModel.name.in_(list(model_counts)))
+                .values(
+                    usage_count=GlobalModel.usage_count
+                    + case(model_counts, value=GlobalModel.name, else_=0)
+                )
+                .execution_options(synchronize_session=False)
             )
 
-        # 批量更新 Provider 月度使用量
-        for provider_id, cost in provider_costs.items():
-            if cost > 0:
-                db.execute(
-                    update(Provider)
-                    .where(Provider.id == provider_id)
-                    .values(monthly_used_usd=Provider.monthly_used_usd + cost)
+        # Provider 月度使用量
+        provider_costs = {k: v for k, v in provider_costs.items() if v > 0}
+        if provider_costs:
+            db.execute(
+                update(Provider)
+                .where(Provider.id.in_(list(provider_costs)))
+                .values(
+                    monthly_used_usd=Provider.monthly_used_usd
+                    + case(provider_costs, value=Provider.id, else_=0.0)
                 )
+                .execution_options(synchronize_session=False)
+            )
 
-        # 批量更新用户使用量
-        from sqlalchemy import func as sql_func
-
-        for user_id, cost in user_costs.items():
-            if cost > 0:
-                db.execute(
-                    update(UserModel)
-                    .where(UserModel.id == user_id)
-                    .values(
-                        used_usd=UserModel.used_usd + cost,
-                        total_usd=UserModel.total_usd + cost,
-                        updated_at=sql_func.now(),
-                    )
+        # 用户使用量
+        user_costs = {k: v for k, v in user_costs.items() if v > 0}
+        user_totals: list[Any] = []
+        key_totals: list[Any] = []
+        if user_costs:
+            user_delta = case(user_costs, value=UserModel.id, else_=0.0)
+            user_totals = db.execute(
+                update(UserModel)
+                .where(UserModel.id.in_(list(user_costs)))
+                .values(
+                    used_usd=UserModel.used_usd + user_delta,
+                    total_usd=UserModel.total_usd + user_delta,
+                    updated_at=sql_func.now(),
                 )
-
-        # 批量更新 API Key 统计
-        for key_id, stats in apikey_stats.items():
-            if stats["is_standalone"]:
-                db.execute(
-                    update(ApiKeyModel)
-                    .where(ApiKeyModel.id == key_id)
-                    .values(
-                        total_requests=ApiKeyModel.total_requests + stats["requests"],
-                        total_cost_usd=ApiKeyModel.total_cost_usd + stats["cost"],
-                        balance_used_usd=ApiKeyModel.balance_used_usd + stats["cost"],
-                        last_used_at=sql_func.now(),
-                        updated_at=sql_func.now(),
-                    )
+                .returning(UserModel.id, UserModel.used_usd, UserModel.quota_usd)
+                .execution_options(synchronize_session=False)
+            ).all()
+
+        # API Key 统计（独立 Key 同时累加 balance_used_usd）
+        if apikey_stats:
+            key_requests = {k: v["requests"] for k, v in apikey_stats.items()}
+            key_costs = {k: v["cost"] for k, v in apikey_stats.items()}
+            standalone_costs = {k: v["cost"] for k, v in apikey_stats.items() if v["is_standalone"]}
+            values: dict[str, Any] = {
+                "total_requests": ApiKeyModel.total_requests
+                + case(key_requests, value=ApiKeyModel.id, else_=0),
+                "total_cost_usd": ApiKeyModel.total_cost_usd
+                + case(key_costs, value=ApiKeyModel.id, else_=0.0),
+                "last_used_at": sql_func.now(),
+                "updated_at": sql_func.now(),
+            }
+            if standalone_costs:
+                values["balance_used_usd"] = ApiKeyModel.balance_used_usd + case(
+                    standalone_costs, value=ApiKeyModel.id, else_=0.0
                 )
-            else:
-                db.execute(
-                    update(ApiKeyModel)
-                    .where(ApiKeyModel.id == key_id)
-                    .values(
-                        total_requests=ApiKeyModel.total_requests + stats["requests"],
-                        total_cost_usd=ApiKeyModel.total_cost_usd + stats["cost"],
-                        last_used_at=sql_func.now(),
-                        updated_at=sql_func.now(),
-                    )
+            key_totals = db.execute(
+                update(ApiKeyModel)
+                .where(ApiKeyModel.id.in_(list(apikey_stats)))
+                .values(**values)
+                .returning(
+                    ApiKeyModel.id,
+                    ApiKeyModel.balance_used_usd,
+                    ApiKeyModel.current_balance_usd,
                 )
+                .execution_options(synchronize_session=False)
+            ).all()
 
         # 单次提交所有更改
         try:
@@ -1773,6 +1894,8 @@ class UsageService:
             db.rollback()
             raise
 
+        rollup_usage(rollup_facts)
+        invalidate_exhausted(users=user_totals, keys=key_totals)
         return usages
 
     @staticmethod
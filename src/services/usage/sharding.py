@@ -0,0 +1,249 @@
+"""
+Usage 队列分片、消费者租约与背压
+
+- 按 user_id（或 api_key_id）哈希把 usage 事件写入 N 个 Redis Stream，
+  同一用户的事件总落在同一分片，避免多个消费者并发更新同一批用户行
+- 消费者通过心跳登记到成员表（ZSET），用 rendezvous hash 计算自己应持有的分片，
+  再以带 TTL 的租约键独占这些分片；成员加入/离开时各消费者自动释放/接管分片
+- 消费者周期性上报所持分片的 lag（Prometheus gauge + Redis hash），
+  写入端据此施加背压：先丢弃 headers/bodies，超过更高阈值才丢弃事件
+"""
+
+from __future__ import annotations
+
+import hashlib
+import time
+import zlib
+from enum import IntEnum
+from typing import Any
+
+from src.config.settings import config
+from src.core.logger import logger
+from src.core.metrics import usage_queue_owned_shards, usage_queue_stream_lag
+
+# 续租或获取租约：当前持有者续期，无人持有时获取
+_ACQUIRE_LEASE_SCRIPT = """
+local cur = redis.call('GET', KEYS[1])
+if cur == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+if not cur then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+return 0
+"""
+
+# 仅释放自己持有的租约
+_RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+# 写入端读取分片 lag 的本地缓存时间（秒），避免每个事件都访问 Redis
+_LAG_CACHE_SECONDS = 1.0
+
+
+class Backpressure(IntEnum):
+    NONE = 0
+    DEGRADE = 1  # 丢弃 headers/bodies，只保留计费所需字段
+    DROP = 2  # 丢弃事件
+
+
+def shard_count() -> int:
+    return max(1, int(config.usage_queue_shards or 1))
+
+
+def stream_key_for_shard(shard: int) -> str:
+    """分片对应的 Stream 键
+
+    分片 0 始终沿用原有的单一 Stream 键：分片数从 1 调大后，旧 Stream 中未消费和
+    已投递未确认的事件仍由分片 0 的持有者读取并 XAUTOCLAIM，不会被遗弃。
+    """
+    base = config.usage_queue_stream_key
+    if shard == 0:
+        return base
+    return f"{base}:{shard}"
+
+
+def all_stream_keys() -> list[str]:
+    return [stream_key_for_shard(i) for i in range(shard_count())]
+
+
+def shard_for(user_id: str | None, api_key_id: str | None) -> int:
+    """按配置的分片键计算事件所属分片（crc32，跨进程稳定）"""
+    n = shard_count()
+    if n == 1:
+        return 0
+    if config.usage_queue_shard_by == "api_key_id":
+        key = api_key_id or user_id
+    else:
+        key = user_id or api_key_id
+    return zlib.crc32(str(key or "").encode("utf-8")) % n
+
+
+def _rendezvous_owner(shard: int, members: list[str]) -> str | None:
+    """rendezvous hash：成员变化时只有属于变化成员的分片会迁移"""
+    best: str | None = None
+    best_score = -1
+    for member in members:
+        digest = hashlib.blake2b(f"{member}|{shard}".encode(), digest_size=8).digest()
+        score = int.from_bytes(digest, "big")
+        if score > best_score:
+            best, best_score = member, score
+    return best
+
+
+def _lag_hash_key() -> str:
+    return f"{config.usage_queue_stream_key}:lag"
+
+
+class ShardLeaseManager:
+    """消费者分片租约管理
+
+    不分片（shards=1）时所有消费者共享同一 Stream，由消费者组分发消息，不需要租约。
+    """
+
+    def __init__(self, consumer_name: str) -> None:
+        self.consumer = consumer_name
+        # 不分片时无需租约，直接持有唯一的 Stream
+        self.owned: set[int] = {0} if shard_count() == 1 else set()
+        self._last_rebalance = 0.0
+
+    @property
+    def _members_key(self) -> str:
+        return f"{config.usage_queue_stream_key}:members"
+
+    def _lease_key(self, shard: int) -> str:
+        return f"{config.usage_queue_stream_key}:lease:{shard}"
+
+    def owned_stream_keys(self) -> list[str]:
+        return [stream_key_for_shard(s) for s in sorted(self.owned)]
+
+    async def rebalance(self, redis_client: Any, *, force: bool = False) -> set[int]:
+        """心跳 + 按当前成员重新计算并获取/续期/释放租约（按 TTL/3 的间隔执行）"""
+        n = shard_count()
+        if n == 1:
+            self.owned = {0}
+            return self.owned
+
+        ttl = max(1.0, float(config.usage_queue_lease_ttl_seconds))
+        now = time.time()
+        if not force and now - self._last_rebalance < ttl / 3:
+            return self.owned
+        self._last_rebalance = now
+
+        pipe = redis_client.pipeline()
+        pipe.zadd(self._members_key, {self.consumer: now})
+        pipe.zremrangebyscore(self._members_key, "-inf", now - ttl)
+        pipe.zrange(self._members_key, 0, -1)
+        results = await pipe.execute()
+        members = sorted(str(m) for m in (results[-1] or []))
+        if self.consumer not in members:
+            members.append(self.consumer)
+
+        desired = {s for s in range(n) if _rendezvous_owner(s, members) == self.consumer}
+        ttl_ms = int(ttl * 1000)
+
+        for shard in self.owned - desired:
+            await redis_client.eval(_RELEASE_LEASE_SCRIPT, 1, self._lease_key(shard), self.consumer)
+
+        acquired: set[int] = set()
+        for shard in desired:
+            ok = await redis_client.eval(
+                _ACQUIRE_LEASE_SCRIPT, 1, self._lease_key(shard), self.consumer, ttl_ms
+            )
+            if ok:
+                acquired.add(shard)
+
+        if acquired != self.owned:
+            logger.info(
+                f"[usage-queue] Shard leases rebalanced: members={len(members)} "
+                f"owned={sorted(acquired)}"
+            )
+        self.owned = acquired
+        usage_queue_owned_shards.set(len(acquired))
+        return acquired
+
+    async def release_all(self, redis_client: Any) -> None:
+        """优雅退出：释放全部租约并注销成员，其他消费者下一轮即可接管"""
+        if shard_count() == 1:
+            self.owned = set()
+            return
+        for shard in self.owned:
+            try:
+                await redis_client.eval(
+                    _RELEASE_LEASE_SCRIPT, 1, self._lease_key(shard), self.consumer
+                )
+            except Exception as exc:
+                logger.debug(f"[usage-queue] Release lease failed: shard={shard} {exc}")
+        try:
+            await redis_client.zrem(self._members_key, self.consumer)
+        except Exception as exc:
+            logger.debug(f"[usage-queue] Unregister member failed: {exc}")
+        self.owned = set()
+        usage_queue_owned_shards.set(0)
+
+
+async def publish_shard_lag(redis_client: Any, lags: dict[int, int]) -> None:
+    """上报分片 lag：Prometheus gauge + Redis hash（供所有写入进程读取）"""
+    if not lags:
+        return
+    for shard, lag in lags.items():
+        usage_queue_stream_lag.labels(str(shard)).set(lag)
+    key = _lag_hash_key()
+    pipe = redis_client.pipeline()
+    pipe.hset(key, mapping={str(s): int(v) for s, v in lags.items()})
+    # 消费者全部下线时 lag 信息自然过期，写入端不会被陈旧数据长期限流
+    pipe.expire(key, max(60, int(config.usage_queue_lag_refresh_seconds * 6)))
+    await pipe.execute()
+
+
+class _LagCache:
+    __slots__ = ("values", "fetched_at")
+
+    def __init__(self) -> None:
+        self.values: dict[int, int] = {}
+        self.fetched_at = 0.0
+
+
+_lag_cache = _LagCache()
+
+
+async def get_backpressure(redis_client: Any, shard: int) -> Backpressure:
+    """根据分片 lag 计算写入端背压级别（阈值均为 0 时不访问 Redis）"""
+    degrade_lag = int(config.usage_queue_backpressure_lag or 0)
+    drop_lag = int(config.usage_queue_drop_lag or 0)
+    if degrade_lag <= 0 and drop_lag <= 0:
+        return Backpressure.NONE
+
+    now = time.monotonic()
+    if now - _lag_cache.fetched_at >= _LAG_CACHE_SECONDS:
+        _lag_cache.fetched_at = now
+        try:
+            raw = await redis_client.hgetall(_lag_hash_key()) or {}
+            _lag_cache.values = {int(k): int(v) for k, v in raw.items()}
+        except Exception as exc:
+            logger.debug(f"[usage-queue] Read shard lag failed: {exc}")
+
+    lag = _lag_cache.values.get(shard, 0)
+    if drop_lag > 0 and lag >= drop_lag:
+        return Backpressure.DROP
+    if degrade_lag > 0 and lag >= degrade_lag:
+        return Backpressure.DEGRADE
+    return Backpressure.NONE
+
+
+__all__ = [
+    "Backpressure",
+    "ShardLeaseManager",
+    "all_stream_keys",
+    "get_backpressure",
+    "publish_shard_lag",
+    "shard_count",
+    "shard_for",
+    "stream_key_for_shard",
+]
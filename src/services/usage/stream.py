@@ -5,8 +5,9 @@
 
 from __future__ import annotations
 
+import codecs
 import json
-import re
+from collections import deque
 from collections.abc import AsyncIterator
 from typing import Any
 
@@ -14,11 +15,73 @@ from sqlalchemy.orm import Session
 
 from src.api.handlers.base.parsers import get_parser_for_format
 from src.api.handlers.base.response_parser import StreamStats
+from src.config.settings import config
 from src.core.exceptions import EmptyStreamException
 from src.core.logger import logger
 from src.database.database import create_session
 from src.models.database import ApiKey, User
 from src.services.usage.service import UsageService
+from src.services.usage.tokenizer import encoding_for_model, estimate_tokens, get_encoder
+
+# 解析失败时记录的原始响应字符数上限
+RAW_RESPONSE_MAX_CHARS = 10000
+# 响应块超出上限后保留的末尾块数
+TAIL_CHUNKS = 64
+
+
+class CappedTextBuffer:
+    """
+    追加式文本缓冲（内存有界）
+
+    保留前 max_chars 个字符和最后约 tail_chars 个字符，中间部分只计数；
+    追加为 O(1) 摊还，getvalue() 时才拼接。
+    """
+
+    __slots__ = ("max_chars", "tail_chars", "length", "_head", "_head_len", "_tail", "_tail_len")
+
+    def __init__(self, max_chars: int, tail_chars: int = 0, initial: str = "") -> None:
+        self.max_chars = max(0, max_chars)
+        self.tail_chars = max(0, tail_chars)
+        self.length = 0
+        self._head: list[str] = []
+        self._head_len = 0
+        self._tail: deque[str] = deque()
+        self._tail_len = 0
+        self.append(initial)
+
+    def __len__(self) -> int:
+        return self.length
+
+    @property
+    def omitted(self) -> int:
+        """未保留的字符数"""
+        return self.length - self._head_len - min(self._tail_len, self.tail_chars)
+
+    def append(self, text: str) -> None:
+        if not text:
+            return
+        self.length += len(text)
+        room = self.max_chars - self._head_len
+        if room > 0:
+            part = text[:room]
+            self._head.append(part)
+            self._head_len += len(part)
+            text = text[room:]
+            if not text:
+                return
+        if not self.tail_chars:
+            return
+        self._tail.append(text)
+        self._tail_len += len(text)
+        while self._tail_len - len(self._tail[0]) >= self.tail_chars:
+            self._tail_len -= len(self._tail.popleft())
+
+    def getvalue(self) -> str:
+        head = "".join(self._head)
+        if not self._tail:
+            return head
+        tail = "".join(self._tail)
+        return head + tail[-self.tail_chars :]
 
 
 class StreamUsageTracker:
@@ -88,14 +151,16 @@ class StreamUsageTracker:
         self.endpoint_api_format = endpoint_api_format
         self.has_format_conversion = has_format_conversion
         self.response_parser = get_parser_for_format(self.api_format)
-        self.stream_stats = StreamStats()  # 解析器统计信息
+        # 解析器统计信息（输出文本由 _content 有界累积，不在 stats 中重复收集）
+        self.stream_stats = StreamStats(collect_text=False)
 
         # Token计数
         self.input_tokens = 0
         self.output_tokens = 0
         self.cache_creation_input_tokens = 0
         self.cache_read_input_tokens = 0
-        self.accumulated_content = ""
+        # 输出文本只保留头部和末尾（超出上限的部分仅计数和滚动估算 token）
+        self._content = self._new_text_buffer()
 
         # 完整响应跟踪（仅用于内部统计，不记录到数据库）
         self.complete_response = {
@@ -108,8 +173,13 @@ class StreamUsageTracker:
             "stop_sequence": None,
             "usage": {},
         }
-        self.response_chunks = []  # 保存所有原始响应块
-        self.raw_chunks = []  # 保存所有原始字节流（用于错误诊断）
+        self.response_chunks = []  # 保存原始响应块（最多 stream_capture_max_chunks 个）
+        self._tail_chunks: deque[dict[str, Any]] = deque(maxlen=TAIL_CHUNKS)
+        self.total_chunk_count = 0
+        self._block_texts: dict[int, CappedTextBuffer] = {}  # content 块文本增量
+        self.raw_chunks = []  # 保存原始字节流的开头部分（用于错误诊断）
+        self.raw_chunk_count = 0
+        self._raw_captured_bytes = 0
 
         # 时间跟踪
         self.start_time = None
@@ -119,8 +189,8 @@ class StreamUsageTracker:
         self.response_headers = {}
 
         # SSE解析缓冲区
-        self.buffer = b""  # 用于处理不完整的字节流
-        self.current_line = ""  # 用于累积SSE行
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._line_parts: list[str] = []  # 尚未遇到换行符的行片段
         self.sse_event_buffer = {
             "event": None,
             "data": [],
@@ -133,6 +203,43 @@ class StreamUsageTracker:
         self.error_message = None  # 错误消息(如果有)
         self.attempt_id = attempt_id
 
+    @staticmethod
+    def _new_text_buffer(initial: str = "") -> CappedTextBuffer:
+        return CappedTextBuffer(
+            config.stream_capture_max_chars, config.stream_capture_tail_chars, initial
+        )
+
+    @property
+    def accumulated_content(self) -> str:
+        """已捕获的输出文本（超出上限时为头部 + 末尾）"""
+        return self._content.getvalue()
+
+    def _capture_raw_chunk(self, chunk: bytes | str) -> None:
+        """保存原始块的开头部分，只用于解析失败时的诊断"""
+        self.raw_chunk_count += 1
+        # UTF-8 每字符最多 4 字节，保证解码后足够 RAW_RESPONSE_MAX_CHARS 个字符
+        if self._raw_captured_bytes < RAW_RESPONSE_MAX_CHARS * 4:
+            self.raw_chunks.append(chunk)
+            self._raw_captured_bytes += len(chunk)
+
+    def _capture_response_chunk(self, data: dict[str, Any]) -> None:
+        """保存已解析的响应块；超出上限后只保留末尾若干块"""
+        self.total_chunk_count += 1
+        if len(self.response_chunks) < config.stream_capture_max_chunks:
+            self.response_chunks.append(data)
+        else:
+            self._tail_chunks.append(data)
+
+    def _captured_chunks(self) -> list[dict[str, Any]]:
+        return self.response_chunks + list(self._tail_chunks)
+
+    def _finalize_complete_response(self) -> None:
+        """把增量累积的文本写回 complete_response 的 content 块"""
+        content = self.complete_response["content"]
+        for index, buffer in self._block_texts.items():
+            if index < len(content):
+                content[index]["text"] = buffer.getvalue()
+
     def set_error_status(self, status_code: int, error_message: str) -> None:
         """
         设置错误状态
@@ -187,11 +294,13 @@ class StreamUsageTracker:
                 current_block = self.complete_response["content"][index]
 
                 if delta.get("type") == "text_delta":
-                    # 文本增量
+                    # 文本增量（追加到缓冲，结束时再写回，避免反复拼接字符串）
                     if current_block.get("type") == "text":
-                        current_block["text"] = current_block.get("text", "") + delta.get(
-                            "text", ""
-                        )
+                        buffer = self._block_texts.get(index)
+                        if buffer is None:
+                            buffer = self._new_text_buffer(current_block.get("text", ""))
+                            self._block_texts[index] = buffer
+                        buffer.append(delta.get("text", ""))
                 elif delta.get("type") == "input_json_delta":
                     # 工具调用输入增量
                     if current_block.get("type") == "tool_use":
@@ -275,7 +384,7 @@ class StreamUsageTracker:
             data = json.loads(data_str)
 
             if isinstance(data, dict):
-                self.response_chunks.append(data)
+                self._capture_response_chunk(data)
                 try:
                     self._update_complete_response(data)
                 except Exception as update_error:
@@ -357,7 +466,7 @@ class StreamUsageTracker:
 
         # 更新完整响应（如果有数据）
         if chunk.data:
-            self.response_chunks.append(chunk.data)
+            self._capture_response_chunk(chunk.data)
             try:
                 self._update_complete_response(chunk.data)
             except Exception as update_error:
@@ -369,72 +478,42 @@ class StreamUsageTracker:
         """
         解析流式响应块（处理原始字节流）
 
+        使用增量 UTF-8 解码器处理跨块的多字节字符；未完成的行以片段列表保存，
+        遇到换行符时才拼接，避免长行反复拼接和重新切分。
+
         Args:
             chunk: 原始字节流
 
         Returns:
             (累积的内容文本, 使用信息)
         """
-        total_content = ""
-        final_usage = None
-
-        # 将新chunk添加到缓冲区
-        # 确保 chunk 是字节类型
-        if isinstance(chunk, str):
-            chunk = chunk.encode("utf-8")
-        self.buffer += chunk
-
-        # 尝试解码并处理完整的行
-        try:
-            # 尝试解码整个缓冲区
-            text = self.buffer.decode("utf-8")
-            self.buffer = b""  # 清空缓冲区
-
-            # 将文本添加到当前行
-            self.current_line += text
-
-            # 按换行符分割，处理完整的行
-            lines = self.current_line.split("\n")
-
-            # 最后一个可能是不完整的行，保留它
-            self.current_line = lines[-1]
-
-            # 处理完整的行
-            for line in lines[:-1]:
-                line = line.rstrip("\r")
-                content, usage = self.parse_sse_line(line)
-                if content:
-                    total_content += content
-                if usage:
-                    final_usage = usage
+        text = chunk if isinstance(chunk, str) else self._decoder.decode(chunk)
+        if not text:
+            return None, None
+        if "\n" not in text:
+            self._line_parts.append(text)
+            return None, None
 
-        except UnicodeDecodeError:
-            # 如果解码失败，说明缓冲区中有不完整的UTF-8序列
-            # 尝试找到最后一个完整的字符边界
-            for i in range(len(self.buffer) - 1, max(0, len(self.buffer) - 4), -1):
-                try:
-                    text = self.buffer[:i].decode("utf-8")
-                    # 成功解码，处理这部分
-                    remaining = self.buffer[i:]
-                    self.buffer = remaining  # 保留未解码的部分
-
-                    # 处理解码的文本
-                    self.current_line += text
-                    lines = self.current_line.split("\n")
-                    self.current_line = lines[-1]
-
-                    for line in lines[:-1]:
-                        line = line.rstrip("\r")
-                        content, usage = self.parse_sse_line(line)
-                        if content:
-                            total_content += content
-                        if usage:
-                            final_usage = usage
-                    break
-                except UnicodeDecodeError:
-                    continue
+        lines = text.split("\n")
+        if self._line_parts:
+            self._line_parts.append(lines[0])
+            lines[0] = "".join(self._line_parts)
+            self._line_parts = []
+        # 最后一个可能是不完整的行，保留它
+        remainder = lines.pop()
+        if remainder:
+            self._line_parts.append(remainder)
+
+        contents: list[str] = []
+        final_usage = None
+        for line in lines:
+            content, usage = self.parse_sse_line(line.rstrip("\r"))
+            if content:
+                contents.append(content)
+            if usage:
+                final_usage = usage
 
-        return total_content if total_content else None, final_usage
+        return "".join(contents) or None, final_usage
 
     async def track_stream(
         self,
@@ -476,7 +555,7 @@ class StreamUsageTracker:
             async for chunk in stream:
                 chunk_count += 1
                 # 保存原始字节流（用于错误诊断）
-                self.raw_chunks.append(chunk)
+                self._capture_raw_chunk(chunk)
 
                 # 第一个 chunk 收到时，记录 TTFB 时间点（但先不更新数据库，避免阻塞）
                 if chunk_count == 1:
@@ -512,9 +591,9 @@ class StreamUsageTracker:
                 content, usage = self.parse_stream_chunk(chunk)
 
                 if content:
-                    self.accumulated_content += content
+                    self._content.append(content)
                     # 实时估算输出tokens
-                    self.output_tokens = max(1, len(self.accumulated_content) // 4)
+                    self.output_tokens = max(1, len(self._content) // 4)
 
                 if usage:
                     # 如果响应中包含准确的usage信息，使用它
@@ -542,7 +621,7 @@ class StreamUsageTracker:
 
             logger.debug(
                 f"ID:{self.request_id} | 流式响应结束 | 共处理{chunk_count}个chunks | "
-                f"累积内容长度:{len(self.accumulated_content)} | 输出tokens:{self.output_tokens}"
+                f"累积内容长度:{len(self._content)} | 输出tokens:{self.output_tokens}"
             )
 
             # 检查是否收到了有效数据
@@ -616,8 +695,10 @@ class StreamUsageTracker:
                 response_time_ms = None
 
             # 如果没有准确的token计数，使用估算值
-            if self.output_tokens == 0 and self.accumulated_content:
-                self.output_tokens = max(1, len(self.accumulated_content) // 4)
+            if self.output_tokens == 0 and self._content:
+                self.output_tokens = max(1, len(self._content) // 4)
+
+            self._finalize_complete_response()
 
             # 使用完整的响应体（包含所有信息，包括工具调用）
             # 更新最终的usage信息
@@ -636,34 +717,35 @@ class StreamUsageTracker:
             if self.response_chunks:
                 # 正常情况：成功解析的SSE JSON响应
                 response_body = {
-                    "chunks": self.response_chunks,
+                    "chunks": self._captured_chunks(),
                     "metadata": {
                         "stream": True,
-                        "total_chunks": len(self.response_chunks),
-                        "content_length": len(self.accumulated_content),
+                        "total_chunks": self.total_chunk_count,
+                        "content_length": len(self._content),
                         "response_time_ms": response_time_ms,
                     },
                 }
+                omitted_chunks = self.total_chunk_count - len(response_body["chunks"])
+                if omitted_chunks > 0:
+                    response_body["metadata"]["omitted_chunks"] = omitted_chunks
             else:
                 # 错误情况：无法解析为JSON（如HTML错误页面）
                 # 尝试解码原始字节流为文本
-                raw_response_text = ""
-                for chunk in self.raw_chunks:
-                    try:
-                        if isinstance(chunk, bytes):
-                            raw_response_text += chunk.decode("utf-8", errors="replace")
-                        else:
-                            raw_response_text += str(chunk)
-                    except Exception:
-                        pass
+                raw_decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                raw_parts = [
+                    raw_decoder.decode(chunk) if isinstance(chunk, bytes) else str(chunk)
+                    for chunk in self.raw_chunks
+                ]
+                raw_response_text = "".join(raw_parts) + raw_decoder.decode(b"", final=True)
 
                 response_body = {
                     "chunks": [],
-                    "raw_response": raw_response_text[:10000],  # 限制大小，避免过大
+                    # 限制大小，避免过大
+                    "raw_response": raw_response_text[:RAW_RESPONSE_MAX_CHARS],
                     "metadata": {
                         "stream": True,
                         "total_chunks": 0,
-                        "raw_chunks_count": len(self.raw_chunks),
+                        "raw_chunks_count": self.raw_chunk_count,
                         "content_length": len(raw_response_text),
                         "response_time_ms": response_time_ms,
                         "parse_error": "Failed to parse response as SSE JSON format",
@@ -744,7 +826,7 @@ class StreamUsageTracker:
                 response_time_ms=response_time_ms,
                 status_code=self.status_code,  # 使用实际的状态码
                 error_message=self.error_message,  # 使用实际的错误消息
-                metadata={"stream": True, "content_length": len(self.accumulated_content)},
+                metadata={"stream": True, "content_length": len(self._content)},
                 request_body=self.request_data if hasattr(self, "request_data") else None,
                 request_headers=self.request_headers,
                 provider_request_headers=self.provider_request_headers,
@@ -857,25 +939,16 @@ class EnhancedStreamUsageTracker(StreamUsageTracker):
         )
         # 用于更准确的token计算
         self._init_tokenizer()
+        self._content_tokens = 0
         # 继承父类的SSE解析缓冲区
         # 这些已经在父类中初始化了
 
     def _init_tokenizer(self) -> None:
-        """初始化分词器（如果可用）"""
-        try:
-            # 尝试导入tiktoken用于更准确的token计算
-            import tiktoken
-
-            # 根据模型选择合适的编码
-            if "gpt-4" in self.model:
-                self.tokenizer = tiktoken.get_encoding("cl100k_base")
-            elif "gpt-3.5" in self.model:
-                self.tokenizer = tiktoken.get_encoding("cl100k_base")
-            else:
-                # Claude或其他模型，使用近似方法
-                self.tokenizer = None
-        except ImportError:
-            logger.debug("tiktoken not available, using estimation")
+        """初始化分词器（共享分词服务预加载的编码器）"""
+        # Claude或其他模型使用近似方法
+        if "gpt-4" in self.model or "gpt-3.5" in self.model:
+            self.tokenizer = get_encoder(encoding_for_model(self.model))
+        else:
             self.tokenizer = None
 
     def count_tokens(self, text: str) -> int:
@@ -890,17 +963,12 @@ class EnhancedStreamUsageTracker(StreamUsageTracker):
         """
         if self.tokenizer:
             try:
-                return len(self.tokenizer.encode(text))
+                return len(self.tokenizer.encode(text, disallowed_special=()))
             except Exception as e:
                 logger.warning(f"Token encoding failed: {e}")
 
-        # 回退到估算方法
-        # 中文字符通常是2个token，英文单词约1.3个token
-        chinese_chars = len(re.findall(r"[\u4e00-\u9fff]", text))
-        english_words = len(re.findall(r"\b\w+\b", text))
-
-        estimated_tokens = chinese_chars * 2 + english_words * 1.3
-        return max(1, int(estimated_tokens))
+        # 回退到估算方法：中文字符通常是2个token，英文单词约1.3个token
+        return max(1, estimate_tokens(text))
 
     def estimate_input_tokens(self, messages: list) -> int:
         """
@@ -965,7 +1033,7 @@ class EnhancedStreamUsageTracker(StreamUsageTracker):
             async for chunk in stream:
                 chunk_count += 1
                 # 保存原始字节流（用于错误诊断）
-                self.raw_chunks.append(chunk)
+                self._capture_raw_chunk(chunk)
 
                 # 第一个 chunk 收到时，记录 TTFB 时间点（但先不更新数据库，避免阻塞）
                 if chunk_count == 1:
@@ -1001,9 +1069,10 @@ class EnhancedStreamUsageTracker(StreamUsageTracker):
                 content, usage = self.parse_stream_chunk(chunk)
 
                 if content:
-                    self.accumulated_content += content
-                    # 使用更准确的方法计算输出tokens
-                    self.output_tokens = self.count_tokens(self.accumulated_content)
+                    self._content.append(content)
+                    # 只对新增内容计数并滚动累加，不再重复分词整段输出
+                    self._content_tokens += self.count_tokens(content)
+                    self.output_tokens = self._content_tokens
 
                 if usage:
                     # 如果响应中包含准确的usage信息，优先使用
@@ -1022,7 +1091,7 @@ class EnhancedStreamUsageTracker(StreamUsageTracker):
 
             logger.debug(
                 f"ID:{self.request_id} | 流式响应结束 | 共处理{chunk_count}个chunks | "
-                f"累积内容长度:{len(self.accumulated_content)} | 输出tokens:{self.output_tokens}"
+                f"累积内容长度:{len(self._content)} | 输出tokens:{self.output_tokens}"
             )
 
             # 检查是否收到了有效数据
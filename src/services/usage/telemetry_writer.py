@@ -12,7 +12,14 @@ from src.api.handlers.base.base_handler import MessageTelemetry
 from src.clients.redis_client import get_redis_client
 from src.config.settings import config
 from src.core.logger import logger
+from src.core.metrics import usage_queue_backpressure_total
 from src.services.usage.events import UsageEventType, build_usage_event
+from src.services.usage.sharding import (
+    Backpressure,
+    get_backpressure,
+    shard_for,
+    stream_key_for_shard,
+)
 
 
 class TelemetryWriter(ABC):
@@ -107,23 +114,38 @@ class QueueTelemetryWriter(TelemetryWriter):
         if not redis_client:
             raise RuntimeError("Redis unavailable for usage queue")
 
-        data = self._build_event_data(**kwargs)
+        shard = shard_for(self.user_id, self.api_key_id)
+        # 背压：消费者积压超过阈值时先丢弃 headers/bodies，超过丢弃阈值才丢弃事件
+        level = await get_backpressure(redis_client, shard)
+        if level == Backpressure.DROP:
+            usage_queue_backpressure_total.labels("dropped").inc()
+            logger.warning(
+                f"[usage-queue] Backpressure: dropping usage event {self.request_id} "
+                f"(shard={shard})"
+            )
+            return
+
+        degraded = level == Backpressure.DEGRADE
+        if degraded:
+            usage_queue_backpressure_total.labels("degraded").inc()
+        data = self._build_event_data(degraded=degraded, **kwargs)
         event = build_usage_event(
             event_type=event_type,
             request_id=self.request_id,
             data=data,
         )
+        stream_key = stream_key_for_shard(shard)
         maxlen = config.usage_queue_stream_maxlen
         try:
             if maxlen > 0:
                 await redis_client.xadd(
-                    config.usage_queue_stream_key,
+                    stream_key,
                     event.to_stream_fields(),
                     maxlen=maxlen,
                     approximate=True,
                 )
             else:
-                await redis_client.xadd(config.usage_queue_stream_key, event.to_stream_fields())
+                await redis_client.xadd(stream_key, event.to_stream_fields())
         except Exception as exc:
             logger.error(f"[usage-queue] XADD failed: {exc}")
             raise
@@ -173,7 +195,7 @@ class QueueTelemetryWriter(TelemetryWriter):
             + f"\n... (truncated {kind} body, original size: {len(body_str)} bytes)"
         )
 
-    def _build_event_data(self, **kwargs: Any) -> dict[str, Any]:
+    def _build_event_data(self, *, degraded: bool = False, **kwargs: Any) -> dict[str, Any]:
         # 必需字段
         data: dict[str, Any] = {
             "request_id": self.request_id,
@@ -246,6 +268,10 @@ class QueueTelemetryWriter(TelemetryWriter):
         if kwargs.get("metadata"):
             data["metadata"] = kwargs["metadata"]
 
+        # 背压降级时只保留计费所需字段
+        if degraded:
+            return data
+
         # Optional: Headers (masked)
         if self.include_headers:
             if kwargs.get("request_headers"):
@@ -0,0 +1,279 @@
+"""
+共享分词服务（Token 计数）
+
+原先 Token 计数分散在 TiktokenCounterPlugin / EnhancedStreamUsageTracker / TokenCounter 和
+流遥测的兜底估算中，各自懒加载编码器、各自估算，大段 prompt 直接在事件循环上同步分词。
+
+- 编码器预加载：gunicorn --preload 下由 when_ready 在 gc.freeze() 之前调用 preload_encoders()，
+  编码器表进入永久代并随 fork 共享；未走 gunicorn 时 lifespan 在线程池中预加载
+- 模型 -> 编码名解析带缓存（精确匹配，其次最长前缀），不再每次线性扫描前缀表
+- 结果缓存：文本按内容哈希缓存计数；消息列表按"前缀链式哈希"缓存累计计数，
+  多轮对话只对新增的尾部消息分词
+- 超过 TOKENIZER_OFFLOAD_CHARS 的输入放到进程池（spawn，子进程自行预加载编码器）执行，
+  任务函数在只依赖 tiktoken 的 src.utils.tiktoken_worker 中，子进程不导入应用；
+  事件循环只等待结果；TOKENIZER_POOL_SIZE=0 时退化为线程池
+- 编码器不可用（未安装 tiktoken 或编码文件无法下载）时统一使用 estimate_tokens() 估算
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+from collections.abc import Callable, Sequence
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Any
+
+from src.core.cache_utils import SyncLRUCache
+from src.core.logger import logger
+from src.utils import tiktoken_worker
+from src.utils.conversation_fingerprint import fingerprint_messages
+from src.utils.tiktoken_worker import encode_len, estimate_tokens, get_encoder, message_tokens
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - 依赖缺失时只估算
+    tiktoken = None
+
+TOKENIZER_PRELOAD_ENCODINGS = [
+    name.strip()
+    for name in os.getenv("TOKENIZER_PRELOAD_ENCODINGS", "cl100k_base,o200k_base").split(",")
+    if name.strip()
+]
+TOKENIZER_CACHE_SIZE = int(os.getenv("TOKENIZER_CACHE_SIZE", "4096"))
+TOKENIZER_OFFLOAD_CHARS = int(os.getenv("TOKENIZER_OFFLOAD_CHARS", "32768"))
+TOKENIZER_POOL_SIZE = int(os.getenv("TOKENIZER_POOL_SIZE", "2"))
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# 模型编码映射（精确匹配优先，其次最长前缀）
+MODEL_ENCODINGS: dict[str, str] = {
+    # GPT-4 系列
+    "gpt-4": "cl100k_base",
+    "gpt-4-32k": "cl100k_base",
+    "gpt-4-turbo": "cl100k_base",
+    "gpt-4-turbo-preview": "cl100k_base",
+    "gpt-4o": "o200k_base",
+    "gpt-4o-mini": "o200k_base",
+    # GPT-3.5 系列
+    "gpt-3.5-turbo": "cl100k_base",
+    "gpt-3.5-turbo-16k": "cl100k_base",
+    # 旧模型
+    "text-davinci-003": "p50k_base",
+    "text-davinci-002": "p50k_base",
+    "code-davinci-002": "p50k_base",
+    # Embeddings
+    "text-embedding-ada-002": "cl100k_base",
+    "text-embedding-3-small": "cl100k_base",
+    "text-embedding-3-large": "cl100k_base",
+}
+_PREFIXES_LONGEST_FIRST = sorted(MODEL_ENCODINGS, key=len, reverse=True)
+
+# 短文本分词很便宜，不值得占用缓存
+_MIN_CACHED_CHARS = 256
+
+
+@lru_cache(maxsize=1024)
+def encoding_for_model(model: str | None) -> str:
+    """解析模型使用的编码名（结果缓存）"""
+    if not model:
+        return DEFAULT_ENCODING
+    if model in MODEL_ENCODINGS:
+        return MODEL_ENCODINGS[model]
+    for prefix in _PREFIXES_LONGEST_FIRST:
+        if model.startswith(prefix):
+            return MODEL_ENCODINGS[prefix]
+    if tiktoken is not None:
+        try:
+            return tiktoken.encoding_name_for_model(model)
+        except Exception:
+            pass
+    return DEFAULT_ENCODING
+
+
+def preload_encoders(names: Sequence[str] | None = None) -> list[str]:
+    """预加载编码器，返回可用的编码名"""
+    return tiktoken_worker.preload_encoders(
+        names if names is not None else TOKENIZER_PRELOAD_ENCODINGS
+    )
+
+
+def count_text_sync(text: str, model: str | None = None) -> int:
+    """同步计数（不走缓存与进程池，供小文本和同步调用方使用）"""
+    if not text:
+        return 0
+    return encode_len(get_encoder(encoding_for_model(model)))(text)
+
+
+def _message_size(message: Any) -> int:
+    if not isinstance(message, dict):
+        return 0
+    content = message.get("content")
+    if isinstance(content, str):
+        return len(content)
+    if isinstance(content, list):
+        return sum(len(item.get("text") or "") for item in content if isinstance(item, dict))
+    return 0
+
+
+class TokenizerService:
+    """Token 计数入口：结果缓存 + 大输入卸载"""
+
+    def __init__(
+        self,
+        cache_size: int = TOKENIZER_CACHE_SIZE,
+        offload_chars: int = TOKENIZER_OFFLOAD_CHARS,
+        pool_size: int = TOKENIZER_POOL_SIZE,
+    ) -> None:
+        self._cache = SyncLRUCache(max_size=cache_size, ttl=3600)
+        self.offload_chars = offload_chars
+        self.pool_size = pool_size
+        self._pool: ProcessPoolExecutor | None = None
+        self._pool_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.offloaded = 0
+
+    # ---------- 卸载 ----------
+
+    def _executor(self) -> Executor | None:
+        """进程池（按需创建）；未启用时返回 None，由 run_in_executor 使用默认线程池"""
+        if self.pool_size <= 0:
+            return None
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.pool_size,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=tiktoken_worker.pool_init,
+                    initargs=(list(TOKENIZER_PRELOAD_ENCODINGS),),
+                )
+            return self._pool
+
+    async def _offload(self, func: Callable[..., Any], *args: Any) -> Any:
+        self.offloaded += 1
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._executor(), func, *args)
+        except BrokenProcessPool:
+            logger.warning("[Tokenizer] 分词进程池异常，改用线程池")
+            self.shutdown()
+            self.pool_size = 0
+            return await loop.run_in_executor(None, func, *args)
+
+    # ---------- 计数 ----------
+
+    async def count_text(self, text: str, model: str | None = None) -> int:
+        if not text:
+            return 0
+        encoding_name = encoding_for_model(model)
+        key = None
+        if len(text) >= _MIN_CACHED_CHARS:
+            digest = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16)
+            key = ("t", encoding_name, digest.digest())
+            cached = self._cache.get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        if len(text) >= self.offload_chars:
+            result = await self._offload(tiktoken_worker.count_text, encoding_name, text)
+        else:
+            result = encode_len(get_encoder(encoding_name))(text)
+        if key is not None:
+            self._cache.set(key, result)
+        return result
+
+    async def count_messages(
+        self,
+        messages: Sequence[Any],
+        model: str | None = None,
+        *,
+        message_overhead: int = 3,
+        reply_overhead: int = 3,
+    ) -> int:
+        """消息列表计数；按前缀链式哈希缓存累计值，只对未缓存的尾部消息分词"""
+        if not messages:
+            return reply_overhead
+        encoding_name = encoding_for_model(model)
+
+        # 会话指纹链：keys[i] 为前 i+1 条消息的前缀摘要，缓存值为其累计 Token 数
+        keys = fingerprint_messages(
+            messages, namespace=f"m|{encoding_name}|{message_overhead}"
+        ).chain
+
+        start, base = 0, 0
+        for i in range(len(keys) - 1, -1, -1):
+            cached = self._cache.get(keys[i])
+            if cached is not None:
+                start, base = i + 1, cached
+                break
+        if start:
+            self.hits += 1
+        if start == len(messages):
+            return base + reply_overhead
+        self.misses += 1
+
+        tail = list(messages[start:])
+        if sum(_message_size(m) for m in tail) >= self.offload_chars:
+            counts = await self._offload(
+                tiktoken_worker.count_messages, encoding_name, tail, message_overhead
+            )
+        else:
+            counts = tiktoken_worker.count_messages(encoding_name, tail, message_overhead)
+
+        running = base
+        for key, count in zip(keys[start:], counts):
+            running += count
+            self._cache.set(key, running)
+        return running + reply_overhead
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "encoders_loaded": tiktoken_worker.loaded_encoders(),
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "offloaded": self.offloaded,
+            "pool_size": self.pool_size,
+        }
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+
+_tokenizer: TokenizerService | None = None
+
+
+def get_tokenizer() -> TokenizerService:
+    global _tokenizer
+    if _tokenizer is None:
+        _tokenizer = TokenizerService()
+    return _tokenizer
+
+
+def shutdown_tokenizer() -> None:
+    if _tokenizer is not None:
+        _tokenizer.shutdown()
+
+
+__all__ = [
+    "DEFAULT_ENCODING",
+    "MODEL_ENCODINGS",
+    "TokenizerService",
+    "count_text_sync",
+    "encoding_for_model",
+    "estimate_tokens",
+    "get_encoder",
+    "get_tokenizer",
+    "message_tokens",
+    "preload_encoders",
+    "shutdown_tokenizer",
+]
@@ -1,3 +1,14 @@
-from .timeout import AsyncTimeoutError, run_with_timeout, with_timeout
+from __future__ import annotations
+
+from typing import Any
 
 __all__ = ["with_timeout", "run_with_timeout", "AsyncTimeoutError"]
+
+
+def __getattr__(name: str) -> Any:
+    # 按需导入：进程池子进程只导入本包下无依赖的模块（如 tiktoken_worker），不连带加载日志等应用模块
+    if name in __all__:
+        from . import timeout
+
+        return getattr(timeout, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
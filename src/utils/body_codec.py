@@ -0,0 +1,211 @@
+"""
+使用记录 body 的分段与压缩编码
+
+body 压缩维护任务在进程池（spawn）中调用 compress_rows()，子进程需要导入任务函数所在的
+模块。此模块只依赖标准库、zstandard（可选）与 json_codec，子进程不会连带导入数据库和
+应用配置；src.services.system.body_store 复用这里的分段 / 段编码函数。
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import threading
+from collections.abc import Iterator, Mapping, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from src.utils import json_codec
+from src.utils.compression import compress_json_text
+
+try:
+    import zstandard as _zstd
+except ImportError:
+    _zstd = None
+
+MANIFEST_VERSION = 1
+# 整体作为一个段的顶层字段
+BLOCK_KEYS = frozenset(
+    {"system", "tools", "instructions", "systemInstruction", "system_instruction"}
+)
+# 逐元素分段的顶层列表字段
+LIST_KEYS = frozenset({"messages", "contents", "input"})
+
+ZSTD_LEVEL = 9
+GZIP_LEVEL = 6
+
+# (最新字典 ID, 字典字节)
+Dictionary = tuple[int, bytes]
+
+
+@dataclass(slots=True)
+class EncodedSegment:
+    codec: str
+    data: bytes
+    raw_size: int
+    refs: int = 1
+
+
+# (id, request_body 文本, response_body 文本)
+BodyRow = tuple[str, str | None, str | None]
+# (id, request_body_compressed, response_body_compressed, 原始字节数, request_body_ref 文本)
+CompressedRow = tuple[str, bytes | None, bytes | None, int, str | None]
+Segments = dict[str, EncodedSegment]
+
+
+def zstd_available() -> bool:
+    return _zstd is not None
+
+
+# ---------- 分段 / 还原 ----------
+
+
+def segment_hash(raw: bytes) -> str:
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def split_request_body(body: Any) -> tuple[dict[str, Any], dict[str, bytes]] | None:
+    """拆分请求体为 (清单, {哈希: 段 JSON 字节})，没有可分段字段时返回 None"""
+    if not isinstance(body, dict):
+        return None
+    rest: dict[str, Any] = {}
+    refs: dict[str, Any] = {}
+    segments: dict[str, bytes] = {}
+
+    def add(value: Any) -> str:
+        raw = json_codec.dumpb(value)
+        digest = segment_hash(raw)
+        segments[digest] = raw
+        return digest
+
+    for key, value in body.items():
+        if key in LIST_KEYS and isinstance(value, list) and value:
+            refs[key] = [add(item) for item in value]
+        elif key in BLOCK_KEYS and value is not None:
+            refs[key] = add(value)
+        else:
+            rest[key] = value
+    if not refs:
+        return None
+    manifest = {"v": MANIFEST_VERSION, "keys": list(body), "body": rest, "segments": refs}
+    return manifest, segments
+
+
+def manifest_hashes(manifest: Mapping[str, Any]) -> Iterator[str]:
+    for ref in (manifest.get("segments") or {}).values():
+        if isinstance(ref, list):
+            yield from ref
+        else:
+            yield ref
+
+
+def assemble_request_body(manifest: Mapping[str, Any], segments: Mapping[str, bytes]) -> Any:
+    """按清单还原请求体（保持原顶层字段顺序），段缺失时抛出 KeyError"""
+    rest = manifest.get("body") or {}
+    refs = manifest.get("segments") or {}
+    body: dict[str, Any] = {}
+    for key in manifest.get("keys") or [*rest, *refs]:
+        if key in refs:
+            ref = refs[key]
+            if isinstance(ref, list):
+                body[key] = [json_codec.loads(segments[h]) for h in ref]
+            else:
+                body[key] = json_codec.loads(segments[ref])
+        elif key in rest:
+            body[key] = rest[key]
+    return body
+
+
+# ---------- 段编码 ----------
+
+# zstd 压缩/解压器不是线程安全的，按线程缓存
+_local = threading.local()
+
+
+def zstd_codec(kind: str, dictionary: Dictionary | None) -> Any:
+    """当前线程的 zstd 压缩器（kind="compressors"）或解压器（kind="decompressors"）"""
+    cache = getattr(_local, kind, None)
+    if cache is None:
+        cache = {}
+        setattr(_local, kind, cache)
+    key = dictionary[0] if dictionary else 0
+    codec = cache.get(key)
+    if codec is None:
+        dict_data = _zstd.ZstdCompressionDict(dictionary[1]) if dictionary else None
+        if kind == "compressors":
+            codec = _zstd.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data)
+        else:
+            codec = _zstd.ZstdDecompressor(dict_data=dict_data)
+        cache[key] = codec
+    return codec
+
+
+def encode_segment(raw: bytes, dictionary: Dictionary | None = None) -> tuple[str, bytes]:
+    """压缩段，返回 (codec, data)"""
+    if _zstd is not None:
+        data = zstd_codec("compressors", dictionary).compress(raw)
+        return (f"zstd:{dictionary[0]}" if dictionary else "zstd"), data
+    return "gzip", gzip.compress(raw, compresslevel=GZIP_LEVEL)
+
+
+def encode_request_body(
+    body: Any, dictionary: Dictionary | None, out: dict[str, EncodedSegment]
+) -> dict[str, Any] | None:
+    """
+    分段并压缩请求体，返回清单；段累加到 out（同一批内相同的段只压缩一次）
+
+    没有可分段字段时返回 None，由调用方整体 gzip。
+    """
+    split = split_request_body(body)
+    if split is None:
+        return None
+    manifest, segments = split
+    for digest in manifest_hashes(manifest):
+        existing = out.get(digest)
+        if existing is not None:
+            existing.refs += 1
+            continue
+        raw = segments[digest]
+        codec, data = encode_segment(raw, dictionary)
+        out[digest] = EncodedSegment(codec=codec, data=data, raw_size=len(raw))
+    return manifest
+
+
+# ---------- 进程池任务（spawn 子进程中执行，必须是模块级函数） ----------
+
+
+def compress_rows(
+    rows: Sequence[BodyRow], body_store: bool = False, dictionary: Dictionary | None = None
+) -> tuple[list[CompressedRow], Segments]:
+    """压缩一组 body：body_store 开启时请求体分段，其余整体 gzip"""
+    result = []
+    segments: Segments = {}
+    for row_id, request_text, response_text in rows:
+        raw = len(request_text or "") + len(response_text or "")
+        manifest = None
+        if body_store and request_text is not None and request_text != "null":
+            manifest = encode_request_body(json_codec.loads(request_text), dictionary, segments)
+        if manifest is not None:
+            request_packed, ref = None, json_codec.dumps(manifest)
+        else:
+            request_packed, ref = compress_json_text(request_text), None
+        result.append((row_id, request_packed, compress_json_text(response_text), raw, ref))
+    return result, segments
+
+
+__all__ = [
+    "BodyRow",
+    "CompressedRow",
+    "Dictionary",
+    "EncodedSegment",
+    "Segments",
+    "assemble_request_body",
+    "compress_rows",
+    "encode_request_body",
+    "encode_segment",
+    "manifest_hashes",
+    "segment_hash",
+    "split_request_body",
+    "zstd_available",
+    "zstd_codec",
+]
@@ -5,9 +5,10 @@
 """
 
 import gzip
-import json
 from typing import Any
 
+from src.utils import json_codec
+
 
 def compress_json(data: Any) -> bytes | None:
     """
@@ -23,16 +24,29 @@ def compress_json(data: Any) -> bytes | None:
         return None
 
     try:
-        # 转换为JSON字符串
-        json_str = json.dumps(data, ensure_ascii=False)
-        # gzip压缩
-        compressed = gzip.compress(json_str.encode("utf-8"), compresslevel=6)
+        # 序列化为JSON字节并gzip压缩
+        compressed = gzip.compress(json_codec.dumpb(data), compresslevel=6)
         return compressed
     except Exception:
         # 如果压缩失败，返回None
         return None
 
 
+def compress_json_text(text: str | None) -> bytes | None:
+    """
+    压缩已序列化的JSON文本（直接从数据库读取的 JSON 列文本，无需反序列化再序列化）
+
+    Args:
+        text: JSON文本
+
+    Returns:
+        gzip压缩后的字节，输入为None或JSON null时返回None
+    """
+    if text is None or text == "null":
+        return None
+    return gzip.compress(text.encode("utf-8"), compresslevel=6)
+
+
 def decompress_json(compressed_data: bytes | None) -> Any | None:
     """
     解压gzip格式的字节为JSON数据
@@ -47,10 +61,8 @@ def decompress_json(compressed_data: bytes | None) -> Any | None:
         return None
 
     try:
-        # gzip解压
-        json_str = gzip.decompress(compressed_data).decode("utf-8")
-        # 解析JSON
-        data = json.loads(json_str)
+        # gzip解压后直接解析JSON字节
+        data = json_codec.loads(gzip.decompress(compressed_data))
         return data
     except Exception:
         # 如果解压失败，返回None
@@ -70,6 +82,6 @@ def get_body_size(data: Any) -> int:
     if data is None:
         return 0
     try:
-        return len(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        return len(json_codec.dumpb(data))
     except Exception:
         return 0
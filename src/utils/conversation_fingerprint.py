@@ -0,0 +1,78 @@
+"""
+会话指纹 (Conversation Fingerprint)
+
+对消息列表计算逐条滚动哈希链，供 sessionId 生成、Token 计数缓存等按会话内容派生标识的
+场景共用，不再各自对整段历史 json.dumps(sort_keys=True) + SHA-256。
+
+- 单条消息摘要：blake2b-128(按键排序的紧凑 JSON)
+- 链：chain_i = blake2b-128(chain_{i-1} || digest_i)，chain_{-1} 为命名空间种子。
+  同一会话第 N 轮的前 N-1 个链节点与上一轮完全相同，可直接作为前缀缓存键
+
+默认经 json_codec 编码（快速 JSON 后端可用时走 orjson），适合进程内缓存键；跨实例或需要
+持久化的标识传 portable=True，改用标准库编码，摘要不随安装的 JSON 后端变化。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+from typing import Any
+
+from src.utils import json_codec
+
+DIGEST_SIZE = 16
+
+_portable_encoder = json.JSONEncoder(
+    ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=str
+)
+
+
+def message_digest(message: Any, *, portable: bool = False) -> bytes:
+    """单条消息（或任意 JSON 兼容对象）的内容摘要"""
+    if portable:
+        raw = _portable_encoder.encode(message).encode("utf-8")
+    else:
+        raw = json_codec.dumpb(message, sort_keys=True, default=str)
+    return hashlib.blake2b(raw, digest_size=DIGEST_SIZE).digest()
+
+
+def _chain(previous: bytes, digests: Iterable[bytes]) -> list[bytes]:
+    chain: list[bytes] = []
+    for digest in digests:
+        h = hashlib.blake2b(previous, digest_size=DIGEST_SIZE)
+        h.update(digest)
+        previous = h.digest()
+        chain.append(previous)
+    return chain
+
+
+@dataclass(frozen=True, slots=True)
+class ConversationFingerprint:
+    namespace: bytes
+    # chain[i] 为前 i+1 条消息的前缀摘要
+    chain: tuple[bytes, ...]
+
+    @property
+    def conversation_id(self) -> str:
+        """整段会话的标识（十六进制，32 字符）；空会话为命名空间本身"""
+        if not self.chain:
+            return hashlib.blake2b(self.namespace, digest_size=DIGEST_SIZE).hexdigest()
+        return self.chain[-1].hex()
+
+
+def fingerprint_messages(
+    messages: Sequence[Any], *, namespace: str | bytes = b"", portable: bool = False
+) -> ConversationFingerprint:
+    """计算消息列表的会话指纹"""
+    seed = namespace.encode("utf-8") if isinstance(namespace, str) else namespace
+    digests = [message_digest(message, portable=portable) for message in messages]
+    return ConversationFingerprint(namespace=seed, chain=tuple(_chain(seed, digests)))
+
+
+__all__ = [
+    "ConversationFingerprint",
+    "fingerprint_messages",
+    "message_digest",
+]
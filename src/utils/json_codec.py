@@ -0,0 +1,240 @@
+"""
+JSON 编解码层
+
+热路径（流式 chunk、Usage 事件、缓存、压缩）统一经由本模块做 JSON 编解码：
+- 安装了 orjson / msgspec 时自动使用（优先 orjson），否则回退到标准库 json
+- 语义与 `json.dumps(obj, ensure_ascii=False)` 一致：非 ASCII 字符原样输出，
+  保持 dict 插入顺序，sort_keys=True 时按键排序
+- 解码失败统一抛出 `json.JSONDecodeError`（与标准库相同），调用方的异常处理无需改动
+- 所有后端统一输出紧凑格式（"," / ":" 分隔符，无多余空格），输出字节与内容哈希不随
+  安装的后端变化
+- 快速后端不支持的值（超过 64 位的整数、NaN/Infinity）整体改用标准库编码；
+  快速后端拒绝的输入（NaN/Infinity）以及可能含超过 64 位整数的输入（快速后端会静默
+  解码为 float）改用标准库解码
+- datetime / dataclass 等快速后端原生支持、标准库不支持的类型交给调用方的 default 处理，
+  与 `json.dumps(default=...)` 输出一致
+
+环境变量 JSON_CODEC 可强制指定后端：auto（默认）/ orjson / msgspec / json。
+
+调用方式：`from src.utils import json_codec` 后使用 `json_codec.dumps/dumpb/loads`，
+通过模块属性访问，`set_backend()` 切换后端后立即生效。
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import os
+from collections.abc import Callable
+from typing import Any
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+try:
+    import msgspec as _msgspec
+except ImportError:
+    _msgspec = None
+
+JSONDecodeError = json.JSONDecodeError
+
+AVAILABLE_BACKENDS: tuple[str, ...] = tuple(
+    name
+    for name, module in (("orjson", _orjson), ("msgspec", _msgspec), ("json", json))
+    if module is not None
+)
+
+
+# ==================== 标准库后端 ====================
+
+_SEPARATORS = (",", ":")
+
+# json.dumps 在传入非默认参数（如 ensure_ascii=False）时每次都会新建 JSONEncoder，
+# 常用组合预先构造好复用
+_json_encoder = json.JSONEncoder(ensure_ascii=False, separators=_SEPARATORS)
+_json_sorted_encoder = json.JSONEncoder(ensure_ascii=False, separators=_SEPARATORS, sort_keys=True)
+
+
+def _json_dumps(obj: Any, *, sort_keys: bool = False, default: Callable | None = None) -> str:
+    if default is not None:
+        return json.dumps(
+            obj, ensure_ascii=False, separators=_SEPARATORS, sort_keys=sort_keys, default=default
+        )
+    return (_json_sorted_encoder if sort_keys else _json_encoder).encode(obj)
+
+
+def _json_dumpb(obj: Any, *, sort_keys: bool = False, default: Callable | None = None) -> bytes:
+    return _json_dumps(obj, sort_keys=sort_keys, default=default).encode("utf-8")
+
+
+def _json_loads(data: str | bytes | bytearray | memoryview) -> Any:
+    return json.loads(bytes(data) if isinstance(data, memoryview) else data)
+
+
+# 快速后端无法按标准库语义编码时（超过 64 位的整数、NaN/Infinity）改用标准库
+_fallback_dumpb = _json_dumpb
+
+# 可能超出 64 位的整数字面量：数字统一映射为 "0" 后查找连续数字串（C 层 translate + 子串查找）。
+# 允许误报：字符串或小数中的长数字串同样改用标准库解码，结果不变
+_DIGITS_TO_ZERO = bytes.maketrans(b"123456789", b"000000000")
+_WIDE_INT = b"0" * 20
+_WIDE_NEG_INT = b"-" + b"0" * 19
+
+
+def _may_have_wide_int(data: str | bytes | bytearray | memoryview) -> bool:
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    elif isinstance(data, memoryview):
+        data = bytes(data)
+    digits = data.translate(_DIGITS_TO_ZERO)
+    return _WIDE_INT in digits or _WIDE_NEG_INT in digits
+
+
+def _has_non_finite(obj: Any) -> bool:
+    """是否含 NaN/Infinity（快速后端会静默输出 null，标准库输出 NaN/Infinity）"""
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, float):
+            if not math.isfinite(item):
+                return True
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
+# ==================== orjson 后端 ====================
+
+if _orjson is not None:
+    # 允许非 str 键（与标准库一致，转换为字符串）；datetime / dataclass 交给 default 处理
+    _ORJSON_OPTS = (
+        _orjson.OPT_NON_STR_KEYS
+        | _orjson.OPT_PASSTHROUGH_DATETIME
+        | _orjson.OPT_PASSTHROUGH_DATACLASS
+    )
+    _ORJSON_SORTED_OPTS = _ORJSON_OPTS | _orjson.OPT_SORT_KEYS
+
+    def _orjson_dumpb(
+        obj: Any, *, sort_keys: bool = False, default: Callable | None = None
+    ) -> bytes:
+        try:
+            data = _orjson.dumps(
+                obj, default=default, option=_ORJSON_SORTED_OPTS if sort_keys else _ORJSON_OPTS
+            )
+        except _orjson.JSONEncodeError:
+            # 超过 64 位的整数等；真正不可序列化的对象由标准库抛出 TypeError
+            return _fallback_dumpb(obj, sort_keys=sort_keys, default=default)
+        # NaN/Infinity 被编码为 null，只有输出含 null 时才需要检查
+        if b"null" in data and _has_non_finite(obj):
+            return _fallback_dumpb(obj, sort_keys=sort_keys, default=default)
+        return data
+
+    def _orjson_dumps(obj: Any, *, sort_keys: bool = False, default: Callable | None = None) -> str:
+        return _orjson_dumpb(obj, sort_keys=sort_keys, default=default).decode("utf-8")
+
+    def _orjson_loads(data: str | bytes | bytearray | memoryview) -> Any:
+        if _may_have_wide_int(data):
+            return _json_loads(data)
+        try:
+            return _orjson.loads(data)
+        except _orjson.JSONDecodeError:
+            # 标准库接受 NaN/Infinity；真正无效的输入由标准库抛出 json.JSONDecodeError
+            return _json_loads(data)
+
+
+# ==================== msgspec 后端 ====================
+
+if _msgspec is not None:
+    _msgspec_encoder = _msgspec.json.Encoder()
+    _msgspec_sorted_encoder = _msgspec.json.Encoder(order="sorted")
+    _msgspec_decoder = _msgspec.json.Decoder()
+
+    def _msgspec_dumpb(
+        obj: Any, *, sort_keys: bool = False, default: Callable | None = None
+    ) -> bytes:
+        if default is not None:
+            # msgspec 原生编码 datetime / dataclass 等类型且无法关闭，带 default 时改用标准库
+            return _fallback_dumpb(obj, sort_keys=sort_keys, default=default)
+        try:
+            encoder = _msgspec_sorted_encoder if sort_keys else _msgspec_encoder
+            data = encoder.encode(obj)
+        except (TypeError, OverflowError, _msgspec.EncodeError):
+            return _fallback_dumpb(obj, sort_keys=sort_keys, default=default)
+        if b"null" in data and _has_non_finite(obj):
+            return _fallback_dumpb(obj, sort_keys=sort_keys, default=default)
+        return data
+
+    def _msgspec_dumps(
+        obj: Any, *, sort_keys: bool = False, default: Callable | None = None
+    ) -> str:
+        return _msgspec_dumpb(obj, sort_keys=sort_keys, default=default).decode("utf-8")
+
+    def _msgspec_loads(data: str | bytes | bytearray | memoryview) -> Any:
+        if _may_have_wide_int(data):
+            return _json_loads(data)
+        try:
+            return _msgspec_decoder.decode(data)
+        except _msgspec.DecodeError:
+            # 标准库接受 NaN/Infinity；真正无效的输入由标准库抛出 json.JSONDecodeError，
+            # 保持调用方 except json.JSONDecodeError 的语义
+            return _json_loads(data)
+
+
+# ==================== 后端选择 ====================
+
+_BACKEND_NAME = "json"
+
+# 以下三个名称在 set_backend() 中被重新绑定
+dumps: Callable[..., str] = _json_dumps
+dumpb: Callable[..., bytes] = _json_dumpb
+loads: Callable[[str | bytes | bytearray | memoryview], Any] = _json_loads
+
+
+def set_backend(name: str = "auto") -> str:
+    """
+    切换 JSON 后端
+
+    Args:
+        name: auto / orjson / msgspec / json；指定的后端未安装时回退到 auto
+
+    Returns:
+        实际生效的后端名称
+    """
+    global _BACKEND_NAME, dumps, dumpb, loads
+
+    name = (name or "auto").strip().lower()
+    if name not in AVAILABLE_BACKENDS:
+        name = AVAILABLE_BACKENDS[0]
+
+    if name == "orjson":
+        dumps, dumpb, loads = _orjson_dumps, _orjson_dumpb, _orjson_loads
+    elif name == "msgspec":
+        dumps, dumpb, loads = _msgspec_dumps, _msgspec_dumpb, _msgspec_loads
+    else:
+        dumps, dumpb, loads = _json_dumps, _json_dumpb, _json_loads
+
+    _BACKEND_NAME = name
+    return name
+
+
+def backend_name() -> str:
+    """当前生效的后端名称（启动日志使用）"""
+    return _BACKEND_NAME
+
+
+set_backend(os.getenv("JSON_CODEC", "auto"))
+
+
+__all__ = [
+    "AVAILABLE_BACKENDS",
+    "JSONDecodeError",
+    "backend_name",
+    "dumpb",
+    "dumps",
+    "loads",
+    "set_backend",
+]
@@ -1,3 +1,11 @@
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+from typing import Any
+
+from src.utils import json_codec
+
+
 class SSEEventParser:
     """轻量SSE解析器，按行接收输入并输出完整事件。"""
 
@@ -107,3 +115,342 @@ class SSEEventParser:
             data_lines.append(value)
         else:
             self._buffer["data"] = [value]
+
+
+class SSEEvent:
+    """SSE 事件（字段保留为原始字节，访问时才做 UTF-8 解码）"""
+
+    __slots__ = ("event_bytes", "data_bytes", "id_bytes", "retry_bytes")
+
+    def __init__(
+        self,
+        event_bytes: bytes | None,
+        data_bytes: bytes,
+        id_bytes: bytes | None = None,
+        retry_bytes: bytes | None = None,
+    ) -> None:
+        self.event_bytes = event_bytes
+        self.data_bytes = data_bytes
+        self.id_bytes = id_bytes
+        self.retry_bytes = retry_bytes
+
+    @property
+    def event(self) -> str | None:
+        return _decode_field(self.event_bytes)
+
+    @property
+    def data(self) -> str:
+        return self.data_bytes.decode("utf-8", errors="replace")
+
+    @property
+    def id(self) -> str | None:
+        return _decode_field(self.id_bytes)
+
+    @property
+    def retry(self) -> str | None:
+        return _decode_field(self.retry_bytes)
+
+    def json(self) -> Any:
+        """直接对 data 字节做 JSON 解码（json_codec.loads 原生支持 bytes，省去一次 str 拷贝）"""
+        return json_codec.loads(self.data_bytes)
+
+    def as_dict(self) -> dict[str, str | None]:
+        """与 SSEEventParser 输出一致的 dict 形式"""
+        return {"event": self.event, "data": self.data, "id": self.id, "retry": self.retry}
+
+    def __repr__(self) -> str:
+        return f"SSEEvent(event={self.event!r}, data={self.data_bytes[:80]!r})"
+
+
+def _decode_field(value: bytes | None) -> str | None:
+    if value is None:
+        return None
+    return value.decode("utf-8", errors="replace")
+
+
+# Gemini JSON-array 流中的数组包装符 / 分隔符
+_JSON_ARRAY_NOISE = frozenset((b"", b"[", b"]", b","))
+
+
+class SSEByteParser:
+    """增量 SSE 解析器，直接接收原始字节。
+
+    - 行边界在可复用的 ``bytearray`` 中查找，按规范支持 CRLF / CR / LF（跨 chunk 的 CRLF 也能正确识别）
+    - 事件以 ``SSEEvent`` 形式产出，字段保持为字节，调用方不读取的字段不做解码
+    - 需要逐行转发 / 转换的调用方使用 ``feed_lines`` / ``flush_lines``，按行取得
+      (行字节, 该行完成的事件)，与 ``feed`` 共用同一套行切分与事件组装
+    - 行为与 ``SSEEventParser`` 保持一致（包括无空行分隔的连续 data 行、``event: x data: y``
+      单行写法、缺少 ``data:`` 前缀的数据行等兼容处理）
+    """
+
+    __slots__ = (
+        "_buf",
+        "_pending_cr",
+        "_event",
+        "_data",
+        "_id",
+        "_retry",
+        "_json_array_lines",
+        "line_count",
+    )
+
+    def __init__(self, *, json_array_lines: bool = False) -> None:
+        """
+        Args:
+            json_array_lines: 不在事件中的无前缀行按独立的 JSON 元素处理（Gemini JSON-array
+                流没有 data: 前缀，每行一个对象），而不是追加到下一个事件的 data
+        """
+        self._buf = bytearray()
+        self._pending_cr = False
+        self._event: bytes | None = None
+        self._data: list[bytes] = []
+        self._id: bytes | None = None
+        self._retry: bytes | None = None
+        self._json_array_lines = json_array_lines
+        # 已处理的非空行数（与 StreamProcessor.chunk_count 的统计口径一致）
+        self.line_count = 0
+
+    def feed(self, chunk: bytes | bytearray | memoryview) -> Iterator[SSEEvent]:
+        """追加原始字节并返回已完成事件的迭代器。
+
+        字节会立即写入内部缓冲区；返回的迭代器未被耗尽时，剩余行保留到下次 feed/flush 处理。
+        """
+        self._append(chunk)
+        return self._drain()
+
+    def feed_lines(
+        self, chunk: bytes | bytearray | memoryview
+    ) -> Iterator[tuple[bytes, tuple[SSEEvent, ...]]]:
+        """追加原始字节，逐行返回 (行字节（不含行结束符）, 该行完成的事件)。
+
+        空行表示事件结束；迭代器未被耗尽时的剩余行保留到下次处理（同 ``feed``）。
+        """
+        self._append(chunk)
+        return self._drain_lines()
+
+    def flush_lines(self) -> list[tuple[bytes, tuple[SSEEvent, ...]]]:
+        """流结束时处理残留的完整行与不完整行；尚未完成的事件仍需调用 ``flush`` 取得。"""
+        if self._pending_cr:
+            self._pending_cr = False
+            self._buf += b"\n"
+        lines = list(self._drain_lines())
+        if self._buf:
+            line = bytes(self._buf)
+            self._buf.clear()
+            lines.append((line, self._feed_line(line)))
+        return lines
+
+    def _append(self, chunk: bytes | bytearray | memoryview) -> None:
+        if not chunk:
+            return
+        # 常见输入已是 bytes，直接使用，只有 bytearray / memoryview 才拷贝
+        data = chunk if isinstance(chunk, bytes) else bytes(chunk)
+        if self._pending_cr:
+            data = b"\r" + data
+            self._pending_cr = False
+        if data.endswith(b"\r"):
+            # 末尾的 CR 可能是跨 chunk 的 CRLF 前半部分，等待下一个 chunk 再判断
+            self._pending_cr = True
+            data = data[:-1]
+        if b"\r" in data:
+            data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        self._buf += data
+
+    def flush(self) -> list[SSEEvent]:
+        """流结束时调用，处理残留的不完整行并输出尚未完成的事件。"""
+        if self._pending_cr:
+            self._pending_cr = False
+            self._buf += b"\n"
+        events = list(self._drain())
+        if self._buf:
+            line = bytes(self._buf)
+            self._buf.clear()
+            events.extend(self._feed_line(line))
+        event = self._finalize_event()
+        if event is not None:
+            events.append(event)
+        return events
+
+    def _drain(self) -> Iterator[SSEEvent]:
+        buf = self._buf
+        pos = 0
+        try:
+            while True:
+                nl = buf.find(b"\n", pos)
+                if nl < 0:
+                    return
+                line = bytes(buf[pos:nl])
+                pos = nl + 1
+                events = self._feed_line(line)
+                if events:
+                    yield from events
+        finally:
+            if pos:
+                del buf[:pos]
+
+    def _drain_lines(self) -> Iterator[tuple[bytes, tuple[SSEEvent, ...]]]:
+        buf = self._buf
+        pos = 0
+        try:
+            while True:
+                nl = buf.find(b"\n", pos)
+                if nl < 0:
+                    return
+                line = bytes(buf[pos:nl])
+                pos = nl + 1
+                yield line, self._feed_line(line)
+        finally:
+            if pos:
+                del buf[:pos]
+
+    def _feed_line(self, line: bytes) -> tuple[SSEEvent, ...]:
+        # 空行表示事件结束
+        if not line:
+            event = self._finalize_event()
+            return (event,) if event is not None else ()
+
+        self.line_count += 1
+
+        if line.startswith(b"data:"):
+            # 已有缓存的 data 时先完成上一个事件（兼容没有空行分隔的连续 data 行）
+            previous = self._finalize_event() if self._data else None
+            self._data.append(line[6:] if line.startswith(b"data: ") else line[5:])
+            return (previous,) if previous is not None else ()
+
+        # 注释行直接忽略
+        if line.startswith(b":") and not line.startswith(b"::"):
+            return ()
+
+        if line.startswith(b"event:"):
+            value = line[6:].lstrip()
+            if b" data:" in value:
+                event_part, _, data_part = value.partition(b"data:")
+                self._event = event_part.strip() or None
+                data_value = data_part.lstrip()
+                if data_value:
+                    self._data.append(data_value)
+                event = self._finalize_event()
+                return (event,) if event is not None else ()
+            self._event = value.strip() or None
+            return ()
+
+        if line.startswith(b"id:"):
+            self._id = line[3:].strip() or None
+            return ()
+
+        if line.startswith(b"retry:"):
+            self._retry = line[6:].strip() or None
+            return ()
+
+        if self._json_array_lines and not self._data:
+            payload = line.strip().strip(b",").strip()
+            if payload in _JSON_ARRAY_NOISE:
+                return ()
+            return (SSEEvent(None, payload),)
+
+        # 未知行：视作数据追加（部分实现会缺少 data: 前缀）
+        self._data.append(line)
+        return ()
+
+    def _finalize_event(self) -> SSEEvent | None:
+        data = self._data
+        if not data:
+            event = None
+        else:
+            event = SSEEvent(
+                self._event,
+                data[0] if len(data) == 1 else b"\n".join(data),
+                self._id,
+                self._retry,
+            )
+            self._data = []
+        self._event = None
+        self._id = None
+        self._retry = None
+        return event
+
+
+# 可能携带 usage / 完成信号的 JSON 字段：仅当值不是 null 时才需要解码
+_LIVE_FIELD_MARKERS: tuple[bytes, ...] = (
+    b'"usage"',
+    b'"usageMetadata"',
+    b'"finish_reason"',
+    b'"finishReason"',
+)
+# 只要出现即需要解码的标记（完成事件）
+_PLAIN_MARKERS: tuple[bytes, ...] = (
+    b'"message_stop"',
+    b'"response.completed"',
+)
+_FIELD_SEPARATORS = frozenset(b" \t\r\n:")
+
+
+def _has_live_field(buf: bytes, key: bytes) -> bool:
+    """buf 中是否存在值不为 null 的 key 字段（key 需包含两侧引号）。"""
+    start = 0
+    size = len(buf)
+    while True:
+        idx = buf.find(key, start)
+        if idx < 0:
+            return False
+        pos = idx + len(key)
+        while pos < size and buf[pos] in _FIELD_SEPARATORS:
+            pos += 1
+        # 0x6E == "n"（null）；字段值被截断在缓冲区末尾时保守视作命中
+        if pos >= size or buf[pos] != 0x6E:
+            return True
+        start = pos
+
+
+def may_carry_usage(buf: bytes) -> bool:
+    """字节级预筛：buf 中是否可能包含 usage / 完成信号。
+
+    只做 C 层的子串查找，允许误报（例如正文中恰好出现 "usage"），不允许漏报。
+    """
+    for marker in _PLAIN_MARKERS:
+        if marker in buf:
+            return True
+    for key in _LIVE_FIELD_MARKERS:
+        if key in buf and _has_live_field(buf, key):
+            return True
+    return False
+
+
+class SSEUsageFrameScanner:
+    """透传模式下的旁路扫描器，在原始字节上按行解析 SSE 事件。
+
+    行边界与事件组装交给 ``SSEByteParser``（CRLF / CR / LF、多行 data 字段、单行
+    ``event: x data: y`` 写法等与逐行解析路径一致），但不解码事件：只返回 data 为
+    ``[DONE]`` 或经 ``may_carry_usage`` 预筛可能携带 usage / 完成信号的帧负载（bytes），
+    由调用方决定是否 JSON 解码。同时维护非空行数与 data 帧数的统计。
+    """
+
+    __slots__ = ("_parser", "data_frame_count")
+
+    def __init__(self) -> None:
+        self._parser = SSEByteParser(json_array_lines=True)
+        self.data_frame_count = 0
+
+    @property
+    def line_count(self) -> int:
+        return self._parser.line_count
+
+    def scan(self, chunk: bytes | bytearray | memoryview) -> list[bytes]:
+        """输入一个原始 chunk，返回其中已完整且需要解码的帧负载。"""
+        return self._select(self._parser.feed(chunk))
+
+    def flush(self) -> list[bytes]:
+        """流结束时调用，处理尚未以换行结束的残留数据。"""
+        return self._select(self._parser.flush())
+
+    def _select(self, events: Iterable[SSEEvent]) -> list[bytes]:
+        payloads: list[bytes] = []
+        for event in events:
+            data = event.data_bytes
+            if data.strip() == b"[DONE]":
+                payloads.append(b"[DONE]")
+                continue
+            self.data_frame_count += 1
+            if may_carry_usage(data):
+                payloads.append(data)
+        return payloads
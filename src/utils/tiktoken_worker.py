@@ -0,0 +1,155 @@
+"""
+tiktoken 分词原语与进程池任务
+
+分词进程池以 spawn 方式启动，子进程需要导入任务函数所在的模块。此模块只依赖标准库与
+tiktoken，子进程不会连带导入应用（配置、数据库、日志文件等）；
+src.services.usage.tokenizer 在主进程中复用同一批函数。
+"""
+
+from __future__ import annotations
+
+import logging
+import re
+import threading
+from collections.abc import Callable, Sequence
+from typing import Any
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - 依赖缺失时只估算
+    tiktoken = None
+
+_log = logging.getLogger(__name__)
+
+# 中文字符约 2 token，其余按单词约 1.3 token
+_ESTIMATE_PATTERN = re.compile(r"([\u4e00-\u9fff])|[^\W\u4e00-\u9fff]+")
+
+_encoders: dict[str, Any] = {}
+_unavailable: set[str] = set()
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(encoding_name: str) -> Any | None:
+    """获取编码器；未预加载时同步加载，加载失败后不再重试"""
+    encoder = _encoders.get(encoding_name)
+    if encoder is not None or tiktoken is None or encoding_name in _unavailable:
+        return encoder
+    with _encoders_lock:
+        encoder = _encoders.get(encoding_name)
+        if encoder is None and encoding_name not in _unavailable:
+            try:
+                encoder = tiktoken.get_encoding(encoding_name)
+                _encoders[encoding_name] = encoder
+            except Exception as e:
+                _unavailable.add(encoding_name)
+                _log.warning(f"[Tokenizer] 编码器 {encoding_name} 加载失败，改用估算: {e}")
+    return encoder
+
+
+def loaded_encoders() -> list[str]:
+    return sorted(_encoders)
+
+
+def preload_encoders(names: Sequence[str]) -> list[str]:
+    """预加载编码器，返回可用的编码名"""
+    return [name for name in names if get_encoder(name) is not None]
+
+
+def estimate_tokens(text: str) -> int:
+    """无编码器时的估算（单次正则扫描）"""
+    if not text:
+        return 0
+    cjk = words = 0
+    for match in _ESTIMATE_PATTERN.finditer(text):
+        if match.group(1):
+            cjk += 1
+        else:
+            words += 1
+    return max(1, int(cjk * 2 + words * 1.3))
+
+
+def encode_len(encoder: Any | None) -> Callable[[str], int]:
+    """返回按给定编码器计数的函数；编码器为 None 时估算"""
+    if encoder is None:
+        return estimate_tokens
+
+    def _count(text: str) -> int:
+        try:
+            return len(encoder.encode(text, disallowed_special=()))
+        except Exception as e:
+            _log.warning(f"Error counting tokens: {e}")
+            return estimate_tokens(text)
+
+    return _count
+
+
+def message_tokens(count: Callable[[str], int], message: Any, overhead: int) -> int:
+    """单条消息的 Token 数（OpenAI 计数规则：角色、内容、名称、工具调用）"""
+    if not isinstance(message, dict):
+        return 0
+    total = overhead
+
+    role = message.get("role")
+    if isinstance(role, str) and role:
+        total += count(role)
+
+    content = message.get("content")
+    if isinstance(content, str):
+        if content:
+            total += count(content)
+    elif isinstance(content, list):
+        for item in content:
+            if not isinstance(item, dict):
+                continue
+            if item.get("type") == "text":
+                total += count(item.get("text") or "")
+            elif item.get("type") == "image_url":
+                # 低分辨率: 85 tokens, 高分辨率: 170 tokens
+                image_url = item.get("image_url")
+                detail = image_url.get("detail", "auto") if isinstance(image_url, dict) else "auto"
+                total += 170 if detail == "high" else 85
+
+    name = message.get("name")
+    if isinstance(name, str) and name:
+        total += count(name) - 1  # name 会减去 1 个 token
+
+    for tool_call in message.get("tool_calls") or []:
+        if not isinstance(tool_call, dict):
+            continue
+        if "id" in tool_call:
+            total += count(str(tool_call["id"]))
+        function = tool_call.get("function") or {}
+        if "name" in function:
+            total += count(str(function["name"]))
+        if "arguments" in function:
+            total += count(str(function["arguments"]))
+    return total
+
+
+# ---------- 进程池任务（spawn 子进程中执行，必须是模块级函数） ----------
+
+
+def pool_init(names: list[str]) -> None:
+    preload_encoders(names)
+
+
+def count_text(encoding_name: str, text: str) -> int:
+    return encode_len(get_encoder(encoding_name))(text)
+
+
+def count_messages(encoding_name: str, messages: list[Any], overhead: int) -> list[int]:
+    count = encode_len(get_encoder(encoding_name))
+    return [message_tokens(count, message, overhead) for message in messages]
+
+
+__all__ = [
+    "count_messages",
+    "count_text",
+    "encode_len",
+    "estimate_tokens",
+    "get_encoder",
+    "loaded_encoders",
+    "message_tokens",
+    "pool_init",
+    "preload_encoders",
+]
@@ -264,3 +264,33 @@ def test_wrap_v1internal_request_injects_session_signature_when_tool_cache_missi
     model_turn = wrapped["request"]["contents"][1]
     part = model_turn["parts"][0]
     assert part["thoughtSignature"] == sig
+
+
+def test_wrap_v1internal_request_session_id_stable_across_turns() -> None:
+    first_turn = [{"role": "user", "parts": [{"text": "hi"}]}]
+    second_turn = first_turn + [
+        {"role": "model", "parts": [{"text": "hello"}]},
+        {"role": "user", "parts": [{"text": "continue"}]},
+    ]
+    third_turn = second_turn + [
+        {"role": "model", "parts": [{"text": "sure"}]},
+        {"role": "user", "parts": [{"text": "more"}]},
+    ]
+
+    def session_id(contents: list[dict], project_id: str = "project-123") -> str:
+        wrapped = wrap_v1internal_request(
+            {"contents": json.loads(json.dumps(contents))},
+            project_id=project_id,
+            model="gemini-2.0-flash",
+        )
+        return wrapped["request"]["sessionId"]
+
+    sid = session_id(second_turn)
+    assert sid.startswith("session-")
+    # 首条 model 回复之后锚点固定
+    assert session_id(third_turn) == sid
+    # 开场消息相同、模型回复不同的会话，以及不同 project 的会话互不相同
+    forked = first_turn + [{"role": "model", "parts": [{"text": "hey"}]}]
+    assert session_id(forked) != sid
+    assert session_id(second_turn, project_id="project-456") != sid
+    assert session_id([{"role": "user", "parts": [{"text": "other"}]}]) != session_id(first_turn)
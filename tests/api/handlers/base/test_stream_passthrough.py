@@ -0,0 +1,260 @@
+import json
+from typing import Any, AsyncIterator
+
+import httpx
+import pytest
+
+from src.api.handlers.base.parsers import get_parser_for_format
+from src.api.handlers.base.stream_context import StreamContext
+from src.api.handlers.base.stream_processor import StreamProcessor
+from src.utils.sse_parser import SSEUsageFrameScanner, may_carry_usage
+
+
+class _DummyResponseCtx:
+    async def __aexit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        return None
+
+
+class _DummyHTTPClient:
+    async def aclose(self) -> None:
+        return None
+
+
+async def _iter_bytes(chunks: list[bytes]) -> AsyncIterator[bytes]:
+    for c in chunks:
+        yield c
+
+
+def _claude_stream() -> bytes:
+    events: list[tuple[str, dict[str, Any]]] = [
+        (
+            "message_start",
+            {
+                "type": "message_start",
+                "message": {
+                    "id": "msg_1",
+                    "model": "claude-test",
+                    "usage": {"input_tokens": 12, "output_tokens": 1},
+                },
+            },
+        ),
+        ("content_block_start", {"type": "content_block_start", "index": 0}),
+    ]
+    for i in range(20):
+        events.append(
+            (
+                "content_block_delta",
+                {
+                    "type": "content_block_delta",
+                    "index": 0,
+                    "delta": {"type": "text_delta", "text": f"token-{i} 你好"},
+                },
+            )
+        )
+    events.extend(
+        [
+            ("content_block_stop", {"type": "content_block_stop", "index": 0}),
+            (
+                "message_delta",
+                {
+                    "type": "message_delta",
+                    "delta": {"stop_reason": "end_turn"},
+                    "usage": {"output_tokens": 34},
+                },
+            ),
+            ("message_stop", {"type": "message_stop"}),
+        ]
+    )
+    return b"".join(
+        f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+        for name, data in events
+    )
+
+
+def _openai_stream() -> bytes:
+    chunks: list[dict[str, Any]] = []
+    for i in range(10):
+        chunks.append(
+            {
+                "id": "chatcmpl_1",
+                "object": "chat.completion.chunk",
+                "choices": [{"index": 0, "delta": {"content": f"t{i}"}, "finish_reason": None}],
+                "usage": None,
+            }
+        )
+    chunks.append(
+        {
+            "id": "chatcmpl_1",
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+        }
+    )
+    chunks.append(
+        {
+            "id": "chatcmpl_1",
+            "object": "chat.completion.chunk",
+            "choices": [],
+            "usage": {"prompt_tokens": 9, "completion_tokens": 10, "total_tokens": 19},
+        }
+    )
+    body = b"".join(f"data: {json.dumps(c)}\n\n".encode() for c in chunks)
+    return body + b"data: [DONE]\n\n"
+
+
+def _split(raw: bytes, size: int) -> list[bytes]:
+    return [raw[i : i + size] for i in range(0, len(raw), size)]
+
+
+def test_may_carry_usage_ignores_null_fields() -> None:
+    assert not may_carry_usage(b'{"choices":[{"finish_reason":null}],"usage": null}')
+    assert may_carry_usage(b'{"choices":[{"finish_reason":"stop"}]}')
+    assert may_carry_usage(b'{"usage":{"prompt_tokens":1}}')
+    assert may_carry_usage(b'{"type":"message_stop"}')
+    assert not may_carry_usage(b'{"type":"content_block_delta","delta":{"text":"hi"}}')
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 4096])
+def test_scanner_selects_only_usage_frames_across_chunk_boundaries(chunk_size: int) -> None:
+    scanner = SSEUsageFrameScanner()
+    payloads: list[bytes] = []
+    for chunk in _split(_claude_stream(), chunk_size):
+        payloads.extend(scanner.scan(chunk))
+    payloads.extend(scanner.flush())
+
+    types = [json.loads(p)["type"] for p in payloads]
+    assert types == ["message_start", "message_delta", "message_stop"]
+    # 25 个 data 帧 + 25 个 event 行
+    assert scanner.data_frame_count == 25
+    assert scanner.line_count == 50
+
+
+def test_scanner_handles_gemini_json_array_without_data_prefix() -> None:
+    scanner = SSEUsageFrameScanner()
+    chunk = {
+        "candidates": [{"content": {"parts": [{"text": "hi"}]}, "finishReason": "STOP"}],
+        "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 4},
+    }
+    payloads = scanner.scan(b"[\n" + json.dumps(chunk).encode() + b",\n]\n")
+    assert [json.loads(p) for p in payloads] == [chunk]
+
+
+def test_scanner_handles_crlf_separators() -> None:
+    scanner = SSEUsageFrameScanner()
+    raw = _openai_stream().replace(b"\n", b"\r\n")
+    payloads: list[bytes] = []
+    # 7 字节切分会把部分 CRLF 切在 chunk 边界上
+    for chunk in _split(raw, 7):
+        payloads.extend(scanner.scan(chunk))
+    payloads.extend(scanner.flush())
+
+    assert payloads[-1] == b"[DONE]"
+    assert json.loads(payloads[-2])["usage"]["total_tokens"] == 19
+    assert scanner.data_frame_count == 12
+    assert scanner.line_count == 13
+
+
+def test_scanner_joins_multiline_data_field() -> None:
+    scanner = SSEUsageFrameScanner()
+    raw = (
+        b'event: message_delta\ndata: {"type":"message_delta",\n'
+        b'  "usage":{"output_tokens":5}}\n\n'
+        b'event: message_stop data: {"type":"message_stop"}\n\n'
+    )
+    payloads = scanner.scan(raw)
+
+    assert [json.loads(p)["type"] for p in payloads] == ["message_delta", "message_stop"]
+    assert json.loads(payloads[0])["usage"] == {"output_tokens": 5}
+    assert scanner.data_frame_count == 2
+
+
+def test_scanner_ignores_done_inside_content() -> None:
+    scanner = SSEUsageFrameScanner()
+    delta = {"choices": [{"index": 0, "delta": {"content": "data: [DONE]"}}]}
+    raw = f"data: {json.dumps(delta)}\n\ndata: [DONE]\n\n".encode()
+    payloads = scanner.scan(raw)
+
+    assert payloads == [b"[DONE]"]
+    assert scanner.data_frame_count == 1
+
+
+async def _run(
+    raw: bytes,
+    provider_format: str,
+    *,
+    record_parsed_chunks: bool,
+    chunk_size: int = 50,
+) -> tuple[bytes, StreamContext]:
+    ctx = StreamContext(model="test-model", api_format=provider_format)
+    ctx.provider_api_format = provider_format
+    ctx.client_api_format = provider_format
+    ctx.record_parsed_chunks = record_parsed_chunks
+    processor = StreamProcessor(
+        request_id="req_test",
+        default_parser=get_parser_for_format(provider_format),
+    )
+    chunks = _split(raw, chunk_size)
+    out = b""
+    async for b in processor.create_response_stream(
+        ctx=ctx,
+        byte_iterator=_iter_bytes(chunks[2:]),
+        response_ctx=_DummyResponseCtx(),
+        http_client=_DummyHTTPClient(),  # type: ignore[arg-type]
+        prefetched_chunks=chunks[:2],
+        start_time=None,
+    ):
+        out += b
+    return out, ctx
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "raw, provider_format",
+    [(_claude_stream(), "claude:chat"), (_openai_stream(), "openai:chat")],
+)
+async def test_passthrough_matches_line_parsing_path(raw: bytes, provider_format: str) -> None:
+    fast_out, fast_ctx = await _run(raw, provider_format, record_parsed_chunks=False)
+    slow_out, slow_ctx = await _run(raw, provider_format, record_parsed_chunks=True)
+
+    assert fast_out == slow_out == raw
+    assert fast_ctx.has_completion is slow_ctx.has_completion is True
+    assert (fast_ctx.input_tokens, fast_ctx.output_tokens) == (
+        slow_ctx.input_tokens,
+        slow_ctx.output_tokens,
+    )
+    assert fast_ctx.input_tokens > 0 and fast_ctx.output_tokens > 0
+    assert fast_ctx.data_count == slow_ctx.data_count
+    assert fast_ctx.chunk_count == slow_ctx.chunk_count
+    assert fast_ctx.parsed_chunks == []
+
+
+@pytest.mark.asyncio
+async def test_passthrough_flushes_usage_on_remote_protocol_error() -> None:
+    ctx = StreamContext(model="test-model", api_format="openai:chat")
+    ctx.provider_api_format = "openai:chat"
+    ctx.record_parsed_chunks = False
+    processor = StreamProcessor(
+        request_id="req_test",
+        default_parser=get_parser_for_format("openai:chat"),
+    )
+    usage_chunk = {
+        "choices": [],
+        "usage": {"prompt_tokens": 11, "completion_tokens": 4, "total_tokens": 15},
+    }
+
+    async def _iter_then_error() -> AsyncIterator[bytes]:
+        # 无结尾换行：只能依赖扫描器 flush 取到尾部 usage
+        yield f"data: {json.dumps(usage_chunk)}".encode()
+        raise httpx.RemoteProtocolError("boom")
+
+    async for _ in processor.create_response_stream(
+        ctx=ctx,
+        byte_iterator=_iter_then_error(),
+        response_ctx=_DummyResponseCtx(),
+        http_client=_DummyHTTPClient(),  # type: ignore[arg-type]
+        prefetched_chunks=[],
+        start_time=None,
+    ):
+        pass
+
+    assert ctx.input_tokens == 11
+    assert ctx.output_tokens == 4
@@ -12,7 +12,7 @@ from src.api.handlers.base.response_parser import (
 )
 from src.api.handlers.base.stream_context import StreamContext
 from src.api.handlers.base.stream_processor import StreamProcessor
-from src.utils.sse_parser import SSEEventParser
+from src.utils.sse_parser import SSEByteParser
 
 
 class DummyParser(ResponseParser):
@@ -29,22 +29,29 @@ class DummyParser(ResponseParser):
         return ""
 
 
-def test_process_line_strips_newlines_and_finalizes_event() -> None:
+def _feed(
+    processor: StreamProcessor, ctx: StreamContext, sse_parser: SSEByteParser, data: bytes
+) -> None:
+    for event in sse_parser.feed(data):
+        processor.handle_sse_event(ctx, event.event, event.data)
+
+
+def test_sse_line_ending_finalizes_event() -> None:
     ctx = StreamContext(model="test-model", api_format="openai:chat")
     processor = StreamProcessor(request_id="test-request", default_parser=DummyParser())
-    sse_parser = SSEEventParser()
+    sse_parser = SSEByteParser()
 
-    processor._process_line(ctx, sse_parser, 'data: {"type":"response.completed"}\n')
-    processor._process_line(ctx, sse_parser, "\n")
+    _feed(processor, ctx, sse_parser, b'data: {"type":"response.completed"}\n')
+    _feed(processor, ctx, sse_parser, b"\n")
 
     assert ctx.has_completion is True
 
 
-def test_process_line_updates_openai_usage_from_usage_only_chunk() -> None:
+def test_sse_updates_openai_usage_from_usage_only_chunk() -> None:
     ctx = StreamContext(model="test-model", api_format="openai:chat")
     ctx.provider_api_format = "openai:chat"
     processor = StreamProcessor(request_id="test-request", default_parser=DummyParser())
-    sse_parser = SSEEventParser()
+    sse_parser = SSEByteParser()
 
     usage_chunk = {
         "id": "chatcmpl_test",
@@ -53,18 +60,18 @@ def test_process_line_updates_openai_usage_from_usage_only_chunk() -> None:
         "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
     }
 
-    processor._process_line(ctx, sse_parser, f"data: {json.dumps(usage_chunk)}\n")
-    processor._process_line(ctx, sse_parser, "\n")
+    _feed(processor, ctx, sse_parser, f"data: {json.dumps(usage_chunk)}\n".encode())
+    _feed(processor, ctx, sse_parser, b"\n")
 
     assert ctx.input_tokens == 10
     assert ctx.output_tokens == 5
 
 
-def test_process_line_handles_openai_usage_chunk_followed_by_done_without_blank_line() -> None:
+def test_sse_handles_openai_usage_chunk_followed_by_done_without_blank_line() -> None:
     ctx = StreamContext(model="test-model", api_format="openai:chat")
     ctx.provider_api_format = "openai:chat"
     processor = StreamProcessor(request_id="test-request", default_parser=DummyParser())
-    sse_parser = SSEEventParser()
+    sse_parser = SSEByteParser()
 
     usage_chunk = {
         "id": "chatcmpl_test",
@@ -74,9 +81,9 @@ def test_process_line_handles_openai_usage_chunk_followed_by_done_without_blank_
     }
 
     # Some SSE implementations may emit consecutive data lines without an empty separator.
-    processor._process_line(ctx, sse_parser, f"data: {json.dumps(usage_chunk)}\n")
-    processor._process_line(ctx, sse_parser, "data: [DONE]\n")
-    processor._process_line(ctx, sse_parser, "\n")
+    _feed(processor, ctx, sse_parser, f"data: {json.dumps(usage_chunk)}\n".encode())
+    _feed(processor, ctx, sse_parser, b"data: [DONE]\n")
+    _feed(processor, ctx, sse_parser, b"\n")
 
     assert ctx.input_tokens == 7
     assert ctx.output_tokens == 3
@@ -5,9 +5,11 @@ from unittest.mock import AsyncMock
 import pytest
 
 from src.api.handlers.base.response_parser import ParsedResponse, ResponseParser, StreamStats
+from src.api.handlers.base import stream_processor
 from src.api.handlers.base.stream_context import StreamContext
 from src.api.handlers.base.stream_processor import StreamProcessor
-from src.core.api_format.conversion import register_default_normalizers
+from src.core.api_format.conversion import format_conversion_registry, register_default_normalizers
+from src.core.api_format.conversion.exceptions import FormatConversionError
 
 
 class DummyParser(ResponseParser):
@@ -102,3 +104,48 @@ async def test_create_response_stream_converts_claude_to_openai() -> None:
         for e in events
         if isinstance(e, dict)
     )
+
+
+@pytest.mark.asyncio
+async def test_unresolvable_transcoder_emits_conversion_error(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    register_default_normalizers()
+
+    def _unavailable(source: str, target: str) -> Any:
+        raise FormatConversionError(source, target, "normalizer 未注册")
+
+    monkeypatch.setattr(format_conversion_registry, "get_stream_transcoder", _unavailable)
+    warnings: list[str] = []
+    monkeypatch.setattr(stream_processor.logger, "warning", warnings.append)
+
+    ctx = StreamContext(model="test-model", api_format="openai:chat")
+    ctx.client_api_format = "openai:chat"
+    ctx.provider_api_format = "claude:chat"
+    ctx.needs_conversion = True
+
+    processor = StreamProcessor(request_id="test-request", default_parser=DummyParser())
+    response_ctx = AsyncMock()
+    response_ctx.__aexit__ = AsyncMock(return_value=None)
+    http_client = AsyncMock()
+    http_client.aclose = AsyncMock(return_value=None)
+
+    prefetched_chunks = [b'data: {"type": "ping"}\n', b"\n"]
+    out = b"".join(
+        [
+            chunk
+            async for chunk in processor.create_response_stream(
+                ctx,
+                byte_iterator=_empty_async_iter(),
+                response_ctx=response_ctx,
+                http_client=http_client,
+                prefetched_chunks=prefetched_chunks,
+            )
+        ]
+    )
+
+    assert ctx.status_code == 502
+    assert ctx.error_message == "format_conversion_failed"
+    assert b'"error"' in out
+    # 报出的是转码器解析时的原始错误，而不是对 None 调用 transcode 的 AttributeError
+    assert any("normalizer 未注册" in message for message in warnings)
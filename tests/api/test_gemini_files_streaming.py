@@ -0,0 +1,145 @@
+"""
+Gemini Files 上传/下载流式转发测试
+
+用本地替身上游（自定义 httpx transport，逐块读取请求体、逐块生成响应体）传输 64 MiB，
+以 tracemalloc 峰值证明单次传输的内存占用与文件大小无关。
+"""
+
+from __future__ import annotations
+
+import tracemalloc
+from collections.abc import AsyncIterator
+from typing import Any
+
+import httpx
+import pytest
+from starlette.requests import Request
+from starlette.responses import StreamingResponse
+
+from src.api.public import gemini_files
+from src.clients.http_client import HTTPClientPool
+
+CHUNK = 64 * 1024
+TOTAL = 64 * 1024 * 1024
+# 远小于 TOTAL：允许若干块在途与解析开销
+PEAK_LIMIT = 4 * 1024 * 1024
+
+
+class StandInUpstream(httpx.AsyncBaseTransport):
+    """边读边丢弃上传体；下载时按块生成响应体"""
+
+    def __init__(self) -> None:
+        self.received = 0
+        self.max_chunk = 0
+        self.request_headers: httpx.Headers | None = None
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.request_headers = request.headers
+        if request.method == "POST":
+            async for chunk in request.stream:  # type: ignore[union-attr]
+                self.received += len(chunk)
+                self.max_chunk = max(self.max_chunk, len(chunk))
+            return httpx.Response(
+                200,
+                json={"file": {"name": "files/abc", "mimeType": "video/mp4"}},
+                headers={"x-goog-upload-status": "final"},
+            )
+        return httpx.Response(
+            200,
+            headers={"content-type": "video/mp4", "content-length": str(TOTAL)},
+            stream=_ByteStream(),
+        )
+
+
+class _ByteStream(httpx.AsyncByteStream):
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        for _ in range(TOTAL // CHUNK):
+            yield b"v" * CHUNK
+
+
+def _upload_request() -> Request:
+    sent = 0
+
+    async def receive() -> dict[str, Any]:
+        nonlocal sent
+        sent += CHUNK
+        return {"type": "http.request", "body": b"u" * CHUNK, "more_body": sent < TOTAL}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/upload/v1beta/files",
+        "query_string": b"upload_id=xyz&upload_protocol=resumable",
+        "headers": [
+            (b"content-length", str(TOTAL).encode()),
+            (b"x-goog-upload-command", b"upload, finalize"),
+            (b"x-goog-upload-offset", b"0"),
+            (b"x-goog-api-key", b"client-key"),
+        ],
+    }
+    return Request(scope, receive)
+
+
+@pytest.mark.asyncio
+async def test_upload_streams_request_body(monkeypatch: pytest.MonkeyPatch) -> None:
+    upstream = StandInUpstream()
+    client = httpx.AsyncClient(transport=upstream)
+    ctx = gemini_files.UpstreamContext("upstream-key", "https://up.example", "pk1", "u1")
+    stored: list[str] = []
+
+    async def _ctx(_request: Request) -> gemini_files.UpstreamContext:
+        return ctx
+
+    async def _client() -> httpx.AsyncClient:
+        return client
+
+    async def _store(file_name: str, *_args: Any, **_kwargs: Any) -> None:
+        stored.append(file_name)
+
+    monkeypatch.setattr(gemini_files, "_resolve_upstream_context_standalone", _ctx)
+    monkeypatch.setattr(HTTPClientPool, "get_default_client_async", _client)
+    monkeypatch.setattr(gemini_files, "store_file_key_mapping", _store)
+
+    tracemalloc.start()
+    try:
+        response = await gemini_files.upload_file(_upload_request())
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        await client.aclose()
+
+    assert response.status_code == 200
+    assert upstream.received == TOTAL and upstream.max_chunk <= CHUNK
+    assert peak < PEAK_LIMIT
+    headers = upstream.request_headers
+    assert headers is not None
+    # 定长转发、保留可恢复上传头、替换认证
+    assert headers["content-length"] == str(TOTAL) and "transfer-encoding" not in headers
+    assert headers["x-goog-upload-command"] == "upload, finalize"
+    assert headers["x-goog-api-key"] == "upstream-key"
+    assert stored == ["files/abc"]
+
+
+@pytest.mark.asyncio
+async def test_download_streams_response_body(monkeypatch: pytest.MonkeyPatch) -> None:
+    upstream = StandInUpstream()
+    monkeypatch.setattr(
+        gemini_files, "_download_client", lambda: httpx.AsyncClient(transport=upstream)
+    )
+
+    tracemalloc.start()
+    try:
+        response = await gemini_files._stream_download("https://up.example/file", {})
+        assert isinstance(response, StreamingResponse)
+        received = max_chunk = 0
+        async for chunk in response.body_iterator:
+            received += len(chunk)
+            max_chunk = max(max_chunk, len(chunk))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert received == TOTAL and max_chunk <= CHUNK
+    assert peak < PEAK_LIMIT
+    assert response.headers["content-length"] == str(TOTAL)
+    assert response.media_type == "video/mp4"
@@ -0,0 +1,5 @@
+"""
+性能基准脚本（不参与 pytest 收集）
+
+运行方式: python -m tests.benchmarks.<bench_module>
+"""
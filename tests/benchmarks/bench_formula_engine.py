@@ -0,0 +1,112 @@
+"""
+计费公式求值基准：默认计费规则的求值吞吐
+
+使用 DefaultBillingRuleGenerator 生成的阶梯计费规则（tiered 单价 + computed *_cost 分量），
+对一批随机 token 用量逐一求值：
+
+- legacy：编译前的实现，每次求值逐节点解释 AST、computed 变量逐轮解析
+- compiled：FormulaEngine.evaluate()，按规则内容复用编译结果
+- batch：CompiledFormula.evaluate_batch()，列式批量求值（重新计费/回填场景）
+
+运行方式::
+
+    python -m tests.benchmarks.bench_formula_engine [--rows 20000] [--rounds 3]
+
+三种方式的结果逐行比对，不一致时报错退出。
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+from types import SimpleNamespace
+from typing import Any
+
+from src.services.billing.default_rules import DefaultBillingRuleGenerator
+from src.services.billing.formula_engine import FormulaEngine
+from tests.services.billing.test_formula_compiled import _legacy_evaluate
+
+
+def build_rule() -> Any:
+    global_model = SimpleNamespace(
+        name="bench-model",
+        default_price_per_request=None,
+        default_tiered_pricing={
+            "tiers": [
+                {"up_to": 200000, "input_price_per_1m": 3, "output_price_per_1m": 15},
+                {"up_to": None, "input_price_per_1m": 6, "output_price_per_1m": 22.5},
+            ]
+        },
+    )
+    return DefaultBillingRuleGenerator.generate_for_model(global_model=global_model)
+
+
+def build_rows(count: int, seed: int = 42) -> list[dict[str, Any]]:
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        input_tokens = rng.randint(0, 300000)
+        cache_read = rng.randint(0, 100000)
+        rows.append(
+            {
+                "input_tokens": input_tokens,
+                "output_tokens": rng.randint(0, 8000),
+                "cache_creation_tokens": rng.randint(0, 20000),
+                "cache_read_tokens": cache_read,
+                "total_input_context": input_tokens + cache_read,
+                "request_count": 1,
+            }
+        )
+    return rows
+
+
+def bench(rows: int, rounds: int) -> None:
+    rule = build_rule()
+    dims = build_rows(rows)
+    columns = {key: [row[key] for row in dims] for key in dims[0]}
+    engine = FormulaEngine()
+    kwargs = dict(
+        expression=rule.expression,
+        variables=rule.variables,
+        dimension_mappings=rule.dimension_mappings,
+    )
+
+    def legacy() -> list[Any]:
+        return [_legacy_evaluate(engine, dimensions=d, **kwargs).cost for d in dims]
+
+    def compiled() -> list[Any]:
+        return [engine.evaluate(dimensions=d, **kwargs).cost for d in dims]
+
+    def batch() -> list[Any]:
+        return [r.cost for r in engine.compile(**kwargs).evaluate_batch(columns)]
+
+    print(f"rows={rows} rounds={rounds} mappings={len(rule.dimension_mappings)}")
+    expected: list[Any] | None = None
+    baseline = 0.0
+    for name, fn in (("legacy", legacy), ("compiled", compiled), ("batch", batch)):
+        best = float("inf")
+        for _ in range(rounds):
+            started = time.perf_counter()
+            costs = fn()
+            best = min(best, time.perf_counter() - started)
+        if expected is None:
+            expected, baseline = costs, best
+        elif costs != expected:
+            raise SystemExit(f"{name}: results differ from legacy")
+        print(
+            f"  {name:<9} {best * 1000:9.1f} ms  {rows / best:10.0f} rows/s  "
+            f"x{baseline / best:5.2f}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+    bench(args.rows, args.rounds)
+
+
+if __name__ == "__main__":
+    main()
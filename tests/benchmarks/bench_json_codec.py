@@ -0,0 +1,173 @@
+"""
+JSON 编解码后端基准：每个请求的端到端代理开销
+
+对每个可用后端（orjson / msgspec / json）模拟一次完整请求经过的 JSON 热路径：
+请求体压缩入库（compress_json）、Claude -> OpenAI 流式转换（StreamProcessor）、
+Usage 事件序列化（UsageEvent.to_stream_fields）与缓存值编解码，输出每个请求的耗时。
+运行方式::
+
+    python -m tests.benchmarks.bench_json_codec [--requests 200] [--tokens 500]
+
+未安装的后端会被跳过（pip install orjson 或 msgspec 后重新运行即可对比）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+from typing import Any
+
+from src.api.handlers.base.parsers import get_parser_for_format
+from src.api.handlers.base.stream_context import StreamContext
+from src.api.handlers.base.stream_processor import StreamProcessor
+from src.core.api_format.conversion import register_default_normalizers
+from src.services.usage.events import UsageEventType, build_usage_event
+from src.utils import json_codec
+from src.utils.compression import compress_json, decompress_json
+
+
+class _DummyResponseCtx:
+    async def __aexit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        return None
+
+
+class _DummyHTTPClient:
+    async def aclose(self) -> None:
+        return None
+
+
+def build_request_body() -> dict[str, Any]:
+    return {
+        "model": "claude-bench",
+        "max_tokens": 1024,
+        "stream": True,
+        "system": "你是一个有帮助的助手。" * 20,
+        "messages": [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"第 {i} 轮消息 " * 40}
+            for i in range(12)
+        ],
+    }
+
+
+def build_claude_stream(tokens: int) -> bytes:
+    events: list[dict[str, Any]] = [
+        {
+            "type": "message_start",
+            "message": {"id": "msg_b", "model": "claude-bench", "usage": {"input_tokens": 900}},
+        },
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "text"}},
+    ]
+    events.extend(
+        {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "text_delta", "text": f" 词{i}"},
+        }
+        for i in range(tokens)
+    )
+    events.append({"type": "content_block_stop", "index": 0})
+    events.append(
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn"},
+            "usage": {"output_tokens": tokens},
+        }
+    )
+    events.append({"type": "message_stop"})
+    return b"".join(
+        f"event: {e['type']}\ndata: {json.dumps(e, ensure_ascii=False)}\n\n".encode()
+        for e in events
+    )
+
+
+def split_chunks(raw: bytes, size: int) -> list[bytes]:
+    return [raw[i : i + size] for i in range(0, len(raw), size)]
+
+
+async def _iter(chunks: list[bytes]) -> AsyncIterator[bytes]:
+    for c in chunks:
+        yield c
+
+
+async def run_request(body: dict[str, Any], chunks: list[bytes]) -> int:
+    # 1. 请求体压缩存储
+    compressed = compress_json(body)
+    assert decompress_json(compressed) is not None
+
+    # 2. 流式转换（Claude 上游 -> OpenAI 客户端）
+    ctx = StreamContext(model="bench", api_format="openai:chat")
+    ctx.provider_api_format = "claude:chat"
+    ctx.client_api_format = "openai:chat"
+    ctx.needs_conversion = True
+    processor = StreamProcessor(
+        request_id="bench",
+        default_parser=get_parser_for_format("claude:chat"),
+    )
+    total = 0
+    async for out in processor.create_response_stream(
+        ctx=ctx,
+        byte_iterator=_iter(chunks),
+        response_ctx=_DummyResponseCtx(),
+        http_client=_DummyHTTPClient(),  # type: ignore[arg-type]
+        prefetched_chunks=[],
+        start_time=None,
+    ):
+        total += len(out)
+
+    # 3. Usage 事件入队序列化 + 消费端解析
+    event = build_usage_event(
+        event_type=UsageEventType.COMPLETED,
+        request_id="bench",
+        data={"request_body": body, "input_tokens": 900, "output_tokens": ctx.output_tokens},
+    )
+    fields = event.to_stream_fields()
+    assert json_codec.loads(fields["payload"])["request_id"] == "bench"
+
+    # 4. 缓存值编解码（与 RedisCache.set/get 相同的调用）
+    cached = json_codec.dumpb({"provider_id": "p1", "endpoint_id": "e1", "key_id": "k1"})
+    json_codec.loads(cached)
+    return total
+
+
+async def bench(requests: int, tokens: int, chunk_size: int) -> None:
+    body = build_request_body()
+    chunks = split_chunks(build_claude_stream(tokens), chunk_size)
+    print(
+        f"{requests} requests, {tokens} tokens/stream, available: {json_codec.AVAILABLE_BACKENDS}"
+    )
+    results: dict[str, float] = {}
+    for name in json_codec.AVAILABLE_BACKENDS:
+        json_codec.set_backend(name)
+        await run_request(body, chunks)  # warmup
+        cpu0 = time.process_time()
+        for _ in range(requests):
+            await run_request(body, chunks)
+        results[name] = (time.process_time() - cpu0) / requests * 1000
+        print(f"  {name:<8} {results[name]:8.3f} ms CPU/request")
+    baseline = results.get("json")
+    if baseline:
+        for name, cost in results.items():
+            if name != "json":
+                print(f"  {name} vs json: {baseline / cost:.2f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=500)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    register_default_normalizers()
+    previous = json_codec.backend_name()
+    try:
+        asyncio.run(bench(args.requests, args.tokens, args.chunk_size))
+    finally:
+        json_codec.set_backend(previous)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+LocalCache A/B 基准：W-TinyLFU + 时间轮 vs 旧版 OrderedDict + asyncio.Lock
+
+按 read-through 模式（get 未命中则 set）回放键序列，对比命中率与每次操作的 CPU 耗时。
+键分布：
+- zipf：Zipf(s) 分布的热点键，键空间为容量的 10 倍
+- zipf+scan：在 zipf 流量中穿插一次性的顺序扫描键（模拟批量导出/遍历类请求）
+
+运行方式::
+
+    python -m tests.benchmarks.bench_local_cache [--ops 200000] [--capacity 1000] [--skew 0.9]
+
+每次未命中都意味着一次 Redis/数据库回源，--miss-penalty-us 用于折算每次查找的等效耗时
+（本地 CPU 开销 + 未命中率 x 回源耗时）。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import random
+import time
+from collections import OrderedDict
+from typing import Any
+
+from src.services.cache.backend import LocalCache
+
+
+class LegacyLocalCache:
+    """旧版实现（LRU + TTL + asyncio.Lock），仅作为对照组"""
+
+    def __init__(self, max_size: int = 1000, default_ttl: int = 300):
+        self._cache: OrderedDict = OrderedDict()
+        self._expiry: dict[str, float] = {}
+        self._max_size = max_size
+        self._default_ttl = default_ttl
+        self._lock = asyncio.Lock()
+
+    async def get(self, key: str) -> Any | None:
+        async with self._lock:
+            if key not in self._cache:
+                return None
+            if key in self._expiry and time.time() > self._expiry[key]:
+                del self._cache[key]
+                del self._expiry[key]
+                return None
+            self._cache.move_to_end(key)
+            return self._cache[key]
+
+    async def set(self, key: str, value: Any, ttl: int | None = None) -> None:
+        async with self._lock:
+            if ttl is None:
+                ttl = self._default_ttl
+            if key in self._cache:
+                self._cache.move_to_end(key)
+            self._cache[key] = value
+            self._expiry[key] = time.time() + ttl
+            if len(self._cache) > self._max_size:
+                oldest_key = next(iter(self._cache))
+                del self._cache[oldest_key]
+                if oldest_key in self._expiry:
+                    del self._expiry[oldest_key]
+
+
+def zipf_keys(ops: int, universe: int, skew: float, seed: int) -> list[str]:
+    rng = random.Random(seed)
+    weights = [1.0 / (rank + 1) ** skew for rank in range(universe)]
+    ids = rng.choices(range(universe), weights=weights, k=ops)
+    # 打散排名与键名的对应关系，避免热点集中在同一分片
+    names = [f"model:{rng.getrandbits(48):012x}" for _ in range(universe)]
+    return [names[i] for i in ids]
+
+
+def with_scans(keys: list[str], every: int, length: int) -> list[str]:
+    scan_ids = itertools.count()
+    out: list[str] = []
+    for i, key in enumerate(keys):
+        out.append(key)
+        if i % every == every - 1:
+            out.extend(f"scan:{next(scan_ids)}" for _ in range(length))
+    return out
+
+
+async def replay(cache: Any, keys: list[str], value: dict[str, Any]) -> tuple[float, float]:
+    hits = 0
+    cpu0 = time.process_time()
+    for key in keys:
+        if await cache.get(key) is not None:
+            hits += 1
+        else:
+            await cache.set(key, value)
+    elapsed = time.process_time() - cpu0
+    return hits / len(keys), elapsed / len(keys) * 1e9
+
+
+async def bench(ops: int, capacity: int, skew: float, miss_penalty_us: float) -> None:
+    value = {"provider_id": "p1", "endpoint_id": "e1", "key_id": "k1", "priority": 1}
+    base = zipf_keys(ops, capacity * 10, skew, seed=7)
+    workloads = {
+        "zipf": base,
+        "zipf+scan": with_scans(base, every=2000, length=capacity),
+    }
+    print(f"{ops} ops, capacity={capacity}, skew={skew}, miss penalty={miss_penalty_us}us")
+    for name, keys in workloads.items():
+        legacy_rate, legacy_ns = await replay(LegacyLocalCache(max_size=capacity), keys, value)
+        cache = LocalCache(max_size=capacity)
+        new_rate, new_ns = await replay(cache, keys, value)
+        print(f"  [{name}] {len(keys)} lookups")
+        for label, rate, ns in (("legacy", legacy_rate, legacy_ns), ("tinylfu", new_rate, new_ns)):
+            effective_us = ns / 1000 + (1 - rate) * miss_penalty_us
+            print(
+                f"    {label:<8} hit={rate:6.2%}  {ns:7.0f} ns/op  "
+                f"effective={effective_us:7.2f} us/lookup"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--capacity", type=int, default=1000)
+    parser.add_argument("--skew", type=float, default=0.9)
+    parser.add_argument("--miss-penalty-us", type=float, default=200.0)
+    args = parser.parse_args()
+    asyncio.run(bench(args.ops, args.capacity, args.skew, args.miss_penalty_us))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+滑动窗口限流 A/B 基准：双窗口计数器 vs 逐请求时间戳 deque
+
+对比三项：
+- 内存：单个热点键在窗口填满后的占用（tracemalloc）
+- 吞吐：每次 add_request 的 CPU 耗时（窗口填满后持续拒绝 + 过期清理）
+- 准确性：泊松到达（速率为限制的 --overload 倍）下，任意滑动窗口内的最大放行数
+  与总放行量相对精确滑动窗口的偏差
+
+运行方式::
+
+    python -m tests.benchmarks.bench_rate_limit [--limit 5000] [--ops 200000] [--overload 1.5]
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import time
+import tracemalloc
+from collections import deque
+from typing import Any
+
+from src.plugins.rate_limit.sliding_window import SlidingWindow
+from src.plugins.rate_limit.sliding_window_counter import WindowCounter
+
+WINDOW = 60
+
+
+def memory_per_key(factory: Any, fill: Any, limit: int) -> int:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    obj = factory()
+    fill(obj, limit)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del obj
+    return size
+
+
+def throughput(add: Any, ops: int) -> float:
+    cpu0 = time.process_time()
+    for _ in range(ops):
+        add()
+    return (time.process_time() - cpu0) / ops * 1e9
+
+
+def accuracy(limit: int, overload: float, seed: int) -> tuple[int, float]:
+    rng = random.Random(seed)
+    counter = WindowCounter(WINDOW, limit)
+    exact: deque[float] = deque()
+    admitted: deque[float] = deque()
+    exact_total = total = peak = 0
+    now = 0.0
+    for _ in range(limit * 20):
+        now += rng.expovariate(limit * overload / WINDOW)
+        if counter.add_request(now):
+            total += 1
+            admitted.append(now)
+            while admitted[0] <= now - WINDOW:
+                admitted.popleft()
+            peak = max(peak, len(admitted))
+        while exact and exact[0] <= now - WINDOW:
+            exact.popleft()
+        if len(exact) < limit:
+            exact.append(now)
+            exact_total += 1
+    return peak, (total - exact_total) / exact_total
+
+
+def bench(limit: int, ops: int, overload: float) -> None:
+    print(f"limit={limit}/{WINDOW}s, ops={ops}")
+
+    legacy_mem = memory_per_key(
+        lambda: SlidingWindow(WINDOW, limit), lambda w, n: w.add_request(n), limit
+    )
+    counter_mem = memory_per_key(
+        lambda: WindowCounter(WINDOW, limit),
+        lambda c, n: c.add_request(time.time(), n),
+        limit,
+    )
+    print(f"  memory per hot key: deque={legacy_mem:,} B  counter={counter_mem:,} B")
+
+    legacy = SlidingWindow(WINDOW, limit)
+    counter = WindowCounter(WINDOW, limit)
+    legacy_ns = throughput(lambda: legacy.add_request(1), ops)
+    counter_ns = throughput(lambda: counter.add_request(time.time(), 1), ops)
+    print(f"  add_request: deque={legacy_ns:7.0f} ns/op  counter={counter_ns:7.0f} ns/op")
+
+    peak, deviation = accuracy(limit, overload, seed=11)
+    print(
+        f"  accuracy @ {overload:.1f}x load: peak window={peak} ({peak / limit - 1:+.2%}), "
+        f"admitted vs exact={deviation:+.2%}"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--limit", type=int, default=5000)
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--overload", type=float, default=1.5)
+    args = parser.parse_args()
+    bench(args.limit, args.ops, args.overload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+SSE 解析器微基准：SSEEventParser（逐行 str）vs SSEByteParser（增量 bytes）
+
+每个场景在相同的分块输入上运行，输出吞吐（MB/s）与每个事件的耗时。运行方式::
+
+    python -m tests.benchmarks.bench_sse_parser [--events 20000] [--chunk-size 1024]
+"""
+
+from __future__ import annotations
+
+import argparse
+import codecs
+import json
+import time
+from collections.abc import Callable
+
+from src.utils.sse_parser import SSEByteParser, SSEEventParser
+
+
+def build_stream(events: int, *, crlf: bool = False) -> bytes:
+    nl = "\r\n" if crlf else "\n"
+    parts = []
+    for i in range(events):
+        payload = json.dumps(
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": f"第{i}个 token "},
+            },
+            ensure_ascii=False,
+        )
+        parts.append(f"event: content_block_delta{nl}data: {payload}{nl}{nl}")
+    return "".join(parts).encode("utf-8")
+
+
+def split_chunks(raw: bytes, size: int) -> list[bytes]:
+    return [raw[i : i + size] for i in range(0, len(raw), size)]
+
+
+def run_line_parser(chunks: list[bytes], *, read_data: bool) -> int:
+    """复刻 StreamProcessor 原有路径：bytes 拼接 + 增量解码 + 逐行 feed_line"""
+    parser = SSEEventParser()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buffer = b""
+    count = 0
+    for chunk in chunks:
+        buffer += chunk
+        while b"\n" in buffer:
+            line_bytes, buffer = buffer.split(b"\n", 1)
+            line = decoder.decode(line_bytes + b"\n", False).rstrip("\r\n")
+            for event in parser.feed_line(line):
+                if read_data:
+                    json.loads(event["data"] or "")
+                count += 1
+    return count
+
+
+def run_byte_parser(chunks: list[bytes], *, read_data: bool) -> int:
+    parser = SSEByteParser()
+    count = 0
+    for chunk in chunks:
+        for event in parser.feed(chunk):
+            if read_data:
+                event.json()
+            count += 1
+    return count
+
+
+def bench(label: str, fn: Callable[[], int], size: int, repeat: int) -> float:
+    fn()  # warmup
+    best = float("inf")
+    events = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        events = fn()
+        best = min(best, time.perf_counter() - t0)
+    print(f"  {label:<28} {size / best / 1e6:8.1f} MB/s  {best / events * 1e9:8.0f} ns/event")
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    for crlf in (False, True):
+        raw = build_stream(args.events, crlf=crlf)
+        chunks = split_chunks(raw, args.chunk_size)
+        print(
+            f"\n{'CRLF' if crlf else 'LF'}: {len(raw) / 1e6:.2f} MB, "
+            f"{args.events} events, {len(chunks)} chunks"
+        )
+        for read_data in (False, True):
+            suffix = "+json" if read_data else "event-only"
+            base = bench(
+                f"SSEEventParser {suffix}",
+                lambda: run_line_parser(chunks, read_data=read_data),
+                len(raw),
+                args.repeat,
+            )
+            fast = bench(
+                f"SSEByteParser {suffix}",
+                lambda: run_byte_parser(chunks, read_data=read_data),
+                len(raw),
+                args.repeat,
+            )
+            print(f"  speedup: {base / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
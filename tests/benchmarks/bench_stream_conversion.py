@@ -0,0 +1,121 @@
+"""
+流式格式转换基准：convert_stream_chunk + 逐事件 json.dumps vs StreamTranscoder
+
+模拟长流式响应的逐 token 转换开销（包含上游行的 json.loads 与 SSE 编码），
+输出每个 token 的耗时。运行方式::
+
+    python -m tests.benchmarks.bench_stream_conversion [--tokens 20000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+from typing import Any
+
+from src.core.api_format.conversion import format_conversion_registry, register_default_normalizers
+from src.core.api_format.conversion.stream_state import StreamState
+
+
+def claude_lines(tokens: int) -> list[str]:
+    events: list[dict[str, Any]] = [
+        {"type": "message_start", "message": {"id": "msg_b", "model": "claude-bench"}},
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "text"}},
+    ]
+    events.extend(
+        {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "text_delta", "text": f" t{i}"},
+        }
+        for i in range(tokens)
+    )
+    events.append({"type": "content_block_stop", "index": 0})
+    events.append(
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": "end_turn"},
+            "usage": {"output_tokens": 1},
+        }
+    )
+    events.append({"type": "message_stop"})
+    return [json.dumps(e) for e in events]
+
+
+def gemini_lines(tokens: int) -> list[str]:
+    lines = [
+        json.dumps({"candidates": [{"content": {"parts": [{"text": f" t{i}"}], "role": "model"}}]})
+        for i in range(tokens)
+    ]
+    lines.append(
+        json.dumps(
+            {
+                "candidates": [{"content": {"parts": [{"text": "."}]}, "finishReason": "STOP"}],
+                "usageMetadata": {"promptTokenCount": 10, "candidatesTokenCount": tokens},
+            }
+        )
+    )
+    return lines
+
+
+def _format_sse_event(evt: dict[str, Any], claude: bool) -> bytes:
+    """复刻 StreamProcessor 原有的逐事件 SSE 编码"""
+    if claude:
+        event_type = evt.get("type", "")
+        if event_type:
+            return f"event: {event_type}\ndata: {json.dumps(evt, ensure_ascii=False)}\n\n".encode()
+    return f"data: {json.dumps(evt, ensure_ascii=False)}\n\n".encode()
+
+
+def run_legacy(lines: list[str], source: str, target: str) -> int:
+    state = StreamState(model="bench", message_id="req")
+    claude = target.startswith("claude")
+    total = 0
+    for line in lines:
+        for evt in format_conversion_registry.convert_stream_chunk(
+            json.loads(line), source, target, state=state
+        ):
+            total += len(_format_sse_event(evt, claude))
+    return total
+
+
+def run_transcoder(lines: list[str], source: str, target: str) -> int:
+    state = StreamState(model="bench", message_id="req")
+    transcoder = format_conversion_registry.get_stream_transcoder(source, target)
+    total = 0
+    for line in lines:
+        for item in transcoder.transcode(json.loads(line), state):
+            total += len(item.payload)
+    return total
+
+
+def bench(source: str, target: str, lines: list[str], repeat: int) -> None:
+    print(f"\n{source} -> {target}: {len(lines)} upstream events")
+    results = {}
+    for label, fn in (("legacy", run_legacy), ("transcoder", run_transcoder)):
+        fn(lines, source, target)  # warmup
+        best = float("inf")
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn(lines, source, target)
+            best = min(best, time.perf_counter() - t0)
+        results[label] = best
+        print(f"  {label:<12} {best / len(lines) * 1e6:8.2f} us/token")
+    print(f"  speedup: {results['legacy'] / results['transcoder']:.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    register_default_normalizers()
+    bench("claude:chat", "openai:chat", claude_lines(args.tokens), args.repeat)
+    bench("gemini:chat", "claude:chat", gemini_lines(args.tokens), args.repeat)
+    bench("gemini:chat", "openai:chat", gemini_lines(args.tokens), args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+StreamProcessor 同格式流基准：字节级透传 vs 逐行解析
+
+对比 create_response_stream 在 needs_conversion=False 时两条路径的吞吐（MB/s）
+与每个流的 CPU 耗时。运行方式::
+
+    python -m tests.benchmarks.bench_stream_passthrough [--streams 200] [--tokens 2000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+
+from src.api.handlers.base.parsers import get_parser_for_format
+from src.api.handlers.base.stream_context import StreamContext
+from src.api.handlers.base.stream_processor import StreamProcessor
+
+
+class _DummyResponseCtx:
+    async def __aexit__(self, exc_type, exc, tb) -> None:  # noqa: ANN001
+        return None
+
+
+class _DummyHTTPClient:
+    async def aclose(self) -> None:
+        return None
+
+
+def build_claude_stream(tokens: int) -> bytes:
+    parts = [
+        'event: message_start\ndata: {"type":"message_start","message":{"id":"msg_1",'
+        '"model":"claude-bench","usage":{"input_tokens":1200,"output_tokens":1}}}\n\n'
+    ]
+    for i in range(tokens):
+        delta = json.dumps(
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "text_delta", "text": f" token{i}"},
+            }
+        )
+        parts.append(f"event: content_block_delta\ndata: {delta}\n\n")
+    parts.append(
+        'event: message_delta\ndata: {"type":"message_delta","delta":{"stop_reason":"end_turn"},'
+        f'"usage":{{"output_tokens":{tokens}}}}}\n\n'
+    )
+    parts.append('event: message_stop\ndata: {"type":"message_stop"}\n\n')
+    return "".join(parts).encode("utf-8")
+
+
+def build_openai_stream(tokens: int) -> bytes:
+    parts = []
+    for i in range(tokens):
+        chunk = {
+            "id": "chatcmpl_bench",
+            "object": "chat.completion.chunk",
+            "choices": [{"index": 0, "delta": {"content": f" token{i}"}, "finish_reason": None}],
+        }
+        parts.append(f"data: {json.dumps(chunk)}\n\n")
+    parts.append(
+        'data: {"id":"chatcmpl_bench","choices":[{"index":0,"delta":{},"finish_reason":"stop"}],'
+        f'"usage":{{"prompt_tokens":1200,"completion_tokens":{tokens}}}}}\n\n'
+    )
+    parts.append("data: [DONE]\n\n")
+    return "".join(parts).encode("utf-8")
+
+
+def split_chunks(raw: bytes, size: int) -> list[bytes]:
+    return [raw[i : i + size] for i in range(0, len(raw), size)]
+
+
+async def _iter(chunks: list[bytes]) -> AsyncIterator[bytes]:
+    for c in chunks:
+        yield c
+
+
+async def run_stream(chunks: list[bytes], api_format: str, *, passthrough: bool) -> int:
+    ctx = StreamContext(model="bench", api_format=api_format)
+    ctx.provider_api_format = api_format
+    ctx.client_api_format = api_format
+    # record_parsed_chunks=True 会强制走逐行解析路径
+    ctx.record_parsed_chunks = not passthrough
+    processor = StreamProcessor(
+        request_id="bench",
+        default_parser=get_parser_for_format(api_format),
+    )
+    total = 0
+    async for out in processor.create_response_stream(
+        ctx=ctx,
+        byte_iterator=_iter(chunks),
+        response_ctx=_DummyResponseCtx(),
+        http_client=_DummyHTTPClient(),  # type: ignore[arg-type]
+        prefetched_chunks=[],
+        start_time=None,
+    ):
+        total += len(out)
+    assert ctx.output_tokens > 0
+    return total
+
+
+async def bench(api_format: str, raw: bytes, streams: int, chunk_size: int) -> None:
+    chunks = split_chunks(raw, chunk_size)
+    print(f"\n{api_format}: {len(raw) / 1024:.1f} KiB/stream, {len(chunks)} chunks/stream")
+    results: dict[str, tuple[float, float]] = {}
+    for label, passthrough in (("line-parse", False), ("passthrough", True)):
+        await run_stream(chunks, api_format, passthrough=passthrough)  # warmup
+        wall0, cpu0 = time.perf_counter(), time.process_time()
+        total = 0
+        for _ in range(streams):
+            total += await run_stream(chunks, api_format, passthrough=passthrough)
+        wall = time.perf_counter() - wall0
+        cpu = time.process_time() - cpu0
+        results[label] = (total / wall / 1e6, cpu / streams * 1000)
+        print(
+            f"  {label:<12} {results[label][0]:8.1f} MB/s  "
+            f"{results[label][1]:8.3f} ms CPU/stream"
+        )
+    base, fast = results["line-parse"], results["passthrough"]
+    print(f"  speedup: {fast[0] / base[0]:.1f}x throughput, {base[1] / fast[1]:.1f}x less CPU")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=1024)
+    args = parser.parse_args()
+
+    asyncio.run(
+        bench("claude:chat", build_claude_stream(args.tokens), args.streams, args.chunk_size)
+    )
+    asyncio.run(
+        bench("openai:chat", build_openai_stream(args.tokens), args.streams, args.chunk_size)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+StreamUsageTracker 长流基准：输出累积的 CPU 与内存
+
+模拟一个逐 token 返回的 Claude 流（每个 delta 一个 chunk），对比：
+
+- legacy：完整保存全部原始块 / 解析块 / 输出文本，并在每个 chunk 后对整段输出重新计数
+- capped：增量解码 + 追加式缓冲，超出 STREAM_CAPTURE_* 上限后只保留头部和末尾，token 滚动累加
+
+输出每种方式的总耗时与 tracemalloc 峰值内存。运行方式::
+
+    python -m tests.benchmarks.bench_stream_usage_tracker [--tokens 2000 5000] [--skip-legacy]
+
+legacy 的耗时随输出长度平方增长，tokens 较大时可加 --skip-legacy 只看 capped。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+import tracemalloc
+from collections.abc import AsyncIterator
+from typing import Any
+
+from src.services.usage.stream import CappedTextBuffer, EnhancedStreamUsageTracker
+
+
+class LegacyTracker(EnhancedStreamUsageTracker):
+    """复现改造前的累积方式：不设上限，每个 chunk 后对整段输出重新计数"""
+
+    @staticmethod
+    def _new_text_buffer(initial: str = "") -> CappedTextBuffer:
+        return CappedTextBuffer(1 << 62, 0, initial)
+
+    def _capture_raw_chunk(self, chunk: bytes | str) -> None:
+        self.raw_chunk_count += 1
+        self.raw_chunks.append(chunk)
+
+    def _capture_response_chunk(self, data: dict[str, Any]) -> None:
+        self.total_chunk_count += 1
+        self.response_chunks.append(data)
+
+    def count_tokens(self, text: str) -> int:
+        if not self._content:
+            return super().count_tokens(text)
+        # 返回差值，使 output_tokens 等于对整段输出的重新计数
+        return super().count_tokens(self.accumulated_content) - self._content_tokens
+
+
+def build_chunks(tokens: int) -> list[bytes]:
+    start = {
+        "type": "content_block_start",
+        "index": 0,
+        "content_block": {"type": "text", "text": ""},
+    }
+    chunks = [f"event: content_block_start\ndata: {json.dumps(start)}\n\n".encode()]
+    for i in range(tokens):
+        payload = {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "text_delta", "text": f" 第{i}个 token"},
+        }
+        data = json.dumps(payload, ensure_ascii=False)
+        chunks.append(f"event: content_block_delta\ndata: {data}\n\n".encode())
+    return chunks
+
+
+async def _iter(chunks: list[bytes]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield chunk
+
+
+async def run(cls: type[EnhancedStreamUsageTracker], chunks: list[bytes]) -> int:
+    tracker = cls(None, None, None, "anthropic", "claude-bench", api_format="claude:chat")  # type: ignore[arg-type]
+
+    async def _skip_record() -> None:
+        return None
+
+    tracker._record_usage = _skip_record  # type: ignore[method-assign]
+    async for _ in tracker.track_stream(_iter(chunks), {"messages": []}):  # type: ignore[arg-type]
+        pass
+    return tracker.output_tokens
+
+
+def measure(cls: type[EnhancedStreamUsageTracker], chunks: list[bytes]) -> tuple[float, int]:
+    started = time.perf_counter()
+    asyncio.run(run(cls, chunks))
+    elapsed = time.perf_counter() - started
+
+    tracemalloc.start()
+    asyncio.run(run(cls, chunks))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def bench(token_counts: list[int], skip_legacy: bool) -> None:
+    variants: list[tuple[str, type[EnhancedStreamUsageTracker]]] = [
+        ("capped", EnhancedStreamUsageTracker)
+    ]
+    if not skip_legacy:
+        variants.insert(0, ("legacy", LegacyTracker))
+    for tokens in token_counts:
+        chunks = build_chunks(tokens)
+        stream_bytes = sum(len(chunk) for chunk in chunks)
+        print(f"tokens={tokens} stream={stream_bytes / 1024 / 1024:.1f} MB")
+        for label, cls in variants:
+            elapsed, peak = measure(cls, chunks)
+            print(
+                f"  {label:<7} {elapsed:8.3f} s  {elapsed / tokens * 1e6:7.1f} us/chunk  "
+                f"peak {peak / 1024 / 1024:7.2f} MB"
+            )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, nargs="+", default=[2000, 5000])
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+    bench(args.tokens, args.skip_legacy)
+
+
+if __name__ == "__main__":
+    main()
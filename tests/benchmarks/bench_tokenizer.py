@@ -0,0 +1,123 @@
+"""
+分词服务基准：Token 计数对事件循环的阻塞
+
+模拟若干并发会话的多轮对话，每一轮都对完整消息历史计数（count_tokens 端点的典型调用方式），
+同时运行一个 1ms 心跳协程测量事件循环延迟：
+
+- inline：原实现，每次在事件循环上对整段历史同步分词
+- service：共享分词服务，历史前缀命中缓存只分词新增尾部，大输入卸载到进程池
+
+运行方式::
+
+    python -m tests.benchmarks.bench_tokenizer [--sessions 8] [--turns 20] [--turn-chars 6000]
+
+编码文件无法下载时两种方式都使用估算分词，对比结论不变。
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from typing import Any
+
+from src.services.usage.tokenizer import (
+    TokenizerService,
+    count_text_sync,
+    encoding_for_model,
+    get_encoder,
+    message_tokens,
+    preload_encoders,
+)
+
+MODEL = "gpt-4o"
+
+
+def build_turn(session: int, turn: int, chars: int) -> dict[str, Any]:
+    role = "user" if turn % 2 == 0 else "assistant"
+    unit = f"会话 {session} 第 {turn} 轮 tokens and words mixed 内容 "
+    return {"role": role, "content": (unit * (chars // len(unit) + 1))[:chars]}
+
+
+def count_inline(messages: list[dict[str, Any]]) -> int:
+    return (
+        sum(
+            message_tokens(lambda text: count_text_sync(text, MODEL), message, 3)
+            for message in messages
+        )
+        + 3
+    )
+
+
+async def _heartbeat(stop: asyncio.Event, lags: list[float]) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(0.001)
+        lags.append((loop.time() - started - 0.001) * 1000)
+
+
+async def run(mode: str, sessions: int, turns: int, turn_chars: int) -> dict[str, float]:
+    service = TokenizerService() if mode == "service" else None
+    if service is not None:
+        # 预热进程池，避免把子进程启动时间计入
+        await service.count_text("warmup " * (service.offload_chars // 7 + 1), MODEL)
+
+    stop = asyncio.Event()
+    lags: list[float] = []
+    heartbeat = asyncio.create_task(_heartbeat(stop, lags))
+
+    async def conversation(session: int) -> None:
+        history: list[dict[str, Any]] = []
+        for turn in range(turns):
+            history.append(build_turn(session, turn, turn_chars))
+            if service is None:
+                count_inline(history)
+            else:
+                await service.count_messages(history, MODEL)
+            # 每轮对应一个独立请求，请求之间让出事件循环
+            await asyncio.sleep(0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(conversation(i) for i in range(sessions)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await heartbeat
+    if service is not None:
+        service.shutdown()
+
+    lags.sort()
+    return {
+        "elapsed_s": elapsed,
+        "max_lag_ms": lags[-1] if lags else 0.0,
+        "p99_lag_ms": lags[int(len(lags) * 0.99)] if lags else 0.0,
+    }
+
+
+async def bench(sessions: int, turns: int, turn_chars: int) -> None:
+    encoding = encoding_for_model(MODEL)
+    preload_encoders([encoding])
+    backend = encoding if get_encoder(encoding) is not None else "estimate"
+    print(
+        f"sessions={sessions} turns={turns} turn_chars={turn_chars} "
+        f"history_chars={turns * turn_chars} backend={backend}"
+    )
+    for mode in ("inline", "service"):
+        result = await run(mode, sessions, turns, turn_chars)
+        print(
+            f"  {mode:<8} total {result['elapsed_s']:7.3f} s  "
+            f"loop lag max {result['max_lag_ms']:8.2f} ms  p99 {result['p99_lag_ms']:8.2f} ms"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=8)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--turn-chars", type=int, default=6000)
+    args = parser.parse_args()
+    asyncio.run(bench(args.sessions, args.turns, args.turn_chars))
+
+
+if __name__ == "__main__":
+    main()
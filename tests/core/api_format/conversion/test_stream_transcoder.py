@@ -0,0 +1,162 @@
+"""
+StreamTranscoder 单元测试
+
+覆盖重点：
+- 快速路径（文本增量模板拼接）输出与逐事件 dict 构造 + 序列化的结果逐字节一致
+- thinking 块、特殊字符、格式对缓存与未注册格式的错误
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from typing import Any
+
+import pytest
+
+from src.core.api_format.conversion.exceptions import FormatConversionError
+from src.core.api_format.conversion.normalizers.claude import ClaudeNormalizer
+from src.core.api_format.conversion.normalizers.gemini import GeminiNormalizer
+from src.core.api_format.conversion.normalizers.openai import OpenAINormalizer
+from src.core.api_format.conversion.registry import FormatConversionRegistry
+from src.core.api_format.conversion.stream_state import StreamState
+
+_TRICKY_TEXTS = ["Hello", ' "quoted" ', "换行\n和\t制表", "emoji 🎉", "\\u0000 literal", "</s>"]
+
+
+def _make_registry() -> FormatConversionRegistry:
+    reg = FormatConversionRegistry()
+    reg.register(OpenAINormalizer())
+    reg.register(ClaudeNormalizer())
+    reg.register(GeminiNormalizer())
+    return reg
+
+
+def _claude_chunks() -> list[dict[str, Any]]:
+    chunks: list[dict[str, Any]] = [
+        {
+            "type": "message_start",
+            "message": {"id": "msg_1", "model": "claude-x", "usage": {"input_tokens": 5}},
+        },
+        {"type": "content_block_start", "index": 0, "content_block": {"type": "thinking"}},
+        {
+            "type": "content_block_delta",
+            "index": 0,
+            "delta": {"type": "thinking_delta", "thinking": "let me think"},
+        },
+        {"type": "content_block_stop", "index": 0},
+        {"type": "content_block_start", "index": 1, "content_block": {"type": "text"}},
+    ]
+    for text in _TRICKY_TEXTS:
+        chunks.append(
+            {
+                "type": "content_block_delta",
+                "index": 1,
+                "delta": {"type": "text_delta", "text": text},
+            }
+        )
+    chunks.extend(
+        [
+            {"type": "content_block_stop", "index": 1},
+            {
+                "type": "message_delta",
+                "delta": {"stop_reason": "end_turn"},
+                "usage": {"output_tokens": 9},
+            },
+            {"type": "message_stop"},
+        ]
+    )
+    return chunks
+
+
+def _gemini_chunks() -> list[dict[str, Any]]:
+    chunks: list[dict[str, Any]] = [
+        {"candidates": [{"content": {"parts": [{"text": "hmm", "thought": True}]}}]}
+    ]
+    for text in _TRICKY_TEXTS:
+        chunks.append({"candidates": [{"content": {"parts": [{"text": text}], "role": "model"}}]})
+    chunks.append(
+        {
+            "candidates": [{"content": {"parts": [{"text": "!"}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 3, "candidatesTokenCount": 7},
+        }
+    )
+    return chunks
+
+
+def _run(
+    reg: FormatConversionRegistry,
+    source: str,
+    target: str,
+    chunks: list[dict[str, Any]],
+    *,
+    materialize: bool,
+) -> list[bytes]:
+    transcoder = reg.get_stream_transcoder(source, target)
+    state = StreamState(model="client-model", message_id="req_1")
+    out: list[bytes] = []
+    for chunk in chunks:
+        out.extend(
+            item.payload for item in transcoder.transcode(chunk, state, materialize=materialize)
+        )
+    return out
+
+
+@pytest.mark.parametrize(
+    "source, target, chunks",
+    [
+        ("claude:chat", "openai:chat", _claude_chunks()),
+        ("gemini:chat", "claude:chat", _gemini_chunks()),
+        ("gemini:chat", "openai:chat", _gemini_chunks()),
+        ("openai:chat", "claude:chat", None),
+    ],
+)
+def test_fast_path_is_byte_identical_to_dict_path(
+    monkeypatch: pytest.MonkeyPatch,
+    source: str,
+    target: str,
+    chunks: list[dict[str, Any]] | None,
+) -> None:
+    monkeypatch.setattr(time, "time", lambda: 1_700_000_000.0)
+    reg = _make_registry()
+    if chunks is None:
+        # OpenAI 源：先把 Claude 流转成 OpenAI chunk，再转回 Claude
+        chunks = [
+            json.loads(p[len(b"data: ") :])
+            for p in _run(reg, "claude:chat", "openai:chat", _claude_chunks(), materialize=True)
+        ]
+
+    fast = _run(reg, source, target, chunks, materialize=False)
+    slow = _run(reg, source, target, chunks, materialize=True)
+    assert fast == slow
+
+    # 快速路径确实生效：至少有一个事件未构造 dict
+    transcoder = reg.get_stream_transcoder(source, target)
+    state = StreamState(model="client-model", message_id="req_1")
+    items = [i for c in chunks for i in transcoder.transcode(c, state)]
+    assert any(i.data is None for i in items)
+
+
+def test_transcode_matches_convert_stream_chunk() -> None:
+    reg = _make_registry()
+    chunks = _claude_chunks()
+    transcoder = reg.get_stream_transcoder("claude:chat", "openai:chat")
+    state_a = StreamState(model="m", message_id="id")
+    state_b = StreamState(model="m", message_id="id")
+    for chunk in chunks:
+        converted = reg.convert_stream_chunk(chunk, "claude:chat", "openai:chat", state=state_a)
+        items = transcoder.transcode(chunk, state_b, materialize=True)
+        assert [i.data for i in items] == converted
+
+
+def test_transcoder_is_cached_per_format_pair() -> None:
+    reg = _make_registry()
+    a = reg.get_stream_transcoder("claude:chat", "openai:chat")
+    assert reg.get_stream_transcoder("CLAUDE:CHAT", "OPENAI:CHAT") is a
+    assert reg.get_stream_transcoder("claude:chat", "claude:chat").is_identity is True
+
+
+def test_unregistered_format_raises() -> None:
+    reg = _make_registry()
+    with pytest.raises(FormatConversionError):
+        reg.get_stream_transcoder("claude:chat", "unknown:chat")
@@ -1,5 +1,8 @@
 from unittest.mock import MagicMock
 
+import pytest
+
+from src.config.settings import config
 from src.models.database import GlobalModel, Model
 from src.services.billing.default_rules import DefaultBillingRuleGenerator
 from src.services.billing.formula_engine import FormulaEngine
@@ -144,6 +147,11 @@ class TestDefaultBillingRuleGenerator:
 
 
 class TestBillingRuleServiceDefaultFallback:
+    @pytest.fixture(autouse=True)
+    def _per_query_path(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        # 覆盖未启用价格快照时的逐次查询路径（快照路径见 test_pricing_snapshot.py）
+        monkeypatch.setattr(config, "pricing_snapshot_enabled", False)
+
     def test_find_rule_returns_default_for_chat_when_no_db_rule(self) -> None:
         from src.services.billing.cache import BillingCache
 
@@ -0,0 +1,426 @@
+"""
+编译求值与逐节点解释求值的等价性测试
+
+参照实现为编译前的 FormulaEngine.evaluate（AST 逐节点解释 + computed 变量逐轮解析），
+对随机生成的规则（dimension/matrix/tiered/constant/computed 映射、required/default、
+乱序依赖、循环依赖、维度同名遮蔽、除零/非整数幂等错误）和维度逐一比对结果；
+evaluate_batch() 与逐行 evaluate() 比对。
+"""
+
+from __future__ import annotations
+
+import ast
+import random
+from decimal import Decimal
+from typing import Any
+
+import pytest
+
+from src.services.billing.formula_engine import (
+    BillingIncompleteError,
+    ExpressionEvaluationError,
+    FormulaEngine,
+    FormulaEvaluationResult,
+    SafeExpressionEvaluator,
+    UnsafeExpressionError,
+    _decimal_context,
+)
+from src.services.billing.precision import DECIMAL_CONTEXT_PRECISION, to_decimal
+
+# ---------- 参照实现 ----------
+
+
+def _legacy_eval_decimal(
+    node: ast.AST, variables: dict[str, Any], funcs: dict[str, Any]
+) -> Decimal:
+    if isinstance(node, ast.Constant):
+        return to_decimal(node.value)
+    if isinstance(node, ast.Name):
+        if node.id not in variables:
+            raise NameError(node.id)
+        return to_decimal(variables[node.id])
+    if isinstance(node, ast.UnaryOp):
+        v = _legacy_eval_decimal(node.operand, variables, funcs)
+        return v if isinstance(node.op, ast.UAdd) else -v
+    if isinstance(node, ast.BinOp):
+        left = _legacy_eval_decimal(node.left, variables, funcs)
+        right = _legacy_eval_decimal(node.right, variables, funcs)
+        if isinstance(node.op, ast.Add):
+            return left + right
+        if isinstance(node.op, ast.Sub):
+            return left - right
+        if isinstance(node.op, ast.Mult):
+            return left * right
+        if isinstance(node.op, ast.Div):
+            return left / right
+        if isinstance(node.op, ast.FloorDiv):
+            return left // right
+        if isinstance(node.op, ast.Mod):
+            return left % right
+        try:
+            exp_int = int(right)
+            if to_decimal(exp_int) != right:
+                raise ValueError("non-integer exponent")
+        except Exception as exc:
+            raise ExpressionEvaluationError("Pow only supports integer exponents") from exc
+        return left**exp_int
+    assert isinstance(node, ast.Call) and isinstance(node.func, ast.Name)
+    func = funcs[node.func.id]
+    args = [_legacy_eval_decimal(a, variables, funcs) for a in node.args]
+    kwargs = {kw.arg: _legacy_eval_decimal(kw.value, variables, funcs) for kw in node.keywords}
+    try:
+        result = func(*args, **kwargs)
+    except Exception as exc:
+        raise ExpressionEvaluationError(str(exc)) from exc
+    return to_decimal(result)
+
+
+def _legacy_eval(expression: str, variables: dict[str, Any]) -> Decimal:
+    evaluator = SafeExpressionEvaluator()
+    tree = evaluator.validate(expression)
+    try:
+        with _decimal_context(DECIMAL_CONTEXT_PRECISION):
+            return _legacy_eval_decimal(tree.body, variables, evaluator.ALLOWED_FUNCS)
+    except (NameError, ExpressionEvaluationError):
+        raise
+    except Exception as exc:
+        raise ExpressionEvaluationError(str(exc)) from exc
+
+
+def _legacy_try_computed(
+    mapping: dict[str, Any], dims: dict[str, Any], resolved: dict[str, Any]
+) -> tuple[Any, str]:
+    required = bool(mapping.get("required", False))
+    default = mapping.get("default", 0)
+    expr = mapping.get("expression") or mapping.get("transform_expression")
+    if not expr:
+        return (None, "missing_required") if required else (default, "ok")
+    try:
+        return _legacy_eval(str(expr), {**dims, **resolved}), "ok"
+    except NameError:
+        return (None, "pending") if required else (default, "pending")
+    except Exception:
+        return (None, "missing_required") if required else (default, "ok")
+
+
+def _legacy_evaluate(
+    engine: FormulaEngine,
+    *,
+    expression: str,
+    variables: dict[str, Any] | None,
+    dimensions: dict[str, Any] | None,
+    dimension_mappings: dict[str, dict[str, Any]] | None,
+    strict_mode: bool = False,
+) -> FormulaEvaluationResult:
+    dims = dimensions or {}
+    resolved: dict[str, Any] = dict(variables or {})
+    missing_required: list[str] = []
+    tier_index = None
+    tier_info = None
+    computed: dict[str, dict[str, Any]] = {}
+
+    for var_name, mapping in (dimension_mappings or {}).items():
+        source = (mapping.get("source") or "constant").lower()
+        if source == "computed":
+            computed[var_name] = mapping
+            continue
+        if source == "constant" and var_name in resolved:
+            continue
+        value, is_missing, tier_meta = engine._resolve_mapping(var_name, mapping, dims)
+        if tier_meta and tier_index is None:
+            tier_index = tier_meta.get("tier_index")
+            tier_info = tier_meta.get("tier_info")
+        if is_missing:
+            missing_required.append(var_name)
+            continue
+        resolved[var_name] = value
+
+    if computed:
+        unresolved = dict(computed)
+        for _ in range(max(4, len(unresolved) + 1)):
+            progressed = False
+            for var_name, mapping in list(unresolved.items()):
+                if var_name in resolved:
+                    unresolved.pop(var_name, None)
+                    continue
+                value, status = _legacy_try_computed(mapping, dims, resolved)
+                if status == "pending":
+                    continue
+                unresolved.pop(var_name, None)
+                if status == "missing_required":
+                    missing_required.append(var_name)
+                    continue
+                resolved[var_name] = value
+                progressed = True
+            if not progressed:
+                break
+        for var_name, mapping in unresolved.items():
+            if mapping.get("required", False):
+                missing_required.append(var_name)
+            else:
+                resolved[var_name] = mapping.get("default", 0)
+
+    common = dict(
+        resolved_dimensions=dims,
+        resolved_variables=resolved,
+        tier_index=tier_index,
+        tier_info=tier_info,
+    )
+    if missing_required:
+        if strict_mode:
+            raise BillingIncompleteError(
+                f"Missing required dimensions: {missing_required}",
+                missing_required=missing_required,
+            )
+        return FormulaEvaluationResult(
+            status="incomplete", cost=Decimal("0"), missing_required=missing_required, **common
+        )
+    try:
+        cost = _legacy_eval(expression, resolved)
+    except NameError as exc:
+        if strict_mode:
+            raise ExpressionEvaluationError(f"Missing variable: {exc}") from exc
+        return FormulaEvaluationResult(
+            status="incomplete", cost=Decimal("0"), error=f"missing_variable:{exc}", **common
+        )
+    except (UnsafeExpressionError, ExpressionEvaluationError) as exc:
+        if strict_mode:
+            raise
+        return FormulaEvaluationResult(
+            status="incomplete", cost=Decimal("0"), error=str(exc), **common
+        )
+    if cost < 0:
+        return FormulaEvaluationResult(
+            status="incomplete", cost=Decimal("0"), error="negative_cost", **common
+        )
+    return FormulaEvaluationResult(
+        status="complete",
+        cost=cost,
+        cost_breakdown=engine._extract_cost_breakdown(resolved),
+        **common,
+    )
+
+
+# ---------- 随机规则 ----------
+
+DIM_NAMES = ["input_tokens", "output_tokens", "cache_tokens", "duration", "resolution", "tier_n"]
+VAR_NAMES = ["p_in", "p_out", "p_cache", "base", "mult", "x_cost", "y_cost", "z_cost", "w"]
+FUNCS = ["min", "max", "abs", "round", "int", "float"]
+
+
+def _random_number(rng: random.Random) -> Any:
+    return rng.choice(
+        [0, 1, 2, 3, 10, 1000, 0.5, 1.25, 2.5e-6, -1, rng.randint(-5, 100), rng.random()]
+    )
+
+
+def _random_expression(rng: random.Random, names: list[str], depth: int = 0) -> str:
+    roll = rng.random()
+    if depth > 3 or roll < 0.3:
+        if rng.random() < 0.75:
+            return rng.choice(names)
+        return repr(_random_number(rng))
+    if roll < 0.75:
+        op = rng.choice(["+", "-", "*", "/", "//", "%", "**", "+", "*"])
+        left = _random_expression(rng, names, depth + 1)
+        right = repr(rng.choice([0, 1, 2, 3, 0.5])) if op == "**" else None
+        right = right or _random_expression(rng, names, depth + 1)
+        return f"({left} {op} {right})"
+    if roll < 0.82:
+        return f"-{_random_expression(rng, names, depth + 1)}"
+    func = rng.choice(FUNCS)
+    if func in ("min", "max"):
+        args = [_random_expression(rng, names, depth + 1) for _ in range(rng.randint(0, 3))]
+        return f"{func}({', '.join(args)})"
+    if func == "round" and rng.random() < 0.5:
+        arg = _random_expression(rng, names, depth + 1)
+        return f"round({arg}, ndigits={rng.choice([0, 2, 6])})"
+    return f"{func}({_random_expression(rng, names, depth + 1)})"
+
+
+def _random_mapping(rng: random.Random, var_name: str, names: list[str]) -> dict[str, Any]:
+    source = rng.choice(["dimension", "matrix", "tiered", "constant", "computed", "computed"])
+    mapping: dict[str, Any] = {"source": source}
+    if rng.random() < 0.1:
+        mapping["required"] = True
+    if rng.random() < 0.5:
+        mapping["default"] = _random_number(rng)
+    if source == "dimension":
+        mapping["key"] = rng.choice(DIM_NAMES)
+        mapping["allow_zero"] = rng.random() < 0.5
+    elif source == "matrix":
+        mapping["key"] = "resolution"
+        mapping["map"] = {"720p": 1, "1080p": 1.5, "4k": "2.25"}
+    elif source == "tiered":
+        mapping["tier_key"] = rng.choice(["tier_n", "input_tokens"])
+        mapping["tiers"] = [
+            {"up_to": 100, "value": 3},
+            {"up_to": 10000, "value": 1.5},
+            {"up_to": None, "value": 0.75},
+        ][: rng.randint(1, 3)]
+        if rng.random() < 0.4:
+            mapping["ttl_key"] = "cache_ttl"
+            mapping["ttl_value_key"] = "price"
+            mapping["tiers"][-1]["cache_ttl_pricing"] = [
+                {"ttl_minutes": 60, "price": 2},
+                {"ttl_minutes": 5, "price": "1.1"},
+            ]
+        if rng.random() < 0.05:
+            mapping["tiers"].insert(0, {"up_to": "bad", "value": 9})
+    elif source == "computed":
+        if rng.random() < 0.05:
+            return mapping  # 缺少表达式
+        key = "expression" if rng.random() < 0.8 else "transform_expression"
+        mapping[key] = _random_expression(rng, names)
+    return mapping
+
+
+def _random_rule(rng: random.Random) -> dict[str, Any]:
+    names = DIM_NAMES + VAR_NAMES
+    variables = {name: _random_number(rng) for name in rng.sample(VAR_NAMES, rng.randint(0, 4))}
+    mapped = rng.sample(VAR_NAMES + DIM_NAMES[:2], rng.randint(0, 7))
+    mappings = {name: _random_mapping(rng, name, names) for name in mapped}
+    return {
+        "expression": _random_expression(rng, names),
+        "variables": variables,
+        "dimension_mappings": mappings,
+    }
+
+
+def _random_dims(rng: random.Random) -> dict[str, Any]:
+    values: dict[str, list[Any]] = {
+        "input_tokens": [0, 1, 50, 5000, 200000, "1200", ""],
+        "output_tokens": [0, 7, 800, 4096],
+        "cache_tokens": [0, 300, "abc", Decimal("12.5"), [1]],
+        "duration": [0, 5, 12.5],
+        "resolution": ["720p", "1080p", "8k", ""],
+        "tier_n": [0, 50, 500, 50000, "x"],
+        # 与变量同名的维度：computed 变量被后置依赖时会遮蔽
+        "x_cost": [0, 2, 3.5],
+        "w": [1, 4],
+        "cache_ttl": [5, 30, 120, "x"],
+    }
+    return {k: rng.choice(v) for k, v in values.items() if rng.random() < 0.7}
+
+
+def _outcome(fn: Any, **kwargs: Any) -> tuple[Any, ...]:
+    try:
+        result = fn(**kwargs)
+    except Exception as exc:
+        return ("raised", type(exc).__name__, str(exc))
+    return (
+        result.status,
+        result.cost,
+        result.resolved_variables,
+        result.missing_required,
+        result.cost_breakdown,
+        result.tier_index,
+        result.tier_info,
+        result.error,
+    )
+
+
+# ---------- 测试 ----------
+
+
+@pytest.mark.parametrize("seed", range(8))
+def test_compiled_matches_legacy_interpreter(seed: int) -> None:
+    rng = random.Random(seed)
+    engine = FormulaEngine()
+    for _ in range(150):
+        rule = _random_rule(rng)
+        for _ in range(6):
+            dims = _random_dims(rng)
+            strict_mode = rng.random() < 0.2
+            kwargs = dict(rule, dimensions=dims, strict_mode=strict_mode)
+            expected = _outcome(_legacy_evaluate, engine=engine, **kwargs)
+            assert _outcome(engine.evaluate, **kwargs) == expected, kwargs
+
+
+@pytest.mark.parametrize(
+    "mappings, dims",
+    [
+        # 依赖排在后面：逐轮解析需要两轮，编译后按排程单轮完成
+        (
+            {
+                "total_cost": {"source": "computed", "expression": "in_cost + out_cost"},
+                "in_cost": {"source": "computed", "expression": "input_tokens * 2"},
+                "out_cost": {"source": "computed", "expression": "output_tokens * 3"},
+            },
+            {"input_tokens": 10, "output_tokens": 5},
+        ),
+        # 后置依赖与维度同名：逐轮解析先读到维度值
+        (
+            {
+                "total_cost": {"source": "computed", "expression": "in_cost + 1"},
+                "in_cost": {"source": "computed", "expression": "input_tokens * 2"},
+            },
+            {"input_tokens": 10, "in_cost": 100},
+        ),
+        # 循环依赖 + required
+        (
+            {
+                "a": {"source": "computed", "expression": "b + 1", "default": 7},
+                "b": {"source": "computed", "expression": "a + 1", "required": True},
+            },
+            {},
+        ),
+    ],
+)
+def test_computed_dependency_orders(mappings: dict[str, Any], dims: dict[str, Any]) -> None:
+    engine = FormulaEngine()
+    expression = "total_cost" if "total_cost" in mappings else "a"
+    kwargs = dict(expression=expression, variables={}, dimensions=dims, dimension_mappings=mappings)
+    expected = _outcome(_legacy_evaluate, engine=engine, **kwargs)
+    assert _outcome(engine.evaluate, **kwargs) == expected
+    assert list(engine.evaluate(**kwargs).resolved_variables) == list(expected[2])
+
+
+def test_compile_cache_reuses_rule_versions() -> None:
+    engine = FormulaEngine()
+    rule = {
+        "expression": "a * b",
+        "variables": {"a": 2},
+        "dimension_mappings": {"b": {"source": "dimension", "key": "n"}},
+    }
+    compiled = engine.compile(**rule)
+    assert engine.compile(**rule) is compiled
+    # 规则内容变化即为新版本
+    rule["variables"] = {"a": 3}
+    assert engine.compile(**rule) is not compiled
+    assert engine.evaluate(**rule, dimensions={"n": 4}).cost == Decimal("12")
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_batch_matches_per_row(seed: int) -> None:
+    rng = random.Random(1000 + seed)
+    engine = FormulaEngine()
+    for _ in range(60):
+        compiled = engine.compile(**_random_rule(rng))
+        rows = [_random_dims(rng) for _ in range(rng.randint(0, 40))]
+        keys = sorted({k for row in rows for k in row})
+        columns = {k: [row.get(k) for row in rows] for k in keys}
+
+        batch = compiled.evaluate_batch(columns)
+        assert len(batch) == len(rows)
+        for row, result in zip(rows, batch):
+            expected = compiled.evaluate(row)
+            assert _outcome(lambda: result) == _outcome(lambda: expected)
+
+
+def test_batch_strict_mode_and_column_lengths() -> None:
+    compiled = FormulaEngine().compile(
+        expression="n * 2",
+        variables={},
+        dimension_mappings={"n": {"source": "dimension", "required": True}},
+    )
+    assert [r.cost for r in compiled.evaluate_batch({"n": [1, 2.5, "3"]})] == [
+        Decimal("2"),
+        Decimal("5.0"),
+        Decimal("6"),
+    ]
+    with pytest.raises(BillingIncompleteError):
+        compiled.evaluate_batch({"n": [1, None]}, strict_mode=True)
+    with pytest.raises(ValueError):
+        compiled.evaluate_batch({"n": [1], "m": [1, 2]})
+    assert compiled.evaluate_batch({}) == []
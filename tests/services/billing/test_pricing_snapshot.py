@@ -0,0 +1,303 @@
+"""
+计费价格快照测试（SQLite 内存库）
+
+覆盖：稳态下查价/查规则零查询、价格变更提交后重建、无关列不触发失效、集群版本前进触发重建、
+快照与逐次查询路径结果一致。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from src.config.settings import config
+from src.models.database import GlobalModel, Model, Provider
+from src.services.billing import pricing_snapshot
+from src.services.billing.pricing_snapshot import PricingSnapshotManager, handle_pricing_version
+from src.services.billing.rule_service import BillingRuleService
+from src.services.model.cost import ModelCostService
+
+_TIERED_GLOBAL = {
+    "tiers": [
+        {
+            "up_to": 200000,
+            "input_price_per_1m": 3.0,
+            "output_price_per_1m": 15.0,
+            "cache_read_price_per_1m": 0.3,
+        },
+        {"up_to": None, "input_price_per_1m": 6.0, "output_price_per_1m": 22.5},
+    ]
+}
+_TIERED_PROVIDER = {
+    "tiers": [
+        {
+            "up_to": None,
+            "input_price_per_1m": 2.0,
+            "output_price_per_1m": 8.0,
+            "cache_creation_price_per_1m": 2.5,
+        }
+    ]
+}
+
+
+@pytest.fixture()
+def engine() -> Iterator[Any]:
+    engine = create_engine("sqlite://")
+    tables = [Provider.__table__, GlobalModel.__table__, Model.__table__]
+    Provider.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [
+            GlobalModel(
+                id="gm1", name="m1", display_name="m1", default_tiered_pricing=_TIERED_GLOBAL
+            ),
+            GlobalModel(
+                id="gm2",
+                name="per-request",
+                display_name="per-request",
+                default_tiered_pricing={},
+                default_price_per_request=0.02,
+            ),
+            GlobalModel(
+                id="gm3",
+                name="retired",
+                display_name="retired",
+                default_tiered_pricing=_TIERED_GLOBAL,
+                is_active=False,
+            ),
+            Provider(id="p1", name="prov-1", provider_priority=1),
+            Provider(id="p2", name="prov-2", provider_priority=2),
+        ]
+    )
+    session.flush()
+    session.add_all(
+        [
+            Model(
+                id="p1-m1",
+                provider_id="p1",
+                global_model_id="gm1",
+                provider_model_name="m1",
+                tiered_pricing=_TIERED_PROVIDER,
+            ),
+            Model(id="p2-m1", provider_id="p2", global_model_id="gm1", provider_model_name="m1"),
+            Model(
+                id="p1-m2",
+                provider_id="p1",
+                global_model_id="gm2",
+                provider_model_name="per-request",
+                price_per_request=0.05,
+            ),
+            Model(
+                id="p1-m3", provider_id="p1", global_model_id="gm3", provider_model_name="retired"
+            ),
+        ]
+    )
+    session.commit()
+    session.close()
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture()
+def manager(monkeypatch: pytest.MonkeyPatch) -> PricingSnapshotManager:
+    manager = PricingSnapshotManager()
+    monkeypatch.setattr(pricing_snapshot, "_manager", manager)
+    monkeypatch.setattr(config, "pricing_snapshot_enabled", True)
+    monkeypatch.setattr(config, "pricing_snapshot_ttl_seconds", 300.0)
+    ModelCostService.clear_cache()
+    return manager
+
+
+def _count_queries(engine: Any) -> list[str]:
+    statements: list[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def _prices(db: Any, provider: Any, model: str) -> tuple[Any, ...]:
+    service = ModelCostService(db)
+    input_price, output_price = service.get_model_price(provider, model)
+    return (
+        input_price,
+        output_price,
+        service.get_cache_prices(provider, model, input_price),
+        service.get_request_price(provider, model),
+        service.get_tiered_pricing(provider, model),
+    )
+
+
+_CASES = [
+    ("prov-1", "m1"),
+    ("prov-2", "m1"),
+    ("prov-1", "per-request"),
+    ("prov-2", "per-request"),
+    ("prov-1", "retired"),
+    ("prov-1", "missing"),
+    ("no-such-provider", "m1"),
+    (None, "m1"),
+]
+
+
+def test_entries_follow_provider_override_and_global_fallback(
+    engine: Any, manager: PricingSnapshotManager
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        snapshot = manager.get(db)
+
+    provider_entry = snapshot.entry("p1", "m1")
+    assert provider_entry is not None
+    assert provider_entry.tiered_source == "provider"
+    assert (provider_entry.input_price, provider_entry.output_price) == (2.0, 8.0)
+    assert provider_entry.cache_creation_price == 2.5
+    assert provider_entry.model is not None
+    assert provider_entry.model.get_effective_tiered_pricing() == _TIERED_PROVIDER
+
+    global_entry = snapshot.entry("p2", "m1")
+    assert global_entry is not None
+    assert global_entry.tiered_source == "global"
+    assert global_entry.cache_read_price == 0.3
+    # 未实现该模型的 Provider 使用 GlobalModel 默认价格
+    assert snapshot.entry("p2", "per-request").price_per_request == 0.02
+    assert snapshot.entry("p1", "per-request").price_per_request == 0.05
+    assert snapshot.entry("p1", "retired") is None
+    assert snapshot.provider_ids == {"prov-1": "p1", "prov-2": "p2"}
+
+
+def test_steady_state_lookups_issue_no_queries(
+    engine: Any, manager: PricingSnapshotManager
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        manager.get(db)
+
+    statements = _count_queries(engine)
+    with sessionmaker(bind=engine)() as db:
+        for provider, model in _CASES:
+            _prices(db, provider, model)
+        provider = db.get(Provider, "p1")
+        statements.clear()
+        _prices(db, provider, "m1")
+        for task_type in ("chat", "cli", "video"):
+            BillingRuleService.find_rule(db, provider_id="p1", model_name="m1", task_type=task_type)
+    assert statements == []
+
+
+def test_snapshot_matches_per_query_path(
+    engine: Any, manager: PricingSnapshotManager, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def collect() -> list[Any]:
+        ModelCostService.clear_cache()
+        with sessionmaker(bind=engine)() as db:
+            prices = [_prices(db, provider, model) for provider, model in _CASES]
+            prices.append(_prices(db, db.get(Provider, "p2"), "m1"))
+            rules = []
+            for pid in ("p1", "p2", None):
+                for model_name in ("m1", "per-request", "retired"):
+                    for task_type in ("chat", "video"):
+                        lookup = BillingRuleService.find_rule(
+                            db, provider_id=pid, model_name=model_name, task_type=task_type
+                        )
+                        rules.append(
+                            None
+                            if lookup is None
+                            else (
+                                lookup.scope,
+                                lookup.effective_task_type,
+                                lookup.rule.expression,
+                                lookup.rule.variables,
+                                lookup.rule.dimension_mappings,
+                            )
+                        )
+        return prices + rules
+
+    for require_rule in (True, False):
+        monkeypatch.setattr(config, "billing_require_rule", require_rule)
+        monkeypatch.setattr(config, "pricing_snapshot_enabled", True)
+        from_snapshot = collect()
+        monkeypatch.setattr(config, "pricing_snapshot_enabled", False)
+        assert from_snapshot == collect()
+
+
+def test_price_change_commit_rebuilds(engine: Any, manager: PricingSnapshotManager) -> None:
+    with sessionmaker(bind=engine)() as db:
+        first = manager.get(db)
+        assert ModelCostService(db).get_model_price("prov-2", "m1") == (3.0, 15.0)
+
+    with sessionmaker(bind=engine)() as db:
+        model = db.get(Model, "p2-m1")
+        model.tiered_pricing = _TIERED_PROVIDER
+        db.commit()
+
+    with sessionmaker(bind=engine)() as db:
+        assert ModelCostService(db).get_model_price("prov-2", "m1") == (2.0, 8.0)
+        assert manager.snapshot is not first
+        assert manager.snapshot.generation == first.generation + 1
+
+
+@pytest.mark.parametrize("finish", ["rollback", "close"])
+def test_uncommitted_price_change_does_not_stick(
+    engine: Any, manager: PricingSnapshotManager, finish: str
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        first = manager.get(db)
+
+    db = sessionmaker(bind=engine)()
+    db.get(Model, "p2-m1").tiered_pricing = _TIERED_PROVIDER
+    manager.invalidate()
+    # autoflush：快照在同一事务内读到未提交的价格
+    assert ModelCostService(db).get_model_price("prov-2", "m1") == (2.0, 8.0)
+    dirty = manager.snapshot
+    getattr(db, finish)()
+
+    with sessionmaker(bind=engine)() as db:
+        assert ModelCostService(db).get_model_price("prov-2", "m1") == (3.0, 15.0)
+        assert manager.snapshot is not dirty
+        assert manager.snapshot.generation == first.generation + 2
+
+
+def test_unrelated_column_change_keeps_snapshot(
+    engine: Any, manager: PricingSnapshotManager
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        first = manager.get(db)
+
+    with sessionmaker(bind=engine)() as db:
+        db.get(GlobalModel, "gm1").usage_count = 42
+        db.commit()
+
+    statements = _count_queries(engine)
+    with sessionmaker(bind=engine)() as db:
+        assert manager.get(db) is first
+    assert statements == []
+
+
+async def test_higher_cluster_version_rebuilds(
+    engine: Any, manager: PricingSnapshotManager
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        first = manager.get(db)
+        assert first.version == 0
+
+        await handle_pricing_version({"version": 3})
+        second = manager.get(db)
+        assert second is not first
+        assert second.version == 3
+
+        # 旧版本或重复消息不触发重建
+        await handle_pricing_version({"version": 2})
+        await handle_pricing_version({"version": 3})
+        assert manager.get(db) is second
+
+
+def test_ttl_expiry_rebuilds(
+    engine: Any, manager: PricingSnapshotManager, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        first = manager.get(db)
+        monkeypatch.setattr(config, "pricing_snapshot_ttl_seconds", 0.0)
+        assert manager.get(db) is not first
@@ -0,0 +1,185 @@
+"""
+活动记录合并写入测试（SQLite 内存库）
+
+覆盖：同一实体的多次记录合并为一条、批量写入只向前推进时间并累加计数、
+Redis 汇聚后由单个进程取出。
+"""
+
+from __future__ import annotations
+
+import contextlib
+from collections.abc import Iterator
+from datetime import datetime, timezone
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.models.database import ApiKey, Provider, ProviderAPIKey, User
+from src.services.system import activity_writer
+from src.services.system.activity_writer import (
+    ActivityRecorder,
+    ActivityTarget,
+    Touch,
+    write_batch,
+)
+
+
+@pytest.fixture()
+def db() -> Iterator[Session]:
+    engine = create_engine("sqlite://")
+    tables = [User.__table__, ApiKey.__table__, Provider.__table__, ProviderAPIKey.__table__]
+    User.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [User(id="u1", username="u1", email_verified=True), Provider(id="p1", name="prov")]
+    )
+    session.flush()
+    session.add_all(
+        [
+            ApiKey(id="k1", user_id="u1", key_hash="h1"),
+            ApiKey(
+                id="k2",
+                user_id="u1",
+                key_hash="h2",
+                last_used_at=datetime(2030, 1, 1, tzinfo=timezone.utc),
+            ),
+            ProviderAPIKey(id="pk1", provider_id="p1", api_key="sk", name="pk1", request_count=3),
+        ]
+    )
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_recorder_coalesces_touches() -> None:
+    recorder = ActivityRecorder()
+    for ip in ("10.0.0.1", None, "10.0.0.2"):
+        recorder.record("management_token", "t1", count=1, ip=ip)
+    recorder.record("api_key", "k1")
+    recorder.record("api_key", "k1")
+    assert recorder.pending_count() == 2
+
+    batch = recorder.drain()
+    token = batch["management_token"]["t1"]
+    assert (token.count, token.ip) == (3, "10.0.0.2")
+    assert recorder.pending_count() == 0
+
+    recorder.record("management_token", "t1", count=1)
+    recorder.restore(batch)
+    assert recorder.drain()["management_token"]["t1"].count == 4
+
+
+def test_write_batch_advances_time_and_adds_counts(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # management_tokens 含 PostgreSQL 专用约束，用带计数列的 ProviderAPIKey 代替
+    targets = {
+        **activity_writer.ACTIVITY_TARGETS,
+        "provider_key": ActivityTarget(
+            ProviderAPIKey,
+            "last_used_at",
+            count_column="request_count",
+            ip_column="name",
+            updated_column="updated_at",
+        ),
+    }
+    monkeypatch.setattr(activity_writer, "ACTIVITY_TARGETS", targets)
+
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc).timestamp()
+    later = datetime(2031, 1, 1, tzinfo=timezone.utc).timestamp()
+    batch = {
+        "api_key": {"k1": Touch(now), "k2": Touch(now)},
+        "provider_key": {"pk1": Touch(later, count=5, ip="renamed")},
+    }
+    assert write_batch(db, batch) == 3
+    db.commit()
+    db.expire_all()
+
+    k1, k2 = db.get(ApiKey, "k1"), db.get(ApiKey, "k2")
+    provider_key = db.get(ProviderAPIKey, "pk1")
+    assert k1 is not None and k2 is not None and provider_key is not None
+    assert k1.last_used_at.replace(tzinfo=timezone.utc).timestamp() == now
+    # 已有更晚的时间时不回退
+    assert k2.last_used_at.year == 2030
+    assert (provider_key.request_count, provider_key.name) == (8, "renamed")
+    # 更新时间列随时间列一起推进
+    assert provider_key.updated_at.replace(tzinfo=timezone.utc).timestamp() == later
+
+
+class FakeRedis:
+    """内存版 Redis：按 _MERGE_SCRIPT / _DRAIN_SCRIPT 的语义实现 eval，另支持 SET NX"""
+
+    def __init__(self) -> None:
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.strings: dict[str, str] = {}
+
+    async def eval(self, script: str, numkeys: int, *args: Any) -> Any:
+        keys, argv = args[:numkeys], args[numkeys:]
+        if script == activity_writer._DRAIN_SCRIPT:
+            return [[x for pair in self.hashes.pop(k, {}).items() for x in pair] for k in keys]
+        ts, count, ip = (self.hashes.setdefault(k, {}) for k in keys)
+        for i in range(0, len(argv), 4):
+            entity_id, t, c, addr = argv[i : i + 4]
+            if float(t) > float(ts.get(entity_id, "0")):
+                ts[entity_id] = t
+            if int(c) > 0:
+                count[entity_id] = str(int(count.get(entity_id, "0")) + int(c))
+            if addr:
+                ip[entity_id] = addr
+        return 1
+
+    async def set(self, key: str, value: str, nx: bool = False, px: int = 0) -> bool:
+        if nx and key in self.strings:
+            return False
+        self.strings[key] = value
+        return True
+
+
+@pytest.mark.asyncio
+async def test_redis_round_drained_by_one_process() -> None:
+    redis = FakeRedis()
+    await activity_writer.merge_into_redis(
+        redis, {"management_token": {"t1": Touch(100.0, count=2, ip="a")}}
+    )
+    await activity_writer.merge_into_redis(
+        redis, {"management_token": {"t1": Touch(50.0, count=1)}}
+    )
+
+    first, second = activity_writer.ActivityFlusher(), activity_writer.ActivityFlusher()
+    assert await first._acquire_round(redis)
+    assert not await second._acquire_round(redis)
+
+    batch = await activity_writer.drain_redis(redis)
+    assert batch == {"management_token": {"t1": Touch(100.0, 3, "a")}}
+    assert await activity_writer.drain_redis(redis) == {}
+
+
+@pytest.mark.asyncio
+async def test_partial_redis_merge_writes_only_unmerged_kinds(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    class FlakyRedis(FakeRedis):
+        async def eval(self, script: str, numkeys: int, *args: Any) -> Any:
+            if script == activity_writer._MERGE_SCRIPT and "management_token" in args[0]:
+                raise ConnectionError("redis down")
+            return await super().eval(script, numkeys, *args)
+
+    redis = FlakyRedis()
+    written: list[Any] = []
+    monkeypatch.setattr(activity_writer, "get_activity_redis_client", lambda: redis)
+    monkeypatch.setattr(activity_writer, "write_batch", lambda _db, b: written.append(b) or 1)
+    monkeypatch.setattr("src.database.database.get_db_context", contextlib.nullcontext)
+    monkeypatch.setattr(activity_writer, "activity_recorder", ActivityRecorder())
+
+    activity_writer.activity_recorder.record("api_key", "k1")
+    activity_writer.activity_recorder.record("management_token", "t1", count=1)
+    await activity_writer.ActivityFlusher().flush()
+
+    # api_key 已进入 Redis，由取到本轮锁的进程写库；只有 management_token 直接写库
+    assert [set(b) for b in written] == [{"management_token"}]
+    assert "k1" in redis.hashes[activity_writer._redis_keys("api_key")[0]]
@@ -0,0 +1,123 @@
+"""
+使用记录 body 压缩流水线测试（SQLite 文件库）
+
+覆盖：键集分页跨越相同 created_at 的分页边界、每页一条 UPDATE、JSON null 清理、
+压缩结果可还原、检查点续跑不重新扫描检查点之前的行。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import Text, cast, create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.database import SystemConfig, Usage
+from src.services.system import body_compaction
+from src.services.system.body_compaction import compact_usage_bodies, load_checkpoint
+from src.utils.compression import decompress_json
+
+BASE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+CUTOFF = BASE + timedelta(days=1)
+
+
+@pytest.fixture()
+def engine(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Engine]:
+    # 文件库：预取与写入在不同线程中使用各自的连接，与生产环境一致
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    Usage.metadata.create_all(engine, tables=[Usage.__table__, SystemConfig.__table__])
+    monkeypatch.setattr(body_compaction, "create_session", sessionmaker(bind=engine))
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def _usage(request_id: str, created_at: datetime, **bodies: Any) -> Usage:
+    return Usage(
+        request_id=request_id,
+        provider_name="prov",
+        model="m",
+        created_at=created_at,
+        **bodies,
+    )
+
+
+def _bodies(engine: Engine) -> dict[str, tuple[Any, Any, Any, Any]]:
+    with sessionmaker(bind=engine)() as db:
+        rows = db.query(
+            Usage.request_id,
+            cast(Usage.request_body, Text),
+            cast(Usage.response_body, Text),
+            Usage.request_body_compressed,
+            Usage.response_body_compressed,
+        ).all()
+    return {r[0]: tuple(r[1:]) for r in rows}
+
+
+@pytest.mark.asyncio
+async def test_compacts_expired_rows_in_keyset_batches(engine: Engine) -> None:
+    with sessionmaker(bind=engine)() as db:
+        # 每两行共享一个 created_at，分页边界落在相同时间戳内
+        for i in range(20):
+            db.add(
+                _usage(
+                    f"old-{i:02d}",
+                    BASE + timedelta(minutes=i // 2),
+                    request_body={"messages": [{"role": "user", "content": f"q{i}" * 50}]},
+                    response_body={"text": f"a{i}"} if i % 3 else None,
+                )
+            )
+        db.add(_usage("old-null", BASE, request_body=None, response_body=None))
+        db.add(_usage("fresh", CUTOFF + timedelta(hours=1), request_body={"keep": True}))
+        db.commit()
+
+    updates: list[str] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(_conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+        if statement.lstrip().upper().startswith("UPDATE USAGE"):
+            updates.append(statement)
+
+    result = await compact_usage_bodies(CUTOFF, batch_size=7, workers=0, body_store=False)
+
+    assert (result.rows, result.batches) == (21, 3)
+    assert len(updates) == 3
+    assert result.compressed_bytes < result.raw_bytes
+
+    bodies = _bodies(engine)
+    for i in range(20):
+        request_text, response_text, request_packed, response_packed = bodies[f"old-{i:02d}"]
+        assert request_text is None and response_text is None
+        assert decompress_json(request_packed)["messages"][0]["content"] == f"q{i}" * 50
+        assert decompress_json(response_packed) == ({"text": f"a{i}"} if i % 3 else None)
+    assert bodies["old-null"] == (None, None, None, None)
+    assert bodies["fresh"][0] is not None and bodies["fresh"][2] is None
+
+    with sessionmaker(bind=engine)() as db:
+        checkpoint = load_checkpoint(db)
+    assert checkpoint is not None and checkpoint[0] == BASE + timedelta(minutes=9)
+
+
+@pytest.mark.asyncio
+async def test_resumes_from_checkpoint(engine: Engine) -> None:
+    with sessionmaker(bind=engine)() as db:
+        db.add(_usage("first", BASE + timedelta(hours=2), request_body={"n": 1}))
+        db.commit()
+    assert (await compact_usage_bodies(CUTOFF, workers=0, body_store=False)).rows == 1
+
+    with sessionmaker(bind=engine)() as db:
+        # 检查点之前的行不会被重新扫描；之后的行继续处理
+        db.add(_usage("before", BASE + timedelta(hours=1), request_body={"n": 2}))
+        db.add(_usage("after", BASE + timedelta(hours=3), request_body={"n": 3}))
+        db.commit()
+
+    assert (await compact_usage_bodies(CUTOFF, workers=0, body_store=False)).rows == 1
+    bodies = _bodies(engine)
+    assert bodies["before"][0] is not None
+    assert decompress_json(bodies["after"][2]) == {"n": 3}
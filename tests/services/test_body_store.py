@@ -0,0 +1,188 @@
+"""
+请求体分段去重存储测试（SQLite 文件库）
+
+覆盖：分段/还原保持字段顺序、压缩流水线跨记录去重、Usage.get_request_body() 还原、
+历史 gzip 请求体迁移、存储报告、随保留期回收段。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import sessionmaker
+
+from src.models.database import (
+    SystemConfig,
+    Usage,
+    UsageBodyDictionary,
+    UsageBodySegment,
+)
+from src.services.system import body_compaction, body_store
+from src.services.system.body_compaction import compact_usage_bodies
+from src.services.system.body_store import (
+    assemble_request_body,
+    backfill_request_bodies,
+    purge_segments,
+    split_request_body,
+    storage_report,
+)
+from src.utils.compression import compress_json
+
+BASE = datetime(2025, 1, 1, tzinfo=timezone.utc)
+CUTOFF = BASE + timedelta(days=1)
+SYSTEM = "You are a coding agent. " * 200
+TOOLS = [{"name": f"tool_{i}", "input_schema": {"type": "object"}} for i in range(20)]
+
+
+@pytest.fixture()
+def engine(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Engine]:
+    engine = create_engine(f"sqlite:///{tmp_path / 'usage.db'}")
+    Usage.metadata.create_all(
+        engine,
+        tables=[
+            Usage.__table__,
+            SystemConfig.__table__,
+            UsageBodySegment.__table__,
+            UsageBodyDictionary.__table__,
+        ],
+    )
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(body_compaction, "create_session", factory)
+    monkeypatch.setattr(body_store, "create_session", factory)
+    monkeypatch.setattr(body_store, "_segment_cache", body_store.SyncLRUCache(64, 60))
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def _turn(n: int) -> dict[str, Any]:
+    """第 n 轮对话：system/tools 不变，消息历史逐轮增长"""
+    messages: list[dict[str, Any]] = []
+    for i in range(n):
+        messages.append({"role": "user", "content": f"question {i}"})
+        messages.append({"role": "assistant", "content": f"answer {i}"})
+    messages.append({"role": "user", "content": f"question {n}"})
+    return {
+        "model": "claude",
+        "system": SYSTEM,
+        "messages": messages,
+        "tools": TOOLS,
+        "max_tokens": 1024,
+    }
+
+
+def test_split_and_assemble_round_trip() -> None:
+    body = _turn(2)
+    manifest, segments = split_request_body(body)
+    assert manifest["body"] == {"model": "claude", "max_tokens": 1024}
+    assert len(manifest["segments"]["messages"]) == 5
+    restored = assemble_request_body(manifest, segments)
+    assert restored == body and list(restored) == list(body)
+
+    assert split_request_body({"prompt": "hi"}) is None
+    assert split_request_body(["not", "a", "dict"]) is None
+
+
+@pytest.mark.asyncio
+async def test_compaction_deduplicates_segments(engine: Engine) -> None:
+    with sessionmaker(bind=engine)() as db:
+        for n in range(10):
+            db.add(
+                Usage(
+                    request_id=f"turn-{n}",
+                    provider_name="prov",
+                    model="m",
+                    created_at=BASE + timedelta(minutes=n),
+                    request_body=_turn(n),
+                    response_body={"text": f"answer {n}"},
+                )
+            )
+        db.add(
+            Usage(
+                request_id="plain",
+                provider_name="prov",
+                model="m",
+                created_at=BASE,
+                request_body={"prompt": "no segments"},
+            )
+        )
+        db.commit()
+
+    result = await compact_usage_bodies(CUTOFF, batch_size=4, workers=0, body_store=True)
+    assert result.rows == 11
+
+    with sessionmaker(bind=engine)() as db:
+        # system + tools + question 0..9 + answer 0..8，相同段只存一份
+        assert db.query(UsageBodySegment).count() == 2 + 10 + 9
+        system_segment = (
+            db.query(UsageBodySegment).order_by(UsageBodySegment.raw_size.desc()).first()
+        )
+        assert system_segment.ref_count == 10
+        assert system_segment.last_seen_at.replace(tzinfo=timezone.utc) >= BASE + timedelta(
+            minutes=9
+        )
+
+        records = {u.request_id: u for u in db.query(Usage).all()}
+        for n in range(10):
+            usage = records[f"turn-{n}"]
+            assert usage.request_body is None and usage.request_body_compressed is None
+            assert usage.get_request_body() == _turn(n)
+            assert usage.get_response_body() == {"text": f"answer {n}"}
+        plain = records["plain"]
+        assert plain.request_body_ref is None
+        assert plain.get_request_body() == {"prompt": "no segments"}
+
+        report = storage_report(db)
+    assert report["usage"]["segmented_rows"] == 10
+    assert report["segments"]["references"] == sum(2 + 2 * n + 1 for n in range(10))
+    assert report["dedup_ratio"] > 5
+    assert report["saved_bytes"] > 0
+
+
+def test_backfill_and_purge(engine: Engine) -> None:
+    with sessionmaker(bind=engine)() as db:
+        for n in range(3):
+            db.add(
+                Usage(
+                    request_id=f"legacy-{n}",
+                    provider_name="prov",
+                    model="m",
+                    created_at=BASE + timedelta(days=n),
+                    request_body_compressed=compress_json(_turn(n)),
+                )
+            )
+        db.add(
+            Usage(
+                request_id="legacy-plain",
+                provider_name="prov",
+                model="m",
+                created_at=BASE,
+                request_body_compressed=compress_json({"prompt": "x"}),
+            )
+        )
+        db.commit()
+
+    result = backfill_request_bodies(batch_size=2)
+    assert (result.scanned, result.converted) == (4, 3)
+    # 再次执行不会重复迁移；无法分段的行保留 gzip
+    assert backfill_request_bodies(batch_size=2).converted == 0
+
+    with sessionmaker(bind=engine)() as db:
+        records = {u.request_id: u for u in db.query(Usage).all()}
+        for n in range(3):
+            usage = records[f"legacy-{n}"]
+            assert usage.request_body_compressed is None
+            assert usage.get_request_body() == _turn(n)
+        assert records["legacy-plain"].get_request_body() == {"prompt": "x"}
+        total = db.query(UsageBodySegment).count()
+
+    # 只回收不再被较新记录引用的段：第 0、1 天独有的段没有，system/tools 仍被第 2 天引用
+    assert purge_segments(BASE + timedelta(days=1, hours=1)) == 0
+    assert purge_segments(BASE + timedelta(days=3)) == total
@@ -0,0 +1,140 @@
+"""
+API Key 认证缓存测试（SQLite 内存库）
+
+覆盖：命中时只读取额度计数且对象挂在请求 Session 上、命中时按实时计数校验余额、
+锁定通过 ORM 事件失效、额度耗尽失效、远程失效广播忽略自身消息。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.core.exceptions import ForbiddenException
+from src.models.database import ApiKey, User
+from src.services.auth import credential_cache as cc
+from src.services.auth.credential_cache import CredentialCache
+from src.services.auth.service import AuthService
+
+RAW_KEY = "sk-test-credential-cache"
+
+
+@pytest.fixture()
+def engine() -> Iterator[Any]:
+    engine = create_engine("sqlite://")
+    User.metadata.create_all(engine, tables=[User.__table__, ApiKey.__table__])
+    with sessionmaker(bind=engine)() as session:
+        session.add(User(id="u1", username="u1", email_verified=True, quota_usd=10.0))
+        session.flush()
+        session.add(ApiKey(id="k1", user_id="u1", key_hash=ApiKey.hash_key(RAW_KEY), name="k1"))
+        session.commit()
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture()
+def cache(monkeypatch: pytest.MonkeyPatch) -> CredentialCache:
+    cache = CredentialCache(max_size=100, ttl=60)
+    monkeypatch.setattr(cc, "credential_cache", cache)
+    return cache
+
+
+def _count_queries(engine: Any) -> list[str]:
+    statements: list[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_hit_only_reads_counters(engine: Any, cache: CredentialCache) -> None:
+    with sessionmaker(bind=engine)() as db:
+        assert AuthService.authenticate_api_key(db, RAW_KEY) is not None
+
+    statements = _count_queries(engine)
+    with sessionmaker(bind=engine)() as db:
+        result = AuthService.authenticate_api_key(db, RAW_KEY)
+        assert result is not None
+        user, key = result
+        assert key in db and user in db and key.user is user
+        assert (user.id, user.quota_usd, key.id) == ("u1", 10.0, "k1")
+    assert len(statements) == 1 and "key_hash" not in statements[0]
+    assert cache.get_stats()["hits"] == 1
+
+
+def test_hit_uses_live_counters(engine: Any, cache: CredentialCache) -> None:
+    with sessionmaker(bind=engine)() as db:
+        key = db.get(ApiKey, "k1")
+        assert key is not None
+        key.is_standalone = True
+        key.current_balance_usd = 5.0
+        db.commit()
+        assert AuthService.authenticate_api_key(db, RAW_KEY) is not None
+
+    # 用量累加走批量 UPDATE，不触发 ORM 失效事件
+    with sessionmaker(bind=engine)() as db:
+        db.query(User).filter(User.id == "u1").update({User.used_usd: 3.0})
+        db.query(ApiKey).filter(ApiKey.id == "k1").update({ApiKey.balance_used_usd: 4.0})
+        db.commit()
+    assert cache.get_stats()["size"] == 1
+
+    with sessionmaker(bind=engine)() as db:
+        result = AuthService.authenticate_api_key(db, RAW_KEY)
+        assert result is not None
+        user, key = result
+        assert (user.used_usd, key.balance_used_usd) == (3.0, 4.0)
+        assert not db.dirty
+
+    with sessionmaker(bind=engine)() as db:
+        db.query(ApiKey).filter(ApiKey.id == "k1").update({ApiKey.balance_used_usd: 5.0})
+        db.commit()
+        assert AuthService.authenticate_api_key(db, RAW_KEY) is None
+    assert cache.get_stats()["size"] == 0
+
+
+def test_lock_invalidates_on_commit(engine: Any, cache: CredentialCache) -> None:
+    with sessionmaker(bind=engine)() as db:
+        _, key = AuthService.authenticate_api_key(db, RAW_KEY)  # type: ignore[misc]
+        # 统计列变更不触发失效
+        key.total_requests = 5
+        db.commit()
+    assert cache.get_stats()["size"] == 1
+
+    with sessionmaker(bind=engine)() as db:
+        key = db.get(ApiKey, "k1")
+        assert key is not None
+        key.is_locked = True
+        db.commit()
+    assert cache.get_stats()["size"] == 0
+
+    with sessionmaker(bind=engine)() as db:
+        with pytest.raises(ForbiddenException):
+            AuthService.authenticate_api_key(db, RAW_KEY)
+
+
+def test_exhausted_quota_invalidates_user_entries(engine: Any, cache: CredentialCache) -> None:
+    with sessionmaker(bind=engine)() as db:
+        AuthService.authenticate_api_key(db, RAW_KEY)
+
+    cc.invalidate_exhausted(users=[("u1", 9.5, 10.0)], keys=[("k1", 100.0, None)])
+    assert cache.get_stats()["size"] == 1
+
+    cc.invalidate_exhausted(users=[("u1", 10.0, 10.0)])
+    assert cache.get_stats()["size"] == 0
+
+
+@pytest.mark.asyncio
+async def test_remote_invalidation_ignores_own_origin(engine: Any, cache: CredentialCache) -> None:
+    with sessionmaker(bind=engine)() as db:
+        AuthService.authenticate_api_key(db, RAW_KEY)
+
+    payload = {"key_ids": ["k1"], "user_ids": [], "origin": cc._INSTANCE_ID, "published_at": 0}
+    await cc.handle_credential_invalidation(payload)
+    assert cache.get_stats()["size"] == 1
+
+    await cc.handle_credential_invalidation({**payload, "origin": "other"})
+    assert cache.get_stats()["size"] == 0
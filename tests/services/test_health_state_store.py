@@ -0,0 +1,210 @@
+"""
+健康度状态存储测试（SQLite 内存库）
+
+覆盖：环形窗口淘汰、请求路径不写数据库、熔断切换立即落库、快照以增量累加计数、
+Redis 镜像的版本号 CAS 与拉取。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from contextlib import contextmanager
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.models.database import Provider, ProviderAPIKey
+from src.services.health import state_store
+from src.services.health.monitor import HealthMonitor
+from src.services.health.state_store import FormatHealthState, health_state_store
+
+FMT = "openai:chat"
+
+
+@pytest.fixture()
+def db() -> Iterator[Session]:
+    engine = create_engine("sqlite://")
+    Provider.metadata.create_all(engine, tables=[Provider.__table__, ProviderAPIKey.__table__])
+    session = sessionmaker(bind=engine)()
+    session.add(Provider(id="p1", name="prov"))
+    session.flush()
+    session.add(
+        ProviderAPIKey(
+            id="k1",
+            provider_id="p1",
+            api_key="sk",
+            name="k1",
+            api_formats=[FMT],
+            request_count=0,
+            success_count=0,
+            error_count=0,
+            total_response_time_ms=0,
+        )
+    )
+    session.commit()
+    health_state_store.clear()
+    try:
+        yield session
+    finally:
+        health_state_store.clear()
+        session.close()
+        engine.dispose()
+
+
+def test_ring_window_evicts_by_capacity_and_age() -> None:
+    state = FormatHealthState(capacity=3)
+    state.push(1.0, False, 0.0)
+    state.push(2.0, True, 0.0)
+    state.push(3.0, False, 0.0)
+    state.push(4.0, True, 0.0)  # 容量满，淘汰 ts=1 的失败
+    assert state.window_stats(0.0) == (3, 1)
+    assert state.window_stats(3.0) == (1, 0)
+
+    restored = FormatHealthState.from_json(
+        FormatHealthState.from_json(None, None).health_json(), {"open": True}
+    )
+    assert restored.open and restored.health_score == 1.0
+
+
+def test_outcomes_stay_in_memory_until_transition(db: Session) -> None:
+    for _ in range(3):
+        HealthMonitor.record_success(db, key_id="k1", api_format=FMT, response_time_ms=10)
+    db.commit()
+
+    db.expire_all()
+    key = db.get(ProviderAPIKey, "k1")
+    assert key is not None
+    assert not key.health_by_format and key.request_count == 0
+
+    for _ in range(HealthMonitor.MIN_REQUESTS):
+        HealthMonitor.record_failure(db, key_id="k1", api_format=FMT)
+    db.commit()
+
+    # 熔断打开：按 ID 直接读取，无需 ORM 对象；切换已写回数据库
+    assert not HealthMonitor.is_circuit_breaker_closed("k1", FMT)
+    assert HealthMonitor.get_health_score("k1", FMT) < 1.0
+    db.expire_all()
+    assert db.get(ProviderAPIKey, "k1").circuit_breaker_by_format[FMT]["open"] is True  # type: ignore[union-attr]
+
+
+def test_snapshot_flush_adds_counter_deltas(db: Session) -> None:
+    HealthMonitor.record_success(db, key_id="k1", api_format=FMT, response_time_ms=30)
+    HealthMonitor.record_failure(db, key_id="k1", api_format=FMT)
+
+    # 其他实例在此期间写入的计数不会被覆盖
+    db.get(ProviderAPIKey, "k1").request_count = 5  # type: ignore[union-attr]
+    db.commit()
+
+    assert health_state_store.flush_snapshots(db) == 1
+    db.commit()
+    db.expire_all()
+    key = db.get(ProviderAPIKey, "k1")
+    assert key is not None
+    assert (key.request_count, key.success_count, key.error_count) == (7, 1, 1)
+    assert key.total_response_time_ms == 30
+    assert len(key.health_by_format[FMT]["request_results_window"]) == 2
+    assert health_state_store.flush_snapshots(db) == 0
+
+
+class _RecordingDB:
+    """只记录快照 UPDATE 参数的假会话；commit_fails=True 时模拟提交失败"""
+
+    def __init__(self, commit_fails: bool = False) -> None:
+        self.commit_fails = commit_fails
+        self.rows: list[dict[str, Any]] = []
+
+    def connection(self) -> Any:
+        return self
+
+    def execute(self, stmt: Any, rows: list[dict[str, Any]]) -> None:
+        self.rows.extend(rows)
+
+    @contextmanager
+    def context(self) -> Iterator[Any]:
+        yield self
+        if self.commit_fails:
+            raise RuntimeError("commit failed")
+
+
+@pytest.mark.asyncio
+async def test_flusher_restores_deltas_when_commit_fails(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from src.database import database
+
+    HealthMonitor.record_success(db, key_id="k1", api_format=FMT, response_time_ms=30)
+    flusher = state_store.HealthStateFlusher()
+
+    failing = _RecordingDB(commit_fails=True)
+    monkeypatch.setattr(database, "get_db_context", failing.context)
+    with pytest.raises(RuntimeError):
+        await flusher.flush()
+    assert failing.rows and failing.rows[0]["d_request"] == 1
+
+    # 失败后的增量加回，并与之后的新请求合并到下一轮
+    HealthMonitor.record_success(db, key_id="k1", api_format=FMT, response_time_ms=20)
+    ok = _RecordingDB()
+    monkeypatch.setattr(database, "get_db_context", ok.context)
+    assert await flusher.flush() == 1
+    (row,) = ok.rows
+    assert (row["d_request"], row["d_success"], row["d_response_time"]) == (2, 2, 50)
+    assert len(row["b_health"][FMT]["request_results_window"]) == 2
+    assert await flusher.flush() == 0
+
+
+class FakeRedis:
+    """内存版 Redis：按 _CIRCUIT_CAS_SCRIPT 的语义实现 eval，另支持 pipeline().hgetall"""
+
+    def __init__(self) -> None:
+        self.hashes: dict[str, dict[str, str]] = {}
+
+    async def eval(self, script: str, numkeys: int, key: str, *args: Any) -> Any:
+        current = self.hashes.setdefault(key, {})
+        version = int(current.get("version", "0"))
+        expected, *fields, _ttl = args
+        if expected != "-1" and version != int(expected):
+            return [x for pair in current.items() for x in pair]
+        names = ("open", "open_at", "next_probe_at", "half_open_until")
+        names += ("half_open_successes", "half_open_failures")
+        current.update(zip(names, fields))
+        current["version"] = str(version + 1)
+        return version + 1
+
+    def pipeline(self) -> Any:
+        redis = self
+
+        class _Pipe:
+            def __init__(self) -> None:
+                self.keys: list[str] = []
+
+            def hgetall(self, key: str) -> None:
+                self.keys.append(key)
+
+            async def execute(self) -> list[dict[str, str]]:
+                return [dict(redis.hashes.get(k, {})) for k in self.keys]
+
+        return _Pipe()
+
+
+@pytest.mark.asyncio
+async def test_redis_mirror_cas_and_pull() -> None:
+    redis = FakeRedis()
+    store_a, store_b = state_store.HealthStateStore(), state_store.HealthStateStore()
+    a = store_a._keys.setdefault("k1", state_store.KeyHealthState()).format_state(FMT)
+    b = store_b._keys.setdefault("k1", state_store.KeyHealthState()).format_state(FMT)
+
+    a.open, a.next_probe_at = True, 123.0
+    await store_a.publish_circuit(redis, "k1", FMT, a)
+    assert a.version == 1
+
+    # b 基于旧版本的切换被拒绝，改为采纳 a 的状态
+    b.half_open_successes = 2
+    await store_b.publish_circuit(redis, "k1", FMT, b)
+    assert b.open and b.next_probe_at == 123.0 and b.version == 1
+
+    a.reset_circuit()
+    await store_a.publish_circuit(redis, "k1", FMT, a)
+    assert await store_b.pull_circuits(redis) == 1
+    assert not b.open and b.version == 2
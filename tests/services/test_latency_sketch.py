@@ -0,0 +1,141 @@
+"""
+延迟分位数草图测试
+
+覆盖：与精确百分位（percentile_cont 的线性插值）相比的相对误差、合并与序列化无损、
+小时对账写入草图后区间查询合并草图（含按模型过滤）、未对账小时与不足一小时的片段回退扫描原始行。
+"""
+
+from __future__ import annotations
+
+import random
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.models.database import (
+    StatsDaily,
+    StatsHourly,
+    StatsHourlyModel,
+    StatsHourlyProvider,
+    StatsHourlyUser,
+    Usage,
+)
+from src.services.system.latency_sketch import LatencySketch
+from src.services.system.stats_aggregator import (
+    StatsAggregatorService,
+    compute_latency_sketches,
+    sketch_percentiles,
+)
+
+QUANTILES = (0.5, 0.9, 0.99)
+# α = 1% 的桶误差 + 插值差异
+TOLERANCE = 0.02
+BASE = datetime(2025, 1, 1, 10, tzinfo=timezone.utc)
+
+
+def _exact(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    pos = q * (len(ordered) - 1)
+    lower = int(pos)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (pos - lower)
+
+
+def _latencies(rng: random.Random, n: int, mu: float = 6.5) -> list[int]:
+    return [max(1, int(rng.lognormvariate(mu, 0.9))) for _ in range(n)]
+
+
+def test_sketch_accuracy_against_exact_percentiles() -> None:
+    rng = random.Random(7)
+    values = _latencies(rng, 20_000) + [0] * 50
+    sketch = LatencySketch().extend(values)
+    for q in QUANTILES:
+        assert sketch.quantile(q) == pytest.approx(_exact(values, q), rel=TOLERANCE)
+    assert sketch.quantile(0) == 0
+    assert sketch.quantile(1) == max(values)
+
+
+def test_merge_and_serialization_are_lossless() -> None:
+    rng = random.Random(11)
+    parts = [_latencies(rng, 3_000, mu) for mu in (5.0, 6.5, 8.0)]
+    merged = LatencySketch()
+    for part in parts:
+        merged.merge(LatencySketch.from_dict(LatencySketch().extend(part).to_dict()))
+
+    whole = LatencySketch().extend(v for part in parts for v in part)
+    assert merged.to_dict() == whole.to_dict()
+    assert LatencySketch.from_dict(None).quantile(0.5) is None
+    with pytest.raises(ValueError):
+        LatencySketch(alpha=0.02).merge(whole)
+
+
+@pytest.fixture()
+def db() -> Iterator[Session]:
+    engine = create_engine("sqlite://")
+    tables = [
+        Usage.__table__,
+        StatsHourly.__table__,
+        StatsHourlyUser.__table__,
+        StatsHourlyModel.__table__,
+        StatsHourlyProvider.__table__,
+        StatsDaily.__table__,
+    ]
+    Usage.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def test_range_percentiles_merge_hourly_sketches(db: Session) -> None:
+    rng = random.Random(3)
+    expected: dict[str | None, list[int]] = {None: [], "m1": []}
+    # 10:00 / 11:00 对账，12:00 未对账，13:00~13:30 为不足一小时的片段
+    for hour_offset in range(4):
+        hour = BASE + timedelta(hours=hour_offset)
+        for i, latency in enumerate(_latencies(rng, 400)):
+            model = "m1" if i % 2 else "m2"
+            db.add(
+                Usage(
+                    request_id=f"r{hour_offset}-{i}",
+                    provider_name="prov",
+                    model=model,
+                    status="completed",
+                    response_time_ms=latency,
+                    first_byte_time_ms=latency // 4,
+                    created_at=hour + timedelta(seconds=i * 4),
+                )
+            )
+            if hour_offset < 3 or i * 4 < 1800:
+                expected[None].append(latency)
+                if model == "m1":
+                    expected["m1"].append(latency)
+    db.commit()
+
+    for hour_offset in (0, 1):
+        StatsAggregatorService.aggregate_hourly_stats_bundle(
+            db, BASE + timedelta(hours=hour_offset)
+        )
+    # 已对账小时的原始行删除后仍能得到完整分布：证明读取的是草图
+    db.query(Usage).filter(Usage.created_at < BASE + timedelta(hours=2)).delete()
+    db.commit()
+    assert db.query(StatsHourlyModel).filter(StatsHourlyModel.model == "m1").count() == 2
+
+    end = BASE + timedelta(hours=3, minutes=30)
+    for model, values in expected.items():
+        rt_sketch, ttfb_sketch = compute_latency_sketches(db, BASE, end, model=model)
+        assert rt_sketch.count == len(values)
+        assert ttfb_sketch.count == len(values)
+        for q in QUANTILES:
+            assert rt_sketch.quantile(q) == pytest.approx(_exact(values, q), rel=TOLERANCE)
+
+    percentiles = sketch_percentiles(*compute_latency_sketches(db, BASE, end))
+    assert percentiles["p50_response_time_ms"] == pytest.approx(
+        _exact(expected[None], 0.5), rel=TOLERANCE
+    )
+    assert percentiles["p99_first_byte_time_ms"] is not None
@@ -0,0 +1,93 @@
+"""
+LocalCache 测试
+
+覆盖：基础读写与统计、时间轮主动回收过期条目、TinyLFU 抵抗扫描、字节预算。
+"""
+
+from __future__ import annotations
+
+import pytest
+
+from src.services.cache.backend import LocalCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_basic_operations_and_stats() -> None:
+    cache = LocalCache(max_size=100, default_ttl=60)
+    await cache.set("user:1", {"name": "a"})
+    await cache.set("user:2", "b")
+    await cache.set("model:1", 1)
+
+    assert await cache.get("user:1") == {"name": "a"}
+    assert await cache.get("missing") is None
+    assert await cache.exists("user:2")
+
+    await cache.clear("user:*")
+    assert not await cache.exists("user:1") and not await cache.exists("user:2")
+    await cache.delete("model:1")
+    assert await cache.get("model:1") is None
+
+    stats = cache.get_stats()
+    assert (stats["size"], stats["hits"], stats["misses"]) == (0, 1, 2)
+
+
+@pytest.mark.asyncio
+async def test_timer_wheel_reclaims_expired_entries() -> None:
+    clock = FakeClock()
+    cache = LocalCache(max_size=100, default_ttl=5, clock=clock)
+    await cache.set("short", 1)
+    await cache.set("long", 2, ttl=7200)
+
+    clock.now += 10
+    # 任意一次访问推进时钟，未被读取的过期条目也会被回收
+    assert await cache.get("long") == 2
+    assert cache.get_stats()["size"] == 1
+
+    # 跨越多层的长 TTL 经级联后按时到期
+    clock.now += 7180
+    assert await cache.exists("long")
+    clock.now += 20
+    await cache.get("other")
+    stats = cache.get_stats()
+    assert stats["size"] == 0 and stats["expirations"] == 2
+
+
+@pytest.mark.asyncio
+async def test_frequent_keys_survive_scan() -> None:
+    cache = LocalCache(max_size=100, default_ttl=60)
+    hot = [f"hot:{i}" for i in range(50)]
+    for key in hot:
+        await cache.set(key, key)
+    for _ in range(5):
+        for key in hot:
+            assert await cache.get(key) == key
+
+    # 一次性访问的扫描流量不应冲掉热点（纯 LRU 下会被全部淘汰）
+    for i in range(1000):
+        await cache.set(f"scan:{i}", i)
+
+    survived = [key for key in hot if await cache.exists(key)]
+    assert len(survived) >= 45
+    stats = cache.get_stats()
+    assert stats["size"] <= 100 and stats["evictions"] >= 950
+
+
+@pytest.mark.asyncio
+async def test_byte_budget_bounds_entries() -> None:
+    cache = LocalCache(max_size=1000, default_ttl=60, max_bytes=20_000)
+    for i in range(100):
+        await cache.set(f"k:{i}", "x" * 1000)
+    stats = cache.get_stats()
+    assert stats["bytes"] <= 20_000 and stats["size"] < 20
+
+    # 超过预算的单个值不缓存，并移除同名旧值
+    await cache.set("k:99", "y" * 50_000)
+    assert await cache.get("k:99") is None
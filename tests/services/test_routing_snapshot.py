@@ -0,0 +1,195 @@
+"""
+路由快照测试（SQLite 内存库）
+
+覆盖：稳态下候选构建零查询、ORM 变更触发按 Provider 增量重建、高频统计列不触发失效、
+返回的候选挂在请求 Session 上。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.config.settings import config
+from src.models.database import GlobalModel, Model, Provider, ProviderAPIKey, ProviderEndpoint
+from src.services.cache import routing_snapshot
+from src.services.cache.aware_scheduler import CacheAwareScheduler
+from src.services.cache.routing_snapshot import RoutingSnapshotManager
+from src.services.system.config import SystemConfigService
+
+
+@pytest.fixture()
+def engine() -> Iterator[Any]:
+    engine = create_engine("sqlite://")
+    tables = [
+        Provider.__table__,
+        ProviderEndpoint.__table__,
+        ProviderAPIKey.__table__,
+        GlobalModel.__table__,
+        Model.__table__,
+    ]
+    Provider.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [
+            GlobalModel(id="gm1", name="m1", display_name="m1", default_tiered_pricing={}),
+            Provider(id="p1", name="prov-1", provider_priority=1),
+            Provider(id="p2", name="prov-2", provider_priority=2),
+        ]
+    )
+    session.flush()
+    for pid in ("p1", "p2"):
+        session.add_all(
+            [
+                ProviderEndpoint(
+                    id=f"{pid}-ep",
+                    provider_id=pid,
+                    api_format="openai:chat",
+                    api_family="openai",
+                    endpoint_kind="chat",
+                    base_url="https://example.invalid",
+                ),
+                ProviderAPIKey(
+                    id=f"{pid}-key",
+                    provider_id=pid,
+                    api_key="sk",
+                    name=f"{pid}-key",
+                    api_formats=["openai:chat"],
+                ),
+                Model(
+                    id=f"{pid}-m1", provider_id=pid, global_model_id="gm1", provider_model_name="m1"
+                ),
+            ]
+        )
+    session.commit()
+    session.close()
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+@pytest.fixture()
+def manager(monkeypatch: pytest.MonkeyPatch) -> RoutingSnapshotManager:
+    manager = RoutingSnapshotManager()
+    monkeypatch.setattr(routing_snapshot, "_manager", manager)
+    monkeypatch.setattr(
+        SystemConfigService, "get_config", classmethod(lambda cls, db, key, default=None: default)
+    )
+    return manager
+
+
+def _count_queries(engine: Any) -> list[str]:
+    statements: list[str] = []
+    event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+    return statements
+
+
+async def _candidates(db: Session) -> list[Any]:
+    scheduler = CacheAwareScheduler(scheduling_mode="fixed_order")
+    candidates, global_model_id = await scheduler.list_all_candidates(
+        db=db, api_format="openai:chat", model_name="m1"
+    )
+    assert global_model_id == "gm1"
+    return candidates
+
+
+@pytest.mark.asyncio
+async def test_steady_state_builds_candidates_without_queries(
+    engine: Any, manager: RoutingSnapshotManager
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        first = await _candidates(db)
+    assert [c.provider.id for c in first] == ["p1", "p2"]
+
+    statements = _count_queries(engine)
+    with sessionmaker(bind=engine)() as db:
+        candidates = await _candidates(db)
+        assert [c.key.id for c in candidates] == ["p1-key", "p2-key"]
+        assert all(c.key in db and c.provider in db and c.endpoint in db for c in candidates)
+    assert statements == []
+    assert manager.snapshot is not None and manager.snapshot.version == 1
+
+
+@pytest.mark.asyncio
+async def test_key_change_rebuilds_only_its_provider(
+    engine: Any, manager: RoutingSnapshotManager
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        await _candidates(db)
+    old = manager.snapshot
+    assert old is not None
+
+    with sessionmaker(bind=engine)() as db:
+        key = db.get(ProviderAPIKey, "p2-key")
+        assert key is not None
+        key.is_active = False
+        db.commit()
+
+    with sessionmaker(bind=engine)() as db:
+        candidates = await _candidates(db)
+    assert [c.key.id for c in candidates] == ["p1-key"]
+
+    new = manager.snapshot
+    assert new is not None and new.version == old.version + 1
+    # 未变更的 Provider 条目原样复用
+    p1_old = next(rp for rp in old.providers if rp.id == "p1")
+    assert any(rp is p1_old for rp in new.providers)
+
+
+@pytest.mark.asyncio
+async def test_volatile_columns_do_not_invalidate(
+    engine: Any, manager: RoutingSnapshotManager
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        candidates = await _candidates(db)
+        # 候选已挂在 Session 上，下游修改统计列可直接 flush
+        candidates[0].key.request_count = 10
+        candidates[0].key.circuit_breaker_by_format = {"openai:chat": {"open": False}}
+        db.commit()
+    version = manager.snapshot.version if manager.snapshot else None
+
+    with sessionmaker(bind=engine)() as db:
+        assert db.get(ProviderAPIKey, "p1-key").request_count == 10  # type: ignore[union-attr]
+        await _candidates(db)
+    assert manager.snapshot is not None and manager.snapshot.version == version
+
+    with sessionmaker(bind=engine)() as db:
+        key = db.get(ProviderAPIKey, "p1-key")
+        assert key is not None
+        key.circuit_breaker_by_format = {"openai:chat": {"open": True}}
+        db.commit()
+        await _candidates(db)
+    assert manager.snapshot.version == (version or 0) + 1
+
+
+@pytest.mark.asyncio
+async def test_snapshot_and_db_paths_page_over_the_same_providers(
+    engine: Any, manager: RoutingSnapshotManager, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # 优先级最高但未实现该模型的 Provider 不占分页位置
+    with sessionmaker(bind=engine)() as db:
+        db.add(Provider(id="p0", name="prov-0", provider_priority=0))
+        db.commit()
+
+    async def page(offset: int, *, use_snapshot: bool) -> list[str]:
+        monkeypatch.setattr(config, "routing_snapshot_enabled", use_snapshot)
+        scheduler = CacheAwareScheduler(scheduling_mode="fixed_order")
+        with sessionmaker(bind=engine)() as db:
+            candidates, _ = await scheduler.list_all_candidates(
+                db=db,
+                api_format="openai:chat",
+                model_name="m1",
+                provider_offset=offset,
+                provider_limit=1,
+            )
+        return [c.provider.id for c in candidates]
+
+    for use_snapshot in (True, False):
+        assert await page(0, use_snapshot=use_snapshot) == ["p1"]
+        assert await page(1, use_snapshot=use_snapshot) == ["p2"]
+        assert await page(2, use_snapshot=use_snapshot) == []
@@ -0,0 +1,149 @@
+"""
+RPM 租约测试
+
+覆盖：租约模式下 Redis 往返次数远少于逐次计数、多进程共享计数时放行总数不超过限制
+且新用户不占用预留槽位、停止时归还未用槽位、计数查询由本地估算回答。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import math
+from typing import Any
+
+import pytest
+
+from src.services.rate_limit import rpm_lease
+from src.services.rate_limit.concurrency_manager import ConcurrencyManager
+from src.services.rate_limit.rpm_lease import RPMLeaser
+
+BUCKET = 1000
+
+
+class FakeRedis:
+    """内存版 Redis：按租约脚本、归还脚本与逐次计数脚本的语义实现 eval"""
+
+    def __init__(self) -> None:
+        self.counts: dict[str, int] = {}
+        self.ops: list[str] = []
+
+    async def eval(self, script: str, numkeys: int, key: str, *argv: Any) -> Any:
+        await asyncio.sleep(0)
+        count = self.counts.get(key, 0)
+        if script == rpm_lease._LEASE_SCRIPT:
+            self.ops.append("lease")
+            limit, _ttl, is_cached, ratio, want = argv
+            new_cap = max(1, math.floor(limit * (1 - ratio)))
+            remaining = (limit if is_cached else new_cap) - count
+            if remaining <= 0:
+                return [0, 0, count]
+            grant = min(want, max(1, remaining // 2))
+            self.counts[key] = count + grant
+            general = max(0, min(grant, new_cap - count))
+            return [general, grant - general, count + grant]
+        if script == rpm_lease._RETURN_SCRIPT:
+            self.ops.append("return")
+            n = min(argv[0], count)
+            self.counts[key] = count - n
+            return n
+        # ConcurrencyManager 逐次计数脚本
+        self.ops.append("acquire")
+        limit, _ttl, is_cached, ratio = argv
+        cap = limit if is_cached else max(1, math.floor(limit * (1 - ratio)))
+        if count >= cap:
+            return 0
+        self.counts[key] = count + 1
+        return 1
+
+    async def get(self, key: str) -> Any:
+        self.ops.append("get")
+        return self.counts.get(key)
+
+
+def _leaser(redis: FakeRedis, max_error_ratio: float = 0.05) -> RPMLeaser:
+    return RPMLeaser(
+        redis,
+        redis_key=lambda key_id, bucket: f"rpm:key:{key_id}:{bucket}",
+        current_bucket=lambda: BUCKET,
+        key_ttl=120,
+        max_error_ratio=max_error_ratio,
+        horizon_seconds=2,
+        idle_return_seconds=5,
+    )
+
+
+@pytest.fixture()
+def manager(monkeypatch: pytest.MonkeyPatch) -> tuple[ConcurrencyManager, FakeRedis]:
+    redis = FakeRedis()
+    manager = ConcurrencyManager()
+    monkeypatch.setattr(manager, "_redis", redis)
+    monkeypatch.setattr(manager, "_leaser", None)
+    monkeypatch.setattr(ConcurrencyManager, "_get_rpm_bucket", classmethod(lambda cls: BUCKET))
+    return manager, redis
+
+
+@pytest.mark.asyncio
+async def test_lease_cuts_redis_ops(
+    manager: tuple[ConcurrencyManager, FakeRedis], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    cm, redis = manager
+    for _ in range(200):
+        assert await cm.acquire_rpm_slot("k1", 1000, cache_reservation_ratio=0.1)
+    assert redis.ops.count("acquire") == 200
+
+    redis.ops.clear()
+    monkeypatch.setattr(cm, "_leaser", _leaser(redis))
+    for _ in range(200):
+        assert await cm.acquire_rpm_slot("k2", 1000, cache_reservation_ratio=0.1)
+        await cm.get_key_rpm_count("k2")
+    # 每次租约最多 50 个（1000 * 5%），计数查询由本地估算回答
+    assert len(redis.ops) < 20
+    assert redis.ops.count("get") == 0
+    assert await cm.get_key_rpm_count("k2") == 200
+
+
+@pytest.mark.asyncio
+async def test_workers_never_exceed_limit() -> None:
+    redis = FakeRedis()
+    workers = [_leaser(redis, max_error_ratio=0.2) for _ in range(3)]
+    limit, ratio = 50, 0.2
+
+    async def attempt(i: int) -> tuple[bool, bool]:
+        is_cached = i % 3 == 0
+        granted = await workers[i % 3].acquire("k1", BUCKET, limit, is_cached, ratio)
+        return granted, is_cached
+
+    results = await asyncio.gather(*(attempt(i) for i in range(300)))
+    granted_new = sum(1 for granted, cached in results if granted and not cached)
+    granted_cached = sum(1 for granted, cached in results if granted and cached)
+
+    assert granted_new + granted_cached <= limit
+    assert granted_new <= math.floor(limit * (1 - ratio))
+    # 误差只来自各进程未用完的租约
+    unspent = sum(w.get_stats()["unspent"] for w in workers)
+    assert granted_new + granted_cached + unspent == redis.counts["rpm:key:k1:1000"]
+
+    for worker in workers:
+        await worker.stop()
+    assert redis.counts["rpm:key:k1:1000"] == granted_new + granted_cached
+
+
+@pytest.mark.asyncio
+async def test_idle_and_rolled_over_leases_are_returned() -> None:
+    redis = FakeRedis()
+    leaser = _leaser(redis, max_error_ratio=0.5)
+    for _ in range(5):
+        assert await leaser.acquire("k1", BUCKET, 100, False, 0.0)
+    leased = redis.counts["rpm:key:k1:1000"]
+    assert leased > 5
+
+    leaser.release_idle(BUCKET, now=10**10)
+    assert await leaser.flush_returns() == leased - 5
+    assert redis.counts["rpm:key:k1:1000"] == 5
+
+    # 分钟桶切换：旧桶租约移除
+    assert await leaser.acquire("k1", BUCKET, 100, False, 0.0)
+    leaser.release_idle(BUCKET + 1, now=0)
+    await leaser.flush_returns()
+    assert redis.counts["rpm:key:k1:1000"] == 6
+    assert leaser.get_stats()["leases"] == 0
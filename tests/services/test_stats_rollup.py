@@ -0,0 +1,147 @@
+"""
+统计增量汇总测试（SQLite 内存库）
+
+覆盖：终态 usage 折叠到全局/用户/模型/提供商四个维度、UPSERT 累加计数并按请求数加权平均响应时间、
+已对账小时丢弃迟到增量、"今日"统计直接读取小时级统计表。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.models.database import StatsHourly, StatsHourlyModel, StatsHourlyProvider, StatsHourlyUser
+from src.services.system import stats_aggregator
+from src.services.system.stats_aggregator import StatsAggregatorService
+from src.services.system.stats_rollup import (
+    RollupRecorder,
+    capture_usage,
+    rollup_covers,
+    write_batch,
+)
+
+HOUR = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+@pytest.fixture()
+def db() -> Iterator[Session]:
+    engine = create_engine("sqlite://")
+    tables = [
+        StatsHourly.__table__,
+        StatsHourlyUser.__table__,
+        StatsHourlyModel.__table__,
+        StatsHourlyProvider.__table__,
+    ]
+    StatsHourly.metadata.create_all(engine, tables=tables)
+    session = sessionmaker(bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _usage(**kwargs: Any) -> dict[str, Any]:
+    params: dict[str, Any] = {
+        "status": "completed",
+        "status_code": 200,
+        "error_message": None,
+        "user_id": "u1",
+        "model": "claude-sonnet",
+        "provider_name": "anthropic",
+        "input_tokens": 100,
+        "output_tokens": 10,
+        "cache_creation_input_tokens": 5,
+        "cache_read_input_tokens": 20,
+        "cache_creation_cost_usd": 0.01,
+        "cache_read_cost_usd": 0.002,
+        "total_cost_usd": 0.5,
+        "actual_total_cost_usd": 0.4,
+        "response_time_ms": 100,
+    }
+    params.update(kwargs)
+    return params
+
+
+def test_capture_and_fold_across_dimensions() -> None:
+    assert capture_usage(_usage(status="streaming")) is None
+
+    recorder = RollupRecorder()
+    recorder.fold(
+        [
+            capture_usage(_usage(), HOUR),
+            capture_usage(_usage(status="failed", status_code=502, user_id="u2"), HOUR),
+            capture_usage(_usage(provider_name=None), HOUR + timedelta(minutes=30)),
+            None,
+        ]
+    )
+    batch = recorder.drain()
+
+    total = batch[("global", HOUR, "")]
+    assert (total.requests, total.errors, total.input_tokens) == (3, 1, 300)
+    assert batch[("user", HOUR, "u1")].requests == 2
+    assert batch[("user", HOUR, "u2")].errors == 1
+    assert batch[("model", HOUR, "claude-sonnet")].requests == 3
+    assert batch[("provider", HOUR, "anthropic")].requests == 2
+    assert recorder.pending_count() == 0
+
+
+def test_upsert_adds_counts_and_weights_average(db: Session) -> None:
+    for response_times in ([100, 100], [400]):
+        recorder = RollupRecorder()
+        recorder.fold(capture_usage(_usage(response_time_ms=ms), HOUR) for ms in response_times)
+        write_batch(db, recorder.drain())
+        db.commit()
+
+    row = db.query(StatsHourly).one()
+    assert (row.total_requests, row.success_requests, row.error_requests) == (3, 3, 0)
+    assert row.input_tokens == 300
+    assert row.cache_read_cost == pytest.approx(0.006)
+    assert row.avg_response_time_ms == pytest.approx(200)
+    assert row.is_complete is False
+    assert db.query(StatsHourlyUser).one().total_requests == 3
+    assert db.query(StatsHourlyModel).one().avg_response_time_ms == pytest.approx(200)
+    assert db.query(StatsHourlyProvider).one().total_cost == pytest.approx(1.5)
+
+
+def test_reconciled_hour_drops_late_deltas(db: Session) -> None:
+    earlier = HOUR - timedelta(hours=1)
+    db.add(StatsHourly(hour_utc=earlier, total_requests=7, is_complete=True))
+    db.commit()
+
+    recorder = RollupRecorder()
+    recorder.fold([capture_usage(_usage(), earlier), capture_usage(_usage(), HOUR)])
+    assert write_batch(db, recorder.drain()) == 4  # 只写当前小时的四个维度
+    db.commit()
+
+    rows = {row.hour_utc.replace(tzinfo=timezone.utc): row for row in db.query(StatsHourly)}
+    assert rows[earlier].total_requests == 7
+    assert rows[HOUR].total_requests == 1
+    assert db.query(StatsHourlyUser).count() == 1
+
+
+def test_today_stats_read_rollup(db: Session, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(stats_aggregator, "STATS_ROLLUP_ENABLED", True)
+    assert rollup_covers(HOUR)
+    assert not rollup_covers(HOUR - timedelta(days=1))
+
+    recorder = RollupRecorder()
+    recorder.fold(
+        [
+            capture_usage(_usage(response_time_ms=100), HOUR),
+            capture_usage(_usage(model="gpt-5", provider_name="openai", status_code=500), HOUR),
+        ]
+    )
+    write_batch(db, recorder.drain())
+    db.commit()
+
+    stats = StatsAggregatorService.get_today_realtime_stats(db)
+    assert (stats["total_requests"], stats["error_requests"]) == (2, 1)
+    assert stats["actual_total_cost"] == pytest.approx(0.8)
+    assert stats["avg_response_time_ms"] == pytest.approx(100)
+    assert (stats["unique_models"], stats["unique_providers"]) == (2, 2)
@@ -0,0 +1,123 @@
+"""
+StreamUsageTracker 流式累积测试
+
+覆盖：跨块的多字节字符与长行拆分、超出捕获上限后只保留头部/末尾且计数不丢失、
+增强版跟踪器按增量滚动计数输出 token。
+"""
+
+from __future__ import annotations
+
+import json
+from collections.abc import AsyncIterator
+from typing import Any
+
+import pytest
+
+from src.config.settings import config
+from src.services.usage.stream import (
+    CappedTextBuffer,
+    EnhancedStreamUsageTracker,
+    StreamUsageTracker,
+)
+
+
+def _delta_event(text: str) -> bytes:
+    payload = {
+        "type": "content_block_delta",
+        "index": 0,
+        "delta": {"type": "text_delta", "text": text},
+    }
+    return (
+        f"event: content_block_delta\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n".encode()
+    )
+
+
+def _stream_bytes(texts: list[str]) -> bytes:
+    start = {
+        "type": "content_block_start",
+        "index": 0,
+        "content_block": {"type": "text", "text": ""},
+    }
+    body = f"event: content_block_start\ndata: {json.dumps(start)}\n\n".encode()
+    return body + b"".join(_delta_event(t) for t in texts)
+
+
+def _tracker(cls: type[StreamUsageTracker] = StreamUsageTracker) -> StreamUsageTracker:
+    return cls(None, None, None, "anthropic", "claude-sonnet", api_format="claude:chat")  # type: ignore[arg-type]
+
+
+async def _drain(tracker: StreamUsageTracker, chunks: list[bytes]) -> None:
+    async def source() -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            yield chunk
+
+    async for _ in tracker.track_stream(source(), {"messages": []}):  # type: ignore[arg-type]
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _skip_record(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def _noop(self: Any) -> None:
+        return None
+
+    monkeypatch.setattr(StreamUsageTracker, "_record_usage", _noop)
+
+
+def test_capped_text_buffer_keeps_head_and_tail() -> None:
+    buffer = CappedTextBuffer(max_chars=5, tail_chars=4)
+    for part in ["abc", "defg", "hij", "klmnop"]:
+        buffer.append(part)
+    assert len(buffer) == 16
+    assert buffer.getvalue() == "abcde" + "mnop"
+    assert buffer.omitted == 7
+
+
+def test_parse_chunk_handles_split_utf8_and_lines() -> None:
+    tracker = _tracker()
+    data = _stream_bytes(["你好", "世界"])
+    pieces = [data[i : i + 3] for i in range(0, len(data), 3)]
+    contents = [tracker.parse_stream_chunk(piece)[0] for piece in pieces]
+    assert "".join(c for c in contents if c) == "你好世界"
+
+
+@pytest.mark.asyncio
+async def test_long_stream_memory_is_capped(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(config, "stream_capture_max_chars", 100)
+    monkeypatch.setattr(config, "stream_capture_tail_chars", 20)
+    monkeypatch.setattr(config, "stream_capture_max_chunks", 10)
+
+    texts = [f"<{i:04d}>" for i in range(2000)]
+    tracker = _tracker()
+    await _drain(tracker, [_stream_bytes(texts[:1])] + [_delta_event(t) for t in texts[1:]])
+
+    full = "".join(texts)
+    assert len(tracker._content) == len(full)
+    assert tracker.output_tokens == len(full) // 4
+    assert tracker.accumulated_content == full[:100] + full[-20:]
+    assert len(tracker.response_chunks) == 10
+    assert tracker.total_chunk_count == 2001
+    assert len(tracker._captured_chunks()) < 100
+    assert tracker.raw_chunk_count == 2000
+    assert len(tracker.raw_chunks) < 2000
+
+    tracker._finalize_complete_response()
+    assert tracker.complete_response["content"][0]["text"] == full[:100] + full[-20:]
+
+
+@pytest.mark.asyncio
+async def test_enhanced_tracker_counts_tokens_incrementally() -> None:
+    tracker = _tracker(EnhancedStreamUsageTracker)
+    calls: list[str] = []
+    original = tracker.count_tokens
+
+    def _count(text: str) -> int:
+        calls.append(text)
+        return original(text)
+
+    tracker.count_tokens = _count  # type: ignore[method-assign]
+    await _drain(
+        tracker, [_stream_bytes(["hello world"]), _delta_event(" 你好"), _delta_event(" again")]
+    )
+    # 第一次调用来自输入估算
+    assert calls[1:] == ["hello world", " 你好", " again"]
+    assert tracker.output_tokens == 2 + 4 + 1
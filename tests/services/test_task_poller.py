@@ -0,0 +1,253 @@
+"""
+视频任务轮询调度测试（SQLite 内存库）
+
+覆盖：分区到期队列的取出顺序与改期、按预计完成耗时的自适应间隔、
+批量准备跳过未到期/已取消任务、进行中任务一条 UPDATE 写回且不覆盖已取消任务、
+终态任务逐个结算并学习完成耗时。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from datetime import datetime, timedelta, timezone
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from src.core.api_format.conversion.internal_video import InternalVideoPollResult, VideoStatus
+from src.models.database import VideoTask
+from src.services.task.impl import video_poller
+from src.services.task.impl.video_poller import VideoPollContext, VideoTaskPollerAdapter
+from src.services.task.scheduling import AdaptiveBackoff, DueQueue, PartitionLeases, PollOutcome
+
+NOW = datetime(2030, 1, 1, 12, 0, tzinfo=timezone.utc)
+
+
+def test_due_queue_pops_earliest_owned_first() -> None:
+    queue = DueQueue(partitions=4)
+    for i in range(8):
+        queue.schedule(f"t{i}", 100.0 + i)
+    queue.schedule("t0", 500.0)  # 改期：旧的堆条目作废
+    queue.discard("t1")
+
+    everything = range(4)
+    assert queue.pop_due(103.0, limit=1, partitions=everything) == ["t2"]
+    assert queue.pop_due(110.0, limit=10, partitions=everything) == [f"t{i}" for i in range(3, 8)]
+    assert queue.next_due(everything) == 500.0
+    assert len(queue) == 1
+
+    # 只取自己持有的分区
+    queue.schedule("x", 1.0)
+    other = [p for p in everything if p != queue.partition_of("x")]
+    assert queue.pop_due(2.0, limit=10, partitions=other) == []
+    assert queue.pop_due(2.0, limit=10, partitions=[queue.partition_of("x")]) == ["x"]
+
+
+def test_adaptive_backoff_converges_on_expected_duration() -> None:
+    backoff = AdaptiveBackoff(max_interval=60)
+    key = AdaptiveBackoff.key("openai:video", "sora-2")
+    assert backoff.next_delay(key, elapsed=0, base_interval=10) == 10
+
+    backoff.observe(key, 200)
+    assert backoff.next_delay(key, elapsed=0, base_interval=10) == 60
+    assert backoff.next_delay(key, elapsed=120, base_interval=10) == 40
+    assert backoff.next_delay(key, elapsed=195, base_interval=10) == 10
+    # 远超预计时间后逐步放大，不超过上限
+    assert backoff.next_delay(key, elapsed=800, base_interval=10) == 30
+    assert backoff.next_delay(key, elapsed=10_000, base_interval=10) == 60
+
+
+@pytest.mark.asyncio
+async def test_partition_leases_without_redis_own_everything() -> None:
+    leases = PartitionLeases(None, prefix="task_poller:video", partitions=8, ttl_seconds=60)
+    assert await leases.refresh() == frozenset(range(8))
+
+
+@pytest.fixture()
+def engine(monkeypatch: pytest.MonkeyPatch) -> Iterator[Engine]:
+    engine = create_engine(
+        "sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool
+    )
+    VideoTask.metadata.create_all(engine, tables=[VideoTask.__table__])
+    monkeypatch.setattr(video_poller, "create_session", sessionmaker(bind=engine))
+    try:
+        yield engine
+    finally:
+        engine.dispose()
+
+
+def _task(task_id: str, status: str, **kwargs: Any) -> VideoTask:
+    defaults: dict[str, Any] = {
+        "user_id": "u1",
+        "client_api_format": "openai:video",
+        "provider_api_format": "openai:video",
+        "model": "sora-2",
+        "prompt": "p",
+        "next_poll_at": NOW - timedelta(seconds=1),
+        "submitted_at": NOW - timedelta(seconds=100),
+        "poll_count": 2,
+        "retry_count": 0,
+        "max_poll_count": 10,
+        "poll_interval_seconds": 10,
+        "progress_percent": 30,
+    }
+    defaults.update(kwargs)
+    return VideoTask(
+        id=task_id, request_id=f"r-{task_id}", status=status, external_task_id=task_id, **defaults
+    )
+
+
+def _ctx(task_id: str, **kwargs: Any) -> VideoPollContext:
+    fields: dict[str, Any] = {
+        "task_id": task_id,
+        "external_task_id": task_id,
+        "provider_api_format": "openai:video",
+        "base_url": "",
+        "upstream_key": "k",
+        "headers": {},
+        "poll_count": 2,
+        "retry_count": 0,
+        "poll_interval_seconds": 10,
+        "max_poll_count": 10,
+        "current_status": VideoStatus.PROCESSING.value,
+        "model": "sora-2",
+        "submitted_at": NOW - timedelta(seconds=100),
+    }
+    fields.update(kwargs)
+    return VideoPollContext(**fields)
+
+
+@pytest.mark.asyncio
+async def test_prepare_batch_skips_inactive_and_reschedules_not_due(engine: Engine) -> None:
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(
+            [
+                _task("due", VideoStatus.PROCESSING.value, endpoint_id=None),
+                _task("later", VideoStatus.QUEUED.value, next_poll_at=NOW + timedelta(minutes=5)),
+                _task("cancelled", VideoStatus.CANCELLED.value),
+            ]
+        )
+        db.commit()
+
+        adapter = VideoTaskPollerAdapter()
+        prepared, reschedule = await adapter.prepare_poll_batch(
+            db, ["due", "later", "cancelled", "missing"], now=NOW
+        )
+
+    assert [task_id for task_id, _ in prepared] == ["due"]
+    # 缺少 provider 信息：准备阶段直接给出失败结果
+    assert prepared[0][1].status == VideoStatus.FAILED
+    assert reschedule == {"later": NOW + timedelta(minutes=5)}
+
+
+@pytest.mark.asyncio
+async def test_apply_results_batches_progress_and_finalizes_terminal(
+    engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        db.add_all(
+            [
+                _task("p1", VideoStatus.PROCESSING.value),
+                _task("p2", VideoStatus.PROCESSING.value, progress_message="queued upstream"),
+                _task("gone", VideoStatus.CANCELLED.value),
+                _task("done", VideoStatus.PROCESSING.value),
+            ]
+        )
+        db.commit()
+
+    finalized: list[str] = []
+
+    async def _finalize(_self: Any, task: VideoTask) -> bool:
+        finalized.append(task.id)
+        return True
+
+    monkeypatch.setattr(video_poller.TaskService, "finalize_video_task", _finalize)
+    monkeypatch.setattr(video_poller, "datetime", _FrozenDatetime)
+
+    updates: list[str] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(_conn: Any, _cursor: Any, statement: str, *_args: Any) -> None:
+        if statement.lstrip().upper().startswith("UPDATE"):
+            updates.append(statement)
+
+    adapter = VideoTaskPollerAdapter()
+    processing = InternalVideoPollResult(status=VideoStatus.PROCESSING, progress_percent=60)
+    outcomes = [
+        PollOutcome("p1", processing, _ctx("p1")),
+        PollOutcome(
+            "p2",
+            InternalVideoPollResult(status=None, error_message="timeout"),  # type: ignore[arg-type]
+            _ctx("p2"),
+            TimeoutError("read timeout"),
+        ),
+        PollOutcome("gone", processing, _ctx("gone")),
+        PollOutcome(
+            "done",
+            InternalVideoPollResult(status=VideoStatus.COMPLETED, video_url="https://v/1.mp4"),
+            _ctx("done"),
+        ),
+    ]
+    next_due = await adapter.apply_poll_results(outcomes, redis_client=None)
+
+    # 三个进行中任务一条语句写回（SQLite 上为 executemany），终态任务单独更新
+    assert len(updates) == 2
+    assert next_due["p1"] == NOW + timedelta(seconds=10)
+    assert next_due["p2"] == NOW + timedelta(seconds=10)
+    assert finalized == ["done"]
+    assert adapter.backoff.expected(AdaptiveBackoff.key("openai:video", "sora-2")) == 100
+
+    with sessionmaker(bind=engine)() as db:
+        rows = {t.id: t for t in db.query(VideoTask).all()}
+    assert (rows["p1"].poll_count, rows["p1"].progress_percent) == (3, 60)
+    assert (rows["p2"].retry_count, rows["p2"].progress_percent) == (1, 30)
+    assert rows["p2"].progress_message == "Poll error: read timeout"
+    assert rows["gone"].status == VideoStatus.CANCELLED.value
+    assert rows["gone"].poll_count == 2
+    assert rows["done"].status == VideoStatus.COMPLETED.value
+
+
+@pytest.mark.asyncio
+async def test_duplicate_terminal_outcome_finalizes_once(
+    engine: Engine, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    with sessionmaker(bind=engine)() as db:
+        db.add(_task("done", VideoStatus.PROCESSING.value))
+        db.commit()
+
+    finalized: list[str] = []
+
+    async def _finalize(_self: Any, task: VideoTask) -> bool:
+        finalized.append(task.id)
+        return True
+
+    monkeypatch.setattr(video_poller.TaskService, "finalize_video_task", _finalize)
+
+    locked: list[Any] = []
+    original_get = Session.get
+
+    def _get(self: Session, entity: Any, ident: Any, **kwargs: Any) -> Any:
+        locked.append(kwargs.get("with_for_update"))
+        return original_get(self, entity, ident, **kwargs)
+
+    monkeypatch.setattr(Session, "get", _get)
+
+    # 分区租约交接：新旧持有者都以旧上下文轮询到同一任务的终态
+    completed = InternalVideoPollResult(status=VideoStatus.COMPLETED, video_url="https://v/1.mp4")
+    adapter = VideoTaskPollerAdapter()
+    await adapter.apply_poll_results([PollOutcome("done", completed, _ctx("done"))], None)
+    await adapter.apply_poll_results([PollOutcome("done", completed, _ctx("done"))], None)
+    await adapter.update_task_after_poll("done", completed, _ctx("done"), None)
+
+    assert finalized == ["done"]
+    assert locked and all(locked)
+
+
+class _FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz: Any = None) -> datetime:  # type: ignore[override]
+        return NOW
@@ -0,0 +1,116 @@
+"""
+两级缓存测试
+
+覆盖：并发未命中的单飞加载、L1 命中返回独立副本、加载期间失效不回填旧值、
+远程失效广播只清理 L1 且忽略自身消息。
+"""
+
+from __future__ import annotations
+
+import asyncio
+from typing import Any
+
+import pytest
+
+from src.core.cache_service import CacheService
+from src.services.cache import tiered
+from src.services.cache.tiered import TieredCache, handle_tiered_invalidation
+
+
+@pytest.fixture()
+def redis_store(monkeypatch: pytest.MonkeyPatch) -> dict[str, Any]:
+    """用内存字典代替 CacheService 的 Redis 读写"""
+    store: dict[str, Any] = {}
+
+    async def _get(key: str) -> Any:
+        return store.get(key)
+
+    async def _set(key: str, value: Any, ttl_seconds: int = 60) -> bool:  # noqa: ARG001
+        store[key] = value
+        return True
+
+    async def _delete(key: str) -> bool:
+        return store.pop(key, None) is not None
+
+    async def _delete_pattern(pattern: str) -> int:
+        prefix = pattern.rstrip("*")
+        keys = [k for k in store if k.startswith(prefix)]
+        for k in keys:
+            del store[k]
+        return len(keys)
+
+    async def _broadcast(*_args: Any) -> None:
+        return None
+
+    monkeypatch.setattr(CacheService, "get", staticmethod(_get))
+    monkeypatch.setattr(CacheService, "set", staticmethod(_set))
+    monkeypatch.setattr(CacheService, "delete", staticmethod(_delete))
+    monkeypatch.setattr(CacheService, "delete_pattern", staticmethod(_delete_pattern))
+    monkeypatch.setattr(tiered, "_broadcast", _broadcast)
+    return store
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_load(redis_store: dict[str, Any]) -> None:
+    cache = TieredCache("test-single-flight", ttl=60, l1_ttl=10)
+    calls = 0
+
+    async def load() -> dict[str, Any]:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return {"id": "m1", "tags": ["a"]}
+
+    results = await asyncio.gather(*(cache.get_or_load("model:id:m1", load) for _ in range(10)))
+    assert calls == 1
+    assert all(r == {"id": "m1", "tags": ["a"]} for r in results)
+    assert redis_store["model:id:m1"] == {"id": "m1", "tags": ["a"]}
+
+    # L1 命中：不访问 L2，且返回值互不影响
+    redis_store.clear()
+    first = await cache.get_or_load("model:id:m1", load)
+    first["tags"].append("mutated")
+    second = await cache.get("model:id:m1")
+    assert second == {"id": "m1", "tags": ["a"]}
+
+    stats = cache.get_stats()
+    assert (stats["loads"], stats["coalesced"], stats["l1_hits"]) == (1, 9, 2)
+
+
+@pytest.mark.asyncio
+async def test_invalidation_during_load_skips_write_back(redis_store: dict[str, Any]) -> None:
+    cache = TieredCache("test-epoch", ttl=60, l1_ttl=10)
+    started = asyncio.Event()
+    release = asyncio.Event()
+
+    async def slow_load() -> str:
+        started.set()
+        await release.wait()
+        return "stale"
+
+    task = asyncio.create_task(cache.get_or_load("k", slow_load))
+    await started.wait()
+    await cache.invalidate("k")
+    release.set()
+    assert await task == "stale"
+
+    assert "k" not in redis_store
+    assert await cache.get_or_load("k", lambda: "fresh") == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_remote_invalidation_drops_l1_only(redis_store: dict[str, Any]) -> None:
+    cache = TieredCache("test-remote", ttl=60, l1_ttl=10)
+    await cache.set("k", 1)
+    redis_store["k"] = 2  # 其他实例已更新 L2
+
+    await handle_tiered_invalidation(
+        {"cache": "test-remote", "keys": ["k"], "prefixes": [], "origin": tiered._INSTANCE_ID}
+    )
+    assert await cache.get("k") == 1
+
+    await handle_tiered_invalidation(
+        {"cache": "test-remote", "keys": ["k"], "prefixes": [], "origin": "other"}
+    )
+    assert await cache.get("k") == 2
+    assert redis_store["k"] == 2
@@ -0,0 +1,89 @@
+"""
+共享分词服务测试
+
+使用假编码器（按空白切分）避免下载 tiktoken 编码文件。
+覆盖：模型 -> 编码名解析（最长前缀优先）、多轮对话按前缀哈希只对新增尾部分词、
+大输入卸载执行、编码器不可用时回退估算。
+"""
+
+from __future__ import annotations
+
+from typing import Any
+
+import pytest
+
+from src.services.usage import tokenizer
+from src.services.usage.tokenizer import TokenizerService, encoding_for_model, estimate_tokens
+from src.utils import tiktoken_worker
+
+
+class _FakeEncoder:
+    def __init__(self) -> None:
+        self.calls: list[str] = []
+
+    def encode(self, text: str, **_: Any) -> list[str]:
+        self.calls.append(text)
+        return text.split()
+
+
+@pytest.fixture()
+def encoder(monkeypatch: pytest.MonkeyPatch) -> _FakeEncoder:
+    fake = _FakeEncoder()
+    monkeypatch.setattr(tiktoken_worker, "_encoders", {"cl100k_base": fake, "o200k_base": fake})
+    return fake
+
+
+def test_encoding_for_model_prefers_longest_prefix() -> None:
+    assert encoding_for_model("gpt-4o-2024-08-06") == "o200k_base"
+    assert encoding_for_model("gpt-4-0613") == "cl100k_base"
+    assert encoding_for_model("text-davinci-003") == "p50k_base"
+    assert encoding_for_model("claude-sonnet-4") == tokenizer.DEFAULT_ENCODING
+    assert encoding_for_model(None) == tokenizer.DEFAULT_ENCODING
+
+
+@pytest.mark.asyncio
+async def test_multi_turn_only_tokenizes_new_tail(encoder: _FakeEncoder) -> None:
+    service = TokenizerService(pool_size=0)
+    history: list[dict[str, Any]] = [
+        {"role": "system", "content": "you are helpful"},
+        {"role": "user", "content": "hello there"},
+    ]
+    first = await service.count_messages(history, "gpt-4")
+    # 每条消息 3 + 角色 1 + 内容，结束标记 3
+    assert first == (3 + 1 + 3) + (3 + 1 + 2) + 3
+
+    encoder.calls.clear()
+    history = history + [
+        {"role": "assistant", "content": "hi how can I help"},
+        {"role": "user", "content": [{"type": "text", "text": "count this"}]},
+    ]
+    second = await service.count_messages(history, "gpt-4")
+    assert encoder.calls == ["assistant", "hi how can I help", "user", "count this"]
+    assert second == await TokenizerService(pool_size=0).count_messages(history, "gpt-4")
+
+    # 历史被修改时前缀哈希不再命中，从分叉处重新分词
+    encoder.calls.clear()
+    edited = [history[0], {"role": "user", "content": "hello again"}, *history[2:]]
+    await service.count_messages(edited, "gpt-4")
+    assert encoder.calls[:2] == ["user", "hello again"]
+    assert "you are helpful" not in encoder.calls
+
+
+@pytest.mark.asyncio
+async def test_large_input_is_offloaded_and_cached(encoder: _FakeEncoder) -> None:
+    service = TokenizerService(offload_chars=1000, pool_size=0)
+    text = "word " * 500
+    assert await service.count_text(text, "gpt-4") == 500
+    assert await service.count_text(text, "gpt-4") == 500
+    assert len(encoder.calls) == 1
+    assert service.stats()["offloaded"] == 1
+    assert service.stats()["cache_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_missing_encoder_falls_back_to_estimate(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(tiktoken_worker, "_encoders", {})
+    monkeypatch.setattr(tiktoken_worker, "_unavailable", {"cl100k_base"})
+    assert tokenizer.get_encoder("cl100k_base") is None
+    assert estimate_tokens("你好 world") == 5
+    assert await TokenizerService(pool_size=0).count_text("你好 world", "gpt-4") == 5
@@ -0,0 +1,205 @@
+"""
+UsageService.record_usage_batch 批量写入测试（SQLite 内存库）
+
+覆盖：多行 INSERT ... ON CONFLICT、批次内重复 request_id、并发写入冲突改走更新路径、
+按 user/api_key/model/provider 聚合后的单条 UPDATE。
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from src.models.database import ApiKey, GlobalModel, Provider, Usage, User
+from src.services.usage.service import UsageRecordParams, UsageService
+
+
+@pytest.fixture()
+def db() -> Iterator[Session]:
+    engine = create_engine("sqlite://")
+    tables = [User.__table__, ApiKey.__table__, GlobalModel.__table__, Provider.__table__]
+    Usage.metadata.create_all(engine, tables=[*tables, Usage.__table__])
+    session = sessionmaker(bind=engine)()
+    session.add_all(
+        [
+            User(id="u1", username="alice", email_verified=True, used_usd=0.0, total_usd=0.0),
+            ApiKey(id="k1", user_id="u1", key_hash="h1", total_requests=0, total_cost_usd=0.0),
+            ApiKey(
+                id="k2",
+                user_id="u1",
+                key_hash="h2",
+                is_standalone=True,
+                total_requests=0,
+                total_cost_usd=0.0,
+                balance_used_usd=0.0,
+            ),
+            GlobalModel(name="m1", display_name="m1", default_tiered_pricing={}, usage_count=0),
+            Provider(id="p1", name="prov", monthly_used_usd=0.0),
+        ]
+    )
+    session.commit()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def _fake_prepare(cost: float = 0.5, before: Any = None) -> Any:
+    async def _prepare(
+        params_list: list[UsageRecordParams],
+    ) -> list[tuple[dict[str, Any], float, Exception | None]]:
+        if before is not None:
+            before()
+        out = []
+        for p in params_list:
+            usage_params = UsageService._build_usage_params(
+                db=p.db,
+                user=p.user,
+                api_key=p.api_key,
+                provider=p.provider,
+                model=p.model,
+                input_tokens=p.input_tokens,
+                output_tokens=p.output_tokens,
+                cache_creation_input_tokens=0,
+                cache_read_input_tokens=0,
+                request_type=p.request_type,
+                api_format=None,
+                endpoint_api_format=None,
+                has_format_conversion=False,
+                is_stream=True,
+                response_time_ms=10,
+                first_byte_time_ms=5,
+                status_code=200,
+                error_message=None,
+                metadata={},
+                request_headers=None,
+                request_body=None,
+                provider_request_headers=None,
+                response_headers=None,
+                client_response_headers=None,
+                response_body=None,
+                request_id=p.request_id,
+                provider_id=p.provider_id,
+                provider_endpoint_id=None,
+                provider_api_key_id=None,
+                status=p.status,
+                target_model=None,
+                input_cost=cost,
+                output_cost=0.0,
+                cache_creation_cost=0.0,
+                cache_read_cost=0.0,
+                cache_cost=0.0,
+                request_cost=0.0,
+                total_cost=cost,
+                input_price=None,
+                output_price=None,
+                cache_creation_price=None,
+                cache_read_price=None,
+                request_price=None,
+                actual_rate_multiplier=1.0,
+                is_free_tier=False,
+            )
+            out.append((usage_params, cost, None))
+        return out
+
+    return _prepare
+
+
+def _record(request_id: str, api_key_id: str = "k1") -> dict[str, Any]:
+    return {
+        "request_id": request_id,
+        "user_id": "u1",
+        "api_key_id": api_key_id,
+        "provider": "prov",
+        "provider_id": "p1",
+        "model": "m1",
+        "input_tokens": 10,
+        "output_tokens": 5,
+        "status": "completed",
+    }
+
+
+@pytest.fixture(autouse=True)
+def _no_body_logging(monkeypatch: pytest.MonkeyPatch) -> None:
+    from src.services.system.config import SystemConfigService
+
+    monkeypatch.setattr(SystemConfigService, "should_log_headers", lambda db: False)
+    monkeypatch.setattr(SystemConfigService, "should_log_body", lambda db: False)
+
+
+@pytest.mark.asyncio
+async def test_batch_inserts_rows_and_aggregates_once_per_table(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(UsageService, "_prepare_usage_records_batch", _fake_prepare())
+
+    records = [_record("r1"), _record("r2"), _record("r3", api_key_id="k2"), _record("r1")]
+    result = await UsageService.record_usage_batch(db, records)
+
+    assert sorted(u.request_id for u in result) == ["r1", "r2", "r3"]
+    rows = db.query(Usage).order_by(Usage.request_id).all()
+    assert [r.request_id for r in rows] == ["r1", "r2", "r3"]
+    assert all(r.billing_status == "settled" and r.finalized_at is not None for r in rows)
+
+    db.expire_all()
+    # 独立 Key（k2）不计入用户
+    assert db.get(User, "u1").used_usd == pytest.approx(1.0)
+    assert db.get(ApiKey, "k1").total_requests == 2
+    assert db.get(ApiKey, "k1").balance_used_usd in (None, 0.0)
+    assert db.get(ApiKey, "k2").balance_used_usd == pytest.approx(0.5)
+    assert db.query(GlobalModel).filter_by(name="m1").one().usage_count == 3
+    assert db.get(Provider, "p1").monthly_used_usd == pytest.approx(1.5)
+
+
+@pytest.mark.asyncio
+async def test_batch_conflict_with_concurrent_pending_row_is_updated(
+    db: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    engine = db.get_bind()
+
+    def _concurrent_insert() -> None:
+        # 预查询之后、写入之前，另一个写入方插入了 pending / settled 记录
+        other = sessionmaker(bind=engine)()
+        other.add_all(
+            [
+                Usage(
+                    request_id="pending-1",
+                    provider_name="prov",
+                    model="m1",
+                    status="streaming",
+                    billing_status="pending",
+                ),
+                Usage(
+                    request_id="settled-1",
+                    provider_name="prov",
+                    model="m1",
+                    status="completed",
+                    billing_status="settled",
+                ),
+            ]
+        )
+        other.commit()
+        other.close()
+
+    monkeypatch.setattr(
+        UsageService, "_prepare_usage_records_batch", _fake_prepare(before=_concurrent_insert)
+    )
+
+    await UsageService.record_usage_batch(
+        db, [_record("pending-1"), _record("settled-1"), _record("new-1")]
+    )
+
+    db.expire_all()
+    pending = db.query(Usage).filter_by(request_id="pending-1").one()
+    assert pending.status == "completed"
+    assert pending.billing_status == "settled"
+    assert pending.input_tokens == 10
+    assert db.query(Usage).count() == 3
+    # 已结算的冲突行不重复计费
+    assert db.get(User, "u1").used_usd == pytest.approx(1.0)
+    assert db.get(ApiKey, "k1").total_requests == 2
@@ -499,8 +499,10 @@ class MockRedisForConsumer:
             return self.xautoclaim_results.pop(0)
         return None
 
-    async def xack(self, key: str, group: str, message_id: str) -> Any:
-        self.xack_calls.append((key, group, message_id))
+    async def xack(self, key: str, group: str, *message_ids: str) -> Any:
+        for message_id in message_ids:
+            self.xack_calls.append((key, group, message_id))
+        return len(message_ids)
 
     async def xadd(
         self,
@@ -1325,3 +1327,40 @@ async def test_record_usage_batch_updates_when_status_completed_billing_pending(
     assert existing.response_body == usage_params["response_body"]
     assert existing.billing_status == "settled"
     assert existing.finalized_at is not None
+
+
+@pytest.mark.asyncio
+async def test_consumer_acks_whole_batch_and_reports_throughput(monkeypatch: Any) -> None:
+    """整批成功后单条 XACK，吞吐随 _log_metrics 输出"""
+    mock_redis = MockRedisForConsumer()
+    monkeypatch.setattr("src.services.usage.consumer_streams.create_session", lambda: MagicMock())
+    monkeypatch.setattr(
+        "src.services.usage.consumer_streams.UsageService.record_usage_batch",
+        AsyncMock(return_value=[]),
+    )
+    xack_spy = AsyncMock(side_effect=mock_redis.xack)
+    mock_redis.xack = xack_spy  # type: ignore[method-assign]
+
+    consumer = UsageQueueConsumer()
+    messages = []
+    for i in range(4):
+        event = build_usage_event(
+            event_type=UsageEventType.COMPLETED, request_id=f"req-{i}", data={"provider": "t"}
+        )
+        messages.append((f"msg-{i}", event.to_stream_fields(), event))
+
+    await consumer._process_record_batch(mock_redis, messages)
+
+    xack_spy.assert_awaited_once()
+    assert xack_spy.await_args.args[2:] == ("msg-0", "msg-1", "msg-2", "msg-3")
+
+    logged: list[str] = []
+    monkeypatch.setattr(
+        "src.services.usage.consumer_streams.logger.info", lambda msg: logged.append(msg)
+    )
+    consumer._last_metrics_log = 0
+    consumer._metrics_interval = 0
+    await consumer._log_metrics(mock_redis)
+
+    assert logged and "throughput=" in logged[0] and "processed=4" in logged[0]
+    assert consumer._processed_since_log == 0
@@ -0,0 +1,245 @@
+"""
+Usage 队列分片 / 租约 / 背压测试
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterator
+from typing import Any
+
+import pytest
+
+from src.config.settings import config
+from src.services.usage import sharding
+from src.services.usage.consumer_streams import UsageQueueConsumer
+from src.services.usage.events import UsageEvent
+from src.services.usage.sharding import (
+    Backpressure,
+    ShardLeaseManager,
+    get_backpressure,
+    publish_shard_lag,
+    shard_for,
+    stream_key_for_shard,
+)
+from src.services.usage.telemetry_writer import QueueTelemetryWriter
+
+
+class FakeRedis:
+    """内存版 Redis：只实现租约 / 成员表 / lag hash / XADD 用到的命令"""
+
+    def __init__(self) -> None:
+        self.kv: dict[str, str] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+        self.hashes: dict[str, dict[str, str]] = {}
+        self.xadds: list[tuple[str, dict[str, str]]] = []
+
+    def pipeline(self) -> "FakePipeline":
+        return FakePipeline(self)
+
+    async def zadd(self, key: str, mapping: dict[str, float]) -> int:
+        self.zsets.setdefault(key, {}).update(mapping)
+        return len(mapping)
+
+    async def zremrangebyscore(self, key: str, min: Any, max: float) -> int:
+        zset = self.zsets.get(key, {})
+        stale = [m for m, score in zset.items() if score <= max]
+        for m in stale:
+            del zset[m]
+        return len(stale)
+
+    async def zrange(self, key: str, start: int, end: int) -> list[str]:
+        zset = self.zsets.get(key, {})
+        return sorted(zset, key=zset.__getitem__)
+
+    async def zrem(self, key: str, member: str) -> int:
+        return 1 if self.zsets.get(key, {}).pop(member, None) is not None else 0
+
+    async def eval(self, script: str, numkeys: int, key: str, owner: str, *args: Any) -> int:
+        current = self.kv.get(key)
+        if script == sharding._ACQUIRE_LEASE_SCRIPT:
+            if current in (None, owner):
+                self.kv[key] = owner
+                return 1
+            return 0
+        if current == owner:
+            del self.kv[key]
+            return 1
+        return 0
+
+    async def hset(self, key: str, mapping: dict[str, Any]) -> int:
+        self.hashes.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+        return len(mapping)
+
+    async def hgetall(self, key: str) -> dict[str, str]:
+        return dict(self.hashes.get(key, {}))
+
+    async def expire(self, key: str, seconds: int) -> bool:
+        return True
+
+    async def xadd(self, key: str, fields: dict[str, str], **kwargs: Any) -> str:
+        self.xadds.append((key, fields))
+        return "1-0"
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis) -> None:
+        self._redis = redis
+        self._calls: list[tuple[str, tuple[Any, ...], dict[str, Any]]] = []
+
+    def __getattr__(self, name: str) -> Any:
+        def _queue(*args: Any, **kwargs: Any) -> "FakePipeline":
+            self._calls.append((name, args, kwargs))
+            return self
+
+        return _queue
+
+    async def execute(self) -> list[Any]:
+        return [await getattr(self._redis, n)(*a, **kw) for n, a, kw in self._calls]
+
+
+@pytest.fixture()
+def shards() -> Iterator[None]:
+    old = (
+        config.usage_queue_shards,
+        config.usage_queue_stream_key,
+        config.usage_queue_backpressure_lag,
+        config.usage_queue_drop_lag,
+    )
+    config.usage_queue_shards = 4
+    config.usage_queue_stream_key = "usage:events:shard-test"
+    config.usage_queue_backpressure_lag = 100
+    config.usage_queue_drop_lag = 1000
+    sharding._lag_cache.fetched_at = 0.0
+    sharding._lag_cache.values = {}
+    try:
+        yield
+    finally:
+        (
+            config.usage_queue_shards,
+            config.usage_queue_stream_key,
+            config.usage_queue_backpressure_lag,
+            config.usage_queue_drop_lag,
+        ) = old
+        sharding._lag_cache.fetched_at = 0.0
+        sharding._lag_cache.values = {}
+
+
+def test_single_shard_keeps_legacy_stream_key() -> None:
+    assert stream_key_for_shard(0) == config.usage_queue_stream_key
+    assert shard_for("u1", "k1") == 0
+    assert ShardLeaseManager("c1").owned_stream_keys() == [config.usage_queue_stream_key]
+
+
+@pytest.mark.asyncio
+async def test_growing_shard_count_keeps_legacy_stream(shards: None) -> None:
+    legacy = config.usage_queue_stream_key
+    config.usage_queue_shards = 1
+    assert sharding.all_stream_keys() == [legacy]
+
+    # 调大分片数后旧 Stream 仍是分片 0，其持有者继续认领旧的未确认消息
+    config.usage_queue_shards = 4
+    assert sharding.all_stream_keys()[0] == legacy
+    assert len(set(sharding.all_stream_keys())) == 4
+
+    redis = FakeRedis()
+    claimed: list[str] = []
+
+    async def _xautoclaim(stream_key: str, *args: Any, **kwargs: Any) -> Any:
+        claimed.append(stream_key)
+        return None
+
+    redis.xautoclaim = _xautoclaim  # type: ignore[attr-defined]
+    consumer = UsageQueueConsumer()
+    await consumer._leases.rebalance(redis, force=True)
+    assert consumer._leases.owned == {0, 1, 2, 3}
+    consumer._last_claim = 0.0
+    await consumer._maybe_claim_pending(redis)
+    assert legacy in claimed
+
+
+def test_shard_for_is_stable_and_keyed_by_user(shards: None) -> None:
+    assert stream_key_for_shard(2) == "usage:events:shard-test:2"
+    assert shard_for("user-a", "k1") == shard_for("user-a", "k2")
+    assert {shard_for(f"user-{i}", None) for i in range(200)} == {0, 1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_leases_rebalance_on_join_and_leave(shards: None) -> None:
+    redis = FakeRedis()
+    a, b = ShardLeaseManager("consumer-a"), ShardLeaseManager("consumer-b")
+
+    assert await a.rebalance(redis, force=True) == {0, 1, 2, 3}
+
+    # b 加入：a 下一轮释放应归 b 的分片，b 随后接管
+    await b.rebalance(redis, force=True)
+    await a.rebalance(redis, force=True)
+    await b.rebalance(redis, force=True)
+    assert a.owned | b.owned == {0, 1, 2, 3}
+    assert a.owned and b.owned and not (a.owned & b.owned)
+
+    # b 退出：释放租约后 a 接管全部分片
+    await b.release_all(redis)
+    assert await a.rebalance(redis, force=True) == {0, 1, 2, 3}
+
+
+@pytest.mark.asyncio
+async def test_backpressure_levels_follow_published_lag(shards: None) -> None:
+    redis = FakeRedis()
+    await publish_shard_lag(redis, {0: 5, 1: 150, 2: 5000})
+
+    assert await get_backpressure(redis, 0) == Backpressure.NONE
+    assert await get_backpressure(redis, 1) == Backpressure.DEGRADE
+    assert await get_backpressure(redis, 2) == Backpressure.DROP
+
+
+@pytest.mark.asyncio
+async def test_writer_drops_bodies_before_events(
+    shards: None, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    redis = FakeRedis()
+
+    async def _get_redis_client(require_redis: bool = False) -> Any:
+        return redis
+
+    monkeypatch.setattr("src.services.usage.telemetry_writer.get_redis_client", _get_redis_client)
+
+    writer = QueueTelemetryWriter(
+        request_id="req-1", user_id="user-a", api_key_id="k1", log_level="full"
+    )
+    shard = shard_for("user-a", "k1")
+    kwargs = {"provider": "p", "model": "m", "input_tokens": 1, "request_body": {"x": 1}}
+
+    await publish_shard_lag(redis, {shard: 150})
+    await writer.record_success(**kwargs)
+    key, fields = redis.xadds[-1]
+    data = UsageEvent.from_stream_fields(fields).data
+    assert key == stream_key_for_shard(shard)
+    assert data["input_tokens"] == 1 and "request_body" not in data
+
+    await publish_shard_lag(redis, {shard: 5000})
+    sharding._lag_cache.fetched_at = 0.0
+    await writer.record_success(**kwargs)
+    assert len(redis.xadds) == 1
+
+
+@pytest.mark.asyncio
+async def test_consumer_reads_only_owned_shards(shards: None) -> None:
+    redis = FakeRedis()
+    read_streams: list[dict[str, str]] = []
+
+    async def _xreadgroup(**kwargs: Any) -> Any:
+        read_streams.append(kwargs["streams"])
+        return None
+
+    redis.xreadgroup = _xreadgroup  # type: ignore[attr-defined]
+
+    consumer = UsageQueueConsumer()
+    other = ShardLeaseManager("other")
+    await consumer._leases.rebalance(redis, force=True)
+    await other.rebalance(redis, force=True)
+    await consumer._leases.rebalance(redis, force=True)
+
+    await consumer._read_new(redis)
+
+    assert set(read_streams[0]) == set(consumer._leases.owned_stream_keys())
+    assert len(read_streams[0]) < 4
@@ -59,7 +59,7 @@ def _make_db() -> MagicMock:
     )
 
     q_usage = MagicMock()
-    q_usage.filter.return_value.first.return_value = usage_obj
+    q_usage.filter.return_value.with_for_update.return_value.first.return_value = usage_obj
     q_user = MagicMock()
     q_user.filter.return_value.first.return_value = user_obj
     q_key = MagicMock()
@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import hashlib
+
+from src.utils import json_codec
+from src.utils.conversation_fingerprint import fingerprint_messages, message_digest
+
+_HISTORY = [
+    {"role": "user", "content": "hi"},
+    {"role": "assistant", "content": [{"type": "text", "text": "hello"}]},
+    {"role": "user", "content": "继续", "temperature": 1e16},
+]
+
+
+def test_prefix_chain_is_shared_between_turns() -> None:
+    previous = fingerprint_messages(_HISTORY[:2], namespace="ns")
+    current = fingerprint_messages(_HISTORY, namespace="ns")
+
+    assert current.chain[:2] == previous.chain
+    assert current.chain[1].hex() == previous.conversation_id
+    assert fingerprint_messages(_HISTORY, namespace="other").chain[0] != current.chain[0]
+
+
+def test_digest_ignores_key_order_but_not_content() -> None:
+    reordered = [{k: m[k] for k in reversed(list(m))} for m in _HISTORY]
+    assert fingerprint_messages(reordered) == fingerprint_messages(_HISTORY)
+
+    edited = list(_HISTORY)
+    edited[1] = {"role": "assistant", "content": [{"type": "text", "text": "hello!"}]}
+    fingerprint = fingerprint_messages(edited)
+    assert fingerprint.chain[0] == fingerprint_messages(_HISTORY).chain[0]
+    assert fingerprint.chain[1] != fingerprint_messages(_HISTORY).chain[1]
+
+
+def test_portable_digest_does_not_depend_on_json_backend() -> None:
+    previous = json_codec.backend_name()
+    try:
+        digests = set()
+        for backend in json_codec.AVAILABLE_BACKENDS:
+            json_codec.set_backend(backend)
+            digests.add(message_digest(_HISTORY[2], portable=True))
+    finally:
+        json_codec.set_backend(previous)
+
+    raw = '{"content":"继续","role":"user","temperature":1e+16}'.encode()
+    assert digests == {hashlib.blake2b(raw, digest_size=16).digest()}
+
+
+def test_empty_conversation() -> None:
+    empty = fingerprint_messages([], namespace="ns")
+    assert empty.chain == ()
+    assert empty.conversation_id == fingerprint_messages([], namespace="ns").conversation_id
+    assert empty.conversation_id != fingerprint_messages([], namespace="other").conversation_id
@@ -0,0 +1,70 @@
+"""
+导入冒烟测试：在全新解释器中单独导入模块，检查导入环
+
+pytest 进程内模块已按某种顺序加载过，导入环不会暴露，因此每个模块起一个子进程单独导入。
+"""
+
+from __future__ import annotations
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+_ROOT = Path(__file__).resolve().parents[2]
+
+_MODULES = [
+    "src.services.cache",
+    "src.services.cache.backend",
+    "src.services.cache.local",
+    "src.services.cache.tiered",
+    "src.services.cache.model_cache",
+    "src.services.cache.user_cache",
+    "src.services.cache.provider_cache",
+    "src.services.billing.pricing_snapshot",
+    "src.services.usage.tokenizer",
+    "src.utils.conversation_fingerprint",
+]
+
+
+@pytest.mark.parametrize("module", _MODULES)
+def test_module_imports_standalone(module: str) -> None:
+    env = {**os.environ, "ENVIRONMENT": "development"}
+    result = subprocess.run(
+        [sys.executable, "-c", f"import {module}"],
+        cwd=_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+
+# 进程池（spawn）任务模块 -> 允许连带导入的 src 模块；子进程不得加载应用（配置、日志、数据库）
+_WORKER_MODULES = {
+    "src.utils.tiktoken_worker": set(),
+    "src.utils.body_codec": {"src.utils.compression", "src.utils.json_codec"},
+}
+
+
+@pytest.mark.parametrize("module", sorted(_WORKER_MODULES))
+def test_worker_module_imports_no_app_modules(module: str) -> None:
+    code = (
+        f"import sys, {module}\n"
+        "loaded = sorted(m for m in sys.modules if m.startswith('src.'))\n"
+        "print(','.join(loaded))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=_ROOT,
+        env={**os.environ, "ENVIRONMENT": "development"},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+    loaded = set(result.stdout.strip().split(","))
+    assert loaded <= {"src._version", "src.utils", module, *_WORKER_MODULES[module]}, loaded
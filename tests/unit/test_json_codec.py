@@ -0,0 +1,104 @@
+import dataclasses
+import json
+import uuid
+from collections.abc import Iterator
+from datetime import datetime
+
+import pytest
+
+from src.utils import json_codec
+
+_SAMPLE = {
+    "model": "claude-测试",
+    "choices": [{"index": 0, "delta": {"content": '你好 🎉\n"quoted"'}, "finish_reason": None}],
+    "usage": {"prompt_tokens": 3, "completion_tokens": 4.5, "cached": True},
+    "z": 1,
+    "a": 2,
+}
+
+
+@pytest.fixture(params=json_codec.AVAILABLE_BACKENDS)
+def backend(request: pytest.FixtureRequest) -> Iterator[str]:
+    previous = json_codec.backend_name()
+    yield json_codec.set_backend(request.param)
+    json_codec.set_backend(previous)
+
+
+def test_round_trip_preserves_non_ascii_and_key_order(backend: str) -> None:
+    encoded = json_codec.dumps(_SAMPLE)
+    assert "你好" in encoded and "\\u" not in encoded
+    assert json_codec.loads(encoded) == _SAMPLE
+    assert list(json_codec.loads(json_codec.dumpb(_SAMPLE))) == list(_SAMPLE)
+
+
+def test_sort_keys_and_default(backend: str) -> None:
+    assert list(json_codec.loads(json_codec.dumps(_SAMPLE, sort_keys=True))) == sorted(_SAMPLE)
+
+    class _Obj:
+        def __str__(self) -> str:
+            return "obj"
+
+    assert json_codec.loads(json_codec.dumps({"v": _Obj()}, default=str)) == {"v": "obj"}
+
+
+def test_loads_accepts_bytes_and_raises_stdlib_error(backend: str) -> None:
+    assert json_codec.loads(b'{"a": [1, 2]}') == {"a": [1, 2]}
+    with pytest.raises(json.JSONDecodeError):
+        json_codec.loads(b"{not json")
+
+
+def test_output_is_compact_and_identical_across_backends(backend: str) -> None:
+    expected = json.dumps(_SAMPLE, ensure_ascii=False, separators=(",", ":"))
+    assert json_codec.dumps(_SAMPLE) == expected
+    assert json_codec.dumpb(_SAMPLE) == expected.encode()
+    assert json_codec.dumps(_SAMPLE, sort_keys=True) == json.dumps(
+        _SAMPLE, ensure_ascii=False, separators=(",", ":"), sort_keys=True
+    )
+
+
+def test_unknown_or_missing_backend_falls_back_to_auto() -> None:
+    previous = json_codec.backend_name()
+    try:
+        assert json_codec.set_backend("no-such-codec") == json_codec.AVAILABLE_BACKENDS[0]
+    finally:
+        json_codec.set_backend(previous)
+
+
+def test_values_outside_fast_backend_match_stdlib(backend: str) -> None:
+    big = {"id": 2**70, "neg": -(2**65), "nested": [1, {"n": 2**64}]}
+    assert json_codec.loads(json_codec.dumps(big))["neg"] == -(2**65)
+    assert json.loads(json_codec.dumpb(big, sort_keys=True)) == big
+
+    special = {"nan": float("nan"), "inf": [float("inf"), -float("inf")], "none": None}
+    encoded = json_codec.dumps(special)
+    assert "NaN" in encoded and "Infinity" in encoded and "-Infinity" in encoded
+    decoded = json_codec.loads(encoded)
+    assert decoded["nan"] != decoded["nan"]
+    assert decoded["inf"] == [float("inf"), -float("inf")] and decoded["none"] is None
+
+    # 不含 NaN 的 null 仍走快速路径；真正不可序列化的对象抛出 TypeError
+    assert json_codec.loads(json_codec.dumps({"a": None, "b": 1.5})) == {"a": None, "b": 1.5}
+    with pytest.raises(TypeError):
+        json_codec.dumps({"v": object()})
+
+
+def test_wide_integers_decode_like_stdlib(backend: str) -> None:
+    raw = '{"arguments":{"id":123456789012345678901234567890,"neg":-9223372036854775809}}'
+    assert json_codec.loads(raw) == json.loads(raw)
+    assert json_codec.loads(raw.encode())["arguments"]["id"] == 123456789012345678901234567890
+    assert json_codec.dumps(json_codec.loads(raw)) == raw
+    # 字符串中的长数字串同样按标准库解码，结果不变
+    assert json_codec.loads(b'{"id":"12345678901234567890123"}') == {
+        "id": "12345678901234567890123"
+    }
+
+
+def test_default_handles_types_fast_backends_encode_natively(backend: str) -> None:
+    @dataclasses.dataclass
+    class _Point:
+        x: int
+
+    value = {"at": datetime(2024, 1, 1), "id": uuid.UUID(int=1), "point": _Point(1)}
+    expected = json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+    assert json_codec.dumps(value, default=str) == expected
+    assert '"2024-01-01 00:00:00"' in expected
@@ -0,0 +1,120 @@
+"""
+滑动窗口计数器测试
+
+覆盖：与逐请求时间戳的滑动窗口对比的准确性、窗口边界不允许双倍突发、
+retry_after 指向真正可放行的时刻、策略按数据库 rate_limit 计数并清理空闲键、
+Redis 后端按存储的双窗口计数估算。
+"""
+
+from __future__ import annotations
+
+import random
+from collections import deque
+from typing import Any
+
+import pytest
+
+from src.plugins.rate_limit import sliding_window_counter as swc
+from src.plugins.rate_limit.sliding_window_counter import (
+    RedisSlidingWindowCounterBackend,
+    SlidingWindowCounterStrategy,
+    WindowCounter,
+)
+
+
+def _exact_admit(log: deque[float], now: float, window: float, limit: int) -> bool:
+    while log and log[0] <= now - window:
+        log.popleft()
+    if len(log) < limit:
+        log.append(now)
+        return True
+    return False
+
+
+def test_accuracy_against_exact_window() -> None:
+    rng = random.Random(3)
+    window, limit = 60.0, 1000
+    counter = WindowCounter(window, limit)
+    exact: deque[float] = deque()
+    admitted: list[float] = []
+    exact_total = 0
+
+    now = 6000.0
+    for _ in range(60_000):
+        # 泊松到达，平均速率为限制的 1.5 倍
+        now += rng.expovariate(limit * 1.5 / window)
+        if counter.add_request(now):
+            admitted.append(now)
+        exact_total += _exact_admit(exact, now, window, limit)
+
+    # 任意滑动窗口内的放行数只允许极小的超出
+    peak, j = 0, 0
+    for i, ts in enumerate(admitted):
+        while admitted[j] <= ts - window:
+            j += 1
+        peak = max(peak, i - j + 1)
+    assert peak <= limit * 1.02
+    # 总放行量与精确滑动窗口相差不超过 2%
+    assert abs(len(admitted) - exact_total) <= exact_total * 0.02
+
+
+def test_no_double_burst_at_boundary() -> None:
+    counter = WindowCounter(60, 100)
+    assert all(counter.add_request(119.0) for _ in range(100))
+    assert not counter.add_request(119.5)
+    # 固定窗口会在 120s 放行新的 100 个；加权估算只放行衰减出的部分
+    assert not counter.add_request(120.0)
+    assert counter.get_remaining(135.0) == 25
+
+    wait = counter.get_retry_after(120.0, amount=10)
+    assert wait is not None
+    assert not counter.can_accept(120.0 + wait - 0.5, amount=10)
+    assert counter.can_accept(120.0 + wait, amount=10)
+
+
+@pytest.mark.asyncio
+async def test_strategy_uses_rate_limit_and_drops_idle(monkeypatch: pytest.MonkeyPatch) -> None:
+    clock = [1200.0]
+    monkeypatch.setattr(swc.time, "time", lambda: clock[0])
+    monkeypatch.setenv("RATE_LIMIT_BACKEND", "memory")
+    strategy = SlidingWindowCounterStrategy()
+
+    for _ in range(5):
+        assert await strategy.consume("api_key:k1", rate_limit=5)
+    assert not await strategy.consume("api_key:k1", rate_limit=5)
+
+    result = await strategy.check_limit("api_key:k1", rate_limit=5)
+    assert not result.allowed and result.remaining == 0
+    # 窗口已满：下一窗口过去 20% 后，上一窗口权重衰减到可再放行 1 个
+    assert result.retry_after == 73
+
+    clock[0] += 10_000
+    await strategy.check_limit("api_key:k2")
+    assert list(strategy.counters) == ["api_key:k2"]
+
+
+class FakeRedis:
+    def __init__(self, hashes: dict[str, list[Any]]) -> None:
+        self.hashes = hashes
+
+    def register_script(self, _script: str) -> Any:
+        return None
+
+    async def hmget(self, key: str, *_fields: str) -> list[Any]:
+        return self.hashes.get(key, [None, None, None])
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_peek(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(swc.time, "time", lambda: 90.0)
+    redis = FakeRedis({"rate_limit:window:user:u1": [b"1", b"30", b"40"]})
+    backend = RedisSlidingWindowCounterBackend(redis)
+
+    # 上一窗口 40 * 0.5 + 当前窗口 30 = 50
+    result = await backend.peek("user:u1", 60, 60, amount=1)
+    assert result.allowed and result.remaining == 10
+    stats = await backend.get_stats("user:u1", 60, 60)
+    assert (stats["current_requests"], stats["backend"]) == (50.0, "redis")
+
+    empty = await backend.peek("user:u2", 60, 60, amount=1)
+    assert empty.remaining == 60
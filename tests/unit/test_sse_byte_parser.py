@@ -0,0 +1,132 @@
+import json
+import random
+
+import pytest
+
+from src.utils.sse_parser import SSEByteParser, SSEEventParser
+
+
+def _reference_events(raw: bytes) -> list[dict[str, str | None]]:
+    """按 StreamProcessor 的方式（按 LF 切分、剔除 CR）驱动旧解析器"""
+    parser = SSEEventParser()
+    text = raw.decode("utf-8", errors="replace")
+    lines = text.split("\n")
+    events: list[dict[str, str | None]] = []
+    for line in lines[:-1]:
+        events.extend(parser.feed_line(line.rstrip("\r")))
+    if lines[-1]:
+        events.extend(parser.feed_line(lines[-1].rstrip("\r")))
+    events.extend(parser.flush())
+    return events
+
+
+def _byte_parser_events(raw: bytes, cuts: list[int]) -> list[dict[str, str | None]]:
+    parser = SSEByteParser()
+    events = []
+    start = 0
+    for cut in [*cuts, len(raw)]:
+        events.extend(e.as_dict() for e in parser.feed(raw[start:cut]))
+        start = cut
+    events.extend(e.as_dict() for e in parser.flush())
+    return events
+
+
+_LINE_POOL = [
+    "event: message_start",
+    "event: content_block_delta",
+    'data: {"type":"content_block_delta","delta":{"text":"你好 world"}}',
+    'data:{"no_space":true}',
+    "data: [DONE]",
+    "data:",
+    "id: 42",
+    "retry: 1000",
+    ": keep-alive comment",
+    ":: not a comment",
+    "event: ping data: {}",
+    '{"candidates":[{"content":{"parts":[{"text":"raw"}]}}]}',
+    "",
+    "",
+]
+
+
+def _random_stream(rng: random.Random) -> bytes:
+    newline = rng.choice(["\n", "\r\n"])
+    lines = [rng.choice(_LINE_POOL) for _ in range(rng.randint(1, 40))]
+    raw = newline.join(lines)
+    if rng.random() < 0.7:
+        raw += newline
+    return raw.encode("utf-8")
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_byte_parser_matches_line_parser(seed: int) -> None:
+    rng = random.Random(seed)
+    raw = _random_stream(rng)
+    cuts = sorted(rng.sample(range(len(raw) + 1), k=min(len(raw), rng.randint(0, 12))))
+
+    assert _byte_parser_events(raw, cuts) == _reference_events(raw)
+
+
+def test_byte_parser_handles_all_line_terminators() -> None:
+    for sep in (b"\n", b"\r\n", b"\r"):
+        raw = sep.join([b"event: a", b"data: 1", b"", b"data: 2", b"", b""])
+        # 逐字节喂入，覆盖 CRLF 跨 chunk 的情况
+        parser = SSEByteParser()
+        events = [e for i in range(len(raw)) for e in parser.feed(raw[i : i + 1])]
+        events.extend(parser.flush())
+        assert [(e.event, e.data) for e in events] == [("a", "1"), (None, "2")]
+
+
+def test_byte_parser_defers_decoding_and_supports_json() -> None:
+    parser = SSEByteParser()
+    payload = {"type": "message_delta", "usage": {"output_tokens": 3}}
+    events = list(parser.feed(f"event: message_delta\ndata: {json.dumps(payload)}\n\n".encode()))
+
+    assert len(events) == 1
+    assert isinstance(events[0].data_bytes, bytes)
+    assert events[0].event_bytes == b"message_delta"
+    assert events[0].json() == payload
+    assert parser.line_count == 2
+
+
+def test_byte_parser_keeps_unconsumed_lines_for_next_feed() -> None:
+    parser = SSEByteParser()
+    it = parser.feed(b"data: 1\n\ndata: 2\n\n")
+    first = next(it)
+    it.close()
+
+    rest = list(parser.feed(b"data: 3\n\n"))
+    assert [first.data] + [e.data for e in rest] == ["1", "2", "3"]
+
+
+def test_byte_parser_accepts_buffer_types() -> None:
+    parser = SSEByteParser()
+    raw = b"data: 1\r\n\r\ndata: 2\n\n"
+    events = list(parser.feed(bytearray(raw[:9])))
+    events.extend(parser.feed(memoryview(raw)[9:]))
+    assert [e.data for e in events] == ["1", "2"]
+
+
+def test_byte_parser_json_array_lines() -> None:
+    raw = b'[\n{"a": 1},\n{"a": 2}\n]\n'
+    parser = SSEByteParser(json_array_lines=True)
+    events = list(parser.feed(raw)) + parser.flush()
+    assert [e.json() for e in events] == [{"a": 1}, {"a": 2}]
+    # 默认把无前缀行追加为同一事件的 data
+    plain = SSEByteParser()
+    assert [e.data for e in list(plain.feed(raw)) + plain.flush()] == [raw.decode().rstrip("\n")]
+
+
+def test_byte_parser_feed_lines_yields_raw_lines_with_events() -> None:
+    parser = SSEByteParser()
+    raw = "event: a\r\ndata: 你好\r\n\r\ndata: tail".encode()
+    # 在多字节字符中间切分
+    cut = raw.index("好".encode()) + 1
+    lines = list(parser.feed_lines(raw[:cut])) + list(parser.feed_lines(raw[cut:]))
+    assert [line for line, _ in lines] == [b"event: a", "data: 你好".encode(), b""]
+    assert [(e.event, e.data) for e in lines[2][1]] == [("a", "你好")]
+
+    rest = parser.flush_lines()
+    assert [line for line, _ in rest] == [b"data: tail"]
+    assert [e.data for e in parser.flush()] == ["tail"]
+    assert parser.line_count == 3